@@ -0,0 +1,38 @@
+"""Create scheduled_job_runs ledger for MSK calendar background jobs.
+
+Revision ID: 0150_scheduled_job_runs
+Revises: 0149_item_ilvl_stat_scale
+"""
+
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0150_scheduled_job_runs"
+down_revision: Union[str, None] = "0149_item_ilvl_stat_scale"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "scheduled_job_runs",
+        sa.Column("job_name", sa.String(length=64), nullable=False),
+        sa.Column("last_slot_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("prev_slot_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("status", sa.String(length=16), nullable=False, server_default="idle"),
+        sa.Column("claimed_by", sa.String(length=128), nullable=True),
+        sa.Column("lease_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.PrimaryKeyConstraint("job_name"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("scheduled_job_runs")
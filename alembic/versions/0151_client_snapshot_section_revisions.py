@@ -0,0 +1,29 @@
+"""Per-section revision tokens for player_client_snapshots.
+
+Revision ID: 0151_client_snapshot_section_revisions
+Revises: 0150_scheduled_job_runs
+"""
+
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision: str = "0151_client_snapshot_section_revisions"
+down_revision: Union[str, None] = "0150_scheduled_job_runs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "player_client_snapshots",
+        sa.Column("section_revisions_json", JSONB(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("player_client_snapshots", "section_revisions_json")
@@ -0,0 +1,54 @@
+"""Hourly rollups for llm_usage_log.
+
+Revision ID: 0152_llm_usage_hourly
+Revises: 0151_client_snapshot_section_revisions
+"""
+
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0152_llm_usage_hourly"
+down_revision: Union[str, None] = "0151_client_snapshot_section_revisions"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "llm_usage_hourly",
+        sa.Column("hour", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("caller", sa.String(length=80), nullable=False),
+        sa.Column("modality", sa.String(length=16), nullable=False),
+        sa.Column("provider", sa.String(length=32), nullable=False),
+        sa.Column("model", sa.String(length=120), nullable=False, server_default=""),
+        sa.Column("source", sa.String(length=16), nullable=False, server_default="background"),
+        sa.Column("requests", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("ok", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("prompt_tokens", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("completion_tokens", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("latency_ms_sum", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("hour", "caller", "modality", "provider", "model", "source"),
+    )
+    # Backfill from the existing raw log so reports over old windows stay complete.
+    op.execute(
+        """
+        INSERT INTO llm_usage_hourly
+            (hour, caller, modality, provider, model, source,
+             requests, ok, prompt_tokens, completion_tokens, latency_ms_sum)
+        SELECT date_trunc('hour', created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+               caller, modality, provider, COALESCE(model, ''), source,
+               COUNT(*), SUM(CASE WHEN ok THEN 1 ELSE 0 END),
+               COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(completion_tokens), 0),
+               COALESCE(SUM(latency_ms), 0)
+        FROM llm_usage_log
+        GROUP BY 1, 2, 3, 4, 5, 6
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("llm_usage_hourly")
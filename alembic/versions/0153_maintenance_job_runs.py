@@ -0,0 +1,50 @@
+"""Checkpointed bulk maintenance runs.
+
+Revision ID: 0153_maintenance_job_runs
+Revises: 0152_llm_usage_hourly
+"""
+
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0153_maintenance_job_runs"
+down_revision: Union[str, None] = "0152_llm_usage_hourly"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "maintenance_job_runs",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("job_name", sa.String(length=64), nullable=False),
+        sa.Column("params", postgresql.JSONB(), nullable=False, server_default=sa.text("'{}'::jsonb")),
+        sa.Column("dry_run", sa.Boolean(), nullable=False, server_default=sa.text("false")),
+        sa.Column("status", sa.String(length=16), nullable=False, server_default="pending"),
+        sa.Column("cursor", sa.BigInteger(), nullable=True),
+        sa.Column("chunk_size", sa.Integer(), nullable=False, server_default="200"),
+        sa.Column("total_estimate", sa.Integer(), nullable=True),
+        sa.Column("processed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("changed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("errors", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("cancel_requested", sa.Boolean(), nullable=False, server_default=sa.text("false")),
+        sa.Column("claimed_by", sa.String(length=128), nullable=True),
+        sa.Column("lease_until", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_by", sa.BigInteger(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+    op.create_index("ix_maintenance_job_runs_status", "maintenance_job_runs", ["status", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_maintenance_job_runs_status", table_name="maintenance_job_runs")
+    op.drop_table("maintenance_job_runs")
@@ -0,0 +1,68 @@
+"""Player search index (pg_trgm + prefix B-trees).
+
+Revision ID: 0154_player_search_index
+Revises: 0153_maintenance_job_runs
+"""
+
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0154_player_search_index"
+down_revision: Union[str, None] = "0153_maintenance_job_runs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match services/player_search.normalize_name.
+_NORM = "regexp_replace(replace(lower(btrim(ltrim(btrim(coalesce({col}, '')), '@'))), 'ё', 'е'), '\\s+', ' ', 'g')"
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_table(
+        "player_search_index",
+        sa.Column(
+            "player_id",
+            sa.BigInteger(),
+            sa.ForeignKey("players.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("username_norm", sa.Text(), nullable=False, server_default=""),
+        sa.Column("first_name_norm", sa.Text(), nullable=False, server_default=""),
+        sa.Column("character_norm", sa.Text(), nullable=False, server_default=""),
+        sa.Column("search_text", sa.Text(), nullable=False, server_default=""),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+    username = _NORM.format(col="p.username")
+    first_name = _NORM.format(col="p.first_name")
+    character = _NORM.format(col="w.name")
+    op.execute(
+        f"""
+        INSERT INTO player_search_index
+            (player_id, username_norm, first_name_norm, character_norm, search_text)
+        SELECT p.id, {username}, {first_name}, {character},
+               btrim(regexp_replace(concat_ws(' ', {username}, {first_name}, {character}), '\\s+', ' ', 'g'))
+        FROM players p
+        LEFT JOIN main_waifus w ON w.player_id = p.id
+        """
+    )
+    op.create_index(
+        "ix_player_search_text_trgm",
+        "player_search_index",
+        ["search_text"],
+        postgresql_using="gin",
+        postgresql_ops={"search_text": "gin_trgm_ops"},
+    )
+    for name, col in (
+        ("ix_player_search_username_prefix", "username_norm"),
+        ("ix_player_search_first_name_prefix", "first_name_norm"),
+        ("ix_player_search_character_prefix", "character_norm"),
+    ):
+        op.create_index(name, "player_search_index", [col], postgresql_ops={col: "text_pattern_ops"})
+
+
+def downgrade() -> None:
+    op.drop_table("player_search_index")
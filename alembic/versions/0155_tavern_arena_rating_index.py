@@ -0,0 +1,24 @@
+"""Index tavern_states.arena_rating for matchmaking range scans.
+
+Revision ID: 0155_tavern_arena_rating_index
+Revises: 0154_player_search_index
+"""
+
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0155_tavern_arena_rating_index"
+down_revision: Union[str, None] = "0154_player_search_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_tavern_states_arena_rating", "tavern_states", ["arena_rating"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tavern_states_arena_rating", table_name="tavern_states")
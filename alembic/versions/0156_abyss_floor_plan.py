@@ -0,0 +1,29 @@
+"""Pre-rolled Abyss floors on abyss_progress.
+
+Revision ID: 0156_abyss_floor_plan
+Revises: 0155_tavern_arena_rating_index
+"""
+
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0156_abyss_floor_plan"
+down_revision: Union[str, None] = "0155_tavern_arena_rating_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "abyss_progress",
+        sa.Column("floor_plan", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("abyss_progress", "floor_plan")
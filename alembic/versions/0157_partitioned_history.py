@@ -0,0 +1,167 @@
+"""Monthly range partitions for player_event_log and economy_ledger; ledger idempotency keys.
+
+Rows are copied into the new partitioned tables (one partition per month from the oldest
+row up to 3 months ahead, plus a DEFAULT partition for rows outside every month; the daily
+history_partitions job keeps that horizon). Month math and partition DDL are inlined so the
+migration does not depend on application code. The
+partial unique index of idempotent ledger sources moves to economy_ledger_keys, since a
+unique index on a partitioned table must contain created_at.
+
+Revision ID: 0157_partitioned_history
+Revises: 0156_abyss_floor_plan
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0157_partitioned_history"
+down_revision: Union[str, None] = "0156_abyss_floor_plan"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+AHEAD_MONTHS = 3
+IDEMPOTENT_SOURCES_SQL = "('challenge_first','admin','temper','reforge','refine','respec')"
+
+EVENT_LOG_COLUMNS = "id, player_id, event_type, payload, created_at"
+EVENT_LOG_BODY = """
+    id BIGINT NOT NULL DEFAULT nextval('{seq}'),
+    player_id BIGINT NOT NULL REFERENCES players(id) ON DELETE CASCADE,
+    event_type VARCHAR(40) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{{}}'::jsonb,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+"""
+
+LEDGER_COLUMNS = "id, player_id, created_at, direction, currency_key, amount, source, ref_type, ref_id"
+LEDGER_BODY = """
+    id BIGINT NOT NULL DEFAULT nextval('{seq}'),
+    player_id BIGINT NOT NULL REFERENCES players(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    direction VARCHAR(8) NOT NULL,
+    currency_key VARCHAR(32) NOT NULL,
+    amount INTEGER NOT NULL,
+    source VARCHAR(32) NOT NULL,
+    ref_type VARCHAR(32),
+    ref_id VARCHAR(64),
+    CONSTRAINT ck_ledger_direction CHECK (direction IN ('in','out')),
+    CONSTRAINT ck_ledger_amount_nonneg CHECK (amount >= 0)
+"""
+
+
+def _month_start(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    dt = dt.astimezone(timezone.utc)
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+
+def _add_months(dt: datetime, n: int) -> datetime:
+    idx = dt.year * 12 + dt.month - 1 + int(n)
+    return dt.replace(year=idx // 12, month=idx % 12 + 1, day=1)
+
+
+def _create_partition_sql(table: str, month: datetime) -> str:
+    end = _add_months(month, 1)
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{table}_p{month:%Y%m}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def _sequence(table: str) -> str:
+    return str(op.get_bind().execute(sa.text(f"SELECT pg_get_serial_sequence('{table}', 'id')")).scalar())
+
+
+def _swap(table: str, body: str, columns: str, *, partitioned: bool) -> str:
+    """Rename ``table`` away, create its replacement and copy rows. Returns the old table name."""
+    bind = op.get_bind()
+    seq = _sequence(table)
+    old = f"{table}_{'unpartitioned' if partitioned else 'partitioned'}"
+    op.execute(sa.text(f"ALTER TABLE {table} RENAME TO {old}"))
+    op.execute(sa.text(f"ALTER INDEX {table}_pkey RENAME TO {old}_pkey"))
+    if partitioned:
+        op.execute(
+            sa.text(
+                f"CREATE TABLE {table} ({body.format(seq=seq)}, PRIMARY KEY (id, created_at)) "
+                "PARTITION BY RANGE (created_at)"
+            )
+        )
+        lo, hi = bind.execute(sa.text(f"SELECT min(created_at), max(created_at) FROM {old}")).one()
+        now = _month_start(datetime.now(timezone.utc))
+        month = _month_start(lo) if lo is not None else now
+        last = max(_add_months(now, AHEAD_MONTHS), _month_start(hi) if hi is not None else now)
+        while month <= last:
+            op.execute(sa.text(_create_partition_sql(table, month)))
+            month = _add_months(month, 1)
+        op.execute(sa.text(f'CREATE TABLE IF NOT EXISTS "{table}_default" PARTITION OF "{table}" DEFAULT'))
+    else:
+        op.execute(sa.text(f"CREATE TABLE {table} ({body.format(seq=seq)}, PRIMARY KEY (id))"))
+    op.execute(sa.text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {old}"))
+    op.execute(sa.text(f"ALTER SEQUENCE {seq} OWNED BY {table}.id"))
+    return old
+
+
+def upgrade() -> None:
+    old = _swap("player_event_log", EVENT_LOG_BODY, EVENT_LOG_COLUMNS, partitioned=True)
+    op.execute(sa.text(f"DROP TABLE {old}"))
+    op.create_index("ix_player_event_log_player_id", "player_event_log", ["player_id"])
+    op.create_index(
+        "ix_player_event_log_player_created",
+        "player_event_log",
+        ["player_id", sa.text("created_at DESC")],
+    )
+
+    op.create_table(
+        "economy_ledger_keys",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("player_id", sa.BigInteger(), sa.ForeignKey("players.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("source", sa.String(32), nullable=False),
+        sa.Column("ref_type", sa.String(32), nullable=True),
+        sa.Column("ref_id", sa.String(64), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+    op.execute(
+        sa.text(
+            "INSERT INTO economy_ledger_keys (player_id, source, ref_type, ref_id, created_at) "
+            "SELECT player_id, source, ref_type, ref_id, min(created_at) FROM economy_ledger "
+            f"WHERE source IN {IDEMPOTENT_SOURCES_SQL} GROUP BY player_id, source, ref_type, ref_id"
+        )
+    )
+    op.create_index(
+        "uq_economy_ledger_keys",
+        "economy_ledger_keys",
+        ["player_id", "source", "ref_type", "ref_id"],
+        unique=True,
+    )
+
+    # Old indexes (incl. uq_economy_ledger_idempotent) go away with the renamed table.
+    old = _swap("economy_ledger", LEDGER_BODY, LEDGER_COLUMNS, partitioned=True)
+    op.execute(sa.text(f"DROP TABLE {old}"))
+    op.create_index("ix_economy_ledger_player_id", "economy_ledger", ["player_id"])
+
+
+def downgrade() -> None:
+    old = _swap("economy_ledger", LEDGER_BODY, LEDGER_COLUMNS, partitioned=False)
+    op.execute(sa.text(f"DROP TABLE {old}"))
+    op.create_index("ix_economy_ledger_player_id", "economy_ledger", ["player_id"])
+    op.execute(
+        sa.text(
+            "CREATE UNIQUE INDEX uq_economy_ledger_idempotent "
+            "ON economy_ledger (player_id, source, ref_type, ref_id) "
+            f"WHERE source IN {IDEMPOTENT_SOURCES_SQL}"
+        )
+    )
+    op.drop_table("economy_ledger_keys")
+
+    old = _swap("player_event_log", EVENT_LOG_BODY, EVENT_LOG_COLUMNS, partitioned=False)
+    op.execute(sa.text(f"DROP TABLE {old}"))
+    op.create_index("ix_player_event_log_player_id", "player_event_log", ["player_id"])
+    op.create_index(
+        "ix_player_event_log_player_created",
+        "player_event_log",
+        ["player_id", sa.text("created_at DESC")],
+    )
@@ -1,69 +1,30 @@
 #!/usr/bin/env python3
 """Тихий бэкфилл скрытых навыков-вех по текущей статистике игроков.
 
-Не шлёт групповые анонсы и не пишет event_log.
+Не шлёт групповые анонсы и не пишет event_log. Работает как maintenance job
+``backfill_hidden_milestones`` (чанки по players.id, коммит и чекпоинт на чанк);
+прерванный прогон продолжается через ``--resume``.
 
 Запуск из корня репозитория (нужен POSTGRES_DSN):
     python scripts/backfill_hidden_milestones.py --dry-run
     python scripts/backfill_hidden_milestones.py --apply
     python scripts/backfill_hidden_milestones.py --apply --player-id 123 --player-id 456
+    python scripts/backfill_hidden_milestones.py --resume 42
 """
 from __future__ import annotations
 
 import argparse
 import asyncio
-import os
 import sys
+from pathlib import Path
 
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT))
 
-from dotenv import load_dotenv
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv  # noqa: E402
 
-from waifu_bot.core.config import settings
-from waifu_bot.db.models import Player
-from waifu_bot.services.hidden_milestones import MILESTONE_SKILL_IDS, sync_milestone_skills
-
-
-async def _run(
-    *,
-    player_ids: list[int] | None,
-    apply: bool,
-    batch_size: int,
-) -> int:
-    engine = create_async_engine(settings.postgres_dsn, echo=False)
-    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    processed = 0
-    offset = 0
-    try:
-        while True:
-            async with Session() as session:
-                q = select(Player.id).order_by(Player.id)
-                if player_ids:
-                    q = q.where(Player.id.in_(player_ids))
-                q = q.offset(offset).limit(batch_size)
-                ids = [int(x) for x in (await session.execute(q)).scalars().all()]
-                if not ids:
-                    break
-                for pid in ids:
-                    counters = await sync_milestone_skills(session, pid, silent=True)
-                    nonzero = {k: v for k, v in counters.items() if int(v or 0) > 0}
-                    print(f"player_id={pid} counters={nonzero or '{}'}")
-                    processed += 1
-                if apply:
-                    await session.commit()
-                else:
-                    await session.rollback()
-            offset += len(ids)
-            if player_ids and offset >= len(player_ids):
-                break
-    finally:
-        await engine.dispose()
-    mode = "applied" if apply else "dry-run"
-    print(f"{mode}: {processed} player(s), {len(MILESTONE_SKILL_IDS)} milestone skills")
-    return 0
+from scripts.lib.maintenance_cli import add_run_args, run_job_cli  # noqa: E402
 
 
 def main() -> int:
@@ -72,11 +33,19 @@ def main() -> int:
     parser.add_argument("--player-id", type=int, action="append", default=None)
     parser.add_argument("--apply", action="store_true", help="Commit changes (default is dry-run)")
     parser.add_argument("--dry-run", action="store_true", help="Do not commit (default)")
-    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=None, help="Alias for --chunk-size")
+    add_run_args(parser, dry_run_flag=False)
     args = parser.parse_args()
     apply = bool(args.apply) and not bool(args.dry_run)
+    params = {"player_ids": args.player_id} if args.player_id else {}
     return asyncio.run(
-        _run(player_ids=args.player_id, apply=apply, batch_size=max(1, int(args.batch_size)))
+        run_job_cli(
+            "backfill_hidden_milestones",
+            params=params,
+            dry_run=not apply,
+            resume=args.resume,
+            chunk_size=args.chunk_size or args.batch_size,
+        )
     )
 
 
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 """Backfill player_item_codex and player_affix_codex from existing inventory and shop offers.
 
+Работает как maintenance job ``backfill_item_codex`` (чанки по inventory_items.id,
+коммит и чекпоинт на чанк); прерванный прогон продолжается через ``--resume``.
+
 Запуск из корня репозитория (нужен POSTGRES_DSN или DATABASE_URL):
     python scripts/backfill_item_codex.py
     python scripts/backfill_item_codex.py --dry-run
+    python scripts/backfill_item_codex.py --resume 42
 """
 
 from __future__ import annotations
@@ -13,75 +17,27 @@ import asyncio
 import sys
 from pathlib import Path
 
-sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
-
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-
-from waifu_bot.db import session as db_session
-from waifu_bot.db.models import InventoryItem, ShopOffer
-from waifu_bot.services.item_codex import register_inventory_codex
-
-
-async def run(dry_run: bool) -> int:
-    db_session.init_engine()
-    assert db_session.SessionLocal is not None
-
-    item_rows = 0
-    offer_rows = 0
-
-    async with db_session.SessionLocal() as session:
-        inv_ids: set[int] = set()
-        player_by_inv: dict[int, int] = {}
-
-        inv_q = await session.execute(
-            select(InventoryItem)
-            .options(selectinload(InventoryItem.item), selectinload(InventoryItem.affixes))
-            .where(InventoryItem.player_id.isnot(None))
-        )
-        for inv in inv_q.scalars().all():
-            if inv.id and inv.player_id:
-                inv_ids.add(int(inv.id))
-                player_by_inv[int(inv.id)] = int(inv.player_id)
-
-        offer_q = await session.execute(select(ShopOffer))
-        for off in offer_q.scalars().all():
-            if off.inventory_item_id and off.player_id:
-                inv_ids.add(int(off.inventory_item_id))
-                player_by_inv[int(off.inventory_item_id)] = int(off.player_id)
-
-        print(f"Уникальных inventory_items для кодекса: {len(inv_ids)}")
-
-        if dry_run:
-            print("Dry-run: изменения не записаны.")
-            return 0
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT))
 
-        for iid in sorted(inv_ids):
-            inv = await session.scalar(
-                select(InventoryItem)
-                .options(selectinload(InventoryItem.item), selectinload(InventoryItem.affixes))
-                .where(InventoryItem.id == int(iid))
-            )
-            pid = player_by_inv.get(iid)
-            if inv is None or not pid:
-                continue
-            if inv.player_id is not None:
-                item_rows += 1
-            else:
-                offer_rows += 1
-            await register_inventory_codex(session, pid, inv)
-
-        await session.commit()
-        print(f"Обработано строк инвентаря игрока: {item_rows}")
-        print(f"Обработано офферов магазина (без player_id на предмете): {offer_rows}")
-    return 0
+from scripts.lib.maintenance_cli import add_run_args, run_job_cli  # noqa: E402
 
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Backfill item/affix library codex")
-    ap.add_argument("--dry-run", action="store_true", help="Только статистика")
+    add_run_args(ap)
     args = ap.parse_args()
-    raise SystemExit(asyncio.run(run(args.dry_run)))
+    raise SystemExit(
+        asyncio.run(
+            run_job_cli(
+                "backfill_item_codex",
+                dry_run=args.dry_run,
+                resume=args.resume,
+                chunk_size=args.chunk_size,
+            )
+        )
+    )
 
 
 if __name__ == "__main__":
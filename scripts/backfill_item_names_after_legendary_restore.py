@@ -1,5 +1,10 @@
 #!/usr/bin/env python3
-"""Backfill items.name after splitting canonical vs legendary template names."""
+"""Backfill items.name after splitting canonical vs legendary template names.
+
+Runs as the ``backfill_item_names`` maintenance job (chunks over items.id, commit and
+checkpoint per chunk). The job is registered only by this script, so an interrupted
+run is continued with ``--resume <run_id>``, not by the background tick.
+"""
 
 from __future__ import annotations
 
@@ -8,65 +13,79 @@ import asyncio
 import json
 import sys
 from pathlib import Path
+from typing import Any
 
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
 
 ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
 sys.path.insert(0, str(ROOT))
 
 from scripts.lib.legendary_name_llm import extract_names_map, filter_template_id_keys  # noqa: E402
+from scripts.lib.maintenance_cli import add_run_args, run_job_cli  # noqa: E402
 
 DEFAULT_LEGENDARY_JSON = ROOT / "scripts/data/legendary_item_names_ru.json"
-
-
-async def _run(*, dry_run: bool) -> int:
-    from waifu_bot.db.session import get_session, init_engine
-
-    data = json.loads(DEFAULT_LEGENDARY_JSON.read_text(encoding="utf-8"))
+JOB_NAME = "backfill_item_names"
+
+_KEYS_SQL = text(
+    """
+    SELECT DISTINCT i.id
+    FROM items i
+    JOIN inventory_items inv ON inv.item_id = i.id
+    WHERE i.id > :after
+    ORDER BY i.id
+    LIMIT :lim
+    """
+)
+_ROWS_SQL = text(
+    """
+    SELECT i.id AS item_id,
+           i.name AS item_name,
+           inv.rarity AS rarity,
+           inv.is_legendary AS is_legendary
+    FROM items i
+    JOIN inventory_items inv ON inv.item_id = i.id
+    WHERE i.id IN :ids
+    ORDER BY i.id
+    """
+).bindparams(bindparam("ids", expanding=True))
+_TEMPLATES_SQL = text(
+    """
+    SELECT id, name, legendary_name_ru
+    FROM item_base_templates
+    WHERE id IN :ids AND COALESCE(base_grade, 0) = 0
+    """
+).bindparams(bindparam("ids", expanding=True))
+
+
+def load_llm_by_name(path: Path = DEFAULT_LEGENDARY_JSON) -> dict[str, int]:
+    data = json.loads(path.read_text(encoding="utf-8"))
     llm_names = filter_template_id_keys(extract_names_map(data))
-    if not llm_names:
-        print("no LLM names in JSON")
-        return 1
-
-    llm_by_name = {name: int(tid) for tid, name in llm_names.items()}
-
-    init_engine()
-    updated = 0
-    async for session in get_session():
-        rows = (
-            await session.execute(
-                text(
-                    """
-                    SELECT i.id AS item_id,
-                           i.name AS item_name,
-                           inv.rarity AS rarity,
-                           inv.is_legendary AS is_legendary
-                    FROM items i
-                    JOIN inventory_items inv ON inv.item_id = i.id
-                    """
-                )
-            )
-        ).mappings().all()
-
+    return {name: int(tid) for tid, name in llm_names.items()}
+
+
+def register_item_names_job(llm_by_name: dict[str, int]) -> None:
+    from waifu_bot.services.maintenance_jobs import ChunkResult, JobContext, MaintenanceJob, register_job
+
+    async def keys(session: AsyncSession, after: int | None, limit: int, params: dict[str, Any]) -> list[int]:
+        res = await session.execute(_KEYS_SQL, {"after": int(after or 0), "lim": int(limit)})
+        return [int(x) for x in res.scalars().all()]
+
+    async def process(session: AsyncSession, ids: list[int], ctx: JobContext) -> ChunkResult:
+        rows = (await session.execute(_ROWS_SQL, {"ids": ids})).mappings().all()
+        names = {str(r["item_name"] or "").strip() for r in rows}
+        wanted = {llm_by_name[n] for n in names if n in llm_by_name}
+        templates = {}
+        if wanted:
+            tpl_rows = (await session.execute(_TEMPLATES_SQL, {"ids": sorted(wanted)})).mappings().all()
+            templates = {int(t["id"]): t for t in tpl_rows}
+        out = ChunkResult(processed=len(ids))
+        renamed: set[int] = set()
         for row in rows:
             item_name = str(row.get("item_name") or "").strip()
-            if item_name not in llm_by_name:
-                continue
-            tid = llm_by_name[item_name]
-            tpl = (
-                await session.execute(
-                    text(
-                        """
-                        SELECT name, legendary_name_ru
-                        FROM item_base_templates
-                        WHERE id = :id AND COALESCE(base_grade, 0) = 0
-                        LIMIT 1
-                        """
-                    ),
-                    {"id": tid},
-                )
-            ).mappings().first()
-            if not tpl:
+            tpl = templates.get(llm_by_name.get(item_name, -1))
+            if not tpl or int(row["item_id"]) in renamed:
                 continue
             is_leg = bool(row.get("is_legendary")) or int(row.get("rarity") or 0) >= 5
             if is_leg:
@@ -75,28 +94,38 @@ async def _run(*, dry_run: bool) -> int:
                 new_name = str(tpl.get("name") or "").strip()
             if not new_name or new_name == item_name:
                 continue
-            if dry_run:
+            if ctx.dry_run:
                 print(f"  item {row['item_id']}: {item_name!r} -> {new_name!r}")
-            else:
-                await session.execute(
-                    text("UPDATE items SET name = :name WHERE id = :id"),
-                    {"name": new_name, "id": int(row["item_id"])},
-                )
-            updated += 1
-
-        if not dry_run:
-            await session.commit()
-        break
+            await session.execute(
+                text("UPDATE items SET name = :name WHERE id = :id"),
+                {"name": new_name, "id": int(row["item_id"])},
+            )
+            renamed.add(int(row["item_id"]))
+            out.changed += 1
+        return out
 
-    print(f"{'would update' if dry_run else 'updated'} {updated} item rows")
-    return 0
+    register_job(
+        MaintenanceJob(
+            name=JOB_NAME,
+            title="Бэкфилл items.name после разделения легендарных имён",
+            keys=keys,
+            process=process,
+        )
+    )
 
 
 def main() -> int:
     parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("--dry-run", action="store_true")
+    add_run_args(parser)
     args = parser.parse_args()
-    return asyncio.run(_run(dry_run=args.dry_run))
+    llm_by_name = load_llm_by_name()
+    if not llm_by_name:
+        print("no LLM names in JSON")
+        return 1
+    register_item_names_job(llm_by_name)
+    return asyncio.run(
+        run_job_cli(JOB_NAME, dry_run=args.dry_run, resume=args.resume, chunk_size=args.chunk_size)
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Offline microbenchmark for the GD round kernel (no DB, no Redis).
+
+Usage:
+  PYTHONPATH=src python scripts/bench_gd_round_kernel.py
+  PYTHONPATH=src python scripts/bench_gd_round_kernel.py --party 5 30 100 --rounds 5000 --seed 7
+
+Prints one JSON line per party size: rounds simulated, outcomes and per-round p50/p95/max in ms.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "src"))
+
+from scripts.lib.gd_round_bench import run_bench  # noqa: E402
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--party", type=int, nargs="+", default=[5, 20, 60], help="party sizes to run")
+    ap.add_argument("--rounds", type=int, default=2000, help="rounds per party size")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    for size in args.party:
+        print(json.dumps(run_bench(size, args.rounds, seed=args.seed), ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Contention benchmark: simultaneous multi-currency wallet payouts (legacy calls vs WalletTx).
+
+Needs POSTGRES_DSN for a staging/local database with existing players. Payouts are
+rolled back unless --commit is given.
+
+Usage:
+  PYTHONPATH=src python scripts/bench_wallet_contention.py --players 101 102 103 104 105
+  PYTHONPATH=src python scripts/bench_wallet_contention.py --players 101 102 103 --workers 16 --payouts 2000
+
+Prints one JSON line per mode: payouts/s, p50/p95 latency in ms, deadlocks and other errors.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "src"))
+
+from scripts.lib.wallet_bench import run_bench  # noqa: E402
+
+
+async def _run(args: argparse.Namespace) -> None:
+    from waifu_bot.db import session as db_session
+
+    db_session.init_engine()
+    for mode in args.mode:
+        res = await run_bench(
+            db_session.SessionLocal,
+            args.players,
+            mode=mode,
+            workers=args.workers,
+            payouts=args.payouts,
+            players_per_payout=args.per_payout,
+            seed=args.seed,
+            commit=args.commit,
+        )
+        print(json.dumps(res, ensure_ascii=False))
+    assert db_session.engine is not None
+    await db_session.engine.dispose()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--players", type=int, nargs="+", required=True, help="hot set of existing player ids")
+    ap.add_argument("--mode", nargs="+", choices=("legacy", "tx"), default=["legacy", "tx"])
+    ap.add_argument("--workers", type=int, default=8, help="concurrent sessions")
+    ap.add_argument("--payouts", type=int, default=400)
+    ap.add_argument("--per-payout", type=int, default=3, help="players credited by one payout")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--commit", action="store_true", help="keep the credits (default: roll back)")
+    asyncio.run(_run(ap.parse_args()))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Build the static asset manifest: content hashes, .br/.gz sidecars, optional icon atlases.
+
+Запуск из корня репозитория (после build_webapp.sh, при каждом деплое):
+    python scripts/build_static_assets.py
+    python scripts/build_static_assets.py --atlas        # + атласы иконок предметов по тирам
+    python scripts/build_static_assets.py --clean        # удалить sidecars/атласы/манифест
+
+.br пишется только если установлен пакет ``brotli``; иначе только .gz.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT))
+
+from scripts.lib.static_asset_build import ATLAS_MAX_PX, build_manifest, clean, write_manifest  # noqa: E402
+from waifu_bot.services.static_assets import manifest_path, mount_directories  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--atlas", action="store_true", help="pack small item icons into per-tier atlases")
+    parser.add_argument("--atlas-max-px", type=int, default=ATLAS_MAX_PX)
+    parser.add_argument("--no-sidecars", action="store_true", help="hash only, no .br/.gz")
+    parser.add_argument("--clean", action="store_true", help="remove build outputs and exit")
+    args = parser.parse_args()
+
+    mounts = mount_directories()
+    if args.clean:
+        print(f"removed {clean(mounts)} files")
+        return 0
+
+    try:
+        import brotli  # type: ignore[import-not-found]
+    except ImportError:
+        brotli = None
+        print("brotli not installed — writing .gz sidecars only")
+
+    started = time.monotonic()
+    manifest = build_manifest(
+        mounts,
+        sidecars=not args.no_sidecars,
+        brotli_module=brotli,
+        atlas=args.atlas,
+        atlas_max_px=args.atlas_max_px,
+    )
+    write_manifest(manifest_path(), manifest)
+    files = manifest["files"]
+    with_sidecars = sum(1 for e in files.values() if e.get("e"))
+    print(
+        f"manifest {manifest['version']}: {len(files)} files, {with_sidecars} with sidecars, "
+        f"{len(manifest['atlases'])} atlases ({len(manifest['frames'])} icons) "
+        f"in {time.monotonic() - started:.1f}s → {manifest_path()}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
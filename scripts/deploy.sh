@@ -35,6 +35,8 @@ if [ -f webapp_frontend/package.json ]; then
     echo "WARN: npm not found — skip webapp bundle build"
   fi
 fi
+echo "==> build static asset manifest (hashed URLs, .br/.gz sidecars)"
+PYTHONPATH=${REPO_DIR}/src python3 scripts/build_static_assets.py --atlas || echo "WARN: static asset build failed — serving plain static files"
 echo "==> apply migrations"
 PYTHONPATH=${REPO_DIR}/src python3 -m waifu_bot.cli migrate || true
 echo "==> restart services"
@@ -0,0 +1,401 @@
+"""Offline replay of combat hit captures (``waifu_bot.services.combat_capture``).
+
+A replay plays the captured hit through ``CombatService._process_message_damage`` again, with no
+DB or Redis:
+
+- session and Redis calls get the recorded answers, in order (:class:`ReplaySession`,
+  :class:`ReplayRedis`);
+- ``random.*`` uses the captured seed;
+- ``datetime.now()`` / ``utcnow()`` in ``waifu_bot.*`` modules return the capture time;
+- Telegram sends go to a null bot.
+
+Any call that differs from the recording (another op or SQL shape) raises
+:class:`ReplayDivergence`. The returned dict and the per-commit column writes are diffed
+against the capture (datetime values by type only). Per-phase timings feed :func:`build_report`,
+and :func:`check_regression` compares them with a saved report.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Iterator
+from unittest.mock import patch
+
+from sqlalchemy.engine import IteratorResult
+from sqlalchemy.engine.result import SimpleResultMetaData
+from sqlalchemy.orm.attributes import set_committed_value
+
+from waifu_bot.core import redis as core_redis
+from waifu_bot.services import combat_capture as cc
+
+
+class ReplayDivergence(Exception):
+    """The replayed hit made a call the capture did not record at this point."""
+
+
+def _raise_recorded(entry: dict[str, Any]) -> None:
+    try:
+        exc_type = cc.resolve_path(entry["raise"])
+        exc = exc_type(entry.get("msg", ""))
+    except Exception:
+        exc = RuntimeError(f"{entry['raise']}: {entry.get('msg', '')}")
+    raise exc
+
+
+class ReplaySession:
+    """Answers session calls from the capture's ``session`` log."""
+
+    def __init__(self, doc: dict[str, Any], decoder: cc.Decoder, tracker: cc.WriteTracker) -> None:
+        self._log = doc["session"]
+        self._pos = 0
+        self._dec = decoder
+        self._tracker = tracker
+        self._adds = 0
+        self.writes: list[list[dict[str, Any]]] = []
+
+    def _next(self, op: str, sql: str | None = None) -> dict[str, Any]:
+        if self._pos >= len(self._log):
+            raise ReplayDivergence(f"session call #{self._pos} {op}: capture has no more calls")
+        entry = self._log[self._pos]
+        if entry["op"] != op or (sql is not None and entry.get("sql") != sql):
+            raise ReplayDivergence(
+                f"session call #{self._pos}: replay {op} {sql or ''} vs capture {entry['op']} {entry.get('sql', '')}"
+            )
+        self._pos += 1
+        cc.count_query()
+        for n, cols in entry.get("pk", ()):
+            obj = self._dec.added.get(int(n))
+            if obj is not None:
+                for key, raw in cols.items():
+                    set_committed_value(obj, key, self._dec.value(raw))
+        if "raise" in entry:
+            _raise_recorded(entry)
+        self._dec.apply_patch(entry.get("patch", ()))
+        return entry
+
+    @property
+    def exhausted(self) -> bool:
+        return self._pos == len(self._log)
+
+    async def get(self, entity: Any, ident: Any, **kwargs: Any) -> Any:
+        entry = self._next("get")
+        if entry["model"] != cc.type_path(entity):
+            raise ReplayDivergence(f"session get: replay {cc.type_path(entity)} vs capture {entry['model']}")
+        return self._dec.value(entry["ret"])
+
+    async def scalar(self, stmt: Any, *args: Any, **kwargs: Any) -> Any:
+        return self._dec.value(self._next("scalar", cc.statement_fingerprint(stmt))["ret"])
+
+    async def execute(self, stmt: Any, *args: Any, **kwargs: Any) -> Any:
+        entry = self._next("execute", cc.statement_fingerprint(stmt))
+        if "rows" not in entry:
+            return _RowcountResult(entry.get("rowcount", -1))
+        rows = [self._dec.value(r) for r in entry["rows"]]
+        return IteratorResult(SimpleResultMetaData(entry["keys"]), iter(rows))
+
+    async def scalars(self, stmt: Any, *args: Any, **kwargs: Any) -> Any:
+        return (await self.execute(stmt, *args, **kwargs)).scalars()
+
+    async def refresh(self, obj: Any, *args: Any, **kwargs: Any) -> None:
+        self._next("refresh")
+
+    async def flush(self, *args: Any, **kwargs: Any) -> None:
+        self._next("flush")
+
+    async def commit(self) -> None:
+        self.writes.append(self._tracker.flush_writes())
+        self._next("commit")
+
+    async def rollback(self) -> None:
+        self._next("rollback")
+
+    async def delete(self, obj: Any) -> None:
+        self._tracker.deleted(obj)
+
+    def add(self, obj: Any, *args: Any, **kwargs: Any) -> None:
+        self._adds += 1
+        self._dec.added[self._adds] = obj
+        self._tracker.added(obj)
+
+    def add_all(self, objs: Any) -> None:
+        for obj in objs:
+            self.add(obj)
+
+    def begin_nested(self) -> Any:
+        return _NullTransaction()
+
+    @property
+    def info(self) -> dict:
+        return {}
+
+    @property
+    def no_autoflush(self) -> Any:
+        return contextlib.nullcontext()
+
+    def __getattr__(self, name: str) -> Any:
+        raise ReplayDivergence(f"session.{name} is not replayable")
+
+
+class _RowcountResult:
+    returns_rows = False
+
+    def __init__(self, rowcount: int) -> None:
+        self.rowcount = rowcount
+
+
+class _NullTransaction:
+    async def __aenter__(self) -> "_NullTransaction":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> bool:
+        return False
+
+    def __await__(self):
+        return self._self().__await__()
+
+    async def _self(self) -> "_NullTransaction":
+        return self
+
+    async def commit(self) -> None:
+        return None
+
+    async def rollback(self) -> None:
+        return None
+
+
+class _RedisCursor:
+    def __init__(self, log: list[dict[str, Any]], decoder: cc.Decoder) -> None:
+        self.log = log
+        self.pos = 0
+        self.dec = decoder
+
+    def next(self, op: str) -> dict[str, Any]:
+        if self.pos >= len(self.log):
+            raise ReplayDivergence(f"redis call #{self.pos} {op}: capture has no more calls")
+        entry = self.log[self.pos]
+        if entry["op"] != op:
+            raise ReplayDivergence(f"redis call #{self.pos}: replay {op} vs capture {entry['op']}")
+        self.pos += 1
+        return entry
+
+
+class ReplayRedis:
+    """Answers Redis calls (client, pipelines, scripts) from one shared ``redis`` log."""
+
+    def __init__(self, cursor: _RedisCursor) -> None:
+        self._cur = cursor
+
+    def _answer(self, op: str) -> Any:
+        entry = self._cur.next(op)
+        kind = entry["kind"]
+        if kind == "raise":
+            _raise_recorded(entry)
+        if kind == "self":
+            return self
+        if kind == "proxy":
+            return ReplayRedis(self._cur)
+        if kind == "value":
+            return self._cur.dec.value(entry.get("ret"))
+
+        async def awaited() -> Any:
+            if "raise" in entry:
+                _raise_recorded(entry)
+            return self._cur.dec.value(entry.get("ret"))
+
+        return awaited()
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._answer(name)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self._answer("__call__")
+
+    async def __aenter__(self) -> "ReplayRedis":
+        await self._answer("__aenter__")
+        return self
+
+    async def __aexit__(self, *exc: Any) -> Any:
+        return await self._answer("__aexit__")
+
+
+class _FrozenMeta(type):
+    def __instancecheck__(cls, obj: Any) -> bool:
+        return isinstance(obj, datetime)
+
+    def __subclasscheck__(cls, sub: type) -> bool:
+        return issubclass(sub, datetime)
+
+
+def frozen_datetime(at: datetime) -> type:
+    """``datetime`` whose ``now()`` / ``utcnow()`` return ``at``; isinstance checks still match."""
+
+    class FrozenDatetime(datetime, metaclass=_FrozenMeta):
+        @classmethod
+        def now(cls, tz=None):
+            return at.astimezone(tz) if tz is not None else at.astimezone().replace(tzinfo=None)
+
+        @classmethod
+        def utcnow(cls):
+            return at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return FrozenDatetime
+
+
+@contextlib.contextmanager
+def frozen_clock(at: datetime) -> Iterator[None]:
+    """Patch ``datetime`` in every loaded ``waifu_bot.*`` module that imported the class."""
+    fake = frozen_datetime(at)
+    patched = [
+        m for name, m in list(sys.modules.items())
+        if name.startswith("waifu_bot") and m is not None and getattr(m, "datetime", None) is datetime
+    ]
+    for m in patched:
+        m.datetime = fake
+    try:
+        yield
+    finally:
+        for m in patched:
+            m.datetime = datetime
+
+
+class _NullBot:
+    def __getattr__(self, name: str) -> Any:
+        async def call(*args: Any, **kwargs: Any) -> None:
+            return None
+
+        return call
+
+
+@dataclass
+class ReplayOutcome:
+    path: str
+    ok: bool
+    error: str | None = None
+    diffs: list[str] = field(default_factory=list)
+    phases_ms: dict[str, float] = field(default_factory=dict)
+    captured_phases_ms: dict[str, float] = field(default_factory=dict)
+    total_ms: float = 0.0
+
+
+def diff_values(a: Any, b: Any, path: str = "$", out: list[str] | None = None, limit: int = 20) -> list[str]:
+    """Paths where two encoded values differ; datetimes compare by tag only (clock noise)."""
+    out = [] if out is None else out
+    if len(out) >= limit:
+        return out
+    if isinstance(a, dict) and isinstance(b, dict):
+        if "$dt" in a and "$dt" in b:
+            return out
+        for key in sorted(set(a) | set(b), key=str):
+            if key not in a or key not in b:
+                out.append(f"{path}.{key}: {'missing' if key not in b else 'extra'} in replay")
+            else:
+                diff_values(a[key], b[key], f"{path}.{key}", out, limit)
+        return out
+    if isinstance(a, list) and isinstance(b, list):
+        if len(a) != len(b):
+            out.append(f"{path}: length {len(a)} vs {len(b)}")
+        for i, (x, y) in enumerate(zip(a, b)):
+            diff_values(x, y, f"{path}[{i}]", out, limit)
+        return out
+    if isinstance(a, float) and isinstance(b, float) and abs(a - b) <= 1e-9 * max(1.0, abs(a)):
+        return out
+    if a != b:
+        out.append(f"{path}: {a!r} vs {b!r}")
+    return out
+
+
+async def replay_capture(doc: dict[str, Any], path: str = "") -> ReplayOutcome:
+    """Re-run one captured hit and diff it against the recording."""
+    from waifu_bot.services.combat import CombatService
+
+    if doc.get("version") != cc.FORMAT_VERSION:
+        return ReplayOutcome(path, False, error=f"unsupported capture version {doc.get('version')}")
+    cc.clear_cold_caches()
+    tracker = cc.WriteTracker()
+    decoder = cc.Decoder(doc["objects"], on_new_object=tracker.seen)
+    session = ReplaySession(doc, decoder, tracker)
+    cursor = _RedisCursor(doc["redis"], decoder)
+    call = {k: decoder.value(v) for k, v in doc["call"].items()}
+    player_id = call.pop("player_id")
+    media_type = call.pop("media_type")
+    has_redis = call.pop("has_redis")
+    svc = CombatService(ReplayRedis(cursor) if has_redis else None)
+    timer = cc.PhaseTimer()
+    tokens = (
+        cc.bind_hit_rng(int(doc["seed"])),
+        cc.bind_phase_timer(timer),
+        core_redis.redis_override.set(ReplayRedis(cursor)),
+    )
+    started = time.perf_counter()
+    try:
+        with frozen_clock(datetime.fromisoformat(doc["captured_at"])), patch(
+            "waifu_bot.services.webhook.get_bot", lambda: _NullBot()
+        ):
+            result = await svc._process_message_damage(session, player_id, media_type, **call)
+    except Exception as exc:
+        return ReplayOutcome(path, False, error=f"{type(exc).__name__}: {exc}")
+    finally:
+        core_redis.redis_override.reset(tokens[2])
+        cc.unbind_phase_timer(tokens[1])
+        cc.unbind_hit_rng(tokens[0])
+    total_ms = (time.perf_counter() - started) * 1000.0
+    phases = timer.finish()
+
+    diffs = diff_values(doc["result"], cc.Encoder().value(result), "$.result")
+    diff_values(doc["writes"], session.writes, "$.writes", diffs)
+    if not session.exhausted:
+        diffs.append(f"session: replay stopped after {session._pos} of {len(doc['session'])} calls")
+    if cursor.pos != len(doc["redis"]):
+        diffs.append(f"redis: replay stopped after {cursor.pos} of {len(doc['redis'])} calls")
+    return ReplayOutcome(
+        path,
+        ok=not diffs,
+        diffs=diffs,
+        phases_ms=phases["ms"],
+        captured_phases_ms=doc.get("phases", {}).get("ms", {}),
+        total_ms=round(total_ms, 3),
+    )
+
+
+def _p(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return round(values[0], 3)
+    return round(statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1], 3)
+
+
+def build_report(outcomes: list[ReplayOutcome]) -> dict[str, Any]:
+    """p50 / p95 per phase (and total) over all successful replays."""
+    ok = [o for o in outcomes if o.ok]
+    phases: dict[str, dict[str, float]] = {}
+    for name in (*cc.PHASES, "total"):
+        values = [o.total_ms if name == "total" else o.phases_ms.get(name, 0.0) for o in ok]
+        phases[name] = {"p50": _p(values, 50), "p95": _p(values, 95)}
+    return {
+        "replays": len(outcomes),
+        "ok": len(ok),
+        "failed": [{"path": o.path, "error": o.error, "diffs": o.diffs[:5]} for o in outcomes if not o.ok],
+        "phases_ms": phases,
+    }
+
+
+def check_regression(report: dict[str, Any], baseline: dict[str, Any], max_regression: float,
+                     min_ms: float = 0.05) -> list[str]:
+    """Phases whose p50 grew more than ``max_regression`` (0.2 = +20 %) over the baseline report."""
+    out = []
+    for name, cur in report.get("phases_ms", {}).items():
+        base = baseline.get("phases_ms", {}).get(name)
+        if not base or base.get("p50", 0.0) < min_ms:
+            continue
+        ratio = cur["p50"] / base["p50"]
+        if ratio > 1.0 + max_regression:
+            out.append(f"{name}: p50 {base['p50']}ms -> {cur['p50']}ms (+{(ratio - 1) * 100:.0f}%)")
+    return out
@@ -0,0 +1,151 @@
+"""Synthetic GD parties and buffers for offline runs of ``gd_round_kernel`` (no DB, no Redis).
+
+``run_bench`` replays whole dungeons back to back until ``rounds`` rounds have been
+simulated and reports per-round timings. Round buffers come from a small pre-built pool,
+so the timings cover the kernel only. Everything derives from ``seed``, so two runs
+with the same arguments produce the same battles.
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+import statistics
+import time
+from typing import Any
+
+from waifu_bot.db.models import MonsterTemplate
+from waifu_bot.services.gd_round_kernel import RoundSnapshot, SkillSpec, replay_rounds
+
+MEDIA_KINDS = ("sticker", "photo", "gif", "video", "voice")
+SKILL_MEDIA = ("sticker", "photo", "gif", "video")
+EFFECT_TYPES = (
+    "DAMAGE_SINGLE",
+    "DAMAGE_ALL",
+    "DAMAGE_SELF_BOOST",
+    "DOT",
+    "TAUNT",
+    "HEAL_SINGLE",
+    "HEAL_ALL",
+    "REVIVE",
+    "SHIELD_PARTY",
+    "DEBUFF_MONSTER_SKIP",
+    "DEBUFF_MONSTER_INITIATIVE",
+    "EVASION_PARTY",
+    "BUFF_CRIT_NEXT",
+    "BUFF_PARTY_DAMAGE",
+    "DEBUFF_MONSTER_ARMOR",
+    "REFLECT",
+    "REGEN",
+    "GOLD_BONUS",
+)
+EFFECT_VALUES = (1.5, 20.0, 3.0, 40.0)
+
+
+def synthetic_templates(n: int = 20) -> tuple[MonsterTemplate, ...]:
+    """Transient monster templates across all five tiers (every other one boss-capable)."""
+    return tuple(
+        MonsterTemplate(
+            id=i,
+            name=f"Монстр {i}",
+            tier=(i % 5) + 1,
+            hp_base=40 + i,
+            hp_per_level=10,
+            dmg_base=5 + i % 3,
+            dmg_per_level=2,
+            boss_dmg_mult=1.8,
+            boss_hp_mult=2.5,
+            boss_allowed=i % 2 == 0,
+        )
+        for i in range(1, n + 1)
+    )
+
+
+def synthetic_skills(class_ids: range = range(1, 8)) -> dict[tuple[str, str], SkillSpec]:
+    """One skill per (class, media); effect types rotate so every type is reachable."""
+    skills: dict[tuple[str, str], SkillSpec] = {}
+    k = 0
+    for cid in class_ids:
+        for mk in SKILL_MEDIA:
+            skills[(str(cid), mk)] = SkillSpec(
+                effect_type=EFFECT_TYPES[k % len(EFFECT_TYPES)],
+                effect_value=EFFECT_VALUES[k % len(EFFECT_VALUES)],
+                effect_duration=1 + k % 3,
+                cooldown_rounds=1 + k % 2,
+            )
+            k += 1
+    return skills
+
+
+def synthetic_party(n: int, rng: random.Random) -> list[dict[str, Any]]:
+    return [
+        {
+            "user_id": 100 + i,
+            "class_id": 1 + i % 7,
+            "level": rng.randint(1, 60),
+            "strength": rng.randint(5, 30),
+            "agility": rng.randint(5, 30),
+            "intelligence": rng.randint(5, 30),
+            "endurance": rng.randint(5, 30),
+            "max_hp": 200,
+            "current_hp": 200,
+        }
+        for i in range(n)
+    ]
+
+
+def synthetic_buffer(party: list[dict[str, Any]], rng: random.Random, *, max_actions: int = 4) -> dict[str, Any]:
+    """Round buffer in the Redis format: per user, 0..max_actions text/media actions."""
+    users: dict[str, Any] = {}
+    for p in party:
+        acts: list[dict[str, Any]] = []
+        for _ in range(rng.randint(0, max_actions)):
+            if rng.random() < 0.5:
+                acts.append({"kind": "text", "len": rng.randint(1, 200), "count": 1})
+            else:
+                acts.append({"kind": "media", "media_kind": rng.choice(MEDIA_KINDS), "count": 1})
+        users[str(p["user_id"])] = {"actions": acts, "silent": not acts}
+    return {"users": users}
+
+
+def run_bench(party_size: int, rounds: int, *, seed: int = 1, buffer_pool: int = 64) -> dict[str, Any]:
+    """Simulate ``rounds`` rounds for a party of ``party_size``; returns counts and timings (ms)."""
+    rng = random.Random(seed)
+    templates = synthetic_templates()
+    skills = synthetic_skills()
+    boss_pool = tuple(t for t in templates if t.boss_allowed)
+    # User ids are the same in every synthetic party, so one pool serves all dungeons.
+    pool = [synthetic_buffer(synthetic_party(party_size, rng), rng) for _ in range(buffer_pool)]
+    timings: list[float] = []
+    outcomes: dict[str, int] = {}
+    dungeons = 0
+    while len(timings) < rounds:
+        dungeons += 1
+        party = synthetic_party(party_size, rng)
+        snapshot = RoundSnapshot(
+            state={"party": party, "wave": "pending_init", "collecting_for_round": 1},
+            buffer=None,
+            cfg={},
+            skills=skills,
+            templates={int(t.id): t for t in templates},
+            boss_pool=boss_pool,
+        )
+        buffers = itertools.islice(itertools.cycle(pool), rng.randrange(buffer_pool), None)
+        buffers = itertools.islice(buffers, rounds - len(timings))
+        started = time.perf_counter()
+        for res in replay_rounds(snapshot, buffers, seed=rng.randrange(1 << 30), trash_pool=templates):
+            now = time.perf_counter()
+            timings.append((now - started) * 1000)
+            started = now
+            outcomes[res.round_outcome] = outcomes.get(res.round_outcome, 0) + 1
+    timings.sort()
+    return {
+        "party_size": party_size,
+        "rounds": len(timings),
+        "dungeons": dungeons,
+        "outcomes": outcomes,
+        "total_ms": round(sum(timings), 3),
+        "p50_ms": round(statistics.median(timings), 4),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 4) if timings else 0.0,
+        "max_ms": round(timings[-1], 4) if timings else 0.0,
+    }
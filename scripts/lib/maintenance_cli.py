@@ -0,0 +1,82 @@
+"""Shared CLI for ``scripts/backfill_*``: start or resume a checkpointed maintenance run.
+
+The run is recorded in ``maintenance_job_runs`` like an admin-started one, so an
+interrupted script can be continued with ``--resume <run_id>`` (or by the
+``maintenance_jobs`` tick for jobs registered in the app) and shows up in
+``GET /api/armory/admin/jobs``.
+"""
+
+from __future__ import annotations
+
+import argparse
+from typing import Any
+
+
+def add_run_args(parser: argparse.ArgumentParser, *, dry_run_flag: bool = True) -> None:
+    if dry_run_flag:
+        parser.add_argument("--dry-run", action="store_true", help="Только статистика, без записи")
+    parser.add_argument("--resume", type=int, default=None, metavar="RUN_ID", help="Продолжить прогон с чекпоинта")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Ключей на чанк (коммит на чанк)")
+
+
+def _progress(row: Any) -> None:
+    total = f"/{row.total_estimate}" if row.total_estimate else ""
+    print(
+        f"  run #{row.id}: cursor={row.cursor} processed={row.processed}{total} "
+        f"changed={row.changed} errors={row.errors}",
+        flush=True,
+    )
+
+
+async def run_job_cli(
+    job_name: str,
+    *,
+    params: dict[str, Any] | None = None,
+    dry_run: bool = False,
+    resume: int | None = None,
+    chunk_size: int | None = None,
+) -> int:
+    """Create (or re-queue) a run, execute it in this process and print the result."""
+    from waifu_bot.db import session as db_session
+    from waifu_bot.db.models.scheduler import MaintenanceJobRun
+    from waifu_bot.services import maintenance_jobs as mj
+
+    db_session.init_engine()
+    assert db_session.SessionLocal is not None
+    async with db_session.SessionLocal() as session:
+        try:
+            if resume is not None:
+                row = await session.get(MaintenanceJobRun, int(resume))
+                if row is None or row.job_name != job_name:
+                    print(f"run #{resume} не найден для {job_name}")
+                    return 1
+                if row.status in ("failed", "cancelled"):
+                    row = await mj.request_resume(session, row.id)
+            else:
+                row = await mj.start_run(
+                    session, job_name, params=params, dry_run=dry_run, chunk_size=chunk_size
+                )
+        except mj.MaintenanceJobError as exc:
+            print(f"{job_name}: {exc.code}")
+            return 1
+        run_id = int(row.id)
+        await session.commit()
+        mode = " (dry-run)" if row.dry_run else ""
+        print(f"{job_name}: run #{run_id}{mode}, оценка ключей: {row.total_estimate}")
+
+        if not await mj.claim_run(session, run_id):
+            print(f"run #{run_id} сейчас выполняет другой процесс или он уже завершён")
+            return 1
+        status = await mj.execute_run(session, run_id, on_chunk=_progress)
+        row = await session.get(MaintenanceJobRun, run_id)
+        assert row is not None
+        await session.refresh(row)
+        print(
+            f"{job_name}: run #{run_id} → {status}; processed={row.processed} "
+            f"changed={row.changed} errors={row.errors}"
+        )
+        if row.last_error:
+            print(f"  last_error: {row.last_error}")
+        if status != "done":
+            print(f"  продолжить: --resume {run_id}")
+    return 0 if status == "done" else 1
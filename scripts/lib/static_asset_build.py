@@ -0,0 +1,217 @@
+"""Build step for ``waifu_bot.services.static_assets``: hashes, sidecars, sprite atlases.
+
+Writes ``static/.asset-manifest.json`` (read at runtime), ``<file>.br`` / ``<file>.gz``
+next to compressible files and, with ``atlas=True``, one lossless WebP atlas per item tier
+under ``static/game/atlas/``. Sidecars and atlases are only rewritten when their content
+changes, so re-running the build after a deploy is cheap.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+from datetime import datetime, timezone
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Iterator
+
+MANIFEST_NAME = ".asset-manifest.json"
+HASH_LEN = 12
+COMPRESSIBLE_SUFFIXES = frozenset({".js", ".mjs", ".css", ".json", ".svg", ".txt", ".map", ".xml"})
+# HTML is rewritten per request (hashed URLs) and compressed by the gzip middleware.
+SKIP_SUFFIXES = frozenset({".html", ".br", ".gz", ".gitkeep", ".md"})
+MIN_COMPRESS_SIZE = 500
+# A sidecar must save at least this fraction to be worth serving.
+MIN_SAVING = 0.1
+
+ATLAS_DIR = "game/atlas"
+ATLAS_MAX_PX = 128
+_ITEM_TIER = re.compile(r"^t(\d+)\.webp$")
+
+
+def file_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LEN]
+
+
+def _write_if_changed(path: Path, data: bytes) -> bool:
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return True
+
+
+def _remove(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def write_sidecars(path: Path, data: bytes, *, brotli_module: Any = None) -> list[str]:
+    """Write ``.gz`` (and ``.br`` when brotli is installed) if they beat the original."""
+    encodings: list[str] = []
+    candidates: list[tuple[str, Any]] = [("gz", lambda raw: gzip.compress(raw, 9, mtime=0))]
+    if brotli_module is not None:
+        candidates.insert(0, ("br", lambda raw: brotli_module.compress(raw, quality=11)))
+    for ext, compress in candidates:
+        sidecar = path.with_name(f"{path.name}.{ext}")
+        if sidecar.exists() and sidecar.stat().st_mtime_ns >= path.stat().st_mtime_ns:
+            encodings.append(ext)
+            continue
+        packed = compress(data)
+        if len(packed) <= len(data) * (1 - MIN_SAVING):
+            _write_if_changed(sidecar, packed)
+            encodings.append(ext)
+        else:
+            _remove(sidecar)
+    return encodings
+
+
+def iter_asset_files(root: Path) -> Iterator[Path]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith((".", "__")))
+        for name in sorted(filenames):
+            if name.startswith(".") or name.endswith(".tmp"):
+                continue
+            path = Path(dirpath) / name
+            if path.suffix.lower() in SKIP_SUFFIXES:
+                continue
+            yield path
+
+
+def atlas_groups(game_dir: Path) -> dict[str, list[Path]]:
+    """Item icons grouped per tier (``items/webp/<category>/<slug>/t<N>.webp``)."""
+    groups: dict[str, list[Path]] = {}
+    items_dir = game_dir / "items" / "webp"
+    if items_dir.is_dir():
+        for path in sorted(items_dir.rglob("t*.webp")):
+            m = _ITEM_TIER.match(path.name)
+            if m:
+                groups.setdefault(f"items-t{int(m.group(1))}", []).append(path)
+    return groups
+
+
+def build_atlases(
+    static_dir: Path,
+    *,
+    max_px: int = ATLAS_MAX_PX,
+) -> tuple[dict[str, dict[str, Any]], dict[str, list[Any]]]:
+    """Pack icons no larger than ``max_px`` into grids; returns (atlases, frames by public path)."""
+    from PIL import Image
+
+    out_dir = static_dir / ATLAS_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+    atlases: dict[str, dict[str, Any]] = {}
+    frames: dict[str, list[Any]] = {}
+    for name, paths in atlas_groups(static_dir / "game").items():
+        icons: list[tuple[str, Any]] = []
+        for path in paths:
+            try:
+                img = Image.open(path)
+                img.load()
+            except OSError:
+                continue
+            if img.width <= max_px and img.height <= max_px:
+                icons.append(("/static/" + path.relative_to(static_dir).as_posix(), img.convert("RGBA")))
+        if len(icons) < 2:
+            continue
+        cell = max(max(img.width, img.height) for _, img in icons)
+        cols = math.ceil(math.sqrt(len(icons)))
+        rows = math.ceil(len(icons) / cols)
+        sheet = Image.new("RGBA", (cols * cell, rows * cell), (0, 0, 0, 0))
+        for i, (public, img) in enumerate(icons):
+            x, y = (i % cols) * cell, (i // cols) * cell
+            sheet.paste(img, (x, y))
+            frames[public] = [name, x, y, img.width, img.height]
+        buf = BytesIO()
+        sheet.save(buf, format="WEBP", lossless=True, method=6)
+        _write_if_changed(out_dir / f"{name}.webp", buf.getvalue())
+        atlases[name] = {
+            "url": f"/static/{ATLAS_DIR}/{name}.webp",
+            "w": sheet.width,
+            "h": sheet.height,
+            "count": len(icons),
+        }
+    return atlases, frames
+
+
+def build_manifest(
+    mounts: dict[str, Path],
+    *,
+    sidecars: bool = True,
+    brotli_module: Any = None,
+    atlas: bool = False,
+    atlas_max_px: int = ATLAS_MAX_PX,
+) -> dict[str, Any]:
+    """Hash every asset under ``mounts`` (public prefix → directory) and write sidecars."""
+    atlases: dict[str, dict[str, Any]] = {}
+    frames: dict[str, list[Any]] = {}
+    static_dir = mounts.get("/static")
+    if atlas and static_dir is not None:
+        atlases, frames = build_atlases(static_dir, max_px=atlas_max_px)
+
+    files: dict[str, dict[str, Any]] = {}
+    for prefix, root in mounts.items():
+        if not root.is_dir():
+            continue
+        for path in iter_asset_files(root):
+            data = path.read_bytes()
+            encodings: list[str] = []
+            if (
+                sidecars
+                and path.suffix.lower() in COMPRESSIBLE_SUFFIXES
+                and len(data) >= MIN_COMPRESS_SIZE
+            ):
+                encodings = write_sidecars(path, data, brotli_module=brotli_module)
+            st = path.stat()
+            entry: dict[str, Any] = {"h": file_digest(data), "s": st.st_size, "m": st.st_mtime_ns}
+            if encodings:
+                entry["e"] = encodings
+            files[f"{prefix}/{path.relative_to(root).as_posix()}"] = entry
+
+    version = hashlib.sha256(
+        "\n".join(f"{k} {v['h']}" for k, v in sorted(files.items())).encode()
+    ).hexdigest()[:HASH_LEN]
+    return {
+        "version": version,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "files": files,
+        "atlases": atlases,
+        "frames": {k: v for k, v in frames.items() if k in files},
+    }
+
+
+def write_manifest(path: Path, manifest: dict[str, Any]) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def clean(mounts: dict[str, Path]) -> int:
+    """Remove sidecars, atlases and the manifest."""
+    removed = 0
+    for root in mounts.values():
+        if not root.is_dir():
+            continue
+        for path in list(root.rglob("*")):
+            if path.suffix in (".br", ".gz") and path.with_suffix("").is_file():
+                _remove(path)
+                removed += 1
+    static_dir = mounts.get("/static")
+    if static_dir is not None:
+        atlas_dir = static_dir / ATLAS_DIR
+        if atlas_dir.is_dir():
+            for path in atlas_dir.glob("*.webp"):
+                _remove(path)
+                removed += 1
+        _remove(static_dir / MANIFEST_NAME)
+    return removed
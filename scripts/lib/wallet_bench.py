@@ -0,0 +1,115 @@
+"""Contention benchmark for multi-currency wallet payouts (needs a real Postgres).
+
+Each payout credits gold plus a few wallet currencies to several players drawn from a
+small hot set, in random player order, so concurrent workers keep hitting the same
+balance rows. Two modes:
+
+- ``legacy``: one ``add`` / ``add_gold`` call per currency and player.
+- ``tx``: one ``WalletTx`` per payout, applied with ``apply_tx``.
+
+Every payout runs in its own transaction. It is rolled back unless ``commit=True``,
+so the locks are real but staging balances stay as they were.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import statistics
+import time
+from typing import Any
+
+from sqlalchemy.exc import DBAPIError
+
+from waifu_bot.db import models as m
+from waifu_bot.services import wallet as wallet_svc
+
+CURRENCIES = ("gold", "enchant_dust", "abyss_shards", "refine_core", "refine_essence", "legendary_ember")
+BENCH_SOURCE = "bench_payout"
+
+Payout = list[tuple[int, str, int]]
+
+
+def payout_plan(
+    player_ids: list[int], *, payouts: int, players_per_payout: int, seed: int = 1
+) -> list[Payout]:
+    """``payouts`` payouts; each credits gold plus 1-3 other currencies to a shuffled set of players."""
+    rng = random.Random(seed)
+    k = max(1, min(players_per_payout, len(player_ids)))
+    plan: list[Payout] = []
+    for _ in range(payouts):
+        lines: Payout = []
+        for pid in rng.sample(player_ids, k):
+            keys = ["gold", *rng.sample(CURRENCIES[1:], rng.randint(1, 3))]
+            lines.extend((pid, key, rng.randint(1, 50)) for key in keys)
+        plan.append(lines)
+    return plan
+
+
+async def _pay_legacy(session: Any, payout: Payout, ref: int) -> None:
+    for pid, key, amount in payout:
+        if key == "gold":
+            player = await session.get(m.Player, pid)
+            await wallet_svc.add_gold(session, player, amount, source=BENCH_SOURCE, ref_type="bench", ref_id=ref)
+        else:
+            await wallet_svc.add(session, pid, key, amount, source=BENCH_SOURCE, ref_type="bench", ref_id=ref)
+
+
+async def _pay_tx(session: Any, payout: Payout, ref: int) -> None:
+    tx = wallet_svc.WalletTx()
+    for pid, key, amount in payout:
+        tx.credit(pid, key, amount, source=BENCH_SOURCE, ref_type="bench", ref_id=ref)
+    await wallet_svc.apply_tx(session, tx)
+
+
+def _is_deadlock(exc: BaseException) -> bool:
+    code = getattr(getattr(exc, "orig", None), "pgcode", None) or getattr(getattr(exc, "orig", None), "sqlstate", None)
+    return code == "40P01" or "deadlock" in str(exc).lower()
+
+
+async def run_bench(
+    session_factory: Any,
+    player_ids: list[int],
+    *,
+    mode: str,
+    workers: int = 8,
+    payouts: int = 400,
+    players_per_payout: int = 3,
+    seed: int = 1,
+    commit: bool = False,
+) -> dict[str, Any]:
+    """Run ``payouts`` payouts on ``workers`` concurrent sessions; latency per payout in ms."""
+    pay = {"legacy": _pay_legacy, "tx": _pay_tx}[mode]
+    queue: asyncio.Queue[tuple[int, Payout]] = asyncio.Queue()
+    for i, payout in enumerate(payout_plan(player_ids, payouts=payouts, players_per_payout=players_per_payout, seed=seed)):
+        queue.put_nowait((i, payout))
+    latencies: list[float] = []
+    counts = {"ok": 0, "deadlocks": 0, "errors": 0}
+
+    async def worker() -> None:
+        while not queue.empty():
+            i, payout = queue.get_nowait()
+            started = time.perf_counter()
+            async with session_factory() as session:
+                try:
+                    await pay(session, payout, i)
+                    await (session.commit() if commit else session.rollback())
+                    counts["ok"] += 1
+                except DBAPIError as exc:
+                    await session.rollback()
+                    counts["deadlocks" if _is_deadlock(exc) else "errors"] += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    wall = time.perf_counter() - wall
+    latencies.sort()
+    return {
+        "mode": mode,
+        "workers": workers,
+        "payouts": payouts,
+        **counts,
+        "payouts_per_s": round(payouts / wall, 1) if wall else 0.0,
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else 0.0,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2) if latencies else 0.0,
+    }
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Replay combat hit captures offline (no DB / Redis) and profile the combat phases.
+
+Captures come from COMBAT_CAPTURE_SAMPLE_RATE > 0 on a live process
+(see waifu_bot/services/combat_capture.py). Pass files or directories of ``*.json.gz``.
+
+Usage:
+  PYTHONPATH=src python scripts/replay_combat_captures.py /var/tmp/waifu/combat_capture/20261019
+  PYTHONPATH=src python scripts/replay_combat_captures.py caps/ --repeat 5 --save-report base.json
+  PYTHONPATH=src python scripts/replay_combat_captures.py caps/ --repeat 5 --baseline base.json --max-regression 0.2
+
+Prints one JSON line per failed replay, then the report (p50/p95 ms per phase).
+Exits 1 when a replay diverges from its capture or a phase p50 regressed past the threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "src"))
+
+from scripts.lib.combat_replay import build_report, check_regression, replay_capture  # noqa: E402
+from waifu_bot.services.combat_capture import read_capture  # noqa: E402
+
+
+def _capture_files(paths: list[str]) -> list[Path]:
+    out: list[Path] = []
+    for raw in paths:
+        p = Path(raw)
+        out.extend(sorted(p.rglob("*.json.gz")) if p.is_dir() else [p])
+    return out
+
+
+async def _run(args: argparse.Namespace) -> int:
+    files = _capture_files(args.paths)
+    if not files:
+        print("no captures found", file=sys.stderr)
+        return 1
+    docs = [(str(f), read_capture(f)) for f in files]
+    outcomes = []
+    for _ in range(args.repeat):
+        for path, doc in docs:
+            outcomes.append(await replay_capture(doc, path))
+    report = build_report(outcomes)
+    for failed in report["failed"]:
+        print(json.dumps(failed, ensure_ascii=False))
+    code = 1 if report["failed"] else 0
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        report["regressions"] = check_regression(report, baseline, args.max_regression)
+        if report["regressions"]:
+            code = 1
+    if args.save_report:
+        Path(args.save_report).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(json.dumps(report, ensure_ascii=False))
+    return code
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="capture files or directories")
+    parser.add_argument("--repeat", type=int, default=1, help="replays per capture (timing runs)")
+    parser.add_argument("--baseline", help="report JSON from an earlier run to gate against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p50 growth per phase (0.2 = +20%%)")
+    parser.add_argument("--save-report", help="write the report JSON here")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""List or requeue Telegram updates whose handler failed (dead letters of the webhook ingress).
+
+Failed updates land in ``tg:updates:dead`` (see waifu_bot/services/telegram_ingress.py).
+Requeued updates go back to their chat's shard and are processed by the running consumers
+in order with the chat's newer updates; the dedupe marker is not checked again.
+
+Usage:
+  PYTHONPATH=src python scripts/replay_failed_updates.py                     # list (oldest first)
+  PYTHONPATH=src python scripts/replay_failed_updates.py --show 1760000000000-0
+  PYTHONPATH=src python scripts/replay_failed_updates.py --requeue 1760000000000-0 1760000000001-0
+  PYTHONPATH=src python scripts/replay_failed_updates.py --requeue-all --limit 50
+  PYTHONPATH=src python scripts/replay_failed_updates.py --stats
+
+Prints JSON lines. Fix the handler (and deploy) before requeueing: a requeued update that fails
+again is dead-lettered again.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from waifu_bot.core import redis as redis_core  # noqa: E402
+from waifu_bot.services import telegram_ingress as ingress  # noqa: E402
+
+
+async def _run(args: argparse.Namespace) -> int:
+    redis = redis_core.get_redis()
+    if args.stats:
+        print(json.dumps(await ingress.ingress_stats(redis), ensure_ascii=False))
+        return 0
+    if args.show:
+        for entry_id, fields in await redis.xrange(ingress.DEAD_STREAM_KEY, min=args.show, max=args.show):
+            print(json.dumps({"id": entry_id, **fields}, ensure_ascii=False))
+            return 0
+        print(f"no dead letter {args.show}", file=sys.stderr)
+        return 1
+    if args.requeue or args.requeue_all:
+        moved = await ingress.requeue_dead(redis, ids=args.requeue or None, count=args.limit)
+        missing = sorted(set(args.requeue or ()) - set(moved))
+        print(json.dumps({"requeued": moved, "missing": missing}, ensure_ascii=False))
+        return 1 if missing else 0
+    for row in await ingress.list_dead(redis, count=args.limit):
+        print(json.dumps(row, ensure_ascii=False))
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--show", metavar="ID", help="print one dead letter with its payload")
+    parser.add_argument("--requeue", nargs="+", metavar="ID", help="requeue these dead letters")
+    parser.add_argument("--requeue-all", action="store_true", help="requeue the oldest --limit dead letters")
+    parser.add_argument("--limit", type=int, default=100, help="entries to list / requeue")
+    parser.add_argument("--stats", action="store_true", help="print queue backlog per shard")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,7 @@ from waifu_bot.services.combat import CombatService
 from waifu_bot.services.expedition import ExpeditionService
 from waifu_bot.services.passive_skills import compute_tavern_hire_price
 from waifu_bot.services.player_new_game_reset import clear_player_redis_keys, reset_player_to_new_game
+from waifu_bot.services import player_revisions
 from waifu_bot.services.tavern import TavernService
 from waifu_bot.services.waifu_hp import sync_waifu_max_hp as _sync_waifu_max_hp
 from waifu_bot.services.item_service import ItemService
@@ -414,6 +415,7 @@ async def admin_clear_all_items(
     await session.execute(
         delete(m.InventoryItem).where(m.InventoryItem.player_id == player_id)
     )
+    player_revisions.note_revision(session, player_id, "inventory")
     await session.commit()
     return {"ok": True}
 
@@ -43,9 +43,8 @@ from waifu_bot.services.armory_service import (
     build_public_summary,
     build_stats_detail,
     load_player_bundle,
-    recompute_all_gear_scores,
     recompute_and_store_gear_score,
-    search_players,
+    search_players_page,
 )
 from waifu_bot.services.paperdoll_quota import paperdoll_generations_remaining
 from waifu_bot.services.armory_session import (
@@ -61,6 +60,15 @@ from waifu_bot.services.armory_session import (
 )
 from waifu_bot.services.auth import validate_telegram_id_token, validate_telegram_login
 from waifu_bot.services.event_log import log_admin_action, log_event
+from waifu_bot.services.maintenance_jobs import (
+    JOBS as MAINTENANCE_JOBS,
+    MaintenanceJobError,
+    list_runs as list_maintenance_runs,
+    request_cancel as request_maintenance_cancel,
+    request_resume as request_maintenance_resume,
+    run_payload,
+    start_run as start_maintenance_run,
+)
 from waifu_bot.services.player_ban import is_player_banned
 from waifu_bot.services.player_new_game_reset import clear_player_redis_keys, reset_player_to_new_game
 from waifu_bot.services.player_statistics import build_player_statistics
@@ -247,11 +255,13 @@ async def auth_me(
 async def players_search(
     request: Request,
     q: str = Query("", max_length=64),
+    limit: int = Query(20, ge=1, le=50),
+    offset: int = Query(0, ge=0, le=500),
     session: AsyncSession = Depends(get_db),
     redis=Depends(get_redis),
 ):
     await rate_limit_by_ip(redis, request, "players_search", 30)
-    return {"items": await search_players(session, q)}
+    return await search_players_page(session, q, limit=limit, offset=offset)
 
 
 @router.get("/players/{tg_id}")
@@ -590,6 +600,54 @@ async def admin_get_stats(
     return await admin_stats(session)
 
 
+_JOB_ERROR_STATUS = {
+    "unknown_job": status.HTTP_404_NOT_FOUND,
+    "run_not_found": status.HTTP_404_NOT_FOUND,
+}
+
+
+def _job_http_error(exc: MaintenanceJobError) -> HTTPException:
+    return HTTPException(
+        status_code=_JOB_ERROR_STATUS.get(exc.code, status.HTTP_409_CONFLICT), detail=exc.code
+    )
+
+
+class MaintenanceJobStartPayload(BaseModel):
+    params: dict[str, Any] = Field(default_factory=dict)
+    dry_run: bool = False
+    chunk_size: int | None = Field(None, ge=1, le=5000)
+
+
+async def _start_maintenance_job(
+    session: AsyncSession,
+    request: Request,
+    admin_id: int,
+    name: str,
+    body: MaintenanceJobStartPayload,
+) -> dict[str, Any]:
+    try:
+        run = await start_maintenance_run(
+            session,
+            name,
+            params=body.params,
+            dry_run=body.dry_run,
+            chunk_size=body.chunk_size,
+            created_by=admin_id,
+        )
+    except MaintenanceJobError as exc:
+        raise _job_http_error(exc) from exc
+    payload = run_payload(run)
+    await _admin_audit(
+        session,
+        request,
+        admin_id,
+        "maintenance_job_start",
+        payload={"run_id": payload["id"], "job": name, "params": body.params, "dry_run": body.dry_run},
+    )
+    await session.commit()
+    return payload
+
+
 @router.post("/admin/gear-score/recompute", dependencies=[Depends(verify_csrf)])
 async def admin_recompute_gear_scores(
     request: Request,
@@ -597,11 +655,80 @@ async def admin_recompute_gear_scores(
     session: AsyncSession = Depends(get_db),
     redis=Depends(get_redis),
 ):
+    """Queue the ``gear_scores`` maintenance job (progress: GET /admin/jobs/runs/{id})."""
     await rate_limit_by_user(redis, admin_id, "admin_gs_recompute", 2)
-    result = await recompute_all_gear_scores(session)
-    await _admin_audit(session, request, admin_id, "recompute_gear_scores", payload=result)
+    run = await _start_maintenance_job(session, request, admin_id, "gear_scores", MaintenanceJobStartPayload())
+    return {"success": True, "run": run}
+
+
+@router.get("/admin/jobs")
+async def admin_list_jobs(
+    admin_id: ArmoryAdmin,
+    session: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
+):
+    await rate_limit_by_user(redis, admin_id, "admin_jobs", 60)
+    return {
+        "jobs": [
+            {"name": j.name, "title": j.title, "chunk_size": j.chunk_size, "params": j.params_doc}
+            for j in MAINTENANCE_JOBS.values()
+        ],
+        "runs": await list_maintenance_runs(session),
+    }
+
+
+@router.post("/admin/jobs/{name}/start", dependencies=[Depends(verify_csrf)])
+async def admin_start_job(
+    name: str,
+    body: MaintenanceJobStartPayload,
+    request: Request,
+    admin_id: ArmoryAdmin,
+    session: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
+):
+    await rate_limit_by_user(redis, admin_id, "admin_job_start", 5)
+    return {"success": True, "run": await _start_maintenance_job(session, request, admin_id, name, body)}
+
+
+@router.get("/admin/jobs/runs/{run_id}")
+async def admin_get_job_run(
+    run_id: int,
+    admin_id: ArmoryAdmin,
+    session: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
+):
+    await rate_limit_by_user(redis, admin_id, "admin_jobs", 60)
+    run = await session.get(m.MaintenanceJobRun, run_id)
+    if run is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="run_not_found")
+    return run_payload(run)
+
+
+@router.post("/admin/jobs/runs/{run_id}/{action}", dependencies=[Depends(verify_csrf)])
+async def admin_control_job_run(
+    run_id: int,
+    action: str,
+    request: Request,
+    admin_id: ArmoryAdmin,
+    session: AsyncSession = Depends(get_db),
+    redis=Depends(get_redis),
+):
+    """``cancel`` stops a run before its next chunk; ``resume`` re-queues it from the checkpoint."""
+    await rate_limit_by_user(redis, admin_id, "admin_job_control", 20)
+    handlers = {"cancel": request_maintenance_cancel, "resume": request_maintenance_resume}
+    handler = handlers.get(action)
+    if handler is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="unknown action")
+    try:
+        run = await handler(session, run_id)
+    except MaintenanceJobError as exc:
+        raise _job_http_error(exc) from exc
+    payload = run_payload(run)
+    await _admin_audit(
+        session, request, admin_id, f"maintenance_job_{action}", payload={"run_id": run_id, "job": run.job_name}
+    )
     await session.commit()
-    return {"success": True, **result}
+    return {"success": True, "run": payload}
 
 
 @router.get("/admin/players")
@@ -1056,6 +1183,48 @@ async def admin_llm_usage(
     )
 
 
+@router.get("/admin/stats/queries")
+async def admin_query_stats(admin_id: ArmoryAdmin):
+    """Live SQL counters per route / Telegram handler / tick of this process (query_budget.py)."""
+    from waifu_bot.services.query_budget import snapshot
+
+    return {
+        "scopes": snapshot(),
+        "enabled": settings.query_accounting_enabled,
+        "nplus1_threshold": settings.query_nplus1_threshold,
+    }
+
+
+@router.get("/admin/stats/telegram-ingress")
+async def admin_telegram_ingress_stats(admin_id: ArmoryAdmin, dead_limit: int = Query(20, ge=0, le=200)):
+    """Webhook update queue: backlog per shard, dead letters, this process's counters (telegram_ingress.py)."""
+    from waifu_bot.core import redis as redis_core
+    from waifu_bot.services import telegram_ingress as ingress
+
+    redis_client = redis_core.get_redis()
+    stats = await ingress.ingress_stats(redis_client)
+    stats["enabled"] = settings.telegram_ingress_enabled
+    stats["dead_letters"] = await ingress.list_dead(redis_client, count=dead_limit) if dead_limit else []
+    return stats
+
+
+@router.get("/admin/history/partitions")
+async def admin_history_partitions(
+    admin_id: ArmoryAdmin,
+    session: AsyncSession = Depends(get_db),
+):
+    from waifu_bot.services.history_partitions import partition_report
+
+    return {
+        "tables": await partition_report(session),
+        "retention_days": {
+            "player_event_log": settings.event_log_retention_days,
+            "economy_ledger": settings.economy_ledger_retention_days,
+        },
+        "read_window_days": settings.history_read_window_days,
+    }
+
+
 @router.get("/admin/actions")
 async def admin_actions_log(
     admin_id: ArmoryAdmin,
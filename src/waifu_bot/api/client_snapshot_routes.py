@@ -6,7 +6,7 @@ from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from waifu_bot.api.deps import get_db, get_player_id
+from waifu_bot.api.deps import get_db, get_player_id, get_redis
 from waifu_bot.core.config import settings
 from waifu_bot.db import models as m
 from waifu_bot.game.economy import ECONOMY_ACTIVITY, ECONOMY_TELEGRAM
@@ -20,9 +20,10 @@ async def client_snapshot(
     player_id: int = Depends(get_player_id),
     session: AsyncSession = Depends(get_db),
     force: bool = Query(False),
+    redis = Depends(get_redis),
 ):
     try:
-        return await get_or_build_client_snapshot(session, player_id, force=force)
+        return await get_or_build_client_snapshot(session, player_id, force=force, redis=redis)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e)) from e
 
@@ -18,19 +18,16 @@ from waifu_bot.services.inventory_payload import (
     enrich_inventory_items_with_template_stats,
 )
 from waifu_bot.services.item_art import enrich_items_with_image_urls
-from waifu_bot.services.shop import compute_player_shop_sell_price
+from waifu_bot.services.player_pricing import get_player_pricing_context, inventory_item_base_value
+from waifu_bot.services.query_budget import query_budget
 
 router = APIRouter()
 
 
 async def _inventory_item_sell_price(session: AsyncSession, player_id: int, inv: m.InventoryItem) -> int:
     """Согласовано с магазином: Item.base_value, эффективный ОБА и пассивки."""
-    item = inv.item
-    if item is not None and getattr(item, "base_value", None) is not None:
-        base_value = max(1, int(item.base_value))
-    else:
-        base_value = max(1, 100 * int(inv.tier or 1) * int(inv.rarity or 1))
-    return await compute_player_shop_sell_price(session, player_id, base_value)
+    ctx = await get_player_pricing_context(session, player_id)
+    return ctx.sell_price(inventory_item_base_value(inv))
 
 
 class EnchantRequest(BaseModel):
@@ -47,6 +44,7 @@ async def _enrich_items_with_template_stats(session: AsyncSession, items: list[m
 
 
 @router.get("/inventory", tags=["inventory"])
+@query_budget(30)
 async def list_inventory(
     player_id: int = Depends(get_player_id),
     session: AsyncSession = Depends(get_db),
@@ -57,7 +55,8 @@ async def list_inventory(
         None, description="telegram | steam | mobile — channel resolve + sticky remap"
     ),
     limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Legacy paging; ignored when after_id is set"),
+    after_id: Optional[int] = Query(None, ge=0, description="Keyset cursor: next_after_id of the previous page"),
 ):
     from waifu_bot.game.economy import normalize_economy
     from waifu_bot.services.channel_bonus_remap import (
@@ -77,7 +76,12 @@ async def list_inventory(
     if equipped is False:
         query = query.where(m.InventoryItem.equipment_slot.is_(None))
 
-    res = await session.execute(query.offset(offset).limit(limit))
+    query = query.order_by(m.InventoryItem.id.asc())
+    if after_id is not None:
+        query = query.where(m.InventoryItem.id > after_id)
+    else:
+        query = query.offset(offset)
+    res = await session.execute(query.limit(limit))
     items = res.scalars().all()
     channel_remap = None
     if client:
@@ -88,8 +92,10 @@ async def list_inventory(
             await session.rollback()
             channel_remap = None
     payload = await build_inventory_payloads(session, items)
+    pricing = await get_player_pricing_context(session, player_id)
+    for row, price in zip(payload, pricing.inventory_sell_prices(items)):
+        row["sell_price"] = price
     for inv, row in zip(items, payload):
-        row["sell_price"] = await _inventory_item_sell_price(session, player_id, inv)
         if client:
             row["resolved_channel"] = client
             row["resolved_bonuses"] = resolve_item_bonuses_for_client(inv, client)
@@ -98,7 +104,11 @@ async def list_inventory(
     except Exception:
         # Keep inventory endpoint unbreakable
         pass
-    out = {"items": payload, "count": len(items)}
+    out = {
+        "items": payload,
+        "count": len(items),
+        "next_after_id": int(items[-1].id) if len(items) == limit else None,
+    }
     if channel_remap:
         out["channel_remap"] = channel_remap
     return out
@@ -155,10 +165,9 @@ async def sell_inventory_items(
     if not items:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="items not found")
 
-    total = 0
+    pricing = await get_player_pricing_context(session, player_id)
+    total = sum(pricing.inventory_sell_prices(items))
     for inv in items:
-        price = await _inventory_item_sell_price(session, player_id, inv)
-        total += price
         await session.delete(inv)
 
     from waifu_bot.services import wallet as wallet_svc
@@ -229,7 +238,8 @@ async def get_inventory_dismantle_preview(
     if not inv:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="item_not_found")
     dust = await preview_dismantle_dust(session, inv)
-    return {"dust_preview": dust}
+    # Цена скупки рядом с пылью — «продать или разобрать» без второго запроса.
+    return {"dust_preview": dust, "sell_price": await _inventory_item_sell_price(session, player_id, inv)}
 
 
 @router.post("/inventory/{item_id}/dismantle", tags=["inventory"])
@@ -11,6 +11,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from waifu_bot.api.deps import get_db, get_player_id
 from waifu_bot.services import merc_systems as merc_sys
+from waifu_bot.services.query_budget import query_budget
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["merc"])
@@ -182,6 +183,7 @@ async def arena_opponents(
 
 
 @router.post("/arena/attack")
+@query_budget(40)
 async def arena_attack(
     body: ArenaAttackBody,
     player_id: int = Depends(get_player_id),
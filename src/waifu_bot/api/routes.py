@@ -28,7 +28,9 @@ from waifu_bot.services.waifu_media_service import (
 from waifu_bot.services.energy import apply_regen
 from waifu_bot.services.enchanting import get_effective_params
 from waifu_bot.services.expedition import ExpeditionService
+from waifu_bot.services.telegram_ingress import accept_update
 from waifu_bot.services.webhook import process_update
+from waifu_bot.services import battle_stream
 from waifu_bot.services import sse as sse_service
 from waifu_bot.game.solo_rewards import enrich_profile_reward_bonus_pcts, guild_reward_fractions
 from waifu_bot.game.effective_stats import fetch_equipped_inventory_items
@@ -787,6 +789,8 @@ async def telegram_webhook(
         )
     except Exception:
         logger.exception("Failed to log webhook update summary")
+    if await accept_update(body):
+        return {"ok": True}
     await process_update(body)
     return {"ok": True}
 
@@ -834,9 +838,17 @@ async def sse_ping() -> dict:
 async def sse_stream(
     player_id: int = Depends(get_player_id),
     redis = Depends(get_redis),
+    proto: int = Query(1, ge=1, le=2, description="2 = delta-encoded battle events with resume"),
+    last_event_id_query: str | None = Query(None, alias="lastEventId"),
+    last_event_id: str | None = Header(None, alias="Last-Event-ID"),
 ):
     channel = f"sse:{player_id}"
-    return sse_service.sse_response(redis, channel)
+    cursor = battle_stream.BattleStreamCursor(
+        player_id,
+        protocol=proto,
+        last_event_id=battle_stream.parse_last_event_id(last_event_id or last_event_id_query),
+    )
+    return sse_service.sse_response(redis, channel, cursor=cursor)
 
 
 # --- Profile/bootstrap ---
@@ -12,7 +12,7 @@ from waifu_bot.services.gamble import GambleService
 from waifu_bot.services.llm_narrative import generate_shop_merchant_line
 from waifu_bot.services.llm_client import has_text_llm_configured
 from waifu_bot.services.game_config_service import cfg_float, get_game_config_map
-from waifu_bot.services.passive_skills import apply_passive_buy_price
+from waifu_bot.services.player_pricing import get_player_pricing_context
 from waifu_bot.services.item_art import enrich_items_with_image_urls
 from waifu_bot.services.inventory_payload import build_inventory_payloads
 from waifu_bot.game.msk_time import msk_next_midnight_utc_iso
@@ -121,7 +121,7 @@ async def buy_protection_stone(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="player_not_found")
     cfg = await get_game_config_map(session)
     price = int(cfg_float(cfg, "enchant.stone_shop_price", 5000))
-    price = await apply_passive_buy_price(session, player_id, price)
+    price = (await get_player_pricing_context(session, player_id)).passive_price(price)
     if int(player.gold or 0) < price:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -80,8 +80,62 @@ class Settings(BaseSettings):
     llm_worker_enabled: bool = Field(False, alias="LLM_WORKER_ENABLED")
     # Debounce PlayerTelegramActivityMiddleware DB writes (seconds).
     player_activity_debounce_seconds: int = Field(300, alias="PLAYER_ACTIVITY_DEBOUNCE_SECONDS")
+    # Buffer bestiary/item/affix codex writes in Redis (flushed by the codex_flush tick).
+    codex_write_behind_enabled: bool = Field(True, alias="CODEX_WRITE_BEHIND_ENABLED")
+    # Sequence-numbered, delta-encoded battle SSE events with Last-Event-ID replay (battle_stream.py).
+    sse_battle_delta_enabled: bool = Field(True, alias="SSE_BATTLE_DELTA_ENABLED")
+    # Bump per-player revision counters (inventory/roster/waifu/wallet) on commit (player_revisions.py).
+    player_revisions_enabled: bool = Field(True, alias="PLAYER_REVISIONS_ENABLED")
+    # Player search via player_search_index (pg_trgm + prefix B-trees, player_search.py); off = legacy ILIKE.
+    player_search_index_enabled: bool = Field(True, alias="PLAYER_SEARCH_INDEX_ENABLED")
+    # Arena matchmaking via Redis rating zset + cached DEF snapshots (arena_matchmaking.py); off = SQL only.
+    arena_matchmaking_index_enabled: bool = Field(True, alias="ARENA_MATCHMAKING_INDEX_ENABLED")
+    # Route group messages via per-player/per-chat Redis mode hashes (activity_modes.py); off = probe every mode.
+    activity_modes_enabled: bool = Field(True, alias="ACTIVITY_MODES_ENABLED")
+    # Defer non-combat group message side effects to the chat:activity stream (chat_activity_bus.py).
+    chat_activity_bus_enabled: bool = Field(True, alias="CHAT_ACTIVITY_BUS_ENABLED")
+    # Guild quest progress via Redis counters + guild_quest_flush (guild_quest_accumulator.py); off = row per metric.
+    guild_quest_accumulator_enabled: bool = Field(True, alias="GUILD_QUEST_ACCUMULATOR_ENABLED")
+    # Chat → guild / active raid / participants in Redis for raid chat logging (raid_chat_cache.py).
+    raid_chat_cache_enabled: bool = Field(True, alias="RAID_CHAT_CACHE_ENABLED")
+    # Webhook acks at once; updates go to tg:updates:* streams, per-chat ordered consumers (telegram_ingress.py).
+    telegram_ingress_enabled: bool = Field(False, alias="TELEGRAM_INGRESS_ENABLED")
+    # Update streams (one consumer per shard at a time); drain the backlog before lowering.
+    telegram_ingress_shards: int = Field(8, alias="TELEGRAM_INGRESS_SHARDS")
+    # Updates dispatched concurrently per process across all shards.
+    telegram_ingress_concurrency: int = Field(16, alias="TELEGRAM_INGRESS_CONCURRENCY")
+    # Buffer llm_usage_log rows in Redis; llm_usage_flush writes them + hourly rollups (llm_usage_ledger.py).
+    llm_usage_write_behind_enabled: bool = Field(True, alias="LLM_USAGE_WRITE_BEHIND_ENABLED")
+    # Raw llm_usage_log retention (days, 0 = keep forever); llm_usage_hourly is never pruned.
+    llm_usage_raw_retention_days: int = Field(30, alias="LLM_USAGE_RAW_RETENTION_DAYS")
+    # Monthly partitions of player_event_log / economy_ledger (history_partitions.py): months created
+    # ahead, retention in days (0 = keep forever), gzip archive dir for dropped months ("" = no archive),
+    # and how far back per-player history reads look (0 = unbounded).
+    history_partitions_ahead_months: int = Field(3, alias="HISTORY_PARTITIONS_AHEAD_MONTHS")
+    event_log_retention_days: int = Field(0, alias="EVENT_LOG_RETENTION_DAYS")
+    economy_ledger_retention_days: int = Field(0, alias="ECONOMY_LEDGER_RETENTION_DAYS")
+    history_archive_dir: str = Field("/var/backups/waifu/history", alias="HISTORY_ARCHIVE_DIR")
+    history_read_window_days: int = Field(90, alias="HISTORY_READ_WINDOW_DAYS")
+    # Sampled capture of solo combat hits for offline replay (combat_capture.py): share of
+    # process_message_damage calls recorded (0 = off) and the gzip output dir.
+    combat_capture_sample_rate: float = Field(0.0, alias="COMBAT_CAPTURE_SAMPLE_RATE")
+    combat_capture_dir: str = Field("/var/tmp/waifu/combat_capture", alias="COMBAT_CAPTURE_DIR")
+    # Hashed immutable URLs + .br/.gz sidecars from static/.asset-manifest.json (static_assets.py).
+    static_asset_pipeline_enabled: bool = Field(True, alias="STATIC_ASSET_PIPELINE_ENABLED")
+    # Bulk maintenance jobs (maintenance_jobs.py): CPU pool size (0 = inline), share of wall time
+    # spent working (rest is sleep between chunks), back off while pg_stat_activity has more
+    # active queries than this (0 = no check).
+    maintenance_job_processes: int = Field(2, alias="MAINTENANCE_JOB_PROCESSES")
+    maintenance_job_duty_cycle: float = Field(0.5, alias="MAINTENANCE_JOB_DUTY_CYCLE")
+    maintenance_job_max_active_queries: int = Field(24, alias="MAINTENANCE_JOB_MAX_ACTIVE_QUERIES")
     # Log P50/P95 for group_message_damage and LLM (Stage 1 baseline; see docs/STAGE1_INFRA.md).
     perf_metrics_enabled: bool = Field(False, alias="PERF_METRICS_ENABLED")
+    # Per-scope SQL accounting (query_budget.py): statements/rows/time per route, Telegram handler
+    # and background tick; a SELECT shape repeated this many times in one scope is flagged as N+1;
+    # strict = a declared @query_budget overrun raises (tests / staging) instead of only logging.
+    query_accounting_enabled: bool = Field(True, alias="QUERY_ACCOUNTING_ENABLED")
+    query_nplus1_threshold: int = Field(10, alias="QUERY_NPLUS1_THRESHOLD")
+    query_budget_strict: bool = Field(False, alias="QUERY_BUDGET_STRICT")
 
     # --- OpenRouter: текстовые модели (OPENROUTER_MODEL, OPENROUTER_MODEL_HIRE); image → ROUTERAI_MODEL_IMAGE ---
     openrouter_api_key: str | None = Field(None, alias="OPENROUTER_API_KEY")
@@ -1,14 +1,22 @@
 """Redis client helper."""
+from contextvars import ContextVar
+
 from redis import asyncio as aioredis
 
 from waifu_bot.core.config import settings
 
 _redis = None
 
+# Per-task replacement for the shared client (combat capture / replay proxies).
+redis_override: ContextVar = ContextVar("redis_override", default=None)
+
 
 def get_redis():
     """Lazy init and return Redis client."""
     global _redis  # noqa: PLW0603
+    override = redis_override.get()
+    if override is not None:
+        return override
     if _redis is None:
         _redis = aioredis.from_url(
             settings.redis_url,
@@ -16,4 +24,3 @@ def get_redis():
             decode_responses=True,
         )
     return _redis
-
@@ -4,7 +4,7 @@ from waifu_bot.db.models.chat_reward import (
     PlayerChatActivityTotal,
     PlayerChatRewardWallet,
 )
-from waifu_bot.db.models.player import Player
+from waifu_bot.db.models.player import Player, PlayerSearchIndex
 from waifu_bot.db.models.player_identity_link import PlayerIdentityLink
 from waifu_bot.db.models.email_credential import EmailCredential
 from waifu_bot.db.models.player_mail import PlayerMail, PlayerMailStatus
@@ -114,7 +114,7 @@ from waifu_bot.db.models.group_dungeon import (
     GDCompletion,
 )
 from waifu_bot.db.models.armory import ArmoryAdminActionLog, PlayerBan, PlayerEventLog
-from waifu_bot.db.models.llm_usage import LlmUsageLog
+from waifu_bot.db.models.llm_usage import LlmUsageHourly, LlmUsageLog
 from waifu_bot.db.models.bot_group_chat import BotGroupChat
 from waifu_bot.db.models.gd_cycle import (
     GDClassSkill,
@@ -134,7 +134,7 @@ from waifu_bot.db.models.abyss import (
     AbyssShardsShopItem,
 )
 from waifu_bot.db.models.perfection import PlayerPerfectionBonus, PlayerPerfectionPending
-from waifu_bot.db.models.wallet import AdminGrant, EconomyLedger, PlayerWalletBalance
+from waifu_bot.db.models.wallet import AdminGrant, EconomyLedger, EconomyLedgerKey, PlayerWalletBalance
 from waifu_bot.db.models.endgame import (
     AbyssKillMatRoll,
     DailyChallengeInstance,
@@ -152,16 +152,21 @@ from waifu_bot.db.models.endgame import (
 )
 from waifu_bot.db.models.activity import ActivityInputState, ActivityItemTemplate
 from waifu_bot.db.models.client_snapshot import PlayerClientSnapshot
+from waifu_bot.db.models.scheduler import MaintenanceJobRun, ScheduledJobRun
 
 __all__ = [
     "PlayerEventLog",
     "ArmoryAdminActionLog",
+    "LlmUsageHourly",
     "LlmUsageLog",
     "BotGroupChat",
     "PlayerBan",
     "Player",
+    "PlayerSearchIndex",
     "PlayerIdentityLink",
     "PlayerClientSnapshot",
+    "ScheduledJobRun",
+    "MaintenanceJobRun",
     "EmailCredential",
     "PlayerChatRewardWallet",
     "PlayerChatActivityDaily",
@@ -289,6 +294,7 @@ __all__ = [
     "PlayerPerfectionPending",
     "PlayerWalletBalance",
     "EconomyLedger",
+    "EconomyLedgerKey",
     "AdminGrant",
     "DailyChallengeSeed",
     "DailyChallengeInstance",
@@ -136,6 +136,8 @@ class AbyssProgress(Base):
     floor_monsters_remaining: Mapped[int | None] = mapped_column(Integer, nullable=True)
     # Pending Grace choices awaiting selection after a checkpoint (list of grace ids).
     pending_grace_choices: Mapped[list | None] = mapped_column(JSONB, nullable=True)
+    # Pre-rolled upcoming floors (modifier + monsters), see abyss_service.generate_floor.
+    floor_plan: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
 
     # Legendary bonus state for active Abyss session
     battle_state: Mapped[dict] = mapped_column(JSONB, default=dict, nullable=False)
@@ -18,10 +18,13 @@ class PlayerEventLog(Base):
     player_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("players.id", ondelete="CASCADE"), index=True)
     event_type: Mapped[str] = mapped_column(String(40), nullable=False)
     payload: Mapped[dict] = mapped_column(JSONB, default=dict, server_default="{}", nullable=False)
+    # Partition key (monthly ranges, services/history_partitions.py), hence part of the PK.
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), default=datetime.utcnow, nullable=False
+        DateTime(timezone=True), primary_key=True, default=datetime.utcnow, nullable=False
     )
 
+    __table_args__ = ({"postgresql_partition_by": "RANGE (created_at)"},)
+
 
 class ArmoryAdminActionLog(Base):
     """Audit log for admin actions via Armory panel."""
@@ -22,6 +22,8 @@ class PlayerClientSnapshot(Base):
     mercenaries_summary_json: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
     revision: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     source_revision: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # {"epoch": str, "sections": {section: [domain revisions...]}} — see player_revisions.py.
+    section_revisions_json: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
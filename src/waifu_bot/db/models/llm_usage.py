@@ -31,3 +31,22 @@ class LlmUsageLog(Base):
     latency_ms: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     prompt_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
     completion_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+
+class LlmUsageHourly(Base):
+    """Hourly rollup of llm_usage_log (filled by the llm_usage_flush tick)."""
+
+    __tablename__ = "llm_usage_hourly"
+
+    hour: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    caller: Mapped[str] = mapped_column(String(80), primary_key=True)
+    modality: Mapped[str] = mapped_column(String(16), primary_key=True)
+    provider: Mapped[str] = mapped_column(String(32), primary_key=True)
+    # '' when the provider default model was used (NULL cannot be part of the key).
+    model: Mapped[str] = mapped_column(String(120), primary_key=True, default="")
+    source: Mapped[str] = mapped_column(String(16), primary_key=True, default="background")
+    requests: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    ok: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    prompt_tokens: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    completion_tokens: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    latency_ms_sum: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
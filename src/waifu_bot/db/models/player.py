@@ -1,7 +1,7 @@
 """Player model."""
 from datetime import datetime
 
-from sqlalchemy import BigInteger, Boolean, DateTime, Integer, String, Text
+from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Index, Integer, String, Text, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -109,3 +109,46 @@ class Player(Base):
         DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
     )
 
+
+class PlayerSearchIndex(Base):
+    """Normalized names for player search (services/player_search.py), one row per player.
+
+    Kept current by a flush hook; ``search_text`` carries a pg_trgm GIN index for substring
+    matches, the per-name columns ``text_pattern_ops`` B-trees for prefix autocomplete.
+    """
+
+    __tablename__ = "player_search_index"
+    __table_args__ = (
+        Index(
+            "ix_player_search_text_trgm",
+            "search_text",
+            postgresql_using="gin",
+            postgresql_ops={"search_text": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_player_search_username_prefix",
+            "username_norm",
+            postgresql_ops={"username_norm": "text_pattern_ops"},
+        ),
+        Index(
+            "ix_player_search_first_name_prefix",
+            "first_name_norm",
+            postgresql_ops={"first_name_norm": "text_pattern_ops"},
+        ),
+        Index(
+            "ix_player_search_character_prefix",
+            "character_norm",
+            postgresql_ops={"character_norm": "text_pattern_ops"},
+        ),
+    )
+
+    player_id: Mapped[int] = mapped_column(
+        BigInteger, ForeignKey("players.id", ondelete="CASCADE"), primary_key=True
+    )
+    username_norm: Mapped[str] = mapped_column(Text, nullable=False, default="", server_default="")
+    first_name_norm: Mapped[str] = mapped_column(Text, nullable=False, default="", server_default="")
+    character_norm: Mapped[str] = mapped_column(Text, nullable=False, default="", server_default="")
+    search_text: Mapped[str] = mapped_column(Text, nullable=False, default="", server_default="")
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False, server_default=text("now()")
+    )
@@ -0,0 +1,70 @@
+"""Persisted ledgers for calendar-scheduled background jobs and bulk maintenance runs."""
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Boolean, DateTime, Index, Integer, String, Text, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from waifu_bot.db.base import Base
+
+
+class ScheduledJobRun(Base):
+    """One row per calendar job: last claimed MSK slot + lease of the running worker."""
+
+    __tablename__ = "scheduled_job_runs"
+
+    job_name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # Fire instant (UTC) of the last claimed slot; NULL = never ran.
+    last_slot_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Slot before last_slot_at — restored when a run fails so the next wake retries it.
+    prev_slot_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="idle", server_default="idle")
+    claimed_by: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False, server_default=text("now()")
+    )
+
+
+class MaintenanceJobRun(Base):
+    """One bulk maintenance run (see services/maintenance_jobs.py) with its resume checkpoint.
+
+    ``cursor`` is the last processed key; every chunk commits its writes together with the
+    new cursor, so a crashed run resumes after the last committed chunk.
+    """
+
+    __tablename__ = "maintenance_job_runs"
+    __table_args__ = (Index("ix_maintenance_job_runs_status", "status", "id"),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    job_name: Mapped[str] = mapped_column(String(64), nullable=False)
+    params: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict, server_default=text("'{}'::jsonb"))
+    dry_run: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, server_default=text("false"))
+    # pending → running → done | failed | cancelled
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="pending", server_default="pending")
+    cursor: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    chunk_size: Mapped[int] = mapped_column(Integer, nullable=False, default=200, server_default="200")
+    total_estimate: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    processed: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    changed: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    errors: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    cancel_requested: Mapped[bool] = mapped_column(
+        Boolean, nullable=False, default=False, server_default=text("false")
+    )
+    claimed_by: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_by: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False, server_default=text("now()")
+    )
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False, server_default=text("now()")
+    )
@@ -11,6 +11,7 @@ from sqlalchemy import (
     Date,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     JSON,
     String,
@@ -55,6 +56,7 @@ class TavernState(Base):
     """Global tavern progression per player."""
 
     __tablename__ = "tavern_states"
+    __table_args__ = (Index("ix_tavern_states_arena_rating", "arena_rating"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     player_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("players.id"), unique=True)
@@ -49,7 +49,11 @@ class PlayerWalletBalance(Base):
 
 
 class EconomyLedger(Base):
-    """Append-only currency movement log. Gold uses currency_key='gold'."""
+    """Append-only currency movement log. Gold uses currency_key='gold'.
+
+    Partitioned by month on created_at (services/history_partitions.py); idempotent
+    sources are deduplicated through :class:`EconomyLedgerKey`.
+    """
 
     __tablename__ = "economy_ledger"
 
@@ -58,7 +62,11 @@ class EconomyLedger(Base):
         BigInteger, ForeignKey("players.id", ondelete="CASCADE"), nullable=False, index=True
     )
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), default=datetime.utcnow, nullable=False, server_default=text("now()")
+        DateTime(timezone=True),
+        primary_key=True,
+        default=datetime.utcnow,
+        nullable=False,
+        server_default=text("now()"),
     )
     direction: Mapped[str] = mapped_column(String(8), nullable=False)  # in | out
     currency_key: Mapped[str] = mapped_column(String(32), nullable=False)
@@ -70,17 +78,28 @@ class EconomyLedger(Base):
     __table_args__ = (
         CheckConstraint("direction IN ('in','out')", name="ck_ledger_direction"),
         CheckConstraint("amount >= 0", name="ck_ledger_amount_nonneg"),
-        Index(
-            "uq_economy_ledger_idempotent",
-            "player_id",
-            "source",
-            "ref_type",
-            "ref_id",
-            unique=True,
-            postgresql_where=text(
-                "source IN ('challenge_first','admin','temper','reforge','refine','respec')"
-            ),
-        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+class EconomyLedgerKey(Base):
+    """Idempotency key of a ledger movement from an idempotent source (not partitioned, never pruned)."""
+
+    __tablename__ = "economy_ledger_keys"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    player_id: Mapped[int] = mapped_column(
+        BigInteger, ForeignKey("players.id", ondelete="CASCADE"), nullable=False
+    )
+    source: Mapped[str] = mapped_column(String(32), nullable=False)
+    ref_type: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    ref_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=datetime.utcnow, nullable=False, server_default=text("now()")
+    )
+
+    __table_args__ = (
+        Index("uq_economy_ledger_keys", "player_id", "source", "ref_type", "ref_id", unique=True),
     )
 
 
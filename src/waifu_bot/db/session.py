@@ -22,6 +22,37 @@ def init_engine() -> None:
         pool_pre_ping=settings.db_pool_pre_ping,
     )
     SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    if settings.query_accounting_enabled:
+        from waifu_bot.services.query_budget import install_engine_hooks
+
+        install_engine_hooks(engine)
+    from waifu_bot.services.player_pricing import install_session_hooks as install_pricing_hooks
+
+    install_pricing_hooks()
+    if settings.player_revisions_enabled:
+        from waifu_bot.services.player_revisions import install_session_hooks
+
+        install_session_hooks()
+    if settings.player_search_index_enabled:
+        from waifu_bot.services.player_search import install_session_hooks as install_search_hooks
+
+        install_search_hooks()
+    if settings.arena_matchmaking_index_enabled:
+        from waifu_bot.services.arena_matchmaking import install_session_hooks as install_arena_hooks
+
+        install_arena_hooks()
+    if settings.activity_modes_enabled:
+        from waifu_bot.services.activity_modes import install_session_hooks as install_activity_hooks
+
+        install_activity_hooks()
+    if settings.guild_quest_accumulator_enabled:
+        from waifu_bot.services.guild_quest_accumulator import install_session_hooks as install_quest_hooks
+
+        install_quest_hooks()
+    if settings.raid_chat_cache_enabled:
+        from waifu_bot.services.raid_chat_cache import install_session_hooks as install_raid_chat_hooks
+
+        install_raid_chat_hooks()
 
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
@@ -7,17 +7,17 @@ from typing import Any
 
 from waifu_bot.game.constants import MediaType
 from waifu_bot.game.legendary_bonuses.context import BonusContext, BonusResult
-from waifu_bot.game.legendary_bonuses.generic import (
-    GENERIC_DEATH_PRIMITIVE,
-    GENERIC_HANDLERS,
-    generic_on_kill,
-)
+from waifu_bot.game.legendary_bonuses.generic import GENERIC_DEATH_PRIMITIVE, generic_on_kill
 from waifu_bot.game.legendary_bonuses.handlers import (
-    BONUS_HANDLERS,
-    DEATH_HANDLERS,
     handler_crit_chain_after_crit,
     handler_killing_blow_heal_on_death,
 )
+from waifu_bot.game.legendary_bonuses.loadout import (
+    BoundBonusContext,
+    LegendaryLoadout,
+    compile_loadout,
+    shared_pass_context,
+)
 from waifu_bot.game.legendary_bonuses.state import merge_battle_state
 
 
@@ -151,71 +151,34 @@ def _aggregate(results: list[BonusResult], *, max_mult: float) -> AggregatedLege
 
 
 def run_outgoing_handlers(
-    active_rows: list[dict[str, Any]],
+    active_rows: list[dict[str, Any]] | LegendaryLoadout,
     ctx_base: BonusContext,
     *,
     max_mult: float = 10.0,
     skip_keys: frozenset[str] | None = None,
     phase: str = "full",
 ) -> AggregatedLegendaryResult:
+    """Run outgoing handlers over a compiled loadout (raw rows are compiled on the fly).
+
+    All handlers of the pass share one read-only snapshot of ``ctx_base``.
+    """
+    loadout = active_rows if isinstance(active_rows, LegendaryLoadout) else compile_loadout(active_rows)
     skip = skip_keys or frozenset()
     results: list[BonusResult] = []
     contributions: list[LegendaryBonusContrib] = []
-    frozen_tick_state = dict(ctx_base.battle_state or {})
     consume_patch: dict[str, Any] = {}
-    for row in active_rows:
-        key = str(row.get("bonus_key") or "")
-        if not key or key in skip or key in DEATH_HANDLERS:
-            continue
-        handler = BONUS_HANDLERS.get(key)
-        if not handler:
-            primitive = str((row.get("params") or {}).get("handler") or "")
-            if primitive == GENERIC_DEATH_PRIMITIVE:
-                continue
-            handler = GENERIC_HANDLERS.get(primitive)
-        if not handler:
+    shared = shared_pass_context(ctx_base) if loadout.bonuses else ctx_base
+    for bonus in loadout.bonuses:
+        if bonus.handler is None or bonus.bonus_key in skip:
             continue
-        ctx = BonusContext(
-            player_id=ctx_base.player_id,
-            waifu_id=ctx_base.waifu_id,
-            session_id=ctx_base.session_id,
-            is_group_dungeon=ctx_base.is_group_dungeon,
-            message_type=ctx_base.message_type,
-            message_length=ctx_base.message_length,
-            message_timestamp=ctx_base.message_timestamp,
-            seconds_since_last_attack=ctx_base.seconds_since_last_attack,
-            monster_id=ctx_base.monster_id,
-            monster_sequence_index=ctx_base.monster_sequence_index,
-            monster_hp_current=ctx_base.monster_hp_current,
-            monster_hp_max=ctx_base.monster_hp_max,
-            monster_affixes=list(ctx_base.monster_affixes),
-            monster_is_boss=ctx_base.monster_is_boss,
-            monster_is_first_in_room=ctx_base.monster_is_first_in_room,
-            waifu_hp_current=ctx_base.waifu_hp_current,
-            waifu_hp_max=ctx_base.waifu_hp_max,
-            waifu_gold=ctx_base.waifu_gold,
-            waifu_level=ctx_base.waifu_level,
-            waifu_stats=dict(ctx_base.waifu_stats),
-            waifu_last_dungeon_knocked_out=ctx_base.waifu_last_dungeon_knocked_out,
-            battle_state=dict(frozen_tick_state),
-            item_id=int(row.get("inventory_item_id") or 0),
-            bonus_key=key,
-            bonus_params=dict(row.get("params") or {}),
-            group_last_attacker_id=ctx_base.group_last_attacker_id,
-            group_messages_since_last_ov_attack=ctx_base.group_messages_since_last_ov_attack,
-            base_damage=ctx_base.base_damage,
-            extra_data=dict(ctx_base.extra_data),
-            equipped_legendary_count=ctx_base.equipped_legendary_count,
-            slot_type=row.get("slot_type"),
-        )
-        res = handler(ctx)
+        res = bonus.handler(BoundBonusContext(shared, bonus))
         if phase == "pre_crit":
             res = BonusResult(force_crit=res.force_crit, crit_damage_multiplier=res.crit_damage_multiplier)
         elif phase == "post_crit":
             res.force_crit = False
         results.append(res)
         if phase == "full":
-            lc = _contrib_from_result(row, res)
+            lc = _contrib_from_result(bonus.row, res)
             if lc is not None:
                 contributions.append(lc)
         consume_patch = merge_battle_state(consume_patch, res.battle_state_patch or {})
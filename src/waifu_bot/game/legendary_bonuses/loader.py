@@ -1,12 +1,23 @@
-"""Load equipped legendary bonuses from DB."""
+"""Load equipped legendary bonuses from DB (+ per-process compiled loadout cache)."""
 
 from __future__ import annotations
 
+import time
+from collections import OrderedDict
 from typing import Any
 
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from waifu_bot.game.legendary_bonuses.loadout import LegendaryLoadout, compile_loadout
+
+# Compiled loadouts per player, tagged with the player's ``inventory`` revision
+# (player_revisions.py): equip / unequip / reforge bump it on commit in any process.
+LOADOUT_CACHE_MAX = 4096
+# Safety net for catalog edits (legendary_bonuses params / is_active), which bump no revision.
+LOADOUT_CACHE_TTL_SEC = 600
+_loadouts: OrderedDict[int, tuple[float, LegendaryLoadout]] = OrderedDict()
+
 
 async def get_active_legendary_bonuses(
     session: AsyncSession,
@@ -72,6 +83,67 @@ async def get_active_legendary_bonuses(
     return [dict(r) for r in rows2]
 
 
+def loadout_version(revisions: dict[str, Any] | None) -> str | None:
+    """Cache tag from ``player_revisions.read_revisions``; None disables caching."""
+    if not revisions or not revisions.get("epoch"):
+        return None
+    return f"{revisions['epoch']}:{int(revisions.get('inventory') or 0)}"
+
+
+def _cached_loadout(player_id: int, version: str) -> LegendaryLoadout | None:
+    hit = _loadouts.get(player_id)
+    if hit is None:
+        return None
+    stored_at, loadout = hit
+    if loadout.version != version or time.monotonic() - stored_at > LOADOUT_CACHE_TTL_SEC:
+        _loadouts.pop(player_id, None)
+        return None
+    _loadouts.move_to_end(player_id)
+    return loadout
+
+
+def _store_loadout(player_id: int, loadout: LegendaryLoadout) -> None:
+    _loadouts[player_id] = (time.monotonic(), loadout)
+    _loadouts.move_to_end(player_id)
+    while len(_loadouts) > LOADOUT_CACHE_MAX:
+        _loadouts.popitem(last=False)
+
+
+def clear_loadout_cache() -> None:
+    _loadouts.clear()
+
+
+async def load_legendary_loadout(
+    session: AsyncSession,
+    player_id: int,
+    *,
+    redis: Any = None,
+) -> LegendaryLoadout:
+    """Compiled loadout; cached per inventory revision when Redis revisions are available.
+
+    Players without equipped legendaries cost one COUNT on a miss and nothing on a hit.
+    """
+    pid = int(player_id)
+    version = None
+    if redis is not None:
+        from waifu_bot.core.config import settings
+
+        if getattr(settings, "player_revisions_enabled", True):
+            from waifu_bot.services.player_revisions import read_revisions
+
+            version = loadout_version(await read_revisions(redis, pid))
+    if version is not None:
+        cached = _cached_loadout(pid, version)
+        if cached is not None:
+            return cached
+    count = await count_equipped_legendaries(session, pid)
+    rows = await get_active_legendary_bonuses(session, pid) if count else []
+    loadout = compile_loadout(rows, legendary_count=count, version=version)
+    if version is not None:
+        _store_loadout(pid, loadout)
+    return loadout
+
+
 async def count_equipped_legendaries(session: AsyncSession, player_id: int) -> int:
     n = await session.scalar(
         text(
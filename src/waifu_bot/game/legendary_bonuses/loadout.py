@@ -0,0 +1,127 @@
+"""Compiled legendary loadout: bonus rows resolved once into handlers + frozen params.
+
+``get_active_legendary_bonuses`` returns plain rows; every hit used to look each handler up
+again and build a fresh ``BonusContext`` (with copied dicts) per row, up to three times
+per hit. ``compile_loadout`` does the lookup once per equipment change; the outgoing pass
+then builds one shared, read-only context per pass and binds only the per-bonus fields
+(``item_id``, ``bonus_key``, ``bonus_params``, ``slot_type``) on a slotted view.
+
+Handlers only read the context (see handlers.py / generic.py), so ``battle_state``,
+``waifu_stats`` and ``extra_data`` are exposed as read-only mappings — an accidental write
+fails loudly instead of leaking into the next bonus.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+from typing import Any, Callable, Mapping
+
+from waifu_bot.game.legendary_bonuses.context import BonusContext, BonusResult
+from waifu_bot.game.legendary_bonuses.generic import GENERIC_DEATH_PRIMITIVE, GENERIC_HANDLERS
+from waifu_bot.game.legendary_bonuses.handlers import BONUS_HANDLERS, DEATH_HANDLERS
+
+Handler = Callable[[Any], BonusResult]
+
+_EMPTY_PARAMS: Mapping[str, Any] = MappingProxyType({})
+
+
+@dataclass(frozen=True)
+class CompiledBonus:
+    bonus_key: str
+    inventory_item_id: int
+    slot_type: str | None
+    params: Mapping[str, Any]
+    # Outgoing handler; None for death-only / unknown bonuses.
+    handler: Handler | None
+    row: Mapping[str, Any]
+
+
+@dataclass(frozen=True)
+class LegendaryLoadout:
+    """Equipped legendary bonuses of one player, ready for the combat passes."""
+
+    bonuses: tuple[CompiledBonus, ...] = ()
+    legendary_count: int = 0
+    # Cache tag (player revisions); None = not cacheable.
+    version: str | None = None
+
+    @property
+    def active(self) -> bool:
+        return bool(self.bonuses)
+
+    @property
+    def rows(self) -> list[dict[str, Any]]:
+        """Row dicts for the non-outgoing helpers (death / incoming / retaliation)."""
+        return [dict(b.row) for b in self.bonuses]
+
+    @property
+    def outgoing(self) -> tuple[CompiledBonus, ...]:
+        return tuple(b for b in self.bonuses if b.handler is not None)
+
+
+EMPTY_LOADOUT = LegendaryLoadout()
+
+
+def _resolve_handler(key: str, params: Mapping[str, Any]) -> Handler | None:
+    if not key or key in DEATH_HANDLERS:
+        return None
+    handler = BONUS_HANDLERS.get(key)
+    if handler is not None:
+        return handler
+    primitive = str(params.get("handler") or "")
+    if primitive == GENERIC_DEATH_PRIMITIVE:
+        return None
+    return GENERIC_HANDLERS.get(primitive)
+
+
+def compile_loadout(
+    rows: list[dict[str, Any]],
+    *,
+    legendary_count: int = 0,
+    version: str | None = None,
+) -> LegendaryLoadout:
+    if not rows:
+        return LegendaryLoadout(legendary_count=legendary_count, version=version)
+    bonuses = []
+    for row in rows:
+        key = str(row.get("bonus_key") or "")
+        params = MappingProxyType(dict(row.get("params") or {})) if row.get("params") else _EMPTY_PARAMS
+        bonuses.append(
+            CompiledBonus(
+                bonus_key=key,
+                inventory_item_id=int(row.get("inventory_item_id") or 0),
+                slot_type=row.get("slot_type"),
+                params=params,
+                handler=_resolve_handler(key, params),
+                row=MappingProxyType(dict(row)),
+            )
+        )
+    return LegendaryLoadout(tuple(bonuses), legendary_count=legendary_count, version=version)
+
+
+class BoundBonusContext:
+    """One bonus' view of the shared pass context (per-bonus fields + read-through)."""
+
+    __slots__ = ("_shared", "item_id", "bonus_key", "bonus_params", "slot_type")
+
+    def __init__(self, shared: BonusContext, bonus: CompiledBonus) -> None:
+        self._shared = shared
+        self.item_id = bonus.inventory_item_id
+        self.bonus_key = bonus.bonus_key
+        self.bonus_params = bonus.params
+        self.slot_type = bonus.slot_type
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._shared, name)
+
+
+def shared_pass_context(ctx_base: BonusContext) -> BonusContext:
+    """Read-only snapshot of ``ctx_base`` for one handler pass (no per-bonus dict copies)."""
+    return replace(
+        ctx_base,
+        monster_affixes=tuple(ctx_base.monster_affixes or ()),
+        waifu_stats=MappingProxyType(dict(ctx_base.waifu_stats or {})),
+        battle_state=MappingProxyType(dict(ctx_base.battle_state or {})),
+        extra_data=MappingProxyType(dict(ctx_base.extra_data or {})),
+    )
@@ -15,6 +15,9 @@ from waifu_bot.db.session import get_session, init_engine
 from waifu_bot.services.webhook import setup_webhook, start_polling, stop_polling, get_update_mode, log_bot_identity
 from waifu_bot.services.background import start_all_background_tasks, cancel_all_background_tasks
 from waifu_bot.services.sse import SseSkipGZipMiddleware
+from waifu_bot.services.telegram_ingress import start_consumers as start_ingress_consumers
+from waifu_bot.services.telegram_ingress import stop_consumers as stop_ingress_consumers
+from waifu_bot.services.static_assets import AssetStaticFiles
 
 logger = logging.getLogger(__name__)
 
@@ -135,6 +138,10 @@ def create_app() -> FastAPI:
 
     app.add_middleware(ExpeditionLegacyGoneMiddleware)
     app.add_middleware(LlmUsageHttpMiddleware)
+    if settings.query_accounting_enabled:
+        from waifu_bot.services.query_budget_http import QueryBudgetHttpMiddleware
+
+        app.add_middleware(QueryBudgetHttpMiddleware)
 
     app.include_router(api_router, prefix="/api")
 
@@ -143,7 +150,11 @@ def create_app() -> FastAPI:
         return RedirectResponse(url="/webapp/index.html", status_code=302)
 
     if webapp_dir.exists():
-        app.mount("/webapp", StaticFiles(directory=str(webapp_dir), html=True), name="webapp")
+        app.mount(
+            "/webapp",
+            AssetStaticFiles(mount="/webapp", directory=str(webapp_dir), html=True),
+            name="webapp",
+        )
         _favicon = webapp_dir / "favicon.ico"
         if _favicon.is_file():
 
@@ -152,7 +163,11 @@ def create_app() -> FastAPI:
                 return FileResponse(_favicon, media_type="image/x-icon")
 
     if static_dir.exists():
-        app.mount("/static", StaticFiles(directory=str(static_dir), html=False), name="static")
+        app.mount(
+            "/static",
+            AssetStaticFiles(mount="/static", directory=str(static_dir), html=False),
+            name="static",
+        )
 
     armory_dir = static_dir / "armory"
     if armory_dir.is_dir():
@@ -203,6 +218,8 @@ def create_app() -> FastAPI:
                             e,
                         )
                 asyncio.create_task(_run())
+                if settings.telegram_ingress_enabled:
+                    start_ingress_consumers()
 
         mode = (settings.background_mode or "inline").lower()
         if mode in ("inline", "dual"):
@@ -213,6 +230,7 @@ def create_app() -> FastAPI:
     @app.on_event("shutdown")
     async def _shutdown() -> None:
         await stop_polling()
+        await stop_ingress_consumers()
         await cancel_all_background_tasks()
 
     @app.get("/health", tags=["infra"])
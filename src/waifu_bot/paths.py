@@ -25,3 +25,13 @@ def repository_root() -> Path:
 def static_game_directory() -> Path:
     """`static/game` — tiered items live under `items/webp/`."""
     return repository_root() / "static" / "game"
+
+
+def static_directory() -> Path:
+    """`static/` — served at `/static`."""
+    return repository_root() / "static"
+
+
+def webapp_directory() -> Path:
+    """Telegram WebApp shell (`src/waifu_bot/webapp`) — served at `/webapp`."""
+    return Path(__file__).resolve().parent / "webapp"
@@ -0,0 +1,262 @@
+"""Process-local snapshot of Abyss content: monster templates, affixes, checkpoint bosses.
+
+Floor generation and monster serialization read this snapshot instead of the
+content tables. It is rebuilt when the TTL runs out or when the ``game_config``
+key ``abyss_catalog_version`` changes (bump it after editing templates/affixes/bosses
+to roll the change out without waiting for the TTL).
+
+Derived pools (templates per biome, eligible affixes per family and depth) are
+built lazily on first use and live as long as the snapshot.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from waifu_bot.db.models import AbyssCheckpointBoss, MonsterAffix, MonsterTemplate
+from waifu_bot.services.game_config_service import cfg_int, cfg_str, get_game_config_map
+
+CATALOG_TTL_SECONDS = 300.0
+CATALOG_VERSION_KEY = "abyss_catalog_version"
+
+# Behaviour flags introduced by the Abyss (ТЗ §10); only spawn on deep floors.
+ABYSS_EXCLUSIVE_FLAGS = frozenset({"GRACE_STEAL", "ABYSS_MIRROR", "ANTI_REGEN", "CHAOS_DMG"})
+
+
+@dataclass(frozen=True, slots=True)
+class TemplateRow:
+    id: int
+    name: str
+    family: str | None
+    slug: str | None
+    emoji: str | None
+    tier: int
+    weight: int
+    tags: frozenset[str]
+
+
+@dataclass(frozen=True, slots=True)
+class AffixRow:
+    id: int
+    name: str
+    type: str
+    category: str
+    affix_group: str
+    tier: int | None
+    hp_mult: float | None
+    dmg_mult: float | None
+    gold_mult: float | None
+    exp_mult: float | None
+    behavior_flag: str | None
+    behavior_params: dict[str, Any] | None
+    incompatible_with: tuple[str, ...]
+    allowed_families: frozenset[str]
+    forbidden_families: frozenset[str]
+
+
+@dataclass(frozen=True, slots=True)
+class BossRow:
+    floor_number: int
+    name: str
+    family: str
+    slug: str
+    base_hp: int
+    base_dmg: int
+    base_exp: int
+    special_mechanic: str | None
+    mechanic_params: dict[str, Any]
+    warning_text: str | None
+    description: str | None
+
+
+def _template_tags(t: MonsterTemplate) -> frozenset[str]:
+    raw = t.tags or []
+    if isinstance(raw, dict):
+        raw = list(raw.keys())
+    out = {str(x).lower() for x in raw or []}
+    if t.family:
+        out.add(str(t.family).lower())
+    return frozenset(out)
+
+
+def template_row(t: MonsterTemplate) -> TemplateRow:
+    return TemplateRow(
+        id=int(t.id),
+        name=t.name,
+        family=t.family,
+        slug=t.slug,
+        emoji=t.emoji,
+        tier=int(getattr(t, "tier", 1) or 1),
+        weight=max(1, int(getattr(t, "weight", 100) or 100)),
+        tags=_template_tags(t),
+    )
+
+
+def _affix_row(a: MonsterAffix) -> AffixRow:
+    return AffixRow(
+        id=int(a.id),
+        name=a.name,
+        type=a.type,
+        category=a.category,
+        affix_group=a.affix_group,
+        tier=int(a.tier) if a.tier is not None else None,
+        hp_mult=a.hp_mult,
+        dmg_mult=a.dmg_mult,
+        gold_mult=a.gold_mult,
+        exp_mult=a.exp_mult,
+        behavior_flag=a.behavior_flag,
+        behavior_params=dict(a.behavior_params) if a.behavior_params else None,
+        incompatible_with=tuple(a.incompatible_with or ()),
+        allowed_families=frozenset(str(x).lower() for x in a.allowed_families or ()),
+        forbidden_families=frozenset(str(x).lower() for x in a.forbidden_families or ()),
+    )
+
+
+def normalize_boss_mechanics(params: dict) -> dict:
+    """Expand high-level COMBINED flags into concrete, runtime-handled params.
+
+    The combat engine reads individual keys (reflect_chance / revive_hp_pct /
+    copies / stone_skin_max / phase_2_at). The deepest bosses are seeded with
+    umbrella flags (``all_mechanics``, ``modifier_every_n``) — fill in working
+    defaults so their mechanics actually fire.
+    """
+    if params.get("all_mechanics"):
+        params.setdefault("reflect_chance", 0.20)
+        params.setdefault("reflect_pct", 0.25)
+        params.setdefault("revive_hp_pct", 0.5)
+        params.setdefault("copies", 2)
+        params.setdefault("copy_hp_pct", 0.4)
+        params.setdefault("copy_dmg_pct", 0.4)
+        params.setdefault("phase_2_at", 0.5)
+        params.setdefault("rage_dmg_mult", 1.4)
+    if params.get("modifier_every_n"):
+        # Cycling between affixes per N messages is future polish; ensure the
+        # boss at least reflects and enrages so the fight is non-trivial.
+        params.setdefault("reflect_chance", 0.25)
+        params.setdefault("reflect_pct", 0.25)
+        params.setdefault("phase_2_at", 0.5)
+        params.setdefault("rage_dmg_mult", 1.5)
+    return params
+
+
+def _boss_row(b: AbyssCheckpointBoss) -> BossRow:
+    return BossRow(
+        floor_number=int(b.floor_number),
+        name=b.name,
+        family=b.family,
+        slug=b.slug,
+        base_hp=int(b.base_hp),
+        base_dmg=int(b.base_dmg),
+        base_exp=int(b.base_exp),
+        special_mechanic=b.special_mechanic,
+        mechanic_params=normalize_boss_mechanics(dict(b.mechanic_params or {})),
+        warning_text=b.warning_text,
+        description=b.description,
+    )
+
+
+def max_affix_tier(cfg: dict[str, str], floor: int) -> int:
+    """Highest affix tier an elite may roll on ``floor`` (3 = deep floors, Abyss-exclusive flags)."""
+    if floor >= cfg_int(cfg, "abyss_affix_tier3_floor", 51):
+        return 3
+    if floor >= cfg_int(cfg, "abyss_affix_tier2_floor", 21):
+        return 2
+    return 1
+
+
+@dataclass
+class AbyssCatalog:
+    version: str
+    templates: tuple[TemplateRow, ...] = ()
+    affixes: tuple[AffixRow, ...] = ()
+    bosses: tuple[BossRow, ...] = ()
+    _affix_by_id: dict[int, AffixRow] = field(default_factory=dict, repr=False)
+    _boss_by_floor: dict[int, BossRow] = field(default_factory=dict, repr=False)
+    _biome_pools: dict[tuple[str, ...], tuple[tuple[TemplateRow, ...], tuple[int, ...]]] = field(
+        default_factory=dict, repr=False
+    )
+    _affix_pools: dict[tuple[str, int], tuple[AffixRow, ...]] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self) -> None:
+        self._affix_by_id = {a.id: a for a in self.affixes}
+        self._boss_by_floor = {b.floor_number: b for b in self.bosses}
+
+    def affix(self, affix_id: int) -> AffixRow | None:
+        return self._affix_by_id.get(int(affix_id))
+
+    def biome_pool(self, tags: list[str]) -> tuple[tuple[TemplateRow, ...], tuple[int, ...]]:
+        """Templates whose tags overlap the biome (all templates if none do), with weights."""
+        key = tuple(sorted({t.lower() for t in tags}))
+        hit = self._biome_pools.get(key)
+        if hit is None:
+            tagset = set(key)
+            pool = tuple(t for t in self.templates if t.tags & tagset) or self.templates
+            hit = (pool, tuple(t.weight for t in pool))
+            self._biome_pools[key] = hit
+        return hit
+
+    def eligible_affixes(self, family: str | None, max_tier: int) -> tuple[AffixRow, ...]:
+        """Affixes an ordinary elite of ``family`` may roll; tier 3 unlocks Abyss-exclusive flags."""
+        fam = (family or "").lower()
+        key = (fam, max_tier)
+        hit = self._affix_pools.get(key)
+        if hit is None:
+            hit = tuple(
+                a
+                for a in self.affixes
+                if not (a.allowed_families and fam not in a.allowed_families)
+                and fam not in a.forbidden_families
+                and (a.tier is None or a.tier <= max_tier)
+                and (max_tier >= 3 or a.behavior_flag not in ABYSS_EXCLUSIVE_FLAGS)
+            )
+            self._affix_pools[key] = hit
+        return hit
+
+    def boss_for_floor(self, floor: int) -> BossRow | None:
+        """Checkpoint boss of ``floor``; the deepest defined boss beyond the seeded range."""
+        boss = self._boss_by_floor.get(int(floor))
+        if boss is None and self.bosses:
+            boss = self.bosses[-1]
+        return boss
+
+
+_catalog: AbyssCatalog | None = None
+_catalog_expires_at: float = 0.0
+
+
+def invalidate_abyss_catalog() -> None:
+    global _catalog, _catalog_expires_at
+    _catalog = None
+    _catalog_expires_at = 0.0
+
+
+async def load_abyss_catalog(session: AsyncSession, version: str = "") -> AbyssCatalog:
+    templates = (await session.execute(select(MonsterTemplate).order_by(MonsterTemplate.id))).scalars().all()
+    affixes = (await session.execute(select(MonsterAffix).order_by(MonsterAffix.id))).scalars().all()
+    bosses = (
+        await session.execute(select(AbyssCheckpointBoss).order_by(AbyssCheckpointBoss.floor_number))
+    ).scalars().all()
+    return AbyssCatalog(
+        version=version,
+        templates=tuple(template_row(t) for t in templates),
+        affixes=tuple(_affix_row(a) for a in affixes),
+        bosses=tuple(_boss_row(b) for b in bosses),
+    )
+
+
+async def get_abyss_catalog(session: AsyncSession, cfg: dict[str, str] | None = None) -> AbyssCatalog:
+    """Current catalog (process-local; reloaded on TTL expiry or ``abyss_catalog_version`` change)."""
+    global _catalog, _catalog_expires_at
+    if cfg is None:
+        cfg = await get_game_config_map(session)
+    version = cfg_str(cfg, CATALOG_VERSION_KEY, "")
+    now = time.monotonic()
+    if _catalog is not None and _catalog.version == version and now < _catalog_expires_at:
+        return _catalog
+    _catalog = await load_abyss_catalog(session, version)
+    _catalog_expires_at = now + CATALOG_TTL_SECONDS
+    return _catalog
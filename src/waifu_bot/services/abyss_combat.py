@@ -247,9 +247,10 @@ async def handle_abyss_attack(
     message_length: int | None = None,
     *,
     rng: random.Random | None = None,
+    redis=None,
 ) -> dict:
     """Process one chat message as an Abyss attack. No-ops cleanly if the player
-    has no active Abyss session."""
+    has no active Abyss session. ``redis`` enables the cached legendary loadout."""
     rng = rng or random
     if not await absvc.has_active_abyss_session(session, player_id):
         return {"error": "no_session"}
@@ -370,7 +371,7 @@ async def handle_abyss_attack(
         legendary_base = int(damage)
 
         legendary_bridge = LegendaryCombatBridge()
-        await legendary_bridge.load(session, player_id)
+        await legendary_bridge.load(session, player_id, redis=redis)
         leg_outgoing_agg = None
         leg_force_crit = False
         leg_crit_add = 0.0
@@ -592,9 +593,7 @@ async def handle_abyss_attack(
 
     if remaining > 0:
         # Next monster on the same (non-checkpoint) floor.
-        nxt = await absvc.build_normal_monster(
-            session, cfg, floor, modifier, rng, player_id=player_id
-        )
+        nxt = await absvc.next_floor_monster(session, cfg, progress, floor, modifier, rng)
         progress.current_monster = nxt
         result["next_monster"] = await absvc.serialize_monster(session, nxt)
         result["waifu_hp_remaining"] = int(waifu.current_hp or 0)
@@ -756,18 +755,13 @@ async def _award_monster(
     if grace and grace.effect_type == "EXP_BOOST":
         exp = round(exp * float(grace.effect_value or 1.0))
 
+    from waifu_bot.services import wallet as wallet_svc
+
+    # Gold and kill materials are credited together in one wallet transaction.
+    tx = wallet_svc.WalletTx()
     player = await session.get(Player, player_id)
     if player is not None and int(gold) > 0:
-        from waifu_bot.services import wallet as wallet_svc
-
-        await wallet_svc.add_gold(
-            session,
-            player,
-            int(gold),
-            source="abyss_kill",
-            ref_type="abyss_floor",
-            ref_id=int(floor),
-        )
+        tx.credit(player_id, "gold", int(gold), source="abyss_kill", ref_type="abyss_floor", ref_id=int(floor))
     waifu.experience = int(waifu.experience or 0) + int(exp)
 
     # Item drop (skipped for checkpoint boss — handled separately, and skipped
@@ -780,7 +774,9 @@ async def _award_monster(
         if rng.random() < drop_chance:
             item = await _generate_drop(session, player_id, floor, rarity=None)
 
-    mats = await _roll_abyss_kill_mats(session, player_id, floor, cfg, rng, progress)
+    mats = await _roll_abyss_kill_mats(session, player_id, floor, cfg, rng, progress, tx)
+    if tx:
+        await wallet_svc.apply_tx(session, tx)
     return {"gold": int(gold), "exp": int(exp), "item": item, **mats}
 
 
@@ -793,29 +789,27 @@ async def _award_checkpoint(
     progress,
     rng: random.Random,
 ) -> dict:
+    from waifu_bot.services import wallet as wallet_svc
+
     under_limit = absvc.under_daily_limit(cfg, progress)
     shards = 0
     item = None
     if under_limit:
         shards = ar.calc_checkpoint_shards(cfg, floor)
-        from waifu_bot.services import wallet as wallet_svc
-
+        tx = wallet_svc.WalletTx()
         if shards > 0:
-            await wallet_svc.add(
-                session,
-                int(player_id),
-                "abyss_shards",
-                int(shards),
-                source="abyss_checkpoint",
-                ref_type="abyss_floor",
-                ref_id=int(floor),
+            tx.credit(
+                player_id, "abyss_shards", int(shards),
+                source="abyss_checkpoint", ref_type="abyss_floor", ref_id=int(floor),
             )
         progress.checkpoints_today = int(progress.checkpoints_today or 0) + 1
         progress.last_checkpoint_date = absvc.msk_today()
         if cfg_int(cfg, "abyss_checkpoint_item_guaranteed", 1) == 1:
             rarity = rng.choices([2, 3, 4, 5], weights=[30, 40, 20, 10])[0]
             item = await _generate_drop(session, player_id, floor, rarity=rarity)
-        mats = await _roll_abyss_checkpoint_mats(session, player_id, floor, cfg, progress, rng)
+        mats = await _roll_abyss_checkpoint_mats(session, player_id, floor, cfg, progress, rng, tx)
+        if tx:
+            await wallet_svc.apply_tx(session, tx)
     else:
         mats = {"essence": 0, "ember": 0, "pity": int(getattr(progress, "ember_pity_paid_checkpoints", 0) or 0)}
     return {
@@ -826,11 +820,11 @@ async def _award_checkpoint(
     }
 
 
-async def _roll_abyss_kill_mats(session, player_id, floor, cfg, rng, progress) -> dict:
+async def _roll_abyss_kill_mats(session, player_id, floor, cfg, rng, progress, tx) -> dict:
+    """Roll kill materials into ``tx`` (applied by the caller)."""
     from sqlalchemy.exc import IntegrityError
 
     from waifu_bot.db.models.endgame import AbyssKillMatRoll
-    from waifu_bot.services import wallet as wallet_svc
     from waifu_bot.services.game_config_service import cfg_float as _cf
 
     out = {"core": 0, "essence": 0}
@@ -845,30 +839,30 @@ async def _roll_abyss_kill_mats(session, player_id, floor, cfg, rng, progress) -
     except IntegrityError:
         return out
     if rng.random() < _cf(cfg, "refine.abyss_core_kill", 0.04):
-        await wallet_svc.add(
-            session, int(player_id), "refine_core", 1,
+        tx.credit(
+            player_id, "refine_core", 1,
             source="abyss_kill", ref_type="abyss_kill_mat", ref_id=int(roll.id),
         )
         out["core"] = 1
     ess_floor = int(float(cfg.get("refine.abyss_essence_kill_floor", "30") or 30))
     if int(floor) >= ess_floor and rng.random() < _cf(cfg, "refine.abyss_essence_kill", 0.02):
-        await wallet_svc.add(
-            session, int(player_id), "refine_essence", 1,
+        tx.credit(
+            player_id, "refine_essence", 1,
             source="abyss_kill", ref_type="abyss_kill_ess", ref_id=int(roll.id),
         )
         out["essence"] = 1
     return out
 
 
-async def _roll_abyss_checkpoint_mats(session, player_id, floor, cfg, progress, rng) -> dict:
-    from waifu_bot.services import wallet as wallet_svc
+async def _roll_abyss_checkpoint_mats(session, player_id, floor, cfg, progress, rng, tx) -> dict:
+    """Roll checkpoint materials into ``tx`` (applied by the caller)."""
     from waifu_bot.services.game_config_service import cfg_float as _cf, cfg_int as _ci
 
     out = {"essence": 0, "ember": 0, "pity": int(getattr(progress, "ember_pity_paid_checkpoints", 0) or 0)}
     ess_floor = _ci(cfg, "refine.abyss_essence_kill_floor", 30)
     if int(floor) >= ess_floor and rng.random() < _cf(cfg, "refine.abyss_essence_checkpoint", 0.08):
-        await wallet_svc.add(
-            session, int(player_id), "refine_essence", 1,
+        tx.credit(
+            player_id, "refine_essence", 1,
             source="abyss_checkpoint", ref_type="abyss_cp_ess", ref_id=int(floor),
         )
         out["essence"] = 1
@@ -880,8 +874,8 @@ async def _roll_abyss_checkpoint_mats(session, player_id, floor, cfg, progress,
         if int(progress.ember_pity_paid_checkpoints or 0) >= pity_n:
             grant = True
         if grant:
-            await wallet_svc.add(
-                session, int(player_id), "legendary_ember", 1,
+            tx.credit(
+                player_id, "legendary_ember", 1,
                 source="abyss_checkpoint", ref_type="abyss_cp_ember", ref_id=int(floor),
             )
             progress.ember_pity_paid_checkpoints = 0
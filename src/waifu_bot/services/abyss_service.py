@@ -9,9 +9,11 @@ floor-generation helpers exported here.
 """
 from __future__ import annotations
 
+import copy
 import logging
 import math
 import random
+from collections.abc import Sequence
 from datetime import date, datetime, timedelta, timezone
 
 try:  # stdlib on 3.9+
@@ -26,19 +28,25 @@ from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from waifu_bot.db.models import (
-    AbyssCheckpointBoss,
     AbyssGrace,
     AbyssProgress,
     AbyssWeeklyLeaderboard,
     DungeonProgress,
     DungeonRun,
     MainWaifu,
-    MonsterAffix,
     MonsterTemplate,
     Player,
     PlayerMonsterCodex,
 )
 from waifu_bot.services import abyss_rewards as ar
+from waifu_bot.services.abyss_catalog import (
+    AbyssCatalog,
+    AffixRow,
+    TemplateRow,
+    get_abyss_catalog,
+    max_affix_tier,
+    template_row,
+)
 from waifu_bot.services.game_config_service import (
     cfg_float,
     cfg_int,
@@ -47,10 +55,6 @@ from waifu_bot.services.game_config_service import (
 
 logger = logging.getLogger(__name__)
 
-# Behaviour flags introduced by the Abyss (ТЗ §10); only spawn on deep floors.
-ABYSS_EXCLUSIVE_FLAGS = frozenset({"GRACE_STEAL", "ABYSS_MIRROR", "ANTI_REGEN", "CHAOS_DMG"})
-
-
 # ---------------------------------------------------------------------------
 # Time helpers (MSK / UTC+3)
 # ---------------------------------------------------------------------------
@@ -209,35 +213,18 @@ def _act_for_floor(floor: int) -> int:
     return max(1, min(5, math.ceil(floor / 20)))
 
 
-async def _pick_template_for_biome(
-    session: AsyncSession, tags: list[str], rng: random.Random
-) -> MonsterTemplate | None:
+def _pick_template_for_biome(
+    catalog: AbyssCatalog, tags: list[str], rng: random.Random
+) -> TemplateRow | None:
     """Pick a weighted random monster template whose tags overlap the biome."""
-    res = await session.execute(select(MonsterTemplate))
-    templates: list[MonsterTemplate] = list(res.scalars().all())
-    if not templates:
+    pool, weights = catalog.biome_pool(tags)
+    if not pool:
         return None
-    tagset = {t.lower() for t in tags}
-
-    def tmpl_tags(t: MonsterTemplate) -> set[str]:
-        raw = t.tags or []
-        if isinstance(raw, dict):
-            raw = list(raw.keys())
-        out: set[str] = set()
-        for x in raw or []:
-            out.add(str(x).lower())
-        if t.family:
-            out.add(str(t.family).lower())
-        return out
-
-    matched = [t for t in templates if tmpl_tags(t) & tagset]
-    pool = matched or templates
-    weights = [max(1, int(getattr(t, "weight", 100) or 100)) for t in pool]
     return rng.choices(pool, weights=weights)[0]
 
 
-async def _roll_elite(
-    session: AsyncSession,
+def _roll_elite(
+    catalog: AbyssCatalog,
     cfg: dict[str, str],
     monster: dict,
     floor: int,
@@ -252,30 +239,8 @@ async def _roll_elite(
     if rng.random() >= chance:
         return
 
-    res = await session.execute(select(MonsterAffix))
-    all_affixes: list[MonsterAffix] = list(res.scalars().all())
-    family = (monster.get("family") or "").lower()
-
-    tier2_floor = cfg_int(cfg, "abyss_affix_tier2_floor", 21)
-    tier3_floor = cfg_int(cfg, "abyss_affix_tier3_floor", 51)
-    max_tier = 1
-    if floor >= tier2_floor:
-        max_tier = 2
-    if floor >= tier3_floor:
-        max_tier = 3
-
-    eligible: list[MonsterAffix] = []
-    for a in all_affixes:
-        if a.allowed_families and family not in [str(x).lower() for x in a.allowed_families]:
-            continue
-        if a.forbidden_families and family in [str(x).lower() for x in a.forbidden_families]:
-            continue
-        if a.tier is not None and int(a.tier) > max_tier:
-            continue
-        # Эксклюзивные Бездна-аффиксы (§10) появляются только с глубоких этажей.
-        if a.behavior_flag in ABYSS_EXCLUSIVE_FLAGS and floor < tier3_floor:
-            continue
-        eligible.append(a)
+    # Эксклюзивные Бездна-аффиксы (§10) появляются только с глубоких этажей (tier 3).
+    eligible = catalog.eligible_affixes(monster.get("family"), max_affix_tier(cfg, floor))
     if not eligible:
         return
 
@@ -331,10 +296,10 @@ async def _roll_elite(
         monster["affix_behaviors"] = behaviors
 
 
-def _pick_affixes(eligible: list[MonsterAffix], n: int, rng: random.Random) -> list[MonsterAffix]:
+def _pick_affixes(eligible: Sequence[AffixRow], n: int, rng: random.Random) -> list[AffixRow]:
     pool = list(eligible)
     rng.shuffle(pool)
-    chosen: list[MonsterAffix] = []
+    chosen: list[AffixRow] = []
     groups: set[str] = set()
     behavioral_suffix = 0
     chosen_ids: set[int] = set()
@@ -356,10 +321,8 @@ def _pick_affixes(eligible: list[MonsterAffix], n: int, rng: random.Random) -> l
     return chosen
 
 
-async def _pick_echo_identity(
-    session: AsyncSession, player_id: int, rng: random.Random
-) -> MonsterTemplate | None:
-    """Pick a campaign monster the player has actually slain, for an ECHO floor.
+async def _echo_candidates(session: AsyncSession, player_id: int) -> list[TemplateRow]:
+    """Campaign monsters the player has actually slain, for ECHO floors.
 
     Visual-only: the echo keeps normal Abyss-scaled stats but wears the identity
     (name/slug/emoji) of a foe from the player's codex, preferring higher tiers.
@@ -371,22 +334,19 @@ async def _pick_echo_identity(
         .order_by(MonsterTemplate.tier.desc(), PlayerMonsterCodex.kills.desc())
         .limit(12)
     )
-    cands = list(res.scalars().all())
-    return rng.choice(cands) if cands else None
+    return [template_row(t) for t in res.scalars().all()]
 
 
-async def build_normal_monster(
-    session: AsyncSession,
+def _roll_normal_monster(
+    catalog: AbyssCatalog,
     cfg: dict[str, str],
     floor: int,
     modifier: str | None,
-    rng: random.Random | None = None,
-    *,
-    player_id: int | None = None,
+    rng: random.Random,
+    echo_pool: Sequence[TemplateRow] = (),
 ) -> dict:
-    rng = rng or random
     tags = ar.get_abyss_biome_tags(floor)
-    tmpl = await _pick_template_for_biome(session, tags, rng)
+    tmpl = _pick_template_for_biome(catalog, tags, rng)
 
     hp_base = cfg_int(cfg, "abyss_monster_hp_base", 200)
     dmg_base = cfg_int(cfg, "abyss_monster_dmg_base", 30)
@@ -403,13 +363,10 @@ async def build_normal_monster(
         dmg = max(1, round(dmg * cfg_float(cfg, "abyss_modifier_rage_dmg", 2.0)))
 
     name = tmpl.name if tmpl else "Тварь Бездны"
-    echo_id = None
     if modifier == "ECHO":
-        if player_id is not None:
-            echo_id = await _pick_echo_identity(session, player_id, rng)
-        if echo_id is not None:
-            tmpl = echo_id  # adopt the slain foe's visual identity
-            name = f"Эхо: {echo_id.name}"
+        if echo_pool:
+            tmpl = rng.choice(echo_pool)  # adopt the slain foe's visual identity
+            name = f"Эхо: {tmpl.name}"
         else:
             name = f"Эхо: {name}"
 
@@ -418,8 +375,8 @@ async def build_normal_monster(
         "family": (tmpl.family if tmpl else None),
         "slug": (tmpl.slug if tmpl else None),
         "emoji": (tmpl.emoji if tmpl else None),
-        "tier": int(getattr(tmpl, "tier", 1) or 1) if tmpl else 1,
-        "template_id": int(tmpl.id) if tmpl else None,
+        "tier": tmpl.tier if tmpl else 1,
+        "template_id": tmpl.id if tmpl else None,
         "level": _monster_level_for_floor(floor),
         "is_boss": False,
         "is_elite": False,
@@ -435,25 +392,33 @@ async def build_normal_monster(
         "mechanic_params": {},
         "mechanic_state": {},
     }
-    await _roll_elite(session, cfg, monster, floor, rng)
+    _roll_elite(catalog, cfg, monster, floor, rng)
     return monster
 
 
-async def build_boss_monster(
-    session: AsyncSession, cfg: dict[str, str], floor: int
+async def build_normal_monster(
+    session: AsyncSession,
+    cfg: dict[str, str],
+    floor: int,
+    modifier: str | None,
+    rng: random.Random | None = None,
+    *,
+    player_id: int | None = None,
 ) -> dict:
-    boss = await session.scalar(
-        select(AbyssCheckpointBoss).where(AbyssCheckpointBoss.floor_number == floor)
-    )
-    if boss is None:
-        # Deepest defined boss as a template for floors beyond the seeded range.
-        boss = await session.scalar(
-            select(AbyssCheckpointBoss).order_by(AbyssCheckpointBoss.floor_number.desc()).limit(1)
-        )
+    catalog = await get_abyss_catalog(session, cfg)
+    echo_pool: list[TemplateRow] = []
+    if modifier == "ECHO" and player_id is not None:
+        echo_pool = await _echo_candidates(session, player_id)
+    return _roll_normal_monster(catalog, cfg, floor, modifier, rng or random, echo_pool)
 
+
+def _roll_boss_monster(
+    catalog: AbyssCatalog, cfg: dict[str, str], floor: int, rng: random.Random
+) -> dict:
+    boss = catalog.boss_for_floor(floor)
     if boss is None:
         # Absolute fallback: a beefed-up normal monster.
-        m = await build_normal_monster(session, cfg, floor, None)
+        m = _roll_normal_monster(catalog, cfg, floor, None, rng)
         m["name"] = f"Страж этажа {floor}"
         m["is_boss"] = True
         m["max_hp"] = m["current_hp"] = max(1, m["max_hp"] * 5)
@@ -465,8 +430,6 @@ async def build_boss_monster(
     exp = ar.calc_abyss_monster_exp(cfg, boss.base_exp, floor)
     exp = round(exp * cfg_float(cfg, "abyss_checkpoint_exp_mult", 3.0))
 
-    mechanic_params = _normalize_boss_mechanics(dict(boss.mechanic_params or {}))
-
     gold_base = cfg_int(cfg, "abyss_gold_base", 20)
     g_min, g_max = ar.calc_abyss_gold(cfg, gold_base, floor)
     boss_mult = cfg_float(cfg, "abyss_gold_boss_mult", 3.0)
@@ -492,38 +455,17 @@ async def build_boss_monster(
         "gold_max": g_max,
         "applied_affix_ids": [],
         "special_mechanic": boss.special_mechanic,
-        "mechanic_params": mechanic_params,
+        "mechanic_params": copy.deepcopy(boss.mechanic_params),
         "mechanic_state": {},
         "warning_text": boss.warning_text,
         "description": boss.description,
     }
 
 
-def _normalize_boss_mechanics(params: dict) -> dict:
-    """Expand high-level COMBINED flags into concrete, runtime-handled params.
-
-    The combat engine reads individual keys (reflect_chance / revive_hp_pct /
-    copies / stone_skin_max / phase_2_at). The deepest bosses are seeded with
-    umbrella flags (``all_mechanics``, ``modifier_every_n``) — fill in working
-    defaults so their mechanics actually fire.
-    """
-    if params.get("all_mechanics"):
-        params.setdefault("reflect_chance", 0.20)
-        params.setdefault("reflect_pct", 0.25)
-        params.setdefault("revive_hp_pct", 0.5)
-        params.setdefault("copies", 2)
-        params.setdefault("copy_hp_pct", 0.4)
-        params.setdefault("copy_dmg_pct", 0.4)
-        params.setdefault("phase_2_at", 0.5)
-        params.setdefault("rage_dmg_mult", 1.4)
-    if params.get("modifier_every_n"):
-        # Cycling between affixes per N messages is future polish; ensure the
-        # boss at least reflects and enrages so the fight is non-trivial.
-        params.setdefault("reflect_chance", 0.25)
-        params.setdefault("reflect_pct", 0.25)
-        params.setdefault("phase_2_at", 0.5)
-        params.setdefault("rage_dmg_mult", 1.5)
-    return params
+async def build_boss_monster(
+    session: AsyncSession, cfg: dict[str, str], floor: int
+) -> dict:
+    return _roll_boss_monster(await get_abyss_catalog(session, cfg), cfg, floor, random)
 
 
 def expire_grace_if_needed(progress: AbyssProgress, floor: int) -> None:
@@ -534,6 +476,107 @@ def expire_grace_if_needed(progress: AbyssProgress, floor: int) -> None:
         progress.grace_expires_at_floor = None
 
 
+# ---------------------------------------------------------------------------
+# Floor pre-generation
+# ---------------------------------------------------------------------------
+
+# ``progress.floor_plan`` holds the next few floors rolled in one go:
+#   {"nonce": session_nonce, "version": catalog version,
+#    "floors": [{"floor": N, "modifier": str | None, "monsters": [monster, ...]}, ...]}
+# The head entry is the current floor; its ``monsters`` are the ones not fought yet.
+# A plan from another session (nonce) or another catalog version is discarded.
+
+
+async def _plan_floors(
+    session: AsyncSession,
+    catalog: AbyssCatalog,
+    cfg: dict[str, str],
+    progress: AbyssProgress,
+    start: int,
+    count: int,
+    rng: random.Random,
+) -> list[dict]:
+    """Roll modifiers and monsters for floors ``start .. start + count - 1``."""
+    floors: list[dict] = []
+    last_mod = int(progress.last_modifier_floor or 0)
+    for floor in range(start, start + count):
+        modifier: str | None = None
+        if not ar.is_checkpoint(floor) and ar.should_assign_modifier(cfg, floor, last_mod, rng):
+            modifier = ar.pick_modifier(cfg, rng)
+            if modifier:
+                last_mod = floor
+        floors.append({"floor": floor, "modifier": modifier, "monsters": []})
+
+    echo_pool: list[TemplateRow] = []
+    if progress.player_id is not None and any(f["modifier"] == "ECHO" for f in floors):
+        echo_pool = await _echo_candidates(session, int(progress.player_id))
+
+    per_floor = max(1, cfg_int(cfg, "abyss_monsters_per_floor", 3))
+    for f in floors:
+        if ar.is_checkpoint(f["floor"]):
+            f["monsters"] = [_roll_boss_monster(catalog, cfg, f["floor"], rng)]
+        else:
+            f["monsters"] = [
+                _roll_normal_monster(catalog, cfg, f["floor"], f["modifier"], rng, echo_pool)
+                for _ in range(per_floor)
+            ]
+    return floors
+
+
+def _plan_is_current(plan: dict | None, progress: AbyssProgress, catalog: AbyssCatalog) -> bool:
+    return (
+        isinstance(plan, dict)
+        and plan.get("nonce") == int(progress.session_nonce or 0)
+        and plan.get("version") == catalog.version
+    )
+
+
+async def _take_planned_floor(
+    session: AsyncSession,
+    cfg: dict[str, str],
+    progress: AbyssProgress,
+    floor: int,
+    rng: random.Random,
+) -> dict:
+    """Plan entry for ``floor``; rolls the next ``abyss_pregen_floors`` floors when it is missing."""
+    catalog = await get_abyss_catalog(session, cfg)
+    plan = progress.floor_plan
+    floors: list[dict] = []
+    if _plan_is_current(plan, progress, catalog):
+        floors = [f for f in plan.get("floors") or [] if int(f.get("floor") or 0) >= floor]
+    if not floors or int(floors[0]["floor"]) != floor:
+        ahead = cfg_int(cfg, "abyss_pregen_floors", 5)
+        floors = await _plan_floors(session, catalog, cfg, progress, floor, max(1, ahead), rng)
+        if ahead <= 0:
+            progress.floor_plan = None
+            return floors[0]
+    # JSONB column without mutation tracking: always assign a fresh dict.
+    progress.floor_plan = {"nonce": int(progress.session_nonce or 0), "version": catalog.version, "floors": floors}
+    return floors[0]
+
+
+async def next_floor_monster(
+    session: AsyncSession,
+    cfg: dict[str, str],
+    progress: AbyssProgress,
+    floor: int,
+    modifier: str | None,
+    rng: random.Random | None = None,
+) -> dict:
+    """Next monster on the current floor: pre-rolled when the plan has one left, else rolled now."""
+    plan = progress.floor_plan
+    if isinstance(plan, dict) and plan.get("floors"):
+        head = plan["floors"][0]
+        if int(head.get("floor") or 0) == floor and head.get("monsters"):
+            monster = head["monsters"][0]
+            floors = [{**head, "monsters": head["monsters"][1:]}, *plan["floors"][1:]]
+            progress.floor_plan = {**plan, "floors": floors}
+            return monster
+    if ar.is_checkpoint(floor):
+        return await build_boss_monster(session, cfg, floor)
+    return await build_normal_monster(session, cfg, floor, modifier, rng, player_id=progress.player_id)
+
+
 async def generate_floor(
     session: AsyncSession,
     cfg: dict[str, str],
@@ -541,7 +584,10 @@ async def generate_floor(
     floor: int,
     rng: random.Random | None = None,
 ) -> None:
-    """Set up the given floor: monster(s), modifier, max-floor / leaderboard."""
+    """Set up the given floor: monster(s), modifier, max-floor / leaderboard.
+
+    Modifier and monsters come from ``progress.floor_plan`` (see above).
+    """
     rng = rng or random
     progress.current_floor = floor
     if floor > int(progress.max_floor_reached or 0):
@@ -561,24 +607,17 @@ async def generate_floor(
 
     expire_grace_if_needed(progress, floor)
 
-    if ar.is_checkpoint(floor):
-        progress.current_floor_modifier = None
-        progress.modifier_params = None
-        progress.floor_monsters_remaining = 1
-        progress.current_monster = await build_boss_monster(session, cfg, floor)
-        return
-
-    modifier: str | None = None
-    if ar.should_assign_modifier(cfg, floor, int(progress.last_modifier_floor or 0), rng):
-        modifier = ar.pick_modifier(cfg, rng)
-        if modifier:
-            progress.last_modifier_floor = floor
+    entry = await _take_planned_floor(session, cfg, progress, floor, rng)
+    modifier = entry["modifier"]
+    if modifier:
+        progress.last_modifier_floor = floor
     progress.current_floor_modifier = modifier
     progress.modifier_params = None
-    progress.floor_monsters_remaining = cfg_int(cfg, "abyss_monsters_per_floor", 3)
-    progress.current_monster = await build_normal_monster(
-        session, cfg, floor, modifier, rng, player_id=progress.player_id
-    )
+    if ar.is_checkpoint(floor):
+        progress.floor_monsters_remaining = 1
+    else:
+        progress.floor_monsters_remaining = cfg_int(cfg, "abyss_monsters_per_floor", 3)
+    progress.current_monster = await next_floor_monster(session, cfg, progress, floor, modifier, rng)
 
 
 async def _update_weekly_leaderboard(
@@ -613,6 +652,7 @@ def _reset_block_on_exit(progress: AbyssProgress) -> dict:
     progress.modifier_params = None
     progress.pending_grace_choices = None
     progress.revive_scrolls_used_this_block = 0
+    progress.floor_plan = None
     return {"floors_lost": floors_lost, "checkpoint_restored_to": int(progress.current_checkpoint or 0)}
 
 
@@ -651,8 +691,13 @@ async def get_active_grace(session: AsyncSession, progress: AbyssProgress) -> Ab
 async def _affix_chips(session: AsyncSession, affix_ids: list[int] | None) -> list[dict]:
     if not affix_ids:
         return []
-    res = await session.execute(select(MonsterAffix).where(MonsterAffix.id.in_(affix_ids)))
-    return [{"id": a.id, "name": a.name, "type": a.type} for a in res.scalars().all()]
+    catalog = await get_abyss_catalog(session)
+    chips = []
+    for aid in affix_ids:
+        a = catalog.affix(aid)
+        if a is not None:
+            chips.append({"id": a.id, "name": a.name, "type": a.type})
+    return chips
 
 
 async def serialize_monster(session: AsyncSession, monster: dict | None) -> dict | None:
@@ -0,0 +1,312 @@
+"""Per-player / per-chat activity mode registry (routing for group chat messages).
+
+Every group message used to probe each game mode in turn — solo run, Abyss session,
+active GD cycle, guild raid — with its own SELECT, although most chatters are in none
+of them. This module keeps one Redis hash per player and one per chat:
+
+* ``activity:player:{id}`` — ``solo`` (active telegram DungeonRun / legacy progress),
+  ``abyss`` (AbyssProgress.session_active);
+* ``activity:chat:{chat_id}`` — ``gd`` (active GDCycle), ``raid`` (guild raid_active_id set).
+
+A present field means "mode active"; its value is always ``"1"``.
+
+The router reads both with one pipelined ``HMGET`` and skips every mode that is absent.
+
+The hashes are maintained by the services that start and stop each mode through ORM
+flush/commit hooks (same pattern as player_revisions.py): starting a mode ``HSET``s its
+field on commit; stopping one drops the ``_k`` ("known") marker so the next message
+rebuilds the hash from the database (a player may briefly own duplicate runs, so a stop
+cannot simply delete the field). Each hook write bumps ``_v``; a rebuild is applied by
+``ACTIVITY_MODES_FILL`` only if ``_v`` did not move since it was read, so a slow rebuild
+never overwrites a newer start/stop.
+
+A hash without ``_k`` (cold, evicted, invalidated) is a miss → DB lookup → rebuild.
+Redis unavailable → ``resolve_routes`` returns None and callers probe every mode as before.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from waifu_bot.db import models as m
+from waifu_bot.services.redis_scripts import ACTIVITY_MODES_FILL, run_script
+
+logger = logging.getLogger(__name__)
+
+PLAYER_KEY_PREFIX = "activity:player:"
+CHAT_KEY_PREFIX = "activity:chat:"
+TTL_SEC = 1800
+
+SOLO = "solo"
+ABYSS = "abyss"
+GD = "gd"
+RAID = "raid"
+PLAYER_FIELDS = (SOLO, ABYSS)
+CHAT_FIELDS = (GD, RAID)
+
+_KNOWN = "_k"
+_VERSION = "_v"
+_PENDING_KEY = "activity_mode_changes"
+# Sentinel op: the mode set of this key is no longer known → rebuild on next read.
+_RESET = None
+
+
+def player_key(player_id: int) -> str:
+    return f"{PLAYER_KEY_PREFIX}{int(player_id)}"
+
+
+def chat_key(chat_id: int) -> str:
+    return f"{CHAT_KEY_PREFIX}{int(chat_id)}"
+
+
+@dataclass(frozen=True)
+class ActivityRoutes:
+    """Which group-message handlers have anything to do for this (player, chat)."""
+
+    solo: bool
+    abyss: bool
+    gd: bool
+    raid: bool
+
+
+# ---------------------------------------------------------------------------
+# Read path
+# ---------------------------------------------------------------------------
+
+
+def _parse(values: list[Any], fields: tuple[str, ...]) -> tuple[dict[str, str] | None, str]:
+    """HMGET reply (``_k``, ``_v``, *fields) → ({field: value} or None when unknown, version)."""
+    known, version, *rest = values
+    version = str(version or "")
+    if not known:
+        return None, version
+    return {f: str(v) for f, v in zip(fields, rest) if v is not None}, version
+
+
+async def read_modes(
+    redis: Any, player_id: int, chat_id: int | None
+) -> tuple[tuple[dict[str, str] | None, str], tuple[dict[str, str] | None, str]] | None:
+    """One round trip: player and chat hashes. None on Redis error."""
+    if redis is None:
+        return None
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.hmget(player_key(player_id), _KNOWN, _VERSION, *PLAYER_FIELDS)
+        if chat_id is not None:
+            pipe.hmget(chat_key(chat_id), _KNOWN, _VERSION, *CHAT_FIELDS)
+        replies = await pipe.execute()
+    except RedisError:
+        logger.debug("activity modes read failed pid=%s chat=%s", player_id, chat_id, exc_info=True)
+        return None
+    player = _parse(replies[0], PLAYER_FIELDS)
+    chat = _parse(replies[1], CHAT_FIELDS) if chat_id is not None else ({}, "")
+    return player, chat
+
+
+async def _refresh(redis: Any, key: str, version: str, modes: dict[str, str]) -> None:
+    args: list[Any] = [version, TTL_SEC]
+    for field, value in modes.items():
+        args.extend((field, value))
+    try:
+        await run_script(redis, ACTIVITY_MODES_FILL, [key], args)
+    except RedisError:
+        logger.debug("activity modes refresh failed key=%s", key, exc_info=True)
+
+
+async def load_player_modes(session: AsyncSession, player_id: int) -> dict[str, str]:
+    """Authoritative player modes from the database."""
+    modes: dict[str, str] = {}
+    run_id = await session.scalar(
+        select(m.DungeonRun.id)
+        .where(
+            m.DungeonRun.player_id == player_id,
+            m.DungeonRun.status == "active",
+            m.DungeonRun.economy == "telegram",
+        )
+        .limit(1)
+    )
+    if run_id is not None:
+        modes[SOLO] = "1"
+    else:
+        legacy = await session.scalar(
+            select(m.DungeonProgress.id)
+            .where(m.DungeonProgress.player_id == player_id, m.DungeonProgress.is_active.is_(True))
+            .limit(1)
+        )
+        if legacy is not None:
+            modes[SOLO] = "1"
+    abyss = await session.scalar(
+        select(m.AbyssProgress.id)
+        .where(m.AbyssProgress.player_id == player_id, m.AbyssProgress.session_active.is_(True))
+        .limit(1)
+    )
+    if abyss is not None:
+        modes[ABYSS] = "1"
+    return modes
+
+
+async def load_chat_modes(session: AsyncSession, chat_id: int) -> dict[str, str]:
+    """Authoritative chat modes from the database."""
+    modes: dict[str, str] = {}
+    cycle_id = await session.scalar(
+        select(m.GDCycle.id).where(m.GDCycle.chat_id == chat_id, m.GDCycle.status == "active").limit(1)
+    )
+    if cycle_id is not None:
+        modes[GD] = "1"
+    raid_id = await session.scalar(
+        select(m.Guild.raid_active_id)
+        .where(m.Guild.telegram_chat_id == chat_id, m.Guild.raid_active_id.isnot(None))
+        .limit(1)
+    )
+    if raid_id is not None:
+        modes[RAID] = "1"
+    return modes
+
+
+async def resolve_routes(redis: Any, player_id: int, chat_id: int | None) -> ActivityRoutes | None:
+    """Modes for one group message; rebuilds missing hashes from the DB. None = Redis down."""
+    got = await read_modes(redis, player_id, chat_id)
+    if got is None:
+        return None
+    (player, player_ver), (chat, chat_ver) = got
+    if player is None or chat is None:
+        from waifu_bot.db.session import get_session
+
+        async for session in get_session():
+            if player is None:
+                player = await load_player_modes(session, player_id)
+                await _refresh(redis, player_key(player_id), player_ver, player)
+            if chat is None:
+                chat = await load_chat_modes(session, int(chat_id))
+                await _refresh(redis, chat_key(chat_id), chat_ver, chat)
+            break
+    player = player or {}
+    chat = chat or {}
+    return ActivityRoutes(solo=SOLO in player, abyss=ABYSS in player, gd=GD in chat, raid=RAID in chat)
+
+
+# ---------------------------------------------------------------------------
+# Write path: ORM hooks on mode start/stop
+# ---------------------------------------------------------------------------
+
+
+def _changed(obj: Any, *attrs: str) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[a].history.has_changes() for a in attrs)
+
+
+def _changes(obj: Any, is_new: bool, is_deleted: bool) -> list[tuple[str, tuple[str, str] | None]]:
+    """(key, (field, value) to set | _RESET) for one flushed row."""
+    if isinstance(obj, m.DungeonRun):
+        if obj.player_id is None or (obj.economy or "telegram") != "telegram":
+            return []
+        if not (is_new or is_deleted or _changed(obj, "status")):
+            return []
+        if obj.status == "active" and not is_deleted:
+            return [(player_key(obj.player_id), (SOLO, "1"))]
+        return [] if is_new else [(player_key(obj.player_id), _RESET)]
+    if isinstance(obj, m.DungeonProgress):
+        if obj.player_id is None or not (is_new or is_deleted or _changed(obj, "is_active")):
+            return []
+        if obj.is_active and not is_deleted:
+            return [(player_key(obj.player_id), (SOLO, "1"))]
+        return [] if is_new else [(player_key(obj.player_id), _RESET)]
+    if isinstance(obj, m.AbyssProgress):
+        if obj.player_id is None or not (is_new or is_deleted or _changed(obj, "session_active")):
+            return []
+        if obj.session_active and not is_deleted:
+            return [(player_key(obj.player_id), (ABYSS, "1"))]
+        return [] if is_new else [(player_key(obj.player_id), _RESET)]
+    if isinstance(obj, m.GDCycle):
+        if obj.chat_id is None or not (is_new or is_deleted or _changed(obj, "status", "chat_id")):
+            return []
+        if obj.status == "active" and not is_deleted:
+            return [(chat_key(obj.chat_id), (GD, "1"))]
+        return [] if is_new else [(chat_key(obj.chat_id), _RESET)]
+    if isinstance(obj, m.Guild):
+        if not (is_new or is_deleted or _changed(obj, "raid_active_id", "telegram_chat_id")):
+            return []
+        out: list[tuple[str, tuple[str, str] | None]] = []
+        if not is_new:
+            # Previous chat binding (if the guild moved chats) loses its raid.
+            for old in inspect(obj).attrs["telegram_chat_id"].history.deleted or ():
+                if old is not None:
+                    out.append((chat_key(old), _RESET))
+        if obj.telegram_chat_id is None:
+            return out
+        if obj.raid_active_id is not None and not is_deleted:
+            out.append((chat_key(obj.telegram_chat_id), (RAID, "1")))
+        elif not is_new:
+            out.append((chat_key(obj.telegram_chat_id), _RESET))
+        return out
+    return []
+
+
+def _collect(session: Session, flush_context: Any, instances: Any) -> None:
+    pending = None
+    new, deleted = session.new, session.deleted
+    for obj in (*new, *session.dirty, *deleted):
+        changes = _changes(obj, obj in new, obj in deleted)
+        if not changes:
+            continue
+        pending = pending if pending is not None else session.info.setdefault(_PENDING_KEY, {})
+        for key, op in changes:
+            pending.setdefault(key, []).append(op)
+
+
+async def apply_changes(redis: Any, pending: dict[str, list[tuple[str, str] | None]]) -> None:
+    """Push committed mode starts/stops: one pipeline for all touched hashes."""
+    if redis is None or not pending:
+        return
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for key, ops in pending.items():
+            pipe.hincrby(key, _VERSION, 1)
+            for op in ops:
+                if op is _RESET:
+                    pipe.hdel(key, _KNOWN)
+                else:
+                    pipe.hset(key, op[0], op[1])
+            pipe.expire(key, TTL_SEC)
+        await pipe.execute()
+    except RedisError:
+        logger.warning("activity modes push failed keys=%s", len(pending), exc_info=True)
+
+
+def _after_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    from waifu_bot.core import redis as redis_core
+
+    coro = apply_changes(redis_core.get_redis(), pending)
+    try:
+        await_only(coro)
+    except Exception:
+        coro.close()
+        logger.debug("activity modes push skipped (no async context)", exc_info=True)
+
+
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+_installed = False
+
+
+def install_session_hooks() -> None:
+    """Register flush/commit listeners on all ORM sessions (idempotent)."""
+    global _installed  # noqa: PLW0603
+    if _installed:
+        return
+    event.listen(Session, "before_flush", _collect)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+    _installed = True
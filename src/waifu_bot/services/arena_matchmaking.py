@@ -0,0 +1,284 @@
+"""Arena matchmaking index: Redis sorted set by rating, recent-opponent exclusion, DEF snapshots.
+
+``arena:mm:rating`` holds every known ``tavern_states.arena_rating`` (member = player id).
+A flush hook records rating changes and pushes them with ``ZADD`` on commit, so the set
+follows the database without a full-table ``ORDER BY abs(rating - my_r)`` per screen open.
+Opponents are picked from a rating window around the caller (±50, widened step by step up
+to ±1600) with two bounded ``ZRANGEBYSCORE`` calls per step — O(log n + pool). Players the
+caller fought recently (``arena:mm:recent:{id}``, last ``RECENT_SIZE``) are skipped while
+alternatives exist.
+
+Defender lineups are cached as fighter snapshots (``arena:mm:def:{id}``) tagged with the
+defender's ``roster`` revision (player_revisions.py): any change to their mercs bumps the
+revision and the next attack rebuilds the snapshot from one batched query.
+
+Redis is an accelerator only: when it is down or the set is empty, callers fall back to
+the indexed SQL range queries in ``merc_systems``.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import random
+from typing import Any, Iterable
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from waifu_bot.db import models as m
+
+logger = logging.getLogger(__name__)
+
+RATING_KEY = "arena:mm:rating"
+DEFENSE_KEY_PREFIX = "arena:mm:def:"
+RECENT_KEY_PREFIX = "arena:mm:recent:"
+
+# Half-widths of the rating window, tried in order until enough opponents are found.
+WINDOWS = (50, 100, 200, 400, 800, 1600)
+# Candidates fetched on each side of the caller per window step.
+POOL_PER_SIDE = 12
+RECENT_SIZE = 5
+RECENT_TTL_SEC = 86400
+DEFENSE_TTL_SEC = 6 * 3600
+
+_PENDING_KEY = "arena_rating_changes"
+
+
+def _defense_key(player_id: int) -> str:
+    return f"{DEFENSE_KEY_PREFIX}{int(player_id)}"
+
+
+def _recent_key(player_id: int) -> str:
+    return f"{RECENT_KEY_PREFIX}{int(player_id)}"
+
+
+# ---------------------------------------------------------------------------
+# Opponent selection
+# ---------------------------------------------------------------------------
+
+
+def pick_opponents(
+    candidates: Iterable[tuple[int, float]],
+    rating: int,
+    want: int,
+    *,
+    window: int,
+    exclude: set[int],
+    avoid: set[int] = frozenset(),
+    rng: random.Random | None = None,
+) -> list[tuple[int, int]]:
+    """Random ``want`` of ``(player_id, rating)`` within ±window, nearest first in the result.
+
+    ``exclude`` is never returned (self); ``avoid`` (recent opponents) only fills gaps.
+    """
+    rng = rng or random
+    seen: dict[int, int] = {}
+    for member, score in candidates:
+        pid = int(member)
+        if pid in exclude or abs(int(score) - rating) > window:
+            continue
+        seen[pid] = int(score)
+    fresh = [pid for pid in seen if pid not in avoid]
+    stale = [pid for pid in seen if pid in avoid]
+    rng.shuffle(fresh)
+    stale.sort(key=lambda pid: abs(seen[pid] - rating))
+    chosen = (fresh + stale)[:want]
+    chosen.sort(key=lambda pid: (abs(seen[pid] - rating), pid))
+    return [(pid, seen[pid]) for pid in chosen]
+
+
+async def nearby_opponents(
+    redis: Any,
+    player_id: int,
+    rating: int,
+    *,
+    want: int = 3,
+    rng: random.Random | None = None,
+) -> list[tuple[int, int]] | None:
+    """``[(player_id, rating)]`` near ``rating``; None when Redis is unavailable or the set is cold.
+
+    Also refreshes the caller's own entry, so active players stay indexed.
+    """
+    if redis is None:
+        return None
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.zadd(RATING_KEY, {str(int(player_id)): int(rating)})
+        pipe.lrange(_recent_key(player_id), 0, RECENT_SIZE - 1)
+        pipe.zcard(RATING_KEY)
+        _, recent_raw, size = await pipe.execute()
+        if int(size or 0) <= 1:
+            return None
+        avoid = {int(x) for x in recent_raw or []}
+        exclude = {int(player_id)}
+        cap = POOL_PER_SIDE + len(avoid) + 1
+        best: list[tuple[int, int]] = []
+        for window in WINDOWS:
+            pipe = redis.pipeline(transaction=False)
+            pipe.zrangebyscore(RATING_KEY, rating, rating + window, start=0, num=cap, withscores=True)
+            pipe.zrevrangebyscore(RATING_KEY, rating, rating - window, start=0, num=cap, withscores=True)
+            up, down = await pipe.execute()
+            best = pick_opponents(
+                [*up, *down], rating, want, window=window, exclude=exclude, avoid=avoid, rng=rng
+            )
+            if len(best) >= want and not any(pid in avoid for pid, _ in best):
+                break
+        return best
+    except Exception:
+        logger.warning("arena matchmaking lookup failed player_id=%s", player_id, exc_info=True)
+        return None
+
+
+async def record_opponent(redis: Any, player_id: int, opponent_id: int) -> None:
+    if redis is None:
+        return
+    try:
+        key = _recent_key(player_id)
+        pipe = redis.pipeline(transaction=False)
+        pipe.lrem(key, 0, str(int(opponent_id)))
+        pipe.lpush(key, str(int(opponent_id)))
+        pipe.ltrim(key, 0, RECENT_SIZE - 1)
+        pipe.expire(key, RECENT_TTL_SEC)
+        await pipe.execute()
+    except Exception:
+        logger.debug("arena recent opponent write failed player_id=%s", player_id, exc_info=True)
+
+
+async def index_ratings(redis: Any, ratings: dict[int, int | None]) -> None:
+    """ZADD changed ratings (ZREM for None); failures are logged, the fallback stays correct."""
+    if redis is None or not ratings:
+        return
+    try:
+        pipe = redis.pipeline(transaction=False)
+        add = {str(int(pid)): int(r) for pid, r in ratings.items() if r is not None}
+        drop = [str(int(pid)) for pid, r in ratings.items() if r is None]
+        if add:
+            pipe.zadd(RATING_KEY, add)
+        if drop:
+            pipe.zrem(RATING_KEY, *drop)
+        await pipe.execute()
+    except Exception:
+        logger.warning("arena rating index update failed players=%s", list(ratings)[:20], exc_info=True)
+
+
+# ---------------------------------------------------------------------------
+# Defender snapshots
+# ---------------------------------------------------------------------------
+
+
+def defense_revision(revisions: dict[str, Any] | None) -> str | None:
+    """Snapshot tag from ``player_revisions.read_revisions``; None disables caching."""
+    if not revisions or not revisions.get("epoch"):
+        return None
+    return f"{revisions['epoch']}:{int(revisions.get('roster') or 0)}"
+
+
+def fighters_to_snapshot(fighters: Iterable[Any]) -> list[dict[str, Any]]:
+    return [
+        {
+            "name": f.name,
+            "cr": int(f.cr),
+            "perk_ids": list(f.perk_ids),
+            "stance": f.stance,
+            "archetype_id": f.archetype_id,
+        }
+        for f in fighters
+    ]
+
+
+def fighters_from_snapshot(rows: Iterable[dict[str, Any]]) -> list[Any]:
+    from waifu_bot.game.merc_arena import ArenaFighter
+
+    return [
+        ArenaFighter(
+            str(r["name"]),
+            int(r["cr"]),
+            [str(p) for p in r.get("perk_ids") or []],
+            str(r["stance"]),
+            str(r["archetype_id"]),
+            side="defender",
+        )
+        for r in rows
+    ]
+
+
+async def load_defense_snapshot(redis: Any, player_id: int, revision: str | None) -> list[Any] | None:
+    if redis is None or revision is None:
+        return None
+    try:
+        raw = await redis.get(_defense_key(player_id))
+    except Exception:
+        logger.debug("arena defense snapshot read failed player_id=%s", player_id, exc_info=True)
+        return None
+    if not raw:
+        return None
+    try:
+        data = json.loads(raw)
+        if data.get("rev") != revision:
+            return None
+        return fighters_from_snapshot(data["fighters"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+async def store_defense_snapshot(redis: Any, player_id: int, revision: str | None, fighters: list[Any]) -> None:
+    if redis is None or revision is None or not fighters:
+        return
+    payload = json.dumps({"rev": revision, "fighters": fighters_to_snapshot(fighters)}, ensure_ascii=False)
+    try:
+        await redis.set(_defense_key(player_id), payload, ex=DEFENSE_TTL_SEC)
+    except Exception:
+        logger.debug("arena defense snapshot write failed player_id=%s", player_id, exc_info=True)
+
+
+# ---------------------------------------------------------------------------
+# Rating change hooks
+# ---------------------------------------------------------------------------
+
+
+def _collect(session: Session, flush_context: Any, instances: Any) -> None:
+    pending = None
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, m.TavernState) or obj.player_id is None:
+            continue
+        if obj in session.deleted:
+            rating = None
+        elif obj in session.new or inspect(obj).attrs["arena_rating"].history.has_changes():
+            rating = int(obj.arena_rating if obj.arena_rating is not None else 1000)
+        else:
+            continue
+        pending = pending if pending is not None else session.info.setdefault(_PENDING_KEY, {})
+        pending[int(obj.player_id)] = rating
+
+
+def _after_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    from waifu_bot.core import redis as redis_core
+
+    coro = index_ratings(redis_core.get_redis(), pending)
+    try:
+        await_only(coro)
+    except Exception:
+        coro.close()
+        logger.debug("arena rating index push skipped (no async context)", exc_info=True)
+
+
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+_installed = False
+
+
+def install_session_hooks() -> None:
+    """Register flush/commit listeners on all ORM sessions (idempotent)."""
+    global _installed  # noqa: PLW0603
+    if _installed:
+        return
+    event.listen(Session, "before_flush", _collect)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+    _installed = True
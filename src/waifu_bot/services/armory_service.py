@@ -20,11 +20,13 @@ from waifu_bot.db.models.armory import PlayerBan, PlayerEventLog
 from waifu_bot.db.models.guild_extended import GuildRaidStatus, GuildWarRowStatus
 from waifu_bot.services.armory_access import PUBLIC_EVENT_TYPES, armory_access_level
 from waifu_bot.services.hidden_skills import get_hidden_skill_bonuses
+from waifu_bot.services.history_partitions import read_since
 from waifu_bot.services.passive_skills import get_passive_skill_bonuses
 from waifu_bot.services.perfection import perfection_totals_dict, summarize_totals
 from waifu_bot.services.player_ban import is_player_banned
 from waifu_bot.services.inventory_payload import build_inventory_payloads
 from waifu_bot.services.paperdoll_quota import paperdoll_generations_remaining
+from waifu_bot.services.player_search import find_player_ids
 
 
 from waifu_bot.services.waifu_media_service import resolve_main_waifu_portrait_url
@@ -121,23 +123,14 @@ async def recompute_and_store_gear_score(session: AsyncSession, player_id: int)
 
 
 async def recompute_all_gear_scores(session: AsyncSession, *, batch_size: int = 200) -> dict[str, int]:
-    """Admin batch: recompute gear_score for all players with equipped items."""
-    updated = 0
-    offset = 0
-    while True:
-        rows = (
-            await session.execute(
-                select(m.Player.id).order_by(m.Player.id).offset(offset).limit(batch_size)
-            )
-        ).all()
-        if not rows:
-            break
-        for (pid,) in rows:
-            await recompute_and_store_gear_score(session, int(pid))
-            updated += 1
-        offset += batch_size
-        await session.flush()
-    return {"updated": updated}
+    """Recompute gear_score for every player inside the caller's transaction.
+
+    Large runs should use the ``gear_scores`` maintenance job (chunk commits, resumable).
+    """
+    from waifu_bot.services.maintenance_jobs import run_job_inline
+
+    result = await run_job_inline(session, "gear_scores", chunk_size=batch_size)
+    return {"updated": result.processed}
 
 
 def _gear_score_subquery():
@@ -368,7 +361,14 @@ async def build_inventory_list(session: AsyncSession, tg_id: int) -> list[dict[s
         .order_by(m.InventoryItem.equipment_slot.desc(), m.InventoryItem.id)
     )
     items = list(result.scalars().all())
-    return await build_inventory_payloads(session, items)
+    rows = await build_inventory_payloads(session, items)
+    if items:
+        from waifu_bot.services.player_pricing import get_player_pricing_context
+
+        pricing = await get_player_pricing_context(session, tg_id)
+        for row, price in zip(rows, pricing.inventory_sell_prices(items)):
+            row["sell_price"] = price
+    return rows
 
 
 async def build_dungeon_history(
@@ -493,6 +493,10 @@ async def build_event_feed(
         q = q.where(PlayerEventLog.event_type.in_(PUBLIC_EVENT_TYPES))
     if cursor:
         q = q.where(PlayerEventLog.id < cursor)
+    since = read_since()
+    if since is not None:
+        # Partition pruning: only the last HISTORY_READ_WINDOW_DAYS of monthly partitions.
+        q = q.where(PlayerEventLog.created_at >= since)
 
     rows = list((await session.execute(q)).scalars().all())
     has_more = len(rows) > limit
@@ -515,40 +519,41 @@ async def build_event_feed(
     }
 
 
-async def search_players(session: AsyncSession, query: str, limit: int = 20) -> list[dict[str, Any]]:
-    q = query.strip()
-    if not q:
-        return []
-
-    stmt = (
-        select(m.Player, m.MainWaifu)
-        .outerjoin(m.MainWaifu, m.MainWaifu.player_id == m.Player.id)
-        .limit(limit)
-    )
-    if q.isdigit():
-        stmt = stmt.where(or_(m.Player.id == int(q), m.Player.username.ilike(f"%{q}%")))
-    else:
-        clean = q.lstrip("@")
-        stmt = stmt.where(
-            or_(
-                m.Player.username.ilike(f"%{clean}%"),
-                m.Player.first_name.ilike(f"%{q}%"),
+async def search_players_page(
+    session: AsyncSession, query: str, *, limit: int = 20, offset: int = 0
+) -> dict[str, Any]:
+    """Ranked search by id / username / first name / character name (player_search index)."""
+    page = await find_player_ids(session, query, limit=limit, offset=offset)
+    items: list[dict[str, Any]] = []
+    if page.player_ids:
+        rows = (
+            await session.execute(
+                select(m.Player, m.MainWaifu)
+                .outerjoin(m.MainWaifu, m.MainWaifu.player_id == m.Player.id)
+                .where(m.Player.id.in_(page.player_ids))
             )
-        )
-
-    rows = (await session.execute(stmt)).all()
-    return [
-        {
-            "telegram_id": p.id,
-            "username": p.username,
-            "first_name": p.first_name,
-            "character_name": sanitize_display_name(
-                w.name if w else None, username=p.username, player_id=p.id
-            ),
-            "level": w.level if w else None,
-        }
-        for p, w in rows
-    ]
+        ).all()
+        by_id = {p.id: (p, w) for p, w in rows}
+        for pid in page.player_ids:
+            if pid not in by_id:
+                continue
+            p, w = by_id[pid]
+            items.append(
+                {
+                    "telegram_id": p.id,
+                    "username": p.username,
+                    "first_name": p.first_name,
+                    "character_name": sanitize_display_name(
+                        w.name if w else None, username=p.username, player_id=p.id
+                    ),
+                    "level": w.level if w else None,
+                }
+            )
+    return {
+        "items": items,
+        "has_more": page.has_more,
+        "next_offset": offset + len(page.player_ids) if page.has_more else None,
+    }
 
 
 def _player_lb_row(
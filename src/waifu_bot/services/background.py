@@ -1,6 +1,7 @@
 """Background task loops extracted from main.py.
 
-Each loop runs as an asyncio task, polling at a fixed interval.
+Each loop runs as an asyncio task, polling at a fixed interval, or — for calendar
+specs — sleeping until the next MSK slot (see calendar_scheduler).
 `start_all_background_tasks` is called once from the FastAPI startup event.
 `cancel_all_background_tasks` can be called on shutdown for graceful cleanup.
 """
@@ -8,9 +9,12 @@ from __future__ import annotations
 
 import asyncio
 import logging
+from datetime import date, datetime, timedelta
 from typing import Any
 
 from waifu_bot.core.config import settings
+from waifu_bot.game.msk_time import msk_now
+from waifu_bot.services.query_budget import run_in_scope
 
 logger = logging.getLogger(__name__)
 
@@ -41,11 +45,26 @@ async def _loop(
             if not await try_acquire_background_tick(name, lock_ttl_sec):
                 continue
         try:
-            await fn()
+            await run_in_scope(f"tick:{name}", fn)
         except Exception:
             logger.exception("%s failed", name)
 
 
+async def _calendar_loop(spec: Any) -> None:
+    """Calendar loop: catch up missed slots → sleep until next MSK slot (+jitter) → repeat."""
+    from waifu_bot.services.calendar_scheduler import MskCron, run_scheduled_tick, seconds_until_next
+
+    cron = MskCron.parse(spec.schedule)
+    while True:
+        if not (spec.skip_in_dev and settings.environment in ("dev", "testing")):
+            try:
+                await run_scheduled_tick(spec)
+            except Exception:
+                logger.exception("%s failed", spec.name)
+        delay = seconds_until_next(cron, jitter_sec=spec.jitter_sec)
+        await asyncio.sleep(min(delay, float(spec.interval_sec)))
+
+
 # ---------------------------------------------------------------------------
 # Individual loops
 # ---------------------------------------------------------------------------
@@ -77,11 +96,11 @@ async def _gd_v1_round_tick() -> None:
         break
 
 
-async def _gd_daily_finalize_tick() -> None:
+async def _gd_daily_finalize_tick(slot: datetime | None = None) -> None:
     await _gd_v1_registration_tick()
 
 
-async def _gd_daily_start_tick() -> None:
+async def _gd_daily_start_tick(slot: datetime | None = None) -> None:
     await _gd_v1_round_tick()
 
 
@@ -185,6 +204,141 @@ async def _chat_rewards_flush_fn() -> None:
         break
 
 
+async def _chat_activity_drain_fn() -> None:
+    """Apply deferred group-message side effects from the chat activity stream."""
+    from waifu_bot.core import redis as redis_core
+    from waifu_bot.db.session import get_session, init_engine
+    from waifu_bot.services import chat_activity_bus as bus
+
+    redis_client = redis_core.get_redis()
+    if redis_client is None:
+        return
+    init_engine()
+    async for session in get_session():
+        for _ in range(CHAT_ACTIVITY_DRAIN_MAX_BATCHES):
+            if await bus.drain_once(session, redis_client) < bus.BATCH_SIZE:
+                break
+        break
+    stats = await bus.stream_stats(redis_client)
+    if stats["lag"] + stats["pending"] > bus.LAG_WARN_ENTRIES:
+        logger.warning("chat activity stream behind: %s", stats)
+
+
+async def _guild_quest_flush_fn() -> None:
+    """Apply accumulated guild quest progress: due quests every wake, all dirty ones once a minute."""
+    from waifu_bot.core import redis as redis_core
+    from waifu_bot.db.session import get_session, init_engine
+    from waifu_bot.services import guild_quest_accumulator as gqa
+
+    if not settings.guild_quest_accumulator_enabled:
+        return
+    redis_client = redis_core.get_redis()
+    if redis_client is None:
+        return
+    init_engine()
+    full = await gqa.claim_full_flush(redis_client)
+    async for session in get_session():
+        applied = await gqa.flush_progress(session, redis_client, full=full)
+        if applied:
+            logger.debug("guild quest flush full=%s quests=%s", full, applied)
+        break
+
+
+async def _flush_guild_quest_progress(session) -> None:
+    """Before a rotation expires quests: apply every accumulated counter while they are still active."""
+    if not settings.guild_quest_accumulator_enabled:
+        return
+    from waifu_bot.core import redis as redis_core
+    from waifu_bot.services import guild_quest_accumulator as gqa
+
+    redis_client = redis_core.get_redis()
+    if redis_client is None:
+        return
+    for _ in range(GUILD_QUEST_ROTATION_FLUSH_MAX_BATCHES):
+        if not await gqa.flush_progress(session, redis_client, full=True):
+            return
+    logger.warning("guild quest rotation flush still busy after %d batches", GUILD_QUEST_ROTATION_FLUSH_MAX_BATCHES)
+
+
+async def _rebuild_guild_quest_index(session) -> None:
+    """After a rotation commit: precompute every guild's quest index."""
+    if not settings.guild_quest_accumulator_enabled:
+        return
+    from waifu_bot.core import redis as redis_core
+    from waifu_bot.services.guild_quest_accumulator import rebuild_indexes
+
+    await rebuild_indexes(session, redis_core.get_redis())
+
+
+async def _codex_flush_fn() -> None:
+    from waifu_bot.db.session import get_session, init_engine
+    from waifu_bot.core import redis as redis_core
+    from waifu_bot.services.codex_buffer import flush_codex_buffers
+
+    init_engine()
+    redis_client = redis_core.get_redis()
+    async for session in get_session():
+        written = await flush_codex_buffers(session, redis_client)
+        if any(written.values()):
+            logger.debug("codex flush %s", written)
+        break
+
+
+async def _llm_usage_flush_fn() -> None:
+    from waifu_bot.db.session import get_session, init_engine
+    from waifu_bot.services.llm_usage_ledger import buffer_redis, flush_llm_usage_buffer
+
+    redis_client = buffer_redis()
+    if redis_client is None:
+        return
+    init_engine()
+    async for session in get_session():
+        written = await flush_llm_usage_buffer(session, redis_client)
+        if written:
+            logger.debug("llm usage flush rows=%d", written)
+        break
+
+
+async def _llm_usage_retention_fn(slot: datetime | None = None) -> None:
+    """Prune raw llm_usage_log rows past retention (hourly rollups are kept)."""
+    from waifu_bot.core.config import settings
+    from waifu_bot.db.session import get_session, init_engine
+    from waifu_bot.services.llm_usage_ledger import prune_raw_rows
+
+    days = int(getattr(settings, "llm_usage_raw_retention_days", 30) or 0)
+    if days <= 0:
+        return
+    init_engine()
+    async for session in get_session():
+        deleted = await prune_raw_rows(session, older_than_days=days)
+        if deleted:
+            logger.info("llm usage retention: deleted %d raw rows older than %d days", deleted, days)
+        break
+
+
+async def _history_partitions_fn(slot: datetime | None = None) -> None:
+    """Create upcoming monthly history partitions; archive + drop months past retention."""
+    from waifu_bot.db.session import get_session, init_engine
+    from waifu_bot.services.history_partitions import maintain_history
+
+    init_engine()
+    async for session in get_session():
+        summary = await maintain_history(session)
+        for table, res in summary.items():
+            if res["created"] or res["dropped"]:
+                logger.info("history partitions %s: created=%s dropped=%s", table, res["created"], res["dropped"])
+        break
+
+
+async def _maintenance_jobs_fn() -> None:
+    """Continue queued / crashed bulk maintenance runs from their checkpoints."""
+    from waifu_bot.services.maintenance_jobs import run_pending_jobs
+
+    ran = await run_pending_jobs(time_budget_sec=MAINTENANCE_JOBS_BUDGET_SEC)
+    if ran:
+        logger.debug("maintenance jobs: %d run(s) advanced", ran)
+
+
 async def _guild_war_hourly_fn() -> None:
     from waifu_bot.db.session import get_session, init_engine
     from waifu_bot.services.guild_progress import hourly_war_online_bonus
@@ -231,39 +385,34 @@ async def _guild_war_narrative_fn() -> None:
         break
 
 
-# Track last observed MSK day/week so resets fire on the transition, not on a
-# fixed interval (and never on a fresh restart mid-day/mid-week).
-_last_abyss_daily_reset = None
-_last_abyss_weekly_reset = None
-_last_guild_quest_daily_reset = None
-_last_guild_quest_weekly_reset = None
-_last_chat_rewards_daily_claim = None
+# Calendar jobs below receive the MSK slot they run for (UTC-aware fire instant) from
+# calendar_scheduler; the persisted ledger replaces the old in-process "last seen day"
+# globals, so a restart across a day/week boundary replays the missed slot.
+
 
+def _slot_msk_date(slot: datetime | None) -> date:
+    from waifu_bot.game.msk_time import msk_now
 
-async def _challenge_day_tick_fn() -> None:
+    return msk_now(slot).date()
+
+
+async def _challenge_day_tick_fn(slot: datetime | None = None) -> None:
     """Always ensure today's challenge instances exist (do not skip on first tick)."""
+    from waifu_bot.db.session import init_engine
     from waifu_bot.services.challenge import challenge_day_tick
 
+    init_engine()
     await challenge_day_tick()
 
 
-async def _abyss_daily_reset_fn() -> None:
+async def _abyss_daily_reset_fn(slot: datetime | None = None) -> None:
     """Reset the per-player daily checkpoint counter at MSK midnight."""
-    global _last_abyss_daily_reset
-    from waifu_bot.services.abyss_service import msk_today
-
-    today = msk_today()
-    if _last_abyss_daily_reset is None:
-        _last_abyss_daily_reset = today
-        return
-    if _last_abyss_daily_reset == today:
-        return
-
     from sqlalchemy import update
 
     from waifu_bot.db.models import AbyssProgress
     from waifu_bot.db.session import get_session, init_engine
 
+    today = _slot_msk_date(slot)
     init_engine()
     async for session in get_session():
         await session.execute(
@@ -273,24 +422,15 @@ async def _abyss_daily_reset_fn() -> None:
         )
         await session.commit()
         break
-    _last_abyss_daily_reset = today
     logger.info("abyss daily checkpoint reset applied for %s (MSK)", today)
 
 
-async def _abyss_weekly_reset_fn() -> None:
+async def _abyss_weekly_reset_fn(slot: datetime | None = None) -> None:
     """On MSK week rollover, rank the finished week and award the top 3."""
-    global _last_abyss_weekly_reset
     from waifu_bot.services.abyss_service import week_start_msk
 
-    cur_week = week_start_msk()
-    if _last_abyss_weekly_reset is None:
-        _last_abyss_weekly_reset = cur_week
-        return
-    if _last_abyss_weekly_reset == cur_week:
-        return
-
-    ended_week = _last_abyss_weekly_reset
-    _last_abyss_weekly_reset = cur_week
+    cur_week = week_start_msk(msk_now(slot))
+    ended_week = cur_week - timedelta(days=7)
 
     from sqlalchemy import select
 
@@ -301,6 +441,7 @@ async def _abyss_weekly_reset_fn() -> None:
 
     init_engine()
     bot = get_bot()
+    rows: list[Any] = []
     async for session in get_session():
         cfg = await get_game_config_map(session)
         reward_by_rank = {
@@ -351,69 +492,56 @@ async def _abyss_weekly_reset_fn() -> None:
     logger.info("abyss weekly reset processed week=%s (%d players)", ended_week, len(rows))
 
 
-async def _guild_quest_daily_reset_fn() -> None:
-    global _last_guild_quest_daily_reset
-    from waifu_bot.services.abyss_service import msk_today
-
-    today = msk_today()
+async def _guild_quest_daily_reset_fn(slot: datetime | None = None) -> None:
     from waifu_bot.db.session import get_session, init_engine
-    from waifu_bot.services.guild_quest_service import (
-        process_weekly_ballot_autopick,
-        rotate_daily_quests,
-    )
+    from waifu_bot.services.guild_quest_service import rotate_daily_quests
 
+    today = _slot_msk_date(slot)
     init_engine()
     async for session in get_session():
-        if _last_guild_quest_daily_reset is None:
-            _last_guild_quest_daily_reset = today
-        elif _last_guild_quest_daily_reset != today:
-            await rotate_daily_quests(session)
-            _last_guild_quest_daily_reset = today
-            logger.info("guild quest daily reset applied for %s (MSK)", today)
-        await process_weekly_ballot_autopick(session)
+        await _flush_guild_quest_progress(session)
+        await rotate_daily_quests(session)
         await session.commit()
+        await _rebuild_guild_quest_index(session)
         break
+    logger.info("guild quest daily reset applied for %s (MSK)", today)
 
 
-async def _guild_quest_weekly_reset_fn() -> None:
-    global _last_guild_quest_weekly_reset
-    from waifu_bot.services.abyss_service import week_start_msk
+async def _guild_quest_ballot_autopick_fn() -> None:
+    """Auto-pick weekly ballots after Monday 12:00 MSK (ballots may open mid-week)."""
+    from waifu_bot.db.session import get_session, init_engine
+    from waifu_bot.services.guild_quest_service import process_weekly_ballot_autopick
+
+    init_engine()
+    async for session in get_session():
+        await process_weekly_ballot_autopick(session)
+        await session.commit()
+        break
 
-    cur_week = week_start_msk()
-    if _last_guild_quest_weekly_reset is None:
-        _last_guild_quest_weekly_reset = cur_week
-        return
-    if _last_guild_quest_weekly_reset == cur_week:
-        return
 
+async def _guild_quest_weekly_reset_fn(slot: datetime | None = None) -> None:
     from waifu_bot.db.session import get_session, init_engine
+    from waifu_bot.services.abyss_service import week_start_msk
     from waifu_bot.services.guild_quest_service import rotate_weekly_quests
 
+    cur_week = week_start_msk(msk_now(slot))
     init_engine()
     async for session in get_session():
+        await _flush_guild_quest_progress(session)
         await rotate_weekly_quests(session)
         await session.commit()
+        await _rebuild_guild_quest_index(session)
         break
-    _last_guild_quest_weekly_reset = cur_week
     logger.info("guild quest weekly reset applied for week=%s (MSK)", cur_week)
 
 
-async def _chat_rewards_daily_claim_fn() -> None:
+async def _chat_rewards_daily_claim_fn(slot: datetime | None = None) -> None:
     """Auto-claim accumulated chat rewards at MSK midnight."""
-    global _last_chat_rewards_daily_claim
-    from waifu_bot.services.abyss_service import msk_today
-
-    today = msk_today()
-    if _last_chat_rewards_daily_claim is None:
-        _last_chat_rewards_daily_claim = today
-        return
-    if _last_chat_rewards_daily_claim == today:
-        return
-
     from waifu_bot.core import redis as redis_core
     from waifu_bot.db.session import get_session, init_engine
     from waifu_bot.services import chat_rewards as chat_rewards_svc
 
+    today = _slot_msk_date(slot)
     init_engine()
     redis_client = redis_core.get_redis()
     claimed: list[tuple[int, chat_rewards_svc.ClaimResult]] = []
@@ -421,7 +549,6 @@ async def _chat_rewards_daily_claim_fn() -> None:
         claimed = await chat_rewards_svc.auto_claim_all_wallets(session, redis_client)
         await session.commit()
         break
-    _last_chat_rewards_daily_claim = today
     logger.info(
         "chat rewards daily auto-claim applied for %s (MSK), players=%d",
         today,
@@ -456,10 +583,23 @@ async def _chronicle_stipend_fn() -> None:
 # ---------------------------------------------------------------------------
 
 CHAT_REWARDS_FLUSH_INTERVAL = 30
+CHAT_ACTIVITY_DRAIN_INTERVAL = 2
+# Batches per chat_activity_drain wake before yielding to the next tick.
+CHAT_ACTIVITY_DRAIN_MAX_BATCHES = 20
+# Rotation flush: FLUSH_BATCH quests per batch; a cap only guards against a runaway loop.
+GUILD_QUEST_ROTATION_FLUSH_MAX_BATCHES = 100
+GUILD_QUEST_FLUSH_INTERVAL = 5
+CODEX_FLUSH_INTERVAL = 30
+LLM_USAGE_FLUSH_INTERVAL = 30
+MAINTENANCE_JOBS_INTERVAL = 30
+# Work per maintenance_jobs wake; the lock TTL below covers it with margin.
+MAINTENANCE_JOBS_BUDGET_SEC = 240
 CHRONICLE_STIPEND_INTERVAL = 3600
 DELVE_GRANT_INTERVAL = 3600
 GD_V1_REG_POLL_SECONDS = 30
 GD_V1_ROUND_POLL_SECONDS = 20
+# Upper bound on a calendar loop's sleep; wakes earlier for the next MSK slot.
+CALENDAR_MAX_SLEEP = 3600
 EXPEDITION_NOTIFY_INTERVAL = 30
 EXPEDITION_TICK_INTERVAL = 30
 GUILD_WAR_HOUR = 3600
@@ -473,6 +613,9 @@ def start_all_background_tasks() -> None:
     from waifu_bot.services.background_ticks import get_background_tick_registry
 
     for spec in get_background_tick_registry():
+        if spec.is_calendar:
+            _schedule(_calendar_loop(spec), name=f"bg:{spec.name}")
+            continue
         _schedule(
             _loop(
                 spec.name,
@@ -10,51 +10,93 @@ from typing import Any
 class BackgroundTickSpec:
     name: str
     interval_sec: float
-    fn: Callable[[], Awaitable[None]]
+    fn: Callable[..., Awaitable[None]]
     lock_ttl_sec: int | None = None
     skip_in_dev: bool = False
+    # Calendar ticks: MSK cron ("min hour dom month dow"); fn receives the slot (UTC datetime).
+    # interval_sec then only caps the sleep between wakes (safety re-check).
+    schedule: str | None = None
+    # Max missed slots replayed after downtime (1 = only the latest).
+    catch_up: int = 1
+    # Random delay added after each slot so processes do not stampede Postgres/Redis.
+    jitter_sec: float = 0.0
+    # True: first-ever wake runs the current slot; False: it is recorded as already done.
+    run_on_bootstrap: bool = False
+
+    @property
+    def is_calendar(self) -> bool:
+        return self.schedule is not None
 
 
 def get_background_tick_registry() -> list[BackgroundTickSpec]:
     from waifu_bot.services.background import (
         ABYSS_RESET_POLL_INTERVAL,
+        CALENDAR_MAX_SLEEP,
+        CHAT_ACTIVITY_DRAIN_INTERVAL,
         CHAT_REWARDS_FLUSH_INTERVAL,
+        CODEX_FLUSH_INTERVAL,
         DELVE_GRANT_INTERVAL,
         GD_V1_REG_POLL_SECONDS,
         GD_V1_ROUND_POLL_SECONDS,
         GUILD_NARRATIVE_INTERVAL,
+        GUILD_QUEST_FLUSH_INTERVAL,
         GUILD_TICK_INTERVAL,
         GUILD_WAR_HOUR,
+        LLM_USAGE_FLUSH_INTERVAL,
+        MAINTENANCE_JOBS_INTERVAL,
         _abyss_daily_reset_fn,
         _abyss_weekly_reset_fn,
         _challenge_day_tick_fn,
+        _guild_quest_ballot_autopick_fn,
         _guild_quest_daily_reset_fn,
         _guild_quest_weekly_reset_fn,
         _chat_rewards_daily_claim_fn,
+        _chat_activity_drain_fn,
         _chat_rewards_flush_fn,
+        _codex_flush_fn,
         _delve_grant_fn,
         _gd_daily_finalize_tick,
         _gd_daily_start_tick,
         _gd_v1_registration_tick,
         _gd_v1_round_tick,
+        _guild_quest_flush_fn,
         _guild_tick_fn,
         _guild_war_hourly_fn,
         _guild_war_narrative_fn,
+        _history_partitions_fn,
+        _llm_usage_flush_fn,
+        _llm_usage_retention_fn,
+        _maintenance_jobs_fn,
     )
 
     return [
+        # No lock: the stream consumer group spreads batches across workers.
+        BackgroundTickSpec(
+            "chat_activity_drain",
+            CHAT_ACTIVITY_DRAIN_INTERVAL,
+            _chat_activity_drain_fn,
+        ),
         BackgroundTickSpec(
             "chat_rewards_flush",
             CHAT_REWARDS_FLUSH_INTERVAL,
             _chat_rewards_flush_fn,
             lock_ttl_sec=55,
         ),
+        BackgroundTickSpec(
+            "codex_flush",
+            CODEX_FLUSH_INTERVAL,
+            _codex_flush_fn,
+            lock_ttl_sec=25,
+        ),
         BackgroundTickSpec(
             "delve_grant",
             DELVE_GRANT_INTERVAL,
             _delve_grant_fn,
             lock_ttl_sec=3500,
         ),
+        # GD daily start / finalize stay on a poll: the start mark is a game_config override
+        # (gd_daily_start_hour_msk / _minute_msk), cycles end at their own ends_at and chats
+        # activated mid-day start on the next poll. Both handlers are idempotent per game date.
         BackgroundTickSpec(
             "gd_daily_finalize",
             GD_V1_REG_POLL_SECONDS,
@@ -88,32 +130,84 @@ def get_background_tick_registry() -> list[BackgroundTickSpec]:
         ),
         BackgroundTickSpec(
             "abyss_daily_reset",
-            ABYSS_RESET_POLL_INTERVAL,
+            CALENDAR_MAX_SLEEP,
             _abyss_daily_reset_fn,
+            schedule="0 0 * * *",
+            jitter_sec=30,
         ),
         BackgroundTickSpec(
             "challenge_day",
-            ABYSS_RESET_POLL_INTERVAL,
+            CALENDAR_MAX_SLEEP,
             _challenge_day_tick_fn,
+            schedule="0 0 * * *",
+            jitter_sec=30,
+            run_on_bootstrap=True,
         ),
         BackgroundTickSpec(
             "abyss_weekly_reset",
-            ABYSS_RESET_POLL_INTERVAL,
+            CALENDAR_MAX_SLEEP,
             _abyss_weekly_reset_fn,
+            schedule="0 0 * * 1",
+            catch_up=8,
+            jitter_sec=30,
         ),
         BackgroundTickSpec(
             "guild_quest_daily_reset",
-            ABYSS_RESET_POLL_INTERVAL,
+            CALENDAR_MAX_SLEEP,
             _guild_quest_daily_reset_fn,
+            schedule="0 0 * * *",
+            jitter_sec=30,
         ),
         BackgroundTickSpec(
-            "guild_quest_weekly_reset",
+            "guild_quest_flush",
+            GUILD_QUEST_FLUSH_INTERVAL,
+            _guild_quest_flush_fn,
+            lock_ttl_sec=25,
+        ),
+        BackgroundTickSpec(
+            "guild_quest_ballot_autopick",
             ABYSS_RESET_POLL_INTERVAL,
+            _guild_quest_ballot_autopick_fn,
+            lock_ttl_sec=280,
+        ),
+        BackgroundTickSpec(
+            "guild_quest_weekly_reset",
+            CALENDAR_MAX_SLEEP,
             _guild_quest_weekly_reset_fn,
+            schedule="0 0 * * 1",
+            jitter_sec=30,
         ),
         BackgroundTickSpec(
             "chat_rewards_daily_claim",
-            ABYSS_RESET_POLL_INTERVAL,
+            CALENDAR_MAX_SLEEP,
             _chat_rewards_daily_claim_fn,
+            schedule="0 0 * * *",
+            jitter_sec=60,
+        ),
+        BackgroundTickSpec(
+            "llm_usage_flush",
+            LLM_USAGE_FLUSH_INTERVAL,
+            _llm_usage_flush_fn,
+            lock_ttl_sec=25,
+        ),
+        BackgroundTickSpec(
+            "llm_usage_retention",
+            CALENDAR_MAX_SLEEP,
+            _llm_usage_retention_fn,
+            schedule="20 5 * * *",
+            jitter_sec=120,
+        ),
+        BackgroundTickSpec(
+            "history_partitions",
+            CALENDAR_MAX_SLEEP,
+            _history_partitions_fn,
+            schedule="40 5 * * *",
+            jitter_sec=120,
+        ),
+        BackgroundTickSpec(
+            "maintenance_jobs",
+            MAINTENANCE_JOBS_INTERVAL,
+            _maintenance_jobs_fn,
+            lock_ttl_sec=300,
         ),
     ]
@@ -0,0 +1,241 @@
+"""Delta-encoded battle events for the WebApp SSE stream.
+
+Every battle event gets a per-player sequence number. Most events carry only the HP /
+monster-position fields that changed since the previous event (``kind="delta"``); every
+``KEYFRAME_EVERY`` events, on a new dungeon, or after a sequence gap the full state is
+sent (``kind="key"``). Event-specific fields (damage, drops, flags, messages) are always
+sent as-is.
+
+Recent events are kept in a short Redis list so a reconnecting client (``Last-Event-ID``)
+gets the missed deltas replayed instead of refetching. Clients that do not opt in with
+``proto=2`` receive the classic full payload, expanded per connection by ``BattleStreamCursor``.
+
+Wire format (v2)::
+
+    {"type": "battle", "v": 2, "seq": 17, "kind": "delta", "payload": {...}}
+"""
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any
+
+from redis.asyncio.client import Redis
+
+from waifu_bot.services.sse import json_dumps
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 2
+# Full state every N events even without a gap (bounds staleness after a lost delta).
+KEYFRAME_EVERY = 16
+# Events kept for Last-Event-ID replay.
+RESUME_BUFFER_LEN = 64
+STREAM_TTL_SEC = 3600
+
+# Client-side battle state reconstructed from deltas (same keys as solo_hp_identity).
+STATE_FIELDS = (
+    "dungeon_id",
+    "position",
+    "monster_position",
+    "monster_hp",
+    "monster_max_hp",
+    "waifu_current_hp",
+    "waifu_max_hp",
+)
+
+
+def _seq_key(player_id: int) -> str:
+    return f"sse:battle:seq:{int(player_id)}"
+
+
+def _state_key(player_id: int) -> str:
+    return f"sse:battle:state:{int(player_id)}"
+
+
+def _buf_key(player_id: int) -> str:
+    return f"sse:battle:buf:{int(player_id)}"
+
+
+def _loads(raw: Any) -> dict | None:
+    if raw is None or raw == "":
+        return None
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8", errors="replace")
+    try:
+        obj = json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+def encode_battle_event(
+    payload: dict,
+    prev: dict | None,
+    seq: int,
+    *,
+    keyframe_every: int = KEYFRAME_EVERY,
+) -> tuple[dict, dict]:
+    """Build the v2 event for ``payload`` and the stream state to store after it.
+
+    ``prev`` is the stored state (``{"seq", "since_key", "state"}``) or None.
+    """
+    prev_state = dict((prev or {}).get("state") or {})
+    incoming = {f: payload[f] for f in STATE_FIELDS if payload.get(f) is not None}
+    new_dungeon = (
+        "dungeon_id" in incoming
+        and "dungeon_id" in prev_state
+        and incoming["dungeon_id"] != prev_state["dungeon_id"]
+    )
+    if new_dungeon:
+        prev_state = {}
+    state = {**prev_state, **incoming}
+    extra = {k: v for k, v in payload.items() if k not in STATE_FIELDS}
+
+    since_key = int((prev or {}).get("since_key") or 0) + 1
+    keyframe = (
+        prev is None
+        or new_dungeon
+        or int(prev.get("seq") or 0) != int(seq) - 1
+        or since_key >= max(1, int(keyframe_every))
+    )
+    if keyframe:
+        body = {**extra, **state}
+        since_key = 0
+    else:
+        changed = {f: v for f, v in state.items() if prev_state.get(f) != v}
+        body = {**extra, **changed}
+    event = {
+        "type": "battle",
+        "v": PROTOCOL_VERSION,
+        "seq": int(seq),
+        "kind": "key" if keyframe else "delta",
+        "payload": body,
+    }
+    return event, {"seq": int(seq), "since_key": since_key, "state": state}
+
+
+async def publish_battle_event(redis: Redis, player_id: int, payload: dict) -> dict:
+    """Sequence, delta-encode, buffer and publish one battle event to ``sse:{player_id}``.
+
+    Concurrent publishers for one player are tolerated: the loser sees a sequence gap
+    against the stored state and emits a keyframe; clients drop events older than their cursor.
+    """
+    pipe = redis.pipeline(transaction=False)
+    pipe.incr(_seq_key(player_id))
+    pipe.get(_state_key(player_id))
+    seq, raw_state = await pipe.execute()
+    event, new_state = encode_battle_event(payload, _loads(raw_state), int(seq))
+    text = json_dumps(event)
+
+    pipe = redis.pipeline(transaction=True)
+    pipe.set(_state_key(player_id), json_dumps(new_state), ex=STREAM_TTL_SEC)
+    pipe.rpush(_buf_key(player_id), text)
+    pipe.ltrim(_buf_key(player_id), -RESUME_BUFFER_LEN, -1)
+    pipe.expire(_buf_key(player_id), STREAM_TTL_SEC)
+    pipe.expire(_seq_key(player_id), STREAM_TTL_SEC)
+    pipe.publish(f"sse:{int(player_id)}", text)
+    await pipe.execute()
+    return event
+
+
+def parse_last_event_id(raw: str | None) -> int | None:
+    if raw is None:
+        return None
+    try:
+        val = int(str(raw).strip())
+    except (TypeError, ValueError):
+        return None
+    return val if val >= 0 else None
+
+
+def _frame(text: str, seq: int | None = None) -> str:
+    if seq is None:
+        return f"data: {text}\n\n"
+    return f"id: {int(seq)}\ndata: {text}\n\n"
+
+
+class BattleStreamCursor:
+    """Per-connection view of the battle stream: replay on connect, dedupe, legacy expansion."""
+
+    def __init__(self, player_id: int, *, protocol: int = 1, last_event_id: int | None = None) -> None:
+        self.player_id = int(player_id)
+        self.delta = int(protocol) >= PROTOCOL_VERSION
+        self.last_event_id = last_event_id if self.delta else None
+        self.max_seq = 0
+        self.state: dict = {}
+
+    async def replay(self, redis: Redis) -> list[str]:
+        """Frames to send right after subscribing (before live events)."""
+        try:
+            if not self.delta:
+                self.state = dict((_loads(await redis.get(_state_key(self.player_id))) or {}).get("state") or {})
+                return []
+            if self.last_event_id is None:
+                return []
+            pipe = redis.pipeline(transaction=False)
+            pipe.lrange(_buf_key(self.player_id), 0, -1)
+            pipe.get(_state_key(self.player_id))
+            raw_events, raw_state = await pipe.execute()
+        except Exception:
+            logger.warning("battle stream replay failed player_id=%s", self.player_id, exc_info=True)
+            return [self._resume_frame(ok=False, replayed=0)] if self.delta and self.last_event_id is not None else []
+
+        last = int(self.last_event_id)
+        stored = _loads(raw_state)
+        events: list[tuple[int, str]] = []
+        for raw in raw_events or []:
+            obj = _loads(raw)
+            if obj is None:
+                continue
+            seq = int(obj.get("seq") or 0)
+            if seq > last:
+                events.append((seq, raw if isinstance(raw, str) else json_dumps(obj)))
+        events.sort(key=lambda it: it[0])
+
+        frames: list[str] = []
+        contiguous = bool(events) and events[0][0] == last + 1
+        if contiguous:
+            frames.extend(_frame(text, seq) for seq, text in events)
+            self.max_seq = events[-1][0]
+            ok = True
+        elif stored is not None and int(stored.get("seq") or 0) != last:
+            # Gap older than the buffer (or the sequence was reset): one keyframe of the current state.
+            seq = int(stored.get("seq") or 0)
+            key = {
+                "type": "battle",
+                "v": PROTOCOL_VERSION,
+                "seq": seq,
+                "kind": "key",
+                "resync": True,
+                "payload": dict(stored.get("state") or {}),
+            }
+            frames.append(_frame(json_dumps(key), seq))
+            self.max_seq = seq
+            ok = False
+        else:
+            ok = not events
+        frames.append(self._resume_frame(ok=ok, replayed=len(frames) if ok else 0))
+        return frames
+
+    def _resume_frame(self, *, ok: bool, replayed: int) -> str:
+        return _frame(json_dumps({"type": "battle_resume", "ok": bool(ok), "replayed": int(replayed)}))
+
+    def frame(self, text: str) -> str | None:
+        """SSE frame for a pub/sub message; None drops it (already replayed)."""
+        if '"seq":' not in text:
+            return _frame(text)
+        obj = _loads(text)
+        if obj is None or obj.get("type") != "battle" or obj.get("v") != PROTOCOL_VERSION:
+            return _frame(text)
+        seq = int(obj.get("seq") or 0)
+        if self.delta:
+            if self.max_seq and seq <= self.max_seq:
+                return None
+            return _frame(text, seq)
+        payload = dict(obj.get("payload") or {})
+        if obj.get("kind") == "key":
+            self.state = {f: payload[f] for f in STATE_FIELDS if f in payload}
+        else:
+            self.state.update({f: payload[f] for f in STATE_FIELDS if f in payload})
+        return _frame(json_dumps({"type": "battle", "payload": {**self.state, **payload}}))
@@ -9,6 +9,10 @@ player's kill count for a monster template into:
 Bonuses are *per-monster* (Monster Hunter style): they only apply while fighting
 that specific template. Tier lookups during combat are cached in Redis for a
 short TTL to avoid a DB round-trip on every message hit.
+
+With Redis available, sightings and kills are buffered by ``codex_buffer`` and
+flushed in batches; tier lookups add the buffered kills to the cached committed
+count so bonuses stay current between flushes.
 """
 
 from __future__ import annotations
@@ -21,13 +25,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from waifu_bot.db.models.dungeon import PlayerMonsterCodex
 from waifu_bot.game import bestiary as bcfg
-
-_CACHE_TTL_SECONDS = 60
-_CACHE_PREFIX = "bestiary:tier"
-
-
-def _cache_key(player_id: int, template_id: int) -> str:
-    return f"{_CACHE_PREFIX}:{int(player_id)}:{int(template_id)}"
+from waifu_bot.services import codex_buffer
 
 
 async def get_kills(session: AsyncSession, player_id: int, template_id: int) -> int:
@@ -39,15 +37,18 @@ async def get_kills(session: AsyncSession, player_id: int, template_id: int) ->
 
 
 async def mark_seen(
-    session: AsyncSession, player_id: int, template_id: int | None
+    session: AsyncSession, player_id: int, template_id: int | None, redis=None
 ) -> None:
     """Ensure a codex row exists for (player, template) without changing kills.
 
     Used on first contact so the monster shows up as "encountered" (tier 0) even
-    before the first kill. No-op for monsters without a template id.
+    before the first kill. No-op for monsters without a template id. With Redis,
+    known monsters skip SQL entirely and new ones are buffered.
     """
     if not template_id:
         return
+    if await codex_buffer.note_monster_seen(redis, player_id, int(template_id)):
+        return
     stmt = (
         pg_insert(PlayerMonsterCodex)
         .values(
@@ -69,11 +70,18 @@ async def record_kill(
 ) -> int | None:
     """Increment the kill count for (player, template). Returns the new tier.
 
-    Upserts the codex row, bumps ``kills`` and timestamps, and invalidates the
-    Redis tier cache. No-op (returns None) for monsters without a template id.
+    With Redis the increment is buffered (flushed by the ``codex_flush`` tick) and
+    the tier is computed from committed + buffered kills; otherwise upserts the
+    codex row directly. No-op (returns None) for monsters without a template id.
     """
     if not template_id:
         return None
+    if redis is not None:
+        buffered = await codex_buffer.note_kill(redis, player_id, int(template_id))
+        if buffered is not None:
+            kills = await _total_kills(session, player_id, int(template_id), redis)
+            await _hook_bestiary_lord(session, player_id, kills)
+            return bcfg.tier_for_kills(kills)
     now = datetime.utcnow()
     stmt = (
         pg_insert(PlayerMonsterCodex)
@@ -96,12 +104,12 @@ async def record_kill(
         .returning(PlayerMonsterCodex.kills)
     )
     new_kills = await session.scalar(stmt)
-    if redis is not None:
-        try:
-            await redis.delete(_cache_key(player_id, template_id))
-        except Exception:
-            pass
     kills = int(new_kills or 0)
+    await _hook_bestiary_lord(session, player_id, kills)
+    return bcfg.tier_for_kills(kills)
+
+
+async def _hook_bestiary_lord(session: AsyncSession, player_id: int, kills: int) -> None:
     if bcfg.tier_for_kills(kills) >= 6 and bcfg.tier_for_kills(kills - 1) < 6:
         try:
             from waifu_bot.services.hidden_milestones import hook_milestones
@@ -109,7 +117,28 @@ async def record_kill(
             await hook_milestones(session, int(player_id), ["bestiary_lord"])
         except Exception:
             pass
-    return bcfg.tier_for_kills(kills)
+
+
+async def _total_kills(
+    session: AsyncSession, player_id: int, template_id: int, redis=None
+) -> int:
+    """Committed kills (Redis-cached) plus kills still sitting in the write-behind buffer."""
+    if redis is None:
+        return await get_kills(session, player_id, template_id)
+    try:
+        cached, pending, in_flight = await codex_buffer.pending_kills(redis, player_id, template_id)
+    except Exception:
+        return await get_kills(session, player_id, template_id)
+    if cached is not None:
+        return cached + pending
+    committed = await get_kills(session, player_id, template_id)
+    # While a flush is mid-way the DB may already include the in-flight batch: don't cache.
+    if not in_flight:
+        try:
+            await codex_buffer.cache_committed_kills(redis, player_id, template_id, committed)
+        except Exception:
+            pass
+    return committed + pending
 
 
 async def get_tier(
@@ -121,21 +150,8 @@ async def get_tier(
     """Return the discovery tier for (player, template), with Redis caching."""
     if not template_id:
         return 0
-    if redis is not None:
-        try:
-            cached = await redis.get(_cache_key(player_id, template_id))
-            if cached is not None:
-                return int(cached)
-        except Exception:
-            pass
-    kills = await get_kills(session, player_id, template_id)
-    tier = bcfg.tier_for_kills(kills)
-    if redis is not None:
-        try:
-            await redis.set(_cache_key(player_id, template_id), int(tier), ex=_CACHE_TTL_SECONDS)
-        except Exception:
-            pass
-    return tier
+    kills = await _total_kills(session, player_id, int(template_id), redis)
+    return bcfg.tier_for_kills(kills)
 
 
 async def get_bestiary_bonuses(
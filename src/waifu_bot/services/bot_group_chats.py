@@ -159,14 +159,17 @@ async def record_bot_chat_member_update(
     await apply_chat_metadata_from_api(session, bot, chat_id)
 
 
-async def touch_bot_group_chat_activity(session: AsyncSession, chat_id: int) -> None:
+async def touch_bot_group_chat_activity(
+    session: AsyncSession, chat_id: int, *, at: datetime | None = None
+) -> None:
     if int(chat_id) >= 0:
         return
-    now = datetime.now(tz=timezone.utc)
+    now = at or datetime.now(tz=timezone.utc)
     row = await session.get(BotGroupChat, int(chat_id))
     if row is None:
         return
-    row.last_activity_at = now
+    if row.last_activity_at is None or row.last_activity_at < now:
+        row.last_activity_at = now
 
 
 def _row_to_dict(row: BotGroupChat) -> dict[str, Any]:
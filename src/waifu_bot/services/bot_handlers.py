@@ -5,6 +5,7 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
+import time
 
 from aiogram import Bot, F, Router
 from aiogram.exceptions import TelegramBadRequest
@@ -21,6 +22,7 @@ from waifu_bot.game.constants import (
     WAIFU_CLASS_LABEL_RU,
     WAIFU_RACE_LABEL_RU,
 )
+from waifu_bot.services.activity_modes import ActivityRoutes, resolve_routes
 from waifu_bot.services.combat import CombatService
 from waifu_bot.services.dungeon import DungeonService
 from waifu_bot.services.gd_cycle_service import GDCycleService
@@ -33,6 +35,7 @@ from waifu_bot.services.gd_v1_worker import (
     send_gd_v1_group_start_narrative,
 )
 from waifu_bot.services.game_config_service import cfg_bool, get_game_config_map
+from waifu_bot.services import chat_activity_bus
 from waifu_bot.services import chat_rewards as chat_rewards_svc
 from waifu_bot.services.telegram_trace import (
     log_outgoing_fail,
@@ -147,6 +150,56 @@ def _gd_v1_media_and_text_len(message: Message) -> tuple[int, str | None]:
     return td, media
 
 
+def _chat_activity_event(
+    message: Message,
+    *,
+    chat_id: int,
+    player_id: int,
+    message_text: str | None,
+    msg_len: int,
+    gd: bool,
+    text_delta: int,
+    media_kind: str | None,
+    raid: bool,
+) -> chat_activity_bus.ChatActivityEvent:
+    metrics: list[str] = []
+    if message.sticker:
+        metrics.append("stickers_sent")
+    elif message.animation:
+        metrics.append("gifs_sent")
+    elif message.video:
+        metrics.append("videos_sent")
+    elif message.voice or message.audio:
+        metrics.append("audio_messages_sent")
+    if message_text and str(message_text).strip():
+        metrics.append("text_messages_sent")
+    raid_media: list[str] = []
+    if message.photo:
+        raid_media.append("photo")
+    elif message.video:
+        raid_media.append("video")
+    elif message.animation:
+        raid_media.append("gif")
+    elif message.voice or message.audio:
+        raid_media.append("voice")
+    elif message.sticker:
+        raid_media.append("sticker")
+    sent_at = getattr(message, "date", None)
+    return chat_activity_bus.ChatActivityEvent(
+        player_id=int(player_id),
+        chat_id=int(chat_id),
+        message_id=int(message.message_id),
+        ts=int(sent_at.timestamp()) if sent_at else int(time.time()),
+        metrics=tuple(metrics),
+        gd=gd,
+        text_delta=int(text_delta or 0),
+        media_kind=media_kind,
+        raid=raid,
+        message_length=int(msg_len or 0),
+        raid_media=tuple(raid_media),
+    )
+
+
 # --- Global commands: /start, /help (any chat type); register first so they match before group_message_damage ---
 
 @router.message(Command("start"), command_addressed_to_this_bot)
@@ -345,8 +398,12 @@ async def _group_solo_combat_and_abyss(
     media_type: MediaType,
     message_text: str | None,
     msg_len: int,
+    routes: ActivityRoutes | None = None,
 ) -> None:
-    """Solo combat + abyss on their own DB session so GD/rewards cannot delay HP publish."""
+    """Solo combat + abyss on their own DB session so GD/rewards cannot delay HP publish.
+
+    ``routes`` (activity_modes) skips the handlers of modes the player is not in; None = try all.
+    """
     from waifu_bot.services import solo_active_cache as solo_active_cache_mod
 
     _redis = redis_core.get_redis()
@@ -355,57 +412,60 @@ async def _group_solo_combat_and_abyss(
             cfg = await get_game_config_map(session)
             v1 = (
                 await gd_v1_cycle_service.get_active_v1_cycle(session, chat_id)
-                if chat_id
+                if chat_id and (routes is None or routes.gd)
                 else None
             )
             if v1 and cfg_bool(cfg, "gd_v1_skip_group_solo_while_active", default=False):
                 break
-            try:
-                result = await combat_service.process_message_damage(
-                    session=session,
-                    player_id=player_id,
-                    media_type=media_type,
-                    message_text=message_text,
-                    message_length=msg_len,
-                    source_chat_id=chat_id,
-                    source_chat_type=getattr(message.chat, "type", None),
-                    source_message_id=message.message_id,
-                )
-            except Exception as combat_exc:
-                logger.exception("solo combat failed pid=%s chat=%s", player_id, chat_id)
+            if routes is None or routes.solo:
                 try:
-                    await session.rollback()
-                    from waifu_bot.services.combat import log_solo_combat_processing_error
-
-                    await log_solo_combat_processing_error(
-                        session,
-                        player_id,
+                    result = await combat_service.process_message_damage(
+                        session=session,
+                        player_id=player_id,
                         media_type=media_type,
+                        message_text=message_text,
                         message_length=msg_len,
-                        error_summary=str(combat_exc)[:200],
                         source_chat_id=chat_id,
+                        source_chat_type=getattr(message.chat, "type", None),
                         source_message_id=message.message_id,
                     )
-                except Exception:
-                    logger.exception(
-                        "failed to log solo combat error pid=%s chat=%s",
-                        player_id,
-                        chat_id,
-                    )
-            else:
-                if result.get("error"):
-                    logger.info(
-                        "group combat result: error=%s player=%s chat_id=%s",
-                        result.get("error"), player_id, chat_id,
-                    )
+                except Exception as combat_exc:
+                    logger.exception("solo combat failed pid=%s chat=%s", player_id, chat_id)
+                    try:
+                        await session.rollback()
+                        from waifu_bot.services.combat import log_solo_combat_processing_error
+
+                        await log_solo_combat_processing_error(
+                            session,
+                            player_id,
+                            media_type=media_type,
+                            message_length=msg_len,
+                            error_summary=str(combat_exc)[:200],
+                            source_chat_id=chat_id,
+                            source_message_id=message.message_id,
+                        )
+                    except Exception:
+                        logger.exception(
+                            "failed to log solo combat error pid=%s chat=%s",
+                            player_id,
+                            chat_id,
+                        )
                 else:
-                    logger.info(
-                        "group combat hit: player=%s chat_id=%s dmg=%s",
-                        player_id, chat_id, result.get("damage"),
-                    )
-                    if result.get("dungeon_completed"):
-                        await solo_active_cache_mod.mark_solo_inactive(_redis, player_id)
+                    if result.get("error"):
+                        logger.info(
+                            "group combat result: error=%s player=%s chat_id=%s",
+                            result.get("error"), player_id, chat_id,
+                        )
+                    else:
+                        logger.info(
+                            "group combat hit: player=%s chat_id=%s dmg=%s",
+                            player_id, chat_id, result.get("damage"),
+                        )
+                        if result.get("dungeon_completed"):
+                            await solo_active_cache_mod.mark_solo_inactive(_redis, player_id)
 
+            if routes is not None and not routes.abyss:
+                break
             try:
                 from waifu_bot.services.abyss_combat import handle_abyss_attack
                 from waifu_bot.services import abyss_notify
@@ -416,6 +476,7 @@ async def _group_solo_combat_and_abyss(
                     media_type=media_type,
                     message_text=message_text,
                     message_length=msg_len,
+                    redis=_redis,
                 )
                 if abyss_res and not abyss_res.get("error"):
                     logger.info(
@@ -446,8 +507,19 @@ async def _group_message_damage_body(
         from waifu_bot.services import solo_active_cache as solo_active_cache_mod
 
         _redis = redis_core.get_redis()
-        solo_cached = await solo_active_cache_mod.has_solo_active_cached(_redis, player_id)
-        if solo_cached is not False:
+        # One pipelined HMGET decides which modes this message can touch (None = Redis down).
+        routes = None
+        if settings.activity_modes_enabled:
+            try:
+                routes = await resolve_routes(_redis, player_id, chat_id)
+            except Exception:
+                logger.debug("activity modes lookup failed pid=%s chat=%s", player_id, chat_id, exc_info=True)
+        if routes is not None:
+            run_solo = routes.solo or routes.abyss
+        else:
+            solo_cached = await solo_active_cache_mod.has_solo_active_cached(_redis, player_id)
+            run_solo = solo_cached is not False
+        if run_solo:
             await _group_solo_combat_and_abyss(
                 bot,
                 message,
@@ -456,41 +528,10 @@ async def _group_message_damage_body(
                 media_type=media_type,
                 message_text=message_text,
                 msg_len=msg_len,
+                routes=routes,
             )
 
         async for session in get_session():
-            if chat_id is not None and int(chat_id) < 0:
-                try:
-                    from waifu_bot.services.player_chats import touch_player_chat_seen
-
-                    await touch_player_chat_seen(session, player_id, int(chat_id))
-                except Exception:
-                    logger.debug("touch_player_chat_seen failed pid=%s chat=%s", player_id, chat_id, exc_info=True)
-                try:
-                    from waifu_bot.services.bot_group_chats import touch_bot_group_chat_activity
-
-                    await touch_bot_group_chat_activity(session, int(chat_id))
-                except Exception:
-                    logger.debug("touch_bot_group_chat_activity failed chat=%s", chat_id, exc_info=True)
-            try:
-                from waifu_bot.services.guild_quest_service import record_metric
-
-                _chat_metrics: list[tuple[str, int]] = []
-                if message.sticker:
-                    _chat_metrics.append(("stickers_sent", 1))
-                elif message.animation:
-                    _chat_metrics.append(("gifs_sent", 1))
-                elif message.video:
-                    _chat_metrics.append(("videos_sent", 1))
-                elif message.voice or message.audio:
-                    _chat_metrics.append(("audio_messages_sent", 1))
-                if message_text and str(message_text).strip():
-                    _chat_metrics.append(("text_messages_sent", 1))
-                for _m, _d in _chat_metrics:
-                    await record_metric(session, player_id, _m, _d)
-            except Exception:
-                logger.debug("guild quest chat hook failed pid=%s", player_id, exc_info=True)
-
             try:
                 text_chars = len(message_text) if message_text else 0
                 cfg = await get_game_config_map(session)
@@ -508,11 +549,11 @@ async def _group_message_damage_body(
 
             v1 = (
                 await gd_v1_cycle_service.get_active_v1_cycle(session, chat_id)
-                if chat_id
+                if chat_id and (routes is None or routes.gd)
                 else None
             )
+            td, media = _gd_v1_media_and_text_len(message) if v1 else (0, None)
             if v1:
-                td, media = _gd_v1_media_and_text_len(message)
                 from waifu_bot.services.gd_daily_stats import (
                     calc_snapshot_message_damage,
                     media_type_to_day_key,
@@ -558,50 +599,28 @@ async def _group_message_damage_body(
                     text_chars=int(msg_len or 0),
                     ephemeral_text=message_text if is_participant else None,
                 )
-                from waifu_bot.services import guild_progress as guild_prog
-
-                media_list = [media] if media else None
-                await guild_prog.apply_gd_chat_gxp(
-                    session, player_id, text_delta=td, media_kinds=media_list
-                )
-                if td > 0:
-                    await guild_prog.apply_war_activity(session, player_id, "chat_text")
-                if media_list:
-                    await guild_prog.apply_war_activity(
-                        session, player_id, "chat_media", media_kinds=media_list
-                    )
                 await session.commit()
 
-            from waifu_bot.services.guild_raid_service import apply_raid_message_damage
-
-            mt: list[str] = []
-            if message.photo:
-                mt.append("photo")
-            elif message.video:
-                mt.append("video")
-            elif message.animation:
-                mt.append("gif")
-            elif message.voice or message.audio:
-                mt.append("voice")
-            elif message.sticker:
-                mt.append("sticker")
+            # Chat seen / guild quests / GD GXP + war score / raid log: deferred to the
+            # chat activity stream (chat_activity_bus); applied inline without Redis.
             if chat_id is not None:
-                rd = await apply_raid_message_damage(
-                    session,
-                    int(chat_id),
-                    player_id,
-                    message_length=msg_len,
-                    media_types=mt or None,
+                event = _chat_activity_event(
+                    message,
+                    chat_id=int(chat_id),
+                    player_id=player_id,
+                    message_text=message_text,
+                    msg_len=msg_len,
+                    gd=v1 is not None,
+                    text_delta=td,
+                    media_kind=media,
+                    raid=routes is None or routes.raid,
                 )
-                if rd.get("ok") and rd.get("damage"):
-                    logger.info(
-                        "group guild raid hit: player=%s chat_id=%s dmg=%s",
-                        player_id,
-                        chat_id,
-                        rd.get("damage"),
-                    )
-                elif rd.get("logged"):
-                    logger.debug("guild raid chat logged player=%s chat_id=%s", player_id, chat_id)
+                published = settings.chat_activity_bus_enabled and await chat_activity_bus.publish_event(
+                    _redis, event
+                )
+                if not published:
+                    await chat_activity_bus.apply_events(session, [event])
+                    await session.commit()
             break
     except Exception:
         logger.exception("Failed to process group message for player %s", player_id)
@@ -0,0 +1,293 @@
+"""MSK calendar scheduler for background jobs (shared by inline loops and Dramatiq scheduler).
+
+Calendar ticks fire on cron-like MSK marks instead of polling. Each job keeps its last
+claimed slot in ``scheduled_job_runs``; a worker claims a slot with a single conditional
+UPDATE, so only one process runs it. Slots missed while everything was down are replayed
+on the next wake (bounded by ``BackgroundTickSpec.catch_up``).
+"""
+from __future__ import annotations
+
+import logging
+import random
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import TYPE_CHECKING
+
+from sqlalchemy import and_, case, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from waifu_bot.db.models.scheduler import ScheduledJobRun
+from waifu_bot.game.msk_time import _msk_zone, msk_now
+from waifu_bot.services.background_lock import _INSTANCE_ID
+from waifu_bot.services.query_budget import run_in_scope
+
+if TYPE_CHECKING:
+    from waifu_bot.services.background_ticks import BackgroundTickSpec
+
+logger = logging.getLogger(__name__)
+
+# Running claims older than this are considered crashed and may be re-claimed.
+DEFAULT_LEASE_SEC = 900
+# How far back previous_fire() searches for a matching day (covers "29 2 *" style specs).
+_MAX_LOOKBACK_DAYS = 366 * 8
+
+_FIELD_BOUNDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),
+)
+
+
+def _parse_field(raw: str, lo: int, hi: int) -> frozenset[int]:
+    values: set[int] = set()
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            raise ValueError(f"empty cron field part in {raw!r}")
+        step = 1
+        if "/" in part:
+            part, step_s = part.split("/", 1)
+            step = int(step_s)
+            if step <= 0:
+                raise ValueError(f"bad cron step {raw!r}")
+        if part == "*":
+            start, end = lo, hi
+        elif "-" in part:
+            a, b = part.split("-", 1)
+            start, end = int(a), int(b)
+        else:
+            start = int(part)
+            end = hi if step != 1 else start
+        if start < lo or end > hi or start > end:
+            raise ValueError(f"cron value out of range {raw!r} ({lo}-{hi})")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+@dataclass(frozen=True)
+class MskCron:
+    """Five-field cron expression (``min hour dom month dow``) evaluated in Europe/Moscow.
+
+    Weekday follows cron: 0 and 7 are Sunday, 1 is Monday. When both day-of-month and
+    day-of-week are restricted, a day matches if either does (classic cron semantics).
+    """
+
+    expr: str
+    minutes: tuple[int, ...]
+    hours: tuple[int, ...]
+    days: frozenset[int]
+    months: frozenset[int]
+    weekdays: frozenset[int]
+    day_restricted: bool
+    weekday_restricted: bool
+
+    @classmethod
+    def parse(cls, expr: str) -> "MskCron":
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron expression needs 5 fields: {expr!r}")
+        parsed = [_parse_field(raw, lo, hi) for raw, (_, lo, hi) in zip(parts, _FIELD_BOUNDS)]
+        weekdays = frozenset(0 if d == 7 else d for d in parsed[4])
+        return cls(
+            expr=expr,
+            minutes=tuple(sorted(parsed[0])),
+            hours=tuple(sorted(parsed[1])),
+            days=parsed[2],
+            months=parsed[3],
+            weekdays=weekdays,
+            day_restricted=parts[2] != "*",
+            weekday_restricted=parts[4] != "*",
+        )
+
+    def _day_matches(self, d: date) -> bool:
+        if d.month not in self.months:
+            return False
+        dom_ok = d.day in self.days
+        dow_ok = ((d.weekday() + 1) % 7) in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return dom_ok or dow_ok
+        return dom_ok and dow_ok
+
+    def previous_fire(self, at: datetime | None = None) -> datetime | None:
+        """Latest fire instant <= ``at`` (UTC-aware), or None if nothing matches."""
+        msk = _msk_zone()
+        local = msk_now(at).replace(second=0, microsecond=0)
+        today = local.date()
+        for back in range(_MAX_LOOKBACK_DAYS):
+            d = today - timedelta(days=back)
+            if not self._day_matches(d):
+                continue
+            for h in reversed(self.hours):
+                if back == 0 and h > local.hour:
+                    continue
+                for m in reversed(self.minutes):
+                    if back == 0 and h == local.hour and m > local.minute:
+                        continue
+                    return datetime(d.year, d.month, d.day, h, m, tzinfo=msk).astimezone(timezone.utc)
+        return None
+
+    def next_fire(self, after: datetime | None = None) -> datetime | None:
+        """Earliest fire instant strictly after ``after`` (UTC-aware)."""
+        msk = _msk_zone()
+        local = msk_now(after)
+        today = local.date()
+        for fwd in range(_MAX_LOOKBACK_DAYS):
+            d = today + timedelta(days=fwd)
+            if not self._day_matches(d):
+                continue
+            for h in self.hours:
+                for m in self.minutes:
+                    cand = datetime(d.year, d.month, d.day, h, m, tzinfo=msk)
+                    if cand > local:
+                        return cand.astimezone(timezone.utc)
+        return None
+
+
+def due_slots(
+    cron: MskCron,
+    last_slot_at: datetime | None,
+    *,
+    now: datetime,
+    limit: int = 1,
+) -> list[datetime]:
+    """Slots in (last_slot_at, now], oldest first, keeping only the newest ``limit``."""
+    out: list[datetime] = []
+    cursor = cron.previous_fire(now)
+    while cursor is not None and len(out) < max(1, int(limit)):
+        if last_slot_at is not None and cursor <= last_slot_at:
+            break
+        out.append(cursor)
+        cursor = cron.previous_fire(cursor - timedelta(minutes=1))
+    out.reverse()
+    return out
+
+
+def seconds_until_next(cron: MskCron, *, now: datetime | None = None, jitter_sec: float = 0.0) -> float:
+    """Sleep duration until the next slot plus a random jitter (spreads workers/Redis load)."""
+    now = now or datetime.now(timezone.utc)
+    nxt = cron.next_fire(now)
+    if nxt is None:
+        return float("inf")
+    delay = max(0.0, (nxt - now).total_seconds())
+    if jitter_sec > 0:
+        delay += random.uniform(0.0, float(jitter_sec))
+    return delay
+
+
+# ---------------------------------------------------------------------------
+# Ledger
+# ---------------------------------------------------------------------------
+
+async def ensure_ledger_row(
+    session: AsyncSession,
+    job_name: str,
+    *,
+    seed_slot_at: datetime | None,
+) -> ScheduledJobRun:
+    """Create the ledger row on first sight. ``seed_slot_at`` marks a slot as already done."""
+    await session.execute(
+        pg_insert(ScheduledJobRun)
+        .values(job_name=job_name, last_slot_at=seed_slot_at, status="idle")
+        .on_conflict_do_nothing(index_elements=[ScheduledJobRun.job_name])
+    )
+    row = await session.scalar(select(ScheduledJobRun).where(ScheduledJobRun.job_name == job_name))
+    assert row is not None
+    return row
+
+
+async def claim_slot(
+    session: AsyncSession,
+    job_name: str,
+    slot_at: datetime,
+    *,
+    now: datetime,
+    lease_sec: int = DEFAULT_LEASE_SEC,
+) -> bool:
+    """Atomically advance ``last_slot_at`` to ``slot_at``. True only for the winning worker.
+
+    A slot still marked ``running`` with an expired lease (crashed worker) can be re-claimed.
+    """
+    t = ScheduledJobRun
+    stale_same_slot = and_(t.last_slot_at == slot_at, t.status == "running", t.lease_until < now)
+    result = await session.execute(
+        update(t)
+        .where(t.job_name == job_name)
+        .where(or_(t.last_slot_at.is_(None), t.last_slot_at < slot_at, stale_same_slot))
+        .values(
+            prev_slot_at=case((t.last_slot_at == slot_at, t.prev_slot_at), else_=t.last_slot_at),
+            last_slot_at=slot_at,
+            status="running",
+            claimed_by=_INSTANCE_ID,
+            lease_until=now + timedelta(seconds=max(1, int(lease_sec))),
+            started_at=now,
+            last_error=None,
+            updated_at=now,
+        )
+        .returning(t.job_name)
+        .execution_options(synchronize_session=False)
+    )
+    claimed = result.scalar_one_or_none() is not None
+    await session.commit()
+    return claimed
+
+
+async def finish_slot(
+    session: AsyncSession,
+    job_name: str,
+    slot_at: datetime,
+    *,
+    error: str | None = None,
+) -> None:
+    """Mark the claimed slot done; on error, roll the ledger back so the next wake retries."""
+    t = ScheduledJobRun
+    now = datetime.now(timezone.utc)
+    values: dict = {"finished_at": now, "updated_at": now, "lease_until": None}
+    if error is None:
+        values["status"] = "ok"
+    else:
+        values.update(status="failed", last_slot_at=t.prev_slot_at, last_error=error[:2000])
+    await session.execute(
+        update(t)
+        .where(t.job_name == job_name, t.last_slot_at == slot_at, t.claimed_by == _INSTANCE_ID)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+
+
+async def run_scheduled_tick(spec: "BackgroundTickSpec", *, now: datetime | None = None) -> int:
+    """Claim and run every due slot of a calendar spec. Returns number of slots executed."""
+    from waifu_bot.db.session import get_session, init_engine
+
+    assert spec.schedule is not None
+    cron = MskCron.parse(spec.schedule)
+    now = now or datetime.now(timezone.utc)
+    init_engine()
+    ran = 0
+    async for session in get_session():
+        seed = None if spec.run_on_bootstrap else cron.previous_fire(now)
+        row = await ensure_ledger_row(session, spec.name, seed_slot_at=seed)
+        last = row.last_slot_at
+        slots = due_slots(cron, last, now=now, limit=spec.catch_up)
+        if last is not None and row.status == "running" and row.lease_until is not None and row.lease_until < now:
+            # Crashed run: due_slots starts after last_slot_at, so retry that slot first.
+            slots.insert(0, last)
+        await session.commit()
+        for slot in slots:
+            if not await claim_slot(session, spec.name, slot, now=now):
+                continue
+            try:
+                await run_in_scope(f"tick:{spec.name}", spec.fn, slot)
+            except Exception as exc:
+                logger.exception("scheduled job %s failed slot=%s", spec.name, slot.isoformat())
+                await session.rollback()
+                await finish_slot(session, spec.name, slot, error=repr(exc))
+                break
+            await finish_slot(session, spec.name, slot)
+            ran += 1
+            logger.info("scheduled job %s done slot=%s", spec.name, slot.isoformat())
+        break
+    return ran
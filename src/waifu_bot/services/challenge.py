@@ -611,34 +611,18 @@ async def settle_challenge_run(
             )
         except Exception:
             pass
-        await wallet_svc.add_gold(
-            session,
-            await session.get(m.Player, int(run.player_id)),
-            int(inst.stipend_gold),
-            source="challenge_first",
-            ref_type="challenge_progress",
-            ref_id=int(prog_locked.id),
-        )
+        pid = int(run.player_id)
+        ref = int(prog_locked.id)
+        tx = wallet_svc.WalletTx()
+        tx.credit(pid, "gold", int(inst.stipend_gold), source="challenge_first",
+                  ref_type="challenge_progress", ref_id=ref)
         if int(inst.dust_bonus or 0) > 0:
-            await wallet_svc.add(
-                session,
-                int(run.player_id),
-                "enchant_dust",
-                int(inst.dust_bonus),
-                source="challenge_first",
-                ref_type="challenge_progress_dust",
-                ref_id=int(prog_locked.id),
-            )
+            tx.credit(pid, "enchant_dust", int(inst.dust_bonus), source="challenge_first",
+                      ref_type="challenge_progress_dust", ref_id=ref)
         if float(inst.core_chance or 0) > 0 and random.random() < float(inst.core_chance):
-            await wallet_svc.add(
-                session,
-                int(run.player_id),
-                "refine_core",
-                1,
-                source="challenge_first",
-                ref_type="challenge_progress_core",
-                ref_id=int(prog_locked.id),
-            )
+            tx.credit(pid, "refine_core", 1, source="challenge_first",
+                      ref_type="challenge_progress_core", ref_id=ref)
+        await wallet_svc.apply_tx(session, tx)
         item_payload = await _roll_challenge_item(
             session, run, inst, first_clear=True
         )
@@ -0,0 +1,273 @@
+"""Chat activity bus: non-combat group-message side effects via a Redis Stream.
+
+Each group message used to run a serial chain of writes on the webhook request — chat
+first-seen, bot group activity, guild quest metrics (one call per metric), GD chat GXP,
+guild war chat score and the raid v2 chat log. Now the handler appends one compact event
+to ``chat:activity`` and returns after the latency-sensitive path (combat, GD round buffer,
+chat rewards). The ``chat_activity_drain`` tick reads the stream through the consumer
+group ``chat_side_effects`` and applies each batch in one transaction, aggregated per
+player / chat: one touch per (player, chat), one ``record_metric`` per (player, metric)
+with the summed delta, one GXP / war-score update per player, one raid log lookup per chat.
+
+Delivery:
+
+* idempotency key ``chat:activity:seen:{chat_id}:{message_id}`` — a Telegram retry of the
+  same update is not appended twice (``CHAT_ACTIVITY_PUBLISH``: ``SET NX`` + ``XADD``);
+* at-least-once — entries are ``XACK``ed after commit; entries left pending by a crashed
+  consumer are re-claimed with ``XAUTOCLAIM`` after ``CLAIM_IDLE_MS``;
+* a failing batch is retried event by event; an event that still fails is logged and
+  acked so it cannot block the stream;
+* lag — ``chat_activity_lag_ms`` (event age at apply, perf_metrics) and ``stream_stats``
+  (length / pending / undelivered).
+
+Redis unavailable → ``publish_event`` returns False and the handler applies the event
+inline (previous behaviour).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from waifu_bot.services.redis_scripts import CHAT_ACTIVITY_PUBLISH, run_script
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "chat:activity"
+GROUP = "chat_side_effects"
+SEEN_KEY_PREFIX = "chat:activity:seen:"
+SEEN_TTL_SEC = 86400
+# Approximate cap (XADD MAXLEN ~): about a day of traffic at Stage 1 volume.
+STREAM_MAXLEN = 200_000
+BATCH_SIZE = 500
+# Pending entries idle this long belong to a dead consumer and are re-claimed.
+CLAIM_IDLE_MS = 60_000
+LAG_WARN_ENTRIES = 5_000
+
+CONSUMER_NAME = f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass(frozen=True)
+class ChatActivityEvent:
+    """One group message, reduced to what the deferred side effects need."""
+
+    player_id: int
+    chat_id: int
+    message_id: int
+    ts: int
+    # guild_quest_service metric names (delta 1 each).
+    metrics: tuple[str, ...] = ()
+    # GD v1 active in the chat: apply GD chat GXP + war chat score.
+    gd: bool = False
+    text_delta: int = 0
+    media_kind: str | None = None
+    # Raid v2 chat log (guild raid active in the chat).
+    raid: bool = False
+    message_length: int = 0
+    raid_media: tuple[str, ...] = ()
+
+    def to_fields(self) -> dict[str, str]:
+        fields = {
+            "p": str(self.player_id),
+            "c": str(self.chat_id),
+            "m": str(self.message_id),
+            "t": str(self.ts),
+        }
+        if self.metrics:
+            fields["q"] = ",".join(self.metrics)
+        if self.gd:
+            fields["g"] = str(self.text_delta)
+            if self.media_kind:
+                fields["gm"] = self.media_kind
+        if self.raid:
+            fields["r"] = str(self.message_length)
+            if self.raid_media:
+                fields["rm"] = ",".join(self.raid_media)
+        return fields
+
+    @classmethod
+    def from_fields(cls, fields: dict[str, Any]) -> "ChatActivityEvent":
+        def _csv(name: str) -> tuple[str, ...]:
+            raw = fields.get(name) or ""
+            return tuple(x for x in str(raw).split(",") if x)
+
+        return cls(
+            player_id=int(fields["p"]),
+            chat_id=int(fields["c"]),
+            message_id=int(fields["m"]),
+            ts=int(fields["t"]),
+            metrics=_csv("q"),
+            gd="g" in fields,
+            text_delta=int(fields.get("g") or 0),
+            media_kind=fields.get("gm") or None,
+            raid="r" in fields,
+            message_length=int(fields.get("r") or 0),
+            raid_media=_csv("rm"),
+        )
+
+
+def _seen_key(event: ChatActivityEvent) -> str:
+    return f"{SEEN_KEY_PREFIX}{event.chat_id}:{event.message_id}"
+
+
+async def publish_event(redis: Any, event: ChatActivityEvent) -> bool:
+    """Append to the stream. True = handled (appended or duplicate); False = apply inline."""
+    if redis is None:
+        return False
+    args: list[Any] = [SEEN_TTL_SEC, STREAM_MAXLEN]
+    for k, v in event.to_fields().items():
+        args.extend((k, v))
+    try:
+        added = await run_script(redis, CHAT_ACTIVITY_PUBLISH, [_seen_key(event), STREAM_KEY], args)
+    except RedisError:
+        logger.warning("chat activity publish failed pid=%s chat=%s", event.player_id, event.chat_id, exc_info=True)
+        return False
+    if not added:
+        logger.debug("chat activity duplicate chat=%s msg=%s", event.chat_id, event.message_id)
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Apply (shared by the consumer and the inline fallback)
+# ---------------------------------------------------------------------------
+
+
+async def apply_events(session: AsyncSession, events: list[ChatActivityEvent]) -> None:
+    """Apply side effects of a batch, aggregated per player / chat. Caller commits."""
+    from waifu_bot.services import guild_progress as guild_prog
+    from waifu_bot.services.bot_group_chats import touch_bot_group_chat_activity
+    from waifu_bot.services.guild_quest_service import record_metric
+    from waifu_bot.services.guild_raid_v2_service import log_raid_chat_events
+    from waifu_bot.services.player_chats import touch_player_chat_seen
+
+    seen: dict[tuple[int, int], int] = {}
+    chat_last: dict[int, int] = {}
+    metrics: Counter[tuple[int, str]] = Counter()
+    gd_text: Counter[int] = Counter()
+    gd_media: Counter[int] = Counter()
+    raid: dict[int, list[tuple[int, datetime, int, list[str] | None]]] = defaultdict(list)
+    for ev in events:
+        if ev.chat_id < 0:
+            seen.setdefault((ev.player_id, ev.chat_id), ev.ts)
+            chat_last[ev.chat_id] = max(chat_last.get(ev.chat_id, 0), ev.ts)
+        for name in ev.metrics:
+            metrics[(ev.player_id, name)] += 1
+        if ev.gd:
+            gd_text[ev.player_id] += 1 if ev.text_delta > 0 else 0
+            gd_media[ev.player_id] += 1 if ev.media_kind else 0
+        if ev.raid:
+            raid[ev.chat_id].append(
+                (
+                    ev.player_id,
+                    datetime.fromtimestamp(ev.ts, tz=timezone.utc),
+                    ev.message_length,
+                    list(ev.raid_media) or None,
+                )
+            )
+
+    for (player_id, chat_id), ts in seen.items():
+        await touch_player_chat_seen(session, player_id, chat_id, at=datetime.fromtimestamp(ts, tz=timezone.utc))
+    for chat_id, ts in chat_last.items():
+        await touch_bot_group_chat_activity(session, chat_id, at=datetime.fromtimestamp(ts, tz=timezone.utc))
+    for (player_id, name), delta in metrics.items():
+        await record_metric(session, player_id, name, delta)
+    for player_id in gd_text.keys() | gd_media.keys():
+        text_n, media_n = gd_text[player_id], gd_media[player_id]
+        await guild_prog.apply_gd_chat_gxp_totals(session, player_id, text_messages=text_n, media_items=media_n)
+        await guild_prog.apply_war_chat_activity(session, player_id, text_messages=text_n, media_items=media_n)
+    for chat_id, rows in raid.items():
+        await log_raid_chat_events(session, chat_id, rows)
+
+
+# ---------------------------------------------------------------------------
+# Consumer
+# ---------------------------------------------------------------------------
+
+
+async def ensure_group(redis: Any) -> None:
+    try:
+        await redis.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+    except ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+def _parse_entries(entries: list[Any]) -> tuple[list[str], list[ChatActivityEvent]]:
+    ids: list[str] = []
+    events: list[ChatActivityEvent] = []
+    for entry_id, fields in entries:
+        ids.append(entry_id)
+        try:
+            events.append(ChatActivityEvent.from_fields(fields))
+        except (KeyError, TypeError, ValueError):
+            logger.warning("chat activity: dropping malformed entry id=%s fields=%s", entry_id, fields)
+    return ids, events
+
+
+async def _read_batch(redis: Any, count: int) -> list[Any]:
+    claimed = await redis.xautoclaim(STREAM_KEY, GROUP, CONSUMER_NAME, CLAIM_IDLE_MS, start_id="0-0", count=count)
+    entries = list(claimed[1] or []) if claimed else []
+    if len(entries) < count:
+        for _stream, fresh in await redis.xreadgroup(
+            GROUP, CONSUMER_NAME, {STREAM_KEY: ">"}, count=count - len(entries)
+        ):
+            entries.extend(fresh)
+    return entries
+
+
+async def _apply_with_isolation(session: AsyncSession, events: list[ChatActivityEvent]) -> int:
+    """Whole batch in one transaction; on failure, event by event. Returns failed count."""
+    try:
+        await apply_events(session, events)
+        await session.commit()
+        return 0
+    except Exception:
+        await session.rollback()
+        logger.exception("chat activity batch failed (%d events), retrying one by one", len(events))
+    failed = 0
+    for ev in events:
+        try:
+            await apply_events(session, [ev])
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            failed += 1
+            logger.exception("chat activity event dropped pid=%s chat=%s msg=%s", ev.player_id, ev.chat_id, ev.message_id)
+    return failed
+
+
+async def drain_once(session: AsyncSession, redis: Any, *, count: int = BATCH_SIZE) -> int:
+    """Apply one batch from the stream; returns the number of entries acked."""
+    await ensure_group(redis)
+    entries = await _read_batch(redis, count)
+    if not entries:
+        return 0
+    ids, events = _parse_entries(entries)
+    if events:
+        await _apply_with_isolation(session, events)
+        from waifu_bot.services.perf_metrics import record_ms
+
+        record_ms("chat_activity_lag_ms", max(0.0, time.time() - min(ev.ts for ev in events)) * 1000.0)
+    await redis.xack(STREAM_KEY, GROUP, *ids)
+    return len(ids)
+
+
+async def stream_stats(redis: Any) -> dict[str, int]:
+    """Stream length, pending (delivered, not acked) and lag (not yet delivered)."""
+    length = int(await redis.xlen(STREAM_KEY) or 0)
+    for group in await redis.xinfo_groups(STREAM_KEY):
+        if str(group.get("name")) == GROUP:
+            return {
+                "length": length,
+                "pending": int(group.get("pending") or 0),
+                "lag": int(group.get("lag") or 0),
+            }
+    return {"length": length, "pending": 0, "lag": length}
@@ -27,6 +27,12 @@ from waifu_bot.services.guild_skill_effects import (
     pct_bonus_lines_ru,
 )
 from waifu_bot.services.passive_skills import get_passive_skill_bonuses
+from waifu_bot.services.redis_scripts import (
+    CHAT_REWARD_COMMIT,
+    CHAT_REWARD_DRAIN,
+    CHAT_REWARD_GATE,
+    run_script,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -254,7 +260,7 @@ async def _redis_hgetall_ints(redis: Any, key: str) -> dict[str, int]:
         return {}
 
 
-async def _get_today_points(session: AsyncSession, redis: Any, player_id: int, day: date) -> int:
+async def _db_today_points(session: AsyncSession, player_id: int, day: date) -> int:
     row = (
         await session.execute(
             select(PlayerChatActivityDaily.points).where(
@@ -263,21 +269,18 @@ async def _get_today_points(session: AsyncSession, redis: Any, player_id: int, d
             )
         )
     ).scalar_one_or_none()
-    db_pts = int(row or 0)
-    redis_pts = await _redis_get_int(redis, _daily_pts_key(player_id, day))
-    return db_pts + redis_pts
+    return int(row or 0)
 
 
-async def _record_unique_author(redis: Any, chat_id: int | None, player_id: int) -> int:
-    if not redis or chat_id is None:
-        return 0
-    try:
-        key = _authors_key(chat_id)
-        await redis.sadd(key, str(int(player_id)))
-        await redis.expire(key, AUTHORS_TTL_SECONDS)
-        return int(await redis.scard(key) or 0)
-    except Exception:
-        return 0
+def _int_pairs(flat: list[Any] | None) -> dict[str, int]:
+    out: dict[str, int] = {}
+    items = list(flat or [])
+    for k, v in zip(items[::2], items[1::2]):
+        try:
+            out[k.decode() if isinstance(k, bytes) else str(k)] = int(v or 0)
+        except (TypeError, ValueError):
+            continue
+    return out
 
 
 async def buffer_chat_reward(
@@ -328,17 +331,25 @@ async def try_award_chat_message(
         return False
 
     cooldown_s = max(1, cfg_int(cfg, "chat_reward.min_seconds_between_msgs", 8))
+    day = _today_msk()
+    redis_pts = unique_authors = 0
     if redis:
+        # One round trip: cooldown, buffered points today, chat's unique authors.
+        keys = [_cd_key(player_id), _daily_pts_key(player_id, day)]
+        if chat_id is not None:
+            keys.append(_authors_key(chat_id))
         try:
-            ok = await redis.set(_cd_key(player_id), "1", nx=True, ex=cooldown_s)
-            if not ok:
+            passed, redis_pts, unique_authors = await run_script(
+                redis, CHAT_REWARD_GATE, keys, [cooldown_s, int(player_id), AUTHORS_TTL_SECONDS]
+            )
+            if not int(passed):
                 return False
         except Exception:
             logger.exception("chat reward cooldown check failed player_id=%s", player_id)
 
-    day = _today_msk()
     daily_cap = cfg_int(cfg, "chat_reward.daily_points_cap", 600)
-    today_pts = await _get_today_points(session, redis, player_id, day)
+    db_pts = await _db_today_points(session, player_id, day)
+    today_pts = db_pts + int(redis_pts or 0)
     if today_pts >= daily_cap:
         return False
 
@@ -351,10 +362,21 @@ async def try_award_chat_message(
     if points <= 0:
         return False
 
-    unique_authors = await _record_unique_author(redis, chat_id, player_id)
-    br = await resolve_multipliers(session, player_id, unique_authors_in_chat=unique_authors)
+    br = await resolve_multipliers(session, player_id, unique_authors_in_chat=int(unique_authors or 0))
     gold, exp = _points_to_rewards(points, cfg, br)
-    await buffer_chat_reward(redis, player_id, gold=gold, exp=exp, points=points, day=day)
+    if redis:
+        # Second round trip: buffer + re-check the cap against concurrent messages.
+        try:
+            buffered = await run_script(
+                redis,
+                CHAT_REWARD_COMMIT,
+                [_buf_key(player_id), _daily_pts_key(player_id, day)],
+                [db_pts, daily_cap, points, gold, exp, BUF_TTL_SECONDS],
+            )
+            if not int(buffered or 0):
+                return False
+        except Exception:
+            logger.exception("buffer_chat_reward failed player_id=%s", player_id)
     try:
         from waifu_bot.services.hidden_skills import increment_skill_counter
 
@@ -409,8 +431,15 @@ async def _flush_player_buffer(
 ) -> bool:
     if not redis:
         return False
-    key = _buf_key(player_id)
-    data = await _redis_hgetall_ints(redis, key)
+    day = _today_msk()
+    try:
+        # Read and delete in one step: messages buffered meanwhile land in a fresh hash.
+        data = _int_pairs(
+            await run_script(redis, CHAT_REWARD_DRAIN, [_buf_key(player_id), _daily_pts_key(player_id, day)])
+        )
+    except Exception:
+        logger.exception("flush: redis drain failed player_id=%s", player_id)
+        return False
     if not data or not any(data.get(k, 0) for k in ("gold", "exp", "points", "messages")):
         return False
 
@@ -424,7 +453,6 @@ async def _flush_player_buffer(
     wallet.exp = int(wallet.exp or 0) + exp
     wallet.last_buffered_at = datetime.now(timezone.utc)
 
-    day = _today_msk()
     daily = await _ensure_daily(session, player_id, day)
     daily.points = int(daily.points or 0) + points
     daily.gold_earned = int(daily.gold_earned or 0) + gold
@@ -443,12 +471,6 @@ async def _flush_player_buffer(
         total.chests_unlocked_count = int(total.chests_unlocked_count or 0) + new_chests
         total.last_chest_at = datetime.now(timezone.utc)
         daily.chests_granted = int(daily.chests_granted or 0) + new_chests
-
-    try:
-        await redis.delete(key)
-        await redis.delete(_daily_pts_key(player_id, day))
-    except Exception:
-        logger.exception("flush: redis delete failed player_id=%s", player_id)
     return True
 
 
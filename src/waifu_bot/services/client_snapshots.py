@@ -1,10 +1,16 @@
-"""Build and cache compact JSON snapshots for client hubs."""
+"""Build and cache compact JSON snapshots for client hubs.
+
+Freshness comes from per-player revision counters (``player_revisions``): each section
+remembers the domain revisions it was built from and only stale sections are rebuilt.
+Without Redis every section is rebuilt from the DB.
+"""
 from __future__ import annotations
 
 import logging
 from datetime import datetime, timezone
+from typing import Any
 
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -14,35 +20,47 @@ from waifu_bot.api.main_waifu_media import (
 )
 from waifu_bot.db import models as m
 from waifu_bot.game.economy import ECONOMY_TELEGRAM, normalize_economy
+from waifu_bot.services import player_revisions
 
 logger = logging.getLogger(__name__)
 
+# Snapshot section → revision domains it is built from.
+SECTION_DOMAINS: dict[str, tuple[str, ...]] = {
+    "hub": ("waifu", "wallet"),
+    "inventory": ("inventory",),
+    # Chronicle showcase scales with the main waifu level.
+    "mercenaries": ("roster", "waifu"),
+}
+ALL_SECTIONS = tuple(SECTION_DOMAINS)
+
 
 def _utc_now() -> datetime:
     return datetime.now(timezone.utc)
 
 
-async def _source_revision(session: AsyncSession, player_id: int) -> int:
-    """Cheap invalidation token from mutable row counts / levels."""
-    mw = await session.scalar(
-        select(m.MainWaifu.level).where(m.MainWaifu.player_id == player_id)
-    )
-    inv_n = await session.scalar(
-        select(func.count())
-        .select_from(m.InventoryItem)
-        .where(
-            m.InventoryItem.player_id == player_id,
-            m.InventoryItem.economy == ECONOMY_TELEGRAM,
-        )
-    )
-    merc_n = await session.scalar(
-        select(func.count()).select_from(m.HiredWaifu).where(m.HiredWaifu.player_id == player_id)
-    )
-    gold = await session.scalar(select(m.Player.gold).where(m.Player.id == player_id))
-    return int(mw or 0) * 1_000_003 + int(inv_n or 0) * 97 + int(merc_n or 0) * 13 + int(gold or 0)
+def _section_tokens(revisions: dict[str, Any]) -> dict[str, list[int]]:
+    return {
+        section: [int(revisions.get(d) or 0) for d in domains]
+        for section, domains in SECTION_DOMAINS.items()
+    }
 
 
-async def rebuild_client_snapshot(session: AsyncSession, player_id: int) -> m.PlayerClientSnapshot:
+def stale_sections(
+    snap: m.PlayerClientSnapshot | None,
+    revisions: dict[str, Any] | None,
+) -> tuple[str, ...]:
+    """Sections whose stored revision tokens differ from the current counters."""
+    if snap is None or revisions is None:
+        return ALL_SECTIONS
+    stored = snap.section_revisions_json or {}
+    if stored.get("epoch") != revisions.get(player_revisions.EPOCH_FIELD):
+        return ALL_SECTIONS
+    have = stored.get("sections") or {}
+    want = _section_tokens(revisions)
+    return tuple(s for s in ALL_SECTIONS if have.get(s) != want[s])
+
+
+async def _build_hub(session: AsyncSession, player_id: int) -> dict:
     player = (
         await session.execute(
             select(m.Player)
@@ -75,7 +93,10 @@ async def rebuild_client_snapshot(session: AsyncSession, player_id: int) -> m.Pl
             "portrait_url": main_waifu_profile_portrait_url(mw, player_id),
             "paperdoll_url": main_waifu_profile_paperdoll_url(mw, player_id),
         }
+    return hub
 
+
+async def _build_inventory(session: AsyncSession, player_id: int) -> tuple[dict, dict]:
     inv_rows = (
         await session.execute(
             select(m.InventoryItem).where(
@@ -102,7 +123,18 @@ async def rebuild_client_snapshot(session: AsyncSession, player_id: int) -> m.Pl
         else:
             bag_summary.append(card)
 
-    chronicle_lite = {}
+    loadout_json = {"economy": ECONOMY_TELEGRAM, "items": loadout}
+    summary_json = {
+        "economy": ECONOMY_TELEGRAM,
+        "equipped_count": len(loadout),
+        "bag_count": len(bag_summary),
+        "bag_preview": bag_summary[:40],
+    }
+    return loadout_json, summary_json
+
+
+async def _build_mercenaries(session: AsyncSession, player_id: int) -> dict:
+    chronicle_lite: dict = {}
     try:
         from waifu_bot.services.delve import lite_showcase, list_companions, companion_out
 
@@ -111,29 +143,52 @@ async def rebuild_client_snapshot(session: AsyncSession, player_id: int) -> m.Pl
         chronicle_lite["companions"] = companions
     except Exception:
         logger.debug("delve lite snapshot failed", exc_info=True)
-        companions = []
-
-    rev = await _source_revision(session, player_id)
-    snap = await session.get(m.PlayerClientSnapshot, player_id)
-    if not snap:
-        snap = m.PlayerClientSnapshot(player_id=player_id)
-        session.add(snap)
 
-    snap.hub_json = hub
-    snap.loadout_json = {"economy": ECONOMY_TELEGRAM, "items": loadout}
-    snap.inventory_summary_json = {
-        "economy": ECONOMY_TELEGRAM,
-        "equipped_count": len(loadout),
-        "bag_count": len(bag_summary),
-        "bag_preview": bag_summary[:40],
-    }
-    snap.mercenaries_summary_json = {
+    return {
         "count": len(chronicle_lite.get("companions") or []),
         "chronicle": chronicle_lite,
         "delve": chronicle_lite,
         "items": chronicle_lite.get("companions") or [],
     }
-    snap.source_revision = rev
+
+
+async def rebuild_client_snapshot(
+    session: AsyncSession,
+    player_id: int,
+    *,
+    sections: tuple[str, ...] = ALL_SECTIONS,
+    revisions: dict[str, Any] | None = None,
+) -> m.PlayerClientSnapshot:
+    """Rebuild ``sections`` and stamp them with ``revisions`` (None = untracked, rebuild next time)."""
+    snap = await session.get(m.PlayerClientSnapshot, player_id)
+    if snap is None or snap.hub_json is None:
+        sections = ALL_SECTIONS
+
+    if "hub" in sections:
+        hub = await _build_hub(session, player_id)
+    if snap is None:
+        snap = m.PlayerClientSnapshot(player_id=player_id)
+        session.add(snap)
+
+    if "hub" in sections:
+        snap.hub_json = hub
+    if "inventory" in sections:
+        snap.loadout_json, snap.inventory_summary_json = await _build_inventory(session, player_id)
+    if "mercenaries" in sections:
+        snap.mercenaries_summary_json = await _build_mercenaries(session, player_id)
+
+    if revisions is None:
+        snap.section_revisions_json = None
+        snap.source_revision = None
+    else:
+        stored = dict(snap.section_revisions_json or {})
+        if stored.get("epoch") != revisions.get(player_revisions.EPOCH_FIELD):
+            stored = {"epoch": revisions.get(player_revisions.EPOCH_FIELD), "sections": {}}
+        tokens = _section_tokens(revisions)
+        built = dict(stored.get("sections") or {})
+        built.update({s: tokens[s] for s in sections})
+        snap.section_revisions_json = {"epoch": stored["epoch"], "sections": built}
+        snap.source_revision = sum(int(revisions.get(d) or 0) for d in player_revisions.DOMAINS)
     snap.revision = int(snap.revision or 0) + 1
     snap.updated_at = _utc_now()
     await session.flush()
@@ -145,18 +200,16 @@ async def get_or_build_client_snapshot(
     player_id: int,
     *,
     force: bool = False,
+    redis: Any = None,
 ) -> dict:
+    revisions = await player_revisions.read_revisions(redis, player_id)
     snap = await session.get(m.PlayerClientSnapshot, player_id)
-    current_rev = await _source_revision(session, player_id)
-    stale = (
-        snap is None
-        or force
-        or snap.source_revision is None
-        or int(snap.source_revision) != current_rev
-    )
-    if stale:
+    sections = ALL_SECTIONS if force else stale_sections(snap, revisions)
+    if sections:
         try:
-            snap = await rebuild_client_snapshot(session, player_id)
+            snap = await rebuild_client_snapshot(
+                session, player_id, sections=sections, revisions=revisions
+            )
             await session.commit()
         except Exception:
             logger.exception("rebuild_client_snapshot failed player_id=%s", player_id)
@@ -0,0 +1,371 @@
+"""Write-behind layer for bestiary / item / affix codex bookkeeping.
+
+Hot paths (every solo hit, every generated or displayed item) used to upsert into
+``player_monster_codex`` / ``player_item_codex`` / ``player_affix_codex`` directly.
+Now they go through Redis:
+
+* ``codex:known:{player_id}`` — set of entries the player already has (``m:<tid>``,
+  ``i:<base_tid>``, ``a:<kind>:<id>``). Repeat sightings are one SADD, no SQL.
+* ``codex:buf:*`` hashes — new discoveries, item sighting counts and kill increments,
+  drained by the ``codex_flush`` background tick into batched multi-row upserts.
+
+Every function returns False when Redis is missing/down so callers fall back to the
+direct SQL path. Kill increments stay visible to the bestiary tier lookups while
+buffered (see ``pending_kills``). Delivery is at-least-once: a crash between the DB
+commit and the buffer delete replays that batch.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any
+
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from waifu_bot.db.models.dungeon import PlayerMonsterCodex
+from waifu_bot.db.models.item import PlayerAffixCodex, PlayerItemCodex
+
+logger = logging.getLogger(__name__)
+
+KNOWN_PREFIX = "codex:known:"
+KNOWN_TTL_SECONDS = 7 * 86400
+
+BUF_MONSTER_SEEN = "codex:buf:monster_seen"  # "pid:tid" -> first-seen epoch
+BUF_ITEM_SEEN = "codex:buf:item_seen"  # "pid:base_tid" -> sightings
+BUF_AFFIX_SEEN = "codex:buf:affix_seen"  # "pid:kind:id" -> first-seen epoch
+BUF_KILLS = "codex:buf:kills"  # "pid:tid" -> kills
+BUF_NEW_PLAYERS = "codex:buf:new_players"  # players with new item/affix discoveries
+INFLIGHT_SUFFIX = ":inflight"
+
+# Committed kills per player (hash tid -> kills); bestiary tier lookups add pending kills.
+KILLS_CACHE_PREFIX = "bestiary:kills:"
+KILLS_CACHE_TTL_SECONDS = 60
+
+FLUSH_CHUNK = 500
+
+
+def known_key(player_id: int) -> str:
+    return f"{KNOWN_PREFIX}{int(player_id)}"
+
+
+def kills_cache_key(player_id: int) -> str:
+    return f"{KILLS_CACHE_PREFIX}{int(player_id)}"
+
+
+def buffer_redis() -> Any | None:
+    """Process Redis client for write-behind, or None when disabled."""
+    from waifu_bot.core.config import settings
+
+    if not getattr(settings, "codex_write_behind_enabled", True):
+        return None
+    try:
+        from waifu_bot.core import redis as redis_core
+
+        return redis_core.get_redis()
+    except Exception:
+        return None
+
+
+async def _note(redis: Any, player_id: int, member: str, buf_key: str, field: str, *, count: bool) -> bool:
+    pipe = redis.pipeline(transaction=False)
+    pipe.sadd(known_key(player_id), member)
+    pipe.expire(known_key(player_id), KNOWN_TTL_SECONDS)
+    added, _ = await pipe.execute()
+    if count:
+        await redis.hincrby(buf_key, field, 1)
+    elif added:
+        await redis.hsetnx(buf_key, field, int(time.time()))
+    if added and buf_key != BUF_MONSTER_SEEN:
+        await redis.sadd(BUF_NEW_PLAYERS, int(player_id))
+    return True
+
+
+async def note_monster_seen(redis: Any, player_id: int, template_id: int) -> bool:
+    """Buffer a first encounter; repeat sightings cost one SADD round-trip."""
+    if redis is None or not template_id:
+        return False
+    try:
+        return await _note(
+            redis,
+            player_id,
+            f"m:{int(template_id)}",
+            BUF_MONSTER_SEEN,
+            f"{int(player_id)}:{int(template_id)}",
+            count=False,
+        )
+    except (RedisError, OSError):
+        logger.debug("codex buffer: monster seen fallback", exc_info=True)
+        return False
+
+
+async def note_item_seen(redis: Any, player_id: int, base_template_id: int) -> bool:
+    """Buffer an item sighting (``seen_count`` += 1 at flush)."""
+    if redis is None or not base_template_id:
+        return False
+    try:
+        return await _note(
+            redis,
+            player_id,
+            f"i:{int(base_template_id)}",
+            BUF_ITEM_SEEN,
+            f"{int(player_id)}:{int(base_template_id)}",
+            count=True,
+        )
+    except (RedisError, OSError):
+        logger.debug("codex buffer: item seen fallback", exc_info=True)
+        return False
+
+
+async def note_affix_seen(redis: Any, player_id: int, catalog_kind: str, catalog_id: int) -> bool:
+    if redis is None or not catalog_id:
+        return False
+    try:
+        return await _note(
+            redis,
+            player_id,
+            f"a:{catalog_kind}:{int(catalog_id)}",
+            BUF_AFFIX_SEEN,
+            f"{int(player_id)}:{catalog_kind}:{int(catalog_id)}",
+            count=False,
+        )
+    except (RedisError, OSError):
+        logger.debug("codex buffer: affix seen fallback", exc_info=True)
+        return False
+
+
+async def note_kill(redis: Any, player_id: int, template_id: int) -> int | None:
+    """Buffer one kill. Returns buffered (not yet flushed) kills for the pair, or None."""
+    if redis is None or not template_id:
+        return None
+    field = f"{int(player_id)}:{int(template_id)}"
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.hincrby(BUF_KILLS, field, 1)
+        pipe.hget(BUF_KILLS + INFLIGHT_SUFFIX, field)
+        pipe.sadd(known_key(player_id), f"m:{int(template_id)}")
+        live, inflight, _ = await pipe.execute()
+    except (RedisError, OSError):
+        logger.debug("codex buffer: kill fallback", exc_info=True)
+        return None
+    return int(live or 0) + int(inflight or 0)
+
+
+async def pending_kills(redis: Any, player_id: int, template_id: int) -> tuple[int | None, int, bool]:
+    """(cached committed kills or None, buffered kills, flush in flight for this pair)."""
+    field = f"{int(player_id)}:{int(template_id)}"
+    pipe = redis.pipeline(transaction=False)
+    pipe.hget(kills_cache_key(player_id), str(int(template_id)))
+    pipe.hget(BUF_KILLS, field)
+    pipe.hget(BUF_KILLS + INFLIGHT_SUFFIX, field)
+    cached, live, inflight = await pipe.execute()
+    return (
+        int(cached) if cached is not None else None,
+        int(live or 0) + int(inflight or 0),
+        inflight is not None,
+    )
+
+
+async def cache_committed_kills(redis: Any, player_id: int, template_id: int, kills: int) -> None:
+    pipe = redis.pipeline(transaction=False)
+    pipe.hset(kills_cache_key(player_id), str(int(template_id)), int(kills))
+    pipe.expire(kills_cache_key(player_id), KILLS_CACHE_TTL_SECONDS)
+    await pipe.execute()
+
+
+# ---------------------------------------------------------------------------
+# Flush
+# ---------------------------------------------------------------------------
+
+async def _take_inflight(redis: Any, key: str) -> dict[str, str]:
+    """Move the live buffer aside (unless a previous batch is still in flight) and read it."""
+    inflight = key + INFLIGHT_SUFFIX
+    if not await redis.exists(inflight):
+        try:
+            await redis.renamenx(key, inflight)
+        except ResponseError:
+            return {}  # live buffer empty
+    return dict(await redis.hgetall(inflight) or {})
+
+
+def _chunks(rows: list[dict], size: int = FLUSH_CHUNK):
+    for i in range(0, len(rows), size):
+        yield rows[i : i + size]
+
+
+async def _execute_rows(session: AsyncSession, build_stmt, rows: list[dict], label: str) -> int:
+    """Multi-row upsert per chunk; a bad chunk (e.g. deleted player FK) retries row by row."""
+    written = 0
+    for chunk in _chunks(rows):
+        try:
+            async with session.begin_nested():
+                await session.execute(build_stmt(chunk))
+            written += len(chunk)
+            continue
+        except SQLAlchemyError:
+            logger.warning("codex flush %s: chunk failed, retrying per row", label, exc_info=True)
+        for row in chunk:
+            try:
+                async with session.begin_nested():
+                    await session.execute(build_stmt([row]))
+                written += 1
+            except SQLAlchemyError:
+                logger.warning("codex flush %s: dropped row %s", label, row)
+    return written
+
+
+def _epoch_to_dt(raw: Any) -> datetime:
+    try:
+        return datetime.fromtimestamp(int(raw), tz=timezone.utc)
+    except (TypeError, ValueError, OverflowError):
+        return datetime.now(timezone.utc)
+
+
+def monster_seen_stmt(rows: list[dict]):
+    return (
+        pg_insert(PlayerMonsterCodex)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["player_id", "monster_template_id"])
+    )
+
+
+def kills_stmt(rows: list[dict]):
+    ins = pg_insert(PlayerMonsterCodex).values(rows)
+    return ins.on_conflict_do_update(
+        index_elements=["player_id", "monster_template_id"],
+        set_={
+            "kills": PlayerMonsterCodex.kills + ins.excluded.kills,
+            "last_kill_at": ins.excluded.last_kill_at,
+            "first_kill_at": func.coalesce(PlayerMonsterCodex.first_kill_at, ins.excluded.first_kill_at),
+        },
+    )
+
+
+def item_seen_stmt(rows: list[dict]):
+    ins = pg_insert(PlayerItemCodex).values(rows)
+    return ins.on_conflict_do_update(
+        index_elements=["player_id", "base_template_id"],
+        set_={"seen_count": PlayerItemCodex.seen_count + ins.excluded.seen_count},
+    )
+
+
+def affix_seen_stmt(rows: list[dict]):
+    return (
+        pg_insert(PlayerAffixCodex)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["player_id", "catalog_kind", "catalog_id"])
+    )
+
+
+def _split_field(field: str, parts: int) -> list[str] | None:
+    bits = str(field).split(":")
+    return bits if len(bits) == parts else None
+
+
+async def flush_codex_buffers(session: AsyncSession, redis: Any) -> dict[str, int]:
+    """Drain all codex buffers into Postgres. Commits. Returns rows written per buffer."""
+    out = {"monster_seen": 0, "kills": 0, "item_seen": 0, "affix_seen": 0}
+    if redis is None:
+        return out
+    now = datetime.now(timezone.utc)
+
+    seen = await _take_inflight(redis, BUF_MONSTER_SEEN)
+    kills = await _take_inflight(redis, BUF_KILLS)
+    items = await _take_inflight(redis, BUF_ITEM_SEEN)
+    affixes = await _take_inflight(redis, BUF_AFFIX_SEEN)
+
+    seen_rows: list[dict] = []
+    for field, ts in seen.items():
+        bits = _split_field(field, 2)
+        if bits:
+            seen_rows.append(
+                {
+                    "player_id": int(bits[0]),
+                    "monster_template_id": int(bits[1]),
+                    "kills": 0,
+                    "first_seen_at": _epoch_to_dt(ts),
+                }
+            )
+    kill_rows: list[dict] = []
+    flushed_kills: dict[int, list[str]] = defaultdict(list)
+    for field, n in kills.items():
+        bits = _split_field(field, 2)
+        if not bits or int(n or 0) <= 0:
+            continue
+        kill_rows.append(
+            {
+                "player_id": int(bits[0]),
+                "monster_template_id": int(bits[1]),
+                "kills": int(n),
+                "first_seen_at": now,
+                "first_kill_at": now,
+                "last_kill_at": now,
+            }
+        )
+        flushed_kills[int(bits[0])].append(bits[1])
+    item_rows: list[dict] = []
+    for field, n in items.items():
+        bits = _split_field(field, 2)
+        if bits and int(n or 0) > 0:
+            item_rows.append(
+                {
+                    "player_id": int(bits[0]),
+                    "base_template_id": int(bits[1]),
+                    "first_seen_at": now,
+                    "seen_count": int(n),
+                }
+            )
+    affix_rows: list[dict] = []
+    for field, ts in affixes.items():
+        bits = _split_field(field, 3)
+        if bits:
+            affix_rows.append(
+                {
+                    "player_id": int(bits[0]),
+                    "catalog_kind": bits[1],
+                    "catalog_id": int(bits[2]),
+                    "first_seen_at": _epoch_to_dt(ts),
+                }
+            )
+
+    # Seen rows first so kill upserts of the same pair find the row either way.
+    out["monster_seen"] = await _execute_rows(session, monster_seen_stmt, seen_rows, "monster_seen")
+    out["kills"] = await _execute_rows(session, kills_stmt, kill_rows, "kills")
+    out["item_seen"] = await _execute_rows(session, item_seen_stmt, item_rows, "item_seen")
+    out["affix_seen"] = await _execute_rows(session, affix_seen_stmt, affix_rows, "affix_seen")
+    await session.commit()
+
+    # Drop in-flight batches and the committed-kills cache of flushed pairs atomically,
+    # so tier readers never count a batch twice (cache + in-flight) or not at all.
+    pipe = redis.pipeline(transaction=True)
+    for key in (BUF_MONSTER_SEEN, BUF_KILLS, BUF_ITEM_SEEN, BUF_AFFIX_SEEN):
+        pipe.delete(key + INFLIGHT_SUFFIX)
+    for pid, tids in flushed_kills.items():
+        pipe.hdel(kills_cache_key(pid), *tids)
+    await pipe.execute()
+
+    await _hook_new_discoveries(session, redis)
+    return out
+
+
+async def _hook_new_discoveries(session: AsyncSession, redis: Any) -> None:
+    """Re-evaluate the codex milestone once per player with new item/affix discoveries."""
+    try:
+        raw = await redis.spop(BUF_NEW_PLAYERS, 1000)
+    except (RedisError, OSError):
+        return
+    if not raw:
+        return
+    from waifu_bot.services.hidden_milestones import hook_milestones
+
+    for pid in raw:
+        try:
+            await hook_milestones(session, int(pid), ["codex_sage"])
+        except Exception:
+            logger.debug("codex flush: milestone hook failed player_id=%s", pid, exc_info=True)
+    await session.commit()
@@ -59,6 +59,9 @@ from waifu_bot.game.constants import MAX_LEVEL
 from waifu_bot.services.energy import apply_regen
 from waifu_bot.services.item_service import ItemService
 from waifu_bot.services.waifu_hp import sync_waifu_max_hp
+from waifu_bot.core.config import settings
+from waifu_bot.services import battle_stream
+from waifu_bot.services import combat_capture
 from waifu_bot.services import sse as sse_service
 from waifu_bot.game.legendary_bonuses.state import initial_battle_state
 from waifu_bot.services.legendary_combat import (
@@ -883,9 +886,39 @@ class CombatService:
     ) -> dict:
         """Process message damage in active battle.
 
+        A sampled share of calls (COMBAT_CAPTURE_SAMPLE_RATE) is recorded for offline replay,
+        see services/combat_capture.py.
+
         Returns:
             dict with battle state and result
         """
+        call = dict(
+            message_text=message_text,
+            message_length=message_length,
+            source_chat_id=source_chat_id,
+            source_chat_type=source_chat_type,
+            source_message_id=source_message_id,
+            skip_spam_check=skip_spam_check,
+            economy=economy,
+        )
+        if combat_capture.should_capture():
+            return await combat_capture.capture_hit(self, session, player_id, media_type, **call)
+        return await self._process_message_damage(session, player_id, media_type, **call)
+
+    async def _process_message_damage(
+        self,
+        session: AsyncSession,
+        player_id: int,
+        media_type: MediaType,
+        message_text: Optional[str] = None,
+        message_length: int | None = None,
+        source_chat_id: int | None = None,
+        source_chat_type: str | None = None,
+        source_message_id: int | None = None,
+        *,
+        skip_spam_check: bool = False,
+        economy: str = "telegram",
+    ) -> dict:
         from waifu_bot.game.economy import ECONOMY_ACTIVITY, normalize_economy
 
         economy = normalize_economy(economy)
@@ -976,7 +1009,7 @@ class CombatService:
         legendary_ignore_death = False
         legendary_state_patch: dict = {}
         if run:
-            await legendary_bridge.load(session, player_id)
+            await legendary_bridge.load(session, player_id, redis=self.redis)
             if not isinstance(getattr(run, "battle_state", None), dict):
                 run.battle_state = initial_battle_state()
             legendary_state_patch.update(
@@ -1022,7 +1055,7 @@ class CombatService:
             # shows up in the player's library even before the first kill.
             try:
                 await bestiary_service.mark_seen(
-                    session, player_id, getattr(run_monster, "template_id", None)
+                    session, player_id, getattr(run_monster, "template_id", None), redis=self.redis
                 )
             except Exception:
                 pass
@@ -1183,6 +1216,7 @@ class CombatService:
         except Exception:
             pass
 
+        combat_capture.mark_phase("legendary")
         leg_ctx = None
         leg_outgoing_agg = None
         leg_force_crit = False
@@ -1257,6 +1291,7 @@ class CombatService:
         damage = pool_result.damage
         stun_proc = pool_result.stun_proc
 
+        combat_capture.mark_phase("crit_mitigation")
         # Elite affix pipeline: curse → stone_skin → immune → media_block → crit (anti_crit) → defense/evade
         affix_rows: list[MonsterAffix] = []
         if run_monster is not None and run_monster.applied_affix_ids:
@@ -1598,6 +1633,7 @@ class CombatService:
             finish_blocked=False,
         )
 
+        combat_capture.mark_phase("persistence")
         # Log battle event
         battle_log = BattleLog(
             player_id=player_id,
@@ -1653,6 +1689,7 @@ class CombatService:
             )
             return result
 
+        combat_capture.mark_phase("rewards")
         # Check if monster defeated
         if monster_hp_after <= 0:
             if run and run_monster:
@@ -2992,7 +3029,7 @@ class CombatService:
             dmg_taken = max(1, int(round(dmg_taken * (1.0 - lhr / 100.0))))
             dmg_after_lhr = dmg_taken
         legendary_bridge = LegendaryCombatBridge()
-        await legendary_bridge.load(session, pid)
+        await legendary_bridge.load(session, pid, redis=self.redis)
         lb_patch: dict = {}
         if legendary_bridge.active and dmg_taken > 0:
             _pl = await session.get(Player, pid)
@@ -3535,6 +3572,12 @@ class CombatService:
         if identity:
             for key, value in identity.items():
                 merged.setdefault(key, value)
+        if settings.sse_battle_delta_enabled:
+            try:
+                await battle_stream.publish_battle_event(self.redis, player_id, merged)
+                return
+            except Exception:
+                logger.warning("battle delta publish failed player_id=%s", player_id, exc_info=True)
         event = {"type": "battle", "payload": merged}
         await sse_service.publish_event(self.redis, player_id, event)
 
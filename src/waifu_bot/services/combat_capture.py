@@ -0,0 +1,705 @@
+"""Sampled capture of solo combat hits for offline replay (``scripts/replay_combat_captures.py``).
+
+With ``COMBAT_CAPTURE_SAMPLE_RATE`` > 0, a sampled ``CombatService.process_message_damage``
+call runs against recording proxies:
+
+- every session call (``get`` / ``execute`` / ``scalar`` / ``refresh`` / ``flush`` …) stores
+  its answer: ORM rows as column + loaded-relationship snapshots, other rows as values;
+- every Redis reply of the hit is stored, both for ``CombatService.redis`` and for
+  ``get_redis()`` callers (per-task override in ``core/redis.py``);
+- ``random.*`` draws come from ``random.Random(seed)`` bound to the hit via a context var,
+  and the seed is stored;
+- process-local caches are cleared first, so a cold replay process issues the same queries.
+
+The file ``COMBAT_CAPTURE_DIR/<YYYYMMDD>/<player>-<ms>-<seed>.json.gz`` also holds the call
+arguments, the returned dict, the column writes per commit and per-phase timings
+(:func:`mark_phase` checkpoints in ``CombatService``). Replay answers the same calls in the
+same order from an in-memory session and diffs the result and the writes.
+
+A hit whose answers cannot be encoded (unknown value type) is played normally and not written.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import gzip
+import hashlib
+import importlib
+import inspect
+import json
+import logging
+import random
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from datetime import time as dt_time
+from decimal import Decimal
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable
+
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.engine import Row
+from sqlalchemy.orm.attributes import set_committed_value
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+PHASES = ("profile", "legendary", "crit_mitigation", "persistence", "rewards")
+
+# Process-local caches a hit may read through; cleared before capture and replay alike.
+COLD_CACHES = (
+    "waifu_bot.services.game_config_service:invalidate_game_config_cache",
+    "waifu_bot.game.legendary_bonuses.loader:clear_loadout_cache",
+    "waifu_bot.game.legendary_bonuses.drop_roll:clear_drop_roll_cache",
+    "waifu_bot.services.abyss_catalog:invalidate_abyss_catalog",
+)
+
+_RNG_FUNCS = (
+    "random", "randint", "randrange", "uniform", "choice", "choices", "shuffle", "sample",
+    "gauss", "normalvariate", "triangular", "betavariate", "expovariate", "getrandbits",
+)
+
+_hit_rng: ContextVar[random.Random | None] = ContextVar("combat_hit_rng", default=None)
+_phase_timer: ContextVar["PhaseTimer | None"] = ContextVar("combat_phase_timer", default=None)
+_rng_hooks_installed = False
+_sampler = random.Random()
+
+
+class CaptureUnsupported(Exception):
+    """A value in a session / Redis answer has no encoding."""
+
+
+def type_path(tp: type) -> str:
+    return f"{tp.__module__}:{tp.__qualname__}"
+
+
+def resolve_path(path: str) -> Any:
+    module, _, qual = path.partition(":")
+    obj: Any = importlib.import_module(module)
+    for part in qual.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+def clear_cold_caches() -> None:
+    for path in COLD_CACHES:
+        try:
+            resolve_path(path)()
+        except Exception:
+            logger.debug("combat capture: cannot clear %s", path, exc_info=True)
+
+
+# ---------------------------------------------------------------------------
+# Seeded RNG per hit + phase timer
+# ---------------------------------------------------------------------------
+
+
+def install_rng_hooks() -> None:
+    """Route module-level ``random.*`` through the hit RNG when one is bound (idempotent)."""
+    global _rng_hooks_installed
+    if _rng_hooks_installed:
+        return
+    for name in _RNG_FUNCS:
+        default = getattr(random, name)
+
+        def hook(*args: Any, _name: str = name, _default: Callable = default, **kwargs: Any) -> Any:
+            rng = _hit_rng.get()
+            return (getattr(rng, _name) if rng is not None else _default)(*args, **kwargs)
+
+        setattr(random, name, hook)
+    _rng_hooks_installed = True
+
+
+def bind_hit_rng(seed: int):
+    """Bind ``random.Random(seed)`` to the current task; returns the reset token."""
+    install_rng_hooks()
+    return _hit_rng.set(random.Random(seed))
+
+
+def unbind_hit_rng(token) -> None:
+    _hit_rng.reset(token)
+
+
+class PhaseTimer:
+    """Wall time (ms) and session calls per phase; :func:`mark_phase` starts the next one."""
+
+    __slots__ = ("current", "started", "ms", "queries")
+
+    def __init__(self, first: str = PHASES[0]) -> None:
+        self.current = first
+        self.started = time.perf_counter()
+        self.ms: dict[str, float] = {}
+        self.queries: dict[str, int] = {}
+
+    def mark(self, name: str) -> None:
+        now = time.perf_counter()
+        self.ms[self.current] = self.ms.get(self.current, 0.0) + (now - self.started) * 1000.0
+        self.current = name
+        self.started = now
+
+    def query(self) -> None:
+        self.queries[self.current] = self.queries.get(self.current, 0) + 1
+
+    def finish(self) -> dict[str, Any]:
+        self.mark("")
+        self.ms.pop("", None)
+        return {"ms": {k: round(v, 3) for k, v in self.ms.items()}, "queries": dict(self.queries)}
+
+
+def mark_phase(name: str) -> None:
+    """Phase checkpoint in the combat hot path; no-op unless a hit is captured or replayed."""
+    timer = _phase_timer.get()
+    if timer is not None:
+        timer.mark(name)
+
+
+def bind_phase_timer(timer: PhaseTimer):
+    return _phase_timer.set(timer)
+
+
+def unbind_phase_timer(token) -> None:
+    _phase_timer.reset(token)
+
+
+def count_query() -> None:
+    timer = _phase_timer.get()
+    if timer is not None:
+        timer.query()
+
+
+# ---------------------------------------------------------------------------
+# Value codec
+# ---------------------------------------------------------------------------
+
+
+def _is_orm(value: Any) -> bool:
+    return hasattr(value, "_sa_instance_state")
+
+
+def primary_key(obj: Any) -> list | None:
+    pk = sa_inspect(obj).mapper.primary_key_from_instance(obj)
+    return None if any(v is None for v in pk) else list(pk)
+
+
+class Encoder:
+    """JSON-safe encoding; ORM instances go into one object table per capture.
+
+    An instance is stored once, at first sight (loaded columns and relationships). Later
+    answers that load more attributes of it carry a ``patch``.
+    """
+
+    def __init__(self, on_new_object: Callable[[Any], None] | None = None) -> None:
+        self.objects: list[dict[str, Any]] = []
+        self.added: dict[int, int] = {}
+        self._index: dict[int, int] = {}
+        self._keys: dict[int, set[str]] = {}
+        self._on_new = on_new_object
+
+    def value(self, v: Any) -> Any:
+        if v is None or isinstance(v, (bool, int, float, str)) and not isinstance(v, Enum):
+            return v
+        if isinstance(v, Enum):
+            return {"$e": type_path(type(v)), "v": self.value(v.value)}
+        if _is_orm(v):
+            return {"$o": self.ref(v)}
+        if isinstance(v, datetime):
+            return {"$dt": v.isoformat()}
+        if isinstance(v, date):
+            return {"$d": v.isoformat()}
+        if isinstance(v, dt_time):
+            return {"$t": v.isoformat()}
+        if isinstance(v, timedelta):
+            return {"$td": v.total_seconds()}
+        if isinstance(v, Decimal):
+            return {"$dec": str(v)}
+        if isinstance(v, uuid.UUID):
+            return {"$uuid": str(v)}
+        if isinstance(v, (bytes, bytearray, memoryview)):
+            return {"$b": base64.b64encode(bytes(v)).decode("ascii")}
+        if isinstance(v, dict):
+            if all(isinstance(k, str) and not k.startswith("$") for k in v):
+                return {k: self.value(x) for k, x in v.items()}
+            return {"$map": [[self.value(k), self.value(x)] for k, x in v.items()]}
+        if isinstance(v, list):
+            return [self.value(x) for x in v]
+        if isinstance(v, (tuple, Row)):
+            return {"$tup": [self.value(x) for x in v]}
+        if isinstance(v, (set, frozenset)):
+            return {"$set": [self.value(x) for x in v]}
+        raise CaptureUnsupported(type(v).__name__)
+
+    def _attrs(self, obj: Any, keys: set[str] | None) -> dict[str, Any]:
+        state = sa_inspect(obj)
+        out: dict[str, Any] = {}
+        for attr in state.mapper.attrs:
+            if attr.key in state.dict and (keys is None or attr.key not in keys):
+                out[attr.key] = self.value(state.dict[attr.key])
+        return out
+
+    def ref(self, obj: Any) -> int:
+        key = id(obj)
+        if key in self._index:
+            return self._index[key]
+        idx = len(self.objects)
+        self._index[key] = idx
+        row: dict[str, Any] = {"cls": type_path(type(obj))}
+        if key in self.added:
+            row["added"] = self.added[key]
+        self.objects.append(row)
+        self._keys[idx] = set(sa_inspect(obj).dict)
+        if self._on_new is not None:
+            self._on_new(obj)
+        row["attrs"] = self._attrs(obj, None)
+        return idx
+
+    def patch(self, objs: list[Any], *, force: bool = False) -> list[list]:
+        """Attributes loaded on already stored instances since they were stored."""
+        out: list[list] = []
+        for obj in objs:
+            idx = self._index.get(id(obj))
+            if idx is None:
+                continue
+            attrs = self._attrs(obj, None if force else self._keys[idx])
+            if attrs:
+                self._keys[idx].update(attrs)
+                out.append([idx, attrs])
+        return out
+
+
+class Decoder:
+    """Inverse of :class:`Encoder`; instances are rebuilt once per object-table index.
+
+    Rows of objects the hit itself added resolve to the replay's own instance (``added``).
+    """
+
+    def __init__(self, objects: list[dict[str, Any]], on_new_object: Callable[[Any], None] | None = None) -> None:
+        self.objects = objects
+        self.added: dict[int, Any] = {}
+        self._live: dict[int, Any] = {}
+        self._on_new = on_new_object
+
+    def obj(self, idx: int) -> Any:
+        if idx in self._live:
+            return self._live[idx]
+        row = self.objects[idx]
+        inst = self.added.get(row.get("added", 0))
+        if inst is not None:
+            self._live[idx] = inst
+            self.apply(inst, row["attrs"])
+            return inst
+        inst = sa_inspect(resolve_path(row["cls"])).class_manager.new_instance()
+        self._live[idx] = inst
+        self.apply(inst, row["attrs"])
+        if self._on_new is not None:
+            self._on_new(inst)
+        return inst
+
+    def apply(self, inst: Any, attrs: dict[str, Any]) -> None:
+        for key, raw in attrs.items():
+            set_committed_value(inst, key, self.value(raw))
+
+    def apply_patch(self, patch: list[list]) -> None:
+        for idx, attrs in patch:
+            self.apply(self.obj(int(idx)), attrs)
+
+    def value(self, v: Any) -> Any:
+        if isinstance(v, list):
+            return [self.value(x) for x in v]
+        if not isinstance(v, dict):
+            return v
+        if len(v) == 1 or (len(v) == 2 and "$e" in v):
+            tag = next(iter(v))
+            if tag == "$o":
+                return self.obj(int(v["$o"]))
+            if tag == "$e":
+                return resolve_path(v["$e"])(self.value(v["v"]))
+            if tag == "$dt":
+                return datetime.fromisoformat(v[tag])
+            if tag == "$d":
+                return date.fromisoformat(v[tag])
+            if tag == "$t":
+                return dt_time.fromisoformat(v[tag])
+            if tag == "$td":
+                return timedelta(seconds=float(v[tag]))
+            if tag == "$dec":
+                return Decimal(v[tag])
+            if tag == "$uuid":
+                return uuid.UUID(v[tag])
+            if tag == "$b":
+                return base64.b64decode(v[tag])
+            if tag == "$map":
+                return {self.value(k): self.value(x) for k, x in v[tag]}
+            if tag == "$tup":
+                return tuple(self.value(x) for x in v[tag])
+            if tag == "$set":
+                return {self.value(x) for x in v[tag]}
+        return {k: self.value(x) for k, x in v.items()}
+
+
+# ---------------------------------------------------------------------------
+# Writes (same code for capture and replay, so the two diff cleanly)
+# ---------------------------------------------------------------------------
+
+
+class WriteTracker:
+    """Column values of seen / added instances; :meth:`flush_writes` reports what changed."""
+
+    def __init__(self) -> None:
+        self._enc = Encoder()
+        self._seen: list[tuple[Any, dict[str, Any]]] = []
+        self._ids: set[int] = set()
+        self._added = 0
+        self._deleted: list[Any] = []
+
+    def _columns(self, obj: Any) -> dict[str, Any]:
+        return column_values(obj, self._enc)
+
+    def seen(self, obj: Any) -> None:
+        if id(obj) not in self._ids:
+            self._ids.add(id(obj))
+            self._seen.append((obj, self._columns(obj)))
+
+    def added(self, obj: Any) -> None:
+        if id(obj) not in self._ids:
+            self._ids.add(id(obj))
+            self._added += 1
+            self._seen.append((obj, {"$new": self._added}))
+
+    def deleted(self, obj: Any) -> None:
+        self._deleted.append(obj)
+
+    def flush_writes(self) -> list[dict[str, Any]]:
+        out: list[dict[str, Any]] = []
+        for i, (obj, base) in enumerate(self._seen):
+            cur = self._columns(obj)
+            changed = {k: v for k, v in cur.items() if base.get(k, ...) != v}
+            if changed:
+                pk = primary_key(obj)
+                out.append({
+                    "cls": type(obj).__name__,
+                    "pk": self._enc.value(pk) if pk is not None else f"new#{base.get('$new', 0)}",
+                    "set": changed,
+                })
+            self._seen[i] = (obj, {**cur, **({"$new": base["$new"]} if "$new" in base else {})})
+        for obj in self._deleted:
+            out.append({"cls": type(obj).__name__, "pk": self._enc.value(primary_key(obj)), "deleted": True})
+        self._deleted = []
+        return sorted(out, key=lambda w: (w["cls"], json.dumps(w["pk"], default=str)))
+
+
+def column_values(obj: Any, enc: Encoder) -> dict[str, Any]:
+    state = sa_inspect(obj)
+    return {a.key: enc.value(state.dict[a.key]) for a in state.mapper.column_attrs if a.key in state.dict}
+
+
+def statement_fingerprint(stmt: Any) -> str:
+    try:
+        text = str(stmt)
+    except Exception:
+        text = type(stmt).__name__
+    return hashlib.blake2s(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Recording proxies
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class HitCapture:
+    seed: int
+    started_at: datetime
+    session_log: list[dict[str, Any]] = field(default_factory=list)
+    redis_log: list[dict[str, Any]] = field(default_factory=list)
+    writes: list[list[dict[str, Any]]] = field(default_factory=list)
+    tracker: WriteTracker = field(default_factory=WriteTracker)
+    broken: str | None = None
+    unsupported: set[str] = field(default_factory=set)
+
+    def __post_init__(self) -> None:
+        self.encoder = Encoder(on_new_object=self.tracker.seen)
+
+    def encode(self, value: Any) -> Any:
+        if self.broken:
+            return None
+        try:
+            return self.encoder.value(value)
+        except CaptureUnsupported as exc:
+            self.broken = f"unsupported value: {exc}"
+            return None
+
+
+class RecordingSession:
+    """Forwards to a real ``AsyncSession`` and logs every answer (see module docstring)."""
+
+    def __init__(self, inner: Any, cap: HitCapture) -> None:
+        self._inner = inner
+        self._cap = cap
+        self._pending: list[tuple[int, Any]] = []
+        self._adds = 0
+
+    def _log(self, entry: dict[str, Any]) -> None:
+        count_query()
+        # Added rows that got their PK: keep all column values the flush produced (defaults too).
+        assigned = []
+        for n, obj in list(self._pending):
+            if primary_key(obj) is not None:
+                try:
+                    assigned.append([n, column_values(obj, self._cap.encoder)])
+                except CaptureUnsupported as exc:
+                    self._cap.broken = f"unsupported value: {exc}"
+                self._pending.remove((n, obj))
+        if assigned:
+            entry["pk"] = assigned
+        self._cap.session_log.append(entry)
+
+    async def _run(self, entry: dict[str, Any], coro: Any) -> Any:
+        try:
+            return await coro
+        except Exception as exc:
+            entry["raise"] = type_path(type(exc))
+            entry["msg"] = str(exc)[:300]
+            self._log(entry)
+            raise
+
+    async def get(self, entity: Any, ident: Any, **kwargs: Any) -> Any:
+        entry: dict[str, Any] = {"op": "get", "model": type_path(entity)}
+        value = await self._run(entry, self._inner.get(entity, ident, **kwargs))
+        entry["ret"] = self._cap.encode(value)
+        if value is not None:
+            entry["patch"] = self._cap.encoder.patch([value])
+        self._log(entry)
+        return value
+
+    async def scalar(self, stmt: Any, *args: Any, **kwargs: Any) -> Any:
+        entry: dict[str, Any] = {"op": "scalar", "sql": statement_fingerprint(stmt)}
+        value = await self._run(entry, self._inner.scalar(stmt, *args, **kwargs))
+        entry["ret"] = self._cap.encode(value)
+        if _is_orm(value):
+            entry["patch"] = self._cap.encoder.patch([value])
+        self._log(entry)
+        return value
+
+    async def execute(self, stmt: Any, *args: Any, **kwargs: Any) -> Any:
+        entry: dict[str, Any] = {"op": "execute", "sql": statement_fingerprint(stmt)}
+        result = await self._run(entry, self._inner.execute(stmt, *args, **kwargs))
+        if not getattr(result, "returns_rows", True):
+            entry["rowcount"] = int(result.rowcount if result.rowcount is not None else -1)
+            self._log(entry)
+            return result
+        frozen = result.freeze()
+        rows = list(frozen.data)
+        entry["keys"] = list(frozen.metadata.keys)
+        entry["rows"] = [self._cap.encode(tuple(r)) for r in rows]
+        entry["patch"] = self._cap.encoder.patch([v for r in rows for v in r if _is_orm(v)])
+        self._log(entry)
+        return frozen()
+
+    async def scalars(self, stmt: Any, *args: Any, **kwargs: Any) -> Any:
+        return (await self.execute(stmt, *args, **kwargs)).scalars()
+
+    async def refresh(self, obj: Any, *args: Any, **kwargs: Any) -> None:
+        entry: dict[str, Any] = {"op": "refresh"}
+        await self._run(entry, self._inner.refresh(obj, *args, **kwargs))
+        self._cap.encode(obj)
+        entry["patch"] = self._cap.encoder.patch([obj], force=True)
+        self._log(entry)
+
+    async def flush(self, *args: Any, **kwargs: Any) -> None:
+        entry: dict[str, Any] = {"op": "flush"}
+        await self._run(entry, self._inner.flush(*args, **kwargs))
+        self._log(entry)
+
+    async def commit(self) -> None:
+        entry: dict[str, Any] = {"op": "commit"}
+        self._cap.writes.append(self._cap.tracker.flush_writes())
+        await self._run(entry, self._inner.commit())
+        self._log(entry)
+
+    async def rollback(self) -> None:
+        entry: dict[str, Any] = {"op": "rollback"}
+        await self._run(entry, self._inner.rollback())
+        self._log(entry)
+
+    async def delete(self, obj: Any) -> None:
+        self._cap.tracker.deleted(obj)
+        await self._inner.delete(obj)
+
+    def add(self, obj: Any, *args: Any, **kwargs: Any) -> None:
+        self._inner.add(obj, *args, **kwargs)
+        self._adds += 1
+        self._pending.append((self._adds, obj))
+        self._cap.encoder.added[id(obj)] = self._adds
+        self._cap.tracker.added(obj)
+
+    def add_all(self, objs: Any) -> None:
+        for obj in objs:
+            self.add(obj)
+
+    def begin_nested(self) -> Any:
+        return self._inner.begin_nested()
+
+    @property
+    def info(self) -> dict:
+        return self._inner.info
+
+    @property
+    def no_autoflush(self) -> Any:
+        return self._inner.no_autoflush
+
+    def __getattr__(self, name: str) -> Any:
+        self._cap.unsupported.add(name)
+        return getattr(self._inner, name)
+
+
+class RecordingRedis:
+    """Forwards to a Redis client (or pipeline / script) and logs each reply in call order."""
+
+    def __init__(self, inner: Any, cap: HitCapture) -> None:
+        self._inner = inner
+        self._cap = cap
+
+    def _wrap(self, name: str, fn: Callable) -> Callable:
+        def call(*args: Any, **kwargs: Any) -> Any:
+            entry: dict[str, Any] = {"op": name}
+            try:
+                res = fn(*args, **kwargs)
+            except Exception as exc:
+                entry.update({"kind": "raise", "raise": type_path(type(exc)), "msg": str(exc)[:300]})
+                self._cap.redis_log.append(entry)
+                raise
+            if inspect.isawaitable(res):
+                entry["kind"] = "await"
+                self._cap.redis_log.append(entry)
+
+                async def awaited() -> Any:
+                    try:
+                        value = await res
+                    except Exception as exc:
+                        entry.update({"raise": type_path(type(exc)), "msg": str(exc)[:300]})
+                        raise
+                    entry["ret"] = self._cap.encode(value)
+                    return value
+
+                return awaited()
+            if res is self._inner:
+                entry["kind"] = "self"
+                self._cap.redis_log.append(entry)
+                return self
+            try:
+                entry.update({"kind": "value", "ret": Encoder().value(res)})
+            except CaptureUnsupported:
+                entry["kind"] = "proxy"
+                self._cap.redis_log.append(entry)
+                return RecordingRedis(res, self._cap)
+            self._cap.redis_log.append(entry)
+            return res
+
+        return call
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._inner, name)
+        return self._wrap(name, attr) if callable(attr) else attr
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self._wrap("__call__", self._inner)(*args, **kwargs)
+
+    async def __aenter__(self) -> "RecordingRedis":
+        await self._wrap("__aenter__", self._inner.__aenter__)()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> Any:
+        return await self._wrap("__aexit__", self._inner.__aexit__)(*exc)
+
+
+# ---------------------------------------------------------------------------
+# Capture entry point
+# ---------------------------------------------------------------------------
+
+
+def should_capture() -> bool:
+    from waifu_bot.core.config import settings
+
+    rate = float(getattr(settings, "combat_capture_sample_rate", 0.0) or 0.0)
+    return rate > 0 and _sampler.random() < rate
+
+
+def capture_path(base_dir: str, player_id: int, started_at: datetime, seed: int) -> Path:
+    return Path(base_dir) / f"{started_at:%Y%m%d}" / f"{int(player_id)}-{int(started_at.timestamp() * 1000)}-{seed}.json.gz"
+
+
+def write_capture(doc: dict[str, Any], path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+        json.dump(doc, fh, ensure_ascii=False, separators=(",", ":"))
+    tmp.replace(path)
+    return path
+
+
+def read_capture(path: str | Path) -> dict[str, Any]:
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+async def capture_hit(service: Any, session: Any, player_id: int, media_type: Any, **call: Any) -> dict:
+    """Play one hit through recording proxies and write the capture file."""
+    from waifu_bot.core import redis as core_redis
+    from waifu_bot.core.config import settings
+
+    if service.redis is None and not call.get("skip_spam_check"):
+        # In-memory spam window is process state a replay cannot see.
+        return await service._process_message_damage(session, player_id, media_type, **call)
+    clear_cold_caches()
+    cap = HitCapture(seed=_sampler.getrandbits(63), started_at=datetime.now(timezone.utc))
+    svc = type(service)(RecordingRedis(service.redis, cap) if service.redis is not None else None)
+    svc._spam_trackers = service._spam_trackers
+    override = None
+    try:
+        override = RecordingRedis(core_redis.get_redis(), cap)
+    except Exception:
+        logger.debug("combat capture: no global redis", exc_info=True)
+    timer = PhaseTimer()
+    tokens = (bind_hit_rng(cap.seed), bind_phase_timer(timer), core_redis.redis_override.set(override))
+    try:
+        result = await svc._process_message_damage(RecordingSession(session, cap), player_id, media_type, **call)
+    finally:
+        core_redis.redis_override.reset(tokens[2])
+        unbind_phase_timer(tokens[1])
+        unbind_hit_rng(tokens[0])
+    phases = timer.finish()
+    if cap.broken is None:
+        try:
+            encoded_result = Encoder().value(result)
+        except CaptureUnsupported as exc:
+            cap.broken = f"unsupported result value: {exc}"
+    if cap.broken is not None:
+        logger.info("combat capture skipped player_id=%s: %s", player_id, cap.broken)
+        return result
+    doc = {
+        "version": FORMAT_VERSION,
+        "captured_at": cap.started_at.isoformat(),
+        "seed": cap.seed,
+        "call": {
+            "player_id": int(player_id),
+            "media_type": Encoder().value(media_type),
+            "has_redis": service.redis is not None,
+            **{k: Encoder().value(v) for k, v in call.items()},
+        },
+        "objects": cap.encoder.objects,
+        "session": cap.session_log,
+        "redis": cap.redis_log,
+        "result": encoded_result,
+        "writes": cap.writes,
+        "phases": phases,
+        "unsupported": sorted(cap.unsupported),
+    }
+    path = capture_path(str(getattr(settings, "combat_capture_dir", "") or "."), player_id, cap.started_at, cap.seed)
+    try:
+        await asyncio.to_thread(write_capture, doc, path)
+    except Exception:
+        logger.warning("combat capture write failed path=%s", path, exc_info=True)
+    return result
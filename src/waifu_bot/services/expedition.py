@@ -81,7 +81,7 @@ from waifu_bot.game.expedition_narrative_catalog import (
     resolve_archetype_and_mode,
     slot_preview_name,
 )
-from waifu_bot.services.expedition_ticks import run_one_tick, tick_narrative_history
+from waifu_bot.services.expedition_ticks import run_one_tick, run_tick_batch, tick_narrative_history
 
 logger = logging.getLogger(__name__)
 
@@ -814,7 +814,10 @@ class ExpeditionService:
     async def process_due_ticks(
         self, session: AsyncSession
     ) -> list[tuple[int, str | None, str | None]]:
-        """Тики 15 мин: (player_id, telegram_narrative, telegram_status) для двух DM в ЛС."""
+        """Тики 15 мин: (player_id, telegram_narrative, telegram_status) для двух DM в ЛС.
+
+        Все due-экспедиции тикают одним батчем (``run_tick_batch``).
+        """
         now = datetime.now(tz=timezone.utc)
         stmt = select(ActiveExpedition).where(
             ActiveExpedition.cancelled.is_(False),
@@ -826,12 +829,19 @@ class ExpeditionService:
         out: list[tuple[int, str | None, str | None]] = []
         from waifu_bot.services.player_notification_prefs import should_send_dm
 
+        due: list[ActiveExpedition] = []
         for active in actives:
             if int(active.events_done or 0) >= int(active.events_total or 0):
                 active.next_tick_at = None
                 continue
-            silent = not await should_send_dm(session, int(active.player_id), "expedition_result")
-            res = await run_one_tick(session, active, silent=silent)
+            due.append(active)
+        dm_on: dict[int, bool] = {}
+        for pid in sorted({int(a.player_id) for a in due}):
+            dm_on[pid] = await should_send_dm(session, pid, "expedition_result")
+        silent_ids = {int(a.id) for a in due if not dm_on[int(a.player_id)]}
+        results = await run_tick_batch(session, due, silent_ids=silent_ids)
+        for active in due:
+            res = results.get(int(active.id)) or {}
             if not res.get("ok"):
                 continue
             narr = (res.get("telegram_narrative") or "").strip()
@@ -1,11 +1,26 @@
-"""Тики экспедиции v1.3/v1.4: урон по тегам сложности + ±10% challenge, твисты, Telegram."""
+"""Тики экспедиции v1.3/v1.4: урон по тегам сложности + ±10% challenge, твисты, Telegram.
+
+Tick engine:
+
+* ``load_tick_inputs`` — squads and slots of many expeditions in two ``IN`` queries, affixes
+  from a process-wide catalog snapshot (``get_affix_catalog``);
+* ``compute_tick`` — pure: one event of one expedition → ``TickOutcome`` (no I/O, no
+  mutation; randomness comes from the per-event seed);
+* ``run_tick_batch`` — background path: all due expeditions, outcomes written back with
+  bulk UPDATEs by primary key;
+* ``run_one_tick`` — single expedition (claim catch-up), applied to the ORM objects.
+"""
 from __future__ import annotations
 
 import random
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
+from typing import Any
 
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
 from waifu_bot.db.models import ActiveExpedition, ExpeditionAffix, ExpeditionSlot, HiredWaifu
 from waifu_bot.game.expedition_data import PERK_BY_ID
@@ -155,33 +170,171 @@ def _active_tags_for_run(
     return frozenset()
 
 
-async def run_one_tick(session: AsyncSession, active: ActiveExpedition, *, silent: bool = False) -> dict:
-    """
-    Один тик (одно событие). Возвращает ok, narrative, telegram_narrative, telegram_status,
-    telegram_text (склейка для совместимости), skip_damage.
-    """
+# ---------------------------------------------------------------------------
+# Inputs: affix catalog snapshot + batched squad / slot preload
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class AffixRow:
+    """Read-only copy of one ``expedition_affixes`` row (shared across sessions)."""
+
+    id: int
+    name: str
+    type: str
+    category: str
+    difficulty_add: int = 1
+    damage_mult: float = 1.0
+    reward_mult: float = 1.0
+    paired_perks: tuple | None = None
+    allowed_biomes: tuple | None = None
+    forbidden_biomes: tuple | None = None
+    weight: int = 100
+    description_hint: str | None = None
+    difficulty_tags: tuple = ()
+
+
+def _affix_row(row: ExpeditionAffix) -> AffixRow:
+    def _tuple(v: Any) -> tuple | None:
+        return tuple(v) if v is not None else None
+
+    return AffixRow(
+        id=int(row.id),
+        name=row.name,
+        type=row.type,
+        category=row.category,
+        difficulty_add=row.difficulty_add,
+        damage_mult=row.damage_mult,
+        reward_mult=row.reward_mult,
+        paired_perks=_tuple(row.paired_perks),
+        allowed_biomes=_tuple(row.allowed_biomes),
+        forbidden_biomes=_tuple(row.forbidden_biomes),
+        weight=row.weight,
+        description_hint=row.description_hint,
+        difficulty_tags=tuple(row.difficulty_tags or ()),
+    )
+
+
+# The affix table is static seed data; admin edits show up within the TTL.
+AFFIX_CATALOG_TTL_SECONDS = 300.0
+_affix_catalog: tuple[AffixRow, ...] | None = None
+_affix_catalog_expires_at: float = 0.0
+
+
+def invalidate_affix_catalog() -> None:
+    global _affix_catalog, _affix_catalog_expires_at
+    _affix_catalog = None
+    _affix_catalog_expires_at = 0.0
+
+
+async def get_affix_catalog(session: AsyncSession) -> tuple[AffixRow, ...]:
+    """All expedition affixes ordered by id (process-local TTL cache)."""
+    global _affix_catalog, _affix_catalog_expires_at
+    now = time.monotonic()
+    if _affix_catalog is not None and now < _affix_catalog_expires_at:
+        return _affix_catalog
+    rows = (await session.execute(select(ExpeditionAffix).order_by(ExpeditionAffix.id))).scalars().all()
+    _affix_catalog = tuple(_affix_row(r) for r in rows)
+    _affix_catalog_expires_at = now + AFFIX_CATALOG_TTL_SECONDS
+    return _affix_catalog
+
+
+@dataclass
+class TickInputs:
+    affixes: tuple[AffixRow, ...]
+    waifus: dict[int, HiredWaifu] = field(default_factory=dict)
+    slots: dict[int, ExpeditionSlot] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.affix_by_id = {a.id: a for a in self.affixes}
+
+    def squad_for(self, active: ActiveExpedition) -> list[HiredWaifu]:
+        out = []
+        for wid in active.squad_waifu_ids or []:
+            w = self.waifus.get(int(wid))
+            if w is not None and w.player_id == active.player_id:
+                out.append(w)
+        return out
+
+    def slot_for(self, active: ActiveExpedition) -> ExpeditionSlot | None:
+        sid = getattr(active, "expedition_slot_id", None)
+        return self.slots.get(int(sid)) if sid else None
+
+
+async def load_tick_inputs(session: AsyncSession, actives: list[ActiveExpedition]) -> TickInputs:
+    """Squads + legacy slots of ``actives`` (one IN query each) and the affix catalog."""
+    inputs = TickInputs(affixes=await get_affix_catalog(session))
+    waifu_ids = sorted({int(w) for a in actives for w in (a.squad_waifu_ids or [])})
+    if waifu_ids:
+        rows = (await session.execute(select(HiredWaifu).where(HiredWaifu.id.in_(waifu_ids)))).scalars().all()
+        inputs.waifus = {int(w.id): w for w in rows}
+    slot_ids = sorted(
+        {
+            int(a.expedition_slot_id)
+            for a in actives
+            if getattr(a, "depth_tier", None) is None and getattr(a, "expedition_slot_id", None)
+        }
+    )
+    if slot_ids:
+        rows = (await session.execute(select(ExpeditionSlot).where(ExpeditionSlot.id.in_(slot_ids)))).scalars().all()
+        inputs.slots = {int(s.id): s for s in rows}
+    return inputs
+
+
+# ---------------------------------------------------------------------------
+# Pure tick
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class TickOutcome:
+    """Result of one event; ``error`` set → nothing to apply."""
+
+    error: str | None = None
+    events_done: int = 0
+    events_total: int = 0
+    next_tick_at: datetime | None = None
+    # Squad HP after the event (unit id → hp); ``hp_updated_at`` None when damage was skipped.
+    hp: dict[int, int] = field(default_factory=dict)
+    hp_updated_at: datetime | None = None
+    tick_state: dict = field(default_factory=dict)
+    skip_damage: bool = False
+    twist: dict | None = None
+    affix_level: int = 0
+    challenge_cat: str = ""
+    challenge_label: str = ""
+    outcome: str = ""
+    active_tags: frozenset[str] = frozenset()
+    covered_tags: frozenset[str] = frozenset()
+    squad_prepared: bool = False
+    tag_mult: float = 1.0
+    tick_affix_names: list[str] = field(default_factory=list)
+    slot_affix_rows: list = field(default_factory=list)
+
+
+def compute_tick(
+    active: ActiveExpedition,
+    squad: list[HiredWaifu],
+    inputs: TickInputs,
+    *,
+    now: datetime,
+) -> TickOutcome:
+    """One event of ``active`` from preloaded inputs. Reads only; never mutates its arguments."""
     is_v2 = getattr(active, "depth_tier", None) is not None
     if not active.affix_level:
-        return {"ok": False, "error": "not_v13"}
+        return TickOutcome(error="not_v13")
     if not is_v2 and not active.affix_template_id:
-        return {"ok": False, "error": "not_v13"}
+        return TickOutcome(error="not_v13")
     affix_level = int(active.affix_level)
     if affix_level not in AFFIX_LEVEL_BASE_HP_PCT:
-        return {"ok": False, "error": "bad_affix_level"}
-
-    squad_ids = list(active.squad_waifu_ids or [])
-    squad: list[HiredWaifu] = []
-    for wid in squad_ids:
-        w = await session.get(HiredWaifu, wid)
-        if w and w.player_id == active.player_id:
-            squad.append(w)
+        return TickOutcome(error="bad_affix_level")
     if not squad:
-        return {"ok": False, "error": "no_squad"}
+        return TickOutcome(error="no_squad")
 
     ts_pre = dict(active.tick_state or {})
     rng = random.Random((active.id << 8) + int(active.events_done or 0))
 
-    affix_row: ExpeditionAffix | None = None
+    affix_row: AffixRow | None = None
     slot: ExpeditionSlot | None = None
     slot_affix_rows: list = []
     tick_affix_rows: list = []
@@ -189,25 +342,22 @@ async def run_one_tick(session: AsyncSession, active: ActiveExpedition, *, silen
 
     if is_v2:
         # Каждый тик v2 — новый набор препятствий из пула аффиксов.
-        affix_pool = list(
-            (await session.execute(select(ExpeditionAffix).order_by(ExpeditionAffix.id))).scalars().all()
-        )
         exclude_ids = [
             int(x)
             for x in (ts_pre.get("last_tick_affix_ids") or [])
             if x is not None
         ]
         tick_affix_rows = pick_procedural_affixes(
-            affix_pool,
+            list(inputs.affixes),
             rng,
             count=tick_affix_count(int(active.depth_tier or 1)),
             exclude_ids=exclude_ids,
         )
         affix_row = tick_affix_rows[0] if tick_affix_rows else None
         if affix_row is None and active.affix_template_id:
-            affix_row = await session.get(ExpeditionAffix, int(active.affix_template_id))
+            affix_row = inputs.affix_by_id.get(int(active.affix_template_id))
         if affix_row is None:
-            return {"ok": False, "error": "affix_not_found"}
+            return TickOutcome(error="affix_not_found")
         if tick_affix_rows:
             primary = union_challenge_categories_from_db_affix_rows(tick_affix_rows)
             active_tags = union_affix_tags(tick_affix_rows)
@@ -221,20 +371,19 @@ async def run_one_tick(session: AsyncSession, active: ActiveExpedition, *, silen
         ]
         slot_affix_rows = list(tick_affix_rows)
     else:
-        affix_row = await session.get(ExpeditionAffix, int(active.affix_template_id))
+        affix_row = inputs.affix_by_id.get(int(active.affix_template_id))
         if not affix_row:
-            return {"ok": False, "error": "affix_not_found"}
+            return TickOutcome(error="affix_not_found")
 
         primary = _db_category_to_challenge_categories(getattr(affix_row, "category", None))
-        sid = getattr(active, "expedition_slot_id", None)
-        if sid:
-            slot = await session.get(ExpeditionSlot, int(sid))
-            slot_aids = list(getattr(slot, "affix_ids", None) or []) if slot else []
-            if slot_aids:
-                stmt_sa = select(ExpeditionAffix).where(ExpeditionAffix.id.in_(slot_aids))
-                slot_affix_rows = list((await session.execute(stmt_sa)).scalars().all())
-                if slot_affix_rows:
-                    primary = union_challenge_categories_from_db_affix_rows(slot_affix_rows)
+        slot = inputs.slot_for(active)
+        slot_aids = list(getattr(slot, "affix_ids", None) or []) if slot else []
+        if slot_aids:
+            slot_affix_rows = [
+                inputs.affix_by_id[int(aid)] for aid in slot_aids if int(aid) in inputs.affix_by_id
+            ]
+            if slot_affix_rows:
+                primary = union_challenge_categories_from_db_affix_rows(slot_affix_rows)
 
         active_tags = _active_tags_for_run(active, slot, slot_affix_rows, affix_row)
         tick_affix_names = [
@@ -284,39 +433,30 @@ async def run_one_tick(session: AsyncSession, active: ActiveExpedition, *, silen
     skip_damage = bool(twist and twist.get("skip_next_damage"))
     hp_restore_pct = float(twist.get("hp_restore_pct") or 0) if twist else 0.0
 
+    hp = {int(u.id): int(getattr(u, "current_hp", u.max_hp) or 0) for u in squad}
     if not skip_damage:
         dist = distribute_damage_to_squad(squad, total_dmg)
-        now = datetime.now(tz=timezone.utc)
-        for u in squad:
-            uid = int(u.id)
-            dmg = int(dist.get(uid, 0))
-            cur = int(getattr(u, "current_hp", u.max_hp) or 0)
-            u.current_hp = max(0, cur - dmg)
-            u.hp_updated_at = now
+        for uid in hp:
+            hp[uid] = max(0, hp[uid] - int(dist.get(uid, 0)))
     if hp_restore_pct > 0:
         for u in squad:
             m = max(1, int(getattr(u, "max_hp", 1) or 1))
-            c = int(getattr(u, "current_hp", 0) or 0)
-            u.current_hp = min(m, c + int(round(m * hp_restore_pct)))
+            hp[int(u.id)] = min(m, hp[int(u.id)] + int(round(m * hp_restore_pct)))
 
     events_done = int(active.events_done or 0) + 1
     events_total = int(active.events_total or 0)
-    active.events_done = events_done
     started = active.started_at
     if started.tzinfo is None:
         started = started.replace(tzinfo=timezone.utc)
+    next_tick_at = None
     if events_done < events_total:
         interval = expedition_event_interval_minutes(
             int(active.duration_minutes or 0),
             events_total,
         )
-        active.next_tick_at = started + timedelta(minutes=interval * (events_done + 1))
-    else:
-        active.next_tick_at = None
+        next_tick_at = started + timedelta(minutes=interval * (events_done + 1))
 
     ts = ts_pre
-    prev = ts.get("last_narrative") or ""
-    loc = active.display_base_location or "Локация"
     roman = ("I", "II", "III", "IV", "V")[affix_level - 1]
     primary_affix_name = (tick_affix_names[0] if tick_affix_names else "") or (
         str(getattr(affix_row, "name", "") or "").strip()
@@ -363,6 +503,54 @@ async def run_one_tick(session: AsyncSession, active: ActiveExpedition, *, silen
             if t not in seen:
                 seen.append(t)
         ts["seen_tags"] = seen
+    ts["last_challenge_category"] = challenge_cat
+    ts["last_outcome"] = outcome
+    ts["squad_prepared"] = squad_prepared
+    ts["tag_mult"] = round(tag_mult, 4)
+    ts["tick_adj"] = round(tick_adj, 4)
+    ts["active_tags"] = sorted(active_tags)
+    ts["covered_tags"] = sorted(covered_tags & active_tags)
+
+    return TickOutcome(
+        events_done=events_done,
+        events_total=events_total,
+        next_tick_at=next_tick_at,
+        hp=hp,
+        hp_updated_at=None if skip_damage else now,
+        tick_state=ts,
+        skip_damage=skip_damage,
+        twist=twist,
+        affix_level=affix_level,
+        challenge_cat=challenge_cat,
+        challenge_label=challenge_label,
+        outcome=outcome,
+        active_tags=active_tags,
+        covered_tags=covered_tags,
+        squad_prepared=squad_prepared,
+        tag_mult=float(tag_mult),
+        tick_affix_names=tick_affix_names,
+        slot_affix_rows=slot_affix_rows,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Narrative + Telegram text (reads squad HP after the outcome was applied)
+# ---------------------------------------------------------------------------
+
+
+async def _render_tick(
+    active: ActiveExpedition,
+    squad: list[HiredWaifu],
+    res: TickOutcome,
+    *,
+    silent: bool,
+) -> tuple[dict, dict]:
+    """(tick_state with narrative, result dict for the caller)."""
+    ts = dict(res.tick_state)
+    events_done, events_total = res.events_done, res.events_total
+    active_tags, covered_tags = res.active_tags, res.covered_tags
+    loc = active.display_base_location or "Локация"
+    twist = res.twist
 
     if silent:
         narrative = "…"
@@ -380,14 +568,15 @@ async def run_one_tick(session: AsyncSession, active: ActiveExpedition, *, silen
             current_beat = str(beats[events_done - 1] or "")
         affix_hints = [
             str(getattr(a, "description_hint", "") or "").strip()
-            for a in slot_affix_rows
+            for a in res.slot_affix_rows
             if getattr(a, "description_hint", None)
         ]
         tag_labels = _tag_labels(active_tags)
+        uncovered_tags = active_tags - covered_tags
         covered_on_active = active_tags & covered_tags
         tick_pressure = _tick_pressure_label(
-            squad_prepared=squad_prepared,
-            tag_mult=float(tag_mult),
+            squad_prepared=res.squad_prepared,
+            tag_mult=res.tag_mult,
             uncovered_count=len(uncovered_tags & active_tags),
         )
         expedition_context = {
@@ -406,31 +595,31 @@ async def run_one_tick(session: AsyncSession, active: ActiveExpedition, *, silen
             "difficulty_tags_ru": tag_labels[:6],
             "tick_pressure": tick_pressure,
             "threats": {
-                "slot_affixes_ru": tick_affix_names[:6],
+                "slot_affixes_ru": res.tick_affix_names[:6],
                 "active_tags_ru": _tag_labels(active_tags),
                 "covered_tags_ru": _tag_labels(covered_on_active),
                 "uncovered_tags_ru": _tag_labels(uncovered_tags & active_tags),
-                "squad_prepared": squad_prepared,
+                "squad_prepared": res.squad_prepared,
             },
         }
 
         narrative = await generate_expedition_tick_narrative(
             location=loc,
             biome_tags=[active.display_biome_tag or ""],
-            challenge_name=challenge_label,
-            challenge_category=challenge_cat,
-            challenge_level=affix_level,
+            challenge_name=res.challenge_label,
+            challenge_category=res.challenge_cat,
+            challenge_level=res.affix_level,
             squad_snapshot=_build_squad_snapshot_for_narrative(
                 squad,
-                challenge_cat=challenge_cat,
+                challenge_cat=res.challenge_cat,
                 active_tags=active_tags,
             ),
-            outcome=outcome,
+            outcome=res.outcome,
             event_num=events_done,
             total_events=events_total,
             is_final=(events_done >= events_total),
             twist=twist,
-            prev_summary=prev,
+            prev_summary=ts.get("last_narrative") or "",
             squad_hp_ratio=squad_hp_ratio,
             expedition_context=expedition_context,
         )
@@ -439,32 +628,24 @@ async def run_one_tick(session: AsyncSession, active: ActiveExpedition, *, silen
         hist = list(ts.get("narrative_history") or [])
         hist.append(str(narrative).strip())
         ts["narrative_history"] = hist[-15:]
-    ts["last_challenge_category"] = challenge_cat
-    ts["last_outcome"] = outcome
-    ts["squad_prepared"] = squad_prepared
-    ts["tag_mult"] = round(tag_mult, 4)
-    ts["tick_adj"] = round(tick_adj, 4)
-    ts["active_tags"] = sorted(active_tags)
-    ts["covered_tags"] = sorted(covered_tags & active_tags)
-    active.tick_state = ts
-
-    now = datetime.now(tz=timezone.utc)
-    ends_at = active.ends_at
-    if ends_at.tzinfo is None:
-        ends_at = ends_at.replace(tzinfo=timezone.utc)
-    sec_left = max(0, int((ends_at - now).total_seconds()))
-    left_min = max(0, sec_left // 60)
 
     if silent:
-        return {
+        return ts, {
             "ok": True,
             "telegram_text": "",
             "telegram_narrative": "",
             "telegram_status": "",
             "narrative": "",
-            "skip_damage": skip_damage,
+            "skip_damage": res.skip_damage,
         }
 
+    now = datetime.now(tz=timezone.utc)
+    ends_at = active.ends_at
+    if ends_at.tzinfo is None:
+        ends_at = ends_at.replace(tzinfo=timezone.utc)
+    sec_left = max(0, int((ends_at - now).total_seconds()))
+    left_min = max(0, sec_left // 60)
+
     narr_lines = [
         f"🗺 «{loc}» · Событие {events_done}/{events_total} · осталось ~{left_min} мин",
         "",
@@ -489,11 +670,106 @@ async def run_one_tick(session: AsyncSession, active: ActiveExpedition, *, silen
     status_lines.append("(база до итога; после экспедиции применяется множитель исхода)")
     status_msg = "\n".join(status_lines)
 
-    return {
+    return ts, {
         "ok": True,
         "telegram_text": narrative_msg + "\n\n" + status_msg,
         "telegram_narrative": narrative_msg,
         "telegram_status": status_msg,
         "narrative": narrative,
-        "skip_damage": skip_damage,
+        "skip_damage": res.skip_damage,
     }
+
+
+# ---------------------------------------------------------------------------
+# Entry points
+# ---------------------------------------------------------------------------
+
+
+async def run_one_tick(
+    session: AsyncSession,
+    active: ActiveExpedition,
+    *,
+    silent: bool = False,
+    inputs: TickInputs | None = None,
+) -> dict:
+    """
+    Один тик (одно событие). Возвращает ok, narrative, telegram_narrative, telegram_status,
+    telegram_text (склейка для совместимости), skip_damage.
+    """
+    inputs = inputs or await load_tick_inputs(session, [active])
+    squad = inputs.squad_for(active)
+    res = compute_tick(active, squad, inputs, now=datetime.now(tz=timezone.utc))
+    if res.error:
+        return {"ok": False, "error": res.error}
+    for u in squad:
+        u.current_hp = res.hp[int(u.id)]
+        if res.hp_updated_at is not None:
+            u.hp_updated_at = res.hp_updated_at
+    active.events_done = res.events_done
+    active.next_tick_at = res.next_tick_at
+    ts, out = await _render_tick(active, squad, res, silent=silent)
+    active.tick_state = ts
+    return out
+
+
+async def run_tick_batch(
+    session: AsyncSession,
+    actives: list[ActiveExpedition],
+    *,
+    silent_ids: set[int] | frozenset[int] = frozenset(),
+) -> dict[int, dict]:
+    """One event for each of ``actives``: {active_id: run_one_tick-style result}.
+
+    Inputs come from ``load_tick_inputs``; squad HP and expedition progress are written
+    with one bulk UPDATE per table. The loaded objects get the same values as committed
+    state, so the session does not re-flush them. Caller commits.
+    """
+    if not actives:
+        return {}
+    inputs = await load_tick_inputs(session, actives)
+    now = datetime.now(tz=timezone.utc)
+    results: dict[int, dict] = {}
+    ticked: list[tuple[ActiveExpedition, list[HiredWaifu], TickOutcome]] = []
+    hp_rows: list[dict] = []
+    for active in actives:
+        squad = inputs.squad_for(active)
+        res = compute_tick(active, squad, inputs, now=now)
+        if res.error:
+            results[int(active.id)] = {"ok": False, "error": res.error}
+            continue
+        ticked.append((active, squad, res))
+        for u in squad:
+            hp_rows.append(
+                {
+                    "id": int(u.id),
+                    "current_hp": res.hp[int(u.id)],
+                    "hp_updated_at": res.hp_updated_at or u.hp_updated_at,
+                }
+            )
+    if hp_rows:
+        await session.execute(update(HiredWaifu), hp_rows)
+    for _active, squad, res in ticked:
+        for u in squad:
+            set_committed_value(u, "current_hp", res.hp[int(u.id)])
+            if res.hp_updated_at is not None:
+                set_committed_value(u, "hp_updated_at", res.hp_updated_at)
+
+    exp_rows: list[dict] = []
+    for active, squad, res in ticked:
+        ts, out = await _render_tick(active, squad, res, silent=int(active.id) in silent_ids)
+        results[int(active.id)] = out
+        exp_rows.append(
+            {
+                "id": int(active.id),
+                "events_done": res.events_done,
+                "next_tick_at": res.next_tick_at,
+                "tick_state": ts,
+            }
+        )
+    if exp_rows:
+        await session.execute(update(ActiveExpedition), exp_rows)
+    for (active, _squad, res), row in zip(ticked, exp_rows):
+        set_committed_value(active, "events_done", res.events_done)
+        set_committed_value(active, "next_tick_at", res.next_tick_at)
+        set_committed_value(active, "tick_state", row["tick_state"])
+    return results
@@ -13,7 +13,7 @@ from waifu_bot.db.models import GambleOffer, InventoryItem, MainWaifu, Player
 from waifu_bot.game.formulas import calculate_gamble_price
 from waifu_bot.services.hidden_skills import record_hidden_gold_spend
 from waifu_bot.services.item_service import ItemService, RARITY_WEIGHTS, _pick_weighted
-from waifu_bot.services.passive_skills import apply_passive_buy_price
+from waifu_bot.services.player_pricing import get_player_pricing_context
 from waifu_bot.services.hidden_skills import get_hidden_skill_bonuses
 
 MSK = timezone(timedelta(hours=3))
@@ -92,7 +92,7 @@ class GambleService:
         waifu = await session.scalar(select(MainWaifu).where(MainWaifu.player_id == player_id))
         level = int(getattr(waifu, "level", None) or 1)
         price = calculate_gamble_price(level)
-        return await apply_passive_buy_price(session, player_id, price)
+        return (await get_player_pricing_context(session, player_id)).passive_price(price)
 
     async def _regenerate(
         self, session: AsyncSession, player_id: int, act: int
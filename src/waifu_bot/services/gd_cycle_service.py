@@ -29,6 +29,7 @@ from waifu_bot.game.constants import (
 from waifu_bot.services.game_config_service import get_game_config_map, cfg_int, cfg_float
 from waifu_bot.services.gd_scaling import compute_challenge_level
 from waifu_bot.services import gd_active_cache as gd_active_cache_mod
+from waifu_bot.services.redis_scripts import INCR_EXPIRE, run_script
 
 if TYPE_CHECKING:
     from aiogram import Bot
@@ -793,8 +794,7 @@ class GDCycleService:
 
         if self.redis:
             try:
-                await self.redis.incr(self._daily_chat_key(cycle.id))
-                await self.redis.expire(self._daily_chat_key(cycle.id), 86400 * 3)
+                await run_script(self.redis, INCR_EXPIRE, [self._daily_chat_key(cycle.id)], [86400 * 3])
             except Exception:
                 logger.debug("GD daily chat incr failed cycle=%s", cycle.id, exc_info=True)
 
@@ -58,11 +58,12 @@ def pick_loot_recipient_user_id(
     contrib: dict[str, Any],
     *,
     boss: bool,
+    rng: random.Random | None = None,
 ) -> int | None:
     """Random alive member; boss loot uses equal weight (no damage-based carry)."""
     if not alive_party:
         return None
-    return int(random.choice(alive_party)["user_id"])
+    return int((rng or random).choice(alive_party)["user_id"])
 
 
 async def try_award_item_on_monster_kill(
@@ -11,6 +11,8 @@ import json
 import logging
 from typing import Any
 
+from waifu_bot.services.redis_scripts import GD_PHANTOM_APPEND, run_script
+
 logger = logging.getLogger(__name__)
 
 REDIS_GD_PHANTOM_TXT = "gd_phantom_txt:"
@@ -48,20 +50,15 @@ async def append_phantom_text(
     uid = int(user_id)
     list_key = phantom_list_key(cid)
     ucnt_key = phantom_ucnt_key(cid)
+    payload = json.dumps({"u": uid, "t": body}, ensure_ascii=False, separators=(",", ":"))
     try:
-        total = await redis.llen(list_key)
-        if int(total or 0) >= MAX_ENTRIES_PER_CYCLE:
-            return False
-        raw_ucnt = await redis.hget(ucnt_key, str(uid))
-        ucnt = int(raw_ucnt or 0)
-        if ucnt >= MAX_MSGS_PER_USER:
-            return False
-        payload = json.dumps({"u": uid, "t": body}, ensure_ascii=False, separators=(",", ":"))
-        await redis.rpush(list_key, payload)
-        await redis.hincrby(ucnt_key, str(uid), 1)
-        await redis.expire(list_key, PHANTOM_TTL_SEC)
-        await redis.expire(ucnt_key, PHANTOM_TTL_SEC)
-        return True
+        stored = await run_script(
+            redis,
+            GD_PHANTOM_APPEND,
+            [list_key, ucnt_key],
+            [uid, payload, MAX_ENTRIES_PER_CYCLE, MAX_MSGS_PER_USER, PHANTOM_TTL_SEC],
+        )
+        return int(stored or 0) == 1
     except Exception:
         logger.debug(
             "GD phantom append failed cycle=%s uid=%s",
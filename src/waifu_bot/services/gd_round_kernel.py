@@ -0,0 +1,1203 @@
+"""GD v1.0: pure round kernel (initiative, skills, monsters) — no DB, no Redis.
+
+``run_round`` takes a :class:`RoundSnapshot` preloaded by ``gd_round_engine`` (battle
+state, active effects, skill cooldowns, class skills, monster templates, guild bonuses)
+and returns a :class:`RoundResult`: the new battle state plus the side effects the engine
+writes after the round (effect rows, cooldowns, loot rolls). All randomness comes from the
+``rng`` argument, so a seeded round replays exactly; ``replay_rounds`` chains rounds in
+memory for tests and offline benchmarks (``scripts/bench_gd_round_kernel.py``).
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass, field, replace
+from typing import Any, Iterable, Iterator
+
+from waifu_bot.db.models import MonsterTemplate
+from waifu_bot.game.constants import GD_ROUND_CYCLE_CAP_DEFAULT, MediaType
+from waifu_bot.game.formulas import calculate_damage_reduction, calculate_message_damage
+from waifu_bot.services.game_config_service import cfg_float, cfg_int
+from waifu_bot.services.gd_loot import pick_loot_recipient_user_id
+from waifu_bot.services.gd_scaling import (
+    compute_challenge_level,
+    maybe_grant_hp_break_assist,
+    merge_activity_totals_from_buffer,
+    normalized_damage_to_global_hp,
+    ref_hp_boss,
+    ref_hp_trash,
+    thematic_class_damage_mult,
+)
+
+# Map Telegram-ish media to gd_class_skills.media_type (audio uses video row)
+MEDIA_TO_SKILL_KEY = {
+    "text": None,
+    "sticker": "sticker",
+    "photo": "photo",
+    "gif": "gif",
+    "video": "video",
+    "voice": "video",
+}
+
+
+@dataclass(eq=False)
+class KernelEffect:
+    """One gd_active_effects row as the kernel sees it (``row`` is None for effects added this round)."""
+
+    target_type: str
+    target_id: int
+    effect_type: str
+    effect_value: float
+    expires_round: int
+    applied_round: int = 0
+    source_user_id: int | None = None
+    row: Any = None
+    removed: bool = False
+
+    @classmethod
+    def from_row(cls, row: Any) -> KernelEffect:
+        return cls(
+            target_type=str(row.target_type),
+            target_id=int(row.target_id),
+            effect_type=str(row.effect_type),
+            effect_value=float(row.effect_value or 0),
+            expires_round=int(row.expires_round),
+            applied_round=int(row.applied_round or 0),
+            source_user_id=row.source_user_id,
+            row=row,
+        )
+
+
+@dataclass(frozen=True)
+class SkillSpec:
+    """gd_class_skills row fields the kernel reads."""
+
+    effect_type: str | None
+    effect_value: float = 0.0
+    effect_duration: int = 1
+    cooldown_rounds: int = 2
+
+    @classmethod
+    def from_row(cls, row: Any) -> SkillSpec:
+        return cls(
+            effect_type=row.effect_type,
+            effect_value=float(row.effect_value or 0),
+            effect_duration=int(row.effect_duration or 1),
+            cooldown_rounds=int(row.cooldown_rounds or 2),
+        )
+
+
+@dataclass(frozen=True)
+class GuildBonus:
+    """Guild skill bonus to GD text damage for one player."""
+
+    damage_mult: float = 1.0
+    lines: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class LootClaim:
+    """Monster kill that earned a loot roll; the engine rolls the item after the round."""
+
+    recipient_user_id: int
+    avg_level: int
+    boss: bool
+
+
+@dataclass
+class RoundSnapshot:
+    """Everything one round reads. ``state`` is owned by the kernel and mutated in place."""
+
+    state: dict[str, Any]
+    buffer: dict[str, Any] | None
+    cfg: dict[str, str]
+    effects: list[KernelEffect] = field(default_factory=list)
+    # (user_id, skill media key) -> available_from_round
+    cooldowns: dict[tuple[int, str], int] = field(default_factory=dict)
+    # (gd_class_skills.class_id, skill media key) -> skill
+    skills: dict[tuple[str, str], SkillSpec] = field(default_factory=dict)
+    templates: dict[int, MonsterTemplate] = field(default_factory=dict)
+    # Boss candidates, used only if the trash wave is cleared this round.
+    boss_pool: tuple[MonsterTemplate, ...] = ()
+    guild: dict[int, GuildBonus] = field(default_factory=dict)
+
+
+@dataclass
+class RoundResult:
+    round_num: int
+    round_outcome: str
+    state: dict[str, Any]
+    actions_log: list[dict[str, Any]]
+    outcomes: dict[str, Any]
+    # Every effect the round saw, including removed ones and ones added this round.
+    effects: list[KernelEffect] = field(default_factory=list)
+    # Cooldowns set this round: (user_id, media key) -> available_from_round.
+    cooldowns: dict[tuple[int, str], int] = field(default_factory=dict)
+    loot: list[LootClaim] = field(default_factory=list)
+    # Trash wave cleared: all monster-targeted effects of the cycle are gone.
+    clear_monster_effects: bool = False
+    idle_silent_streak: int | None = None
+
+
+def _attack_type_for_class(class_id: int) -> str:
+    if class_id in (4,):  # MAGE
+        return "spell"
+    if class_id in (3, 5):  # ARCHER, ASSASSIN
+        return "ranged"
+    return "melee"
+
+
+def _weapon_dmg_from_level(level: int) -> int:
+    return max(1, 5 + int(level) // 2)
+
+
+def _monster_damage_raw(mt: MonsterTemplate | None, level: int, is_boss: bool) -> int:
+    if mt is None:
+        return max(1, 5 + 2 * max(1, level))
+    raw = int(mt.dmg_base or 5) + int(mt.dmg_per_level or 2) * max(1, level)
+    if is_boss:
+        raw = int(raw * float(mt.boss_dmg_mult or 1.8))
+    return max(1, raw)
+
+
+def trash_tier(challenge_level: int) -> int:
+    return min(5, max(1, int(challenge_level) // 12 + 1))
+
+
+def boss_tier(challenge_level: int) -> int:
+    return min(5, max(1, int(challenge_level) // 12 + 2))
+
+
+def build_trash_wave(
+    party: list[dict],
+    hp_scale: float,
+    challenge_level: int,
+    pool: list[MonsterTemplate] | tuple[MonsterTemplate, ...],
+    rng: random.Random,
+) -> list[dict]:
+    n_players = len(party)
+    # 2p: single trash; larger parties keep 1 + n//2
+    n_mons = 1 if n_players <= 2 else 1 + n_players // 2
+    ch = max(1, min(60, int(challenge_level)))
+    templates: list[MonsterTemplate | None] = [rng.choice(pool) for _ in range(n_mons)] if pool else []
+    if not templates:
+        templates = [None] * n_mons
+    monsters = []
+    for i, mt in enumerate(templates):
+        if mt is None:
+            base_hp = 40 + 10 * ch
+            hp = max(1, int(base_hp * n_players * hp_scale))
+            monsters.append(
+                {
+                    "id": 1000 + i,
+                    "template_id": 0,
+                    "name": "Монстр",
+                    "hp": hp,
+                    "max_hp": hp,
+                    "agility": 10,
+                    "level": ch,
+                    "is_boss": False,
+                    "skip_next": False,
+                    "init_penalty": 0,
+                    "n_players": n_players,
+                    "hp_scale": hp_scale,
+                }
+            )
+            continue
+        base_hp = int(mt.hp_base or 40) + int(mt.hp_per_level or 10) * ch
+        hp = max(1, int(base_hp * n_players * hp_scale))
+        agi = 8 + int(mt.tier or 1) * 2
+        monsters.append(
+            {
+                "id": 1000 + i,
+                "template_id": mt.id,
+                "name": mt.name,
+                "hp": hp,
+                "max_hp": hp,
+                "agility": agi,
+                "level": ch,
+                "is_boss": False,
+                "skip_next": False,
+                "init_penalty": 0,
+                "n_players": n_players,
+                "hp_scale": hp_scale,
+            }
+        )
+    return monsters
+
+
+def build_boss(
+    party: list[dict],
+    challenge_level: int,
+    cfg: dict[str, str],
+    pool: list[MonsterTemplate] | tuple[MonsterTemplate, ...],
+    rng: random.Random,
+) -> list[dict]:
+    n_players = len(party)
+    ch = max(1, min(60, int(challenge_level)))
+    party_hp_mult = 1.0 + cfg_float(cfg, "gd_boss_hp_party_mult", 0.08) * max(0, n_players - 2)
+    bm = 2.5
+    if not pool:
+        hp = max(1, int((40 + 10 * ch) * bm * party_hp_mult))
+        return [
+            {
+                "id": 2000,
+                "template_id": 0,
+                "name": "Босс подземелья",
+                "hp": hp,
+                "max_hp": hp,
+                "agility": 14,
+                "level": ch,
+                "is_boss": True,
+                "skip_next": False,
+                "init_penalty": 0,
+                "n_players": n_players,
+                "hp_scale": 1.0,
+                "boss_hp_mult": bm,
+            }
+        ]
+    mt = rng.choice(pool)
+    bm = float(mt.boss_hp_mult or 2.5)
+    base_hp = int(mt.hp_base or 40) + int(mt.hp_per_level or 10) * ch
+    hp = max(1, int(base_hp * bm * party_hp_mult))
+    return [
+        {
+            "id": 2000,
+            "template_id": mt.id,
+            "name": mt.name,
+            "hp": hp,
+            "max_hp": hp,
+            "agility": 10 + int(mt.tier or 1) * 2,
+            "level": ch,
+            "is_boss": True,
+            "skip_next": False,
+            "init_penalty": 0,
+            "n_players": n_players,
+            "hp_scale": 1.0,
+            "boss_hp_mult": bm,
+        }
+    ]
+
+
+def prepare_round_state(state: dict[str, Any], cfg: dict[str, str]) -> int:
+    """Reset per-round fields and pin the challenge level; returns it."""
+    state["taunt_user_id"] = None
+    state.setdefault("contribution", {})
+    state["__gd_cfg_thematic_mult"] = cfg_float(cfg, "gd_thematic_bonus_mult", 1.15)
+    ch_raw = state.get("challenge_level")
+    if ch_raw is None:
+        challenge_level = compute_challenge_level([int(p.get("level") or 1) for p in state.get("party") or []], cfg)
+        state["challenge_level"] = challenge_level
+    else:
+        challenge_level = max(1, min(60, int(ch_raw)))
+    state.setdefault("activity_totals", {})
+    return challenge_level
+
+
+def needs_trash_wave(state: dict[str, Any]) -> bool:
+    return state.get("wave") == "pending_init" or (not state.get("monsters") and state.get("wave") != "done")
+
+
+def _highest_hp_monster(monsters: list[dict]) -> dict | None:
+    alive = [m for m in monsters if m["hp"] > 0]
+    if not alive:
+        return None
+    return max(alive, key=lambda m: m["hp"])
+
+
+def _lowest_hp_pct_member(party: list[dict]) -> dict | None:
+    alive = [p for p in party if not p.get("fallen") and int(p.get("current_hp") or 0) > 0]
+    if not alive:
+        return None
+    def pct(p):
+        mx = max(1, int(p.get("max_hp") or 1))
+        return int(p.get("current_hp") or 0) / mx
+    return min(alive, key=pct)
+
+
+def _first_fallen(party: list[dict]) -> dict | None:
+    for p in party:
+        if p.get("fallen") or int(p.get("current_hp") or 0) <= 0:
+            return p
+    return None
+
+
+def _monster_armor_debuff_mult(fx: list[KernelEffect], monster_id: int) -> float:
+    tot = 0.0
+    found = False
+    for e in fx:
+        if e.effect_type != "DEBUFF_MONSTER_ARMOR":
+            continue
+        if e.target_type != "monster" or int(e.target_id) != int(monster_id):
+            continue
+        found = True
+        tot += float(e.effect_value or 0)
+    if not found:
+        return 1.0
+    pct = tot if tot > 0 else 12.0
+    return 1.0 + min(0.75, pct / 100.0)
+
+
+def _party_damage_mult(fx: list[KernelEffect], uid: int) -> float:
+    s = 0.0
+    for e in fx:
+        if e.effect_type != "BUFF_PARTY_DAMAGE":
+            continue
+        if e.target_type != "player":
+            continue
+        tid = int(e.target_id)
+        if tid not in (0, int(uid)):
+            continue
+        s += float(e.effect_value or 0)
+    return 1.0 + min(0.8, s / 100.0)
+
+
+def _party_evasion_pct(fx: list[KernelEffect]) -> float:
+    s = 0.0
+    for e in fx:
+        if e.effect_type == "EVASION_PARTY" and e.target_type == "player" and int(e.target_id) == 0:
+            s += float(e.effect_value or 0)
+    return min(75.0, s if s > 0 else 0.0)
+
+
+def _party_reflect_pct(fx: list[KernelEffect]) -> float:
+    s = 0.0
+    for e in fx:
+        if e.effect_type == "REFLECT" and e.target_type == "player" and int(e.target_id) == 0:
+            s += float(e.effect_value or 0)
+    return min(80.0, s)
+
+
+def _build_initiative_queue(
+    party: list[dict], monsters: list[dict], rng: random.Random
+) -> list[tuple[str, dict, int, int]]:
+    actors: list[tuple[str, dict, int, int]] = []
+    for p in party:
+        if p.get("fallen") or int(p.get("current_hp") or 0) <= 0:
+            continue
+        sc = rng.randint(1, 20) + int(p.get("agility") or 10)
+        actors.append(("player", p, sc, int(p.get("user_id") or 0)))
+    for m in monsters:
+        if m["hp"] <= 0:
+            continue
+        sc = rng.randint(1, 20) - int(m.get("init_penalty") or 0)
+        actors.append(("monster", m, sc, int(m["id"])))
+    actors.sort(key=lambda t: (-t[2], -t[3]))
+    return actors
+
+
+def _player_action_sequence(ubuf: dict[str, Any]) -> list[dict[str, Any]]:
+    """Упорядоченный список действий игрока за раунд (для мульти-циклового реплея).
+
+    Берём `actions` из буфера (с анти-спам склейкой в серии). Для обратной совместимости
+    со старым форматом буфера (`text_len`/`media`) собираем одно текстовое действие + по
+    одному действию на каждый медиа-элемент.
+    """
+    acts = ubuf.get("actions")
+    if isinstance(acts, list) and acts:
+        out: list[dict[str, Any]] = []
+        for a in acts:
+            if not isinstance(a, dict):
+                continue
+            kind = a.get("kind")
+            if kind == "text" and int(a.get("len") or 0) > 0:
+                out.append(
+                    {"kind": "text", "len": int(a["len"]), "count": int(a.get("count") or 1)}
+                )
+            elif kind == "media" and a.get("media_kind"):
+                out.append(
+                    {
+                        "kind": "media",
+                        "media_kind": a.get("media_kind"),
+                        "count": int(a.get("count") or 1),
+                    }
+                )
+        return out
+    # legacy fallback
+    out = []
+    if int(ubuf.get("text_len") or 0) > 0:
+        out.append({"kind": "text", "len": int(ubuf["text_len"]), "count": 1})
+    for mk in ubuf.get("media") or []:
+        out.append({"kind": "media", "media_kind": mk, "count": 1})
+    return out
+
+
+def action_sequences(party: list[dict], buffer: dict[str, Any] | None) -> dict[int, list[dict[str, Any]]]:
+    """user_id -> ordered actions this round, for every party member."""
+    users_buf = (buffer or {}).get("users") or {}
+    return {
+        int(p.get("user_id") or 0): _player_action_sequence(users_buf.get(str(int(p.get("user_id") or 0))) or {})
+        for p in party
+    }
+
+
+class _Round:
+    """Mutable working set of one ``run_round`` call."""
+
+    def __init__(self, snap: RoundSnapshot, rng: random.Random) -> None:
+        self.snap = snap
+        self.rng = rng
+        self.state = snap.state
+        self.party: list[dict] = self.state.get("party") or []
+        self.monsters: list[dict] = self.state.get("monsters") or []
+        self.contrib: dict = self.state.setdefault("contribution", {})
+        self.round_num = int(self.state.get("collecting_for_round") or 1)
+        self.fx: list[KernelEffect] = [e for e in snap.effects if not e.removed]
+        self.all_effects: list[KernelEffect] = list(snap.effects)
+        self.cooldowns = snap.cooldowns
+        self.cooldown_updates: dict[tuple[int, str], int] = {}
+        self.loot: list[LootClaim] = []
+        self.clear_monster_effects = False
+        self.actions_log: list[dict[str, Any]] = []
+        self.outcomes: dict[str, Any] = {
+            "hits": [],
+            "heals": [],
+            "flags": {"revive_no_target": False, "heal_no_target": False, "skill_on_cooldown": []},
+        }
+
+    # --- effects / cooldowns / loot -------------------------------------------------
+
+    def add_effect(
+        self,
+        target_type: str,
+        target_id: int,
+        effect_type: str,
+        effect_value: float,
+        expires_round: int,
+        source_user_id: int | None = None,
+        applied_round: int = 0,
+    ) -> None:
+        e = KernelEffect(
+            target_type=target_type,
+            target_id=int(target_id),
+            effect_type=effect_type,
+            effect_value=float(effect_value),
+            expires_round=int(expires_round),
+            applied_round=int(applied_round),
+            source_user_id=source_user_id,
+        )
+        self.fx.append(e)
+        self.all_effects.append(e)
+
+    def remove_effect(self, e: KernelEffect) -> None:
+        e.removed = True
+        self.fx.remove(e)
+
+    def consume_buff_crit_next(self, uid: int) -> float:
+        mult = 1.0
+        for e in list(self.fx):
+            if e.effect_type != "BUFF_CRIT_NEXT" or e.target_type != "player" or int(e.target_id) != int(uid):
+                continue
+            mult = max(mult, 1.5 if float(e.effect_value or 0) <= 1.0 else float(e.effect_value))
+            self.remove_effect(e)
+        return mult
+
+    def consume_party_shields(self, incoming: int) -> tuple[int, int]:
+        left = incoming
+        absorbed = 0
+        shields = [
+            e
+            for e in list(self.fx)
+            if e.effect_type == "SHIELD_PARTY" and e.target_type == "player" and int(e.target_id) == 0
+        ]
+        for e in shields:
+            if left <= 0:
+                break
+            pool = float(e.effect_value or 0)
+            take = min(pool, float(left))
+            pool -= take
+            left -= int(take)
+            absorbed += int(take)
+            e.effect_value = pool
+            if pool <= 0.01:
+                self.remove_effect(e)
+        return absorbed, left
+
+    def drop_monster_effects(self) -> None:
+        for e in list(self.fx):
+            if e.target_type == "monster":
+                self.remove_effect(e)
+        self.clear_monster_effects = True
+
+    def cooldown_ok(self, uid: int, media_key: str) -> bool:
+        avail = self.cooldowns.get((uid, media_key))
+        return avail is None or int(avail) <= self.round_num
+
+    def set_cooldown(self, uid: int, media_key: str, cd: int) -> None:
+        avail = self.round_num + max(1, cd)
+        self.cooldowns[(uid, media_key)] = avail
+        self.cooldown_updates[(uid, media_key)] = avail
+
+    def grant_loot_if_monster_died(self, m: dict) -> None:
+        if int(m.get("hp") or 0) > 0:
+            return
+        party = self.party
+        n_players = len(party)
+        ch = int(self.state.get("challenge_level") or 0)
+        if ch <= 0:
+            ch = max(1, sum(int(p.get("level") or 1) for p in party) // max(1, n_players))
+        alive = [p for p in party if not p.get("fallen") and int(p.get("current_hp") or 0) > 0]
+        recipient = pick_loot_recipient_user_id(
+            alive, self.state.get("contribution") or {}, boss=bool(m.get("is_boss")), rng=self.rng
+        )
+        if recipient is None:
+            return
+        self.loot.append(LootClaim(recipient_user_id=recipient, avg_level=max(1, ch), boss=bool(m.get("is_boss"))))
+
+    # --- damage ---------------------------------------------------------------------
+
+    def damage_monster(self, m: dict[str, Any], raw_damage: int, attacker: dict[str, Any]) -> int:
+        """Apply raw DPS to shared HP pool using per-attacker level normalization."""
+        if raw_damage <= 0:
+            return 0
+        mt = self.snap.templates.get(int(m.get("template_id") or 0))
+        L = max(1, min(60, int(attacker.get("level") or 1)))
+        n_players = int(m.get("n_players") or max(1, len(self.party)))
+        hp_scale = float(m.get("hp_scale") or 0.7)
+        g = int(m.get("max_hp") or 1)
+        if m.get("is_boss"):
+            bm = float(m.get("boss_hp_mult") or 2.5)
+            ref = ref_hp_boss(mt, L, bm)
+        else:
+            ref = ref_hp_trash(mt, L, n_players, hp_scale)
+        delta = normalized_damage_to_global_hp(g, raw_damage, ref)
+        hp_before = int(m.get("hp") or 0)
+        m["hp"] = max(0, hp_before - delta)
+        uid = int(attacker.get("user_id") or 0)
+        if uid:
+            maybe_grant_hp_break_assist(self.state, uid, m, hp_before, int(m["hp"]))
+        return delta
+
+    def reflect_to_monster(self, m: dict[str, Any], reflected_raw: int) -> int:
+        """Normalize reflect damage using challenge_level as reference tier."""
+        if reflected_raw <= 0:
+            return 0
+        mt = self.snap.templates.get(int(m.get("template_id") or 0))
+        cl = max(1, min(60, int(self.state.get("challenge_level") or 1)))
+        n_players = int(m.get("n_players") or max(1, len(self.party)))
+        hp_scale = float(m.get("hp_scale") or 0.7)
+        g = int(m.get("max_hp") or 1)
+        if m.get("is_boss"):
+            bm = float(m.get("boss_hp_mult") or 2.5)
+            ref = ref_hp_boss(mt, cl, bm)
+        else:
+            ref = ref_hp_trash(mt, cl, n_players, hp_scale)
+        delta = normalized_damage_to_global_hp(g, reflected_raw, ref)
+        m["hp"] = max(0, int(m.get("hp") or 0) - delta)
+        return delta
+
+    def spawn_boss(self) -> None:
+        self.drop_monster_effects()
+        self.state["wave"] = "boss"
+        self.state["monsters"] = build_boss(
+            self.party,
+            int(self.state.get("challenge_level") or 1),
+            self.snap.cfg,
+            self.snap.boss_pool,
+            self.rng,
+        )
+        self.monsters = self.state["monsters"]
+
+    # --- turns ----------------------------------------------------------------------
+
+    def player_action(self, p: dict, action: dict[str, Any], cycle_no: int) -> None:
+        """Одно действие игрока в текущем цикле раунда: текстовая атака или навык (по медиа)."""
+        uid = int(p.get("user_id", 0))
+        kind = action.get("kind")
+        count = max(1, int(action.get("count") or 1))
+
+        if kind == "text":
+            text_len = int(action.get("len") or 0)
+            if text_len <= 0:
+                return
+            atk = _attack_type_for_class(int(p.get("class_id") or 1))
+            wd = int(p.get("weapon_damage") or 0)
+            if wd <= 0:
+                wd = _weapon_dmg_from_level(int(p.get("level") or 1))
+            td = calculate_message_damage(
+                MediaType.TEXT,
+                int(p.get("strength") or 10),
+                int(p.get("agility") or 10),
+                int(p.get("intelligence") or 10),
+                atk,
+                message_length=text_len,
+                weapon_damage=wd,
+            )
+            crit_m = self.consume_buff_crit_next(uid)
+            td = int(td * crit_m * _party_damage_mult(self.fx, uid))
+            theme_mult = thematic_class_damage_mult(
+                int(p.get("class_id") or 0),
+                self.state.get("thematic_bonus_class_ids"),
+                {"gd_thematic_bonus_mult": str(self.state.get("__gd_cfg_thematic_mult") or 1.15)},
+            )
+            if theme_mult != 1.0:
+                td = max(1, int(td * theme_mult))
+            guild_mult = 1.0
+            guild_skill_lines: list[str] = []
+            bonus = self.snap.guild.get(uid)
+            if bonus is not None:
+                guild_mult = bonus.damage_mult
+                td = max(1, int(td * guild_mult))
+                guild_skill_lines = list(bonus.lines)
+            m = _highest_hp_monster(self.monsters)
+            if m and td > 0:
+                mult = _monster_armor_debuff_mult(self.fx, int(m["id"]))
+                td = max(1, int(td * mult))
+                delta = self.damage_monster(m, td, p)
+                self.actions_log.append(
+                    {
+                        "user_id": uid,
+                        "kind": "text",
+                        "cycle": cycle_no,
+                        "series": count,
+                        "damage": int(delta),
+                        "guild_damage_pct": guild_mult - 1.0,
+                        "guild_skill_lines": guild_skill_lines,
+                        "thematic": theme_mult > 1.0,
+                    }
+                )
+                c = self.contrib.setdefault(
+                    str(uid), {"text": 0, "skill": 0, "heal": 0, "rounds": 0, "assists": 0}
+                )
+                c["text"] = int(c.get("text") or 0) + int(delta)
+                self.outcomes["hits"].append({"target": m["id"], "damage": int(delta), "from": uid})
+                self.grant_loot_if_monster_died(m)
+            return
+
+        if kind == "media":
+            mk = action.get("media_kind")
+            sk = MEDIA_TO_SKILL_KEY.get(mk)
+            if not sk:
+                return
+            if not self.cooldown_ok(uid, sk):
+                self.outcomes["flags"]["skill_on_cooldown"].append(uid)
+                return
+            row = self.snap.skills.get((str(int(p.get("class_id") or 1)), sk))
+            if not row:
+                return
+            self.skill_effect(row, p)
+            self.set_cooldown(uid, sk, int(row.cooldown_rounds or 2))
+
+    def monster_turn(self, m: dict, taunt_uid: int | None, cycle_no: int) -> None:
+        if m["hp"] <= 0:
+            return
+        if m.get("skip_next"):
+            m["skip_next"] = False
+            self.actions_log.append({"monster": m["id"], "skipped": True, "cycle": cycle_no})
+            return
+        mt = self.snap.templates.get(int(m.get("template_id") or 0))
+        targets = [p for p in self.party if not p.get("fallen") and int(p.get("current_hp") or 0) > 0]
+        if not targets:
+            return
+        if taunt_uid:
+            tgt = next((p for p in targets if int(p.get("user_id", 0)) == int(taunt_uid)), None)
+            if not tgt:
+                tgt = self.rng.choice(targets)
+        else:
+            tgt = self.rng.choice(targets)
+
+        tgt_lvl = max(1, min(60, int(tgt.get("level") or 1)))
+        raw = _monster_damage_raw(mt, tgt_lvl, bool(m.get("is_boss")))
+        party_scale = float(self.state.get("__monster_dmg_party_scale") or 1.0)
+        if party_scale < 1.0:
+            raw = max(1, int(raw * party_scale))
+
+        evp = _party_evasion_pct(self.fx)
+        if evp > 0 and self.rng.uniform(0, 100) < evp:
+            self.actions_log.append(
+                {"monster": m["id"], "target": tgt.get("user_id"), "evaded": True, "cycle": cycle_no}
+            )
+            return
+
+        ref_pct = _party_reflect_pct(self.fx)
+        reflected = int(raw * min(0.85, ref_pct / 100.0)) if ref_pct > 0 else 0
+        if reflected > 0 and m["hp"] > 0:
+            rdelta = self.reflect_to_monster(m, reflected)
+            self.outcomes["hits"].append({"reflect": True, "monster": m["id"], "damage": rdelta})
+            self.grant_loot_if_monster_died(m)
+            if m["hp"] <= 0:
+                return
+
+        reduc = calculate_damage_reduction(int(tgt.get("endurance") or 10))
+        pre_shield = max(1, int((raw - reflected) * (1.0 - reduc)))
+        _, to_player = self.consume_party_shields(pre_shield)
+        final_dmg = max(0, to_player)
+        if final_dmg <= 0:
+            self.actions_log.append(
+                {"monster": m["id"], "target": tgt.get("user_id"), "shielded": True, "cycle": cycle_no}
+            )
+            return
+        chp = int(tgt.get("current_hp") or 0) - final_dmg
+        tgt["current_hp"] = max(0, chp)
+        if tgt["current_hp"] <= 0:
+            tgt["fallen"] = True
+        self.actions_log.append(
+            {
+                "kind": "monster_hit",
+                "monster_id": int(m["id"]),
+                "target_user_id": int(tgt.get("user_id") or 0),
+                "damage": int(final_dmg),
+                "cycle": cycle_no,
+            }
+        )
+        self.outcomes["hits"].append({"monster": m["id"], "target": tgt.get("user_id"), "damage": final_dmg})
+
+    def dot_phase(self) -> None:
+        round_num = self.round_num
+        for e in list(self.fx):
+            if e.effect_type != "DOT" or e.target_type != "monster":
+                continue
+            if not (int(e.applied_round) < round_num <= int(e.expires_round)):
+                continue
+            tid = int(e.target_id)
+            for m in self.monsters:
+                if m["id"] != tid or m["hp"] <= 0:
+                    continue
+                dmg_raw = max(1, int(m["max_hp"] * float(e.effect_value or 0) / 100.0))
+                su = e.source_user_id
+                atk: dict[str, Any] = {"level": 1}
+                if su:
+                    pl = next((p for p in self.party if int(p.get("user_id", 0)) == int(su)), None)
+                    if pl:
+                        atk = pl
+                delta = self.damage_monster(m, dmg_raw, atk)
+                self.outcomes["hits"].append({"dot": True, "target": tid, "damage": delta})
+                self.actions_log.append(
+                    {
+                        "kind": "dot_tick",
+                        "monster_id": tid,
+                        "damage": int(delta),
+                        "source_user_id": int(su) if su else None,
+                    }
+                )
+                if su:
+                    c = self.contrib.setdefault(
+                        str(int(su)), {"text": 0, "skill": 0, "heal": 0, "rounds": 0, "assists": 0}
+                    )
+                    c["skill"] = int(c.get("skill") or 0) + max(1, delta // 4)
+                self.grant_loot_if_monster_died(m)
+
+    def regen_phase(self) -> None:
+        round_num = self.round_num
+        for e in list(self.fx):
+            if e.effect_type != "REGEN" or e.target_type != "player":
+                continue
+            if not (int(e.applied_round) < round_num <= int(e.expires_round)):
+                continue
+            uid = int(e.target_id)
+            if uid == 0:
+                for t in self.party:
+                    if t.get("fallen"):
+                        continue
+                    mx = max(1, int(t.get("max_hp") or 1))
+                    add = max(1, int(mx * float(e.effect_value or 0) / 100.0))
+                    t["current_hp"] = min(mx, int(t.get("current_hp") or 0) + add)
+                self.actions_log.append({"skill": "REGEN_TICK", "party": True})
+            else:
+                t = next((p for p in self.party if int(p.get("user_id", 0)) == uid), None)
+                if t and not t.get("fallen"):
+                    mx = max(1, int(t.get("max_hp") or 1))
+                    add = max(1, int(mx * float(e.effect_value or 0) / 100.0))
+                    t["current_hp"] = min(mx, int(t.get("current_hp") or 0) + add)
+                    self.actions_log.append({"user_id": uid, "skill": "REGEN_TICK", "heal": add})
+
+    def skill_effect(self, row: SkillSpec, caster: dict) -> None:
+        party, monsters, fx = self.party, self.monsters, self.fx
+        actions_log, outcomes, contrib = self.actions_log, self.outcomes, self.contrib
+        round_num = self.round_num
+        uid = int(caster.get("user_id", 0))
+        et = row.effect_type
+        ev = float(row.effect_value or 0)
+        dur = int(row.effect_duration or 1)
+        exp_r = round_num + max(1, dur)
+
+        def add_contrib_skill(amount: int) -> None:
+            c = contrib.setdefault(
+                str(uid), {"text": 0, "skill": 0, "heal": 0, "rounds": 0, "assists": 0}
+            )
+            c["skill"] = int(c.get("skill") or 0) + int(amount)
+
+        def grant_support_assist() -> None:
+            assists = self.state.setdefault("assists", {})
+            key = str(uid)
+            assists[key] = int(assists.get(key) or 0) + 1
+            c = contrib.setdefault(
+                key, {"text": 0, "skill": 0, "heal": 0, "rounds": 0, "assists": 0}
+            )
+            c["assists"] = int(c.get("assists") or 0) + 1
+
+        def skill_damage(message_length: int, weapon_damage: int) -> int:
+            return int(
+                calculate_message_damage(
+                    MediaType.TEXT,
+                    int(caster.get("strength") or 10),
+                    int(caster.get("agility") or 10),
+                    int(caster.get("intelligence") or 10),
+                    _attack_type_for_class(int(caster.get("class_id") or 1)),
+                    message_length=message_length,
+                    weapon_damage=weapon_damage,
+                )
+                * pm
+            )
+
+        pm = _party_damage_mult(fx, uid)
+        weapon = _weapon_dmg_from_level(int(caster.get("level") or 1))
+
+        if et == "DAMAGE_SINGLE":
+            m = _highest_hp_monster(monsters)
+            if m:
+                base = skill_damage(40, int(weapon * ev))
+                base = max(1, int(base * _monster_armor_debuff_mult(fx, int(m["id"]))))
+                delta = self.damage_monster(m, base, caster)
+                add_contrib_skill(delta)
+                actions_log.append({"user_id": uid, "skill": et, "damage": delta})
+                outcomes["hits"].append({"skill": et, "damage": delta, "target": m["id"]})
+                self.grant_loot_if_monster_died(m)
+
+        elif et == "DAMAGE_ALL":
+            wd = int(weapon * ev)
+            tot = 0
+            for m in monsters:
+                if m["hp"] <= 0:
+                    continue
+                d = skill_damage(20, max(1, wd // max(1, len(monsters))))
+                d = max(1, int(d * _monster_armor_debuff_mult(fx, int(m["id"]))))
+                delta = self.damage_monster(m, d, caster)
+                tot += delta
+                self.grant_loot_if_monster_died(m)
+            add_contrib_skill(tot)
+            actions_log.append({"user_id": uid, "skill": et, "damage": tot})
+
+        elif et == "DAMAGE_SELF_BOOST":
+            m = _highest_hp_monster(monsters)
+            if m:
+                d = skill_damage(30, int(weapon * ev))
+                d = max(1, int(d * _monster_armor_debuff_mult(fx, int(m["id"]))))
+                delta = self.damage_monster(m, d, caster)
+                cost_pct = dur
+                mx = max(1, int(caster.get("max_hp") or 100))
+                caster["current_hp"] = max(1, int(caster.get("current_hp") or 1) - int(mx * cost_pct / 100.0))
+                add_contrib_skill(delta)
+                actions_log.append({"user_id": uid, "skill": et, "damage": delta, "self_cost_pct": cost_pct})
+                self.grant_loot_if_monster_died(m)
+
+        elif et == "DOT":
+            m = _highest_hp_monster(monsters)
+            if m:
+                self.add_effect(
+                    "monster", int(m["id"]), "DOT", ev, round_num + dur,
+                    source_user_id=uid, applied_round=round_num,
+                )
+                add_contrib_skill(1)
+                actions_log.append({"user_id": uid, "skill": et, "target": m["id"]})
+
+        elif et == "TAUNT":
+            self.state["taunt_user_id"] = uid
+            outcomes.setdefault("taunt_set", uid)
+            grant_support_assist()
+            actions_log.append({"user_id": uid, "skill": et})
+
+        elif et in ("HEAL_SINGLE",):
+            t = _lowest_hp_pct_member(party)
+            if t:
+                mx = max(1, int(t.get("max_hp") or 1))
+                add = int(mx * ev / 100.0)
+                if add < 1 and int(t.get("current_hp") or 0) >= mx:
+                    outcomes["flags"]["heal_no_target"] = True
+                else:
+                    t["current_hp"] = min(mx, int(t.get("current_hp") or 0) + max(1, add))
+                    c = contrib.setdefault(
+                        str(uid), {"text": 0, "skill": 0, "heal": 0, "rounds": 0, "assists": 0}
+                    )
+                    c["heal"] = int(c.get("heal") or 0) + max(1, add)
+                    grant_support_assist()
+                    actions_log.append({"user_id": uid, "skill": et, "heal": max(1, add)})
+            else:
+                outcomes["flags"]["heal_no_target"] = True
+
+        elif et == "HEAL_ALL":
+            mxv = 0
+            for t in party:
+                if t.get("fallen"):
+                    continue
+                mx = max(1, int(t.get("max_hp") or 1))
+                add = int(mx * ev / 100.0)
+                t["current_hp"] = min(mx, int(t.get("current_hp") or 0) + max(1, add))
+                mxv += max(1, add)
+            c = contrib.setdefault(
+                str(uid), {"text": 0, "skill": 0, "heal": 0, "rounds": 0, "assists": 0}
+            )
+            c["heal"] = int(c.get("heal") or 0) + mxv
+            grant_support_assist()
+            actions_log.append({"user_id": uid, "skill": et, "heal": mxv})
+
+        elif et == "REVIVE":
+            fallen = _first_fallen(party)
+            if fallen:
+                mx = max(1, int(fallen.get("max_hp") or 1))
+                pct = ev / 100.0 if ev > 1.0 else ev
+                fallen["current_hp"] = max(1, int(mx * pct))
+                fallen["fallen"] = False
+                grant_support_assist()
+                actions_log.append({"user_id": uid, "skill": et})
+            else:
+                outcomes["flags"]["revive_no_target"] = True
+                actions_log.append({"user_id": uid, "skill": et, "whiff": True})
+
+        elif et == "SHIELD_PARTY":
+            self.add_effect("player", 0, "SHIELD_PARTY", float(ev), exp_r, source_user_id=uid, applied_round=round_num)
+            grant_support_assist()
+            actions_log.append({"user_id": uid, "skill": et, "absorb": ev})
+
+        elif et == "DEBUFF_MONSTER_SKIP":
+            m = _highest_hp_monster(monsters)
+            if m:
+                m["skip_next"] = True
+                grant_support_assist()
+                actions_log.append({"user_id": uid, "skill": et, "target": m["id"]})
+
+        elif et == "DEBUFF_MONSTER_INITIATIVE":
+            m = _highest_hp_monster(monsters)
+            if m:
+                m["init_penalty"] = int(m.get("init_penalty") or 0) + int(ev)
+                grant_support_assist()
+                actions_log.append({"user_id": uid, "skill": et})
+
+        elif et == "EVASION_PARTY":
+            evasion_val = float(ev) if ev > 0 else 25.0
+            self.add_effect("player", 0, "EVASION_PARTY", evasion_val, exp_r, source_user_id=uid, applied_round=round_num)
+            grant_support_assist()
+            actions_log.append({"user_id": uid, "skill": et})
+
+        elif et == "BUFF_CRIT_NEXT":
+            self.add_effect(
+                "player", uid, "BUFF_CRIT_NEXT", max(1.5, ev) if ev > 1.0 else 0.0, round_num + 1,
+                source_user_id=uid, applied_round=round_num,
+            )
+            actions_log.append({"user_id": uid, "skill": et, "value": ev, "duration": dur})
+
+        elif et == "BUFF_PARTY_DAMAGE":
+            for pl in party:
+                if pl.get("fallen") or int(pl.get("current_hp") or 0) <= 0:
+                    continue
+                self.add_effect(
+                    "player", int(pl["user_id"]), "BUFF_PARTY_DAMAGE", ev, exp_r,
+                    source_user_id=uid, applied_round=round_num,
+                )
+            actions_log.append({"user_id": uid, "skill": et, "value": ev, "duration": dur})
+
+        elif et == "DEBUFF_MONSTER_ARMOR":
+            m = _highest_hp_monster(monsters)
+            if m:
+                arm = float(ev) if ev > 0 else 15.0
+                self.add_effect(
+                    "monster", int(m["id"]), "DEBUFF_MONSTER_ARMOR", arm, exp_r,
+                    source_user_id=uid, applied_round=round_num,
+                )
+                actions_log.append({"user_id": uid, "skill": et, "value": arm, "duration": dur})
+
+        elif et == "REFLECT":
+            ref_v = float(ev) if ev > 0 else 35.0
+            self.add_effect("player", 0, "REFLECT", ref_v, exp_r, source_user_id=uid, applied_round=round_num)
+            actions_log.append({"user_id": uid, "skill": et, "value": ref_v, "duration": dur})
+
+        elif et == "REGEN":
+            for pl in party:
+                if pl.get("fallen") or int(pl.get("current_hp") or 0) <= 0:
+                    continue
+                self.add_effect(
+                    "player", int(pl["user_id"]), "REGEN", ev if ev > 0 else 5.0, exp_r,
+                    source_user_id=uid, applied_round=round_num,
+                )
+            actions_log.append({"user_id": uid, "skill": et, "value": ev, "duration": dur})
+
+        elif et == "GOLD_BONUS":
+            lm = self.state.setdefault("loot_modifiers", {})
+            lm["gold_pct"] = float(lm.get("gold_pct") or 0) + ev
+            actions_log.append({"user_id": uid, "skill": et, "value": ev, "duration": dur})
+
+        else:
+            actions_log.append({"user_id": uid, "skill": et or "unknown"})
+
+    def result(self, round_outcome: str, **kwargs: Any) -> RoundResult:
+        self.state.pop("__gd_cfg_thematic_mult", None)
+        self.state.pop("__monster_dmg_party_scale", None)
+        return RoundResult(
+            round_num=self.round_num,
+            round_outcome=round_outcome,
+            state=self.state,
+            actions_log=self.actions_log,
+            outcomes=self.outcomes,
+            effects=self.all_effects,
+            cooldowns=self.cooldown_updates,
+            loot=self.loot,
+            clear_monster_effects=self.clear_monster_effects,
+            **kwargs,
+        )
+
+
+def run_round(snap: RoundSnapshot, rng: random.Random) -> RoundResult:
+    """Simulate one round over a preloaded snapshot (state after ``prepare_round_state``)."""
+    r = _Round(snap, rng)
+    state, party, cfg = r.state, r.party, snap.cfg
+    round_num = r.round_num
+    actions_log = r.actions_log
+
+    # Учитываем КАЖДОЕ сообщение: собираем упорядоченные действия каждого игрока,
+    # затем «реплеим» их по циклам в порядке инициативы (брошенной один раз на раунд).
+    seqs = action_sequences(party, snap.buffer)
+    max_actions = max((len(s) for s in seqs.values()), default=0)
+
+    # Silent / idle round: no player actions → skip combat (no monster DPS out of thin air)
+    if max_actions <= 0:
+        for p in party:
+            uid = int(p.get("user_id") or 0)
+            actions_log.append({"user_id": uid, "kind": "silent"})
+        streak = int(state.get("idle_silent_streak") or 0) + 1
+        state["idle_silent_streak"] = streak
+        actions_log.append({"kind": "idle_round", "idle_silent_streak": streak})
+        state["collecting_for_round"] = round_num + 1
+        merge_activity_totals_from_buffer(state, snap.buffer, cfg)
+        return r.result("idle", idle_silent_streak=streak)
+
+    state["idle_silent_streak"] = 0
+    n_party = max(1, len(party))
+    dmg_ref = cfg_float(cfg, "gd_monster_dmg_party_ref", 1.3)
+    dmg_min = cfg_float(cfg, "gd_monster_dmg_party_min", 0.55)
+    if n_party <= 4:
+        state["__monster_dmg_party_scale"] = max(dmg_min, min(1.0, dmg_ref / float(n_party)))
+    else:
+        state["__monster_dmg_party_scale"] = 1.0
+
+    cap = cfg_int(cfg, "gd_round_cycle_cap", GD_ROUND_CYCLE_CAP_DEFAULT)
+    n_cycles = max(1, min(max(1, cap), max_actions if max_actions > 0 else 1))
+
+    # Молчавшие за весь раунд (нет ни одного действия) — отметить один раз для нарратива.
+    for p in party:
+        uid = int(p.get("user_id") or 0)
+        if not seqs.get(uid):
+            actions_log.append({"user_id": uid, "kind": "silent"})
+
+    queue = _build_initiative_queue(party, r.monsters, rng)
+    actions_log.append(
+        {
+            "kind": "initiative_order",
+            "queue": [
+                {"actor": k, "id": int(ref.get("user_id") or ref.get("id") or 0), "score": sc}
+                for k, ref, sc, _tie in queue
+            ],
+        }
+    )
+
+    round_outcome: str | None = None
+    for ci in range(n_cycles):
+        cycle_no = ci + 1
+        actions_log.append({"kind": "cycle_start", "cycle": cycle_no})
+        for kind, ref, _sc, _tie in queue:
+            if kind == "player":
+                if ref.get("fallen") or int(ref.get("current_hp") or 0) <= 0:
+                    continue
+                seq = seqs.get(int(ref.get("user_id") or 0)) or []
+                if ci < len(seq):
+                    r.player_action(ref, seq[ci], cycle_no)
+            else:
+                if ref["hp"] <= 0:
+                    continue
+                r.monster_turn(ref, state.get("taunt_user_id"), cycle_no)
+
+        # Проверка состояния после цикла: вайп, зачистка волны, победа.
+        alive_p = [p for p in party if not p.get("fallen") and int(p.get("current_hp") or 0) > 0]
+        if not alive_p:
+            round_outcome = "party_wiped"
+            break
+        alive_m = [m for m in r.monsters if m["hp"] > 0]
+        if not alive_m:
+            if state.get("wave") == "trash":
+                r.spawn_boss()
+                queue = _build_initiative_queue(party, r.monsters, rng)
+                continue
+            if state.get("wave") == "boss":
+                round_outcome = "victory"
+                state["wave"] = "done"
+                break
+
+    r.dot_phase()
+    r.regen_phase()
+
+    # Зачёт активного раунда для каждого, кто хоть раз действовал.
+    for p in party:
+        uid = int(p.get("user_id") or 0)
+        if seqs.get(uid):
+            c = r.contrib.setdefault(str(uid), {"text": 0, "skill": 0, "heal": 0, "rounds": 0})
+            c["rounds"] = int(c.get("rounds") or 0) + 1
+
+    # Advance wave if trash cleared at end of cycles (без победы внутри цикла).
+    alive_m = [m for m in r.monsters if m["hp"] > 0]
+    if round_outcome is None and not alive_m and state.get("wave") == "trash":
+        r.spawn_boss()
+
+    if round_outcome is None:
+        alive_m = [m for m in state.get("monsters") or [] if m["hp"] > 0]
+        alive_p = [p for p in party if not p.get("fallen") and int(p.get("current_hp") or 0) > 0]
+        if not alive_p:
+            round_outcome = "party_wiped"
+        elif not alive_m and state.get("wave") == "boss":
+            round_outcome = "victory"
+            state["wave"] = "done"
+        else:
+            round_outcome = "ongoing"
+
+    state["collecting_for_round"] = round_num + 1
+
+    # After wipe: recover minimal HP so cycle can continue (soft-fail with stake)
+    if round_outcome == "party_wiped":
+        state["wipe_count"] = int(state.get("wipe_count") or 0) + 1
+        recover_pct = cfg_float(cfg, "gd_wipe_recovery_hp_pct", 0.25)
+        for p in party:
+            p["fallen"] = False
+            p["current_hp"] = max(1, int(int(p.get("max_hp") or 100) * recover_pct))
+        actions_log.append(
+            {
+                "kind": "party_wipe_recovery",
+                "wipe_count": int(state["wipe_count"]),
+            }
+        )
+
+    merge_activity_totals_from_buffer(state, snap.buffer, cfg)
+    return r.result(round_outcome)
+
+
+def replay_rounds(
+    snapshot: RoundSnapshot,
+    buffers: Iterable[dict[str, Any] | None],
+    *,
+    seed: int,
+    trash_pool: tuple[MonsterTemplate, ...] = (),
+) -> Iterator[RoundResult]:
+    """Run rounds back to back in memory, carrying effects and cooldowns the way the engine stores them.
+
+    ``snapshot.buffer`` is ignored; each element of ``buffers`` is one round. Stops once the
+    dungeon is done. Loot claims are yielded with each result, not rolled.
+    """
+    rng = random.Random(seed)
+    state = snapshot.state
+    effects = list(snapshot.effects)
+    cooldowns = dict(snapshot.cooldowns)
+    for buf in buffers:
+        if state.get("wave") == "done":
+            break
+        challenge_level = prepare_round_state(state, snapshot.cfg)
+        if needs_trash_wave(state):
+            state["wave"] = "trash"
+            state["monsters"] = build_trash_wave(
+                state.get("party") or [],
+                cfg_float(snapshot.cfg, "gd_monster_hp_scale", 0.7),
+                challenge_level,
+                trash_pool,
+                rng,
+            )
+        round_num = int(state.get("collecting_for_round") or 1)
+        live = [e for e in effects if e.expires_round >= round_num]
+        res = run_round(replace(snapshot, state=state, buffer=buf, effects=live, cooldowns=cooldowns), rng)
+        yield res
+        effects = [replace(e, row=None) for e in res.effects if not e.removed]
+        state = res.state
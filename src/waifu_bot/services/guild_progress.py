@@ -157,15 +157,33 @@ async def apply_gd_chat_gxp(
     text_delta: int,
     media_kinds: list[str] | None,
 ) -> None:
+    await apply_gd_chat_gxp_totals(
+        session,
+        player_id,
+        text_messages=1 if text_delta > 0 else 0,
+        media_items=len(media_kinds or ()),
+    )
+
+
+async def apply_gd_chat_gxp_totals(
+    session: AsyncSession,
+    player_id: int,
+    *,
+    text_messages: int,
+    media_items: int,
+) -> None:
+    """Same as apply_gd_chat_gxp for a batch of GD chat messages (one guild lookup)."""
+    if text_messages <= 0 and media_items <= 0:
+        return
     cfg = await get_game_config_map(session)
     gid = await get_player_guild_id(session, player_id)
     if not gid:
         return
     total = 0
-    if text_delta > 0:
-        total += cfg_int(cfg, "guild_gxp.chat_text", 1)
-    if media_kinds:
-        total += cfg_int(cfg, "guild_gxp.chat_media", 2) * len(media_kinds)
+    if text_messages > 0:
+        total += cfg_int(cfg, "guild_gxp.chat_text", 1) * text_messages
+    if media_items > 0:
+        total += cfg_int(cfg, "guild_gxp.chat_media", 2) * media_items
     if total:
         await add_gxp(session, gid, total, reason="gd_chat")
         from waifu_bot.services.guild_contribution import add_member_contribution
@@ -376,6 +394,29 @@ async def apply_war_activity(
         await apply_war_bank_deposit(session, player_id, gold_deposit)
 
 
+async def apply_war_chat_activity(
+    session: AsyncSession,
+    player_id: int,
+    *,
+    text_messages: int,
+    media_items: int,
+) -> None:
+    """``chat_text`` / ``chat_media`` war score for a batch of messages (one guild + war lookup)."""
+    if text_messages <= 0 and media_items <= 0:
+        return
+    cfg = await get_game_config_map(session)
+    gid = await get_player_guild_id(session, player_id)
+    if not gid:
+        return
+    war = await _active_war_for_guild(session, gid)
+    if not war:
+        return
+    pts = cfg_int(cfg, "guild_war.ws_chat_text", 1) * max(0, text_messages)
+    pts += cfg_int(cfg, "guild_war.ws_chat_media", 2) * max(0, media_items)
+    if pts:
+        await add_war_score_to_guild(session, gid, pts)
+
+
 async def apply_war_gd_kills(
     session: AsyncSession,
     registrations_user_ids: list[int],
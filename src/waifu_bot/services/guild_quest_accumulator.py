@@ -0,0 +1,365 @@
+"""Guild quest progress accumulator: per-guild / per-member counters outside the quest rows.
+
+``record_metric`` used to provision quests (``ensure_guild_quests``: a COUNT per milestone
+template + daily / weekly checks) and then update the shared ``GuildQuest.current_val``
+row and upsert a contribution row on every chat message, so a busy guild chat serialized
+on the same few rows. Now:
+
+* quest index ``guild:quests:{guild_id}`` (hash, ``_k`` + one field per metric,
+  ``"quest_id:need,..."``) lists the guild's active quests and how much is left to their
+  next threshold. It is precomputed by the rotation ticks and rebuilt after every flush;
+  a missing hash is rebuilt from one query. Provisioning itself lives in the rotation jobs
+  (``rotate_daily_quests`` / ``rotate_weekly_quests``) and guild creation;
+* counters ``guild:quest:acc:{quest_id}`` (hash, ``_t`` = guild total, ``{player_id}`` =
+  member share) are bumped by ``GUILD_QUEST_ACCUMULATE``, which also detects the threshold
+  crossing atomically and puts the quest into the due set. ``accumulate`` only resolves the
+  targets inside the caller's transaction and queues the delta on ``session.info``; the
+  script runs in ``after_commit`` and the queue is dropped on rollback, so a rolled-back or
+  retried transaction never counts twice;
+* ``guild_quest_flush`` (short tick) applies the due quests; every ``FULL_FLUSH_SEC`` it
+  applies all dirty ones. Each quest costs one row update + one batched contribution
+  upsert per flush, however many messages it received. Tier / period completion runs on
+  flush (``apply_quest_progress``). The rotation ticks run full flushes until nothing is
+  left before they expire quests, so progress on an ending period is not dropped.
+
+The index is tagged by a commit hook on ``GuildQuest`` (new quest, status / tier / value
+change): the guild's index is dropped and rebuilt on the next metric. A crossing that lands
+between a flush taking the counters and the rebuilt index is picked up by the next full
+flush.
+
+Redis unavailable → ``accumulate`` returns False and the metric is applied directly. A
+Redis error in the commit hook itself loses that commit's deltas (logged).
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Iterable
+
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from waifu_bot.db.models import Guild, GuildQuest, GuildQuestStatus, GuildQuestTemplate, GuildQuestTier
+from waifu_bot.services.redis_scripts import GUILD_QUEST_ACCUMULATE, GUILD_QUEST_TAKE, run_script
+
+logger = logging.getLogger(__name__)
+
+INDEX_KEY_PREFIX = "guild:quests:"
+ACC_KEY_PREFIX = "guild:quest:acc:"
+DIRTY_KEY = "guild:quest:dirty"
+DUE_KEY = "guild:quest:due"
+FULL_FLUSH_KEY = "guild:quest:flush:full"
+INDEX_TTL_SEC = 3600
+# Counters outlive any plausible flush outage; the dirty set still points at them.
+ACC_TTL_SEC = 7 * 86400
+FULL_FLUSH_SEC = 60
+FLUSH_BATCH = 500
+
+_KNOWN = "_k"
+_PENDING_KEY = "guild_quest_index_stale"
+_PENDING_ACC_KEY = "guild_quest_pending_deltas"
+
+
+def index_key(guild_id: int) -> str:
+    return f"{INDEX_KEY_PREFIX}{int(guild_id)}"
+
+
+def acc_key(quest_id: int) -> str:
+    return f"{ACC_KEY_PREFIX}{int(quest_id)}"
+
+
+# ---------------------------------------------------------------------------
+# Quest index
+# ---------------------------------------------------------------------------
+
+
+def _need(current: int, target: int) -> int:
+    if target <= 0:
+        return 0
+    return max(1, target - current)
+
+
+async def load_quest_index(
+    session: AsyncSession, guild_ids: Iterable[int] | None = None
+) -> dict[int, dict[str, list[tuple[int, int]]]]:
+    """{guild_id: {metric: [(quest_id, need), ...]}} for active quests (one query)."""
+    stmt = (
+        select(
+            GuildQuest.id,
+            GuildQuest.guild_id,
+            GuildQuest.current_val,
+            GuildQuest.target_value,
+            GuildQuestTemplate.metric,
+            GuildQuestTemplate.type,
+            GuildQuestTemplate.target_value,
+            GuildQuestTier.target_value,
+        )
+        .join(GuildQuestTemplate, GuildQuestTemplate.id == GuildQuest.template_id)
+        .outerjoin(GuildQuestTier, GuildQuestTier.id == GuildQuest.tier_id)
+        .where(
+            GuildQuest.status == GuildQuestStatus.ACTIVE,
+            GuildQuestTemplate.is_active.is_(True),
+        )
+    )
+    ids = None if guild_ids is None else sorted({int(g) for g in guild_ids})
+    if ids is not None:
+        if not ids:
+            return {}
+        stmt = stmt.where(GuildQuest.guild_id.in_(ids))
+    out: dict[int, dict[str, list[tuple[int, int]]]] = {g: {} for g in ids or ()}
+    for qid, gid, current, q_target, metric, qtype, t_target, tier_target in (await session.execute(stmt)).all():
+        if not metric:
+            continue
+        target = tier_target if qtype == "milestone" else (q_target or t_target)
+        entry = (int(qid), _need(int(current or 0), int(target or 0)))
+        out.setdefault(int(gid), {}).setdefault(str(metric), []).append(entry)
+    return out
+
+
+async def write_quest_index(redis: Any, indexes: dict[int, dict[str, list[tuple[int, int]]]]) -> None:
+    if redis is None or not indexes:
+        return
+    pipe = redis.pipeline(transaction=False)
+    for gid, by_metric in indexes.items():
+        key = index_key(gid)
+        mapping = {_KNOWN: "1"}
+        for metric, entries in by_metric.items():
+            mapping[metric] = ",".join(f"{qid}:{need}" for qid, need in entries)
+        pipe.delete(key)
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, INDEX_TTL_SEC)
+    await pipe.execute()
+
+
+async def rebuild_indexes(session: AsyncSession, redis: Any, guild_ids: Iterable[int] | None = None) -> int:
+    """Recompute the quest index (all guilds when ``guild_ids`` is None); returns guild count."""
+    if redis is None:
+        return 0
+    if guild_ids is None:
+        guild_ids = (await session.execute(select(Guild.id))).scalars().all()
+    indexes = await load_quest_index(session, guild_ids)
+    try:
+        await write_quest_index(redis, indexes)
+    except RedisError:
+        logger.warning("guild quest index rebuild failed guilds=%s", len(indexes), exc_info=True)
+        return 0
+    return len(indexes)
+
+
+def _parse_entries(raw: Any) -> list[tuple[int, int]]:
+    out: list[tuple[int, int]] = []
+    for part in str(raw or "").split(","):
+        if not part:
+            continue
+        qid, _, need = part.partition(":")
+        out.append((int(qid), int(need or 0)))
+    return out
+
+
+async def quest_targets(
+    session: AsyncSession, redis: Any, guild_id: int, metric: str
+) -> list[tuple[int, int]]:
+    """Active quests of the guild counting ``metric``; rebuilds a missing index."""
+    known, raw = await redis.hmget(index_key(guild_id), _KNOWN, metric)
+    if known:
+        return _parse_entries(raw)
+    indexes = await load_quest_index(session, [guild_id])
+    await write_quest_index(redis, indexes)
+    return list(indexes.get(int(guild_id), {}).get(metric, []))
+
+
+# ---------------------------------------------------------------------------
+# Hot path
+# ---------------------------------------------------------------------------
+
+
+def _session_info(session: Any) -> dict | None:
+    info = getattr(getattr(session, "sync_session", session), "info", None)
+    return info if isinstance(info, dict) else None
+
+
+async def accumulate(
+    session: AsyncSession, redis: Any, guild_id: int, player_id: int, metric: str, delta: int
+) -> bool:
+    """Count ``delta`` for the member's guild quests on commit. False = Redis unavailable, apply directly.
+
+    Without ``session.info`` (no ORM session) the counters are bumped immediately.
+    """
+    if redis is None:
+        return False
+    try:
+        targets = await quest_targets(session, redis, guild_id, metric)
+        if not targets:
+            return True
+        info = _session_info(session)
+        if info is not None:
+            pending = info.setdefault(_PENDING_ACC_KEY, {})
+            key = (tuple(targets), int(player_id))
+            pending[key] = pending.get(key, 0) + int(delta)
+            return True
+        await _run_accumulate(redis, targets, player_id, delta)
+    except RedisError:
+        logger.warning("guild quest accumulate failed guild=%s metric=%s", guild_id, metric, exc_info=True)
+        return False
+    return True
+
+
+async def _run_accumulate(redis: Any, targets: Iterable[tuple[int, int]], player_id: int, delta: int) -> int:
+    targets = list(targets)
+    args: list[Any] = [int(player_id), int(delta), ACC_TTL_SEC]
+    for qid, need in targets:
+        args.extend((qid, need))
+    keys = [DIRTY_KEY, DUE_KEY, *(acc_key(qid) for qid, _ in targets)]
+    crossed = await run_script(redis, GUILD_QUEST_ACCUMULATE, keys, args)
+    if crossed:
+        logger.debug("guild quest threshold crossed player=%s quests=%s", player_id, crossed)
+    return int(crossed or 0)
+
+
+async def apply_pending(redis: Any, pending: dict[tuple[tuple[tuple[int, int], ...], int], int]) -> None:
+    """Run the deltas queued by ``accumulate`` (commit hook)."""
+    if redis is None or not pending:
+        return
+    try:
+        for (targets, player_id), delta in pending.items():
+            await _run_accumulate(redis, targets, player_id, delta)
+    except RedisError:
+        logger.error("guild quest deltas lost entries=%s", len(pending), exc_info=True)
+
+
+# ---------------------------------------------------------------------------
+# Flush
+# ---------------------------------------------------------------------------
+
+
+def _parse_taken(reply: list[Any]) -> dict[int, dict[int, int]]:
+    """TAKE reply → {quest_id: {player_id: delta}} (``_t`` is implied by the member sum)."""
+    out: dict[int, dict[int, int]] = {}
+    for i in range(0, len(reply or []), 2):
+        flat = reply[i + 1] or []
+        members: dict[int, int] = {}
+        for j in range(0, len(flat), 2):
+            field, value = str(flat[j]), int(flat[j + 1] or 0)
+            if field != "_t" and value > 0:
+                members[int(field)] = value
+        if members:
+            out[int(reply[i])] = members
+    return out
+
+
+async def _restore(redis: Any, taken: dict[int, dict[int, int]]) -> None:
+    """Put counters back after a failed apply (next flush retries them)."""
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for qid, members in taken.items():
+            key = acc_key(qid)
+            pipe.hincrby(key, "_t", sum(members.values()))
+            for pid, value in members.items():
+                pipe.hincrby(key, str(pid), value)
+            pipe.expire(key, ACC_TTL_SEC)
+            pipe.sadd(DIRTY_KEY, qid)
+            pipe.sadd(DUE_KEY, qid)
+        await pipe.execute()
+    except RedisError:
+        logger.error("guild quest counters lost quests=%s", sorted(taken), exc_info=True)
+
+
+async def flush_progress(
+    session: AsyncSession, redis: Any, *, full: bool = False, batch: int = FLUSH_BATCH
+) -> int:
+    """Apply accumulated progress of due (or, ``full``, all dirty) quests; returns quest count."""
+    from waifu_bot.services.guild_quest_service import apply_quest_progress
+
+    members = await redis.smembers(DIRTY_KEY if full else DUE_KEY)
+    qids = sorted(int(x) for x in members)[:batch]
+    if not qids:
+        return 0
+    reply = await run_script(redis, GUILD_QUEST_TAKE, [DIRTY_KEY, DUE_KEY, *map(acc_key, qids)], qids)
+    taken = _parse_taken(reply)
+    if not taken:
+        return 0
+    try:
+        guild_ids = await apply_quest_progress(session, taken)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        await _restore(redis, taken)
+        raise
+    await rebuild_indexes(session, redis, guild_ids)
+    return len(taken)
+
+
+async def claim_full_flush(redis: Any) -> bool:
+    """True at most once per ``FULL_FLUSH_SEC`` across workers."""
+    return bool(await redis.set(FULL_FLUSH_KEY, "1", nx=True, ex=FULL_FLUSH_SEC))
+
+
+# ---------------------------------------------------------------------------
+# Commit hooks: apply queued deltas; drop the index of guilds whose quests changed
+# outside the flush
+# ---------------------------------------------------------------------------
+
+_INDEXED_ATTRS = ("status", "tier_id", "current_val", "target_value")
+
+
+def _collect(session: Session, flush_context: Any, instances: Any) -> None:
+    stale: set[int] | None = None
+    new = session.new
+    for obj in (*new, *session.dirty, *session.deleted):
+        if not isinstance(obj, GuildQuest) or obj.guild_id is None:
+            continue
+        if obj not in new:
+            state = inspect(obj)
+            if not any(state.attrs[a].history.has_changes() for a in _INDEXED_ATTRS) and obj not in session.deleted:
+                continue
+        stale = stale if stale is not None else session.info.setdefault(_PENDING_KEY, set())
+        stale.add(int(obj.guild_id))
+
+
+async def drop_indexes(redis: Any, guild_ids: Iterable[int]) -> None:
+    keys = [index_key(g) for g in guild_ids]
+    if redis is None or not keys:
+        return
+    try:
+        await redis.delete(*keys)
+    except RedisError:
+        logger.warning("guild quest index drop failed guilds=%s", len(keys), exc_info=True)
+
+
+def _after_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING_ACC_KEY, None)
+    stale = session.info.pop(_PENDING_KEY, None)
+    if not pending and not stale:
+        return
+    from waifu_bot.core import redis as redis_core
+
+    redis = redis_core.get_redis()
+    for coro in (apply_pending(redis, pending), drop_indexes(redis, stale or ())):
+        try:
+            # Runs inside AsyncSession's greenlet: counters land before commit() returns.
+            await_only(coro)
+        except Exception:
+            coro.close()
+            logger.debug("guild quest commit hook skipped (no async context)", exc_info=True)
+
+
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_ACC_KEY, None)
+    session.info.pop(_PENDING_KEY, None)
+
+
+_installed = False
+
+
+def install_session_hooks() -> None:
+    """Register flush/commit listeners on all ORM sessions (idempotent)."""
+    global _installed  # noqa: PLW0603
+    if _installed:
+        return
+    event.listen(Session, "before_flush", _collect)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+    _installed = True
+
@@ -384,37 +384,104 @@ async def _complete_periodic_quest(
     await _log_quest_complete(session, quest.guild_id, template.name, reward)
 
 
+async def _apply_metric_direct(
+    session: AsyncSession, guild_id: int, player_id: int, metric: str, delta: int
+) -> None:
+    stmt = (
+        select(GuildQuest, GuildQuestTemplate)
+        .join(GuildQuestTemplate, GuildQuestTemplate.id == GuildQuest.template_id)
+        .where(
+            GuildQuest.guild_id == guild_id,
+            GuildQuest.status == GuildQuestStatus.ACTIVE,
+            GuildQuestTemplate.metric == metric,
+            GuildQuestTemplate.is_active.is_(True),
+        )
+    )
+    rows = (await session.execute(stmt)).all()
+    for quest, template in rows:
+        quest.current_val = int(quest.current_val or 0) + int(delta)
+        await _upsert_contribution(session, quest.id, player_id, delta)
+        if template.type == "milestone":
+            await _check_milestone_progress(session, quest, template)
+        else:
+            await _complete_periodic_quest(session, quest, template)
+
+
 async def record_metric(
     session: AsyncSession, player_id: int, metric: str, delta: int = 1
 ) -> None:
-    """Increment guild quest progress for all active quests matching metric."""
+    """Increment guild quest progress for all active quests matching metric.
+
+    Quests are provisioned by the rotation jobs; progress goes through the Redis
+    accumulator (guild_quest_accumulator.py) and reaches the quest rows on flush.
+    """
     if delta <= 0 or not metric:
         return
     try:
         guild_id = await get_player_guild_id(session, player_id)
         if not guild_id:
             return
-        await ensure_guild_quests(session, guild_id)
-        stmt = (
+        from waifu_bot.core.config import settings
+
+        if getattr(settings, "guild_quest_accumulator_enabled", True):
+            from waifu_bot.core import redis as redis_core
+            from waifu_bot.services import guild_quest_accumulator
+
+            if await guild_quest_accumulator.accumulate(
+                session, redis_core.get_redis(), guild_id, player_id, metric, delta
+            ):
+                return
+        await _apply_metric_direct(session, guild_id, player_id, metric, delta)
+    except Exception:
+        logger.exception("guild quest record_metric failed pid=%s metric=%s", player_id, metric)
+
+
+async def apply_quest_progress(
+    session: AsyncSession, progress: dict[int, dict[int, int]]
+) -> set[int]:
+    """Apply accumulated ``{quest_id: {player_id: delta}}``; returns touched guild ids.
+
+    One ``current_val`` update per quest and one contribution upsert for the batch, then
+    the usual tier / period completion. Progress of quests that are no longer active is
+    dropped (same as ``record_metric`` after expiry).
+    """
+    if not progress:
+        return set()
+    rows = (
+        await session.execute(
             select(GuildQuest, GuildQuestTemplate)
             .join(GuildQuestTemplate, GuildQuestTemplate.id == GuildQuest.template_id)
-            .where(
-                GuildQuest.guild_id == guild_id,
-                GuildQuest.status == GuildQuestStatus.ACTIVE,
-                GuildQuestTemplate.metric == metric,
-                GuildQuestTemplate.is_active.is_(True),
+            .where(GuildQuest.id.in_(sorted(progress)))
+            .order_by(GuildQuest.id)
+        )
+    ).all()
+    live: list[tuple[GuildQuest, GuildQuestTemplate]] = []
+    contribs: list[dict[str, int]] = []
+    for quest, template in rows:
+        if quest.status != GuildQuestStatus.ACTIVE or not template.is_active:
+            continue
+        members = progress.get(int(quest.id)) or {}
+        quest.current_val = int(quest.current_val or 0) + sum(members.values())
+        contribs.extend(
+            {"quest_id": int(quest.id), "player_id": int(pid), "value": int(v)}
+            for pid, v in sorted(members.items())
+            if v > 0
+        )
+        live.append((quest, template))
+    if contribs:
+        stmt = pg_insert(GuildQuestContribution).values(contribs)
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["quest_id", "player_id"],
+                set_={"value": GuildQuestContribution.value + stmt.excluded.value},
             )
         )
-        rows = (await session.execute(stmt)).all()
-        for quest, template in rows:
-            quest.current_val = int(quest.current_val or 0) + int(delta)
-            await _upsert_contribution(session, quest.id, player_id, delta)
-            if template.type == "milestone":
-                await _check_milestone_progress(session, quest, template)
-            else:
-                await _complete_periodic_quest(session, quest, template)
-    except Exception:
-        logger.exception("guild quest record_metric failed pid=%s metric=%s", player_id, metric)
+    for quest, template in live:
+        if template.type == "milestone":
+            await _check_milestone_progress(session, quest, template)
+        else:
+            await _complete_periodic_quest(session, quest, template)
+    return {int(quest.guild_id) for quest, _ in live}
 
 
 async def get_quest_exp_bonus_pct(session: AsyncSession, player_id: int) -> float:
@@ -541,7 +608,7 @@ def _quest_card_dto(
 
 
 async def rotate_daily_quests(session: AsyncSession) -> None:
-    """Expire previous daily quests and spawn new ones for all guilds."""
+    """Expire previous daily quests and provision milestone / daily / weekly ones for all guilds."""
     today_pk = _daily_period_key()
     guild_ids = (await session.execute(select(Guild.id))).scalars().all()
     for gid in guild_ids:
@@ -557,7 +624,7 @@ async def rotate_daily_quests(session: AsyncSession) -> None:
             )
             .values(status=GuildQuestStatus.EXPIRED)
         )
-        await _ensure_daily_quests_for_guild(session, int(gid))
+        await ensure_guild_quests(session, int(gid))
     await session.flush()
 
 
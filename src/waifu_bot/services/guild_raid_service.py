@@ -24,6 +24,7 @@ from waifu_bot.game.constants import MediaType
 from waifu_bot.game.formulas import calculate_message_damage
 from waifu_bot.services.game_config_service import cfg_float, get_game_config_map
 from waifu_bot.services.guild_progress import add_gxp
+from waifu_bot.services.raid_chat_cache import resolve_raid_chat
 from waifu_bot.services.gd_round_engine import _attack_type_for_class, _weapon_dmg_from_level
 
 logger = logging.getLogger(__name__)
@@ -206,26 +207,22 @@ async def apply_raid_message_damage(
     media_types: list[str] | None,
     text_preview: str | None = None,
 ) -> dict:
-    """v2: log chat metadata for narrative; v1 legacy: HP damage (deprecated)."""
+    """v2: log chat metadata for narrative; v1 legacy: HP damage (deprecated). Caller commits."""
     del text_preview  # privacy: never forward chat fragments
     from waifu_bot.services.guild_raid_v2_service import log_raid_chat_event
 
+    target = await resolve_raid_chat(session, chat_id)
     logged = await log_raid_chat_event(
         session,
         chat_id,
         player_id,
         message_length=message_length,
         media_types=media_types,
+        target=target,
     )
-    if logged.get("ok"):
+    if logged.get("logged"):
         return {"logged": True}
-    g = (
-        await session.execute(select(Guild).where(Guild.telegram_chat_id == int(chat_id)))
-    ).scalar_one_or_none()
-    if not g or not g.raid_active_id:
-        return {"ok": False, "reason": "no_raid"}
-    raid = await session.get(GuildRaid, g.raid_active_id)
-    if not raid or int(getattr(raid, "raid_version", 1) or 1) >= 2:
+    if target is None or target.raid_id is None or target.raid_version >= 2:
         return {"ok": False, "reason": "no_raid"}
     return {"ok": False, "reason": "legacy_disabled"}
 
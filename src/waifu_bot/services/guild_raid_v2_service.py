@@ -3,11 +3,12 @@ from __future__ import annotations
 
 import asyncio
 import logging
+from collections import Counter
 from datetime import date, datetime, timedelta, time, timezone
 from typing import Any
 from zoneinfo import ZoneInfo
 
-from sqlalchemy import select, update
+from sqlalchemy import bindparam, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -59,6 +60,7 @@ from waifu_bot.services.guild_raid_narrative_ai import (
     pick_random_raid_setting,
 )
 from waifu_bot.services.guild_progress import add_gxp
+from waifu_bot.services.raid_chat_cache import RaidChatTarget, resolve_raid_chat
 
 logger = logging.getLogger(__name__)
 _MSK = ZoneInfo("Europe/Moscow")
@@ -648,6 +650,55 @@ async def _deliver_prologue(
         logger.exception("deliver prologue failed raid_id=%s", raid.id)
 
 
+async def _append_raid_chat_events(
+    session: AsyncSession,
+    raid_id: int,
+    events: list[tuple[int, datetime, int, list[str] | None]],
+) -> int:
+    """Insert chat events + one executemany UPDATE of participant message counters (no commit)."""
+    counts: Counter[int] = Counter()
+    for player_id, event_ts, message_length, media_types in events:
+        session.add(
+            GuildRaidChatEvent(
+                raid_id=int(raid_id),
+                player_id=int(player_id),
+                event_ts=event_ts,
+                message_length=int(message_length or 0),
+                media_types_json=list(media_types or []),
+                text_preview=None,
+            )
+        )
+        counts[int(player_id)] += 1
+    if counts:
+        t = GuildRaidParticipant.__table__
+        await session.execute(
+            update(t)
+            .where(t.c.raid_id == bindparam("b_raid"), t.c.player_id == bindparam("b_pid"))
+            .values(message_count=func.coalesce(t.c.message_count, 0) + bindparam("b_n")),
+            [{"b_raid": int(raid_id), "b_pid": pid, "b_n": n} for pid, n in counts.items()],
+        )
+    return sum(counts.values())
+
+
+async def log_raid_chat_events(
+    session: AsyncSession,
+    chat_id: int,
+    events: list[tuple[int, datetime, int, list[str] | None]],
+) -> int:
+    """Batch form of log_raid_chat_event for one chat: (player_id, event_ts, length, media).
+
+    Chat → raid / participants come from raid_chat_cache; the caller commits.
+    Returns the number of logged events (non-participants are skipped).
+    """
+    if not events:
+        return 0
+    target = await resolve_raid_chat(session, chat_id)
+    if target is None or not target.logs_chat:
+        return 0
+    rows = [e for e in events if int(e[0]) in target.participants]
+    return await _append_raid_chat_events(session, int(target.raid_id), rows)
+
+
 async def log_raid_chat_event(
     session: AsyncSession,
     chat_id: int,
@@ -656,38 +707,24 @@ async def log_raid_chat_event(
     message_length: int,
     media_types: list[str] | None,
     text_preview: str | None = None,
+    target: RaidChatTarget | None | bool = False,
 ) -> dict[str, Any]:
+    """Log one participant message of an active v2 raid; the caller commits.
+
+    ``target``: an already resolved raid_chat_cache entry (False = resolve here).
+    """
     del text_preview  # privacy: never persist chat fragments
-    g = (
-        await session.execute(select(Guild).where(Guild.telegram_chat_id == int(chat_id)))
-    ).scalar_one_or_none()
-    if not g or not g.raid_active_id:
+    if target is False:
+        target = await resolve_raid_chat(session, chat_id)
+    if target is None or target.raid_id is None:
         return {"ok": False, "reason": "no_raid"}
-    raid = await session.get(GuildRaid, g.raid_active_id)
-    if not raid or raid.status != "active" or int(getattr(raid, "raid_version", 1) or 1) < 2:
+    if not target.logs_chat:
         return {"ok": False, "reason": "not_v2"}
-    part = (
-        await session.execute(
-            select(GuildRaidParticipant).where(
-                GuildRaidParticipant.raid_id == raid.id,
-                GuildRaidParticipant.player_id == player_id,
-            )
-        )
-    ).scalar_one_or_none()
-    if not part:
+    if int(player_id) not in target.participants:
         return {"ok": False, "reason": "not_participant"}
-    session.add(
-        GuildRaidChatEvent(
-            raid_id=raid.id,
-            player_id=int(player_id),
-            event_ts=_utc_now(),
-            message_length=int(message_length or 0),
-            media_types_json=list(media_types or []),
-            text_preview=None,
-        )
+    await _append_raid_chat_events(
+        session, int(target.raid_id), [(int(player_id), _utc_now(), message_length, media_types)]
     )
-    part.message_count = int(part.message_count or 0) + 1
-    await session.commit()
     return {"logged": True}
 
 
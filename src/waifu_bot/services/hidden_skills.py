@@ -4,7 +4,7 @@ from __future__ import annotations
 
 import html
 import logging
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Any, Literal
 
 from sqlalchemy import func, select
@@ -22,6 +22,7 @@ from waifu_bot.game.hidden_effect_labels import (
     labeled_effects_from_dict,
 )
 from waifu_bot.services.player_chats import forget_player_chat_seen, resolve_player_group_chats
+from waifu_bot.services.redis_scripts import ACTIVITY_SESSION, DAILY_STREAK, HOARDER_DAY, run_script
 
 logger = logging.getLogger(__name__)
 
@@ -496,18 +497,14 @@ async def try_hoarder_saving_streak(
     now = datetime.now(timezone.utc).astimezone(tz)
     day_key = f"hidden:hoarder:day:{player_id}:{now.year}{now.month:02d}{now.day:02d}"
     try:
-        if not await redis.set(day_key, "1", nx=True, ex=86400):
-            return
-        spent = await redis.get(f"hidden:hoarder:last_spend:{int(player_id)}")
-        if spent:
-            return
-        peak_key = f"hidden:hoarder:peak:{int(player_id)}"
-        prev = await redis.get(peak_key)
-        prev_g = int(prev) if prev else 0
-        if int(current_gold) <= prev_g:
-            return
-        await redis.set(peak_key, str(int(current_gold)), ex=86400 * 60)
-        await increment_skill_counter(session, int(player_id), "saving_period", 1)
+        counted = await run_script(
+            redis,
+            HOARDER_DAY,
+            [day_key, f"hidden:hoarder:last_spend:{int(player_id)}", f"hidden:hoarder:peak:{int(player_id)}"],
+            [int(current_gold), 86400, 86400 * 60],
+        )
+        if int(counted or 0):
+            await increment_skill_counter(session, int(player_id), "saving_period", 1)
     except Exception:
         logger.debug("hoarder streak skip", exc_info=True)
 
@@ -524,19 +521,9 @@ async def try_track_marathon_session(
     start_key = f"hidden:marathon:start:{pid}"
     try:
         now_ts = int(datetime.now(timezone.utc).timestamp())
-        last_raw = await redis.get(last_key)
-        start_raw = await redis.get(start_key)
-        if last_raw and start_raw:
-            last_ts = int(last_raw)
-            start_ts = int(start_raw)
-            if now_ts - last_ts > 30 * 60:
-                if last_ts - start_ts >= 6 * 3600:
-                    await increment_skill_counter(session, pid, "marathon_complete", 1)
-                await redis.delete(start_key)
-                start_raw = None
-        if not start_raw:
-            await redis.set(start_key, str(now_ts), ex=86400)
-        await redis.set(last_key, str(now_ts), ex=86400)
+        finished = await run_script(redis, ACTIVITY_SESSION, [last_key, start_key], [now_ts, 30 * 60, 86400])
+        if int(finished or 0) >= 6 * 3600:
+            await increment_skill_counter(session, pid, "marathon_complete", 1)
     except Exception:
         logger.debug("marathon track skip", exc_info=True)
 
@@ -553,32 +540,17 @@ async def try_track_consistent_day(
     tz = ZoneInfo("Europe/Moscow")
     now = datetime.now(timezone.utc).astimezone(tz)
     day = f"{now.year}{now.month:02d}{now.day:02d}"
+    yesterday = (now.date() - timedelta(days=1)).strftime("%Y%m%d")
     pid = int(player_id)
     try:
-        if not await redis.set(f"hidden:consistent:day:{pid}:{day}", "1", nx=True, ex=86400):
-            return
-        last_key = f"hidden:consistent:last:{pid}"
-        streak_key = f"hidden:consistent:streak:{pid}"
-        last_raw = await redis.get(last_key)
-        streak_raw = await redis.get(streak_key)
-        streak = int(streak_raw or 0)
-        if last_raw:
-            from datetime import date
-
-            last_d = str(last_raw)
-            y, m, d = int(last_d[:4]), int(last_d[4:6]), int(last_d[6:8])
-            last_date = date(y, m, d)
-            today = now.date()
-            delta = (today - last_date).days
-            if delta == 1:
-                streak += 1
-            elif delta > 1:
-                streak = 1
-        else:
-            streak = 1
-        await redis.set(last_key, day, ex=86400 * 400)
-        await redis.set(streak_key, str(streak), ex=86400 * 400)
-        await set_skill_counter(session, pid, "consistent", streak)
+        streak = await run_script(
+            redis,
+            DAILY_STREAK,
+            [f"hidden:consistent:day:{pid}:{day}", f"hidden:consistent:last:{pid}", f"hidden:consistent:streak:{pid}"],
+            [day, yesterday, 86400, 86400 * 400],
+        )
+        if int(streak) >= 0:
+            await set_skill_counter(session, pid, "consistent", int(streak))
     except Exception:
         logger.debug("consistent track skip", exc_info=True)
 
@@ -0,0 +1,286 @@
+"""Monthly partitions + retention for append-only history (player_event_log, economy_ledger).
+
+Both tables are ``PARTITION BY RANGE (created_at)`` with one partition per calendar month
+(UTC), named ``<table>_pYYYYMM``. The daily ``history_partitions`` job:
+
+- creates partitions ``HISTORY_PARTITIONS_AHEAD_MONTHS`` months ahead, so inserts normally
+  land in a monthly range;
+- archives every partition whose month is entirely past retention to
+  ``HISTORY_ARCHIVE_DIR/<table>/<partition>.jsonl.gz`` and drops it (DETACH + DROP).
+
+A ``<table>_default`` partition catches rows outside every monthly range (the job did not
+run for months, or a backdated insert into a dropped month), so such inserts do not fail.
+When the job creates a month that already has rows in the default partition, it moves them
+into the new partition before attaching it. Retention never drops the default partition.
+
+Retention never deletes row by row, so the hot partitions and their indexes stay the same
+size no matter how old the game gets. Per-player reads go through :func:`read_since` so
+the planner only touches recent partitions.
+
+Ledger idempotency lives in ``economy_ledger_keys`` (see ``wallet``): a unique index on a
+partitioned table has to include ``created_at`` and could not enforce it across months.
+"""
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_CHUNK = 5000
+
+
+@dataclass(frozen=True, slots=True)
+class HistoryTable:
+    name: str
+    retention_setting: str  # Settings attribute, days (0 = keep forever)
+
+
+HISTORY_TABLES = (
+    HistoryTable("player_event_log", "event_log_retention_days"),
+    HistoryTable("economy_ledger", "economy_ledger_retention_days"),
+)
+
+
+@dataclass(frozen=True, slots=True)
+class PartitionInfo:
+    name: str
+    month: datetime | None  # None: not a monthly partition (left alone)
+    total_bytes: int
+    est_rows: int
+
+
+def month_start(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    dt = dt.astimezone(timezone.utc)
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(dt: datetime, n: int) -> datetime:
+    idx = dt.year * 12 + dt.month - 1 + int(n)
+    return dt.replace(year=idx // 12, month=idx % 12 + 1, day=1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def partition_month(table: str, name: str) -> datetime | None:
+    match = re.fullmatch(re.escape(table) + r"_p(\d{4})(\d{2})", name)
+    if not match:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def create_default_partition_sql(table: str) -> str:
+    return f'CREATE TABLE IF NOT EXISTS "{default_partition_name(table)}" PARTITION OF "{table}" DEFAULT'
+
+
+def _bounds(month: datetime) -> tuple[str, str]:
+    start = month_start(month)
+    return start.isoformat(), add_months(start, 1).isoformat()
+
+
+def create_partition_sql(table: str, month: datetime) -> str:
+    lo, hi = _bounds(month)
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(table, month_start(month))}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{lo}') TO ('{hi}')"
+    )
+
+
+def move_from_default_sql(table: str, month: datetime) -> list[str]:
+    """Create the month's partition from the default partition's rows in its range.
+
+    A plain ``PARTITION OF`` fails when the default partition holds rows of that range,
+    so the rows are moved into a detached copy first and the copy is attached.
+    """
+    name = partition_name(table, month_start(month))
+    lo, hi = _bounds(month)
+    return [
+        f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+        f'WITH moved AS (DELETE FROM "{default_partition_name(table)}" '
+        f"WHERE created_at >= '{lo}' AND created_at < '{hi}' RETURNING *) "
+        f'INSERT INTO "{name}" SELECT * FROM moved',
+        f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" '
+        f"FOR VALUES FROM ('{lo}') TO ('{hi}')",
+    ]
+
+
+def expired(parts: list[PartitionInfo], *, now: datetime, retention_days: int) -> list[PartitionInfo]:
+    """Monthly partitions whose whole range is older than ``now - retention_days``."""
+    if retention_days <= 0:
+        return []
+    cutoff = now - timedelta(days=int(retention_days))
+    return sorted(
+        (p for p in parts if p.month is not None and add_months(p.month, 1) <= cutoff),
+        key=lambda p: p.month,
+    )
+
+
+def read_since(now: datetime | None = None, days: int | None = None) -> datetime | None:
+    """Lower ``created_at`` bound for per-player history reads (None = unbounded)."""
+    if days is None:
+        from waifu_bot.core.config import settings
+
+        days = int(getattr(settings, "history_read_window_days", 90) or 0)
+    if days <= 0:
+        return None
+    return month_start((now or datetime.now(timezone.utc)) - timedelta(days=int(days)))
+
+
+async def list_partitions(session: AsyncSession, table: str) -> list[PartitionInfo]:
+    rows = (
+        await session.execute(
+            text(
+                "SELECT c.relname, pg_total_relation_size(c.oid), GREATEST(c.reltuples, 0)::bigint "
+                "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = CAST(:table AS regclass) ORDER BY c.relname"
+            ),
+            {"table": table},
+        )
+    ).all()
+    return [
+        PartitionInfo(name=str(r[0]), month=partition_month(table, str(r[0])), total_bytes=int(r[1] or 0),
+                      est_rows=int(r[2] or 0))
+        for r in rows
+    ]
+
+
+async def ensure_partitions(
+    session: AsyncSession, table: str, *, now: datetime, ahead_months: int
+) -> list[str]:
+    """Create this month's partition and ``ahead_months`` after it. Returns names created."""
+    have = {p.name for p in await list_partitions(session, table)}
+    created: list[str] = []
+    current = month_start(now)
+    default = default_partition_name(table)
+    for i in range(max(0, int(ahead_months)) + 1):
+        month = add_months(current, i)
+        name = partition_name(table, month)
+        if name in have:
+            continue
+        stray = False
+        if default in have:
+            lo, hi = _bounds(month)
+            stray = bool(
+                (
+                    await session.execute(
+                        text(
+                            f'SELECT EXISTS (SELECT 1 FROM "{default}" '
+                            "WHERE created_at >= CAST(:lo AS timestamptz) AND created_at < CAST(:hi AS timestamptz))"
+                        ),
+                        {"lo": lo, "hi": hi},
+                    )
+                ).scalar()
+            )
+        if stray:
+            logger.warning("history: moving %s rows out of %s", name, default)
+            for sql in move_from_default_sql(table, month):
+                await session.execute(text(sql))
+        else:
+            await session.execute(text(create_partition_sql(table, month)))
+        created.append(name)
+    await session.commit()
+    return created
+
+
+def _archive_path(archive_dir: str, table: str, part: str) -> Path:
+    return Path(archive_dir) / table / f"{part}.jsonl.gz"
+
+
+async def archive_partition(session: AsyncSession, table: str, part: str, archive_dir: str) -> int:
+    """Stream a partition into gzip JSON lines (written to ``.tmp``, renamed when complete)."""
+    path = _archive_path(archive_dir, table, part)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+    fh = await asyncio.to_thread(gzip.open, tmp, "wb")
+    rows = 0
+    try:
+        result = await session.stream(text(f'SELECT * FROM "{part}" ORDER BY id'))
+        async for chunk in result.mappings().partitions(ARCHIVE_CHUNK):
+            blob = "".join(json.dumps(dict(r), ensure_ascii=False, default=str) + "\n" for r in chunk)
+            await asyncio.to_thread(fh.write, blob.encode("utf-8"))
+            rows += len(chunk)
+    finally:
+        await asyncio.to_thread(fh.close)
+    await asyncio.to_thread(os.replace, tmp, path)
+    return rows
+
+
+async def drop_partition(session: AsyncSession, table: str, part: str) -> None:
+    await session.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{part}"'))
+    await session.execute(text(f'DROP TABLE "{part}"'))
+    await session.commit()
+
+
+async def maintain_history(
+    session: AsyncSession,
+    *,
+    now: datetime | None = None,
+    ahead_months: int | None = None,
+    archive_dir: str | None = None,
+) -> dict[str, dict[str, Any]]:
+    """Create upcoming partitions and archive + drop expired ones for every history table."""
+    from waifu_bot.core.config import settings
+
+    now = now or datetime.now(timezone.utc)
+    if ahead_months is None:
+        ahead_months = int(getattr(settings, "history_partitions_ahead_months", 3) or 0)
+    if archive_dir is None:
+        archive_dir = str(getattr(settings, "history_archive_dir", "") or "")
+    out: dict[str, dict[str, Any]] = {}
+    for table in HISTORY_TABLES:
+        created = await ensure_partitions(session, table.name, now=now, ahead_months=ahead_months)
+        retention = int(getattr(settings, table.retention_setting, 0) or 0)
+        dropped: list[str] = []
+        for part in expired(await list_partitions(session, table.name), now=now, retention_days=retention):
+            if archive_dir:
+                rows = await archive_partition(session, table.name, part.name, archive_dir)
+                logger.info("history: archived %s (%d rows)", part.name, rows)
+            await drop_partition(session, table.name, part.name)
+            dropped.append(part.name)
+        out[table.name] = {"created": created, "dropped": dropped}
+    return out
+
+
+async def partition_report(session: AsyncSession) -> list[dict[str, Any]]:
+    """Partition sizes per history table (admin view); newest month first."""
+    out: list[dict[str, Any]] = []
+    for table in HISTORY_TABLES:
+        parts = await list_partitions(session, table.name)
+        parts.sort(key=lambda p: (p.month is not None, p.month or datetime.min.replace(tzinfo=timezone.utc)),
+                   reverse=True)
+        out.append(
+            {
+                "table": table.name,
+                "total_bytes": sum(p.total_bytes for p in parts),
+                "est_rows": sum(p.est_rows for p in parts),
+                "partitions": [
+                    {
+                        "name": p.name,
+                        "month": p.month.strftime("%Y-%m") if p.month else None,
+                        "total_bytes": p.total_bytes,
+                        "est_rows": p.est_rows,
+                    }
+                    for p in parts
+                ],
+            }
+        )
+    return out
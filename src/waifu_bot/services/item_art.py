@@ -22,6 +22,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from waifu_bot.db import models as m
 from waifu_bot.paths import static_game_directory
+from waifu_bot.services import static_assets
 
 logger = logging.getLogger(__name__)
 
@@ -45,8 +46,11 @@ def normalize_game_relative_path(relative_path: str) -> str:
 
 
 def game_asset_public_url(relative_path: str) -> str:
-    """Map stored relative_path (DB or default) to public URL under /static/game/."""
-    return f"{GAME_STATIC_PREFIX}/{normalize_game_relative_path(relative_path)}"
+    """Map stored relative_path (DB or default) to public URL under /static/game/.
+
+    Content-hashed (immutable) when the asset manifest knows the file (see static_assets).
+    """
+    return static_assets.asset_url(f"{GAME_STATIC_PREFIX}/{normalize_game_relative_path(relative_path)}")
 
 
 def relative_path_to_game_file(relative_path: str) -> Path:
@@ -523,6 +527,9 @@ async def enrich_items_with_image_urls(session: AsyncSession, items: list[Any])
         if not rel:
             rel = default_relative_path(k, t)
         _set_field(it, "image_url", game_asset_public_url(rel))
+        sprite = static_assets.sprite_for(f"{GAME_STATIC_PREFIX}/{normalize_game_relative_path(rel)}")
+        if sprite is not None:
+            _set_field(it, "image_sprite", sprite)
 
     return items
 
@@ -1,4 +1,8 @@
-"""Item and affix library (codex) discovery tracking."""
+"""Item and affix library (codex) discovery tracking.
+
+Writes go through ``codex_buffer`` (Redis write-behind) when Redis is available;
+the direct upserts below are the fallback path.
+"""
 
 from __future__ import annotations
 
@@ -11,6 +15,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from waifu_bot.db import models as m
 from waifu_bot.db.models.item import PlayerAffixCodex, PlayerItemCodex
+from waifu_bot.services import codex_buffer
 
 logger = logging.getLogger(__name__)
 
@@ -101,10 +106,13 @@ async def resolve_base_template_id(
 
 
 async def mark_item_seen(
-    session: AsyncSession, player_id: int, base_template_id: int | None
-) -> None:
+    session: AsyncSession, player_id: int, base_template_id: int | None, redis=None
+) -> bool:
+    """Count one sighting. Returns True when buffered in Redis (no SQL issued)."""
     if not base_template_id:
-        return
+        return False
+    if await codex_buffer.note_item_seen(redis, player_id, int(base_template_id)):
+        return True
     now = datetime.utcnow()
     stmt = (
         pg_insert(PlayerItemCodex)
@@ -122,6 +130,7 @@ async def mark_item_seen(
         )
     )
     await session.execute(stmt)
+    return False
 
 
 async def mark_affix_seen(
@@ -130,9 +139,12 @@ async def mark_affix_seen(
     *,
     catalog_kind: str,
     catalog_id: int,
-) -> None:
+    redis=None,
+) -> bool:
     if not catalog_id:
-        return
+        return False
+    if await codex_buffer.note_affix_seen(redis, player_id, str(catalog_kind), int(catalog_id)):
+        return True
     stmt = (
         pg_insert(PlayerAffixCodex)
         .values(
@@ -146,11 +158,13 @@ async def mark_affix_seen(
         )
     )
     await session.execute(stmt)
+    return False
 
 
 async def mark_affixes_from_inventory(
-    session: AsyncSession, player_id: int, inv: m.InventoryItem
-) -> None:
+    session: AsyncSession, player_id: int, inv: m.InventoryItem, redis=None
+) -> bool:
+    """Mark every affix of ``inv`` as seen. Returns True if all writes were buffered."""
     affixes = list(getattr(inv, "affixes", None) or [])
     if not affixes and inv.id:
         res = await session.execute(
@@ -158,14 +172,16 @@ async def mark_affixes_from_inventory(
         )
         affixes = list(res.scalars().all())
 
+    buffered = True
     for a in affixes:
         fam_id = getattr(a, "family_id", None)
         if fam_id is not None:
-            await mark_affix_seen(
+            buffered &= await mark_affix_seen(
                 session,
                 player_id,
                 catalog_kind=CATALOG_DIABLO,
                 catalog_id=int(fam_id),
+                redis=redis,
             )
             continue
         name = str(getattr(a, "name", "") or "").strip()
@@ -175,26 +191,35 @@ async def mark_affixes_from_inventory(
             select(m.Affix.id).where(func.lower(m.Affix.name) == name.lower()).limit(1)
         )
         if leg is not None:
-            await mark_affix_seen(
+            buffered &= await mark_affix_seen(
                 session,
                 player_id,
                 catalog_kind=CATALOG_LEGACY,
                 catalog_id=int(leg),
+                redis=redis,
             )
+    return buffered
 
 
 async def register_inventory_codex(
-    session: AsyncSession, player_id: int | None, inv: m.InventoryItem
+    session: AsyncSession, player_id: int | None, inv: m.InventoryItem, redis=None
 ) -> None:
-    """Record base item + affix discovery for a player from one inventory instance."""
+    """Record base item + affix discovery for a player from one inventory instance.
+
+    ``redis`` defaults to the process client (write-behind); pass through explicitly
+    from services that already hold one.
+    """
     if not player_id or inv is None:
         return
+    if redis is None:
+        redis = codex_buffer.buffer_redis()
     try:
+        buffered = True
         bt_id = _direct_base_template_id(inv)
         if not bt_id:
             bt_id = await resolve_base_template_id(session, inv)
         if bt_id:
-            await mark_item_seen(session, int(player_id), bt_id)
+            buffered &= await mark_item_seen(session, int(player_id), bt_id, redis=redis)
         else:
             name = getattr(inv, "_display_name", None) or (
                 getattr(getattr(inv, "item", None), "name", None)
@@ -206,7 +231,10 @@ async def register_inventory_codex(
                 name,
                 getattr(inv, "tier", None),
             )
-        await mark_affixes_from_inventory(session, int(player_id), inv)
+        buffered &= await mark_affixes_from_inventory(session, int(player_id), inv, redis=redis)
+        if buffered:
+            # codex_flush re-evaluates the milestone for players with new discoveries.
+            return
         try:
             from waifu_bot.services.hidden_milestones import hook_milestones
 
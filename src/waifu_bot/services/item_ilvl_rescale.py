@@ -2,16 +2,11 @@
 from __future__ import annotations
 
 import logging
-from typing import Any
-
-from sqlalchemy import or_, select
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-
-from waifu_bot.db import models as m
 from types import SimpleNamespace
+from typing import Any, Awaitable, Callable
 
 from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from waifu_bot.game.item_ilvl_scaling import (
     CURRENT_SCALE_VER,
@@ -25,7 +20,6 @@ from waifu_bot.game.item_ilvl_scaling import (
     should_rescale_inventory,
 )
 from waifu_bot.services.enchanting import apply_enchant_steps_to_inventory_item, calculate_enchant_steps
-from waifu_bot.services.enchanting import apply_enchant_steps_to_inventory_item
 
 logger = logging.getLogger(__name__)
 
@@ -75,20 +69,92 @@ def rescale_legacy_plus_item(inv: Any, *, scale_ilvl: int | None = None) -> bool
     return True
 
 
-async def rescale_legacy_plus_items(session: AsyncSession, *, limit: int | None = None) -> int:
-    """Load plus/power_rank items with ver < current and rescale them."""
-    stmt = (
-        select(m.InventoryItem)
-        .options(selectinload(m.InventoryItem.affixes), selectinload(m.InventoryItem.item))
-        .where(m.InventoryItem.ilvl_stat_scale_ver < CURRENT_SCALE_VER)
-        .where(or_(m.InventoryItem.plus_level_source > 0, m.InventoryItem.power_rank > 0))
-    )
-    if limit is not None:
-        stmt = stmt.limit(int(limit))
-    items = list((await session.scalars(stmt)).all())
+_SNAPSHOT_FIELDS = (
+    "id",
+    "base_stat_value",
+    "damage_min",
+    "damage_max",
+    "power_rank",
+    "plus_level_source",
+    "secondary_fraction_value",
+    "ilvl_stat_scale_ver",
+)
+_RESCALED_FIELDS = (
+    "base_stat_value",
+    "damage_min",
+    "damage_max",
+    "secondary_fraction_value",
+    "ilvl_stat_scale_ver",
+)
+
+
+def rescale_snapshot(inv: Any) -> dict[str, Any]:
+    """Plain (picklable) copy of the fields ``rescale_legacy_plus_item`` reads."""
+    item = getattr(inv, "item", None)
+    return {
+        **{f: getattr(inv, f, None) for f in _SNAPSHOT_FIELDS},
+        "item_damage": getattr(item, "damage", None) if item is not None else None,
+        "has_item": item is not None,
+        "affixes": [
+            {
+                "id": getattr(aff, "id", None),
+                "stat": getattr(aff, "stat", None),
+                "value": getattr(aff, "value", None),
+                "affix_tier": getattr(aff, "affix_tier", None),
+                "tier": getattr(aff, "tier", None),
+            }
+            for aff in getattr(inv, "affixes", None) or []
+        ],
+    }
+
+
+def compute_rescale(snap: dict[str, Any]) -> dict[str, Any] | None:
+    """Rescale a snapshot without touching the DB (runs in the maintenance process pool).
+
+    None when the item is not due; otherwise the new field values, ``changed`` as
+    returned by ``rescale_legacy_plus_item``.
+    """
+    affixes = [SimpleNamespace(**a) for a in snap.get("affixes") or []]
+    item = SimpleNamespace(damage=snap.get("item_damage")) if snap.get("has_item") else None
+    inv = SimpleNamespace(**{f: snap.get(f) for f in _SNAPSHOT_FIELDS}, affixes=affixes, item=item)
+    if not should_rescale_inventory(inv):
+        return None
+    changed = rescale_legacy_plus_item(inv)
+    return {
+        "changed": changed,
+        "fields": {f: getattr(inv, f) for f in _RESCALED_FIELDS},
+        "item_damage": item.damage if item is not None else None,
+        "affixes": {a.id: a.value for a in affixes},
+    }
+
+
+def apply_rescale(inv: Any, result: dict[str, Any]) -> None:
+    for name, value in result["fields"].items():
+        setattr(inv, name, value)
+    item = getattr(inv, "item", None)
+    if item is not None:
+        item.damage = result["item_damage"]
+    values = result["affixes"]
+    for aff in getattr(inv, "affixes", None) or []:
+        if aff.id in values:
+            aff.value = values[aff.id]
+
+
+async def rescale_inventory_chunk(
+    session: AsyncSession,
+    items: list[Any],
+    *,
+    run_cpu: Callable[[Callable[[Any], Any], list[Any]], Awaitable[list[Any]]] | None = None,
+) -> int:
+    """Rescale loaded items (math via ``run_cpu`` when given) and refresh enchant steps."""
+    snaps = [rescale_snapshot(inv) for inv in items]
+    results = await run_cpu(compute_rescale, snaps) if run_cpu else [compute_rescale(s) for s in snaps]
     changed = 0
-    for inv in items:
-        if not rescale_legacy_plus_item(inv):
+    for inv, result in zip(items, results):
+        if result is None:
+            continue
+        apply_rescale(inv, result)
+        if not result["changed"]:
             continue
         try:
             await apply_enchant_steps_to_inventory_item(session, inv)
@@ -98,6 +164,14 @@ async def rescale_legacy_plus_items(session: AsyncSession, *, limit: int | None
     return changed
 
 
+async def rescale_legacy_plus_items(session: AsyncSession, *, limit: int | None = None) -> int:
+    """Rescale plus/power_rank items with ver < current (keyset chunks, caller commits)."""
+    from waifu_bot.services.maintenance_jobs import run_job_inline
+
+    result = await run_job_inline(session, "ilvl_rescale", limit=limit)
+    return result.changed
+
+
 def rescale_legacy_plus_items_on_bind(bind: Any) -> int:
     """Sync remake on an Alembic/SQLAlchemy connection (same transaction as the column add)."""
     rows = bind.execute(
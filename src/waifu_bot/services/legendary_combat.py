@@ -48,7 +48,8 @@ from waifu_bot.game.legendary_bonuses.engine import (
     try_incoming_damage_mirror,
     try_incoming_last_breath,
 )
-from waifu_bot.game.legendary_bonuses.loader import count_equipped_legendaries, get_active_legendary_bonuses
+from waifu_bot.game.legendary_bonuses.loader import load_legendary_loadout
+from waifu_bot.game.legendary_bonuses.loadout import EMPTY_LOADOUT, LegendaryLoadout
 from waifu_bot.game.legendary_bonuses.state import (
     increment_message_counters,
     merge_battle_state,
@@ -102,18 +103,21 @@ class LegendaryMonsterView:
 
 
 class LegendaryCombatBridge:
-    """Per-request cache of active bonuses + battle_state mutations."""
+    """Per-request view of the compiled legendary loadout + battle_state mutations."""
 
     def __init__(self) -> None:
+        self._loadout: LegendaryLoadout = EMPTY_LOADOUT
         self._rows: list[dict[str, Any]] | None = None
         self._legendary_count: int = 0
         self._max_mult: float = 10.0
 
-    async def load(self, session: AsyncSession, player_id: int) -> None:
+    async def load(self, session: AsyncSession, player_id: int, *, redis: Any = None) -> None:
+        """``redis``: enables the per-inventory-revision loadout cache (loader.py)."""
         cfg = await get_game_config_map(session)
         self._max_mult = float(cfg_float(cfg, "legendary_bonus_max_total_multiplier", 10.0))
-        self._rows = await get_active_legendary_bonuses(session, player_id)
-        self._legendary_count = await count_equipped_legendaries(session, player_id)
+        self._loadout = await load_legendary_loadout(session, player_id, redis=redis)
+        self._rows = self._loadout.rows if self._loadout.active else []
+        self._legendary_count = self._loadout.legendary_count
 
     @property
     def active(self) -> bool:
@@ -185,12 +189,12 @@ class LegendaryCombatBridge:
         """Run outgoing handlers once; % mult feeds unified pool, flats/extra_hits after crit."""
         if not self._rows:
             return AggregatedLegendaryResult()
-        return run_outgoing_handlers(self._rows, ctx, max_mult=self._max_mult, phase="full")
+        return run_outgoing_handlers(self._loadout, ctx, max_mult=self._max_mult, phase="full")
 
     def apply_pre_crit(self, ctx: BonusContext) -> tuple[bool, float, dict[str, Any]]:
         if not self._rows:
             return False, 1.0, {}
-        agg = run_outgoing_handlers(self._rows, ctx, max_mult=self._max_mult, phase="pre_crit")
+        agg = run_outgoing_handlers(self._loadout, ctx, max_mult=self._max_mult, phase="pre_crit")
         return agg.force_crit, agg.crit_damage_multiplier, agg.battle_state_patch
 
     def apply_outgoing(
@@ -205,7 +209,7 @@ class LegendaryCombatBridge:
         from waifu_bot.game.legendary_bonuses.engine import apply_outgoing_flat_only
 
         if agg is None:
-            agg = run_outgoing_handlers(self._rows, ctx, max_mult=self._max_mult, phase="post_crit")
+            agg = run_outgoing_handlers(self._loadout, ctx, max_mult=self._max_mult, phase="post_crit")
             new_damage = apply_outgoing_to_damage(damage, agg)
         else:
             new_damage = apply_outgoing_flat_only(damage, agg)
@@ -118,31 +118,40 @@ async def record_llm_http(
     prompt_tokens: int | None = None,
     completion_tokens: int | None = None,
 ) -> None:
-    """Insert one roundtrip. No-op if the API engine is not up. Never raises."""
+    """Queue one roundtrip for the ledger flush (Redis), else insert it directly. Never raises.
+
+    The direct path is a no-op if the API engine is not up.
+    """
+    from waifu_bot.services import llm_usage_ledger as ledger
+
+    row = {
+        "created_at": datetime.now(timezone.utc),
+        "caller": (caller or "unknown")[:80],
+        "modality": "image" if modality == "image" else "text",
+        "player_id": llm_player_id(),
+        "source": (llm_source() or "background")[:16],
+        "trigger": ((llm_trigger() or "")[:160] or None),
+        "provider": (provider or "unknown")[:32],
+        "model": (str(model)[:120] if model else None),
+        "http_status": http_status,
+        "ok": bool(ok),
+        "latency_ms": max(0, int(latency_ms)),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+    }
+    try:
+        if await ledger.enqueue(ledger.buffer_redis(), row):
+            return
+    except Exception:
+        logger.debug("llm usage enqueue failed caller=%s", caller, exc_info=True)
+
     from waifu_bot.db.session import SessionLocal
 
     if SessionLocal is None:
         return
     try:
-        from waifu_bot.db.models.llm_usage import LlmUsageLog
-
-        row = LlmUsageLog(
-            created_at=datetime.now(timezone.utc),
-            caller=(caller or "unknown")[:80],
-            modality="image" if modality == "image" else "text",
-            player_id=llm_player_id(),
-            source=(llm_source() or "background")[:16],
-            trigger=((llm_trigger() or "")[:160] or None),
-            provider=(provider or "unknown")[:32],
-            model=(str(model)[:120] if model else None),
-            http_status=http_status,
-            ok=bool(ok),
-            latency_ms=max(0, int(latency_ms)),
-            prompt_tokens=prompt_tokens,
-            completion_tokens=completion_tokens,
-        )
         async with SessionLocal() as session:
-            session.add(row)
+            await ledger.write_rows(session, [row])
             await session.commit()
     except Exception:
         logger.warning("llm_usage_log insert failed caller=%s", caller, exc_info=True)
@@ -177,6 +186,65 @@ async def record_llm_response(
     )
 
 
+def _hour_aligned(dt: datetime) -> bool:
+    return dt.minute == 0 and dt.second == 0 and dt.microsecond == 0
+
+
+def _aggregate_source(
+    start: datetime,
+    end: datetime,
+    *,
+    modality: str | None,
+    caller: str | None,
+    player_id: int | None = None,
+    use_rollup: bool,
+) -> tuple[Any, dict[str, Any], list[Any]]:
+    """Aggregate columns + filters over llm_usage_hourly (rollup) or llm_usage_log (raw)."""
+    from waifu_bot.db.models.llm_usage import LlmUsageHourly, LlmUsageLog
+
+    if use_rollup:
+        t = LlmUsageHourly
+        cols = {
+            "n": func.coalesce(func.sum(t.requests), 0),
+            "ok": func.coalesce(func.sum(t.ok), 0),
+            "latency_sum": func.coalesce(func.sum(t.latency_ms_sum), 0),
+            "prompt_tokens": func.coalesce(func.sum(t.prompt_tokens), 0),
+            "completion_tokens": func.coalesce(func.sum(t.completion_tokens), 0),
+        }
+        # Buckets are hour-aligned: [start, end) covers whole hours (the current one while end = now).
+        filters = [t.hour >= start, t.hour < end]
+    else:
+        t = LlmUsageLog
+        cols = {
+            "n": func.count(),
+            "ok": func.coalesce(func.sum(func.cast(t.ok, Integer)), 0),
+            "latency_sum": func.coalesce(func.sum(t.latency_ms), 0),
+            "prompt_tokens": func.coalesce(func.sum(t.prompt_tokens), 0),
+            "completion_tokens": func.coalesce(func.sum(t.completion_tokens), 0),
+        }
+        filters = [t.created_at >= start, t.created_at <= end]
+    if modality in ("text", "image"):
+        filters.append(t.modality == modality)
+    if caller:
+        filters.append(t.caller == caller.strip()[:80])
+    if player_id:
+        filters.append(LlmUsageLog.player_id == int(player_id))
+    return t, cols, filters
+
+
+def _agg_out(r: Any) -> dict[str, int]:
+    n = int(r.n or 0)
+    ok_n = int(r.ok or 0)
+    return {
+        "count": n,
+        "ok": ok_n,
+        "error": max(0, n - ok_n),
+        "avg_ms": int(int(r.latency_sum or 0) / n) if n else 0,
+        "prompt_tokens": int(r.prompt_tokens or 0),
+        "completion_tokens": int(r.completion_tokens or 0),
+    }
+
+
 async def usage_report(
     session: AsyncSession,
     *,
@@ -187,49 +255,43 @@ async def usage_report(
     player_id: int | None = None,
     recent_limit: int = 80,
 ) -> dict[str, Any]:
+    """Spend report. Totals / by_caller / by_model read hourly rollups when the window is
+    hour-aligned and not filtered by player (the default MSK+7 day window is); by_player,
+    the distinct player count and recent rows come from the raw log (kept for retention)."""
     from waifu_bot.db.models import Player
     from waifu_bot.db.models.llm_usage import LlmUsageLog
 
     start, end = default_window_utc(since, until)
-    filters = [
-        LlmUsageLog.created_at >= start,
-        LlmUsageLog.created_at <= end,
-    ]
-    if modality in ("text", "image"):
-        filters.append(LlmUsageLog.modality == modality)
-    if caller:
-        filters.append(LlmUsageLog.caller == caller.strip()[:80])
-    if player_id:
-        filters.append(LlmUsageLog.player_id == int(player_id))
+    _, _, filters = _aggregate_source(
+        start, end, modality=modality, caller=caller, player_id=player_id, use_rollup=False
+    )
+    use_rollup = not player_id and _hour_aligned(start) and (until is None or _hour_aligned(end))
+    t, agg, agg_filters = _aggregate_source(
+        start, end, modality=modality, caller=caller, player_id=player_id, use_rollup=use_rollup
+    )
+    agg_cols = [c.label(k) for k, c in agg.items()]
 
-    totals_row = (
-        await session.execute(
-            select(
-                func.count().label("sent"),
-                func.coalesce(func.sum(func.cast(LlmUsageLog.ok, Integer)), 0).label("ok"),
-                func.coalesce(func.sum(LlmUsageLog.prompt_tokens), 0).label("prompt_tokens"),
-                func.coalesce(func.sum(LlmUsageLog.completion_tokens), 0).label("completion_tokens"),
-                func.count(func.distinct(LlmUsageLog.player_id)).label("players"),
-            ).where(*filters)
-        )
-    ).one()
-    sent = int(totals_row.sent or 0)
-    ok_n = int(totals_row.ok or 0)
+    totals_row = (await session.execute(select(*agg_cols).where(*agg_filters))).one()
+    players = (
+        await session.execute(select(func.count(func.distinct(LlmUsageLog.player_id))).where(*filters))
+    ).scalar_one()
+    totals = _agg_out(totals_row)
 
     by_caller_rows = (
         await session.execute(
-            select(
-                LlmUsageLog.caller,
-                LlmUsageLog.modality,
-                func.count().label("n"),
-                func.coalesce(func.sum(func.cast(LlmUsageLog.ok, Integer)), 0).label("ok"),
-                func.coalesce(func.avg(LlmUsageLog.latency_ms), 0).label("avg_ms"),
-                func.coalesce(func.sum(LlmUsageLog.prompt_tokens), 0).label("prompt_tokens"),
-                func.coalesce(func.sum(LlmUsageLog.completion_tokens), 0).label("completion_tokens"),
-            )
-            .where(*filters)
-            .group_by(LlmUsageLog.caller, LlmUsageLog.modality)
-            .order_by(func.count().desc())
+            select(t.caller, t.modality, *agg_cols)
+            .where(*agg_filters)
+            .group_by(t.caller, t.modality)
+            .order_by(agg["n"].desc())
+            .limit(80)
+        )
+    ).all()
+    by_model_rows = (
+        await session.execute(
+            select(t.provider, t.model, t.source, *agg_cols)
+            .where(*agg_filters)
+            .group_by(t.provider, t.model, t.source)
+            .order_by(agg["n"].desc())
             .limit(80)
         )
     ).all()
@@ -265,27 +327,23 @@ async def usage_report(
     return {
         "since": start.isoformat(),
         "until": end.isoformat(),
+        "aggregates": "hourly" if use_rollup else "raw",
         "totals": {
-            "sent": sent,
-            "ok": ok_n,
-            "error": max(0, sent - ok_n),
-            "prompt_tokens": int(totals_row.prompt_tokens or 0),
-            "completion_tokens": int(totals_row.completion_tokens or 0),
-            "players": int(totals_row.players or 0),
+            "sent": totals["count"],
+            "ok": totals["ok"],
+            "error": totals["error"],
+            "prompt_tokens": totals["prompt_tokens"],
+            "completion_tokens": totals["completion_tokens"],
+            "players": int(players or 0),
         },
         "by_caller": [
-            {
-                "caller": r.caller,
-                "modality": r.modality,
-                "count": int(r.n),
-                "ok": int(r.ok),
-                "error": int(r.n) - int(r.ok),
-                "avg_ms": int(r.avg_ms or 0),
-                "prompt_tokens": int(r.prompt_tokens or 0),
-                "completion_tokens": int(r.completion_tokens or 0),
-            }
+            {"caller": r.caller, "modality": r.modality, **_agg_out(r)}
             for r in by_caller_rows
         ],
+        "by_model": [
+            {"provider": r.provider, "model": r.model or None, "source": r.source, **_agg_out(r)}
+            for r in by_model_rows
+        ],
         "by_player": [
             {
                 "player_id": r.player_id,
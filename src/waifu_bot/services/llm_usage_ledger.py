@@ -0,0 +1,217 @@
+"""Write-behind ledger for LLM roundtrips: Redis buffer → batched inserts + hourly rollups.
+
+``record_llm_http`` used to open a session and commit one ``llm_usage_log`` row per
+HTTP call. Now it RPUSHes a JSON row onto ``llm_usage:buf``; the ``llm_usage_flush``
+tick drains it into multi-row INSERTs and upserts ``llm_usage_hourly`` (one row per
+hour × caller × modality × provider × model × source) in the same transaction, so the
+admin report reads a few hundred rollup rows instead of scanning the raw log.
+
+Raw rows are kept ``LLM_USAGE_RAW_RETENTION_DAYS`` (daily ``llm_usage_retention`` job);
+rollups are kept forever. Delivery is at-least-once like ``codex_buffer``: a crash
+between the DB commit and the in-flight delete replays that batch.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable
+
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from waifu_bot.db.models.llm_usage import LlmUsageHourly, LlmUsageLog
+
+logger = logging.getLogger(__name__)
+
+BUF_KEY = "llm_usage:buf"
+INFLIGHT_KEY = BUF_KEY + ":inflight"
+# Hard cap so a stuck flusher cannot grow the buffer without bound (oldest rows are kept).
+BUF_MAX_LEN = 200_000
+FLUSH_CHUNK = 500
+RETENTION_DELETE_BATCH = 5000
+
+_ROW_FIELDS = (
+    "caller",
+    "modality",
+    "player_id",
+    "source",
+    "trigger",
+    "provider",
+    "model",
+    "http_status",
+    "ok",
+    "latency_ms",
+    "prompt_tokens",
+    "completion_tokens",
+)
+
+
+def buffer_redis() -> Any | None:
+    """Process Redis client for the ledger buffer, or None when disabled."""
+    from waifu_bot.core.config import settings
+
+    if not getattr(settings, "llm_usage_write_behind_enabled", True):
+        return None
+    try:
+        from waifu_bot.core import redis as redis_core
+
+        return redis_core.get_redis()
+    except Exception:
+        return None
+
+
+def encode_row(row: dict[str, Any]) -> str:
+    out = {k: row.get(k) for k in _ROW_FIELDS}
+    created = row.get("created_at") or datetime.now(timezone.utc)
+    out["ts"] = created.timestamp()
+    return json.dumps(out, separators=(",", ":"))
+
+
+def decode_row(raw: str) -> dict[str, Any] | None:
+    try:
+        data = json.loads(raw)
+        row = {k: data.get(k) for k in _ROW_FIELDS}
+        row["created_at"] = datetime.fromtimestamp(float(data["ts"]), tz=timezone.utc)
+    except (TypeError, ValueError, KeyError):
+        logger.warning("llm usage ledger: dropped malformed row %r", str(raw)[:200])
+        return None
+    if not row.get("caller") or not row.get("provider"):
+        return None
+    row["ok"] = bool(row.get("ok"))
+    row["latency_ms"] = max(0, int(row.get("latency_ms") or 0))
+    row["source"] = row.get("source") or "background"
+    return row
+
+
+async def enqueue(redis: Any, row: dict[str, Any]) -> bool:
+    """Buffer one roundtrip; False when Redis is missing/down (caller writes directly)."""
+    if redis is None:
+        return False
+    try:
+        n = await redis.rpush(BUF_KEY, encode_row(row))
+        if int(n or 0) > BUF_MAX_LEN:
+            await redis.ltrim(BUF_KEY, 0, BUF_MAX_LEN - 1)
+        return True
+    except (RedisError, OSError):
+        logger.debug("llm usage ledger: enqueue fallback", exc_info=True)
+        return False
+
+
+def hour_floor(dt: datetime) -> datetime:
+    return dt.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_rows(rows: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Aggregate raw rows into ``llm_usage_hourly`` increments."""
+    acc: dict[tuple, dict[str, Any]] = {}
+    for r in rows:
+        key = (
+            hour_floor(r["created_at"]),
+            r["caller"],
+            r["modality"],
+            r["provider"],
+            r.get("model") or "",
+            r.get("source") or "background",
+        )
+        agg = acc.get(key)
+        if agg is None:
+            agg = acc[key] = {
+                "hour": key[0],
+                "caller": key[1],
+                "modality": key[2],
+                "provider": key[3],
+                "model": key[4],
+                "source": key[5],
+                "requests": 0,
+                "ok": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "latency_ms_sum": 0,
+            }
+        agg["requests"] += 1
+        agg["ok"] += 1 if r.get("ok") else 0
+        agg["prompt_tokens"] += int(r.get("prompt_tokens") or 0)
+        agg["completion_tokens"] += int(r.get("completion_tokens") or 0)
+        agg["latency_ms_sum"] += int(r.get("latency_ms") or 0)
+    return list(acc.values())
+
+
+def hourly_upsert_stmt(rows: list[dict[str, Any]]):
+    ins = pg_insert(LlmUsageHourly).values(rows)
+    return ins.on_conflict_do_update(
+        index_elements=["hour", "caller", "modality", "provider", "model", "source"],
+        set_={
+            col: getattr(LlmUsageHourly, col) + getattr(ins.excluded, col)
+            for col in ("requests", "ok", "prompt_tokens", "completion_tokens", "latency_ms_sum")
+        },
+    )
+
+
+def _chunks(rows: list[dict], size: int = FLUSH_CHUNK):
+    for i in range(0, len(rows), size):
+        yield rows[i : i + size]
+
+
+async def write_rows(session: AsyncSession, rows: list[dict[str, Any]]) -> int:
+    """Multi-row insert into the raw log plus rollup upserts. Does not commit."""
+    if not rows:
+        return 0
+    for chunk in _chunks(rows):
+        await session.execute(pg_insert(LlmUsageLog).values(chunk))
+    # Sorted so concurrent writers (flush + direct fallback) lock rollup rows in the same order.
+    hourly = sorted(
+        rollup_rows(rows),
+        key=lambda a: (a["hour"], a["caller"], a["modality"], a["provider"], a["model"], a["source"]),
+    )
+    for chunk in _chunks(hourly):
+        await session.execute(hourly_upsert_stmt(chunk))
+    return len(rows)
+
+
+async def _take_inflight(redis: Any) -> list[str]:
+    """Move the live buffer aside (unless a previous batch is still in flight) and read it."""
+    if not await redis.exists(INFLIGHT_KEY):
+        try:
+            await redis.renamenx(BUF_KEY, INFLIGHT_KEY)
+        except ResponseError:
+            return []  # live buffer empty
+    return list(await redis.lrange(INFLIGHT_KEY, 0, -1) or [])
+
+
+async def flush_llm_usage_buffer(session: AsyncSession, redis: Any) -> int:
+    """Drain ``llm_usage:buf`` into Postgres. Commits. Returns raw rows written."""
+    if redis is None:
+        return 0
+    raw = await _take_inflight(redis)
+    rows = [r for r in (decode_row(x) for x in raw) if r is not None]
+    written = await write_rows(session, rows)
+    await session.commit()
+    if raw:
+        await redis.delete(INFLIGHT_KEY)
+    return written
+
+
+async def prune_raw_rows(session: AsyncSession, *, older_than_days: int, now: datetime | None = None) -> int:
+    """Delete raw rows past retention in id batches (rollups stay). Commits per batch."""
+    if older_than_days <= 0:
+        return 0
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=int(older_than_days))
+    total = 0
+    while True:
+        ids = (
+            select(LlmUsageLog.id)
+            .where(LlmUsageLog.created_at < cutoff)
+            .order_by(LlmUsageLog.id)
+            .limit(RETENTION_DELETE_BATCH)
+            .scalar_subquery()
+        )
+        res = await session.execute(delete(LlmUsageLog).where(LlmUsageLog.id.in_(ids)))
+        await session.commit()
+        n = int(res.rowcount or 0)
+        total += n
+        if n < RETENTION_DELETE_BATCH:
+            return total
+
@@ -0,0 +1,864 @@
+"""Resumable bulk maintenance jobs (gear score / perfection recompute, ilvl rescale, backfills).
+
+A job is a keyset over integer ids plus a chunk processor. The engine pages with
+``id > cursor ORDER BY id LIMIT chunk_size`` and commits every chunk together with the
+new cursor in ``maintenance_job_runs``, so a crashed or cancelled run resumes after the
+last committed chunk instead of starting over. Each key runs in a SAVEPOINT: one broken
+player/item is counted in ``errors`` and does not abort the chunk.
+
+Between chunks the engine throttles itself: it sleeps so that work takes at most
+``MAINTENANCE_JOB_DUTY_CYCLE`` of wall time, and waits while Postgres has more than
+``MAINTENANCE_JOB_MAX_ACTIVE_QUERIES`` active queries. Pure CPU steps (item rescale math)
+go through ``JobContext.run_cpu`` — a spawn process pool sized by
+``MAINTENANCE_JOB_PROCESSES``.
+
+Runs are created by the Armory admin API or the ``scripts/backfill_*`` CLIs and executed
+by the ``maintenance_jobs`` tick (or directly by the CLI). Legacy entry points
+(``recompute_all_gear_scores`` etc.) call ``run_job_inline``: same chunks, caller's
+transaction, no ledger row.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Sequence
+
+from sqlalchemy import and_, func, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from waifu_bot.db import models as m
+from waifu_bot.db.models.scheduler import MaintenanceJobRun
+from waifu_bot.services.background_lock import _INSTANCE_ID
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 200
+MAX_CHUNK_SIZE = 5000
+# A running claim not renewed for this long is treated as crashed and may be re-claimed.
+LEASE_SEC = 300
+# Chunks with fewer CPU items than this are computed inline (pool round-trip costs more).
+CPU_POOL_MIN_ITEMS = 64
+THROTTLE_BACKOFF_SEC = 2.0
+THROTTLE_MAX_WAITS = 30
+ACTIVE_STATUSES = ("pending", "running")
+
+_ACTIVE_QUERIES_SQL = text(
+    "SELECT count(*) FROM pg_stat_activity WHERE state = 'active' AND datname = current_database()"
+)
+
+
+class MaintenanceJobError(Exception):
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.code = code
+
+
+@dataclass
+class ChunkResult:
+    processed: int = 0
+    changed: int = 0
+    errors: int = 0
+
+    def add(self, other: "ChunkResult") -> None:
+        self.processed += other.processed
+        self.changed += other.changed
+        self.errors += other.errors
+
+
+def _map_slice(fn: Callable[[Any], Any], items: list[Any]) -> list[Any]:
+    return [fn(x) for x in items]
+
+
+class JobContext:
+    """Per-run state handed to ``process``: params, dry-run flag and the CPU pool."""
+
+    def __init__(
+        self,
+        params: dict[str, Any] | None = None,
+        *,
+        dry_run: bool = False,
+        processes: int | None = None,
+        results: list[Any] | None = None,
+    ) -> None:
+        from waifu_bot.core.config import settings
+
+        self.params = dict(params or {})
+        self.dry_run = bool(dry_run)
+        self.processes = max(
+            0, int(processes if processes is not None else getattr(settings, "maintenance_job_processes", 0) or 0)
+        )
+        # Inline callers that need per-key reports (legacy wrappers) pass a list here.
+        self.results = results
+        self._pool: ProcessPoolExecutor | None = None
+
+    async def run_cpu(self, fn: Callable[[Any], Any], items: Sequence[Any]) -> list[Any]:
+        """``[fn(x) for x in items]`` in the process pool; ``fn`` must be a picklable top-level function."""
+        items = list(items)
+        if self.processes <= 0 or len(items) < CPU_POOL_MIN_ITEMS:
+            return _map_slice(fn, items)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        step = -(-len(items) // self.processes)
+        loop = asyncio.get_running_loop()
+        parts = await asyncio.gather(
+            *(
+                loop.run_in_executor(self._pool, _map_slice, fn, items[i : i + step])
+                for i in range(0, len(items), step)
+            )
+        )
+        return [x for part in parts for x in part]
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+KeysFn = Callable[[AsyncSession, "int | None", int, dict[str, Any]], Awaitable[list[int]]]
+ProcessFn = Callable[[AsyncSession, list[int], JobContext], Awaitable[ChunkResult]]
+CountFn = Callable[[AsyncSession, dict[str, Any]], Awaitable[int]]
+
+
+@dataclass(frozen=True)
+class MaintenanceJob:
+    name: str
+    title: str
+    # (session, after_id, limit, params) → next ids in ascending order.
+    keys: KeysFn
+    # Must not commit; the engine commits (or rolls back on dry-run) per chunk.
+    process: ProcessFn
+    count: CountFn | None = None
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    params_doc: dict[str, str] = field(default_factory=dict)
+
+
+JOBS: dict[str, MaintenanceJob] = {}
+
+
+def register_job(job: MaintenanceJob) -> MaintenanceJob:
+    JOBS[job.name] = job
+    return job
+
+
+def get_job(name: str) -> MaintenanceJob:
+    job = JOBS.get(str(name))
+    if job is None:
+        raise MaintenanceJobError("unknown_job")
+    return job
+
+
+async def each_key(
+    session: AsyncSession,
+    keys: Sequence[Any],
+    fn: Callable[[Any], Awaitable[bool]],
+    *,
+    label: str,
+) -> ChunkResult:
+    """Run ``fn`` per key in its own SAVEPOINT; True from ``fn`` counts as changed."""
+    out = ChunkResult()
+    for key in keys:
+        out.processed += 1
+        try:
+            async with session.begin_nested():
+                if await fn(key):
+                    out.changed += 1
+        except Exception:
+            out.errors += 1
+            logger.exception("maintenance job %s failed key=%s", label, key)
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+
+
+def _clamp_chunk(job: MaintenanceJob, chunk_size: int | None) -> int:
+    return max(1, min(MAX_CHUNK_SIZE, int(chunk_size or job.chunk_size)))
+
+
+async def run_job_inline(
+    session: AsyncSession,
+    name: str,
+    *,
+    params: dict[str, Any] | None = None,
+    chunk_size: int | None = None,
+    limit: int | None = None,
+    results: list[Any] | None = None,
+) -> ChunkResult:
+    """Run a job to the end inside the caller's transaction (flush per chunk, no commit)."""
+    job = get_job(name)
+    size = _clamp_chunk(job, chunk_size)
+    ctx = JobContext(params, results=results)
+    total = ChunkResult()
+    cursor: int | None = None
+    try:
+        while limit is None or total.processed < limit:
+            want = size if limit is None else min(size, int(limit) - total.processed)
+            keys = await job.keys(session, cursor, want, ctx.params)
+            if not keys:
+                break
+            total.add(await job.process(session, keys, ctx))
+            await session.flush()
+            cursor = int(keys[-1])
+    finally:
+        ctx.close()
+    return total
+
+
+async def start_run(
+    session: AsyncSession,
+    name: str,
+    *,
+    params: dict[str, Any] | None = None,
+    dry_run: bool = False,
+    chunk_size: int | None = None,
+    created_by: int | None = None,
+) -> MaintenanceJobRun:
+    """Queue a run (the caller commits). One unfinished run per job at a time."""
+    job = get_job(name)
+    busy = await session.scalar(
+        select(MaintenanceJobRun.id)
+        .where(MaintenanceJobRun.job_name == job.name, MaintenanceJobRun.status.in_(ACTIVE_STATUSES))
+        .limit(1)
+    )
+    if busy is not None:
+        raise MaintenanceJobError("already_running")
+    params = dict(params or {})
+    total = None
+    if job.count is not None:
+        try:
+            total = int(await job.count(session, params))
+        except Exception:
+            logger.warning("maintenance job %s: count failed", job.name, exc_info=True)
+    row = MaintenanceJobRun(
+        job_name=job.name,
+        params=params,
+        dry_run=bool(dry_run),
+        status="pending",
+        chunk_size=_clamp_chunk(job, chunk_size),
+        total_estimate=total,
+        created_by=created_by,
+    )
+    session.add(row)
+    await session.flush()
+    return row
+
+
+async def request_cancel(session: AsyncSession, run_id: int) -> MaintenanceJobRun:
+    """Pending runs are cancelled at once; running ones stop before their next chunk."""
+    row = await session.get(MaintenanceJobRun, int(run_id))
+    if row is None:
+        raise MaintenanceJobError("run_not_found")
+    now = datetime.now(timezone.utc)
+    if row.status == "pending":
+        row.status = "cancelled"
+        row.finished_at = now
+    elif row.status == "running":
+        row.cancel_requested = True
+    else:
+        raise MaintenanceJobError("run_finished")
+    row.updated_at = now
+    await session.flush()
+    return row
+
+
+async def request_resume(session: AsyncSession, run_id: int) -> MaintenanceJobRun:
+    """Re-queue a failed/cancelled run from its checkpoint."""
+    row = await session.get(MaintenanceJobRun, int(run_id))
+    if row is None:
+        raise MaintenanceJobError("run_not_found")
+    if row.status not in ("failed", "cancelled"):
+        raise MaintenanceJobError("run_not_resumable")
+    get_job(row.job_name)
+    busy = await session.scalar(
+        select(MaintenanceJobRun.id)
+        .where(
+            MaintenanceJobRun.job_name == row.job_name,
+            MaintenanceJobRun.status.in_(ACTIVE_STATUSES),
+            MaintenanceJobRun.id != row.id,
+        )
+        .limit(1)
+    )
+    if busy is not None:
+        raise MaintenanceJobError("already_running")
+    row.status = "pending"
+    row.cancel_requested = False
+    row.finished_at = None
+    row.last_error = None
+    row.updated_at = datetime.now(timezone.utc)
+    await session.flush()
+    return row
+
+
+async def claim_run(session: AsyncSession, run_id: int, *, now: datetime | None = None) -> bool:
+    """Take the lease on a pending (or crashed running) run. Commits."""
+    t = MaintenanceJobRun
+    now = now or datetime.now(timezone.utc)
+    result = await session.execute(
+        update(t)
+        .where(t.id == int(run_id))
+        .where(or_(t.status == "pending", and_(t.status == "running", t.lease_until < now)))
+        .values(
+            status="running",
+            claimed_by=_INSTANCE_ID,
+            lease_until=now + timedelta(seconds=LEASE_SEC),
+            started_at=func.coalesce(t.started_at, now),
+            updated_at=now,
+        )
+        .returning(t.id)
+        .execution_options(synchronize_session=False)
+    )
+    claimed = result.scalar_one_or_none() is not None
+    await session.commit()
+    return claimed
+
+
+async def next_runnable_id(session: AsyncSession, *, now: datetime | None = None) -> int | None:
+    """Oldest run that is queued or whose worker stopped renewing its lease."""
+    t = MaintenanceJobRun
+    now = now or datetime.now(timezone.utc)
+    run_id = await session.scalar(
+        select(t.id)
+        .where(
+            t.job_name.in_(list(JOBS)),
+            or_(t.status == "pending", and_(t.status == "running", t.lease_until < now)),
+        )
+        .order_by(t.id)
+        .limit(1)
+    )
+    await session.commit()
+    return int(run_id) if run_id is not None else None
+
+
+async def _finish(session: AsyncSession, run_id: int, status: str, *, error: str | None = None) -> None:
+    now = datetime.now(timezone.utc)
+    await session.execute(
+        update(MaintenanceJobRun)
+        .where(MaintenanceJobRun.id == int(run_id), MaintenanceJobRun.claimed_by == _INSTANCE_ID)
+        .values(
+            status=status,
+            lease_until=None,
+            finished_at=now if status != "pending" else None,
+            last_error=error[:2000] if error else None,
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+
+
+def _duty_sleep_sec(work_sec: float) -> float:
+    from waifu_bot.core.config import settings
+
+    duty = float(getattr(settings, "maintenance_job_duty_cycle", 1.0) or 1.0)
+    if duty >= 1.0 or work_sec <= 0:
+        return 0.0
+    duty = max(0.05, duty)
+    return work_sec * (1.0 - duty) / duty
+
+
+async def throttle(session: AsyncSession, work_sec: float) -> None:
+    """Yield DB capacity between chunks: duty-cycle sleep, then wait out load spikes."""
+    from waifu_bot.core.config import settings
+
+    pause = _duty_sleep_sec(work_sec)
+    if pause > 0:
+        await asyncio.sleep(pause)
+    max_active = int(getattr(settings, "maintenance_job_max_active_queries", 0) or 0)
+    if max_active <= 0:
+        return
+    for _ in range(THROTTLE_MAX_WAITS):
+        active = int(await session.scalar(_ACTIVE_QUERIES_SQL) or 0)
+        await session.rollback()
+        if active <= max_active:
+            return
+        logger.info("maintenance job throttled: %d active queries > %d", active, max_active)
+        await asyncio.sleep(THROTTLE_BACKOFF_SEC)
+
+
+async def execute_run(
+    session: AsyncSession,
+    run_id: int,
+    *,
+    time_budget_sec: float | None = None,
+    on_chunk: Callable[[MaintenanceJobRun], None] | None = None,
+) -> str:
+    """Process chunks of a claimed run until done, cancelled, failed or out of budget.
+
+    Returns the resulting status; ``pending`` means the budget ran out and the next
+    ``maintenance_jobs`` tick continues from the checkpoint.
+    """
+    t = MaintenanceJobRun
+    row = await session.get(t, int(run_id))
+    if row is None or row.claimed_by != _INSTANCE_ID or row.status != "running":
+        raise MaintenanceJobError("run_not_claimed")
+    job = JOBS.get(row.job_name)
+    if job is None:
+        await _finish(session, run_id, "failed", error="unknown_job")
+        return "failed"
+    ctx = JobContext(row.params, dry_run=row.dry_run)
+    cursor = row.cursor
+    size = _clamp_chunk(job, row.chunk_size)
+    deadline = time.monotonic() + time_budget_sec if time_budget_sec else None
+    try:
+        while True:
+            cancel = await session.scalar(select(t.cancel_requested).where(t.id == int(run_id)))
+            if cancel:
+                await _finish(session, run_id, "cancelled")
+                return "cancelled"
+            started = time.monotonic()
+            try:
+                keys = await job.keys(session, cursor, size, ctx.params)
+                if not keys:
+                    await session.rollback()
+                    await _finish(session, run_id, "done")
+                    return "done"
+                res = await job.process(session, keys, ctx)
+                if ctx.dry_run:
+                    await session.rollback()
+                else:
+                    await session.flush()
+            except Exception as exc:
+                logger.exception("maintenance job %s run=%s failed after cursor=%s", job.name, run_id, cursor)
+                await session.rollback()
+                await _finish(session, run_id, "failed", error=repr(exc))
+                return "failed"
+            cursor = int(keys[-1])
+            now = datetime.now(timezone.utc)
+            await session.execute(
+                update(t)
+                .where(t.id == int(run_id), t.claimed_by == _INSTANCE_ID)
+                .values(
+                    cursor=cursor,
+                    processed=t.processed + res.processed,
+                    changed=t.changed + res.changed,
+                    errors=t.errors + res.errors,
+                    lease_until=now + timedelta(seconds=LEASE_SEC),
+                    updated_at=now,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            # Chunk writes and the checkpoint land in one transaction.
+            await session.commit()
+            session.expunge_all()
+            if on_chunk is not None:
+                row = await session.get(t, int(run_id))
+                if row is not None:
+                    on_chunk(row)
+            await throttle(session, time.monotonic() - started)
+            if deadline is not None and time.monotonic() >= deadline:
+                await _finish(session, run_id, "pending")
+                return "pending"
+    finally:
+        ctx.close()
+
+
+async def run_pending_jobs(*, time_budget_sec: float) -> int:
+    """Tick body: claim runnable runs one by one and execute them within the budget."""
+    from waifu_bot.db.session import get_session, init_engine
+
+    init_engine()
+    deadline = time.monotonic() + float(time_budget_sec)
+    ran = 0
+    async for session in get_session():
+        while time.monotonic() < deadline:
+            run_id = await next_runnable_id(session)
+            if run_id is None or not await claim_run(session, run_id):
+                break
+            status = await execute_run(session, run_id, time_budget_sec=deadline - time.monotonic())
+            logger.info("maintenance run %s → %s", run_id, status)
+            ran += 1
+            if status == "pending":
+                break
+        break
+    return ran
+
+
+def run_payload(row: MaintenanceJobRun) -> dict[str, Any]:
+    job = JOBS.get(row.job_name)
+    total = row.total_estimate
+    return {
+        "id": int(row.id),
+        "job": row.job_name,
+        "title": job.title if job else row.job_name,
+        "params": row.params or {},
+        "dry_run": bool(row.dry_run),
+        "status": row.status,
+        "cancel_requested": bool(row.cancel_requested),
+        "cursor": row.cursor,
+        "chunk_size": int(row.chunk_size),
+        "processed": int(row.processed or 0),
+        "changed": int(row.changed or 0),
+        "errors": int(row.errors or 0),
+        "total_estimate": total,
+        "progress": round(min(1.0, (row.processed or 0) / total), 4) if total else None,
+        "created_by": row.created_by,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "started_at": row.started_at.isoformat() if row.started_at else None,
+        "finished_at": row.finished_at.isoformat() if row.finished_at else None,
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+        "last_error": row.last_error,
+    }
+
+
+async def list_runs(session: AsyncSession, *, limit: int = 20) -> list[dict[str, Any]]:
+    rows = (
+        await session.execute(select(MaintenanceJobRun).order_by(MaintenanceJobRun.id.desc()).limit(limit))
+    ).scalars().all()
+    return [run_payload(r) for r in rows]
+
+
+# ---------------------------------------------------------------------------
+# Jobs
+# ---------------------------------------------------------------------------
+
+
+def _player_ids_param(params: dict[str, Any]) -> list[int] | None:
+    raw = params.get("player_ids")
+    if not raw:
+        return None
+    return sorted({int(x) for x in raw})
+
+
+def _player_keyset(*conds: Any) -> KeysFn:
+    async def keys(session: AsyncSession, after: int | None, limit: int, params: dict[str, Any]) -> list[int]:
+        q = select(m.Player.id).where(*conds)
+        only = _player_ids_param(params)
+        if only:
+            q = q.where(m.Player.id.in_(only))
+        if after is not None:
+            q = q.where(m.Player.id > int(after))
+        return [int(x) for x in (await session.scalars(q.order_by(m.Player.id).limit(limit))).all()]
+
+    return keys
+
+
+def _player_count(*conds: Any) -> CountFn:
+    async def count(session: AsyncSession, params: dict[str, Any]) -> int:
+        q = select(func.count(m.Player.id)).where(*conds)
+        only = _player_ids_param(params)
+        if only:
+            q = q.where(m.Player.id.in_(only))
+        return int(await session.scalar(q) or 0)
+
+    return count
+
+
+async def _gear_scores_process(session: AsyncSession, keys: list[int], ctx: JobContext) -> ChunkResult:
+    from waifu_bot.services.armory_service import recompute_and_store_gear_score
+
+    old = dict(
+        (await session.execute(select(m.Player.id, m.Player.gear_score).where(m.Player.id.in_(keys)))).all()
+    )
+
+    async def one(pid: int) -> bool:
+        score = await recompute_and_store_gear_score(session, int(pid))
+        return int(old.get(pid) or 0) != int(score)
+
+    return await each_key(session, keys, one, label="gear_scores")
+
+
+register_job(
+    MaintenanceJob(
+        name="gear_scores",
+        title="Пересчёт gear score",
+        keys=_player_keyset(),
+        process=_gear_scores_process,
+        count=_player_count(),
+        params_doc={"player_ids": "list[int], optional"},
+    )
+)
+
+
+_PERFECTION_FILTER = (m.Player.perfection_level > 0) | (m.Player.perfection_bonus_totals.isnot(None))
+
+
+async def _perfection_process(session: AsyncSession, keys: list[int], ctx: JobContext) -> ChunkResult:
+    from waifu_bot.services.perfection import recompute_player_perfection_from_catalog
+
+    players = {
+        int(p.id): p
+        for p in (await session.scalars(select(m.Player).where(m.Player.id.in_(keys)))).all()
+    }
+    sync_hp = bool(ctx.params.get("sync_hp", True))
+
+    async def one(pid: int) -> bool:
+        player = players.get(int(pid))
+        if player is None:
+            return False
+        report = await recompute_player_perfection_from_catalog(session, player, sync_hp=sync_hp)
+        if ctx.results is not None:
+            ctx.results.append(report)
+        return report["old_totals"] != report["new_totals"] or bool(report["pending_updated"])
+
+    return await each_key(session, keys, one, label="perfection_recompute")
+
+
+register_job(
+    MaintenanceJob(
+        name="perfection_recompute",
+        title="Пересчёт совершенствования по каталогу",
+        keys=_player_keyset(_PERFECTION_FILTER),
+        process=_perfection_process,
+        count=_player_count(_PERFECTION_FILTER),
+        params_doc={"player_ids": "list[int], optional", "sync_hp": "bool, default true"},
+    )
+)
+
+
+def _ilvl_rescale_filter() -> tuple[Any, ...]:
+    from waifu_bot.game.item_ilvl_scaling import CURRENT_SCALE_VER
+
+    return (
+        m.InventoryItem.ilvl_stat_scale_ver < CURRENT_SCALE_VER,
+        or_(m.InventoryItem.plus_level_source > 0, m.InventoryItem.power_rank > 0),
+    )
+
+
+async def _ilvl_rescale_keys(
+    session: AsyncSession, after: int | None, limit: int, params: dict[str, Any]
+) -> list[int]:
+    q = select(m.InventoryItem.id).where(*_ilvl_rescale_filter())
+    if after is not None:
+        q = q.where(m.InventoryItem.id > int(after))
+    return [int(x) for x in (await session.scalars(q.order_by(m.InventoryItem.id).limit(limit))).all()]
+
+
+async def _ilvl_rescale_count(session: AsyncSession, params: dict[str, Any]) -> int:
+    return int(await session.scalar(select(func.count(m.InventoryItem.id)).where(*_ilvl_rescale_filter())) or 0)
+
+
+async def _ilvl_rescale_process(session: AsyncSession, keys: list[int], ctx: JobContext) -> ChunkResult:
+    from sqlalchemy.orm import selectinload
+
+    from waifu_bot.services.item_ilvl_rescale import rescale_inventory_chunk
+
+    items = list(
+        (
+            await session.scalars(
+                select(m.InventoryItem)
+                .options(selectinload(m.InventoryItem.affixes), selectinload(m.InventoryItem.item))
+                .where(m.InventoryItem.id.in_(keys))
+                .order_by(m.InventoryItem.id)
+            )
+        ).all()
+    )
+    changed = await rescale_inventory_chunk(session, items, run_cpu=ctx.run_cpu)
+    return ChunkResult(processed=len(keys), changed=changed)
+
+
+register_job(
+    MaintenanceJob(
+        name="ilvl_rescale",
+        title="Рескейл легаси Dungeon+ предметов на кривую ilvl",
+        keys=_ilvl_rescale_keys,
+        process=_ilvl_rescale_process,
+        count=_ilvl_rescale_count,
+        chunk_size=500,
+    )
+)
+
+
+async def _monster_codex_process(session: AsyncSession, keys: list[int], ctx: JobContext) -> ChunkResult:
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+    from waifu_bot.db.models.dungeon import DungeonRun, DungeonRunMonster, PlayerMonsterCodex
+
+    # A monster counts as killed if its run advanced past its position OR its hp reached 0.
+    rows = (
+        await session.execute(
+            select(
+                DungeonRun.player_id,
+                DungeonRunMonster.template_id,
+                func.count().label("kills"),
+            )
+            .join(DungeonRun, DungeonRun.id == DungeonRunMonster.run_id)
+            .where(
+                DungeonRun.player_id.in_(keys),
+                DungeonRunMonster.template_id.isnot(None),
+                or_(
+                    DungeonRunMonster.current_hp <= 0,
+                    DungeonRunMonster.position < DungeonRun.current_position,
+                ),
+            )
+            .group_by(DungeonRun.player_id, DungeonRunMonster.template_id)
+            .order_by(DungeonRun.player_id, DungeonRunMonster.template_id)
+        )
+    ).all()
+    now = datetime.utcnow()
+    values = [
+        {
+            "player_id": int(pid),
+            "monster_template_id": int(tid),
+            "kills": int(kills),
+            "first_seen_at": now,
+            "first_kill_at": now,
+            "last_kill_at": now,
+        }
+        for pid, tid, kills in rows
+        if int(kills or 0) > 0
+    ]
+    if values:
+        ins = pg_insert(PlayerMonsterCodex).values(values)
+        # greatest(): re-running never lowers real progress.
+        await session.execute(
+            ins.on_conflict_do_update(
+                index_elements=["player_id", "monster_template_id"],
+                set_={"kills": func.greatest(PlayerMonsterCodex.kills, ins.excluded.kills)},
+            )
+        )
+    return ChunkResult(processed=len(keys), changed=len(values))
+
+
+register_job(
+    MaintenanceJob(
+        name="backfill_monster_codex",
+        title="Бэкфилл бестиария из истории забегов",
+        keys=_player_keyset(),
+        process=_monster_codex_process,
+        count=_player_count(),
+        chunk_size=500,
+    )
+)
+
+
+def _item_codex_filter() -> Any:
+    offered = select(m.ShopOffer.inventory_item_id).where(
+        m.ShopOffer.inventory_item_id == m.InventoryItem.id, m.ShopOffer.player_id.isnot(None)
+    )
+    return or_(m.InventoryItem.player_id.isnot(None), offered.exists())
+
+
+async def _item_codex_keys(
+    session: AsyncSession, after: int | None, limit: int, params: dict[str, Any]
+) -> list[int]:
+    q = select(m.InventoryItem.id).where(_item_codex_filter())
+    if after is not None:
+        q = q.where(m.InventoryItem.id > int(after))
+    return [int(x) for x in (await session.scalars(q.order_by(m.InventoryItem.id).limit(limit))).all()]
+
+
+async def _item_codex_count(session: AsyncSession, params: dict[str, Any]) -> int:
+    return int(await session.scalar(select(func.count(m.InventoryItem.id)).where(_item_codex_filter())) or 0)
+
+
+async def _item_codex_process(session: AsyncSession, keys: list[int], ctx: JobContext) -> ChunkResult:
+    from sqlalchemy.orm import selectinload
+
+    from waifu_bot.services.item_codex import register_inventory_codex
+
+    if ctx.dry_run:
+        # Discoveries go through the Redis codex buffer, which a rollback cannot undo.
+        return ChunkResult(processed=len(keys))
+    offer_owner = dict(
+        (
+            await session.execute(
+                select(m.ShopOffer.inventory_item_id, m.ShopOffer.player_id).where(
+                    m.ShopOffer.inventory_item_id.in_(keys), m.ShopOffer.player_id.isnot(None)
+                )
+            )
+        ).all()
+    )
+    items = (
+        await session.scalars(
+            select(m.InventoryItem)
+            .options(selectinload(m.InventoryItem.item), selectinload(m.InventoryItem.affixes))
+            .where(m.InventoryItem.id.in_(keys))
+            .order_by(m.InventoryItem.id)
+        )
+    ).all()
+    out = ChunkResult(processed=len(keys))
+    for inv in items:
+        pid = inv.player_id or offer_owner.get(inv.id)
+        if not pid:
+            continue
+        await register_inventory_codex(session, int(pid), inv)
+        out.changed += 1
+    return out
+
+
+register_job(
+    MaintenanceJob(
+        name="backfill_item_codex",
+        title="Бэкфилл кодекса предметов и аффиксов",
+        keys=_item_codex_keys,
+        process=_item_codex_process,
+        count=_item_codex_count,
+    )
+)
+
+
+async def _hidden_milestones_process(session: AsyncSession, keys: list[int], ctx: JobContext) -> ChunkResult:
+    from waifu_bot.services.hidden_milestones import sync_milestone_skills
+
+    async def one(pid: int) -> bool:
+        counters = await sync_milestone_skills(session, int(pid), silent=True)
+        return any(int(v or 0) > 0 for v in counters.values())
+
+    return await each_key(session, keys, one, label="backfill_hidden_milestones")
+
+
+register_job(
+    MaintenanceJob(
+        name="backfill_hidden_milestones",
+        title="Тихий бэкфилл скрытых навыков-вех",
+        keys=_player_keyset(),
+        process=_hidden_milestones_process,
+        count=_player_count(),
+        params_doc={"player_ids": "list[int], optional"},
+    )
+)
+
+
+async def _player_search_process(session: AsyncSession, keys: list[int], ctx: JobContext) -> ChunkResult:
+    from waifu_bot.services.player_search import rebuild_index
+
+    await rebuild_index(session, keys)
+    return ChunkResult(processed=len(keys), changed=len(keys))
+
+
+register_job(
+    MaintenanceJob(
+        name="player_search_reindex",
+        title="Перестроить индекс поиска игроков",
+        keys=_player_keyset(),
+        process=_player_search_process,
+        count=_player_count(),
+        chunk_size=1000,
+    )
+)
+
+
+async def _arena_rating_index_process(session: AsyncSession, keys: list[int], ctx: JobContext) -> ChunkResult:
+    from waifu_bot.core.redis import get_redis
+    from waifu_bot.services.arena_matchmaking import index_ratings
+
+    rows = (
+        await session.execute(
+            select(m.TavernState.player_id, m.TavernState.arena_rating).where(m.TavernState.player_id.in_(keys))
+        )
+    ).all()
+    if not ctx.dry_run:
+        # Redis writes cannot be rolled back with the chunk; dry-run only counts.
+        await index_ratings(get_redis(), {int(pid): int(r or 0) for pid, r in rows})
+    return ChunkResult(processed=len(keys), changed=len(rows))
+
+
+register_job(
+    MaintenanceJob(
+        name="arena_rating_index",
+        title="Заполнить индекс рейтинга арены (Redis)",
+        keys=_player_keyset(),
+        process=_arena_rating_index_process,
+        count=_player_count(),
+        chunk_size=1000,
+    )
+)
@@ -44,6 +44,14 @@ from waifu_bot.game.merc_config import (
     PITY_LEG_SOFT_START,
 )
 from waifu_bot.game.merc_threat_tags import THREAT_TAG_LABELS_RU, THREAT_TAGS
+from waifu_bot.services.arena_matchmaking import (
+    defense_revision,
+    load_defense_snapshot,
+    nearby_opponents,
+    record_opponent,
+    store_defense_snapshot,
+)
+from waifu_bot.services.player_search import find_player_ids
 
 try:
     from zoneinfo import ZoneInfo
@@ -678,6 +686,68 @@ def _arena_opponent_payload(
     }
 
 
+def _arena_redis() -> Any:
+    from waifu_bot.core.config import settings
+
+    if not getattr(settings, "arena_matchmaking_index_enabled", True):
+        return None
+    from waifu_bot.core.redis import get_redis
+
+    return get_redis()
+
+
+async def _nearby_from_db(
+    session: AsyncSession, player_id: int, rating: int, *, want: int = 3
+) -> list[tuple[int, int]]:
+    """Nearest ratings via two range scans on ``ix_tavern_states_arena_rating``."""
+    base = select(TavernState.player_id, TavernState.arena_rating).where(TavernState.player_id != player_id)
+    up = await session.execute(
+        base.where(TavernState.arena_rating >= rating).order_by(TavernState.arena_rating).limit(want)
+    )
+    down = await session.execute(
+        base.where(TavernState.arena_rating < rating).order_by(TavernState.arena_rating.desc()).limit(want)
+    )
+    rows = [(int(pid), int(r)) for pid, r in (*up.all(), *down.all())]
+    rows.sort(key=lambda x: (abs(x[1] - rating), x[0]))
+    return rows[:want]
+
+
+async def _lineup_units(session: AsyncSession, player_id: int) -> tuple[list[HiredWaifu], list[HiredWaifu]]:
+    """(ATK, DEF) lineup units in slot order, loaded with one query."""
+    rows = (
+        await session.execute(
+            select(HiredWaifu).where(
+                HiredWaifu.player_id == player_id,
+                or_(HiredWaifu.atk_slot.between(1, 3), HiredWaifu.def_slot.between(1, 3)),
+            )
+        )
+    ).scalars().all()
+    atk = sorted((w for w in rows if w.atk_slot and 1 <= int(w.atk_slot) <= 3), key=lambda w: int(w.atk_slot))
+    dfn = sorted((w for w in rows if w.def_slot and 1 <= int(w.def_slot) <= 3), key=lambda w: int(w.def_slot))
+    return atk, dfn
+
+
+async def _defender_fighters(session: AsyncSession, defender_id: int, redis: Any) -> list:
+    """DEF lineup (ATK when DEF is empty) as fighters; cached per roster revision."""
+    from waifu_bot.core.config import settings
+
+    revision = None
+    if redis is not None and getattr(settings, "player_revisions_enabled", True):
+        from waifu_bot.services.player_revisions import read_revisions
+
+        revision = defense_revision(await read_revisions(redis, defender_id))
+    cached = await load_defense_snapshot(redis, defender_id, revision)
+    if cached is not None:
+        return cached
+    atk, dfn = await _lineup_units(session, defender_id)
+    fighters = []
+    for w in dfn or atk:
+        refresh_unit_power(w)
+        fighters.append(fighter_from_unit(w, side="defender"))
+    await store_defense_snapshot(redis, defender_id, revision, fighters)
+    return fighters
+
+
 async def arena_opponents(
     session: AsyncSession,
     player_id: int,
@@ -688,38 +758,36 @@ async def arena_opponents(
     my_r = int(getattr(state, "arena_rating", 1000) or 1000)
     query = (q or "").strip().lstrip("@")
     if query:
-        pattern = f"%{query}%"
-        # Global player search (not guild / not tavern-only)
+        # Global player search (not guild / not tavern-only), best name matches first.
+        page = await find_player_ids(session, query, limit=10, exclude_player_id=player_id)
+        if not page.player_ids:
+            return []
         rows = (
             await session.execute(
                 select(Player, TavernState)
                 .outerjoin(TavernState, TavernState.player_id == Player.id)
-                .where(Player.id != player_id)
-                .where(
-                    or_(
-                        Player.username.ilike(pattern),
-                        Player.first_name.ilike(pattern),
-                    )
-                )
-                .order_by(func.abs(func.coalesce(TavernState.arena_rating, 1000) - my_r))
-                .limit(10)
+                .where(Player.id.in_(page.player_ids))
             )
         ).all()
-        return [_arena_opponent_payload(p, t) for p, t in rows]
+        by_id = {int(p.id): (p, t) for p, t in rows}
+        return [_arena_opponent_payload(*by_id[pid]) for pid in page.player_ids if pid in by_id]
 
-    # Nearby ratings (suggested 3) + bots to fill
-    others = (
-        await session.execute(
-            select(TavernState, Player)
-            .outerjoin(Player, Player.id == TavernState.player_id)
-            .where(TavernState.player_id != player_id)
-            .order_by(func.abs(TavernState.arena_rating - my_r))
-            .limit(5)
-        )
-    ).all()
+    # Nearby ratings (suggested 3) from the matchmaking index, SQL range scans as fallback; bots fill.
+    picked = await nearby_opponents(_arena_redis(), player_id, my_r)
+    if picked is None:
+        picked = await _nearby_from_db(session, player_id, my_r)
     out = []
-    for t, p in others[:3]:
-        out.append(_arena_opponent_payload(p, t))
+    if picked:
+        ids = [pid for pid, _ in picked]
+        rows = (
+            await session.execute(
+                select(TavernState, Player)
+                .outerjoin(Player, Player.id == TavernState.player_id)
+                .where(TavernState.player_id.in_(ids))
+            )
+        ).all()
+        by_id = {int(t.player_id): (p, t) for t, p in rows}
+        out = [_arena_opponent_payload(*by_id[pid]) for pid in ids if pid in by_id]
     while len(out) < 3:
         out.append(
             {
@@ -748,29 +816,20 @@ async def arena_attack(
     if int(state.arena_tickets or 0) < 1:
         return {"error": "no_tickets"}
 
-    lineup = await get_lineup(session, player_id)
-    atk_ids = [x for x in lineup["atk"] if x]
-    if len(atk_ids) < 1:
+    atk_units, _ = await _lineup_units(session, player_id)
+    if not atk_units:
         return {"error": "no_atk_lineup"}
-    atk_units = []
-    for wid in atk_ids:
-        w = await session.get(HiredWaifu, int(wid))
-        if w:
-            refresh_unit_power(w)
-            atk_units.append(w)
+    for w in atk_units:
+        refresh_unit_power(w)
     attackers = [fighter_from_unit(u, side="attacker") for u in atk_units]
 
+    redis = _arena_redis()
     defenders = []
     if bot or not defender_id:
         defenders = _bot_defense(int(state.arena_rating or 1000))
         defender_id = None
     else:
-        d_line = await get_lineup(session, int(defender_id))
-        for wid in [x for x in d_line["def"] if x] or [x for x in d_line["atk"] if x]:
-            w = await session.get(HiredWaifu, int(wid))
-            if w:
-                refresh_unit_power(w)
-                defenders.append(fighter_from_unit(w, side="defender"))
+        defenders = await _defender_fighters(session, int(defender_id), redis)
         if not defenders:
             defenders = _bot_defense(int(state.arena_rating or 1000))
 
@@ -805,6 +864,8 @@ async def arena_attack(
     )
     session.add(match)
     await session.flush()
+    if defender_id:
+        await record_opponent(redis, player_id, int(defender_id))
     try:
         from waifu_bot.services.hidden_milestones import hook_milestones
 
@@ -547,38 +547,16 @@ async def apply_passive_hire_cost(session: AsyncSession, player_id: int, base_co
     return await apply_passive_buy_price(session, player_id, base_cost)
 
 
-async def effective_main_waifu_charm(session: AsyncSession, player_id: int) -> int:
-    """ОБА основной вайфу + бонусы с экипировки (как в /shop/inventory)."""
-    waifu = await session.scalar(select(MainWaifu).where(MainWaifu.player_id == int(player_id)))
-    if not waifu:
-        return 0
-    rows = (
-        await session.execute(
-            select(m.InventoryItem)
-            .options(selectinload(m.InventoryItem.item), selectinload(m.InventoryItem.affixes))
-            .where(
-                m.InventoryItem.player_id == int(player_id),
-                m.InventoryItem.equipment_slot.isnot(None),
-            )
-        )
-    ).scalars().all()
-    # Ленивый импорт: routes тянет passive_skills на уровне модуля.
-    from waifu_bot.api.routes import calculate_item_bonuses
-
-    total = 0
-    for inv in rows or []:
-        b = calculate_item_bonuses(inv)
-        total += int(b.get("charm", 0) or 0)
-    return int(getattr(waifu, "charm", 0) or 0) + total
-
-
-async def merchant_discount_pct_for_player(session: AsyncSession, player_id: int) -> float:
-    """Скидка у торговца (%) — как в блоке профиля: эффективный ОБА × coeff + flat/percent с экипировки."""
-    from waifu_bot.game.constants import CHM_MERCHANT_DISCOUNT_COEFF
+async def equipped_charm_and_merchant_bonuses(
+    session: AsyncSession, player_id: int
+) -> tuple[int, float, float] | None:
+    """(эффективный ОБА, merchant_discount_flat, merchant_discount_percent) или None без ОВ.
 
+    Один запрос ОВ + один запрос надетых предметов.
+    """
     waifu = await session.scalar(select(MainWaifu).where(MainWaifu.player_id == int(player_id)))
     if not waifu:
-        return 0.0
+        return None
     rows = (
         await session.execute(
             select(m.InventoryItem)
@@ -589,6 +567,7 @@ async def merchant_discount_pct_for_player(session: AsyncSession, player_id: int
             )
         )
     ).scalars().all()
+    # Ленивый импорт: routes тянет passive_skills на уровне модуля.
     from waifu_bot.api.routes import calculate_item_bonuses
 
     charm = int(getattr(waifu, "charm", 0) or 0)
@@ -599,13 +578,34 @@ async def merchant_discount_pct_for_player(session: AsyncSession, player_id: int
         charm += int(b.get("charm", 0) or 0)
         md_flat += float(b.get("merchant_discount_flat", 0) or 0)
         md_pct += float(b.get("merchant_discount_percent", 0) or 0)
+    return charm, md_flat, md_pct
+
+
+def merchant_discount_pct_from_charm(charm: int, md_flat: float = 0.0, md_pct: float = 0.0) -> float:
+    """Скидка у торговца (%) по эффективному ОБА и бонусам экипировки, 0..50."""
+    from waifu_bot.game.constants import CHM_MERCHANT_DISCOUNT_COEFF
+
     base_disc = min(50.0, max(0.0, float(charm) * float(CHM_MERCHANT_DISCOUNT_COEFF) * 100.0))
-    merchant_disc = base_disc + md_flat
+    merchant_disc = base_disc + float(md_flat)
     if md_pct > 0:
-        merchant_disc = merchant_disc * (1.0 + md_pct / 100.0)
+        merchant_disc = merchant_disc * (1.0 + float(md_pct) / 100.0)
     return min(50.0, max(0.0, merchant_disc))
 
 
+async def effective_main_waifu_charm(session: AsyncSession, player_id: int) -> int:
+    """ОБА основной вайфу + бонусы с экипировки (как в /shop/inventory)."""
+    found = await equipped_charm_and_merchant_bonuses(session, player_id)
+    return found[0] if found else 0
+
+
+async def merchant_discount_pct_for_player(session: AsyncSession, player_id: int) -> float:
+    """Скидка у торговца (%) — как в блоке профиля: эффективный ОБА × coeff + flat/percent с экипировки."""
+    found = await equipped_charm_and_merchant_bonuses(session, player_id)
+    if found is None:
+        return 0.0
+    return merchant_discount_pct_from_charm(*found)
+
+
 def _charm_discount_fraction(charm: int, coeff: float) -> float:
     return min(0.5, max(0.0, float(charm) * float(coeff)))
 
@@ -1091,6 +1091,9 @@ async def reset_passive_branch(session: AsyncSession, player_id: int, branch: st
                 PlayerPassiveSkill.node_id.in_(nids),
             )
         )
+        from waifu_bot.services.player_pricing import invalidate_player_pricing_context
+
+        invalidate_player_pricing_context(session, int(player_id))
 
     player.skill_points = int(getattr(player, "skill_points", 0) or 0) + total_points
     from waifu_bot.services import wallet as wallet_svc
@@ -921,21 +921,19 @@ async def recompute_all_perfection_from_catalog(
     player_ids: list[int] | None = None,
     sync_hp: bool = True,
 ) -> list[dict[str, Any]]:
-    """Пересчитать совершенствование для всех (или выбранных) игроков с историей/totals."""
-    q = select(m.Player).where(
-        (m.Player.perfection_level > 0)
-        | (m.Player.perfection_bonus_totals.isnot(None))
-    )
-    if player_ids:
-        q = q.where(m.Player.id.in_([int(x) for x in player_ids]))
-    players = list((await session.execute(q)).scalars().all())
+    """Пересчитать совершенствование для всех (или выбранных) игроков с историей/totals.
+
+    Идёт чанками по ``players.id`` (job ``perfection_recompute``) в транзакции вызывающего.
+    """
+    from waifu_bot.services.maintenance_jobs import run_job_inline
+
     reports: list[dict[str, Any]] = []
-    for player in players:
-        reports.append(
-            await recompute_player_perfection_from_catalog(
-                session, player, sync_hp=sync_hp
-            )
-        )
+    await run_job_inline(
+        session,
+        "perfection_recompute",
+        params={"player_ids": player_ids, "sync_hp": sync_hp},
+        results=reports,
+    )
     return reports
 
 
@@ -13,7 +13,9 @@ from waifu_bot.db.models import BotGroupChat, GDCycle, GDRegistration, PlayerCha
 from waifu_bot.services.bot_group_chats import ACTIVE_STATUSES, build_telegram_group_url
 
 
-async def touch_player_chat_seen(session: AsyncSession, player_id: int, chat_id: int) -> None:
+async def touch_player_chat_seen(
+    session: AsyncSession, player_id: int, chat_id: int, *, at: datetime | None = None
+) -> None:
     """Record that the player sent a message in a group chat (chat_id < 0)."""
     if int(chat_id) >= 0:
         return
@@ -22,7 +24,7 @@ async def touch_player_chat_seen(session: AsyncSession, player_id: int, chat_id:
         .values(
             player_id=int(player_id),
             chat_id=int(chat_id),
-            first_seen_at=datetime.now(tz=timezone.utc),
+            first_seen_at=at or datetime.now(tz=timezone.utc),
         )
         .on_conflict_do_nothing(index_elements=["player_id", "chat_id"])
     )
@@ -10,6 +10,8 @@ from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from waifu_bot.db import models as m
+from waifu_bot.services import player_revisions
+from waifu_bot.services.player_search import note_player_search
 from waifu_bot.services.tutorial import TUTORIAL_VERSION
 
 logger = logging.getLogger(__name__)
@@ -77,6 +79,8 @@ async def reset_player_to_new_game(session: AsyncSession, player_id: int) -> Non
     for wid in mw_ids:
         await session.execute(delete(m.WaifuSkill).where(m.WaifuSkill.waifu_id == int(wid)))
     await session.execute(delete(m.MainWaifu).where(m.MainWaifu.player_id == pid))
+    player_revisions.note_revision(session, pid, *player_revisions.DOMAINS)
+    note_player_search(session, pid)
 
     await session.execute(delete(m.MainWaifuPortraitDraft).where(m.MainWaifuPortraitDraft.player_id == pid))
 
@@ -0,0 +1,146 @@
+"""Per-request shop pricing for one player.
+
+``PlayerPricingContext`` gathers everything price-related (effective charm, merchant
+discount, passive and hidden-skill price modifiers) with a fixed number of queries; the
+price methods are pure, so a whole inventory page is priced without touching the DB.
+The context is cached on ``session.info`` like the passive-skill equipment cache; a
+``before_flush`` hook drops a player's entry when their equipment, main waifu, passive or
+hidden-skill rows change in that session. Bulk ``update()``/``delete()`` statements bypass
+the unit of work — call ``invalidate_player_pricing_context`` next to them.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Mapping
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from waifu_bot.db import models as m
+
+from waifu_bot.game.formulas import SHOP_SELL_VS_BUY_RATIO, shop_buy_price_from_merchant_discount
+from waifu_bot.services.passive_skills import (
+    compute_passive_buy_price_from_bonuses,
+    equipped_charm_and_merchant_bonuses,
+    get_passive_skill_bonuses,
+    merchant_discount_pct_from_charm,
+)
+
+logger = logging.getLogger(__name__)
+
+_SESSION_PRICING_CACHE_KEY = "_cached_player_pricing_context"
+
+# Rows that feed the context; attributed to their ``player_id``.
+_PRICING_MODELS: tuple[type, ...] = (m.InventoryItem, m.MainWaifu, m.PlayerPassiveSkill, m.PlayerHiddenSkill)
+
+
+@dataclass(frozen=True)
+class PlayerPricingContext:
+    player_id: int
+    charm: int = 0
+    merchant_discount_pct: float = 0.0
+    passive_bonuses: Mapping[str, float] = field(default_factory=dict)
+    hidden_bonuses: Mapping[str, float] | None = None
+
+    def passive_price(self, price: int) -> int:
+        """Цена после скидки и торгового бонуса пассивок (как apply_passive_buy_price)."""
+        return compute_passive_buy_price_from_bonuses(
+            int(price), dict(self.passive_bonuses), dict(self.hidden_bonuses) if self.hidden_bonuses else None
+        )
+
+    def buy_price(self, base_value: int) -> int:
+        """Покупка у торговца: скидка ОБА, затем пассивки."""
+        return self.passive_price(shop_buy_price_from_merchant_discount(int(base_value), self.merchant_discount_pct))
+
+    def sell_price(self, base_value: int) -> int:
+        """Скупка: доля от цены покупки (та же формула, что compute_player_shop_sell_price)."""
+        return max(1, int(self.buy_price(base_value) * SHOP_SELL_VS_BUY_RATIO))
+
+    def sell_prices(self, base_values: Iterable[int]) -> list[int]:
+        return [self.sell_price(v) for v in base_values]
+
+    def inventory_sell_prices(self, items: Iterable[Any]) -> list[int]:
+        return self.sell_prices(inventory_item_base_value(inv) for inv in items)
+
+
+def inventory_item_base_value(inv: Any) -> int:
+    """Item.base_value шаблона, иначе оценка по tier × rarity."""
+    item = getattr(inv, "item", None)
+    if item is not None and getattr(item, "base_value", None) is not None:
+        return max(1, int(item.base_value))
+    return max(1, 100 * int(getattr(inv, "tier", None) or 1) * int(getattr(inv, "rarity", None) or 1))
+
+
+async def load_player_pricing_context(session: AsyncSession, player_id: int) -> PlayerPricingContext:
+    """Uncached build: main waifu + equipped items, passive tree, hidden skills."""
+    found = await equipped_charm_and_merchant_bonuses(session, player_id)
+    charm, disc = 0, 0.0
+    if found is not None:
+        charm = int(found[0])
+        disc = merchant_discount_pct_from_charm(*found)
+    ps: dict[str, float] = {}
+    hs: dict[str, float] | None = None
+    try:
+        ps = await get_passive_skill_bonuses(session, int(player_id))
+    except Exception:
+        # Как apply_passive_buy_price: без пассивок цена не меняется (и скрытые не читаются).
+        logger.debug("pricing: passive bonuses failed player_id=%s", player_id, exc_info=True)
+    else:
+        try:
+            from waifu_bot.services.hidden_skills import get_hidden_skill_bonuses
+
+            hs = await get_hidden_skill_bonuses(session, int(player_id))
+        except Exception:
+            hs = None
+    return PlayerPricingContext(
+        player_id=int(player_id),
+        charm=charm,
+        merchant_discount_pct=disc,
+        passive_bonuses=ps,
+        hidden_bonuses=hs,
+    )
+
+
+async def get_player_pricing_context(session: AsyncSession, player_id: int) -> PlayerPricingContext:
+    cache = session.info.setdefault(_SESSION_PRICING_CACHE_KEY, {})
+    ctx = cache.get(int(player_id))
+    if ctx is None:
+        ctx = await load_player_pricing_context(session, player_id)
+        cache[int(player_id)] = ctx
+    return ctx
+
+
+def invalidate_player_pricing_context(session: AsyncSession, player_id: int | None = None) -> None:
+    """Drop the cached context (after equip/charm changes within the same session)."""
+    cache = session.info.get(_SESSION_PRICING_CACHE_KEY)
+    if not cache:
+        return
+    if player_id is None:
+        cache.clear()
+    else:
+        cache.pop(int(player_id), None)
+
+
+def _drop_changed(session: Session, flush_context: Any, instances: Any) -> None:
+    cache = session.info.get(_SESSION_PRICING_CACHE_KEY)
+    if not cache:
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, _PRICING_MODELS):
+            pid = getattr(obj, "player_id", None)
+            if pid is not None:
+                cache.pop(int(pid), None)
+
+
+_installed = False
+
+
+def install_session_hooks() -> None:
+    """Register the flush listener that keeps cached contexts fresh (idempotent)."""
+    global _installed  # noqa: PLW0603
+    if _installed:
+        return
+    event.listen(Session, "before_flush", _drop_changed)
+    _installed = True
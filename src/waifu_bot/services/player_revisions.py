@@ -0,0 +1,167 @@
+"""Per-player revision counters by domain (inventory, roster, waifu, wallet).
+
+Counters live in one Redis hash per player (``player:rev:{player_id}``) and only ever go
+up. Mutations are picked up automatically: a ``before_flush`` hook records which players'
+tracked rows changed, and ``after_commit`` bumps their counters before ``commit()`` returns.
+Bulk ``update()``/``delete()`` statements bypass the unit of work — call ``note_revision``
+next to them.
+
+The hash carries a random ``epoch``; if Redis loses the hash, readers see a new epoch and
+rebuild everything instead of trusting counters that restarted from zero.
+"""
+from __future__ import annotations
+
+import logging
+import uuid
+from collections import defaultdict
+from typing import Any, Iterable
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from waifu_bot.db import models as m
+
+logger = logging.getLogger(__name__)
+
+DOMAINS = ("inventory", "roster", "waifu", "wallet")
+EPOCH_FIELD = "epoch"
+REVISION_TTL_SEC = 30 * 86400
+
+_PENDING_KEY = "player_revision_bumps"
+
+# Row type → domain; rows are attributed to their ``player_id``.
+_MODEL_DOMAINS: tuple[tuple[type, str], ...] = (
+    (m.InventoryItem, "inventory"),
+    (m.HiredWaifu, "roster"),
+    (m.DelveState, "roster"),
+    (m.DelveCompanion, "roster"),
+    (m.CompanionCard, "roster"),
+    (m.MainWaifu, "waifu"),
+    (m.PlayerWalletBalance, "wallet"),
+)
+# Player columns shown in client hubs; other columns (last_active, flags) do not bump.
+_PLAYER_ATTR_DOMAINS = {
+    "gold": "wallet",
+    "enchant_dust": "wallet",
+    "current_act": "waifu",
+    "max_act": "waifu",
+    "username": "waifu",
+}
+
+
+def revision_key(player_id: int) -> str:
+    return f"player:rev:{int(player_id)}"
+
+
+def _pending(session: Session) -> dict[int, set[str]]:
+    return session.info.setdefault(_PENDING_KEY, defaultdict(set))
+
+
+def note_revision(session: Any, player_id: int, *domains: str) -> None:
+    """Queue a bump for ``player_id`` on the next commit of ``session`` (sync or async)."""
+    sync = getattr(session, "sync_session", session)
+    bucket = _pending(sync)[int(player_id)]
+    for d in domains:
+        if d not in DOMAINS:
+            raise ValueError(f"unknown revision domain {d!r}")
+        bucket.add(d)
+
+
+def _player_changes(obj: Any) -> set[str]:
+    state = inspect(obj)
+    out: set[str] = set()
+    for attr, domain in _PLAYER_ATTR_DOMAINS.items():
+        if attr in state.attrs and state.attrs[attr].history.has_changes():
+            out.add(domain)
+    return out
+
+
+def _collect(session: Session, flush_context: Any, instances: Any) -> None:
+    pending = None
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, m.Player):
+            domains = _player_changes(obj) if obj not in session.new else set()
+            if domains and obj.id is not None:
+                pending = pending or _pending(session)
+                pending[int(obj.id)].update(domains)
+            continue
+        for cls, domain in _MODEL_DOMAINS:
+            if isinstance(obj, cls):
+                pid = getattr(obj, "player_id", None)
+                if pid is not None and (obj in session.new or obj in session.deleted or session.is_modified(obj)):
+                    pending = pending or _pending(session)
+                    pending[int(pid)].add(domain)
+                break
+
+
+def _after_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    from waifu_bot.core import redis as redis_core
+
+    coro = bump_many(redis_core.get_redis(), pending)
+    try:
+        # Runs inside AsyncSession's greenlet: the bump lands before commit() returns.
+        await_only(coro)
+    except Exception:
+        coro.close()
+        logger.debug("player revision bump skipped (no async context)", exc_info=True)
+
+
+_installed = False
+
+
+def install_session_hooks() -> None:
+    """Register flush/commit listeners on all ORM sessions (idempotent)."""
+    global _installed  # noqa: PLW0603
+    if _installed:
+        return
+    event.listen(Session, "before_flush", _collect)
+    event.listen(Session, "after_commit", _after_commit)
+    _installed = True
+
+
+async def bump(redis: Any, player_id: int, *domains: str) -> None:
+    await bump_many(redis, {int(player_id): set(domains)})
+
+
+async def bump_many(redis: Any, changes: dict[int, Iterable[str]]) -> None:
+    """HINCRBY each changed domain; failures are logged (snapshots may stay stale until TTL)."""
+    if redis is None or not changes:
+        return
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for pid, domains in changes.items():
+            key = revision_key(pid)
+            for d in sorted(set(domains)):
+                pipe.hincrby(key, d, 1)
+            pipe.expire(key, REVISION_TTL_SEC)
+        await pipe.execute()
+    except Exception:
+        logger.warning("player revision bump failed players=%s", list(changes)[:20], exc_info=True)
+
+
+async def read_revisions(redis: Any, player_id: int) -> dict[str, Any] | None:
+    """``{"epoch": str, <domain>: int, ...}`` in one round trip; None when Redis is unavailable."""
+    if redis is None:
+        return None
+    key = revision_key(player_id)
+    try:
+        raw = await redis.hgetall(key)
+        if not raw or EPOCH_FIELD not in raw:
+            # New or evicted hash: stamp a fresh epoch so stored snapshots are not trusted.
+            await redis.hsetnx(key, EPOCH_FIELD, uuid.uuid4().hex)
+            await redis.expire(key, REVISION_TTL_SEC)
+            raw = await redis.hgetall(key)
+    except Exception:
+        logger.warning("player revision read failed player_id=%s", player_id, exc_info=True)
+        return None
+    out: dict[str, Any] = {EPOCH_FIELD: str(raw.get(EPOCH_FIELD) or "")}
+    for d in DOMAINS:
+        try:
+            out[d] = int(raw.get(d) or 0)
+        except (TypeError, ValueError):
+            out[d] = 0
+    return out
@@ -0,0 +1,379 @@
+"""Ranked player search over ``player_search_index`` (Armory search, arena opponents).
+
+``Player.username ILIKE '%q%'`` cannot use a B-tree and degrades linearly with the player
+table. Names are normalized once into ``player_search_index`` (lower case, no ``@``, ё→е,
+single spaces): username, first name and main waifu name, plus ``search_text`` — the three
+joined. Queries then hit either the per-name ``text_pattern_ops`` B-trees (prefix) or the
+pg_trgm GIN index on ``search_text`` (substring, 3+ chars), so latency stays flat as the
+player base grows.
+
+Ranking (same in SQL and in the in-process index): exact Telegram id, exact username or
+character name, name prefix, substring — then trigram similarity, then player id (stable
+pages for autocomplete).
+
+The index is kept current by a flush hook: rows are refreshed in the same transaction when
+``Player.username`` / ``first_name`` or a ``MainWaifu`` name changes (identity sync, new
+character, deletion). Bulk ``update()``/``delete()`` bypass the hook — call
+``note_player_search`` next to them. ``MemoryPlayerSearchIndex`` is a drop-in backend for
+tests and tooling without Postgres.
+"""
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from sqlalchemy import case, event, func, inspect, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from waifu_bot.db import models as m
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERY_LEN = 64
+MAX_PAGE_SIZE = 50
+# pg_trgm cannot serve '%ab%' from the GIN index; shorter queries are prefix-only.
+TRIGRAM_MIN_LEN = 3
+
+RANK_ID = 0
+RANK_EXACT = 1
+RANK_PREFIX = 2
+RANK_SUBSTRING = 3
+
+_PENDING_KEY = "player_search_refresh"
+_WS = re.compile(r"\s+")
+
+
+def normalize_name(value: str | None) -> str:
+    return _WS.sub(" ", (value or "").strip().lstrip("@").strip().lower().replace("ё", "е"))
+
+
+def _sql_norm(col: Any) -> Any:
+    """SQL twin of ``normalize_name`` (also inlined in migration 0154)."""
+    trimmed = func.btrim(func.ltrim(func.btrim(func.coalesce(col, "")), "@"))
+    return func.regexp_replace(func.replace(func.lower(trimmed), "ё", "е"), r"\s+", " ", "g")
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@dataclass(frozen=True)
+class SearchDoc:
+    player_id: int
+    username: str = ""
+    first_name: str = ""
+    character: str = ""
+
+    @classmethod
+    def build(
+        cls, player_id: int, username: str | None, first_name: str | None, character: str | None
+    ) -> "SearchDoc":
+        return cls(int(player_id), normalize_name(username), normalize_name(first_name), normalize_name(character))
+
+    @property
+    def search_text(self) -> str:
+        return " ".join(x for x in (self.username, self.first_name, self.character) if x)
+
+
+@dataclass(frozen=True)
+class SearchQuery:
+    text: str
+    player_id: int | None
+
+    @classmethod
+    def parse(cls, raw: str | None) -> "SearchQuery | None":
+        q = normalize_name((raw or "")[:MAX_QUERY_LEN])
+        if not q:
+            return None
+        return cls(q, int(q) if q.isdigit() else None)
+
+    @property
+    def substring(self) -> bool:
+        return len(self.text) >= TRIGRAM_MIN_LEN
+
+
+@dataclass(frozen=True)
+class SearchPage:
+    player_ids: list[int]
+    has_more: bool
+
+
+def _trigrams(value: str) -> set[str]:
+    out: set[str] = set()
+    for word in re.findall(r"\w+", value):
+        padded = f"  {word} "
+        out.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return out
+
+
+def trigram_similarity(a: str, b: str) -> float:
+    """pg_trgm ``similarity()`` for the in-process index."""
+    ta, tb = _trigrams(a), _trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def rank_doc(doc: SearchDoc, query: SearchQuery) -> int | None:
+    q = query.text
+    if query.player_id is not None and doc.player_id == query.player_id:
+        return RANK_ID
+    if q in (doc.username, doc.character):
+        return RANK_EXACT
+    if any(name.startswith(q) for name in (doc.username, doc.first_name, doc.character) if name):
+        return RANK_PREFIX
+    if query.substring and q in doc.search_text:
+        return RANK_SUBSTRING
+    return None
+
+
+class MemoryPlayerSearchIndex:
+    """In-process backend with the SQL ranking (tests, scripts without Postgres)."""
+
+    def __init__(self, docs: Iterable[SearchDoc] = ()) -> None:
+        self.docs: dict[int, SearchDoc] = {d.player_id: d for d in docs}
+
+    def upsert(self, doc: SearchDoc) -> None:
+        self.docs[doc.player_id] = doc
+
+    def remove(self, player_id: int) -> None:
+        self.docs.pop(int(player_id), None)
+
+    async def search(
+        self,
+        session: Any,
+        query: SearchQuery,
+        *,
+        limit: int,
+        offset: int = 0,
+        exclude_player_id: int | None = None,
+    ) -> SearchPage:
+        hits = []
+        for doc in self.docs.values():
+            if doc.player_id == exclude_player_id:
+                continue
+            rank = rank_doc(doc, query)
+            if rank is not None:
+                sim = trigram_similarity(doc.search_text, query.text) if query.substring else 0.0
+                hits.append((rank, -sim, doc.player_id))
+        hits.sort()
+        page = hits[offset : offset + limit + 1]
+        return SearchPage([h[2] for h in page[:limit]], len(page) > limit)
+
+    async def refresh(self, session: Any, player_ids: Iterable[int]) -> None:
+        return None
+
+
+class PgPlayerSearchIndex:
+    """``player_search_index`` in Postgres (pg_trgm + ``text_pattern_ops`` indexes)."""
+
+    def search_stmt(
+        self,
+        query: SearchQuery,
+        *,
+        limit: int,
+        offset: int = 0,
+        exclude_player_id: int | None = None,
+    ):
+        t = m.PlayerSearchIndex
+        esc = _like_escape(query.text)
+        exact = or_(t.username_norm == query.text, t.character_norm == query.text)
+        prefix = or_(
+            t.username_norm.like(f"{esc}%", escape="\\"),
+            t.first_name_norm.like(f"{esc}%", escape="\\"),
+            t.character_norm.like(f"{esc}%", escape="\\"),
+        )
+        match = [prefix]
+        whens = []
+        if query.player_id is not None:
+            match.append(t.player_id == query.player_id)
+            whens.append((t.player_id == query.player_id, RANK_ID))
+        whens += [(exact, RANK_EXACT), (prefix, RANK_PREFIX)]
+        order: list[Any] = [case(*whens, else_=RANK_SUBSTRING)]
+        if query.substring:
+            match.append(t.search_text.like(f"%{esc}%", escape="\\"))
+            order.append(func.similarity(t.search_text, query.text).desc())
+        stmt = select(t.player_id).where(or_(*match))
+        if exclude_player_id is not None:
+            stmt = stmt.where(t.player_id != int(exclude_player_id))
+        return stmt.order_by(*order, t.player_id).offset(int(offset)).limit(int(limit) + 1)
+
+    async def search(
+        self,
+        session: AsyncSession,
+        query: SearchQuery,
+        *,
+        limit: int,
+        offset: int = 0,
+        exclude_player_id: int | None = None,
+    ) -> SearchPage:
+        stmt = self.search_stmt(query, limit=limit, offset=offset, exclude_player_id=exclude_player_id)
+        ids = [int(x) for x in (await session.scalars(stmt)).all()]
+        return SearchPage(ids[:limit], len(ids) > limit)
+
+    async def refresh(self, session: AsyncSession, player_ids: Iterable[int]) -> None:
+        ids = sorted({int(x) for x in player_ids})
+        if ids:
+            await session.execute(refresh_stmt(ids))
+
+
+class LegacyIlikeSearch:
+    """``PLAYER_SEARCH_INDEX_ENABLED=0`` rollback path: the old ILIKE scan over ``players``."""
+
+    async def search(
+        self,
+        session: AsyncSession,
+        query: SearchQuery,
+        *,
+        limit: int,
+        offset: int = 0,
+        exclude_player_id: int | None = None,
+    ) -> SearchPage:
+        pattern = f"%{_like_escape(query.text)}%"
+        conds = [m.Player.username.ilike(pattern, escape="\\"), m.Player.first_name.ilike(pattern, escape="\\")]
+        if query.player_id is not None:
+            conds.append(m.Player.id == query.player_id)
+        stmt = select(m.Player.id).where(or_(*conds))
+        if exclude_player_id is not None:
+            stmt = stmt.where(m.Player.id != int(exclude_player_id))
+        stmt = stmt.order_by(m.Player.id).offset(int(offset)).limit(int(limit) + 1)
+        ids = [int(x) for x in (await session.scalars(stmt)).all()]
+        return SearchPage(ids[:limit], len(ids) > limit)
+
+    async def refresh(self, session: Any, player_ids: Iterable[int]) -> None:
+        return None
+
+
+_backend: Any = None
+
+
+def set_backend(backend: Any) -> None:
+    """Override the search backend (tests); None restores the configured one."""
+    global _backend  # noqa: PLW0603
+    _backend = backend
+
+
+def get_backend() -> Any:
+    if _backend is not None:
+        return _backend
+    from waifu_bot.core.config import settings
+
+    if getattr(settings, "player_search_index_enabled", True):
+        return PgPlayerSearchIndex()
+    return LegacyIlikeSearch()
+
+
+async def find_player_ids(
+    session: AsyncSession,
+    raw_query: str | None,
+    *,
+    limit: int = 20,
+    offset: int = 0,
+    exclude_player_id: int | None = None,
+) -> SearchPage:
+    """Ranked page of matching player ids (``has_more`` drives autocomplete paging)."""
+    query = SearchQuery.parse(raw_query)
+    if query is None:
+        return SearchPage([], False)
+    limit = max(1, min(MAX_PAGE_SIZE, int(limit)))
+    return await get_backend().search(
+        session, query, limit=limit, offset=max(0, int(offset)), exclude_player_id=exclude_player_id
+    )
+
+
+# ---------------------------------------------------------------------------
+# Index maintenance
+# ---------------------------------------------------------------------------
+
+
+def refresh_stmt(player_ids: list[int] | None = None):
+    """Upsert index rows from ``players`` + ``main_waifus`` (all players when ids is None)."""
+    p, w = m.Player, m.MainWaifu
+    username, first_name, character = _sql_norm(p.username), _sql_norm(p.first_name), _sql_norm(w.name)
+    joined = func.btrim(
+        func.regexp_replace(func.concat_ws(" ", username, first_name, character), r"\s+", " ", "g")
+    )
+    src = (
+        select(p.id, username, first_name, character, joined, func.now())
+        .select_from(p)
+        .outerjoin(w, w.player_id == p.id)
+    )
+    if player_ids is not None:
+        src = src.where(p.id.in_(player_ids))
+    t = m.PlayerSearchIndex
+    ins = pg_insert(t).from_select(
+        ["player_id", "username_norm", "first_name_norm", "character_norm", "search_text", "updated_at"], src
+    )
+    return ins.on_conflict_do_update(
+        index_elements=[t.player_id],
+        set_={
+            "username_norm": ins.excluded.username_norm,
+            "first_name_norm": ins.excluded.first_name_norm,
+            "character_norm": ins.excluded.character_norm,
+            "search_text": ins.excluded.search_text,
+            "updated_at": ins.excluded.updated_at,
+        },
+    )
+
+
+def note_player_search(session: Any, player_id: int) -> None:
+    """Refresh ``player_id``'s index row on the next flush of ``session`` (sync or async)."""
+    sync = getattr(session, "sync_session", session)
+    sync.info.setdefault(_PENDING_KEY, set()).add(int(player_id))
+
+
+def _changed(obj: Any, attrs: tuple[str, ...]) -> bool:
+    state = inspect(obj)
+    return any(a in state.attrs and state.attrs[a].history.has_changes() for a in attrs)
+
+
+def _collect(session: Session, flush_context: Any, instances: Any) -> None:
+    pending = None
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        pid = None
+        if isinstance(obj, m.Player):
+            if obj in session.new or _changed(obj, ("username", "first_name")):
+                pid = obj.id
+        elif isinstance(obj, m.MainWaifu):
+            if obj in session.new or obj in session.deleted or _changed(obj, ("name", "player_id")):
+                pid = obj.player_id
+        if pid is not None:
+            pending = pending if pending is not None else session.info.setdefault(_PENDING_KEY, set())
+            pending.add(int(pid))
+
+
+def _refresh_after_flush(session: Session, flush_context: Any) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    try:
+        # Core statement on the flush connection: same transaction, no autoflush recursion;
+        # the savepoint keeps a failed refresh from aborting the caller's transaction.
+        conn = session.connection()
+        with conn.begin_nested():
+            conn.execute(refresh_stmt(sorted(pending)))
+    except Exception:
+        logger.warning("player search refresh failed players=%s", sorted(pending)[:20], exc_info=True)
+
+
+_installed = False
+
+
+def install_session_hooks() -> None:
+    """Register flush listeners on all ORM sessions (idempotent)."""
+    global _installed  # noqa: PLW0603
+    if _installed:
+        return
+    event.listen(Session, "before_flush", _collect)
+    event.listen(Session, "after_flush_postexec", _refresh_after_flush)
+    _installed = True
+
+
+async def rebuild_index(session: AsyncSession, player_ids: list[int] | None = None) -> None:
+    """Recompute index rows (all players when ``player_ids`` is None). Does not commit."""
+    await session.execute(refresh_stmt(player_ids))
+
@@ -0,0 +1,246 @@
+"""SQL accounting per unit of work (HTTP route, Telegram handler, background tick).
+
+Engine events (``install_engine_hooks``) count statements, rows and time into the
+:class:`QueryScope` bound to the current task. Scopes come from ``query_budget_http`` (routes),
+``query_budget_telegram`` (handlers) and :func:`run_in_scope` (ticks).
+
+When a scope ends:
+
+- its totals go into per-name live counters (:func:`snapshot`, admin stats);
+- SELECT shapes repeated ``QUERY_NPLUS1_THRESHOLD`` times are flagged as N+1 (logged once per
+  scope name + shape);
+- a budget declared with :func:`query_budget` is checked. An overrun is logged and counted;
+  with ``QUERY_BUDGET_STRICT`` it raises :class:`QueryBudgetExceeded`.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+from sqlalchemy import event
+
+from waifu_bot.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_MAX_SCOPES = 500
+_MAX_SHAPES_PER_SCOPE = 20
+# Distinct statement strings kept normalized; the compiled cache repeats the same texts.
+_SHAPE_CACHE_SIZE = 4096
+_T0_KEY = "query_budget_t0"
+
+_current: ContextVar["QueryScope | None"] = ContextVar("query_scope", default=None)
+_stats: dict[str, dict[str, Any]] = {}
+_warned: set[tuple[str, str]] = set()
+
+_WS = re.compile(r"\s+")
+_PARAM = re.compile(r"\$\d+(?:::[A-Z_ ]+(?:\[\])?)?|%\(\w+\)s|\?|\b\d+(?:\.\d+)?\b|'(?:[^']|'')*'")
+_PARAM_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_ROW_LIST = re.compile(r"\(\?(?:…)?\)(?:\s*,\s*\(\?(?:…)?\))+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A scope ran more statements than its declared budget (strict mode)."""
+
+
+def query_budget(limit: int) -> Callable[[F], F]:
+    """Declare the statement budget of a route endpoint, Telegram handler or tick function."""
+
+    def wrap(fn: F) -> F:
+        fn.__query_budget__ = int(limit)  # type: ignore[attr-defined]
+        return fn
+
+    return wrap
+
+
+def budget_of(fn: Any) -> int | None:
+    return getattr(fn, "__query_budget__", None)
+
+
+def normalize_sql(sql: str) -> str:
+    """Statement shape: literals and bind params become ``?``, IN / VALUES lists collapse."""
+    out = _PARAM.sub("?", _WS.sub(" ", sql.strip()))
+    out = _PARAM_LIST.sub("?…", out)
+    return _ROW_LIST.sub("(?…)…", out)
+
+
+def fingerprint(shape: str) -> str:
+    return hashlib.blake2s(shape.encode("utf-8"), digest_size=6).hexdigest()
+
+
+@lru_cache(maxsize=_SHAPE_CACHE_SIZE)
+def _shape_of(sql: str) -> tuple[str, str]:
+    """``(shape, fingerprint)`` of a statement text, memoized: ``record`` runs per statement."""
+    shape = normalize_sql(sql)
+    return shape, fingerprint(shape)
+
+
+@dataclass
+class QueryScope:
+    name: str
+    budget: int | None = None
+    statements: int = 0
+    rows: int = 0
+    ms: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+    samples: dict[str, str] = field(default_factory=dict)
+
+    def record(self, sql: str, rows: int, ms: float) -> None:
+        self.statements += 1
+        self.rows += max(int(rows), 0)
+        self.ms += ms
+        shape, fp = _shape_of(sql)
+        self.shapes[fp] += 1
+        if fp not in self.samples:
+            self.samples[fp] = shape[:300]
+
+    def repeated(self, threshold: int) -> list[tuple[str, int, str]]:
+        """SELECT shapes run at least ``threshold`` times: (fingerprint, count, shape)."""
+        if threshold <= 0:
+            return []
+        return [
+            (fp, n, self.samples[fp])
+            for fp, n in self.shapes.most_common()
+            if n >= threshold and self.samples[fp].upper().startswith(("SELECT", "WITH"))
+        ]
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.statements > self.budget
+
+
+def current_scope() -> QueryScope | None:
+    return _current.get()
+
+
+def rename_scope(name: str, *, budget: int | None = None) -> None:
+    """Re-label the current scope once the route / handler is known."""
+    scope = _current.get()
+    if scope is not None:
+        scope.name = name
+        if budget is not None:
+            scope.budget = budget
+
+
+@contextmanager
+def query_scope(name: str, *, budget: int | None = None) -> Iterator[QueryScope]:
+    scope = QueryScope(name, budget)
+    token = _current.set(scope)
+    failed = False
+    try:
+        yield scope
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _current.reset(token)
+        _finish(scope, raise_on_budget=not failed)
+
+
+async def run_in_scope(name: str, fn: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+    """Await ``fn(*args)`` inside a scope (background ticks)."""
+    with query_scope(name, budget=budget_of(fn)):
+        return await fn(*args)
+
+
+def _finish(scope: QueryScope, *, raise_on_budget: bool) -> None:
+    if not scope.statements:
+        return
+    threshold = int(getattr(settings, "query_nplus1_threshold", 10) or 0)
+    repeated = scope.repeated(threshold)
+    row = _stats.get(scope.name)
+    if row is None:
+        if len(_stats) >= _MAX_SCOPES:
+            return
+        row = _stats[scope.name] = {
+            "runs": 0, "statements": 0, "rows": 0, "ms": 0.0, "max_statements": 0,
+            "budget": None, "over_budget": 0, "n_plus_one": {},
+        }
+    row["runs"] += 1
+    row["statements"] += scope.statements
+    row["rows"] += scope.rows
+    row["ms"] += scope.ms
+    row["max_statements"] = max(row["max_statements"], scope.statements)
+    row["budget"] = scope.budget
+    for fp, n, shape in repeated:
+        hit = row["n_plus_one"].get(fp)
+        if hit is None:
+            if len(row["n_plus_one"]) >= _MAX_SHAPES_PER_SCOPE:
+                continue
+            hit = row["n_plus_one"][fp] = {"sql": shape, "runs": 0, "max_repeats": 0}
+        hit["runs"] += 1
+        hit["max_repeats"] = max(hit["max_repeats"], n)
+        if (scope.name, fp) not in _warned:
+            _warned.add((scope.name, fp))
+            logger.warning("query_budget n+1 scope=%s repeats=%d sql=%s", scope.name, n, shape[:200])
+    if scope.over_budget:
+        row["over_budget"] += 1
+        logger.warning(
+            "query_budget over scope=%s statements=%d budget=%d", scope.name, scope.statements, scope.budget
+        )
+        if raise_on_budget and getattr(settings, "query_budget_strict", False):
+            raise QueryBudgetExceeded(
+                f"{scope.name}: {scope.statements} statements > budget {scope.budget}; top shapes: "
+                + "; ".join(f"{n}x {scope.samples[fp][:120]}" for fp, n in scope.shapes.most_common(3))
+            )
+
+
+def snapshot() -> list[dict[str, Any]]:
+    """Live counters per scope name, busiest first."""
+    out = []
+    for name, row in _stats.items():
+        runs = row["runs"] or 1
+        out.append({
+            "scope": name,
+            "runs": row["runs"],
+            "statements": row["statements"],
+            "avg_statements": round(row["statements"] / runs, 2),
+            "max_statements": row["max_statements"],
+            "avg_rows": round(row["rows"] / runs, 1),
+            "avg_ms": round(row["ms"] / runs, 2),
+            "budget": row["budget"],
+            "over_budget": row["over_budget"],
+            "n_plus_one": sorted(row["n_plus_one"].values(), key=lambda h: -h["max_repeats"]),
+        })
+    return sorted(out, key=lambda r: -r["statements"])
+
+
+def reset() -> None:
+    _stats.clear()
+    _warned.clear()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if _current.get() is not None:
+        conn.info[_T0_KEY] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    scope = _current.get()
+    t0 = conn.info.pop(_T0_KEY, None)
+    if scope is None or t0 is None:
+        return
+    rows = getattr(cursor, "rowcount", -1)
+    if rows is None or rows < 0:
+        # asyncpg adapter: SELECT rowcount is -1, rows are prefetched into the cursor.
+        rows = len(getattr(cursor, "_rows", None) or ())
+    scope.record(statement, rows, (time.perf_counter() - t0) * 1000.0)
+
+
+def install_engine_hooks(engine: Any) -> None:
+    """Attach the statement counters to an ``AsyncEngine`` / ``Engine`` (idempotent)."""
+    target = getattr(engine, "sync_engine", engine)
+    if event.contains(target, "after_cursor_execute", _after_cursor_execute):
+        return
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,19 @@
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+from waifu_bot.services.llm_usage import http_trigger
+from waifu_bot.services.query_budget import budget_of, query_scope
+
+
+class QueryBudgetHttpMiddleware(BaseHTTPMiddleware):
+    """One query scope per request, named after the matched route template."""
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        with query_scope(http_trigger(request.method, request.url.path)) as scope:
+            response = await call_next(request)
+            route_path = getattr(request.scope.get("route"), "path", None)
+            if route_path:
+                scope.name = http_trigger(request.method, route_path)
+            scope.budget = budget_of(request.scope.get("endpoint"))
+            return response
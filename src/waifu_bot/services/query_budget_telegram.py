@@ -0,0 +1,34 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from waifu_bot.services.query_budget import budget_of, query_scope, rename_scope
+
+
+class QueryBudgetUpdateMiddleware(BaseMiddleware):
+    """Outer: one query scope per update (middlewares + handler)."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        with query_scope("tg:update"):
+            return await handler(event, data)
+
+
+class QueryBudgetHandlerMiddleware(BaseMiddleware):
+    """Inner (message / callback_query): name the scope after the matched handler."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        callback = getattr(data.get("handler"), "callback", None)
+        if callback is not None:
+            rename_scope(f"tg:{getattr(callback, '__name__', 'handler')}", budget=budget_of(callback))
+        return await handler(event, data)
@@ -0,0 +1,291 @@
+"""Redis cache: group chat → (guild, active raid, participant ids) for raid chat logging.
+
+Most group chats are not guild chats and most guild chats have no active raid, so the cache
+answers "nothing to log" without touching Postgres. Entries hold the guild id, the active raid id,
+its version and status, and the participant ids; non-guild chats get a negative entry.
+
+A ``before_flush`` hook collects the chats whose entry a flush changes: ``Guild`` rows with a
+new ``raid_active_id`` / ``telegram_chat_id`` (old and new chat), ``GuildRaid`` rows with a new
+status or chat, and added / removed ``GuildRaidParticipant`` rows. On commit the chat's
+generation counter ``raid_chat:gen:{chat_id}`` is bumped and the entry dropped. A reader that missed the
+cache reads the generation before its DB load and refills only if it is unchanged
+(``RAID_CHAT_FILL``), so a load that raced the commit cannot put the pre-commit state back.
+``CACHE_TTL_SECONDS`` bounds anything missed (e.g. Redis down during the commit hook).
+"""
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.util import await_only
+
+from waifu_bot.core.config import settings
+from waifu_bot.db.models import Guild, GuildRaid, GuildRaidParticipant
+from waifu_bot.services.redis_scripts import RAID_CHAT_FILL, run_script
+
+logger = logging.getLogger(__name__)
+
+REDIS_RAID_CHAT_PREFIX = "raid_chat:"
+REDIS_RAID_CHAT_GEN_PREFIX = "raid_chat:gen:"
+CACHE_TTL_SECONDS = 600
+# Outlives any in-flight refill; an expired counter reads as "" like a never-bumped one.
+GEN_TTL_SECONDS = 86400
+SENTINEL_NONE = "none"
+_PENDING_KEY = "raid_chat_invalidate"
+
+
+@dataclass(frozen=True)
+class RaidChatTarget:
+    guild_id: int
+    raid_id: int | None = None
+    raid_version: int = 1
+    raid_status: str | None = None
+    participants: frozenset[int] = frozenset()
+
+    @property
+    def logs_chat(self) -> bool:
+        """v2 raid in progress: participant messages are logged for the narrative."""
+        return self.raid_id is not None and self.raid_status == "active" and self.raid_version >= 2
+
+
+def _key(chat_id: int) -> str:
+    return f"{REDIS_RAID_CHAT_PREFIX}{int(chat_id)}"
+
+
+def _gen_key(chat_id: int) -> str:
+    return f"{REDIS_RAID_CHAT_GEN_PREFIX}{int(chat_id)}"
+
+
+def _text(raw: Any) -> str | None:
+    if raw is None:
+        return None
+    return raw.decode() if isinstance(raw, bytes) else str(raw)
+
+
+def _dump(target: RaidChatTarget | None) -> str:
+    if target is None:
+        return SENTINEL_NONE
+    return json.dumps(
+        {
+            "g": target.guild_id,
+            "r": target.raid_id,
+            "v": target.raid_version,
+            "s": target.raid_status,
+            "p": sorted(target.participants),
+        },
+        separators=(",", ":"),
+    )
+
+
+def _load(text: str) -> RaidChatTarget | None | bool:
+    if text == SENTINEL_NONE:
+        return None
+    try:
+        data = json.loads(text)
+        return RaidChatTarget(
+            guild_id=int(data["g"]),
+            raid_id=int(data["r"]) if data.get("r") is not None else None,
+            raid_version=int(data.get("v") or 1),
+            raid_status=data.get("s"),
+            participants=frozenset(int(p) for p in data.get("p") or ()),
+        )
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return False
+
+
+async def get_cached_raid_chat(redis: Any, chat_id: int) -> tuple[RaidChatTarget | None | bool, str | None]:
+    """(cached target, generation) in one round trip.
+
+    The target is None for a cached "not a guild chat" and False on miss. The generation
+    ("" when never bumped) is what a refill must match; None on Redis error (no refill).
+    """
+    if redis is None:
+        return False, None
+    try:
+        raw, gen = await redis.mget(_key(chat_id), _gen_key(chat_id))
+    except RedisError:
+        logger.debug("raid_chat_cache get failed chat_id=%s", chat_id, exc_info=True)
+        return False, None
+    gen = _text(gen) or ""
+    if raw is None:
+        return False, gen
+    return _load(_text(raw)), gen
+
+
+async def set_raid_chat_cache(
+    redis: Any, chat_id: int, target: RaidChatTarget | None, *, gen: str, ttl: int = CACHE_TTL_SECONDS
+) -> bool:
+    """Refill unless the chat was invalidated since ``gen`` was read. True = stored."""
+    if redis is None:
+        return False
+    try:
+        keys = [_key(chat_id), _gen_key(chat_id)]
+        return bool(await run_script(redis, RAID_CHAT_FILL, keys, [gen, _dump(target), max(1, int(ttl))]))
+    except RedisError:
+        logger.debug("raid_chat_cache set failed chat_id=%s", chat_id, exc_info=True)
+        return False
+
+
+async def invalidate_raid_chats(redis: Any, chat_ids: Iterable[int]) -> None:
+    chats = sorted({int(c) for c in chat_ids if c})
+    if redis is None or not chats:
+        return
+    try:
+        pipe = redis.pipeline(transaction=True)
+        for chat_id in chats:
+            pipe.incr(_gen_key(chat_id))
+            pipe.expire(_gen_key(chat_id), GEN_TTL_SECONDS)
+        pipe.delete(*(_key(c) for c in chats))
+        await pipe.execute()
+    except RedisError:
+        logger.warning("raid_chat_cache invalidate failed chats=%s", chats[:20], exc_info=True)
+
+
+async def load_raid_chat(session: AsyncSession, chat_id: int) -> RaidChatTarget | None:
+    """DB resolution: at most guild + raid + participant ids (3 queries, 1 for non-guild chats)."""
+    guild_id, raid_id = (
+        await session.execute(
+            select(Guild.id, Guild.raid_active_id).where(Guild.telegram_chat_id == int(chat_id)).limit(1)
+        )
+    ).first() or (None, None)
+    if guild_id is None:
+        return None
+    if not raid_id:
+        return RaidChatTarget(guild_id=int(guild_id))
+    raid = await session.get(GuildRaid, int(raid_id))
+    if raid is None:
+        return RaidChatTarget(guild_id=int(guild_id))
+    pids = (
+        await session.execute(
+            select(GuildRaidParticipant.player_id).where(GuildRaidParticipant.raid_id == raid.id)
+        )
+    ).scalars().all()
+    return RaidChatTarget(
+        guild_id=int(guild_id),
+        raid_id=int(raid.id),
+        raid_version=int(getattr(raid, "raid_version", 1) or 1),
+        raid_status=raid.status,
+        participants=frozenset(int(p) for p in pids),
+    )
+
+
+async def resolve_raid_chat(session: AsyncSession, chat_id: int, *, redis: Any = None) -> RaidChatTarget | None:
+    """Cache first, DB on miss (and refill). None = the chat is not bound to a guild."""
+    if redis is None and settings.raid_chat_cache_enabled:
+        from waifu_bot.core import redis as redis_core
+
+        redis = redis_core.get_redis()
+    cached, gen = await get_cached_raid_chat(redis, chat_id) if settings.raid_chat_cache_enabled else (False, None)
+    if cached is not False:
+        return cached
+    target = await load_raid_chat(session, chat_id)
+    if gen is not None:
+        await set_raid_chat_cache(redis, chat_id, target, gen=gen)
+    return target
+
+
+def _changed(obj: Any, *attrs: str) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[a].history.has_changes() for a in attrs)
+
+
+def _previous(obj: Any, attr: str) -> list[Any]:
+    return list(inspect(obj).attrs[attr].history.deleted or ())
+
+
+def _loaded(session: Session, cls: type, pk: Any) -> Any:
+    if pk is None:
+        return None
+    return session.identity_map.get(identity_key(cls, int(pk)))
+
+
+def _guild_chat(session: Session, guild_id: Any) -> int | None:
+    """The guild's bound chat: from the identity map, one query when the guild is not loaded."""
+    if guild_id is None:
+        return None
+    guild = _loaded(session, Guild, guild_id)
+    if guild is not None:
+        return guild.telegram_chat_id
+    return session.execute(select(Guild.telegram_chat_id).where(Guild.id == int(guild_id))).scalar()
+
+
+def _raid_chats(session: Session, raid: Any) -> list[int | None]:
+    return [raid.chat_id, *_previous(raid, "chat_id"), _guild_chat(session, raid.guild_id)]
+
+
+def _changes(session: Session, obj: Any, is_new: bool, is_deleted: bool) -> list[int | None]:
+    """Chats whose cached entry one flushed row makes stale."""
+    if isinstance(obj, Guild):
+        if not (is_new or is_deleted or _changed(obj, "raid_active_id", "telegram_chat_id")):
+            return []
+        return [obj.telegram_chat_id, *_previous(obj, "telegram_chat_id")]
+    if isinstance(obj, GuildRaid):
+        if not (is_new or is_deleted or _changed(obj, "status", "chat_id")):
+            return []
+        return _raid_chats(session, obj)
+    if isinstance(obj, GuildRaidParticipant):
+        if not (is_new or is_deleted or _changed(obj, "raid_id")):
+            return []
+        out: list[int | None] = []
+        for raid_id in {obj.raid_id, *_previous(obj, "raid_id")}:
+            raid = _loaded(session, GuildRaid, raid_id)
+            if raid is not None:
+                out.extend(_raid_chats(session, raid))
+            elif raid_id is not None:
+                row = session.execute(
+                    select(GuildRaid.chat_id, GuildRaid.guild_id).where(GuildRaid.id == int(raid_id))
+                ).first()
+                if row is not None:
+                    out.extend([row.chat_id, _guild_chat(session, row.guild_id)])
+        return out
+    return []
+
+
+def _collect(session: Session, flush_context: Any, instances: Any) -> None:
+    pending = None
+    new, deleted = session.new, session.deleted
+    for obj in (*new, *session.dirty, *deleted):
+        chats = [int(c) for c in _changes(session, obj, obj in new, obj in deleted) if c]
+        if not chats:
+            continue
+        pending = pending if pending is not None else session.info.setdefault(_PENDING_KEY, set())
+        pending.update(chats)
+
+
+def _after_commit(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    from waifu_bot.core import redis as redis_core
+
+    coro = invalidate_raid_chats(redis_core.get_redis(), pending)
+    try:
+        await_only(coro)
+    except Exception:
+        coro.close()
+        logger.debug("raid chat cache invalidation skipped (no async context)", exc_info=True)
+
+
+def _after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+_installed = False
+
+
+def install_session_hooks() -> None:
+    """Register the flush / commit / rollback listeners on all ORM sessions (idempotent)."""
+    global _installed  # noqa: PLW0603
+    if _installed:
+        return
+    event.listen(Session, "before_flush", _collect)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+    _installed = True
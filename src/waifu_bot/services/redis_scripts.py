@@ -0,0 +1,383 @@
+"""Server-side Lua scripts for multi-step Redis hot paths (one round trip, atomic).
+
+Each script is registered once at import time with its SHA1. ``run_script`` sends
+``EVALSHA``; after a Redis restart / ``SCRIPT FLUSH`` the server answers ``NOSCRIPT`` and
+the call is retried with ``EVAL`` (which also re-caches the body), so callers never load
+scripts explicitly. ``preload_scripts`` is an optional warm-up.
+
+Scripts keep to the Redis scripting rules: every key is passed in ``KEYS`` (cluster-safe),
+no wall-clock reads inside Lua — callers pass "today" / timestamps as ``ARGV``.
+
+``tests/unit/fake_redis.py`` mirrors each script in Python for unit tests; keep the two in
+step when changing a body.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+from redis.exceptions import NoScriptError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RedisScript:
+    name: str
+    source: str
+    sha: str
+
+
+SCRIPTS: dict[str, RedisScript] = {}
+
+
+def register_script(name: str, source: str) -> RedisScript:
+    body = source.strip() + "\n"
+    script = RedisScript(name, body, hashlib.sha1(body.encode("utf-8")).hexdigest())
+    SCRIPTS[name] = script
+    return script
+
+
+async def run_script(redis: Any, script: RedisScript, keys: Sequence[str], args: Sequence[Any] = ()) -> Any:
+    """EVALSHA with transparent reload on NOSCRIPT. Other Redis errors propagate."""
+    argv = [str(a) for a in args]
+    try:
+        return await redis.evalsha(script.sha, len(keys), *keys, *argv)
+    except NoScriptError:
+        logger.debug("redis script %s not cached, reloading", script.name)
+        return await redis.eval(script.source, len(keys), *keys, *argv)
+
+
+async def preload_scripts(redis: Any) -> int:
+    """SCRIPT LOAD every registered script; returns how many were loaded."""
+    if redis is None:
+        return 0
+    loaded = 0
+    for script in SCRIPTS.values():
+        try:
+            await redis.script_load(script.source)
+            loaded += 1
+        except Exception:
+            logger.warning("redis script preload failed name=%s", script.name, exc_info=True)
+    return loaded
+
+
+# ---------------------------------------------------------------------------
+# Counters
+# ---------------------------------------------------------------------------
+
+# KEYS: counter. ARGV: ttl_sec. → new value.
+INCR_EXPIRE = register_script(
+    "incr_expire",
+    """
+local n = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return n
+""",
+)
+
+# ---------------------------------------------------------------------------
+# GD phantom log (gd_phantom_log.append_phantom_text)
+# ---------------------------------------------------------------------------
+
+# KEYS: list, per-user count hash. ARGV: user_id, payload, max_entries, max_per_user, ttl_sec.
+# → 1 stored, 0 over a cap.
+GD_PHANTOM_APPEND = register_script(
+    "gd_phantom_append",
+    """
+if redis.call('LLEN', KEYS[1]) >= tonumber(ARGV[3]) then
+  return 0
+end
+local n = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0') or 0
+if n >= tonumber(ARGV[4]) then
+  return 0
+end
+redis.call('RPUSH', KEYS[1], ARGV[2])
+redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return 1
+""",
+)
+
+# ---------------------------------------------------------------------------
+# Chat rewards (chat_rewards.try_award_chat_message / flush)
+# ---------------------------------------------------------------------------
+
+# KEYS: cooldown, daily points[, chat authors set]. ARGV: cooldown_sec, player_id,
+# authors_ttl_sec. → {0} on cooldown, else {1, buffered_points_today, unique_authors}.
+CHAT_REWARD_GATE = register_script(
+    "chat_reward_gate",
+    """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+  return {0, 0, 0}
+end
+local pts = tonumber(redis.call('GET', KEYS[2]) or '0') or 0
+local authors = 0
+if #KEYS >= 3 then
+  redis.call('SADD', KEYS[3], ARGV[2])
+  redis.call('EXPIRE', KEYS[3], ARGV[3])
+  authors = redis.call('SCARD', KEYS[3])
+end
+return {1, pts, authors}
+""",
+)
+
+# KEYS: buffer hash, daily points. ARGV: db_points_today, daily_cap, points, gold, exp, ttl_sec.
+# Re-checks the cap against the live counter (concurrent messages) → 1 buffered, 0 capped.
+CHAT_REWARD_COMMIT = register_script(
+    "chat_reward_commit",
+    """
+local used = tonumber(ARGV[1]) + (tonumber(redis.call('GET', KEYS[2]) or '0') or 0)
+local pts = tonumber(ARGV[3])
+if pts <= 0 or used + pts > tonumber(ARGV[2]) then
+  return 0
+end
+if tonumber(ARGV[4]) > 0 then redis.call('HINCRBY', KEYS[1], 'gold', ARGV[4]) end
+if tonumber(ARGV[5]) > 0 then redis.call('HINCRBY', KEYS[1], 'exp', ARGV[5]) end
+redis.call('HINCRBY', KEYS[1], 'points', pts)
+redis.call('HINCRBY', KEYS[1], 'messages', 1)
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('INCRBY', KEYS[2], pts)
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+return 1
+""",
+)
+
+# KEYS: buffer hash, daily points. → flat HGETALL of the buffer; both keys are deleted in the
+# same step, so a message buffered during flush is never lost.
+CHAT_REWARD_DRAIN = register_script(
+    "chat_reward_drain",
+    """
+local data = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1], KEYS[2])
+return data
+""",
+)
+
+# ---------------------------------------------------------------------------
+# Hidden-skill trackers (hidden_skills)
+# ---------------------------------------------------------------------------
+
+# KEYS: day marker, last-spend flag, peak gold. ARGV: current_gold, day_ttl, peak_ttl.
+# → 1 when a new saving day is counted.
+HOARDER_DAY = register_script(
+    "hoarder_day",
+    """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[2]) then
+  return 0
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+  return 0
+end
+local prev = tonumber(redis.call('GET', KEYS[3]) or '0') or 0
+if tonumber(ARGV[1]) <= prev then
+  return 0
+end
+redis.call('SET', KEYS[3], ARGV[1], 'EX', ARGV[3])
+return 1
+""",
+)
+
+# KEYS: day marker, last day, streak. ARGV: today, yesterday (YYYYMMDD), day_ttl, keep_ttl.
+# → current streak, or -1 when today was already counted.
+DAILY_STREAK = register_script(
+    "daily_streak",
+    """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[3]) then
+  return -1
+end
+local last = redis.call('GET', KEYS[2])
+local streak = tonumber(redis.call('GET', KEYS[3]) or '0') or 0
+if not last then
+  streak = 1
+elseif last == ARGV[2] then
+  streak = streak + 1
+elseif last < ARGV[2] then
+  streak = 1
+end
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[4])
+redis.call('SET', KEYS[3], streak, 'EX', ARGV[4])
+return streak
+""",
+)
+
+# KEYS: last activity ts, session start ts. ARGV: now_ts, max_gap_sec, ttl_sec.
+# → length in seconds of a session that just ended (gap exceeded), else 0.
+ACTIVITY_SESSION = register_script(
+    "activity_session",
+    """
+local now = tonumber(ARGV[1])
+local last = tonumber(redis.call('GET', KEYS[1]) or '')
+local start = tonumber(redis.call('GET', KEYS[2]) or '')
+local finished = 0
+if last and start and now - last > tonumber(ARGV[2]) then
+  finished = last - start
+  start = nil
+end
+if not start then
+  redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[3])
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return finished
+""",
+)
+
+# ---------------------------------------------------------------------------
+# Activity modes (activity_modes.refresh)
+# ---------------------------------------------------------------------------
+
+# KEYS: mode hash. ARGV: expected version ('' = none), ttl_sec, field1, value1, ...
+# Rebuilds the hash from a DB read unless a commit hook bumped ``_v`` meanwhile → 1 / 0.
+ACTIVITY_MODES_FILL = register_script(
+    "activity_modes_fill",
+    """
+local v = redis.call('HGET', KEYS[1], '_v') or ''
+if v ~= ARGV[1] then
+  return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], '_k', '1')
+if v ~= '' then
+  redis.call('HSET', KEYS[1], '_v', v)
+end
+for i = 3, #ARGV, 2 do
+  redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+""",
+)
+
+# ---------------------------------------------------------------------------
+# Raid chat cache (raid_chat_cache.resolve_raid_chat)
+# ---------------------------------------------------------------------------
+
+# KEYS: entry, generation. ARGV: generation read before the DB load ('' = none), value, ttl_sec.
+# Refills the entry unless an invalidation bumped the generation meanwhile → 1 / 0.
+RAID_CHAT_FILL = register_script(
+    "raid_chat_fill",
+    """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+""",
+)
+
+# ---------------------------------------------------------------------------
+# Chat activity bus (chat_activity_bus.publish_event)
+# ---------------------------------------------------------------------------
+
+# KEYS: idempotency marker, stream. ARGV: marker_ttl_sec, maxlen, field1, value1, ...
+# → 1 appended, 0 duplicate (same chat message delivered twice).
+CHAT_ACTIVITY_PUBLISH = register_script(
+    "chat_activity_publish",
+    """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+  return 0
+end
+local fields = {}
+for i = 3, #ARGV do
+  fields[#fields + 1] = ARGV[i]
+end
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], '*', unpack(fields))
+return 1
+""",
+)
+
+# ---------------------------------------------------------------------------
+# Telegram update ingress (telegram_ingress.enqueue_update / shard leases)
+# ---------------------------------------------------------------------------
+
+# KEYS: update_id marker, shard stream. ARGV: marker_ttl_sec, maxlen, field1, value1, ...
+# → shard stream length after the append (backlog signal), -1 duplicate (Telegram retry).
+TELEGRAM_UPDATE_ENQUEUE = register_script(
+    "telegram_update_enqueue",
+    """
+if not redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+  return -1
+end
+local fields = {}
+for i = 3, #ARGV do
+  fields[#fields + 1] = ARGV[i]
+end
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], '*', unpack(fields))
+return redis.call('XLEN', KEYS[2])
+""",
+)
+
+# KEYS: shard lease. ARGV: owner, ttl_sec (0 = release).
+# → 1 held by ``owner`` (acquired or renewed / released), 0 held by another consumer.
+TELEGRAM_INGRESS_LEASE = register_script(
+    "telegram_ingress_lease",
+    """
+local cur = redis.call('GET', KEYS[1])
+if tonumber(ARGV[2]) == 0 then
+  if cur == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+  end
+  return 1
+end
+if cur == ARGV[1] then
+  redis.call('EXPIRE', KEYS[1], ARGV[2])
+  return 1
+end
+if cur then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+""",
+)
+
+# ---------------------------------------------------------------------------
+# Guild quest accumulator (guild_quest_accumulator.accumulate / flush_progress)
+# ---------------------------------------------------------------------------
+
+# KEYS: dirty set, due set, acc hash per quest. ARGV: player_id, delta, acc_ttl_sec,
+# quest_id1, need1, ... (need = remaining to the next threshold at index build, 0 = none).
+# Adds ``delta`` to each quest's ``_t`` and member field; a quest whose ``_t`` crosses its
+# need joins the due set (flushed on the next short tick) → number of crossings.
+GUILD_QUEST_ACCUMULATE = register_script(
+    "guild_quest_accumulate",
+    """
+local delta = tonumber(ARGV[2])
+local crossed = 0
+for i = 3, #KEYS do
+  local j = 4 + (i - 3) * 2
+  local qid = ARGV[j]
+  local need = tonumber(ARGV[j + 1]) or 0
+  local total = redis.call('HINCRBY', KEYS[i], '_t', delta)
+  redis.call('HINCRBY', KEYS[i], ARGV[1], delta)
+  redis.call('EXPIRE', KEYS[i], ARGV[3])
+  redis.call('SADD', KEYS[1], qid)
+  if need > 0 and total >= need and total - delta < need then
+    redis.call('SADD', KEYS[2], qid)
+    crossed = crossed + 1
+  end
+end
+return crossed
+""",
+)
+
+# KEYS: dirty set, due set, acc hash per quest. ARGV: quest_id per acc hash.
+# Atomically takes the counters → {quest_id1, {field, value, ...}, quest_id2, ...}.
+GUILD_QUEST_TAKE = register_script(
+    "guild_quest_take",
+    """
+local out = {}
+for i = 3, #KEYS do
+  local qid = ARGV[i - 2]
+  out[#out + 1] = qid
+  out[#out + 1] = redis.call('HGETALL', KEYS[i])
+  redis.call('DEL', KEYS[i])
+  redis.call('SREM', KEYS[1], qid)
+  redis.call('SREM', KEYS[2], qid)
+end
+return out
+""",
+)
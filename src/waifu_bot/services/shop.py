@@ -22,13 +22,8 @@ from waifu_bot.services.hidden_skills import (
     record_hidden_gold_spend,
 )
 from waifu_bot.services.item_service import RARITY_WEIGHTS, _pick_weighted
-from waifu_bot.services.passive_skills import (
-    apply_passive_buy_price,
-    compute_passive_buy_price_from_bonuses,
-    get_passive_skill_bonuses,
-    merchant_discount_pct_for_player,
-    normalize_passive_level_affix_value,
-)
+from waifu_bot.services.passive_skills import normalize_passive_level_affix_value
+from waifu_bot.services.player_pricing import get_player_pricing_context
 from waifu_bot.services.item_art import (
     derive_image_key,
     enrich_items_with_image_urls,
@@ -47,12 +42,8 @@ def shop_size_for_act(act: int) -> int:
 
 async def compute_player_shop_sell_price(session: AsyncSession, player_id: int, base_value: int) -> int:
     """Скупка: доля от цены «как у NPC после ОБА», уже с теми же пассивными скидками что и покупка."""
-    from waifu_bot.game.formulas import SHOP_SELL_VS_BUY_RATIO
-
-    disc = await merchant_discount_pct_for_player(session, player_id)
-    raw_buy = shop_buy_price_from_merchant_discount(int(base_value), disc)
-    anchor = await apply_passive_buy_price(session, player_id, raw_buy)
-    return max(1, int(anchor * SHOP_SELL_VS_BUY_RATIO))
+    ctx = await get_player_pricing_context(session, player_id)
+    return ctx.sell_price(int(base_value))
 
 
 class ShopService:
@@ -77,8 +68,10 @@ class ShopService:
         if player_id is None:
             raise ValueError("player_id is required for shop inventory")
         offers = await self._ensure_offers(session, player_id, act, size=slot_count)
+        pricing = None
         if player_id is not None:
-            merchant_disc = await merchant_discount_pct_for_player(session, player_id)
+            pricing = await get_player_pricing_context(session, player_id)
+            merchant_disc = pricing.merchant_discount_pct
         elif charm is not None:
             merchant_disc = min(
                 50.0,
@@ -105,18 +98,6 @@ class ShopService:
 
             await enrich_inventory_items_with_template_stats(session, live_invs)
 
-        ps_bonuses: dict[str, float] = {}
-        hs_bonuses: dict[str, float] | None = None
-        if player_id is not None:
-            try:
-                ps_bonuses = await get_passive_skill_bonuses(session, int(player_id))
-            except Exception:
-                ps_bonuses = {}
-            try:
-                hs_bonuses = await get_hidden_skill_bonuses(session, int(player_id))
-            except Exception:
-                pass
-
         previews = []
         for off in offers:
             inv = inv_by_id.get(int(off.inventory_item_id)) if off.inventory_item_id else None
@@ -137,10 +118,8 @@ class ShopService:
                 await register_inventory_codex(session, int(player_id), inv)
             preview = self._offer_to_preview(off, inv, act=act, merchant_discount_pct=merchant_disc)
             preview["sold"] = is_sold
-            if player_id is not None and preview.get("price") is not None:
-                preview["price"] = compute_passive_buy_price_from_bonuses(
-                    int(preview["price"]), ps_bonuses, hs_bonuses
-                )
+            if pricing is not None and preview.get("price") is not None:
+                preview["price"] = pricing.passive_price(int(preview["price"]))
             previews.append(preview)
         await enrich_items_with_image_urls(session, previews)
         return previews
@@ -178,9 +157,8 @@ class ShopService:
         if not inv:
             return {"error": "not_found"}
 
-        disc = await merchant_discount_pct_for_player(session, player_id)
-        price = shop_buy_price_from_merchant_discount(offer.price_base, disc)
-        price = await apply_passive_buy_price(session, player_id, price)
+        pricing = await get_player_pricing_context(session, player_id)
+        price = pricing.buy_price(offer.price_base)
 
         if player.gold < price:
             return {"error": "insufficient_gold", "required": price, "have": player.gold}
@@ -281,7 +259,7 @@ class ShopService:
 
         # Calculate price
         price = calculate_gamble_price(waifu.level)
-        price = await apply_passive_buy_price(session, player_id, price)
+        price = (await get_player_pricing_context(session, player_id)).passive_price(price)
 
         # Check gold
         if player.gold < price:
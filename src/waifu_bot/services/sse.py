@@ -2,12 +2,17 @@
 import asyncio
 import contextlib
 import logging
-from typing import AsyncIterator
+from typing import TYPE_CHECKING, AsyncIterator
 
 from fastapi.responses import StreamingResponse
 from redis.asyncio.client import Redis
 from starlette.middleware.gzip import GZipMiddleware
 
+from waifu_bot.services import static_assets
+
+if TYPE_CHECKING:
+    from waifu_bot.services.battle_stream import BattleStreamCursor
+
 logger = logging.getLogger(__name__)
 
 SSE_HEADERS = {
@@ -22,7 +27,8 @@ class SseSkipGZipMiddleware:
     """Gzip HTTP responses except /api/sse — EventSource frames must not sit in zlib.
 
     This *is* the gzip middleware (not a wrapper nested inside GZipResponder).
-    SSE paths call the inner app directly; everything else goes through gzip.
+    SSE paths call the inner app directly; so do static media and assets with prebuilt
+    .br/.gz sidecars (``static_assets.skip_gzip``); everything else goes through gzip.
     """
 
     def __init__(self, app, minimum_size: int = 500):
@@ -32,7 +38,7 @@ class SseSkipGZipMiddleware:
     async def __call__(self, scope, receive, send):
         if scope.get("type") == "http":
             path = scope.get("path") or ""
-            if str(path).startswith("/api/sse"):
+            if str(path).startswith("/api/sse") or static_assets.skip_gzip(str(path)):
                 await self.app(scope, receive, send)
                 return
         await self.gzip(scope, receive, send)
@@ -46,14 +52,22 @@ def _message_data_text(data) -> str | None:
     return str(data)
 
 
-async def event_stream(redis: Redis, channel: str, heartbeat: float = 15.0) -> AsyncIterator[str]:
+async def event_stream(
+    redis: Redis,
+    channel: str,
+    heartbeat: float = 15.0,
+    *,
+    cursor: "BattleStreamCursor | None" = None,
+) -> AsyncIterator[str]:
     """SSE event stream for a given Redis pubsub channel.
 
     Subscribe first, then emit the SSE preamble so a hit published between
-    subscribe and the first yield is still delivered.
+    subscribe and the first yield is still delivered. With ``cursor``, missed battle
+    events are replayed before the listener starts (live duplicates are dropped by seq).
     """
     pubsub = redis.pubsub()
     await pubsub.subscribe(channel)
+    replay: list[str] = await cursor.replay(redis) if cursor is not None else []
     queue: asyncio.Queue[str] = asyncio.Queue()
     stop = asyncio.Event()
 
@@ -67,7 +81,9 @@ async def event_stream(redis: Redis, channel: str, heartbeat: float = 15.0) -> A
                 text = _message_data_text(message.get("data"))
                 if text is None:
                     continue
-                await queue.put(f"data: {text}\n\n")
+                chunk = cursor.frame(text) if cursor is not None else f"data: {text}\n\n"
+                if chunk:
+                    await queue.put(chunk)
         except asyncio.CancelledError:
             raise
         except Exception:
@@ -85,6 +101,8 @@ async def event_stream(redis: Redis, channel: str, heartbeat: float = 15.0) -> A
     hb_task = asyncio.create_task(_heartbeat(), name=f"sse-hb:{channel}")
     try:
         yield "retry: 3000\n\n: connected\n\n"
+        for chunk in replay:
+            yield chunk
         while True:
             chunk = await queue.get()
             yield chunk
@@ -102,10 +120,15 @@ async def event_stream(redis: Redis, channel: str, heartbeat: float = 15.0) -> A
             await pubsub.close()
 
 
-def sse_response(redis: Redis, channel: str) -> StreamingResponse:
+def sse_response(
+    redis: Redis,
+    channel: str,
+    *,
+    cursor: "BattleStreamCursor | None" = None,
+) -> StreamingResponse:
     """Return streaming response for SSE channel (never gzip)."""
     return StreamingResponse(
-        event_stream(redis, channel),
+        event_stream(redis, channel, cursor=cursor),
         media_type="text/event-stream",
         headers=SSE_HEADERS,
     )
@@ -0,0 +1,386 @@
+"""Content-hashed, precompressed static assets for ``/static`` and ``/webapp``.
+
+``scripts/build_static_assets.py`` writes ``static/.asset-manifest.json``: for every public
+path its content hash, size/mtime and the ``.br``/``.gz`` sidecars written next to it, plus
+optional sprite atlases of small item icons (one per tier). At runtime:
+
+* ``asset_url`` maps ``/static/game/a/t1.webp`` → ``/static/game/a/t1.<hash>.webp`` (the
+  plain path when the file is unknown or changed on disk since the build);
+* ``AssetStaticFiles`` serves hashed names from the original file with an immutable
+  ``Cache-Control``, picks a sidecar by ``Accept-Encoding`` (ETag/304 per encoding) and
+  rewrites ``src``/``href`` in WebApp HTML to hashed URLs.
+
+Without a manifest (dev, tests) everything behaves like plain ``StaticFiles``.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+import time
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Any
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from waifu_bot.paths import static_directory, webapp_directory
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".asset-manifest.json"
+MANIFEST_RECHECK_SEC = 10.0
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Sidecar extension per Content-Encoding, in server preference order.
+ENCODINGS: tuple[tuple[str, str], ...] = (("br", ".br"), ("gzip", ".gz"))
+# Already-compressed media: never worth a gzip pass (neither sidecar nor middleware).
+INCOMPRESSIBLE_SUFFIXES = frozenset(
+    {".webp", ".png", ".jpg", ".jpeg", ".gif", ".avif", ".ico", ".woff", ".woff2", ".mp3", ".ogg", ".mp4", ".webm"}
+    | {suffix for _, suffix in ENCODINGS}
+)
+
+_HASHED_NAME = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{12})(?P<suffix>\.[A-Za-z0-9]+)$")
+_HTML_REF = re.compile(r'(?P<attr>\b(?:src|href)=")(?P<ref>[^"]+)(?P<end>")')
+
+
+def mount_directories() -> dict[str, Path]:
+    """Public prefix → directory (same mounts as ``main.create_app``)."""
+    return {"/static": static_directory(), "/webapp": webapp_directory()}
+
+
+def manifest_path() -> Path:
+    return static_directory() / MANIFEST_NAME
+
+
+def pipeline_enabled() -> bool:
+    from waifu_bot.core.config import settings
+
+    return bool(getattr(settings, "static_asset_pipeline_enabled", True))
+
+
+@dataclass(frozen=True)
+class AssetEntry:
+    hash: str
+    size: int
+    mtime_ns: int
+    encodings: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class SpriteFrame:
+    atlas: str
+    x: int
+    y: int
+    w: int
+    h: int
+
+
+@dataclass
+class AssetManifest:
+    version: str = ""
+    files: dict[str, AssetEntry] = field(default_factory=dict)
+    atlases: dict[str, dict[str, Any]] = field(default_factory=dict)
+    frames: dict[str, SpriteFrame] = field(default_factory=dict)
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> "AssetManifest":
+        files = {
+            path: AssetEntry(
+                hash=str(e["h"]),
+                size=int(e["s"]),
+                mtime_ns=int(e["m"]),
+                encodings=tuple(e.get("e") or ()),
+            )
+            for path, e in (data.get("files") or {}).items()
+        }
+        frames = {
+            path: SpriteFrame(str(f[0]), int(f[1]), int(f[2]), int(f[3]), int(f[4]))
+            for path, f in (data.get("frames") or {}).items()
+        }
+        return cls(
+            version=str(data.get("version") or ""),
+            files=files,
+            atlases=dict(data.get("atlases") or {}),
+            frames=frames,
+        )
+
+
+_EMPTY = AssetManifest()
+_manifest: AssetManifest = _EMPTY
+_manifest_mtime_ns: int | None = None
+_checked_at = 0.0
+
+
+def load_manifest(path: Path) -> AssetManifest:
+    try:
+        return AssetManifest.from_json(json.loads(path.read_text(encoding="utf-8")))
+    except FileNotFoundError:
+        return _EMPTY
+    except (OSError, ValueError, KeyError, TypeError):
+        logger.warning("static assets: unreadable manifest %s", path, exc_info=True)
+        return _EMPTY
+
+
+def get_manifest() -> AssetManifest:
+    """Process-wide manifest; re-read when the file changes (checked every few seconds)."""
+    global _manifest, _manifest_mtime_ns, _checked_at  # noqa: PLW0603
+    if not pipeline_enabled():
+        return _EMPTY
+    now = time.monotonic()
+    if now - _checked_at < MANIFEST_RECHECK_SEC:
+        return _manifest
+    _checked_at = now
+    path = manifest_path()
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    if mtime_ns != _manifest_mtime_ns:
+        _manifest = load_manifest(path) if mtime_ns is not None else _EMPTY
+        _manifest_mtime_ns = mtime_ns
+    return _manifest
+
+
+def reset_manifest_cache() -> None:
+    global _manifest, _manifest_mtime_ns, _checked_at  # noqa: PLW0603
+    _manifest, _manifest_mtime_ns, _checked_at = _EMPTY, None, 0.0
+
+
+def hashed_name(public_path: str, digest: str) -> str:
+    head, _, name = public_path.rpartition("/")
+    stem, dot, suffix = name.rpartition(".")
+    if not dot or not stem:
+        return public_path
+    return f"{head}/{stem}.{digest}.{suffix}"
+
+
+def split_hashed(public_path: str) -> tuple[str, str] | None:
+    """``/a/b.<hash>.js`` → (``/a/b.js``, hash); None for plain names."""
+    head, _, name = public_path.rpartition("/")
+    m = _HASHED_NAME.match(name)
+    if not m:
+        return None
+    return f"{head}/{m.group('stem')}{m.group('suffix')}", m.group("hash")
+
+
+def filesystem_path(public_path: str) -> Path | None:
+    for prefix, directory in mount_directories().items():
+        if public_path.startswith(prefix + "/"):
+            return directory / public_path[len(prefix) + 1 :]
+    return None
+
+
+def _matches(entry: AssetEntry, st: os.stat_result) -> bool:
+    return st.st_size == entry.size and st.st_mtime_ns == entry.mtime_ns
+
+
+def _fresh(public_path: str, entry: AssetEntry) -> bool:
+    fs = filesystem_path(public_path)
+    if fs is None:
+        return False
+    try:
+        return _matches(entry, fs.stat())
+    except OSError:
+        return False
+
+
+def asset_url(public_path: str) -> str:
+    """Hashed URL for a built asset; ``public_path`` unchanged otherwise."""
+    entry = get_manifest().files.get(public_path)
+    if entry is None or not _fresh(public_path, entry):
+        return public_path
+    return hashed_name(public_path, entry.hash)
+
+
+def sprite_for(public_path: str) -> dict[str, Any] | None:
+    """Atlas placement of a small icon: ``{"url", "x", "y", "w", "h", "atlas_w", "atlas_h"}``."""
+    manifest = get_manifest()
+    frame = manifest.frames.get(public_path)
+    if frame is None:
+        return None
+    atlas = manifest.atlases.get(frame.atlas)
+    entry = manifest.files.get(public_path)
+    if atlas is None or entry is None or not _fresh(public_path, entry):
+        return None
+    return {
+        "url": asset_url(str(atlas["url"])),
+        "x": frame.x,
+        "y": frame.y,
+        "w": frame.w,
+        "h": frame.h,
+        "atlas_w": int(atlas.get("w") or 0),
+        "atlas_h": int(atlas.get("h") or 0),
+    }
+
+
+def skip_gzip(path: str) -> bool:
+    """True for static paths the gzip middleware must not touch (media, prebuilt sidecars)."""
+    if not pipeline_enabled() or filesystem_path(path) is None:
+        return False
+    suffix = PurePosixPath(path).suffix.lower()
+    if suffix in INCOMPRESSIBLE_SUFFIXES:
+        return True
+    split = split_hashed(path)
+    entry = get_manifest().files.get(split[0] if split else path)
+    return entry is not None and bool(entry.encodings)
+
+
+def accepted_encodings(header: str | None) -> set[str]:
+    out: set[str] = set()
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        out.add(token)
+    return out
+
+
+def rewrite_html(text: str, page_public_path: str, manifest: AssetManifest) -> str:
+    """Point ``src``/``href`` of built assets at their hashed names (``?v=`` busters dropped)."""
+    base = posixpath.dirname(page_public_path)
+
+    def _sub(m: re.Match) -> str:
+        ref = m.group("ref")
+        if "://" in ref or ref.startswith(("//", "data:", "#", "mailto:", "javascript:")):
+            return m.group(0)
+        url = ref.split("#", 1)[0].split("?", 1)[0]
+        if not url:
+            return m.group(0)
+        public = url if url.startswith("/") else posixpath.normpath(posixpath.join(base, url))
+        entry = manifest.files.get(public)
+        if entry is None or not _fresh(public, entry):
+            return m.group(0)
+        head, sep, _ = url.rpartition("/")
+        new_name = hashed_name("/" + public.rpartition("/")[2], entry.hash)[1:]
+        return f"{m.group('attr')}{head}{sep}{new_name}{m.group('end')}"
+
+    return _HTML_REF.sub(_sub, text)
+
+
+class AssetStaticFiles(StaticFiles):
+    """``StaticFiles`` + hashed names, precompressed sidecars and HTML URL rewriting."""
+
+    def __init__(self, *, mount: str, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.mount = mount.rstrip("/")
+        self._html_cache: dict[str, tuple[int, str, bytes, str]] = {}
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        manifest = get_manifest()
+        if not manifest.files:
+            return await super().get_response(path, scope)
+        if any(part.startswith(".") for part in PurePosixPath(path).parts):
+            raise HTTPException(status_code=404)
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405)
+
+        public = f"{self.mount}/{path}"
+        requested_hash = None
+        split = split_hashed(public)
+        if split is not None and split[0] in manifest.files:
+            public, requested_hash = split
+            path = public[len(self.mount) + 1 :]
+
+        full_path, st = await anyio.to_thread.run_sync(self.lookup_path, path)
+        if st is not None and stat.S_ISDIR(st.st_mode) and self.html and scope["path"].endswith("/"):
+            path = posixpath.join(path, "index.html")
+            public = posixpath.join(public, "index.html")
+            full_path, st = await anyio.to_thread.run_sync(self.lookup_path, path)
+        if st is None or not stat.S_ISREG(st.st_mode):
+            return await super().get_response(path, scope)
+
+        if full_path.endswith(".html") and self.html:
+            return await self._html_response(full_path, st, public, manifest, scope)
+
+        entry = manifest.files.get(public)
+        fresh = entry is not None and _matches(entry, st)
+        response: Response | None = None
+        if fresh and entry.encodings:
+            accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding"))
+            for encoding, suffix in ENCODINGS:
+                if encoding not in accepted or suffix[1:] not in entry.encodings:
+                    continue
+                sidecar = full_path + suffix
+                try:
+                    sidecar_st = await anyio.to_thread.run_sync(os.stat, sidecar)
+                except OSError:
+                    continue
+                response = self._file_response(
+                    sidecar,
+                    sidecar_st,
+                    scope,
+                    media_type=mimetypes.guess_type(full_path)[0] or "application/octet-stream",
+                    content_encoding=encoding,
+                )
+                break
+        if response is None:
+            response = self.file_response(full_path, st, scope)
+        if entry is not None and entry.encodings:
+            response.headers.add_vary_header("Accept-Encoding")
+        if requested_hash is not None:
+            immutable = fresh and requested_hash == entry.hash
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        return response
+
+    def _file_response(
+        self,
+        full_path: str,
+        st: os.stat_result,
+        scope: Scope,
+        *,
+        media_type: str,
+        content_encoding: str,
+    ) -> Response:
+        response = FileResponse(full_path, stat_result=st, media_type=media_type)
+        response.headers["Content-Encoding"] = content_encoding
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return Response(status_code=304, headers=_not_modified_headers(response.headers))
+        return response
+
+    async def _html_response(
+        self,
+        full_path: str,
+        st: os.stat_result,
+        public: str,
+        manifest: AssetManifest,
+        scope: Scope,
+    ) -> Response:
+        cached = self._html_cache.get(full_path)
+        if cached is None or cached[0] != st.st_mtime_ns or cached[1] != manifest.version:
+            raw = await anyio.to_thread.run_sync(Path(full_path).read_text, "utf-8")
+            body = rewrite_html(raw, public, manifest).encode("utf-8")
+            etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+            cached = (st.st_mtime_ns, manifest.version, body, etag)
+            self._html_cache[full_path] = cached
+        _, _, body, etag = cached
+        headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+        if_none_match = Headers(scope=scope).get("if-none-match") or ""
+        if etag in [tag.strip(" W/") for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="text/html", headers=headers)
+
+
+def _not_modified_headers(headers: Any) -> dict[str, str]:
+    keep = ("cache-control", "content-location", "date", "etag", "expires", "vary", "content-encoding")
+    return {k: v for k, v in headers.items() if k in keep}
@@ -38,6 +38,7 @@ from waifu_bot.services.passive_skills import (
     apply_passive_hire_cost,
     compute_tavern_hire_price,
 )
+from waifu_bot.services import player_revisions
 from waifu_bot.services import merc_systems as merc_sys
 
 
@@ -585,6 +586,7 @@ class TavernService:
                 and_(HiredWaifu.id == waifu_id, HiredWaifu.player_id == player_id)
             )
         )
+        player_revisions.note_revision(session, player_id, "roster")
 
         try:
             state = await self._get_or_create_tavern_state(session, player_id)
@@ -0,0 +1,577 @@
+"""Telegram update ingress: fast webhook ack, durable per-chat ordered processing.
+
+``POST /webhook`` used to run ``Dispatcher.feed_update`` inline, so Telegram's delivery latency
+(and its retries on slow responses) followed the slowest handler. Now the route calls
+:func:`accept_update`, which appends the raw update to a Redis Stream and returns.
+
+Layout:
+
+* ``tg:updates:{shard}`` — ``TELEGRAM_INGRESS_SHARDS`` streams; an update goes to
+  ``chat_id % shards`` (user id for chat-less updates), so one chat always lands on one shard;
+* ``tg:update:seen:{update_id}`` — dedupe marker; a Telegram redelivery of the same update is not
+  appended twice (``TELEGRAM_UPDATE_ENQUEUE``: ``SET NX`` + ``XADD``, returns the shard length);
+* ``tg:updates:lease:{shard}`` — one consumer process reads a shard at a time
+  (``TELEGRAM_INGRESS_LEASE``, renewed by the lease keeper every ``LEASE_RENEW_SEC``).
+
+Ordering and parallelism: the shard owner (:class:`ShardConsumer`) reads through the consumer
+group ``tg_ingress`` and keeps one chain of in-flight updates per chat: an update starts when the
+chat's previous one is done, so a chat's next update never overtakes the previous one. Reading
+continues while chats run (up to ``MAX_IN_FLIGHT`` entries per shard), and each entry is acked and
+deleted as soon as it is done, so one slow handler only holds back its own chat and a shard's
+length is its backlog. ``TELEGRAM_INGRESS_CONCURRENCY`` caps updates in flight per process;
+different shards run in parallel.
+
+Delivery:
+
+* at-least-once — entries left pending by a previous lease holder are re-claimed once they have
+  been idle for ``CLAIM_IDLE_MS`` (well past ``LEASE_TTL_SEC``, so the old holder has stopped
+  reading and normally finished them); until then the new holder reads nothing new, to keep each
+  chat in order. Only a handler that runs longer than ``CLAIM_IDLE_MS`` can run twice; an entry
+  whose ack failed after its handler ran is remembered by the holder and only its ack is retried;
+* an update whose handler failed (parse error, exception, or the dispatcher error handler fired)
+  is copied to ``tg:updates:dead`` and acked; handlers have side effects and may already have
+  answered, so there is no automatic retry. ``scripts/replay_failed_updates.py`` lists and requeues;
+* metrics — ``tg_ingress_lag_ms`` (queue wait) and ``tg_ingress_handle_ms`` (perf_metrics),
+  :func:`ingress_stats` (per-shard length / pending / lag, dead letters, process counters).
+
+Redis unavailable, ingress disabled or no consumer pool in this process → ``accept_update``
+returns False and the route processes the update inline (previous behaviour).
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import socket
+import time
+from collections import Counter
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterable
+
+from redis.exceptions import RedisError, ResponseError
+
+from waifu_bot.core.config import settings
+from waifu_bot.services.redis_scripts import TELEGRAM_INGRESS_LEASE, TELEGRAM_UPDATE_ENQUEUE, run_script
+
+logger = logging.getLogger(__name__)
+
+STREAM_PREFIX = "tg:updates:"
+DEAD_STREAM_KEY = "tg:updates:dead"
+LEASE_KEY_PREFIX = "tg:updates:lease:"
+GROUP = "tg_ingress"
+SEEN_KEY_PREFIX = "tg:update:seen:"
+# Telegram keeps retrying an unacked update for up to 24h.
+SEEN_TTL_SEC = 86400
+# Hard cap per shard (XADD MAXLEN ~); far above any backlog the consumers are expected to carry.
+STREAM_MAXLEN = 100_000
+DEAD_MAXLEN = 10_000
+BATCH_SIZE = 32
+BLOCK_MS = 1_000
+LEASE_TTL_SEC = 30
+LEASE_RENEW_SEC = 10
+# Pending entries of another consumer are re-claimed only after this idle time (> lease TTL).
+CLAIM_IDLE_MS = 2 * LEASE_TTL_SEC * 1000
+# Entries read but not yet acked per shard; reading pauses at the cap.
+MAX_IN_FLIGHT = 256
+PENDING_RETRY_SEC = 1.0
+ERROR_BACKOFF_SEC = 1.0
+LAG_WARN_ENTRIES = 2_000
+LAG_WARN_INTERVAL_SEC = 60.0
+STOP_TIMEOUT_SEC = 5.0
+
+CONSUMER_NAME = f"{socket.gethostname()}:{os.getpid()}"
+
+# Updates whose chat is known from these objects' ``chat`` field.
+_CHAT_FIELDS = (
+    "message",
+    "edited_message",
+    "channel_post",
+    "edited_channel_post",
+    "business_message",
+    "edited_business_message",
+    "my_chat_member",
+    "chat_member",
+    "chat_join_request",
+    "message_reaction",
+    "message_reaction_count",
+    "chat_boost",
+    "removed_chat_boost",
+)
+# Chat-less updates: ordered per user instead.
+_USER_FIELDS = ("inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query", "poll_answer")
+
+Dispatch = Callable[[dict[str, Any]], Awaitable[bool]]
+
+_handler_errors: ContextVar["list[str] | None"] = ContextVar("tg_ingress_handler_errors", default=None)
+_counters: Counter[str] = Counter()
+_held: set[int] = set()
+_tasks: list["asyncio.Task[None]"] = []
+_stopping: asyncio.Event | None = None
+_slots: asyncio.Semaphore | None = None
+_last_lag_warn = 0.0
+
+
+def shard_count() -> int:
+    return max(1, int(getattr(settings, "telegram_ingress_shards", 8) or 1))
+
+
+def stream_key(shard: int) -> str:
+    return f"{STREAM_PREFIX}{int(shard)}"
+
+
+def _lease_key(shard: int) -> str:
+    return f"{LEASE_KEY_PREFIX}{int(shard)}"
+
+
+def _id_of(obj: Any) -> int | None:
+    if isinstance(obj, dict) and obj.get("id") is not None:
+        return int(obj["id"])
+    return None
+
+
+def chat_key(payload: dict[str, Any]) -> int:
+    """Ordering key of an update: chat id, else the user id, else 0."""
+    for name in _CHAT_FIELDS:
+        obj = payload.get(name)
+        if isinstance(obj, dict):
+            chat_id = _id_of(obj.get("chat"))
+            if chat_id is not None:
+                return chat_id
+    query = payload.get("callback_query")
+    if isinstance(query, dict):
+        msg = query.get("message")
+        chat_id = _id_of(msg.get("chat")) if isinstance(msg, dict) else None
+        return chat_id if chat_id is not None else (_id_of(query.get("from")) or 0)
+    for name in _USER_FIELDS:
+        obj = payload.get(name)
+        if isinstance(obj, dict):
+            user_id = _id_of(obj.get("from")) or _id_of(obj.get("user"))
+            if user_id is not None:
+                return user_id
+    return 0
+
+
+def shard_for(chat_id: int, shards: int | None = None) -> int:
+    return int(chat_id) % (shards or shard_count())
+
+
+def _entry_fields(payload: dict[str, Any], chat_id: int) -> dict[str, str]:
+    return {
+        "u": str(int(payload["update_id"])),
+        "c": str(chat_id),
+        "t": str(int(time.time() * 1000)),
+        "b": json.dumps(payload, ensure_ascii=False, separators=(",", ":")),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Ingress (webhook route)
+# ---------------------------------------------------------------------------
+
+
+async def enqueue_update(redis: Any, payload: dict[str, Any]) -> bool:
+    """Append to the chat's shard. True = handled (appended or duplicate); False = process inline."""
+    if redis is None:
+        return False
+    try:
+        update_id = int(payload["update_id"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    chat_id = chat_key(payload)
+    args: list[Any] = [SEEN_TTL_SEC, STREAM_MAXLEN]
+    for k, v in _entry_fields(payload, chat_id).items():
+        args.extend((k, v))
+    keys = [f"{SEEN_KEY_PREFIX}{update_id}", stream_key(shard_for(chat_id))]
+    try:
+        length = int(await run_script(redis, TELEGRAM_UPDATE_ENQUEUE, keys, args))
+    except RedisError:
+        logger.warning("telegram ingress enqueue failed update_id=%s", update_id, exc_info=True)
+        return False
+    if length < 0:
+        _counters["duplicate"] += 1
+        logger.debug("telegram ingress duplicate update_id=%s", update_id)
+        return True
+    _counters["enqueued"] += 1
+    _warn_backlog(keys[1], length)
+    return True
+
+
+def _warn_backlog(stream: str, length: int) -> None:
+    global _last_lag_warn  # noqa: PLW0603
+    if length <= LAG_WARN_ENTRIES:
+        return
+    now = time.monotonic()
+    if now - _last_lag_warn >= LAG_WARN_INTERVAL_SEC:
+        _last_lag_warn = now
+        logger.warning("telegram ingress backlog stream=%s length=%d", stream, length)
+
+
+def is_running() -> bool:
+    return any(not t.done() for t in _tasks)
+
+
+async def accept_update(payload: dict[str, Any]) -> bool:
+    """Webhook entry point: queue the update when this process runs the consumer pool."""
+    if not settings.telegram_ingress_enabled or not is_running():
+        return False
+    from waifu_bot.core import redis as redis_core
+
+    accepted = await enqueue_update(redis_core.get_redis(), payload)
+    if not accepted:
+        _counters["inline"] += 1
+    return accepted
+
+
+# ---------------------------------------------------------------------------
+# Consumer
+# ---------------------------------------------------------------------------
+
+
+def note_handler_error(exc: BaseException) -> None:
+    """Called by the dispatcher error handler: mark the update being consumed as failed."""
+    errors = _handler_errors.get()
+    if errors is not None:
+        errors.append(f"{type(exc).__name__}: {exc}"[:500])
+
+
+async def _default_dispatch(payload: dict[str, Any]) -> bool:
+    from waifu_bot.services.webhook import process_update
+
+    return await process_update(payload)
+
+
+async def ensure_group(redis: Any, stream: str) -> None:
+    try:
+        await redis.xgroup_create(stream, GROUP, id="0", mkstream=True)
+    except ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+async def _dead_letter(redis: Any, shard: int, entry_id: str, fields: dict[str, Any], error: str) -> None:
+    _counters["failed"] += 1
+    dead = {k: str(v) for k, v in fields.items() if k in ("u", "c", "b", "t")}
+    dead.update({"s": str(shard), "id": str(entry_id), "e": error[:500], "f": str(int(time.time() * 1000))})
+    try:
+        await redis.xadd(DEAD_STREAM_KEY, dead, maxlen=DEAD_MAXLEN, approximate=True)
+    except RedisError:
+        logger.exception("telegram ingress dead-letter write failed entry=%s fields=%s", entry_id, dead)
+
+
+async def _dispatch_entry(redis: Any, shard: int, entry_id: str, fields: dict[str, Any], dispatch: Dispatch) -> None:
+    from waifu_bot.services.perf_metrics import record_ms
+
+    try:
+        payload = json.loads(fields["b"])
+    except (KeyError, TypeError, ValueError):
+        await _dead_letter(redis, shard, entry_id, fields, "malformed entry")
+        return
+    record_ms("tg_ingress_lag_ms", max(0.0, time.time() * 1000.0 - int(fields.get("t") or 0)))
+    errors: list[str] = []
+    token = _handler_errors.set(errors)
+    t0 = time.perf_counter()
+    try:
+        async with _slots or nullcontext():
+            ok = await dispatch(payload)
+    except Exception as exc:
+        logger.exception("telegram ingress dispatch crashed entry=%s update_id=%s", entry_id, fields.get("u"))
+        ok = False
+        errors.append(f"{type(exc).__name__}: {exc}"[:500])
+    finally:
+        _handler_errors.reset(token)
+    record_ms("tg_ingress_handle_ms", (time.perf_counter() - t0) * 1000.0)
+    if ok and not errors:
+        _counters["processed"] += 1
+        return
+    await _dead_letter(redis, shard, entry_id, fields, "; ".join(errors) or "dispatch failed")
+
+
+class ShardConsumer:
+    """Reader of one shard for its lease holder: one ordered chain of in-flight updates per chat."""
+
+    def __init__(
+        self, redis: Any, shard: int, dispatch: Dispatch | None = None, *, max_in_flight: int = MAX_IN_FLIGHT
+    ) -> None:
+        self.redis = redis
+        self.shard = int(shard)
+        self.stream = stream_key(shard)
+        self.dispatch = dispatch or _default_dispatch
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.acked = 0
+        self._chains: dict[str, asyncio.Task[None]] = {}
+        self._in_flight: dict[str, asyncio.Task[None]] = {}
+        # Done here but XACK / XDEL failed: retried on the next read, never dispatched again.
+        self._unacked: set[str] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def read(self, *, count: int = BATCH_SIZE, block_ms: int | None = None) -> int:
+        """Start the next entries of the shard; returns how many were started."""
+        await self.retry_acks()
+        room = min(int(count), self.max_in_flight - self.in_flight)
+        if room <= 0:
+            await self.wait_any()
+            return 0
+        entries, waiting = await self._claim(room)
+        if not entries and waiting:
+            # A previous holder's entries are not idle long enough yet: new ones must wait.
+            await asyncio.sleep(PENDING_RETRY_SEC)
+            return 0
+        if not entries:
+            for _stream, fresh in await self.redis.xreadgroup(
+                GROUP, CONSUMER_NAME, {self.stream: ">"}, count=room, block=block_ms
+            ) or []:
+                entries.extend(fresh)
+        for entry_id, fields in entries:
+            self._submit(entry_id, fields)
+        return len(entries)
+
+    async def _claim(self, count: int) -> tuple[list[Any], bool]:
+        """Idle entries nobody here is running. True = some stale entries are not claimable yet."""
+        summary = await self.redis.xpending(self.stream, GROUP)
+        stale = int((summary or {}).get("pending") or 0) - self.in_flight - len(self._unacked)
+        if stale <= 0:
+            return [], False
+        claimed = await self.redis.xautoclaim(
+            self.stream, GROUP, CONSUMER_NAME, CLAIM_IDLE_MS, start_id="0-0", count=count
+        )
+        entries = [
+            (i, f)
+            for i, f in (claimed[1] or [] if claimed else [])
+            if i not in self._in_flight and i not in self._unacked
+        ]
+        return entries, len(entries) < stale
+
+    def _submit(self, entry_id: str, fields: dict[str, Any]) -> None:
+        chat = str(fields.get("c"))
+        task = asyncio.create_task(self._run(self._chains.get(chat), entry_id, fields))
+        self._chains[chat] = task
+        self._in_flight[entry_id] = task
+        task.add_done_callback(functools.partial(self._done, chat, entry_id))
+
+    def _done(self, chat: str, entry_id: str, task: "asyncio.Task[None]") -> None:
+        self._in_flight.pop(entry_id, None)
+        if self._chains.get(chat) is task:
+            del self._chains[chat]
+
+    async def _run(self, prev: "asyncio.Task[None] | None", entry_id: str, fields: dict[str, Any]) -> None:
+        if prev is not None:
+            await asyncio.wait([prev])
+        try:
+            await _dispatch_entry(self.redis, self.shard, entry_id, fields, self.dispatch)
+            await self._ack([entry_id])
+        except RedisError:
+            self._unacked.add(entry_id)
+            logger.warning("telegram ingress ack failed shard=%s entry=%s", self.shard, entry_id, exc_info=True)
+
+    async def _ack(self, entry_ids: list[str]) -> None:
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xack(self.stream, GROUP, *entry_ids)
+        # Done entries are deleted, so the stream length is the shard backlog.
+        pipe.xdel(self.stream, *entry_ids)
+        await pipe.execute()
+        self.acked += len(entry_ids)
+
+    async def retry_acks(self) -> None:
+        """Ack entries whose handler finished but whose ack failed."""
+        if not self._unacked:
+            return
+        ids = sorted(self._unacked)
+        try:
+            await self._ack(ids)
+        except RedisError:
+            logger.warning("telegram ingress ack retry failed shard=%s entries=%d", self.shard, len(ids), exc_info=True)
+            return
+        self._unacked.difference_update(ids)
+
+    async def wait_any(self) -> None:
+        if self._in_flight:
+            await asyncio.wait(list(self._in_flight.values()), return_when=asyncio.FIRST_COMPLETED)
+
+    async def join(self) -> None:
+        while self._in_flight:
+            await asyncio.wait(list(self._in_flight.values()))
+
+    def cancel(self) -> None:
+        for task in list(self._in_flight.values()):
+            task.cancel()
+
+
+async def drain_shard(
+    redis: Any,
+    shard: int,
+    *,
+    dispatch: Dispatch | None = None,
+    count: int = BATCH_SIZE,
+    block_ms: int | None = None,
+) -> int:
+    """Process everything readable on a shard now (chats in parallel, each in order); returns entries acked."""
+    consumer = ShardConsumer(redis, shard, dispatch)
+    await ensure_group(redis, consumer.stream)
+    try:
+        while True:
+            if await consumer.read(count=count, block_ms=block_ms):
+                continue
+            if not consumer.in_flight:
+                return consumer.acked
+            await consumer.wait_any()
+    finally:
+        consumer.cancel()
+
+
+async def hold_lease(redis: Any, shard: int, *, owner: str = CONSUMER_NAME, ttl: int = LEASE_TTL_SEC) -> bool:
+    """Acquire or renew the shard lease (``ttl=0`` releases it)."""
+    return bool(await run_script(redis, TELEGRAM_INGRESS_LEASE, [_lease_key(shard)], [owner, ttl]))
+
+
+async def _lease_keeper(redis: Any, stopping: asyncio.Event) -> None:
+    while not stopping.is_set():
+        for shard in range(shard_count()):
+            try:
+                if await hold_lease(redis, shard):
+                    _held.add(shard)
+                else:
+                    _held.discard(shard)
+            except RedisError:
+                _held.discard(shard)
+                logger.warning("telegram ingress lease renew failed shard=%s", shard, exc_info=True)
+        try:
+            await asyncio.wait_for(stopping.wait(), timeout=LEASE_RENEW_SEC)
+        except asyncio.TimeoutError:
+            pass
+    for shard in list(_held):
+        try:
+            await hold_lease(redis, shard, ttl=0)
+        except RedisError:
+            logger.debug("telegram ingress lease release failed shard=%s", shard, exc_info=True)
+    _held.clear()
+
+
+async def _shard_loop(redis: Any, shard: int, stopping: asyncio.Event) -> None:
+    consumer = ShardConsumer(redis, shard)
+    ready = False
+    try:
+        while not stopping.is_set():
+            if shard not in _held:
+                ready = False
+                try:
+                    await asyncio.wait_for(stopping.wait(), timeout=LEASE_RENEW_SEC / 2)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                if not ready:
+                    await ensure_group(redis, consumer.stream)
+                    ready = True
+                await consumer.read(block_ms=BLOCK_MS)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                ready = False
+                logger.exception("telegram ingress shard %s loop error", shard)
+                await asyncio.sleep(ERROR_BACKOFF_SEC)
+        await consumer.join()
+        await consumer.retry_acks()
+    finally:
+        consumer.cancel()
+
+
+def start_consumers() -> bool:
+    """Start the lease keeper and one reader per shard in this process (idempotent)."""
+    global _stopping, _slots  # noqa: PLW0603
+    if is_running():
+        return True
+    from waifu_bot.core import redis as redis_core
+
+    redis = redis_core.get_redis()
+    if redis is None:
+        return False
+    _stopping = asyncio.Event()
+    _slots = asyncio.Semaphore(max(1, int(settings.telegram_ingress_concurrency)))
+    _tasks.clear()
+    _tasks.append(asyncio.create_task(_lease_keeper(redis, _stopping), name="tg_ingress_lease"))
+    for shard in range(shard_count()):
+        _tasks.append(asyncio.create_task(_shard_loop(redis, shard, _stopping), name=f"tg_ingress_{shard}"))
+    logger.info("telegram ingress consumers started shards=%d consumer=%s", shard_count(), CONSUMER_NAME)
+    return True
+
+
+async def stop_consumers(timeout: float = STOP_TIMEOUT_SEC) -> None:
+    """Let in-flight updates finish (up to ``timeout``), then cancel and release the leases."""
+    if not _tasks:
+        return
+    if _stopping is not None:
+        _stopping.set()
+    _done, pending = await asyncio.wait(_tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    _tasks.clear()
+    logger.info("telegram ingress consumers stopped (%d shards cancelled with updates in flight)", len(pending))
+
+
+# ---------------------------------------------------------------------------
+# Metrics and dead letters
+# ---------------------------------------------------------------------------
+
+
+async def ingress_stats(redis: Any) -> dict[str, Any]:
+    """Per-shard length / pending / lag, dead-letter count and this process's counters."""
+    shards = []
+    for shard in range(shard_count()):
+        stream = stream_key(shard)
+        length = int(await redis.xlen(stream) or 0)
+        row = {"shard": shard, "length": length, "pending": 0, "lag": length}
+        try:
+            groups = await redis.xinfo_groups(stream)
+        except ResponseError:
+            groups = []
+        for group in groups:
+            if str(group.get("name")) == GROUP:
+                row.update(pending=int(group.get("pending") or 0), lag=int(group.get("lag") or 0))
+        shards.append(row)
+    return {
+        "shards": shards,
+        "backlog": sum(r["pending"] + r["lag"] for r in shards),
+        "dead": int(await redis.xlen(DEAD_STREAM_KEY) or 0),
+        "counters": dict(_counters),
+        "running": is_running(),
+        "leases_held": sorted(_held),
+        "consumer": CONSUMER_NAME,
+    }
+
+
+async def list_dead(redis: Any, *, count: int = 100) -> list[dict[str, Any]]:
+    """Oldest dead letters first: entry id, update id, chat, error, failed-at (ms)."""
+    out = []
+    for entry_id, fields in await redis.xrange(DEAD_STREAM_KEY, count=count):
+        out.append({
+            "id": entry_id,
+            "update_id": int(fields.get("u") or 0),
+            "chat_id": int(fields.get("c") or 0),
+            "error": fields.get("e"),
+            "failed_at": int(fields.get("f") or 0),
+        })
+    return out
+
+
+async def requeue_dead(redis: Any, *, ids: Iterable[str] | None = None, count: int = 100) -> list[str]:
+    """Move dead letters (all up to ``count``, or only ``ids``) back to their chat's shard."""
+    wanted = set(ids) if ids is not None else None
+    moved: list[str] = []
+    for entry_id, fields in await redis.xrange(DEAD_STREAM_KEY, count=count if wanted is None else None):
+        if wanted is not None and entry_id not in wanted:
+            continue
+        chat_id = int(fields.get("c") or 0)
+        entry = {k: str(fields[k]) for k in ("u", "c", "b") if k in fields}
+        entry["t"] = str(int(time.time() * 1000))
+        await redis.xadd(stream_key(shard_for(chat_id)), entry, maxlen=STREAM_MAXLEN, approximate=True)
+        await redis.xdel(DEAD_STREAM_KEY, entry_id)
+        moved.append(entry_id)
+    _counters["requeued"] += len(moved)
+    return moved
@@ -1,9 +1,12 @@
 """Central wallet + economy ledger. Dual-writes dust/shards mirrors until later."""
 from __future__ import annotations
 
+from collections import Counter
+from dataclasses import dataclass, field
 from typing import Any
 
-from sqlalchemy import select
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -117,6 +120,25 @@ async def _mirror(session: AsyncSession, player_id: int, currency_key: str, amou
             prog.abyss_shards = int(amount)
 
 
+_KEY_COLUMNS = ("player_id", "source", "ref_type", "ref_id")
+
+
+async def _claim_keys(session: AsyncSession, keys: list[tuple]) -> Counter:
+    """Insert idempotency keys; returns the ones that were new (duplicates are skipped).
+
+    Lives outside ``economy_ledger`` because that table is partitioned by month and a
+    unique index there could only be enforced per partition.
+    """
+    cols = [getattr(m.EconomyLedgerKey, c) for c in _KEY_COLUMNS]
+    stmt = (
+        pg_insert(m.EconomyLedgerKey)
+        .values([dict(zip(_KEY_COLUMNS, k)) for k in keys])
+        .on_conflict_do_nothing(index_elements=list(_KEY_COLUMNS))
+        .returning(*cols)
+    )
+    return Counter(tuple(r) for r in (await session.execute(stmt)).all())
+
+
 async def _write_ledger(
     session: AsyncSession,
     *,
@@ -128,27 +150,26 @@ async def _write_ledger(
     ref_type: str | None,
     ref_id: str | None,
 ) -> bool:
-    """Insert ledger row. Returns False if idempotent unique already exists."""
+    """Insert ledger row. Returns False if the idempotency key already exists."""
     if int(amount) <= 0:
         return True
-    row = m.EconomyLedger(
-        player_id=int(player_id),
-        direction=str(direction),
-        currency_key=str(currency_key),
-        amount=int(amount),
-        source=str(source),
-        ref_type=ref_type,
-        ref_id=None if ref_id is None else str(ref_id),
-    )
-    try:
-        async with session.begin_nested():
-            session.add(row)
-            await session.flush()
-        return True
-    except IntegrityError as exc:
-        if source in IDEMPOTENT_SOURCES and _is_unique_violation(exc):
+    ref = None if ref_id is None else str(ref_id)
+    if source in IDEMPOTENT_SOURCES:
+        claimed = await _claim_keys(session, [(int(player_id), str(source), ref_type, ref)])
+        if not claimed:
             return False
-        raise
+    session.add(
+        m.EconomyLedger(
+            player_id=int(player_id),
+            direction=str(direction),
+            currency_key=str(currency_key),
+            amount=int(amount),
+            source=str(source),
+            ref_type=ref_type,
+            ref_id=ref,
+        )
+    )
+    return True
 
 
 async def add(
@@ -285,3 +306,208 @@ async def spend_gold(
         return False
     player.gold = have - amt
     return True
+
+
+# ---------------------------------------------------------------------------
+# Batched transactions
+# ---------------------------------------------------------------------------
+
+GOLD_KEY = "gold"
+
+_LEDGER_KEY_COLUMNS = ("player_id", "direction", "currency_key", "source", "ref_type", "ref_id")
+
+
+@dataclass(frozen=True, slots=True)
+class Movement:
+    player_id: int
+    currency_key: str
+    amount: int
+    direction: str  # in | out
+    source: str
+    ref_type: str | None = None
+    ref_id: str | None = None
+
+    def ledger_key(self) -> tuple:
+        return (self.player_id, self.direction, self.currency_key, self.source, self.ref_type, self.ref_id)
+
+    def idempotency_key(self) -> tuple:
+        return (self.player_id, self.source, self.ref_type, self.ref_id)
+
+
+@dataclass
+class WalletTx:
+    """Credits and debits for one or more players, applied together by :func:`apply_tx`.
+
+    Gold is ``currency_key="gold"`` (``players.gold``); everything else is a wallet currency.
+    """
+
+    movements: list[Movement] = field(default_factory=list)
+
+    def _push(self, direction: str, player_id: int, currency_key: str, amount: int, source: str,
+              ref_type: str | None, ref_id: Any) -> WalletTx:
+        amt = int(amount)
+        if amt < 0:
+            raise ValueError("amount must be >= 0")
+        if currency_key != GOLD_KEY and currency_key not in WALLET_CURRENCY_KEYS:
+            raise ValueError(f"unknown currency {currency_key}")
+        self.movements.append(
+            Movement(
+                player_id=int(player_id),
+                currency_key=str(currency_key),
+                amount=amt,
+                direction=direction,
+                source=str(source),
+                ref_type=ref_type,
+                ref_id=None if ref_id is None else str(ref_id),
+            )
+        )
+        return self
+
+    def credit(self, player_id: int, currency_key: str, amount: int, *, source: str,
+               ref_type: str | None = None, ref_id: Any = None) -> WalletTx:
+        return self._push("in", player_id, currency_key, amount, source, ref_type, ref_id)
+
+    def debit(self, player_id: int, currency_key: str, amount: int, *, source: str,
+              ref_type: str | None = None, ref_id: Any = None) -> WalletTx:
+        return self._push("out", player_id, currency_key, amount, source, ref_type, ref_id)
+
+    def __bool__(self) -> bool:
+        return any(mv.amount > 0 for mv in self.movements)
+
+
+async def _lock_balances(
+    session: AsyncSession, pairs: list[tuple[int, str]]
+) -> dict[tuple[int, str], m.PlayerWalletBalance]:
+    """Create missing rows, then lock all of them in (player_id, currency_key) order."""
+    await session.execute(
+        pg_insert(m.PlayerWalletBalance)
+        .values([{"player_id": pid, "currency_key": key, "amount": 0} for pid, key in pairs])
+        .on_conflict_do_nothing(index_elements=["player_id", "currency_key"])
+    )
+    rows = (
+        await session.execute(
+            select(m.PlayerWalletBalance)
+            .where(tuple_(m.PlayerWalletBalance.player_id, m.PlayerWalletBalance.currency_key).in_(pairs))
+            .order_by(m.PlayerWalletBalance.player_id, m.PlayerWalletBalance.currency_key)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+    ).scalars().all()
+    return {(int(r.player_id), str(r.currency_key)): r for r in rows}
+
+
+async def _lock_abyss_progress(session: AsyncSession, player_ids: list[int]) -> dict[int, m.AbyssProgress]:
+    rows = (
+        await session.execute(
+            select(m.AbyssProgress)
+            .where(m.AbyssProgress.player_id.in_(player_ids))
+            .order_by(m.AbyssProgress.player_id)
+            .with_for_update()
+        )
+    ).scalars().all()
+    return {int(r.player_id): r for r in rows}
+
+
+async def _existing_keys(session: AsyncSession, keys: list[tuple]) -> set[tuple]:
+    """Idempotency keys already claimed by earlier transactions (no locks, no writes)."""
+    cols = [getattr(m.EconomyLedgerKey, c) for c in _KEY_COLUMNS]
+    stmt = select(*cols).where(tuple_(*cols).in_(list(dict.fromkeys(keys))))
+    return {tuple(r) for r in (await session.execute(stmt)).all()}
+
+
+async def _insert_ledger(session: AsyncSession, moves: list[Movement]) -> Counter:
+    """One INSERT for all rows; idempotent duplicates are skipped. Returns keys actually written."""
+    idem = [mv.idempotency_key() for mv in moves if mv.source in IDEMPOTENT_SOURCES]
+    claimed = await _claim_keys(session, idem) if idem else Counter()
+    rows: list[Movement] = []
+    for mv in moves:
+        if mv.source in IDEMPOTENT_SOURCES:
+            if claimed[mv.idempotency_key()] <= 0:
+                continue
+            claimed[mv.idempotency_key()] -= 1
+        rows.append(mv)
+    if rows:
+        await session.execute(
+            pg_insert(m.EconomyLedger).values(
+                [{**dict(zip(_LEDGER_KEY_COLUMNS, mv.ledger_key())), "amount": mv.amount} for mv in rows]
+            )
+        )
+    return Counter(mv.ledger_key() for mv in rows)
+
+
+async def apply_tx(session: AsyncSession, tx: WalletTx) -> list[bool]:
+    """Apply all movements of ``tx`` at once; one flag per movement, like :func:`add` / :func:`spend`.
+
+    ``False`` marks an idempotent duplicate (ledger row already present, balance untouched).
+    Replayed movements are found first; the remaining debits are checked in order against
+    the locked balances before anything is written, so a replay returns ``False`` even when
+    the balance no longer covers it. :class:`InsufficientCurrency` leaves the ledger and
+    balances as they were.
+
+    Lock order is fixed for every caller: wallet rows by (player_id, currency_key), then
+    ``abyss_progress`` by player_id. Gold follows :func:`add_gold`: the ``Player`` row is
+    updated through the session, its lock is up to the caller (e.g. :func:`lock_player`).
+    """
+    moves = [(i, mv) for i, mv in enumerate(tx.movements) if mv.amount > 0]
+    applied = [mv.amount == 0 for mv in tx.movements]
+    if not moves:
+        return applied
+
+    pairs = sorted({(mv.player_id, mv.currency_key) for _, mv in moves if mv.currency_key != GOLD_KEY})
+    balances = await _lock_balances(session, pairs) if pairs else {}
+    player_ids = sorted(
+        {mv.player_id for _, mv in moves if mv.currency_key == GOLD_KEY or mv.currency_key in MIRROR_PLAYER_KEYS}
+    )
+    players = {pid: await session.get(m.Player, pid) for pid in player_ids}
+
+    def current(pid: int, key: str) -> int:
+        if key == GOLD_KEY:
+            player = players.get(pid)
+            return int(player.gold or 0) if player is not None else 0
+        return int(balances[(pid, key)].amount or 0)
+
+    idem = [mv.idempotency_key() for _, mv in moves if mv.source in IDEMPOTENT_SOURCES]
+    seen = await _existing_keys(session, idem) if idem else set()
+    running: dict[tuple[int, str], int] = {}
+    for _, mv in moves:
+        if mv.source in IDEMPOTENT_SOURCES:
+            key = mv.idempotency_key()
+            if key in seen:
+                continue
+            if None not in key:  # NULL refs never conflict in uq_economy_ledger_keys
+                seen.add(key)
+        k = (mv.player_id, mv.currency_key)
+        have = running.get(k, current(*k))
+        if mv.direction == "out" and have < mv.amount:
+            raise InsufficientCurrency(mv.currency_key, have, mv.amount)
+        running[k] = have + (mv.amount if mv.direction == "in" else -mv.amount)
+
+    written = await _insert_ledger(session, [mv for _, mv in moves])
+    deltas: dict[tuple[int, str], int] = {}
+    for i, mv in moves:
+        key = mv.ledger_key()
+        if written[key] <= 0:
+            continue
+        written[key] -= 1
+        applied[i] = True
+        k = (mv.player_id, mv.currency_key)
+        deltas[k] = deltas.get(k, 0) + (mv.amount if mv.direction == "in" else -mv.amount)
+
+    shard_players: list[int] = []
+    for (pid, key), delta in sorted(deltas.items()):
+        amount = current(pid, key) + delta
+        if key == GOLD_KEY:
+            if players.get(pid) is not None:
+                players[pid].gold = amount
+            continue
+        balances[(pid, key)].amount = amount
+        if key in MIRROR_PLAYER_KEYS and players.get(pid) is not None:
+            players[pid].enchant_dust = amount
+        elif key in MIRROR_ABYSS_KEYS:
+            shard_players.append(pid)
+    if shard_players:
+        progress = await _lock_abyss_progress(session, shard_players)
+        for pid in shard_players:
+            if pid in progress:
+                progress[pid].abyss_shards = int(balances[(pid, "abyss_shards")].amount)
+    return applied
@@ -15,6 +15,8 @@ from waifu_bot.services.bot_handlers import router as bot_router
 from waifu_bot.services.command_debug_dm import CommandDebugDmMiddleware
 from waifu_bot.services.llm_usage_telegram import LlmUsageTelegramMiddleware
 from waifu_bot.services.player_activity import PlayerTelegramActivityMiddleware
+from waifu_bot.services.query_budget_telegram import QueryBudgetHandlerMiddleware, QueryBudgetUpdateMiddleware
+from waifu_bot.services.telegram_ingress import note_handler_error
 from waifu_bot.services.telegram_trace import TelegramUpdateTraceMiddleware, trace_enabled
 
 logger = logging.getLogger(__name__)
@@ -51,17 +53,24 @@ def _build_bot() -> Bot:
 _bot = _build_bot()
 _dp = Dispatcher()
 _dp.include_router(bot_router)
+if settings.query_accounting_enabled:
+    # Outermost: the update budget also counts queries of the middlewares below.
+    _dp.update.outer_middleware(QueryBudgetUpdateMiddleware())
 _dp.update.outer_middleware(LlmUsageTelegramMiddleware())
 _dp.update.outer_middleware(PlayerTelegramActivityMiddleware())
 _dp.update.outer_middleware(TelegramUpdateTraceMiddleware())
 # До хендлеров: эхо команд в ЛС (если TELEGRAM_COMMAND_DEBUG_DM=true)
 _dp.message.middleware(CommandDebugDmMiddleware())
+if settings.query_accounting_enabled:
+    _dp.message.middleware(QueryBudgetHandlerMiddleware())
+    _dp.callback_query.middleware(QueryBudgetHandlerMiddleware())
 
 
 @_dp.errors()
 async def _telegram_error_handler(event: ErrorEvent) -> None:
     """Логируем падения хендлеров; в группе частая причина — нет права отвечать."""
     uid = getattr(event.update, "update_id", None)
+    note_handler_error(event.exception)
     tb = "".join(
         traceback.format_exception(
             type(event.exception),
@@ -123,7 +132,8 @@ async def log_bot_identity() -> None:
         )
 
 
-async def process_update(payload: dict[str, Any]) -> None:
+async def process_update(payload: dict[str, Any]) -> bool:
+    """Feed one raw update to the dispatcher. False when it could not be parsed or processing crashed."""
     if trace_enabled():
         logger.info(
             "telegram.webhook raw update_id=%s has_message=%s",
@@ -134,12 +144,14 @@ async def process_update(payload: dict[str, Any]) -> None:
         update = Update.model_validate(payload)
     except Exception:
         logger.exception("Failed to parse update payload_keys=%s", list((payload or {}).keys()))
-        return
+        return False
 
     try:
         await _dp.feed_update(bot=_bot, update=update)
     except Exception:
         logger.exception("Failed to process update update_id=%s", getattr(update, "update_id", None))
+        return False
+    return True
 
 
 _polling_task: "asyncio.Task[None] | None" = None
@@ -2230,6 +2230,19 @@ let sseReconnectTimer = null;
 let sseBackoffMs = 1000;
 let sseConnectGeneration = 0;
 const SSE_BACKOFF_MAX = 15000;
+/** Battle SSE v2: последний применённый seq и состояние HP, собранное из delta/key событий. */
+const BATTLE_SSE_STATE_FIELDS = [
+  "dungeon_id",
+  "position",
+  "monster_position",
+  "monster_hp",
+  "monster_max_hp",
+  "waifu_current_hp",
+  "waifu_max_hp",
+];
+let battleSseSeq = 0;
+let battleSseState = {};
+let battleSseResumeTimer = null;
 let dungeonPlusStatusById = {};
 /** Выбранная сложность (+N) отдельно для каждого подземелья (id → уровень). */
 let selectedPlusLevelByDungeonId = {};
@@ -2267,20 +2280,36 @@ function connectSSE() {
   const params = new URLSearchParams();
   if (initData) params.set("initData", initData);
   if (desktopSession) params.set("desktopSession", desktopSession);
+  params.set("proto", "2");
+  const resumeFrom = battleSseSeq;
+  if (resumeFrom > 0) params.set("lastEventId", String(resumeFrom));
   const url = `${API_BASE}/sse/stream?${params.toString()}`;
   sse = new EventSource(url);
   sse.onopen = () => {
     if (gen !== sseConnectGeneration) return;
     sseBackoffMs = 1000;
-    if (typeof window.WaifuApp?.onSseResumed === "function") {
-      window.WaifuApp.onSseResumed();
+    clearTimeout(battleSseResumeTimer);
+    if (resumeFrom > 0) {
+      // Сервер дошлёт пропущенные дельты и battle_resume; без ответа — полный рефетч.
+      battleSseResumeTimer = setTimeout(() => notifySseResumed({ replayed: false }), 1500);
+      return;
     }
+    notifySseResumed({ replayed: false });
   };
   sse.onmessage = (ev) => {
     const data = ev?.data;
     if (typeof data === "string") {
       try {
-        const obj = JSON.parse(data);
+        let obj = JSON.parse(data);
+        if (obj && obj.type === "battle_resume") {
+          clearTimeout(battleSseResumeTimer);
+          notifySseResumed({ replayed: obj.ok === true });
+          return;
+        }
+        if (obj && obj.type === "battle" && obj.v === 2) {
+          obj = reconcileBattleSseEvent(obj);
+          if (!obj) return;
+        }
         if (obj && typeof window.WaifuApp?.onSseEvent === "function") {
           window.WaifuApp.onSseEvent(obj);
           return;
@@ -2310,6 +2339,35 @@ function connectSSE() {
   };
 }
 
+function notifySseResumed(info) {
+  if (typeof window.WaifuApp?.onSseResumed === "function") {
+    window.WaifuApp.onSseResumed(info);
+  }
+}
+
+/**
+ * Battle SSE v2 → классический payload {type:"battle", payload:{...полное состояние}}.
+ * key — заменяет состояние; delta — только изменившиеся поля. Пропуск seq → дельта
+ * применяется (значения абсолютные), но остальное состояние подтягивается рефетчем.
+ */
+function reconcileBattleSseEvent(evt) {
+  const seq = Number(evt.seq) || 0;
+  const payload = evt.payload || {};
+  const isKey = evt.kind === "key";
+  if (!isKey && seq > 0 && seq <= battleSseSeq) return null;
+  if (isKey) {
+    battleSseState = {};
+  } else if (battleSseSeq > 0 && seq !== battleSseSeq + 1) {
+    window.WaifuApp._scheduleSseRefetch?.();
+  }
+  for (const f of BATTLE_SSE_STATE_FIELDS) {
+    if (payload[f] != null) battleSseState[f] = payload[f];
+  }
+  battleSseSeq = seq;
+  if (evt.resync) window.WaifuApp._scheduleSseRefetch?.();
+  return { type: "battle", seq, payload: { ...battleSseState, ...payload } };
+}
+
 function ensureSseConnected() {
   if (!sse || sse.readyState === EventSource.CLOSED) connectSSE();
 }
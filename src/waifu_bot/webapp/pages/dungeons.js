@@ -1238,8 +1238,9 @@ async function populateDungeonsPage(profile) {
     if (typeof invalidateActiveDungeonCache === "function") invalidateActiveDungeonCache();
     if (soloCombatIsVisible()) fetchSoloCombatHp({ flash: false }).catch(() => {});
   };
-  window.WaifuApp.onSseResumed = () => {
-    fetchSoloCombatHp({ flash: false }).catch(() => {});
+  window.WaifuApp.onSseResumed = (info) => {
+    // Пропущенные дельты уже доиграны сервером (Last-Event-ID) — рефетч не нужен.
+    if (!info?.replayed) fetchSoloCombatHp({ flash: false }).catch(() => {});
     startSoloHpSafetyPoll();
   };
   window.WaifuApp.onSseDisconnected = () => startSoloHpSafetyPoll();
@@ -9,22 +9,31 @@ from waifu_bot.worker.asyncio_bridge import run_async
 def _run_tick(name: str, coro_fn) -> None:
     from waifu_bot.services.background_lock import try_acquire_background_tick
     from waifu_bot.services.background_ticks import get_background_tick_registry
+    from waifu_bot.services.query_budget import run_in_scope
 
     lock_ttl: int | None = None
+    calendar_spec = None
     for spec in get_background_tick_registry():
         if spec.name == name:
             lock_ttl = spec.lock_ttl_sec
+            if spec.is_calendar:
+                calendar_spec = spec
             break
-    if lock_ttl is not None:
+    if calendar_spec is not None:
+        # Ledger claim (scheduled_job_runs) is the exactly-once guard; no Redis lock needed.
+        from waifu_bot.services.calendar_scheduler import run_scheduled_tick
+
+        run_async(run_scheduled_tick(calendar_spec))
+    elif lock_ttl is not None:
 
         async def _with_lock() -> None:
             if not await try_acquire_background_tick(name, lock_ttl):
                 return
-            await coro_fn()
+            await run_in_scope(f"tick:{name}", coro_fn)
 
         run_async(_with_lock())
     else:
-        run_async(coro_fn())
+        run_async(run_in_scope(f"tick:{name}", coro_fn))
 
 
 @dramatiq.actor(queue_name="default", actor_name="tick_chat_rewards_flush", max_retries=1, time_limit=600_000)
@@ -34,6 +43,13 @@ def tick_chat_rewards_flush() -> None:
     _run_tick("chat_rewards_flush", _chat_rewards_flush_fn)
 
 
+@dramatiq.actor(queue_name="default", actor_name="tick_codex_flush", max_retries=1, time_limit=600_000)
+def tick_codex_flush() -> None:
+    from waifu_bot.services.background import _codex_flush_fn
+
+    _run_tick("codex_flush", _codex_flush_fn)
+
+
 @dramatiq.actor(queue_name="default", actor_name="tick_delve_grant", max_retries=1, time_limit=600_000)
 def tick_delve_grant() -> None:
     from waifu_bot.services.background import _delve_grant_fn
@@ -152,10 +168,62 @@ def tick_chat_rewards_daily_claim() -> None:
     _run_tick("chat_rewards_daily_claim", _chat_rewards_daily_claim_fn)
 
 
+@dramatiq.actor(queue_name="default", actor_name="tick_guild_quest_ballot_autopick", max_retries=1, time_limit=600_000)
+def tick_guild_quest_ballot_autopick() -> None:
+    from waifu_bot.services.background import _guild_quest_ballot_autopick_fn
+
+    _run_tick("guild_quest_ballot_autopick", _guild_quest_ballot_autopick_fn)
+
+
+@dramatiq.actor(queue_name="default", actor_name="tick_chat_activity_drain", max_retries=1, time_limit=600_000)
+def tick_chat_activity_drain() -> None:
+    from waifu_bot.services.background import _chat_activity_drain_fn
+
+    _run_tick("chat_activity_drain", _chat_activity_drain_fn)
+
+
+@dramatiq.actor(queue_name="default", actor_name="tick_guild_quest_flush", max_retries=1, time_limit=600_000)
+def tick_guild_quest_flush() -> None:
+    from waifu_bot.services.background import _guild_quest_flush_fn
+
+    _run_tick("guild_quest_flush", _guild_quest_flush_fn)
+
+
+@dramatiq.actor(queue_name="default", actor_name="tick_llm_usage_flush", max_retries=1, time_limit=600_000)
+def tick_llm_usage_flush() -> None:
+    from waifu_bot.services.background import _llm_usage_flush_fn
+
+    _run_tick("llm_usage_flush", _llm_usage_flush_fn)
+
+
+@dramatiq.actor(queue_name="default", actor_name="tick_llm_usage_retention", max_retries=1, time_limit=600_000)
+def tick_llm_usage_retention() -> None:
+    from waifu_bot.services.background import _llm_usage_retention_fn
+
+    _run_tick("llm_usage_retention", _llm_usage_retention_fn)
+
+
+@dramatiq.actor(queue_name="default", actor_name="tick_history_partitions", max_retries=1, time_limit=1_800_000)
+def tick_history_partitions() -> None:
+    from waifu_bot.services.background import _history_partitions_fn
+
+    _run_tick("history_partitions", _history_partitions_fn)
+
+
+@dramatiq.actor(queue_name="default", actor_name="tick_maintenance_jobs", max_retries=1, time_limit=600_000)
+def tick_maintenance_jobs() -> None:
+    from waifu_bot.services.background import _maintenance_jobs_fn
+
+    _run_tick("maintenance_jobs", _maintenance_jobs_fn)
+
+
 TICK_ACTORS: dict[str, dramatiq.Actor] = {
+    "chat_activity_drain": tick_chat_activity_drain,
     "chat_rewards_flush": tick_chat_rewards_flush,
+    "codex_flush": tick_codex_flush,
     "delve_grant": tick_delve_grant,
     "gd_daily_finalize": tick_gd_daily_finalize,
+    "guild_quest_flush": tick_guild_quest_flush,
     "guild_tick": tick_guild_tick,
     "guild_war_hourly": tick_guild_war_hourly,
     "guild_war_narrative": tick_guild_war_narrative,
@@ -164,6 +232,11 @@ TICK_ACTORS: dict[str, dramatiq.Actor] = {
     "challenge_day": tick_challenge_day,
     "abyss_weekly_reset": tick_abyss_weekly_reset,
     "guild_quest_daily_reset": tick_guild_quest_daily_reset,
+    "guild_quest_ballot_autopick": tick_guild_quest_ballot_autopick,
     "guild_quest_weekly_reset": tick_guild_quest_weekly_reset,
     "chat_rewards_daily_claim": tick_chat_rewards_daily_claim,
+    "llm_usage_flush": tick_llm_usage_flush,
+    "llm_usage_retention": tick_llm_usage_retention,
+    "history_partitions": tick_history_partitions,
+    "maintenance_jobs": tick_maintenance_jobs,
 }
@@ -5,9 +5,8 @@ import logging
 from typing import Any
 
 import dramatiq
-import httpx
 
-from waifu_bot.worker.asyncio_bridge import run_async
+from waifu_bot.worker.asyncio_bridge import run_async, shared_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -39,15 +38,14 @@ def llm_post_chat_completions_task(
         chain = provider_chain_for_request(use_image_model=use_image_model)
         if not chain:
             raise RuntimeError("no LLM provider configured")
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            r = await _post_chat_completions_locked(
-                client,
-                payload,
-                caller=caller,
-                use_image_model=use_image_model,
-                fallback_set=set(FALLBACK_HTTP_STATUSES),
-                chain=chain,
-            )
+        r = await _post_chat_completions_locked(
+            shared_http_client(),
+            payload,
+            caller=caller,
+            use_image_model=use_image_model,
+            fallback_set=set(FALLBACK_HTTP_STATUSES),
+            chain=chain,
+        )
         return {
             "status_code": r.status_code,
             "content": r.content,
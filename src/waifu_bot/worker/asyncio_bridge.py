@@ -1,12 +1,168 @@
-"""Run async tick/LLM coroutines from sync Dramatiq actors."""
+"""Run async tick/LLM coroutines from sync Dramatiq actors.
+
+All actor threads of a worker process submit into one long-lived event loop (own daemon
+thread) via ``run_coroutine_threadsafe``. The SQLAlchemy engine, Redis client, LLM
+semaphores and the shared httpx client are created lazily on that loop and reused across
+messages, instead of being bound to a throwaway ``asyncio.run`` loop per message.
+Started/stopped by ``AsyncioBridgeMiddleware`` (see broker.py).
+"""
 from __future__ import annotations
 
 import asyncio
-from collections.abc import Awaitable, Coroutine
+import logging
+import threading
+from collections.abc import Coroutine
 from typing import Any, TypeVar
 
+import dramatiq
+import httpx
+
+logger = logging.getLogger(__name__)
+
 T = TypeVar("T")
 
+# Shared httpx pool for LLM actors (per bridge loop).
+HTTP_TIMEOUT_SEC = 120.0
+HTTP_MAX_CONNECTIONS = 20
+SHUTDOWN_TIMEOUT_SEC = 15.0
+
+
+class EventLoopBridge:
+    """Event loop in a daemon thread; sync callers block on submitted coroutines."""
+
+    def __init__(self, name: str = "asyncio-bridge") -> None:
+        self._name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+        self._http: httpx.AsyncClient | None = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop | None:
+        return self._loop
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._started.clear()
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+        self._started.wait()
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._started.set()
+        try:
+            loop.run_forever()
+        finally:
+            try:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            finally:
+                loop.close()
+
+    def submit(self, coro: Coroutine[Any, Any, T], *, timeout: float | None = None) -> T:
+        """Run ``coro`` on the bridge loop and block the calling thread for its result."""
+        if not self.running:
+            self.start()
+        loop = self._loop
+        assert loop is not None
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("run_async called from the bridge loop thread (would deadlock)")
+        fut = asyncio.run_coroutine_threadsafe(coro, loop)
+        try:
+            return fut.result(timeout)
+        except BaseException:
+            # Timeout / actor time_limit interrupt: do not leave the coroutine running.
+            fut.cancel()
+            raise
+
+    def http_client(self) -> httpx.AsyncClient:
+        """Shared httpx client; call only from coroutines running on the bridge loop."""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=HTTP_TIMEOUT_SEC,
+                limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS),
+            )
+        return self._http
+
+    async def _close_resources(self) -> None:
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+        await close_loop_bound_resources()
+
+    def stop(self) -> None:
+        """Close pools on the loop, then stop and join the loop thread."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None or thread is None or not thread.is_alive():
+                self._loop = None
+                self._thread = None
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._close_resources(), loop).result(
+                    SHUTDOWN_TIMEOUT_SEC
+                )
+            except Exception:
+                logger.exception("asyncio bridge: resource shutdown failed")
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(SHUTDOWN_TIMEOUT_SEC)
+            self._loop = None
+            self._thread = None
+
+
+async def close_loop_bound_resources() -> None:
+    """Dispose the async engine and Redis client so a later loop re-creates them."""
+    from waifu_bot.core import redis as redis_core
+    from waifu_bot.db import session as db_session
+    from waifu_bot.services import llm_client
+
+    if db_session.engine is not None:
+        try:
+            await db_session.engine.dispose()
+        except Exception:
+            logger.exception("asyncio bridge: engine dispose failed")
+        db_session.engine = None
+        db_session.SessionLocal = None
+    if redis_core._redis is not None:
+        try:
+            await redis_core._redis.aclose()
+        except Exception:
+            logger.exception("asyncio bridge: redis close failed")
+        redis_core._redis = None
+    llm_client._llm_sem = None
+    llm_client._fusion_sem = None
+
+
+_bridge = EventLoopBridge()
+
+
+def get_bridge() -> EventLoopBridge:
+    return _bridge
+
+
+def run_async(coro: Coroutine[Any, Any, T], *, timeout: float | None = None) -> T:
+    return _bridge.submit(coro, timeout=timeout)
+
+
+def shared_http_client() -> httpx.AsyncClient:
+    return _bridge.http_client()
+
+
+class AsyncioBridgeMiddleware(dramatiq.Middleware):
+    """Start the bridge loop with the worker and close pools before it shuts down."""
+
+    def after_worker_boot(self, broker: Any, worker: Any) -> None:
+        _bridge.start()
 
-def run_async(coro: Coroutine[Any, Any, T]) -> T:
-    return asyncio.run(coro)
+    def before_worker_shutdown(self, broker: Any, worker: Any) -> None:
+        _bridge.stop()
@@ -9,10 +9,12 @@ from dramatiq.results.backends import RedisBackend
 
 def configure_broker() -> RedisBroker:
     from waifu_bot.core.config import settings
+    from waifu_bot.worker.asyncio_bridge import AsyncioBridgeMiddleware
 
     result_backend = RedisBackend(url=settings.redis_url)
     broker = RedisBroker(url=settings.redis_url)
     broker.add_middleware(Results(backend=result_backend))
+    broker.add_middleware(AsyncioBridgeMiddleware())
     dramatiq.set_broker(broker)
     return broker
 
@@ -1,4 +1,4 @@
-"""Enqueue Dramatiq tick actors on interval (BACKGROUND_MODE=worker|dual)."""
+"""Enqueue Dramatiq tick actors on interval or MSK calendar slot (BACKGROUND_MODE=worker|dual)."""
 from __future__ import annotations
 
 import asyncio
@@ -25,6 +25,27 @@ async def _poll_spec(name: str, interval_sec: float, skip_in_dev: bool) -> None:
             logger.exception("scheduler enqueue failed tick=%s", name)
 
 
+async def _calendar_spec(spec) -> None:
+    """Enqueue once at start (catch-up), then at each MSK slot; the actor claims the slot."""
+    from waifu_bot.core.config import settings
+    from waifu_bot.services.calendar_scheduler import MskCron, seconds_until_next
+    from waifu_bot.worker.actors.gameplay import TICK_ACTORS
+
+    actor = TICK_ACTORS.get(spec.name)
+    if actor is None:
+        logger.warning("scheduler: no actor for tick %s", spec.name)
+        return
+    cron = MskCron.parse(spec.schedule)
+    while True:
+        if not (spec.skip_in_dev and settings.environment in ("dev", "testing")):
+            try:
+                actor.send()
+            except Exception:
+                logger.exception("scheduler enqueue failed tick=%s", spec.name)
+        delay = seconds_until_next(cron, jitter_sec=spec.jitter_sec)
+        await asyncio.sleep(min(delay, float(spec.interval_sec)))
+
+
 async def run_scheduler() -> None:
     from waifu_bot.core.config import settings
     from waifu_bot.services.background_ticks import get_background_tick_registry
@@ -41,7 +62,9 @@ async def run_scheduler() -> None:
     logger.info("Starting background scheduler (%d ticks, mode=%s)", len(registry), mode)
     await asyncio.gather(
         *[
-            _poll_spec(spec.name, spec.interval_sec, spec.skip_in_dev)
+            _calendar_spec(spec)
+            if spec.is_calendar
+            else _poll_spec(spec.name, spec.interval_sec, spec.skip_in_dev)
             for spec in registry
         ]
     )
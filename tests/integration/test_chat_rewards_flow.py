@@ -13,84 +13,7 @@ from waifu_bot.services.chat_rewards import (
     compute_chat_points,
     try_award_chat_message,
 )
-
-
-class FakeRedis:
-    def __init__(self):
-        self.store: dict[str, dict[str, int] | set] = {}
-        self.strings: dict[str, str] = {}
-
-    async def set(self, key, value, nx=False, ex=None):
-        if nx and key in self.strings:
-            return False
-        self.strings[key] = str(value)
-        return True
-
-    async def get(self, key):
-        return self.strings.get(key)
-
-    async def hincrby(self, key, field, amount):
-        h = self.store.setdefault(key, {})
-        if not isinstance(h, dict):
-            h = {}
-            self.store[key] = h
-        h[field] = int(h.get(field, 0)) + int(amount)
-        return h[field]
-
-    async def hgetall(self, key):
-        raw = self.store.get(key, {})
-        if not isinstance(raw, dict):
-            return {}
-        return {k: str(v) for k, v in raw.items()}
-
-    async def expire(self, key, ttl):
-        return True
-
-    async def incrby(self, key, amount):
-        self.strings[key] = str(int(self.strings.get(key, 0) or 0) + int(amount))
-        return int(self.strings[key])
-
-    async def sadd(self, key, member):
-        s = self.store.get(key)
-        if not isinstance(s, set):
-            s = set()
-            self.store[key] = s
-        s.add(str(member))
-        return 1
-
-    async def scard(self, key):
-        s = self.store.get(key, set())
-        return len(s) if isinstance(s, set) else 0
-
-    def pipeline(self):
-        redis = self
-        ops: list[tuple[str, tuple]] = []
-
-        class Pipe:
-            async def execute(self):
-                for name, args in ops:
-                    fn = getattr(redis, name)
-                    await fn(*args)
-                return []
-
-            def hincrby(self, key, field, amount):
-                ops.append(("hincrby", (key, field, amount)))
-                return self
-
-            def incrby(self, key, amount):
-                ops.append(("incrby", (key, amount)))
-                return self
-
-            def expire(self, key, ttl):
-                ops.append(("expire", (key, ttl)))
-                return self
-
-        return Pipe()
-
-    async def delete(self, key):
-        self.store.pop(key, None)
-        self.strings.pop(key, None)
-        return 1
+from tests.unit.fake_redis import FakeRedis
 
 
 @pytest.mark.asyncio
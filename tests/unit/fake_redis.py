@@ -0,0 +1,670 @@
+"""In-memory Redis for unit tests, including the Lua scripts in ``services/redis_scripts.py``.
+
+There is no Lua runtime in the test environment, so ``evalsha`` / ``eval`` dispatch to a
+Python mirror of each registered script (``SCRIPT_MIRRORS``, same KEYS/ARGV/reply shape).
+Mirrors run without awaiting anything that yields, so they are atomic like real scripts.
+``evalsha`` raises ``NoScriptError`` until the script was loaded by ``eval`` /
+``script_load`` — exactly the reload path ``run_script`` takes after a Redis restart.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import time
+from typing import Any, Awaitable, Callable
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import NoScriptError, ResponseError
+
+from waifu_bot.services import redis_scripts
+
+
+class _Pipe:
+    def __init__(self, redis: "FakeRedis") -> None:
+        self._r = redis
+        self._calls: list = []
+
+    def __getattr__(self, name):
+        def _queue(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            return self
+
+        return _queue
+
+    async def execute(self):
+        # One client round trip, however many commands were queued.
+        mark = len(self._r.commands)
+        out = [await getattr(self._r, name)(*args, **kwargs) for name, args, kwargs in self._calls]
+        del self._r.commands[mark:]
+        self._r._log("pipeline")
+        self._calls.clear()
+        return out
+
+
+class FakeRedis:
+    def __init__(self, *, fail: bool = False) -> None:
+        # fail=True: every command raises ConnectionError (Redis down → fallback paths).
+        self.fail = fail
+        self.strings: dict[str, str] = {}
+        self.hashes: dict[str, dict[str, str]] = {}
+        self.lists: dict[str, list[str]] = {}
+        self.sets: dict[str, set[str]] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+        self.streams: dict[str, list[tuple[str, dict[str, str]]]] = {}
+        # (stream, group) -> {"last": last delivered id, "pending": {id: [consumer, deliveries, delivered_ms]}}
+        self.groups: dict[tuple[str, str], dict[str, Any]] = {}
+        self._stream_seq = 0
+        self.ttls: dict[str, int] = {}
+        self.loaded_scripts: set[str] = set()
+        self.commands: list[str] = []
+        self.published: list[tuple[str, str]] = []
+
+    def _log(self, name: str) -> None:
+        if self.fail:
+            raise RedisConnectionError("down")
+        self.commands.append(name)
+
+    def pipeline(self, transaction: bool = True):
+        if self.fail:
+            raise RedisConnectionError("down")
+        return _Pipe(self)
+
+    # --- keys ---
+
+    def _stores(self):
+        return (self.strings, self.hashes, self.lists, self.sets, self.zsets, self.streams)
+
+    async def exists(self, *keys: str) -> int:
+        self._log("exists")
+        return sum(1 for k in keys if any(k in s for s in self._stores()))
+
+    async def delete(self, *keys: str) -> int:
+        self._log("delete")
+        n = 0
+        for k in keys:
+            for store in self._stores():
+                if k in store:
+                    del store[k]
+                    n += 1
+            self.ttls.pop(k, None)
+        return n
+
+    async def renamenx(self, src: str, dst: str) -> int:
+        self._log("renamenx")
+        store = next((s for s in self._stores() if src in s), None)
+        if store is None:
+            raise ResponseError("ERR no such key")
+        if any(dst in s for s in self._stores()):
+            return 0
+        store[dst] = store.pop(src)
+        return 1
+
+    async def expire(self, key: str, ttl: int) -> bool:
+        self._log("expire")
+        self.ttls[key] = int(ttl)
+        return True
+
+    async def scan_iter(self, match: str = "*"):
+        self._log("scan")
+        for store in self._stores():
+            for k in list(store):
+                if fnmatch.fnmatchcase(k, match):
+                    yield k
+
+    # --- strings ---
+
+    async def get(self, key: str) -> str | None:
+        self._log("get")
+        return self.strings.get(key)
+
+    async def mget(self, keys: Any, *args: Any) -> list[str | None]:
+        self._log("mget")
+        names = [*keys, *args] if isinstance(keys, (list, tuple)) else [keys, *args]
+        return [self.strings.get(k) for k in names]
+
+    async def set(self, key: str, value: Any, nx: bool = False, ex: int | None = None) -> bool | None:
+        self._log("set")
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = str(value)
+        if ex is not None:
+            self.ttls[key] = int(ex)
+        return True
+
+    async def incrby(self, key: str, amount: int = 1) -> int:
+        self._log("incrby")
+        self.strings[key] = str(int(self.strings.get(key, "0")) + int(amount))
+        return int(self.strings[key])
+
+    async def incr(self, key: str) -> int:
+        return await self.incrby(key, 1)
+
+    # --- hashes ---
+
+    async def hget(self, key: str, field: Any) -> str | None:
+        self._log("hget")
+        return self.hashes.get(key, {}).get(str(field))
+
+    async def hincrby(self, key: str, field: Any, amount: int = 1) -> int:
+        self._log("hincrby")
+        h = self.hashes.setdefault(key, {})
+        h[str(field)] = str(int(h.get(str(field), "0")) + int(amount))
+        return int(h[str(field)])
+
+    async def hset(self, key: str, field: Any = None, value: Any = None, mapping: dict | None = None) -> int:
+        self._log("hset")
+        h = self.hashes.setdefault(key, {})
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        added = sum(1 for f in items if str(f) not in h)
+        h.update({str(f): str(v) for f, v in items.items()})
+        return added
+
+    async def hmget(self, key: str, keys: Any, *args: Any) -> list[str | None]:
+        self._log("hmget")
+        fields = [*keys, *args] if isinstance(keys, (list, tuple)) else [keys, *args]
+        h = self.hashes.get(key, {})
+        return [h.get(str(f)) for f in fields]
+
+    async def hdel(self, key: str, *fields: Any) -> int:
+        self._log("hdel")
+        h = self.hashes.get(key, {})
+        n = sum(1 for f in fields if h.pop(str(f), None) is not None)
+        if key in self.hashes and not h:
+            del self.hashes[key]
+        return n
+
+    async def hsetnx(self, key: str, field: Any, value: Any) -> int:
+        self._log("hsetnx")
+        h = self.hashes.setdefault(key, {})
+        if str(field) in h:
+            return 0
+        h[str(field)] = str(value)
+        return 1
+
+    async def hgetall(self, key: str) -> dict[str, str]:
+        self._log("hgetall")
+        return dict(self.hashes.get(key, {}))
+
+    # --- lists ---
+
+    async def llen(self, key: str) -> int:
+        self._log("llen")
+        return len(self.lists.get(key, []))
+
+    async def rpush(self, key: str, *values: Any) -> int:
+        self._log("rpush")
+        self.lists.setdefault(key, []).extend(str(v) for v in values)
+        return len(self.lists[key])
+
+    async def lpush(self, key: str, *values: Any) -> int:
+        self._log("lpush")
+        lst = self.lists.setdefault(key, [])
+        for v in values:
+            lst.insert(0, str(v))
+        return len(lst)
+
+    async def lrange(self, key: str, start: int, end: int) -> list[str]:
+        self._log("lrange")
+        return _slice(self.lists.get(key, []), start, end)
+
+    async def lrem(self, key: str, count: int, value: Any) -> int:
+        self._log("lrem")
+        before = self.lists.get(key, [])
+        self.lists[key] = [x for x in before if x != str(value)]
+        return len(before) - len(self.lists[key])
+
+    async def ltrim(self, key: str, start: int, end: int) -> bool:
+        self._log("ltrim")
+        self.lists[key] = _slice(self.lists.get(key, []), start, end)
+        if not self.lists[key]:
+            del self.lists[key]
+        return True
+
+    # --- sets ---
+
+    async def sadd(self, key: str, *members: Any) -> int:
+        self._log("sadd")
+        s = self.sets.setdefault(key, set())
+        before = len(s)
+        s.update(str(m) for m in members)
+        return len(s) - before
+
+    async def scard(self, key: str) -> int:
+        self._log("scard")
+        return len(self.sets.get(key, set()))
+
+    async def srem(self, key: str, *members: Any) -> int:
+        self._log("srem")
+        s = self.sets.get(key, set())
+        n = sum(1 for m in members if str(m) in s)
+        s.difference_update(str(m) for m in members)
+        if key in self.sets and not s:
+            del self.sets[key]
+        return n
+
+    async def spop(self, key: str, count: int | None = None) -> Any:
+        self._log("spop")
+        s = self.sets.get(key, set())
+        popped = [s.pop() for _ in range(min(len(s), 1 if count is None else int(count)))]
+        if key in self.sets and not s:
+            del self.sets[key]
+        if count is None:
+            return popped[0] if popped else None
+        return popped
+
+    async def smembers(self, key: str) -> set[str]:
+        self._log("smembers")
+        return set(self.sets.get(key, set()))
+
+    # --- sorted sets ---
+
+    async def zadd(self, key: str, mapping: dict[str, float]) -> int:
+        self._log("zadd")
+        z = self.zsets.setdefault(key, {})
+        new = sum(1 for k in mapping if k not in z)
+        z.update({str(k): float(v) for k, v in mapping.items()})
+        return new
+
+    async def zrem(self, key: str, *members: str) -> int:
+        self._log("zrem")
+        z = self.zsets.get(key, {})
+        return sum(1 for m in members if z.pop(str(m), None) is not None)
+
+    async def zcard(self, key: str) -> int:
+        self._log("zcard")
+        return len(self.zsets.get(key, {}))
+
+    async def zrangebyscore(self, key, lo, hi, start=0, num=None, withscores=False):
+        self._log("zrangebyscore")
+        items = sorted((s, k) for k, s in self.zsets.get(key, {}).items() if float(lo) <= s <= float(hi))
+        items = items[start : None if num is None else start + num]
+        return [(k, s) for s, k in items] if withscores else [k for _, k in items]
+
+    async def zrevrangebyscore(self, key, hi, lo, start=0, num=None, withscores=False):
+        self._log("zrevrangebyscore")
+        items = sorted(
+            ((s, k) for k, s in self.zsets.get(key, {}).items() if float(lo) <= s <= float(hi)), reverse=True
+        )
+        items = items[start : None if num is None else start + num]
+        return [(k, s) for s, k in items] if withscores else [k for _, k in items]
+
+    # --- streams (ids are "<seq>-0"; idle time is not tracked, so XAUTOCLAIM claims all pending) ---
+
+    async def xadd(self, name: str, fields: dict, id: str = "*", maxlen: int | None = None, approximate: bool = True):
+        self._log("xadd")
+        self._stream_seq += 1
+        entry_id = f"{self._stream_seq}-0"
+        entries = self.streams.setdefault(name, [])
+        entries.append((entry_id, {str(k): str(v) for k, v in fields.items()}))
+        if maxlen is not None and len(entries) > int(maxlen):
+            del entries[: len(entries) - int(maxlen)]
+        return entry_id
+
+    async def xrange(self, name: str, min: str = "-", max: str = "+", count: int | None = None):
+        self._log("xrange")
+        lo = (0, 0) if min == "-" else _sid(min)
+        hi = None if max == "+" else _sid(max)
+        entries = [(i, dict(f)) for i, f in self.streams.get(name, []) if _sid(i) >= lo and (hi is None or _sid(i) <= hi)]
+        return entries[: count or None]
+
+    async def xdel(self, name: str, *ids: str) -> int:
+        self._log("xdel")
+        entries = self.streams.get(name, [])
+        keep = [(i, f) for i, f in entries if i not in ids]
+        self.streams[name] = keep
+        return len(entries) - len(keep)
+
+    async def xlen(self, name: str) -> int:
+        self._log("xlen")
+        return len(self.streams.get(name, []))
+
+    async def xgroup_create(self, name: str, groupname: str, id: str = "$", mkstream: bool = False) -> bool:
+        from redis.exceptions import ResponseError
+
+        self._log("xgroup_create")
+        if name not in self.streams:
+            if not mkstream:
+                raise ResponseError("ERR The XGROUP subcommand requires the key to exist.")
+            self.streams[name] = []
+        if (name, groupname) in self.groups:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+        last = self.streams[name][-1][0] if id == "$" and self.streams[name] else "0-0"
+        self.groups[(name, groupname)] = {"last": last, "pending": {}}
+        return True
+
+    async def xreadgroup(self, groupname: str, consumername: str, streams: dict, count=None, block=None, noack=False):
+        self._log("xreadgroup")
+        out = []
+        for name in streams:
+            group = self.groups[(name, groupname)]
+            last = _sid(group["last"])
+            batch = [(i, f) for i, f in self.streams.get(name, []) if _sid(i) > last][: count or None]
+            for i, _ in batch:
+                # [consumer, deliveries, delivered at (ms)]; tests age entries by editing the time.
+                group["pending"][i] = [consumername, 1, _now_ms()]
+            if batch:
+                group["last"] = batch[-1][0]
+                out.append([name, batch])
+        return out
+
+    async def xautoclaim(self, name, groupname, consumername, min_idle_time, start_id="0-0", count=None):
+        self._log("xautoclaim")
+        group = self.groups[(name, groupname)]
+        by_id = dict(self.streams.get(name, []))
+        claimed = []
+        now = _now_ms()
+        idle = [i for i in sorted(group["pending"], key=_sid) if now - group["pending"][i][2] >= int(min_idle_time)]
+        for i in idle[: count or None]:
+            if i in by_id:
+                group["pending"][i] = [consumername, group["pending"][i][1] + 1, now]
+                claimed.append((i, by_id[i]))
+        return ["0-0", claimed, []]
+
+    async def xpending(self, name: str, groupname: str) -> dict[str, Any]:
+        self._log("xpending")
+        pending = self.groups[(name, groupname)]["pending"]
+        per: dict[str, int] = {}
+        for consumer, _n, _t in pending.values():
+            per[consumer] = per.get(consumer, 0) + 1
+        ids = sorted(pending, key=_sid)
+        return {
+            "pending": len(pending),
+            "min": ids[0] if ids else None,
+            "max": ids[-1] if ids else None,
+            "consumers": [{"name": c, "pending": n} for c, n in per.items()],
+        }
+
+    async def xack(self, name: str, groupname: str, *ids: str) -> int:
+        self._log("xack")
+        pending = self.groups[(name, groupname)]["pending"]
+        return sum(1 for i in ids if pending.pop(i, None) is not None)
+
+    async def xinfo_groups(self, name: str) -> list[dict[str, Any]]:
+        self._log("xinfo_groups")
+        out = []
+        for (stream, group_name), group in self.groups.items():
+            if stream != name:
+                continue
+            last = _sid(group["last"])
+            lag = sum(1 for i, _ in self.streams.get(name, []) if _sid(i) > last)
+            out.append({"name": group_name, "pending": len(group["pending"]), "lag": lag})
+        return out
+
+    # --- pub/sub ---
+
+    async def publish(self, channel: str, message: Any) -> int:
+        self._log("publish")
+        self.published.append((channel, message))
+        return 1
+
+    # --- scripting ---
+
+    async def script_load(self, source: str) -> str:
+        self._log("script_load")
+        script = _by_source(source)
+        self.loaded_scripts.add(script.sha)
+        return script.sha
+
+    async def script_flush(self) -> bool:
+        self.loaded_scripts.clear()
+        return True
+
+    async def evalsha(self, sha: str, numkeys: int, *keys_and_args: Any) -> Any:
+        self._log("evalsha")
+        if sha not in self.loaded_scripts:
+            raise NoScriptError("NOSCRIPT No matching script. Please use EVAL.")
+        return await self._run(_by_sha(sha), numkeys, keys_and_args)
+
+    async def eval(self, source: str, numkeys: int, *keys_and_args: Any) -> Any:
+        self._log("eval")
+        script = _by_source(source)
+        self.loaded_scripts.add(script.sha)
+        return await self._run(script, numkeys, keys_and_args)
+
+    async def _run(self, script: redis_scripts.RedisScript, numkeys: int, keys_and_args: tuple) -> Any:
+        keys = [str(k) for k in keys_and_args[:numkeys]]
+        args = [str(a) for a in keys_and_args[numkeys:]]
+        # Commands issued by the script do not count as client round trips.
+        mark = len(self.commands)
+        try:
+            return await SCRIPT_MIRRORS[script.name](self, keys, args)
+        finally:
+            del self.commands[mark:]
+
+    def round_trips(self) -> int:
+        return len(self.commands)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _slice(items: list[str], start: int, end: int) -> list[str]:
+    """LRANGE / LTRIM index semantics (inclusive end, negative from the tail)."""
+    n = len(items)
+    start = max(0, start + n if start < 0 else start)
+    end = end + n if end < 0 else end
+    return list(items[start : end + 1])
+
+
+def _sid(entry_id: str) -> tuple[int, int]:
+    ms, _, seq = str(entry_id).partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _by_sha(sha: str) -> redis_scripts.RedisScript:
+    for script in redis_scripts.SCRIPTS.values():
+        if script.sha == sha:
+            return script
+    raise NoScriptError("NOSCRIPT unknown sha")
+
+
+def _by_source(source: str) -> redis_scripts.RedisScript:
+    for script in redis_scripts.SCRIPTS.values():
+        if script.source == source:
+            return script
+    raise AssertionError("eval of an unregistered script body")
+
+
+def _num(value: str | None) -> float | None:
+    try:
+        return float(value) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+# --- Python mirrors of the Lua bodies (keep in step with redis_scripts.py) ---
+
+
+async def _incr_expire(r: FakeRedis, keys: list[str], args: list[str]) -> int:
+    n = await r.incrby(keys[0], 1)
+    await r.expire(keys[0], int(args[0]))
+    return n
+
+
+async def _gd_phantom_append(r: FakeRedis, keys: list[str], args: list[str]) -> int:
+    if await r.llen(keys[0]) >= int(args[2]):
+        return 0
+    if int(_num(await r.hget(keys[1], args[0])) or 0) >= int(args[3]):
+        return 0
+    await r.rpush(keys[0], args[1])
+    await r.hincrby(keys[1], args[0], 1)
+    await r.expire(keys[0], int(args[4]))
+    await r.expire(keys[1], int(args[4]))
+    return 1
+
+
+async def _chat_reward_gate(r: FakeRedis, keys: list[str], args: list[str]) -> list[int]:
+    if not await r.set(keys[0], "1", nx=True, ex=int(args[0])):
+        return [0, 0, 0]
+    pts = int(_num(await r.get(keys[1])) or 0)
+    authors = 0
+    if len(keys) >= 3:
+        await r.sadd(keys[2], args[1])
+        await r.expire(keys[2], int(args[2]))
+        authors = await r.scard(keys[2])
+    return [1, pts, authors]
+
+
+async def _chat_reward_commit(r: FakeRedis, keys: list[str], args: list[str]) -> int:
+    used = int(args[0]) + int(_num(await r.get(keys[1])) or 0)
+    pts = int(args[2])
+    if pts <= 0 or used + pts > int(args[1]):
+        return 0
+    if int(args[3]) > 0:
+        await r.hincrby(keys[0], "gold", int(args[3]))
+    if int(args[4]) > 0:
+        await r.hincrby(keys[0], "exp", int(args[4]))
+    await r.hincrby(keys[0], "points", pts)
+    await r.hincrby(keys[0], "messages", 1)
+    await r.expire(keys[0], int(args[5]))
+    await r.incrby(keys[1], pts)
+    await r.expire(keys[1], int(args[5]))
+    return 1
+
+
+async def _chat_reward_drain(r: FakeRedis, keys: list[str], args: list[str]) -> list[str]:
+    data = await r.hgetall(keys[0])
+    await r.delete(keys[0], keys[1])
+    return [x for kv in data.items() for x in kv]
+
+
+async def _hoarder_day(r: FakeRedis, keys: list[str], args: list[str]) -> int:
+    if not await r.set(keys[0], "1", nx=True, ex=int(args[1])):
+        return 0
+    if await r.exists(keys[1]):
+        return 0
+    prev = _num(await r.get(keys[2])) or 0
+    if float(args[0]) <= prev:
+        return 0
+    await r.set(keys[2], args[0], ex=int(args[2]))
+    return 1
+
+
+async def _daily_streak(r: FakeRedis, keys: list[str], args: list[str]) -> int:
+    if not await r.set(keys[0], "1", nx=True, ex=int(args[2])):
+        return -1
+    last = await r.get(keys[1])
+    streak = int(_num(await r.get(keys[2])) or 0)
+    if last is None:
+        streak = 1
+    elif last == args[1]:
+        streak += 1
+    elif last < args[1]:
+        streak = 1
+    await r.set(keys[1], args[0], ex=int(args[3]))
+    await r.set(keys[2], streak, ex=int(args[3]))
+    return streak
+
+
+async def _activity_session(r: FakeRedis, keys: list[str], args: list[str]) -> int:
+    now = int(args[0])
+    last = _num(await r.get(keys[0]))
+    start = _num(await r.get(keys[1]))
+    finished = 0
+    if last is not None and start is not None and now - last > int(args[1]):
+        finished = int(last - start)
+        start = None
+    if start is None:
+        await r.set(keys[1], args[0], ex=int(args[2]))
+    await r.set(keys[0], args[0], ex=int(args[2]))
+    return finished
+
+
+async def _activity_modes_fill(r: FakeRedis, keys: list[str], args: list[str]) -> int:
+    version = await r.hget(keys[0], "_v") or ""
+    if version != args[0]:
+        return 0
+    await r.delete(keys[0])
+    await r.hset(keys[0], "_k", "1")
+    if version:
+        await r.hset(keys[0], "_v", version)
+    for i in range(2, len(args), 2):
+        await r.hset(keys[0], args[i], args[i + 1])
+    await r.expire(keys[0], int(args[1]))
+    return 1
+
+
+async def _raid_chat_fill(r: FakeRedis, keys: list[str], args: list[str]) -> int:
+    if (await r.get(keys[1]) or "") != args[0]:
+        return 0
+    await r.set(keys[0], args[1], ex=int(args[2]))
+    return 1
+
+
+async def _chat_activity_publish(r: FakeRedis, keys: list[str], args: list[str]) -> int:
+    if not await r.set(keys[0], "1", nx=True, ex=int(args[0])):
+        return 0
+    pairs = args[2:]
+    await r.xadd(keys[1], dict(zip(pairs[::2], pairs[1::2])), maxlen=int(args[1]))
+    return 1
+
+
+async def _telegram_update_enqueue(r: FakeRedis, keys: list[str], args: list[str]) -> int:
+    if not await r.set(keys[0], "1", nx=True, ex=int(args[0])):
+        return -1
+    pairs = args[2:]
+    await r.xadd(keys[1], dict(zip(pairs[::2], pairs[1::2])), maxlen=int(args[1]))
+    return await r.xlen(keys[1])
+
+
+async def _telegram_ingress_lease(r: FakeRedis, keys: list[str], args: list[str]) -> int:
+    cur = await r.get(keys[0])
+    if int(args[1]) == 0:
+        if cur == args[0]:
+            await r.delete(keys[0])
+        return 1
+    if cur == args[0]:
+        await r.expire(keys[0], int(args[1]))
+        return 1
+    if cur is not None:
+        return 0
+    await r.set(keys[0], args[0], ex=int(args[1]))
+    return 1
+
+
+async def _guild_quest_accumulate(r: FakeRedis, keys: list[str], args: list[str]) -> int:
+    delta = int(args[1])
+    crossed = 0
+    for i, acc in enumerate(keys[2:]):
+        qid, need = args[3 + 2 * i], int(args[4 + 2 * i] or 0)
+        total = await r.hincrby(acc, "_t", delta)
+        await r.hincrby(acc, args[0], delta)
+        await r.expire(acc, int(args[2]))
+        await r.sadd(keys[0], qid)
+        if need > 0 and total >= need and total - delta < need:
+            await r.sadd(keys[1], qid)
+            crossed += 1
+    return crossed
+
+
+async def _guild_quest_take(r: FakeRedis, keys: list[str], args: list[str]) -> list[Any]:
+    out: list[Any] = []
+    for qid, acc in zip(args, keys[2:]):
+        h = await r.hgetall(acc)
+        out.extend((qid, [x for kv in h.items() for x in kv]))
+        await r.delete(acc)
+        await r.srem(keys[0], qid)
+        await r.srem(keys[1], qid)
+    return out
+
+
+SCRIPT_MIRRORS: dict[str, Callable[[FakeRedis, list[str], list[str]], Awaitable[Any]]] = {
+    "incr_expire": _incr_expire,
+    "gd_phantom_append": _gd_phantom_append,
+    "chat_reward_gate": _chat_reward_gate,
+    "chat_reward_commit": _chat_reward_commit,
+    "chat_reward_drain": _chat_reward_drain,
+    "hoarder_day": _hoarder_day,
+    "daily_streak": _daily_streak,
+    "activity_session": _activity_session,
+    "activity_modes_fill": _activity_modes_fill,
+    "raid_chat_fill": _raid_chat_fill,
+    "chat_activity_publish": _chat_activity_publish,
+    "telegram_update_enqueue": _telegram_update_enqueue,
+    "telegram_ingress_lease": _telegram_ingress_lease,
+    "guild_quest_accumulate": _guild_quest_accumulate,
+    "guild_quest_take": _guild_quest_take,
+}
@@ -0,0 +1,143 @@
+"""Unit tests: in-memory Abyss catalog (pools, versioned reload) and floor pre-generation."""
+
+from __future__ import annotations
+
+import random
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from waifu_bot.db.models import AbyssProgress
+from waifu_bot.services import abyss_catalog as ac
+from waifu_bot.services import abyss_service as absvc
+
+CFG = {
+    "abyss_elite_chance_base": "1.0",
+    "abyss_elite_chance_max": "1.0",
+    "abyss_monsters_per_floor": "3",
+    "abyss_modifier_start_floor": "1",
+    "abyss_modifier_min_floor_gap": "1",
+    "abyss_modifier_max_floor_gap": "1",
+    "abyss_modifier_weight_echo": "0",
+    "abyss_pregen_floors": "4",
+}
+
+
+def _tmpl(i: int, family: str, *tags: str) -> ac.TemplateRow:
+    return ac.TemplateRow(
+        id=i, name=f"M{i}", family=family, slug=f"m{i}", emoji=None, tier=1, weight=100,
+        tags=frozenset({family, *tags}),
+    )
+
+
+def _affix(i: int, *, tier: int = 1, flag: str | None = None, allowed=(), forbidden=()) -> ac.AffixRow:
+    return ac.AffixRow(
+        id=i, name=f"A{i}", type="prefix", category="stat", affix_group=f"g{i}", tier=tier,
+        hp_mult=1.5, dmg_mult=None, gold_mult=None, exp_mult=None, behavior_flag=flag, behavior_params=None,
+        incompatible_with=(), allowed_families=frozenset(allowed), forbidden_families=frozenset(forbidden),
+    )
+
+
+def _catalog(version: str = "") -> ac.AbyssCatalog:
+    return ac.AbyssCatalog(
+        version=version,
+        templates=(_tmpl(1, "undead", "cave"), _tmpl(2, "beast", "forest"), _tmpl(3, "demon", "fortress")),
+        affixes=(
+            _affix(1),
+            _affix(2, tier=2),
+            _affix(3, tier=3, flag="ANTI_REGEN"),
+            _affix(4, allowed=("beast",)),
+            _affix(5, forbidden=("undead",)),
+        ),
+        bosses=(
+            ac.BossRow(10, "Страж", "undead", "guard", 500, 40, 100, "UNDYING",
+                       ac.normalize_boss_mechanics({"all_mechanics": True}), None, None),
+        ),
+    )
+
+
+def _progress(nonce: int = 1) -> AbyssProgress:
+    return AbyssProgress(
+        player_id=7, session_nonce=nonce, current_floor=0, max_floor_reached=99, last_modifier_floor=0,
+    )
+
+
+def test_catalog_pools_by_biome_and_depth():
+    cat = _catalog()
+    pool, weights = cat.biome_pool(["cave", "Undead"])
+    assert [t.id for t in pool] == [1] and weights == (100,)
+    assert cat.biome_pool(["sky"])[0] == cat.templates
+
+    assert [a.id for a in cat.eligible_affixes("undead", 1)] == [1]
+    assert [a.id for a in cat.eligible_affixes("beast", 2)] == [1, 2, 4, 5]
+    # Abyss-exclusive flags only unlock with tier 3 (deep floors).
+    assert [a.id for a in cat.eligible_affixes("demon", 3)] == [1, 2, 3, 5]
+    assert ac.max_affix_tier({}, 20) == 1 and ac.max_affix_tier({}, 21) == 2 and ac.max_affix_tier({}, 51) == 3
+
+    assert cat.boss_for_floor(10).name == "Страж" and cat.boss_for_floor(90).name == "Страж"
+    assert cat.boss_for_floor(10).mechanic_params["copies"] == 2
+
+
+@pytest.mark.asyncio
+async def test_catalog_reloads_only_on_ttl_or_version_change():
+    ac.invalidate_abyss_catalog()
+    loads = AsyncMock(side_effect=lambda session, version: _catalog(version))
+    try:
+        with patch.object(ac, "load_abyss_catalog", loads):
+            first = await ac.get_abyss_catalog(MagicMock(), {})
+            assert await ac.get_abyss_catalog(MagicMock(), {}) is first
+            bumped = await ac.get_abyss_catalog(MagicMock(), {ac.CATALOG_VERSION_KEY: "2"})
+        assert bumped is not first and bumped.version == "2"
+        assert loads.await_count == 2
+    finally:
+        ac.invalidate_abyss_catalog()
+
+
+@pytest.mark.asyncio
+async def test_floors_are_pre_generated_and_consumed_without_catalog_queries():
+    cat = _catalog()
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=AssertionError("catalog table queried"))
+    progress = _progress()
+    plan_floors = AsyncMock(wraps=absvc._plan_floors)
+    with (
+        patch.object(absvc, "get_abyss_catalog", AsyncMock(return_value=cat)),
+        patch.object(absvc, "_plan_floors", plan_floors),
+    ):
+        await absvc.generate_floor(session, CFG, progress, 7, random.Random(3))
+        first = progress.current_monster
+        assert [f["floor"] for f in progress.floor_plan["floors"]] == [7, 8, 9, 10]
+        assert progress.floor_monsters_remaining == 3 and first["is_elite"]
+        assert first["level"] == 4 and first["applied_affix_ids"]
+
+        second = await absvc.next_floor_monster(session, CFG, progress, 7, progress.current_floor_modifier)
+        assert second is not first and len(progress.floor_plan["floors"][0]["monsters"]) == 1
+
+        for floor in (8, 9, 10):
+            await absvc.generate_floor(session, CFG, progress, floor, random.Random(floor))
+        assert progress.current_monster["is_boss"] and progress.current_floor_modifier is None
+        assert progress.current_monster["mechanic_params"] is not cat.bosses[0].mechanic_params
+        assert plan_floors.await_count == 1
+
+        chips = await absvc.serialize_monster(session, first)
+        assert [c["id"] for c in chips["affixes"]] == first["applied_affix_ids"]
+
+        # Floor 11 is past the plan; a new session (nonce) discards a stale plan too.
+        await absvc.generate_floor(session, CFG, progress, 11, random.Random(1))
+        assert plan_floors.await_count == 2
+        progress.session_nonce = 2
+        await absvc.generate_floor(session, CFG, progress, 12, random.Random(1))
+        assert plan_floors.await_count == 3 and progress.floor_plan["nonce"] == 2
+
+    absvc._reset_block_on_exit(progress)
+    assert progress.floor_plan is None
+
+
+@pytest.mark.asyncio
+async def test_pregen_disabled_keeps_one_floor_at_a_time():
+    progress = _progress()
+    with patch.object(absvc, "get_abyss_catalog", AsyncMock(return_value=_catalog())):
+        await absvc.generate_floor(MagicMock(), {**CFG, "abyss_pregen_floors": "0"}, progress, 3, random.Random(1))
+        assert progress.floor_plan is None and progress.current_monster["level"] == 2
+        nxt = await absvc.next_floor_monster(MagicMock(), CFG, progress, 3, None, random.Random(2))
+    assert nxt["level"] == 2
@@ -0,0 +1,108 @@
+"""Unit tests: activity mode registry (HMGET routing, DB rebuild, version guard, commit hooks)."""
+
+from __future__ import annotations
+
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.util import greenlet_spawn
+
+from waifu_bot.core import redis as redis_core
+from waifu_bot.db import models as m
+from waifu_bot.services import activity_modes as am
+from waifu_bot.services import redis_scripts as rs
+
+from tests.unit.fake_redis import FakeRedis
+
+
+def _fake_sessions(monkeypatch) -> list[object]:
+    opened: list[object] = []
+
+    async def _get_session():
+        opened.append(object())
+        yield opened[-1]
+
+    monkeypatch.setattr("waifu_bot.db.session.get_session", _get_session)
+    return opened
+
+
+@pytest.mark.asyncio
+async def test_cold_hashes_are_rebuilt_then_routing_is_one_round_trip(monkeypatch):
+    opened = _fake_sessions(monkeypatch)
+    monkeypatch.setattr(am, "load_player_modes", AsyncMock(return_value={am.ABYSS: "1"}))
+    monkeypatch.setattr(am, "load_chat_modes", AsyncMock(return_value={}))
+    redis = FakeRedis()
+    redis.loaded_scripts.add(rs.ACTIVITY_MODES_FILL.sha)
+
+    routes = await am.resolve_routes(redis, 7, -100)
+    assert routes == am.ActivityRoutes(solo=False, abyss=True, gd=False, raid=False)
+    assert len(opened) == 1
+    assert redis.hashes[am.player_key(7)] == {"_k": "1", "abyss": "1"}
+    assert redis.ttls[am.chat_key(-100)] == am.TTL_SEC
+
+    redis.commands.clear()
+    assert await am.resolve_routes(redis, 7, -100) == routes
+    assert redis.round_trips() == 1 and len(opened) == 1
+
+
+@pytest.mark.asyncio
+async def test_rebuild_is_dropped_when_a_hook_wrote_meanwhile(monkeypatch):
+    redis = FakeRedis()
+    _fake_sessions(monkeypatch)
+
+    async def racing_load(session, player_id):
+        if am.player_key(player_id) not in redis.hashes:
+            await am.apply_changes(redis, {am.player_key(player_id): [(am.SOLO, "1")]})
+            return {}
+        return {am.SOLO: "1"}
+
+    monkeypatch.setattr(am, "load_player_modes", racing_load)
+    monkeypatch.setattr(am, "load_chat_modes", AsyncMock(return_value={}))
+
+    await am.resolve_routes(redis, 7, None)
+    # Stale "no modes" rebuild lost; the started run is still recorded (hash stays unknown).
+    assert redis.hashes[am.player_key(7)] == {"_v": "1", "solo": "1"}
+    await am.resolve_routes(redis, 7, None)
+    assert redis.hashes[am.player_key(7)] == {"_k": "1", "_v": "1", "solo": "1"}
+
+
+@pytest.mark.asyncio
+async def test_no_redis_means_probe_everything():
+    assert await am.resolve_routes(None, 7, -100) is None
+
+
+def _persistent(session: Session, obj):
+    make_transient_to_detached(obj)
+    session.add(obj)
+    return obj
+
+
+@pytest.mark.asyncio
+async def test_mode_start_sets_field_and_stop_forces_rebuild(monkeypatch):
+    redis = FakeRedis()
+    redis.hashes[am.player_key(4)] = {"_k": "1"}
+    redis.hashes[am.chat_key(-5)] = {"_k": "1", "gd": "1"}
+    monkeypatch.setattr(redis_core, "_redis", redis)
+    session = Session()
+    run = _persistent(session, m.DungeonRun(id=1, player_id=4, status="completed", economy="telegram"))
+    cycle = _persistent(session, m.GDCycle(id=2, chat_id=-5, status="active"))
+    guild = _persistent(session, m.Guild(id=3, telegram_chat_id=-5, raid_active_id=None))
+
+    run.status = "active"
+    guild.raid_active_id = 11
+    am._collect(session, None, None)
+    await greenlet_spawn(am._after_commit, session)
+    assert redis.hashes[am.player_key(4)] == {"_k": "1", "_v": "1", "solo": "1"}
+    assert redis.hashes[am.chat_key(-5)]["raid"] == "1"
+
+    cycle.status = "finished"
+    am._collect(session, None, None)
+    await greenlet_spawn(am._after_commit, session)
+    assert "_k" not in redis.hashes[am.chat_key(-5)]
+
+    activity_run = _persistent(session, m.DungeonRun(id=9, player_id=8, status="completed", economy="activity"))
+    activity_run.status = "active"
+    am._collect(session, None, None)
+    am._after_rollback(session)
+    assert am._PENDING_KEY not in session.info
@@ -0,0 +1,121 @@
+"""Unit tests: arena matchmaking (rating windows, recent exclusion, DEF snapshots, rating hooks)."""
+
+from __future__ import annotations
+
+import random
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.util import greenlet_spawn
+
+from waifu_bot.core import redis as redis_core
+from waifu_bot.core.config import settings
+from waifu_bot.db import models as m
+from waifu_bot.services import arena_matchmaking as am
+from waifu_bot.services import merc_systems
+
+from tests.unit.fake_redis import FakeRedis
+
+
+def _ratings(redis: FakeRedis, **by_pid) -> None:
+    redis.zsets[am.RATING_KEY] = {k.lstrip("p"): float(v) for k, v in by_pid.items()}
+
+
+def test_pick_opponents_window_exclusion_and_recent_fill():
+    cands = [("1", 1000), ("2", 1030), ("3", 960), ("4", 1300), ("5", 1010)]
+    got = am.pick_opponents(cands, 1000, 3, window=50, exclude={1}, rng=random.Random(1))
+    assert got == [(5, 1010), (2, 1030), (3, 960)]
+    # Recent opponents only fill the gap; the result is still ordered by distance.
+    got = am.pick_opponents(cands, 1000, 3, window=50, exclude={1}, avoid={2, 5}, rng=random.Random(1))
+    assert got == [(5, 1010), (2, 1030), (3, 960)]
+    assert am.pick_opponents(cands, 1000, 2, window=50, exclude={1}, avoid={5}, rng=random.Random(1)) == [
+        (2, 1030),
+        (3, 960),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_nearby_opponents_widens_window_and_skips_recent():
+    redis = FakeRedis()
+    _ratings(redis, p2=1020, p3=1180, p4=1390, p5=400)
+    got = await am.nearby_opponents(redis, 1, 1000, rng=random.Random(0))
+    assert [pid for pid, _ in got] == [2, 3, 4]
+    assert redis.zsets[am.RATING_KEY]["1"] == 1000  # caller indexed on the way
+
+    await am.record_opponent(redis, 1, 2)
+    await am.record_opponent(redis, 1, 2)
+    assert redis.lists[am._recent_key(1)] == ["2"]
+    got = await am.nearby_opponents(redis, 1, 1000, rng=random.Random(0))
+    assert [pid for pid, _ in got] == [3, 4, 5]
+
+    assert await am.nearby_opponents(FakeRedis(), 1, 1000) is None
+    assert await am.nearby_opponents(None, 1, 1000) is None
+
+
+@pytest.mark.asyncio
+async def test_defense_snapshot_is_tagged_by_roster_revision():
+    from waifu_bot.game.merc_arena import ArenaFighter
+
+    redis = FakeRedis()
+    rev = am.defense_revision({"epoch": "e1", "roster": 3})
+    fighters = [ArenaFighter("Аня", 120, ["cleave_u"], "Assault", "vanguard", side="defender")]
+    await am.store_defense_snapshot(redis, 9, rev, fighters)
+    got = await am.load_defense_snapshot(redis, 9, rev)
+    assert [(f.name, f.cr, f.perk_ids, f.side) for f in got] == [("Аня", 120, ["cleave_u"], "defender")]
+    assert await am.load_defense_snapshot(redis, 9, am.defense_revision({"epoch": "e1", "roster": 4})) is None
+    assert am.defense_revision(None) is None
+
+
+@pytest.mark.asyncio
+async def test_defender_fighters_reuses_snapshot_until_roster_changes(monkeypatch):
+    redis = FakeRedis()
+    revs = {"epoch": "e1", "roster": 1}
+    monkeypatch.setattr(settings, "player_revisions_enabled", True)
+    monkeypatch.setattr(
+        "waifu_bot.services.player_revisions.read_revisions", AsyncMock(side_effect=lambda r, pid: dict(revs))
+    )
+    unit = SimpleNamespace(name="Кира", power=0, perks=["mend_u"], atk_slot=None, def_slot=1)
+    monkeypatch.setattr(merc_systems, "refresh_unit_power", lambda w: setattr(w, "power", 77))
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = [unit]
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=result)
+
+    first = await merc_systems._defender_fighters(session, 9, redis)
+    again = await merc_systems._defender_fighters(session, 9, redis)
+    assert [f.cr for f in first] == [f.cr for f in again] == [77]
+    assert session.execute.await_count == 1
+
+    revs["roster"] = 2
+    await merc_systems._defender_fighters(session, 9, redis)
+    assert session.execute.await_count == 2
+
+
+def _persistent_tavern(session: Session, pid: int, rating: int) -> m.TavernState:
+    state = m.TavernState(id=pid, player_id=pid, arena_rating=rating)
+    make_transient_to_detached(state)
+    session.add(state)
+    return state
+
+
+@pytest.mark.asyncio
+async def test_rating_change_is_pushed_to_index_on_commit(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(redis_core, "_redis", redis)
+    session = Session()
+    state = _persistent_tavern(session, 4, 1000)
+    state.arena_tickets = 3
+    am._collect(session, None, None)
+    assert am._PENDING_KEY not in session.info
+
+    state.arena_rating = 1018
+    am._collect(session, None, None)
+    await greenlet_spawn(am._after_commit, session)
+    assert redis.zsets[am.RATING_KEY] == {"4": 1018.0}
+    assert am._PENDING_KEY not in session.info
+
+    session.info[am._PENDING_KEY] = {4: None}
+    am._after_rollback(session)
+    assert am._PENDING_KEY not in session.info
@@ -0,0 +1,88 @@
+"""Unit tests: persistent event loop bridge for Dramatiq actors."""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from waifu_bot.worker.asyncio_bridge import EventLoopBridge
+
+
+@pytest.fixture
+def bridge():
+    b = EventLoopBridge(name="test-bridge")
+    b.start()
+    yield b
+    b.stop()
+
+
+def test_reuses_one_loop_across_calls(bridge):
+    async def _loop_id() -> int:
+        return id(asyncio.get_running_loop())
+
+    first = bridge.submit(_loop_id())
+    second = bridge.submit(_loop_id())
+    assert first == second == id(bridge.loop)
+
+
+def test_concurrent_submits_overlap(bridge):
+    async def _sleep() -> float:
+        await asyncio.sleep(0.2)
+        return time.perf_counter()
+
+    t0 = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: bridge.submit(_sleep()), range(4)))
+    assert len(results) == 4
+    # Four 0.2s sleeps on one loop finish together, not serially.
+    assert time.perf_counter() - t0 < 0.6
+
+
+def test_exception_propagates(bridge):
+    async def _boom() -> None:
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        bridge.submit(_boom())
+
+
+def test_timeout_cancels_coroutine(bridge):
+    cancelled = threading.Event()
+
+    async def _slow() -> None:
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(concurrent.futures.TimeoutError):
+        bridge.submit(_slow(), timeout=0.05)
+    assert cancelled.wait(1.0)
+
+
+def test_stop_joins_thread_and_restarts_lazily():
+    b = EventLoopBridge(name="test-bridge-restart")
+
+    async def _one() -> int:
+        return 1
+
+    assert b.submit(_one()) == 1
+    first_loop = b.loop
+    b.stop()
+    assert not b.running
+    assert first_loop.is_closed()
+    assert b.submit(_one()) == 1
+    assert b.loop is not first_loop
+    b.stop()
+
+
+def test_shared_http_client_is_reused(bridge):
+    async def _client_id() -> int:
+        return id(bridge.http_client())
+
+    assert bridge.submit(_client_id()) == bridge.submit(_client_id())
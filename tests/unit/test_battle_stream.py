@@ -0,0 +1,105 @@
+"""Unit tests: delta-encoded battle SSE events and Last-Event-ID replay."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from waifu_bot.services import battle_stream as bs
+
+from tests.unit.fake_redis import FakeRedis
+
+
+def _hit(hp: int, *, pos: int = 1, dungeon: int = 7, **extra) -> dict:
+    return {
+        "dungeon_id": dungeon,
+        "position": pos,
+        "monster_position": pos,
+        "monster_hp": hp,
+        "monster_max_hp": 100,
+        "waifu_current_hp": 50,
+        "waifu_max_hp": 50,
+        **extra,
+    }
+
+
+def _data(frame: str) -> dict:
+    line = next(ln for ln in frame.splitlines() if ln.startswith("data: "))
+    return json.loads(line[len("data: ") :])
+
+
+def test_first_event_is_keyframe_then_deltas_carry_only_changes():
+    ev1, st1 = bs.encode_battle_event(_hit(90, damage=10), None, 1)
+    assert ev1["kind"] == "key" and ev1["seq"] == 1
+    assert ev1["payload"]["waifu_max_hp"] == 50
+
+    ev2, st2 = bs.encode_battle_event(_hit(80, damage=10, drops=[{"id": 1}]), st1, 2)
+    assert ev2["kind"] == "delta"
+    assert ev2["payload"] == {"damage": 10, "drops": [{"id": 1}], "monster_hp": 80}
+    assert st2["state"]["monster_hp"] == 80 and st2["state"]["waifu_current_hp"] == 50
+
+
+def test_keyframe_on_cadence_gap_and_new_dungeon():
+    _, st = bs.encode_battle_event(_hit(90), None, 1)
+    ev, st = bs.encode_battle_event(_hit(80), st, 2, keyframe_every=2)
+    assert ev["kind"] == "delta"
+    ev, st = bs.encode_battle_event(_hit(70), st, 3, keyframe_every=2)
+    assert ev["kind"] == "key"
+
+    ev, st = bs.encode_battle_event(_hit(60), st, 5)
+    assert ev["kind"] == "key"  # seq 4 went elsewhere (concurrent publisher)
+
+    ev, st = bs.encode_battle_event({"dungeon_id": 8, "monster_hp": 200}, st, 6)
+    assert ev["kind"] == "key"
+    assert ev["payload"] == {"dungeon_id": 8, "monster_hp": 200}
+
+
+@pytest.mark.asyncio
+async def test_publish_buffers_and_resume_replays_missed_deltas():
+    redis = FakeRedis()
+    for hp in (90, 80, 70):
+        await bs.publish_battle_event(redis, 5, _hit(hp))
+    assert [ch for ch, _ in redis.published] == ["sse:5"] * 3
+
+    cursor = bs.BattleStreamCursor(5, protocol=2, last_event_id=1)
+    frames = await cursor.replay(redis)
+    assert [f.split("\n", 1)[0] for f in frames[:2]] == ["id: 2", "id: 3"]
+    assert _data(frames[1])["payload"] == {"monster_hp": 70}
+    assert _data(frames[-1]) == {"type": "battle_resume", "ok": True, "replayed": 2}
+
+    # Live copy of an already replayed event is dropped; the next one is framed with its id.
+    assert cursor.frame(redis.published[-1][1]) is None
+    ev = await bs.publish_battle_event(redis, 5, _hit(60))
+    assert cursor.frame(redis.published[-1][1]).startswith(f"id: {ev['seq']}\n")
+    assert cursor.frame('{"type": "gd"}') == 'data: {"type": "gd"}\n\n'
+
+
+@pytest.mark.asyncio
+async def test_resume_past_buffer_sends_resync_keyframe(monkeypatch):
+    monkeypatch.setattr(bs, "RESUME_BUFFER_LEN", 2)
+    redis = FakeRedis()
+    for hp in (90, 80, 70, 60):
+        await bs.publish_battle_event(redis, 5, _hit(hp))
+
+    cursor = bs.BattleStreamCursor(5, protocol=2, last_event_id=1)
+    frames = await cursor.replay(redis)
+    key = _data(frames[0])
+    assert key["kind"] == "key" and key["resync"] is True and key["seq"] == 4
+    assert key["payload"]["monster_hp"] == 60
+    assert _data(frames[-1])["ok"] is False
+
+
+@pytest.mark.asyncio
+async def test_legacy_client_gets_full_payload():
+    redis = FakeRedis()
+    await bs.publish_battle_event(redis, 5, _hit(90))
+    cursor = bs.BattleStreamCursor(5, protocol=1, last_event_id=1)
+    assert await cursor.replay(redis) == []
+
+    await bs.publish_battle_event(redis, 5, _hit(80, damage=10))
+    legacy = _data(cursor.frame(redis.published[-1][1]))
+    assert "v" not in legacy and "seq" not in legacy
+    assert legacy["payload"]["monster_hp"] == 80
+    assert legacy["payload"]["waifu_current_hp"] == 50
+    assert legacy["payload"]["damage"] == 10
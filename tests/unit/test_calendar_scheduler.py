@@ -0,0 +1,141 @@
+"""Unit tests: MSK calendar triggers, missed-slot catch-up, calendar tick registry."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from waifu_bot.services import calendar_scheduler as cs
+from waifu_bot.services import gd_daily_worker
+from waifu_bot.services.background_ticks import BackgroundTickSpec, get_background_tick_registry
+from waifu_bot.services.calendar_scheduler import MskCron, due_slots, seconds_until_next
+
+UTC = timezone.utc
+
+
+def _msk(y, mo, d, h=0, mi=0) -> datetime:
+    # MSK is UTC+3 (no DST)
+    return datetime(y, mo, d, h, mi, tzinfo=UTC) - timedelta(hours=3)
+
+
+def test_parse_rejects_bad_expressions():
+    for expr in ("", "0 0 * *", "60 0 * * *", "0 24 * * *", "0 0 * * 8", "*/0 * * * *"):
+        with pytest.raises(ValueError):
+            MskCron.parse(expr)
+
+
+def test_daily_previous_and_next_fire():
+    cron = MskCron.parse("30 4 * * *")
+    now = _msk(2026, 3, 10, 4, 29)
+    assert cron.previous_fire(now) == _msk(2026, 3, 9, 4, 30)
+    assert cron.next_fire(now) == _msk(2026, 3, 10, 4, 30)
+    on_mark = _msk(2026, 3, 10, 4, 30)
+    assert cron.previous_fire(on_mark) == on_mark
+    assert cron.next_fire(on_mark) == _msk(2026, 3, 11, 4, 30)
+
+
+def test_weekly_monday_midnight():
+    cron = MskCron.parse("0 0 * * 1")
+    # 2026-03-12 is Thursday
+    assert cron.previous_fire(_msk(2026, 3, 12, 15)) == _msk(2026, 3, 9)
+    assert cron.next_fire(_msk(2026, 3, 12, 15)) == _msk(2026, 3, 16)
+
+
+def test_sunday_as_seven_and_steps():
+    assert MskCron.parse("0 0 * * 7").weekdays == frozenset({0})
+    cron = MskCron.parse("*/15 9-10 * * *")
+    assert cron.minutes == (0, 15, 30, 45)
+    assert cron.hours == (9, 10)
+
+
+def test_due_slots_catch_up_bounded_and_ordered():
+    cron = MskCron.parse("0 0 * * 1")
+    last = _msk(2026, 2, 16)
+    now = _msk(2026, 3, 12, 15)
+    assert due_slots(cron, last, now=now, limit=8) == [
+        _msk(2026, 2, 23),
+        _msk(2026, 3, 2),
+        _msk(2026, 3, 9),
+    ]
+    assert due_slots(cron, last, now=now, limit=1) == [_msk(2026, 3, 9)]
+
+
+def test_due_slots_nothing_when_current_slot_done():
+    cron = MskCron.parse("0 0 * * *")
+    now = _msk(2026, 3, 12, 15)
+    assert due_slots(cron, _msk(2026, 3, 12), now=now, limit=5) == []
+    assert due_slots(cron, None, now=now, limit=5) == [_msk(2026, 3, 8 + i) for i in range(5)]
+
+
+def test_seconds_until_next_with_jitter():
+    cron = MskCron.parse("0 0 * * *")
+    now = _msk(2026, 3, 12, 23, 59)
+    assert seconds_until_next(cron, now=now) == 60
+    assert 60 <= seconds_until_next(cron, now=now, jitter_sec=30) <= 90
+
+
+def test_registry_calendar_specs_parse():
+    specs = {s.name: s for s in get_background_tick_registry()}
+    for spec in specs.values():
+        if spec.is_calendar:
+            MskCron.parse(spec.schedule)
+            assert spec.catch_up >= 1
+    assert specs["abyss_weekly_reset"].schedule == "0 0 * * 1"
+    assert specs["abyss_weekly_reset"].catch_up > 1
+    assert not specs["gd_daily_start"].is_calendar and not specs["gd_daily_finalize"].is_calendar
+    assert not specs["chat_rewards_flush"].is_calendar
+
+
+@pytest.mark.asyncio
+async def test_gd_daily_start_polls_until_configured_start_time():
+    spec = {s.name: s for s in get_background_tick_registry()}["gd_daily_start"]
+    assert spec.interval_sec <= 30
+
+    session = MagicMock()
+    session.execute = AsyncMock(
+        return_value=MagicMock(scalars=lambda: MagicMock(all=lambda: [SimpleNamespace(chat_id=-100)]))
+    )
+    session.get = AsyncMock(return_value=None)
+    session.commit = AsyncMock()
+    gd = MagicMock()
+    gd.return_value.start_daily_cycle_for_chat = AsyncMock(return_value={"success": True, "cycle_id": 1})
+    cfg = {"gd_daily_start_hour_msk": "10", "gd_daily_start_minute_msk": "0"}
+
+    started = []
+    # Polls at the default 04:30 mark and shortly after it, then at the configured 10:00.
+    for at in (_msk(2026, 3, 10, 4, 30), _msk(2026, 3, 10, 4, 31), _msk(2026, 3, 10, 10, 0)):
+        clock = type("Clock", (datetime,), {"now": classmethod(lambda cls, tz=None, _at=at: _at)})
+        with patch.object(gd_daily_worker, "datetime", clock), \
+                patch.object(gd_daily_worker, "get_game_config_map", AsyncMock(return_value=cfg)), \
+                patch.object(gd_daily_worker, "GDCycleService", gd), \
+                patch.object(gd_daily_worker, "_try_lock", AsyncMock(return_value=True)):
+            started.append(await gd_daily_worker.run_gd_daily_start_tick(session, None, None))
+    assert started == [0, 0, 1]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("lease_left_min, expected", [(-1, 1), (5, 0)])
+async def test_crashed_running_slot_is_reclaimed_after_lease(lease_left_min, expected):
+    now = _msk(2026, 3, 12, 15)
+    slot = _msk(2026, 3, 12)
+    row = SimpleNamespace(last_slot_at=slot, status="running", lease_until=now + timedelta(minutes=lease_left_min))
+    fn = AsyncMock()
+    spec = BackgroundTickSpec("demo_daily", 3600, fn, schedule="0 0 * * *")
+
+    async def sessions():
+        session = MagicMock()
+        session.commit = AsyncMock()
+        yield session
+
+    with patch("waifu_bot.db.session.init_engine"), \
+            patch("waifu_bot.db.session.get_session", sessions), \
+            patch.object(cs, "ensure_ledger_row", AsyncMock(return_value=row)), \
+            patch.object(cs, "claim_slot", AsyncMock(return_value=True)) as claim, \
+            patch.object(cs, "finish_slot", AsyncMock()) as finish:
+        assert await cs.run_scheduled_tick(spec, now=now) == expected
+    assert [c.args[2] for c in claim.await_args_list] == [slot] * expected
+    assert [c.args[0] for c in fn.await_args_list] == [slot] * expected
+    assert finish.await_count == expected
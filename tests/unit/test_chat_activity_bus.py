@@ -0,0 +1,109 @@
+"""Unit tests: chat activity stream (idempotent publish, aggregated drain, poison isolation)."""
+
+from __future__ import annotations
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from waifu_bot.services import bot_group_chats, guild_progress, guild_quest_service, guild_raid_v2_service
+from waifu_bot.services import chat_activity_bus as bus
+from waifu_bot.services import player_chats
+from waifu_bot.services import redis_scripts as rs
+
+from tests.unit.fake_redis import FakeRedis
+
+
+def _event(pid: int, msg: int, **kw) -> bus.ChatActivityEvent:
+    return bus.ChatActivityEvent(player_id=pid, chat_id=-100, message_id=msg, ts=1_700_000_000 + msg, **kw)
+
+
+@pytest.fixture
+def effects(monkeypatch) -> dict[str, AsyncMock]:
+    mocks = {
+        "seen": AsyncMock(),
+        "chat": AsyncMock(),
+        "metric": AsyncMock(),
+        "gxp": AsyncMock(),
+        "war": AsyncMock(),
+        "raid": AsyncMock(return_value=0),
+    }
+    monkeypatch.setattr(player_chats, "touch_player_chat_seen", mocks["seen"])
+    monkeypatch.setattr(bot_group_chats, "touch_bot_group_chat_activity", mocks["chat"])
+    monkeypatch.setattr(guild_quest_service, "record_metric", mocks["metric"])
+    monkeypatch.setattr(guild_progress, "apply_gd_chat_gxp_totals", mocks["gxp"])
+    monkeypatch.setattr(guild_progress, "apply_war_chat_activity", mocks["war"])
+    monkeypatch.setattr(guild_raid_v2_service, "log_raid_chat_events", mocks["raid"])
+    return mocks
+
+
+def _session() -> MagicMock:
+    session = MagicMock()
+    session.commit = AsyncMock()
+    session.rollback = AsyncMock()
+    return session
+
+
+def test_event_fields_round_trip():
+    ev = _event(1, 5, metrics=("stickers_sent",), gd=True, text_delta=0, media_kind="sticker", raid=True,
+                message_length=3, raid_media=("sticker",))
+    assert bus.ChatActivityEvent.from_fields(ev.to_fields()) == ev
+    assert bus.ChatActivityEvent.from_fields(_event(2, 6).to_fields()) == _event(2, 6)
+
+
+@pytest.mark.asyncio
+async def test_publish_is_one_round_trip_and_drops_telegram_retries():
+    redis = FakeRedis()
+    redis.loaded_scripts.add(rs.CHAT_ACTIVITY_PUBLISH.sha)
+    assert await bus.publish_event(redis, _event(1, 5))
+    assert redis.round_trips() == 1
+    assert await bus.publish_event(redis, _event(1, 5))
+    assert len(redis.streams[bus.STREAM_KEY]) == 1
+    assert not await bus.publish_event(None, _event(1, 5))
+
+
+@pytest.mark.asyncio
+async def test_drain_aggregates_per_player_and_chat(effects):
+    redis = FakeRedis()
+    for msg, kw in enumerate(
+        [
+            dict(metrics=("text_messages_sent",), gd=True, text_delta=4, raid=True, message_length=4),
+            dict(metrics=("text_messages_sent",), gd=True, text_delta=2, raid=True, message_length=2),
+            dict(metrics=("stickers_sent",), gd=True, media_kind="sticker"),
+        ]
+    ):
+        await bus.publish_event(redis, _event(1, msg, **kw))
+    await bus.publish_event(redis, _event(2, 9))
+    session = _session()
+
+    assert await bus.drain_once(session, redis) == 4
+    assert effects["seen"].await_count == 2 and effects["chat"].await_count == 1
+    assert sorted(c.args[1:] for c in effects["metric"].await_args_list) == [
+        (1, "stickers_sent", 1),
+        (1, "text_messages_sent", 2),
+    ]
+    effects["gxp"].assert_awaited_once_with(session, 1, text_messages=2, media_items=1)
+    effects["war"].assert_awaited_once_with(session, 1, text_messages=2, media_items=1)
+    assert [len(c.args[2]) for c in effects["raid"].await_args_list] == [2]
+    session.commit.assert_awaited_once()
+    assert await bus.stream_stats(redis) == {"length": 4, "pending": 0, "lag": 0}
+    assert await bus.drain_once(session, redis) == 0
+
+
+@pytest.mark.asyncio
+async def test_poison_event_is_isolated_and_acked(effects):
+    async def metric(session, player_id, name, delta):
+        if player_id == 13:
+            raise RuntimeError("boom")
+
+    effects["metric"].side_effect = metric
+    redis = FakeRedis()
+    await bus.publish_event(redis, _event(1, 1, metrics=("text_messages_sent",)))
+    await bus.publish_event(redis, _event(13, 2, metrics=("text_messages_sent",)))
+    session = _session()
+
+    assert await bus.drain_once(session, redis) == 2
+    # Batch attempt + one commit for the healthy event; the poisoned one is rolled back.
+    assert session.commit.await_count == 1
+    assert session.rollback.await_count == 2
+    assert (await bus.stream_stats(redis))["pending"] == 0
@@ -0,0 +1,117 @@
+"""Unit tests: bestiary / item codex Redis write-behind."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from waifu_bot.services import bestiary as bestiary_service
+from waifu_bot.services import codex_buffer as cb
+from waifu_bot.services import item_codex as ic
+
+from tests.unit.fake_redis import FakeRedis
+
+
+def _session(kills_in_db: int = 0) -> AsyncMock:
+    session = AsyncMock()
+    session.execute = AsyncMock()
+    session.get = AsyncMock(
+        return_value=SimpleNamespace(kills=kills_in_db) if kills_in_db else None
+    )
+    nested = MagicMock()
+    nested.__aenter__ = AsyncMock(return_value=None)
+    nested.__aexit__ = AsyncMock(return_value=False)
+    session.begin_nested = MagicMock(return_value=nested)
+    return session
+
+
+@pytest.mark.asyncio
+async def test_mark_seen_buffers_once_and_skips_sql():
+    r = FakeRedis()
+    session = _session()
+    await bestiary_service.mark_seen(session, 1, 10, redis=r)
+    await bestiary_service.mark_seen(session, 1, 10, redis=r)
+    session.execute.assert_not_awaited()
+    assert list(r.hashes[cb.BUF_MONSTER_SEEN]) == ["1:10"]
+    assert "m:10" in r.sets[cb.known_key(1)]
+
+
+@pytest.mark.asyncio
+async def test_mark_seen_falls_back_to_sql_when_redis_down():
+    session = _session()
+    await bestiary_service.mark_seen(session, 1, 10, redis=FakeRedis(fail=True))
+    session.execute.assert_awaited_once()
+    assert "player_monster_codex" in str(session.execute.await_args[0][0])
+
+
+@pytest.mark.asyncio
+async def test_record_kill_buffers_and_tier_counts_pending():
+    r = FakeRedis()
+    session = _session(kills_in_db=4)
+    for _ in range(3):
+        await bestiary_service.record_kill(session, 1, 10, redis=r)
+    session.execute.assert_not_awaited()
+    assert r.hashes[cb.BUF_KILLS]["1:10"] == "3"
+    # committed baseline (4) cached once, then reused
+    assert session.get.await_count == 1
+    kills = await bestiary_service._total_kills(session, 1, 10, r)
+    assert kills == 7
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_batches_and_keeps_tier_coherent():
+    r = FakeRedis()
+    session = _session(kills_in_db=4)
+    await bestiary_service.mark_seen(session, 1, 10, redis=r)
+    await bestiary_service.record_kill(session, 1, 10, redis=r)
+    await bestiary_service.record_kill(session, 2, 10, redis=r)
+    await ic.mark_item_seen(session, 1, 55, redis=r)
+    await ic.mark_item_seen(session, 1, 55, redis=r)
+    await ic.mark_affix_seen(session, 1, catalog_kind=ic.CATALOG_DIABLO, catalog_id=9, redis=r)
+    assert cb.BUF_NEW_PLAYERS in r.sets
+
+    out = await cb.flush_codex_buffers(session, r)
+    assert out == {"monster_seen": 1, "kills": 2, "item_seen": 1, "affix_seen": 1}
+    session.commit.assert_awaited()
+    stmts = [str(c[0][0].compile(dialect=postgresql.dialect())) for c in session.execute.await_args_list]
+    assert any("player_item_codex.seen_count + excluded.seen_count" in s for s in stmts)
+    assert any("player_monster_codex.kills + excluded.kills" in s for s in stmts)
+    # buffers and in-flight batches drained, committed-kills cache dropped for flushed pairs
+    for key in (cb.BUF_KILLS, cb.BUF_ITEM_SEEN, cb.BUF_MONSTER_SEEN, cb.BUF_AFFIX_SEEN):
+        assert key not in r.hashes and key + cb.INFLIGHT_SUFFIX not in r.hashes
+    assert "10" not in r.hashes.get(cb.kills_cache_key(1), {})
+    assert cb.BUF_NEW_PLAYERS not in r.sets
+
+
+@pytest.mark.asyncio
+async def test_in_flight_batch_is_counted_until_flush_completes():
+    r = FakeRedis()
+    session = _session(kills_in_db=0)
+    await bestiary_service.record_kill(session, 1, 10, redis=r)
+    # simulate a flush that moved the buffer aside but has not committed yet
+    r.hashes[cb.BUF_KILLS + cb.INFLIGHT_SUFFIX] = r.hashes.pop(cb.BUF_KILLS)
+    await bestiary_service.record_kill(session, 1, 10, redis=r)
+    assert await bestiary_service._total_kills(session, 1, 10, r) == 2
+
+
+@pytest.mark.asyncio
+async def test_register_inventory_codex_buffered_skips_milestone_hook(monkeypatch):
+    r = FakeRedis()
+    session = _session()
+    hook = AsyncMock()
+    monkeypatch.setattr("waifu_bot.services.hidden_milestones.hook_milestones", hook)
+    inv = SimpleNamespace(
+        id=11,
+        _base_template_id=5,
+        tier=2,
+        affixes=[SimpleNamespace(family_id=99, name="Силы")],
+        item=SimpleNamespace(name="Кольцо"),
+    )
+    await ic.register_inventory_codex(session, 200, inv, redis=r)
+    session.execute.assert_not_awaited()
+    hook.assert_not_awaited()
+    assert r.hashes[cb.BUF_ITEM_SEEN] == {"200:5": "1"}
+    assert "200:diablo_family:99" in r.hashes[cb.BUF_AFFIX_SEEN]
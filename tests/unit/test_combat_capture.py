@@ -0,0 +1,152 @@
+"""Unit tests: combat hit capture (codec, seeded RNG, phase timer) and offline replay of the session log."""
+
+from __future__ import annotations
+
+import random
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.engine import IteratorResult
+from sqlalchemy.engine.result import SimpleResultMetaData
+
+from scripts.lib import combat_replay as cr
+from waifu_bot.db.models import BattleLog, Player
+from waifu_bot.game.constants import MediaType
+from waifu_bot.services import combat_capture as cc
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+
+
+def test_codec_round_trips_values_and_orm_rows():
+    player = Player(id=7, gold=120, username="aya", last_active=NOW)
+    enc = cc.Encoder()
+    value = {
+        "p": player,
+        "again": player,
+        "media": MediaType.PHOTO,
+        "at": NOW,
+        "price": Decimal("1.50"),
+        "by_id": {1: "x"},
+        "row": (1, "a"),
+        "tags": {"a"},
+    }
+    raw = enc.value(value)
+    assert raw["p"] == raw["again"] == {"$o": 0} and len(enc.objects) == 1
+
+    out = cc.Decoder(enc.objects).value(raw)
+    assert out["p"] is out["again"] and isinstance(out["p"], Player)
+    assert (out["p"].id, out["p"].gold, out["p"].username, out["p"].last_active) == (7, 120, "aya", NOW)
+    assert out["media"] is MediaType.PHOTO
+    assert (out["at"], out["price"], out["by_id"], out["row"], out["tags"]) == (NOW, Decimal("1.50"), {1: "x"}, (1, "a"), {"a"})
+
+    with pytest.raises(cc.CaptureUnsupported):
+        enc.value(object())
+
+
+def test_hit_rng_is_seeded_per_task_only():
+    token = cc.bind_hit_rng(42)
+    try:
+        drawn = [random.random(), random.randint(1, 100), random.choice("abcdef")]
+    finally:
+        cc.unbind_hit_rng(token)
+    ref = random.Random(42)
+    assert drawn == [ref.random(), ref.randint(1, 100), ref.choice("abcdef")]
+
+    random.seed(5)
+    first = random.random()
+    random.seed(5)
+    assert random.random() == first  # unbound: module RNG as before
+
+
+def test_phase_timer_splits_time_and_queries():
+    timer = cc.PhaseTimer()
+    token = cc.bind_phase_timer(timer)
+    try:
+        cc.count_query()
+        cc.mark_phase("legendary")
+        cc.count_query()
+        cc.count_query()
+        cc.mark_phase("rewards")
+    finally:
+        cc.unbind_phase_timer(token)
+    cc.mark_phase("persistence")  # unbound: no-op
+    out = timer.finish()
+    assert set(out["ms"]) == {"profile", "legendary", "rewards"}
+    assert out["queries"] == {"profile": 1, "legendary": 2}
+
+
+async def _hit(session) -> dict:
+    player = await session.get(Player, 7)
+    player.gold += random.randint(1, 50)
+    rows = (await session.execute(select(Player.id, Player.gold))).all()
+    log = BattleLog(player_id=player.id, dungeon_id=3, event_type="damage", monster_hp_after=random.randint(0, 9))
+    session.add(log)
+    await session.flush()
+    await session.commit()
+    return {"gold": player.gold, "rows": rows, "log_id": log.id, "hp": log.monster_hp_after}
+
+
+def _inner_session() -> MagicMock:
+    added = []
+
+    async def flush():
+        for obj in added:
+            obj.id = 55
+            obj.created_at = NOW
+
+    inner = MagicMock()
+    inner.get = AsyncMock(return_value=Player(id=7, gold=100, username="aya"))
+    inner.execute = AsyncMock(
+        side_effect=lambda stmt: IteratorResult(SimpleResultMetaData(["id", "gold"]), iter([(7, 100)]))
+    )
+    inner.add = MagicMock(side_effect=added.append)
+    inner.flush = AsyncMock(side_effect=flush)
+    inner.commit = AsyncMock()
+    return inner
+
+
+@pytest.mark.asyncio
+async def test_recorded_session_replays_to_same_result_and_writes():
+    cap = cc.HitCapture(seed=9, started_at=NOW)
+    token = cc.bind_hit_rng(cap.seed)
+    try:
+        result = await _hit(cc.RecordingSession(_inner_session(), cap))
+    finally:
+        cc.unbind_hit_rng(token)
+    assert cap.broken is None
+    assert [e["op"] for e in cap.session_log] == ["get", "execute", "flush", "commit"]
+    doc = {"session": cap.session_log, "objects": cap.encoder.objects}
+    (commit_writes,) = cap.writes
+    assert {w["cls"] for w in commit_writes} == {"BattleLog", "Player"}
+
+    tracker = cc.WriteTracker()
+    decoder = cc.Decoder(doc["objects"], on_new_object=tracker.seen)
+    session = cr.ReplaySession(doc, decoder, tracker)
+    token = cc.bind_hit_rng(cap.seed)
+    try:
+        replayed = await _hit(session)
+    finally:
+        cc.unbind_hit_rng(token)
+
+    assert session.exhausted
+    assert cr.diff_values(cc.Encoder().value(result), cc.Encoder().value(replayed)) == []
+    assert cr.diff_values(cap.writes, session.writes) == []
+    assert replayed["log_id"] == 55
+
+
+@pytest.mark.asyncio
+async def test_replay_flags_divergent_calls_and_regressions():
+    cap = cc.HitCapture(seed=1, started_at=NOW)
+    await _hit(cc.RecordingSession(_inner_session(), cap))
+    doc = {"session": cap.session_log[1:], "objects": cap.encoder.objects}
+    session = cr.ReplaySession(doc, cc.Decoder(doc["objects"]), cc.WriteTracker())
+    with pytest.raises(cr.ReplayDivergence):
+        await _hit(session)
+
+    base = {"phases_ms": {"profile": {"p50": 2.0}, "rewards": {"p50": 0.01}}}
+    cur = {"phases_ms": {"profile": {"p50": 3.0}, "rewards": {"p50": 5.0}}}
+    assert cr.check_regression(cur, base, 0.2) == ["profile: p50 2.0ms -> 3.0ms (+50%)"]
+    assert cr.check_regression(cur, base, 0.6) == []
@@ -149,6 +149,7 @@ def test_process_due_ticks_silent_when_pref_off():
         session = AsyncMock()
 
         active = MagicMock()
+        active.id = 5
         active.player_id = 999
         active.events_done = 0
         active.events_total = 4
@@ -165,15 +166,15 @@ def test_process_due_ticks_silent_when_pref_off():
                 return_value=False,
             ),
             patch(
-                "waifu_bot.services.expedition.run_one_tick",
+                "waifu_bot.services.expedition.run_tick_batch",
                 new_callable=AsyncMock,
-                return_value={"ok": True, "telegram_narrative": "", "telegram_status": ""},
+                return_value={5: {"ok": True, "telegram_narrative": "", "telegram_status": ""}},
             ) as mock_tick,
         ):
             out = await svc.process_due_ticks(session)
 
         mock_tick.assert_called_once()
-        assert mock_tick.call_args.kwargs["silent"] is True
+        assert mock_tick.call_args.kwargs["silent_ids"] == {5}
         assert out == []
 
     asyncio.run(_run())
@@ -185,6 +186,7 @@ def test_process_due_ticks_narrative_when_pref_on():
         session = AsyncMock()
 
         active = MagicMock()
+        active.id = 5
         active.player_id = 999
         active.events_done = 0
         active.events_total = 4
@@ -201,18 +203,20 @@ def test_process_due_ticks_narrative_when_pref_on():
                 return_value=True,
             ),
             patch(
-                "waifu_bot.services.expedition.run_one_tick",
+                "waifu_bot.services.expedition.run_tick_batch",
                 new_callable=AsyncMock,
                 return_value={
-                    "ok": True,
-                    "telegram_narrative": "story",
-                    "telegram_status": "status",
+                    5: {
+                        "ok": True,
+                        "telegram_narrative": "story",
+                        "telegram_status": "status",
+                    }
                 },
             ) as mock_tick,
         ):
             out = await svc.process_due_ticks(session)
 
-        assert mock_tick.call_args.kwargs["silent"] is False
+        assert mock_tick.call_args.kwargs["silent_ids"] == set()
         assert out == [(999, "story", "status")]
 
     asyncio.run(_run())
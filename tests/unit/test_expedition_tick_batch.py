@@ -0,0 +1,102 @@
+"""Unit tests: batched expedition ticks (pure compute, batched preload, bulk write-back)."""
+
+from __future__ import annotations
+
+import copy
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from waifu_bot.db.models import ActiveExpedition, HiredWaifu
+from waifu_bot.services import expedition_ticks as et
+
+NOW = datetime(2026, 6, 1, 12, 0, tzinfo=timezone.utc)
+CATALOG = tuple(
+    et.AffixRow(id=i, name=f"Аффикс {i}", type="prefix", category=cat, difficulty_tags=tags)
+    for i, (cat, tags) in enumerate(
+        [("elemental", ("fire",)), ("enemy", ("monsters",)), ("hazard", ()), ("cursed", ("dark",))], start=1
+    )
+)
+
+
+def _waifu(wid: int, player_id: int = 1, hp: int = 100) -> HiredWaifu:
+    return HiredWaifu(
+        id=wid, player_id=player_id, name=f"W{wid}", race=1, class_=1, level=10,
+        max_hp=100, current_hp=hp, perks=[],
+    )
+
+
+def _active(aid: int, squad: list[int], *, player_id: int = 1, depth_tier: int | None = 2) -> ActiveExpedition:
+    return ActiveExpedition(
+        id=aid, player_id=player_id, squad_waifu_ids=squad, affix_level=2, depth_tier=depth_tier,
+        affix_template_id=1, tick_state={}, events_done=0, events_total=4, duration_minutes=60,
+        started_at=NOW - timedelta(minutes=20), ends_at=NOW + timedelta(minutes=40),
+        display_base_location="Пещера", reward_gold=10, reward_experience=5,
+    )
+
+
+def _inputs(waifus: list[HiredWaifu]) -> et.TickInputs:
+    return et.TickInputs(affixes=CATALOG, waifus={int(w.id): w for w in waifus})
+
+
+def test_compute_tick_is_pure_and_deterministic():
+    waifus = [_waifu(1), _waifu(2, hp=60)]
+    active = _active(7, [1, 2])
+    inputs = _inputs(waifus)
+
+    first = et.compute_tick(active, inputs.squad_for(active), inputs, now=NOW)
+    second = et.compute_tick(active, inputs.squad_for(active), inputs, now=NOW)
+    assert first == second and first.error is None
+    assert first.events_done == 1 and first.next_tick_at is not None
+    assert [w.current_hp for w in waifus] == [100, 60] and active.events_done == 0
+    assert active.tick_state == {}
+    assert first.tick_state["gate_log"][0]["index"] == 1
+
+
+def test_compute_tick_reports_missing_squad_and_foreign_units():
+    inputs = _inputs([_waifu(1, player_id=2)])
+    active = _active(7, [1])
+    assert et.compute_tick(active, inputs.squad_for(active), inputs, now=NOW).error == "no_squad"
+
+
+@pytest.mark.asyncio
+async def test_inputs_for_many_expeditions_take_two_queries(monkeypatch):
+    monkeypatch.setattr(et, "get_affix_catalog", AsyncMock(return_value=CATALOG))
+    waifus = [_waifu(1), _waifu(2), _waifu(3, player_id=2)]
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = waifus
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=result)
+
+    actives = [_active(7, [1, 2]), _active(8, [3], player_id=2), _active(9, [3], depth_tier=None)]
+    actives[2].expedition_slot_id = 4
+    inputs = await et.load_tick_inputs(session, actives)
+    assert session.execute.await_count == 2
+    assert [w.id for w in inputs.squad_for(actives[0])] == [1, 2]
+    assert inputs.squad_for(actives[2]) == []
+
+
+@pytest.mark.asyncio
+async def test_batch_matches_single_ticks_and_writes_in_bulk(monkeypatch):
+    monkeypatch.setattr(et, "get_affix_catalog", AsyncMock(return_value=CATALOG))
+    waifus = [_waifu(1), _waifu(2, hp=70), _waifu(3, player_id=2)]
+    actives = [_active(7, [1, 2]), _active(8, [3], player_id=2)]
+    single_waifus = copy.deepcopy(waifus)
+    single_actives = copy.deepcopy(actives)
+
+    session = MagicMock()
+    session.execute = AsyncMock()
+    monkeypatch.setattr(et, "load_tick_inputs", AsyncMock(return_value=_inputs(waifus)))
+    results = await et.run_tick_batch(session, actives, silent_ids={7, 8})
+    assert all(r["ok"] for r in results.values())
+    # One bulk UPDATE per table, all rows at once.
+    assert session.execute.await_count == 2
+    assert [len(c.args[1]) for c in session.execute.await_args_list] == [3, 2]
+
+    singles = _inputs(single_waifus)
+    for active in single_actives:
+        await et.run_one_tick(MagicMock(), active, silent=True, inputs=singles)
+    assert [w.current_hp for w in waifus] == [w.current_hp for w in single_waifus]
+    assert [a.events_done for a in actives] == [a.events_done for a in single_actives] == [1, 1]
+    assert [a.tick_state["gate_log"] for a in actives] == [a.tick_state["gate_log"] for a in single_actives]
@@ -32,6 +32,8 @@ from waifu_bot.services.gd_phantom_log import (
 )
 from waifu_bot.services.message_privacy import assert_no_user_message_text
 
+from tests.unit.fake_redis import FakeRedis
+
 
 class _Reg:
     def __init__(self, user_id: int, snap: dict, stats: dict | None = None):
@@ -40,51 +42,6 @@ class _Reg:
         self.day_stats_json = stats
 
 
-class _FakeRedis:
-    def __init__(self) -> None:
-        self.lists: dict[str, list[str]] = {}
-        self.hashes: dict[str, dict[str, str]] = {}
-        self.ttls: dict[str, int] = {}
-
-    async def llen(self, key: str) -> int:
-        return len(self.lists.get(key, []))
-
-    async def hget(self, key: str, field: str) -> str | None:
-        return self.hashes.get(key, {}).get(str(field))
-
-    async def rpush(self, key: str, value: str) -> int:
-        self.lists.setdefault(key, []).append(value)
-        return len(self.lists[key])
-
-    async def hincrby(self, key: str, field: str, amount: int) -> int:
-        h = self.hashes.setdefault(key, {})
-        cur = int(h.get(str(field), "0")) + int(amount)
-        h[str(field)] = str(cur)
-        return cur
-
-    async def expire(self, key: str, ttl: int) -> bool:
-        self.ttls[key] = int(ttl)
-        return True
-
-    async def lrange(self, key: str, start: int, end: int) -> list[str]:
-        items = self.lists.get(key, [])
-        if end == -1:
-            return list(items[start:])
-        return list(items[start : end + 1])
-
-    async def delete(self, *keys: str) -> int:
-        n = 0
-        for k in keys:
-            if k in self.lists:
-                del self.lists[k]
-                n += 1
-            if k in self.hashes:
-                del self.hashes[k]
-                n += 1
-            self.ttls.pop(k, None)
-        return n
-
-
 def test_text_chars_accumulate_and_normalize():
     s = empty_day_stats()
     assert s["text_chars"] == 0
@@ -193,7 +150,7 @@ def test_parse_word_stats_response_json():
 
 def test_phantom_append_caps_and_purge():
     async def _run() -> None:
-        redis = _FakeRedis()
+        redis = FakeRedis()
         assert await append_phantom_text(redis, 1, 42, "  hello world  ")
         assert await append_phantom_text(redis, 1, 42, "") is False
         long = "x" * (MAX_CHARS_PER_MSG + 50)
@@ -203,7 +160,7 @@ def test_phantom_append_caps_and_purge():
         assert len(loaded[42][1]) == MAX_CHARS_PER_MSG
 
         # per-user cap
-        redis2 = _FakeRedis()
+        redis2 = FakeRedis()
         for i in range(MAX_MSGS_PER_USER):
             ok = await append_phantom_text(redis2, 2, 7, f"m{i}")
             assert ok
@@ -216,7 +173,7 @@ def test_phantom_append_caps_and_purge():
         old_max = phantom_mod.MAX_ENTRIES_PER_CYCLE
         phantom_mod.MAX_ENTRIES_PER_CYCLE = 5
         try:
-            redis3 = _FakeRedis()
+            redis3 = FakeRedis()
             for i in range(5):
                 assert await append_phantom_text(redis3, 3, i + 1, f"e{i}")
             assert await append_phantom_text(redis3, 3, 99, "nope") is False
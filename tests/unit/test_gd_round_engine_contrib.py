@@ -1,16 +1,18 @@
 """Regression: guild_skill_contributions list must not shadow battle_state contribution dict."""
 from __future__ import annotations
 
+import random
 from unittest.mock import AsyncMock, patch
 
 import pytest
 
 from waifu_bot.services.guild_skill_effects import GuildSkillContribution
-from waifu_bot.services.gd_round_engine import _execute_player_action
+from waifu_bot.services.gd_round_engine import _load_guild_bonus
+from waifu_bot.services.gd_round_kernel import RoundSnapshot, _Round
 
 
 @pytest.mark.asyncio
-async def test_execute_player_action_updates_contrib_when_guild_skills_return_list() -> None:
+async def test_text_action_updates_contrib_when_guild_skills_return_list() -> None:
     uid = 305174198
     contrib: dict = {}
     party = [
@@ -26,17 +28,7 @@ async def test_execute_player_action_updates_contrib_when_guild_skills_return_li
         }
     ]
     monsters = [{"id": 1, "hp": 500, "max_hp": 500, "level": 5, "n_players": 1, "hp_scale": 0.7}]
-    state: dict = {"contribution": contrib}
-    outcomes = {
-        "hits": [],
-        "heals": [],
-        "flags": {"revive_no_target": False, "heal_no_target": False, "skill_on_cooldown": []},
-    }
-    actions_log: list = []
-    fx: list = []
-    cycle = AsyncMock()
-    cycle.id = 1
-    session = AsyncMock()
+    state: dict = {"contribution": contrib, "party": party, "monsters": monsters}
 
     guild_list = [
         GuildSkillContribution(param="gd_party_damage_pct", name="Боевой клич", value=0.1),
@@ -51,36 +43,16 @@ async def test_execute_player_action_updates_contrib_when_guild_skills_return_li
             "waifu_bot.services.guild_skill_effects.guild_skill_contributions",
             new=AsyncMock(return_value=guild_list),
         ),
-        patch(
-            "waifu_bot.services.gd_round_engine._consume_buff_crit_next",
-            new=AsyncMock(return_value=1.0),
-        ),
-        patch(
-            "waifu_bot.services.gd_round_engine._apply_player_damage_to_monster",
-            new=AsyncMock(return_value=25),
-        ),
-        patch(
-            "waifu_bot.services.gd_round_engine._grant_loot_if_monster_died",
-            new=AsyncMock(),
-        ),
     ):
-        await _execute_player_action(
-            session,
-            cycle,
-            1,
-            party[0],
-            {"kind": "text", "len": 42, "count": 1},
-            party,
-            monsters,
-            state,
-            outcomes,
-            actions_log,
-            contrib,
-            fx,
-            1,
-        )
+        bonus = await _load_guild_bonus(AsyncMock(), uid)
+
+    assert bonus is not None and bonus.damage_mult == 1.1
+    r = _Round(RoundSnapshot(state=state, buffer=None, cfg={}, guild={uid: bonus}), random.Random(1))
+    r.player_action(party[0], {"kind": "text", "len": 42, "count": 1}, 1)
 
     assert isinstance(contrib, dict)
     assert str(uid) in contrib
-    assert contrib[str(uid)]["text"] == 25
-    assert any(a.get("kind") == "text" for a in actions_log)
+    assert contrib[str(uid)]["text"] == 500 - monsters[0]["hp"]
+    assert contrib[str(uid)]["text"] > 0
+    text = next(a for a in r.actions_log if a.get("kind") == "text")
+    assert text["guild_skill_lines"] == list(bonus.lines)
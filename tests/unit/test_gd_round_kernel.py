@@ -0,0 +1,159 @@
+"""Unit tests: pure GD round kernel (seeded replay, effect/cooldown deltas, side-effect write-back)."""
+
+from __future__ import annotations
+
+import copy
+import json
+import random
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from waifu_bot.db.models import GDActiveEffect, GDCycle, GDSkillCooldown
+from waifu_bot.services import gd_round_engine as engine
+from waifu_bot.services import gd_round_kernel as kernel
+
+from scripts.lib.gd_round_bench import run_bench, synthetic_buffer, synthetic_party, synthetic_skills, synthetic_templates
+
+TEMPLATES = synthetic_templates()
+
+
+def _snapshot(party_size: int = 6, seed: int = 3, **kwargs) -> kernel.RoundSnapshot:
+    party = synthetic_party(party_size, random.Random(seed))
+    base = dict(
+        state={"party": party, "wave": "pending_init", "collecting_for_round": 1},
+        buffer=None,
+        cfg={},
+        skills=synthetic_skills(),
+        templates={int(t.id): t for t in TEMPLATES},
+        boss_pool=tuple(t for t in TEMPLATES if t.boss_allowed),
+    )
+    base.update(kwargs)
+    return kernel.RoundSnapshot(**base)
+
+
+def _buffers(party_size: int, n: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    party = synthetic_party(party_size, rng)
+    return [synthetic_buffer(party, rng) for _ in range(n)]
+
+
+def _trace(results: list[kernel.RoundResult]) -> str:
+    return json.dumps(
+        [[r.round_outcome, r.actions_log, r.state, [(c.recipient_user_id, c.boss) for c in r.loot]] for r in results],
+        sort_keys=True,
+    )
+
+
+def test_seeded_replay_is_deterministic():
+    buffers = _buffers(6, 40, seed=9)
+    first = list(kernel.replay_rounds(_snapshot(), copy.deepcopy(buffers), seed=42, trash_pool=TEMPLATES))
+    second = list(kernel.replay_rounds(_snapshot(), copy.deepcopy(buffers), seed=42, trash_pool=TEMPLATES))
+    other = list(kernel.replay_rounds(_snapshot(), copy.deepcopy(buffers), seed=43, trash_pool=TEMPLATES))
+    assert _trace(first) == _trace(second)
+    assert _trace(first) != _trace(other)
+    assert [r.round_num for r in first] == list(range(1, len(first) + 1))
+    assert all("__gd_cfg_thematic_mult" not in r.state for r in first)
+
+
+def test_effects_and_cooldowns_come_back_as_deltas():
+    shield_row = GDActiveEffect(
+        cycle_id=1, target_type="player", target_id=0, effect_type="SHIELD_PARTY",
+        effect_value=1.0, expires_round=5, applied_round=0,
+    )
+    crit_row = GDActiveEffect(
+        cycle_id=1, target_type="player", target_id=100, effect_type="BUFF_CRIT_NEXT",
+        effect_value=0.0, expires_round=5, applied_round=0,
+    )
+    snap = _snapshot(
+        party_size=1,
+        effects=[kernel.KernelEffect.from_row(shield_row), kernel.KernelEffect.from_row(crit_row)],
+        skills={("1", "sticker"): kernel.SkillSpec("SHIELD_PARTY", 50.0, 2, 3)},
+        cooldowns={(100, "photo"): 9},
+    )
+    snap.state["party"][0]["class_id"] = 1
+    kernel.prepare_round_state(snap.state, {})
+    snap.state["wave"] = "trash"
+    snap.state["monsters"] = kernel.build_trash_wave(snap.state["party"], 0.7, 10, TEMPLATES, random.Random(1))
+    snap.buffer = {
+        "users": {
+            "100": {
+                "actions": [
+                    {"kind": "text", "len": 40},
+                    {"kind": "media", "media_kind": "sticker"},
+                    {"kind": "media", "media_kind": "sticker"},
+                    {"kind": "media", "media_kind": "photo"},
+                ]
+            }
+        }
+    }
+
+    res = kernel.run_round(snap, random.Random(5))
+    by_type = {e.effect_type: e for e in res.effects}
+    assert by_type["BUFF_CRIT_NEXT"].removed and by_type["BUFF_CRIT_NEXT"].row is crit_row
+    new_shield = [e for e in res.effects if e.effect_type == "SHIELD_PARTY" and e.row is None]
+    assert len(new_shield) == 1 and new_shield[0].expires_round == 3
+    # Second sticker is on cooldown; photo cooldown (round 9) is untouched.
+    assert res.cooldowns == {(100, "sticker"): 4}
+    assert res.outcomes["flags"]["skill_on_cooldown"] == [100, 100]
+    # ORM rows are read, never written, by the kernel.
+    assert crit_row.effect_value == 0.0 and shield_row.effect_value == 1.0
+
+
+def test_trash_clear_spawns_boss_and_drops_monster_effects():
+    snap = _snapshot(party_size=2)
+    kernel.prepare_round_state(snap.state, {})
+    snap.state["wave"] = "trash"
+    snap.state["monsters"] = [{"id": 1000, "template_id": 0, "hp": 1, "max_hp": 1, "level": 1, "n_players": 2}]
+    snap.effects = [kernel.KernelEffect("monster", 1000, "DOT", 10.0, 4, applied_round=0)]
+    snap.buffer = {"users": {"100": {"actions": [{"kind": "text", "len": 50}]}}}
+
+    res = kernel.run_round(snap, random.Random(2))
+    assert res.clear_monster_effects and res.effects[0].removed
+    assert res.state["wave"] == "boss" and res.state["monsters"][0]["is_boss"]
+    assert res.loot and not res.loot[0].boss
+
+
+@pytest.mark.asyncio
+async def test_engine_writes_side_effects_after_the_round():
+    kept = GDActiveEffect(cycle_id=1, target_type="player", target_id=0, effect_type="SHIELD_PARTY",
+                          effect_value=30.0, expires_round=4)
+    gone = GDActiveEffect(cycle_id=1, target_type="player", target_id=7, effect_type="BUFF_CRIT_NEXT",
+                          effect_value=0.0, expires_round=4)
+    monster_fx = GDActiveEffect(cycle_id=1, target_type="monster", target_id=1000, effect_type="DOT",
+                                effect_value=5.0, expires_round=4)
+    effects = [kernel.KernelEffect.from_row(r) for r in (kept, gone, monster_fx)]
+    effects[0].effect_value = 12.0
+    effects[1].removed = effects[2].removed = True
+    effects.append(kernel.KernelEffect("player", 0, "REFLECT", 35.0, 4, applied_round=2))
+    cd_row = GDSkillCooldown(cycle_id=1, user_id=7, media_type="gif", available_from_round=2)
+    res = kernel.RoundResult(
+        round_num=2, round_outcome="ongoing", state={}, actions_log=[], outcomes={"hits": []},
+        effects=effects, cooldowns={(7, "gif"): 5, (8, "photo"): 4},
+        loot=[kernel.LootClaim(8, 12, True)], clear_monster_effects=True,
+    )
+    session = MagicMock()
+    session.delete = AsyncMock()
+    cycle = GDCycle(id=1)
+
+    award = AsyncMock(return_value={"item": 1})
+    with (
+        patch.object(engine.gd_fx, "delete_monster_targeted_effects", AsyncMock()) as wipe,
+        patch.object(engine, "try_award_item_on_monster_kill", award),
+    ):
+        await engine._apply_round_side_effects(session, cycle, res, {(7, "gif"): cd_row})
+
+    wipe.assert_awaited_once_with(session, 1)
+    session.delete.assert_awaited_once_with(gone)
+    assert kept.effect_value == 12.0 and cd_row.available_from_round == 5
+    added = [c.args[0] for c in session.add.call_args_list]
+    assert [type(a).__name__ for a in added] == ["GDActiveEffect", "GDSkillCooldown"]
+    assert added[0].effect_type == "REFLECT" and added[1].user_id == 8
+    award.assert_awaited_once_with(session, recipient_user_id=8, act=None, avg_level=12, boss=True)
+    assert res.state["loot_awards"] == [{"item": 1}] and res.outcomes["loot"] == [{"item": 1}]
+
+
+def test_bench_runs_large_party_offline():
+    first = run_bench(30, 100, seed=4)
+    assert first["rounds"] == 100 and sum(first["outcomes"].values()) == 100
+    assert run_bench(30, 100, seed=4)["outcomes"] == first["outcomes"]
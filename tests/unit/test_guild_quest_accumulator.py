@@ -0,0 +1,197 @@
+"""Unit tests: guild quest accumulator (index, atomic crossings, flush take/restore, commit hook, rotation flush)."""
+
+from __future__ import annotations
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.util import greenlet_spawn
+
+from waifu_bot.core import redis as redis_core
+from waifu_bot.db.models import GuildQuest
+from waifu_bot.services import guild_quest_accumulator as gqa
+from waifu_bot.services import guild_quest_service
+from waifu_bot.services import redis_scripts as rs
+
+from tests.unit.fake_redis import FakeRedis
+
+INDEX = {5: {"stickers_sent": [(11, 3), (12, 0)], "text_messages_sent": [(13, 100)]}}
+
+
+def _session() -> MagicMock:
+    session = MagicMock()
+    session.commit = AsyncMock()
+    session.rollback = AsyncMock()
+    return session
+
+
+@pytest.mark.asyncio
+async def test_cold_index_is_built_once_then_counts_without_db(monkeypatch):
+    load = AsyncMock(return_value=INDEX)
+    monkeypatch.setattr(gqa, "load_quest_index", load)
+    redis = FakeRedis()
+    redis.loaded_scripts.add(rs.GUILD_QUEST_ACCUMULATE.sha)
+
+    assert await gqa.accumulate(object(), redis, 5, 7, "stickers_sent", 1)
+    assert redis.hashes[gqa.index_key(5)]["stickers_sent"] == "11:3,12:0"
+    redis.commands.clear()
+    assert await gqa.accumulate(object(), redis, 5, 8, "stickers_sent", 2)
+    # HMGET on the index + one script call; no DB.
+    assert redis.round_trips() == 2 and load.await_count == 1
+    assert redis.hashes[gqa.acc_key(11)] == {"_t": "3", "7": "1", "8": "2"}
+    assert redis.sets[gqa.DIRTY_KEY] == {"11", "12"}
+    # Quest 11 crossed its remaining 3 on the second message; 12 has no threshold.
+    assert redis.sets[gqa.DUE_KEY] == {"11"}
+
+    assert await gqa.accumulate(object(), redis, 5, 7, "bosses_killed", 1)
+    assert gqa.acc_key(13) not in redis.hashes
+    assert not await gqa.accumulate(object(), None, 5, 7, "stickers_sent", 1)
+
+
+@pytest.mark.asyncio
+async def test_flush_applies_due_quests_and_rebuilds_index(monkeypatch):
+    monkeypatch.setattr(gqa, "load_quest_index", AsyncMock(return_value=INDEX))
+    apply = AsyncMock(return_value={5})
+    monkeypatch.setattr(guild_quest_service, "apply_quest_progress", apply)
+    redis = FakeRedis()
+    for pid, delta in ((7, 2), (8, 1), (7, 4)):
+        await gqa.accumulate(object(), redis, 5, pid, "stickers_sent", delta)
+    await gqa.accumulate(object(), redis, 5, 9, "text_messages_sent", 1)
+    session = _session()
+
+    assert await gqa.flush_progress(session, redis) == 1
+    apply.assert_awaited_once_with(session, {11: {7: 6, 8: 1}})
+    session.commit.assert_awaited_once()
+    assert gqa.acc_key(11) not in redis.hashes and gqa.DUE_KEY not in redis.sets
+
+    assert await gqa.flush_progress(session, redis, full=True) == 2
+    assert apply.await_args.args[1] == {12: {7: 6, 8: 1}, 13: {9: 1}}
+    assert gqa.DIRTY_KEY not in redis.sets
+    assert await gqa.flush_progress(session, redis, full=True) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_puts_counters_back(monkeypatch):
+    monkeypatch.setattr(gqa, "load_quest_index", AsyncMock(return_value=INDEX))
+    monkeypatch.setattr(guild_quest_service, "apply_quest_progress", AsyncMock(side_effect=RuntimeError("db")))
+    redis = FakeRedis()
+    await gqa.accumulate(object(), redis, 5, 7, "stickers_sent", 3)
+    session = _session()
+
+    with pytest.raises(RuntimeError):
+        await gqa.flush_progress(session, redis)
+    session.rollback.assert_awaited_once()
+    assert redis.hashes[gqa.acc_key(11)] == {"_t": "3", "7": "3"}
+    assert redis.sets[gqa.DUE_KEY] == {"11"}
+
+
+@pytest.mark.asyncio
+async def test_record_metric_goes_through_the_accumulator(monkeypatch):
+    monkeypatch.setattr(guild_quest_service, "get_player_guild_id", AsyncMock(return_value=5))
+    monkeypatch.setattr(gqa, "load_quest_index", AsyncMock(return_value=INDEX))
+    redis = FakeRedis()
+    monkeypatch.setattr(redis_core, "_redis", redis)
+    session = AsyncMock()
+
+    await guild_quest_service.record_metric(session, 7, "stickers_sent", 1)
+    session.execute.assert_not_called()
+    assert redis.hashes[gqa.acc_key(11)]["7"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_deltas_wait_for_commit_and_vanish_on_rollback(monkeypatch):
+    monkeypatch.setattr(gqa, "load_quest_index", AsyncMock(return_value=INDEX))
+    redis = FakeRedis()
+    monkeypatch.setattr(redis_core, "_redis", redis)
+    session = Session()
+
+    assert await gqa.accumulate(session, redis, 5, 7, "stickers_sent", 2)
+    gqa._after_rollback(session)  # e.g. the batch failed and chat_activity_bus retries per event
+    assert gqa.acc_key(11) not in redis.hashes and gqa.DIRTY_KEY not in redis.sets
+    assert gqa._PENDING_ACC_KEY not in session.info
+
+    assert await gqa.accumulate(session, redis, 5, 7, "stickers_sent", 2)
+    assert await gqa.accumulate(session, redis, 5, 7, "stickers_sent", 1)
+    assert gqa.acc_key(11) not in redis.hashes
+    await greenlet_spawn(gqa._after_commit, session)
+    assert redis.hashes[gqa.acc_key(11)] == {"_t": "3", "7": "3"}
+    assert redis.sets[gqa.DUE_KEY] == {"11"}
+    assert gqa._PENDING_ACC_KEY not in session.info
+
+
+def _persistent(session: Session, obj):
+    make_transient_to_detached(obj)
+    session.add(obj)
+    return obj
+
+
+@pytest.mark.asyncio
+async def test_quest_changes_drop_the_guild_index(monkeypatch):
+    redis = FakeRedis()
+    redis.hashes[gqa.index_key(5)] = {"_k": "1"}
+    redis.hashes[gqa.index_key(6)] = {"_k": "1"}
+    monkeypatch.setattr(redis_core, "_redis", redis)
+    session = Session()
+    quest = _persistent(session, GuildQuest(id=1, guild_id=5, template_id=1, status="active", current_val=0))
+
+    quest.status = "completed"
+    gqa._collect(session, None, None)
+    await greenlet_spawn(gqa._after_commit, session)
+    assert gqa.index_key(5) not in redis.hashes
+    assert gqa.index_key(6) in redis.hashes
+
+    session.add(GuildQuest(guild_id=6, template_id=2, period_key="daily:x"))
+    gqa._collect(session, None, None)
+    gqa._after_rollback(session)
+    assert gqa._PENDING_KEY not in session.info
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("tick, rotate", [
+    ("_guild_quest_daily_reset_fn", "rotate_daily_quests"),
+    ("_guild_quest_weekly_reset_fn", "rotate_weekly_quests"),
+])
+async def test_rotation_applies_accumulated_progress_before_expiring(monkeypatch, tick, rotate):
+    from waifu_bot.db import session as db_session
+    from waifu_bot.services import background
+
+    monkeypatch.setattr(gqa, "load_quest_index", AsyncMock(return_value=INDEX))
+    monkeypatch.setattr(gqa, "rebuild_indexes", AsyncMock(return_value=0))
+    monkeypatch.setattr("waifu_bot.core.config.settings.guild_quest_accumulator_enabled", True)
+    redis = FakeRedis()
+    monkeypatch.setattr(redis_core, "_redis", redis)
+    for pid, delta in ((7, 2), (8, 1)):
+        await gqa.accumulate(object(), redis, 5, pid, "stickers_sent", delta)
+    await gqa.accumulate(object(), redis, 5, 9, "text_messages_sent", 4)
+
+    quests = {qid: GuildQuest(id=qid, guild_id=5, status="active", current_val=10) for qid in (11, 12, 13)}
+    contributions: dict[tuple[int, int], int] = {}
+
+    async def apply(session, progress):
+        for qid, members in progress.items():
+            quest = quests[qid]
+            if quest.status != "active":  # as apply_quest_progress: expired quests drop progress
+                continue
+            quest.current_val += sum(members.values())
+            for pid, value in members.items():
+                contributions[(qid, pid)] = contributions.get((qid, pid), 0) + value
+        return {5}
+
+    async def expire(session):
+        for quest in quests.values():
+            quest.status = "expired"
+
+    async def get_session():
+        yield _session()
+
+    monkeypatch.setattr(guild_quest_service, "apply_quest_progress", apply)
+    monkeypatch.setattr(guild_quest_service, rotate, expire)
+    monkeypatch.setattr(db_session, "get_session", get_session)
+    monkeypatch.setattr(db_session, "init_engine", lambda: None)
+
+    await getattr(background, tick)()
+
+    assert {qid: q.current_val for qid, q in quests.items()} == {11: 13, 12: 13, 13: 14}
+    assert contributions == {(11, 7): 2, (11, 8): 1, (12, 7): 2, (12, 8): 1, (13, 9): 4}
+    assert gqa.DIRTY_KEY not in redis.sets and all(q.status == "expired" for q in quests.values())
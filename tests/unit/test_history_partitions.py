@@ -0,0 +1,159 @@
+"""Unit tests: monthly history partitions (naming, retention, archive) and bounded reads."""
+
+from __future__ import annotations
+
+import gzip
+import importlib.util
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from waifu_bot.services import history_partitions as hp
+
+NOW = datetime(2026, 10, 19, 5, 40, tzinfo=timezone.utc)
+
+
+def _part(table: str, year: int, month: int) -> hp.PartitionInfo:
+    m = datetime(year, month, 1, tzinfo=timezone.utc)
+    return hp.PartitionInfo(name=hp.partition_name(table, m), month=m, total_bytes=8192, est_rows=10)
+
+
+def test_month_math_names_and_ddl():
+    assert hp.month_start(datetime(2026, 12, 31, 23, 59)) == datetime(2026, 12, 1, tzinfo=timezone.utc)
+    assert hp.add_months(datetime(2026, 11, 1, tzinfo=timezone.utc), 3) == datetime(2027, 2, 1, tzinfo=timezone.utc)
+    assert hp.add_months(datetime(2026, 1, 1, tzinfo=timezone.utc), -1) == datetime(2025, 12, 1, tzinfo=timezone.utc)
+
+    name = hp.partition_name("economy_ledger", NOW)
+    assert name == "economy_ledger_p202610"
+    assert hp.partition_month("economy_ledger", name) == datetime(2026, 10, 1, tzinfo=timezone.utc)
+    assert hp.partition_month("economy_ledger", "economy_ledger_keys") is None
+    assert hp.partition_month("economy_ledger", "player_event_log_p202610") is None
+
+    ddl = hp.create_partition_sql("player_event_log", datetime(2026, 12, 5, tzinfo=timezone.utc))
+    assert ddl == (
+        'CREATE TABLE IF NOT EXISTS "player_event_log_p202612" PARTITION OF "player_event_log" '
+        "FOR VALUES FROM ('2026-12-01T00:00:00+00:00') TO ('2027-01-01T00:00:00+00:00')"
+    )
+
+
+def test_default_partition_ddl_and_migration_copy_of_month_ddl():
+    assert hp.create_default_partition_sql("economy_ledger") == (
+        'CREATE TABLE IF NOT EXISTS "economy_ledger_default" PARTITION OF "economy_ledger" DEFAULT'
+    )
+    assert hp.partition_month("economy_ledger", hp.default_partition_name("economy_ledger")) is None
+
+    path = Path(__file__).resolve().parents[2] / "alembic" / "versions" / "0157_partitioned_history.py"
+    assert "waifu_bot" not in path.read_text(encoding="utf-8")
+    spec = importlib.util.spec_from_file_location("migration_0157", path)
+    mig = importlib.util.module_from_spec(spec)
+    assert spec.loader is not None
+    spec.loader.exec_module(mig)
+    for month in (datetime(2026, 12, 1, tzinfo=timezone.utc), datetime(2025, 1, 1, tzinfo=timezone.utc)):
+        assert mig._create_partition_sql("economy_ledger", month) == hp.create_partition_sql("economy_ledger", month)
+    assert mig._add_months(mig._month_start(NOW), -10) == hp.add_months(hp.month_start(NOW), -10)
+
+
+@pytest.mark.asyncio
+async def test_month_with_rows_in_default_partition_is_moved_then_attached():
+    table = "player_event_log"
+
+    async def execute(stmt, params=None):
+        # EXISTS probe: rows of 2026-11 sit in the default partition, 2026-10 is clean.
+        return MagicMock(scalar=MagicMock(return_value=str((params or {}).get("lo")).startswith("2026-11")))
+
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=execute)
+    session.commit = AsyncMock()
+    listed = [hp.PartitionInfo(hp.default_partition_name(table), None, 8192, 4)]
+    with patch.object(hp, "list_partitions", AsyncMock(return_value=listed)):
+        created = await hp.ensure_partitions(session, table, now=NOW, ahead_months=1)
+
+    assert created == ["player_event_log_p202610", "player_event_log_p202611"]
+    sql = [str(c.args[0]) for c in session.execute.await_args_list if "SELECT EXISTS" not in str(c.args[0])]
+    assert sql == [
+        hp.create_partition_sql(table, NOW),
+        *hp.move_from_default_sql(table, datetime(2026, 11, 1, tzinfo=timezone.utc)),
+    ]
+    assert sql[-1] == (
+        'ALTER TABLE "player_event_log" ATTACH PARTITION "player_event_log_p202611" '
+        "FOR VALUES FROM ('2026-11-01T00:00:00+00:00') TO ('2026-12-01T00:00:00+00:00')"
+    )
+    assert 'DELETE FROM "player_event_log_default"' in sql[-2]
+
+
+def test_only_whole_months_past_retention_expire():
+    parts = [
+        _part("player_event_log", 2025, 11),
+        _part("player_event_log", 2025, 9),
+        _part("player_event_log", 2025, 10),
+        hp.PartitionInfo("player_event_log_legacy", None, 1, 1),
+    ]
+    # Cutoff 2025-10-19: September ended before it, October did not.
+    out = hp.expired(parts, now=NOW, retention_days=365)
+    assert [p.name for p in out] == ["player_event_log_p202509"]
+    assert hp.expired(parts, now=NOW, retention_days=0) == []
+
+
+def test_read_since_bounds_history_to_recent_partitions():
+    assert hp.read_since(NOW, days=90) == datetime(2026, 7, 1, tzinfo=timezone.utc)
+    assert hp.read_since(NOW, days=0) is None
+
+
+@pytest.mark.asyncio
+async def test_maintain_creates_ahead_and_archives_then_drops(tmp_path):
+    table = "economy_ledger"
+    session = MagicMock()
+    session.execute = AsyncMock()
+    session.commit = AsyncMock()
+    listed = {
+        "player_event_log": [_part("player_event_log", 2026, 10)],
+        table: [_part(table, 2024, 9), _part(table, 2026, 10), _part(table, 2026, 11)],
+    }
+    archive = AsyncMock(return_value=3)
+    with (
+        patch.object(hp, "list_partitions", AsyncMock(side_effect=lambda s, t: list(listed[t]))),
+        patch.object(hp, "archive_partition", archive),
+        patch("waifu_bot.core.config.settings.event_log_retention_days", 365),
+        patch("waifu_bot.core.config.settings.economy_ledger_retention_days", 730),
+    ):
+        out = await hp.maintain_history(session, now=NOW, ahead_months=2, archive_dir=str(tmp_path))
+
+    assert out["player_event_log"] == {"created": ["player_event_log_p202611", "player_event_log_p202612"],
+                                       "dropped": []}
+    assert out[table] == {"created": ["economy_ledger_p202612"], "dropped": ["economy_ledger_p202409"]}
+    archive.assert_awaited_once_with(session, table, "economy_ledger_p202409", str(tmp_path))
+    sql = [str(c.args[0]) for c in session.execute.await_args_list]
+    assert sql[-2:] == [
+        'ALTER TABLE "economy_ledger" DETACH PARTITION "economy_ledger_p202409"',
+        'DROP TABLE "economy_ledger_p202409"',
+    ]
+
+
+class _Stream:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def mappings(self):
+        return self
+
+    async def partitions(self, size):
+        for i in range(0, len(self._rows), size):
+            yield self._rows[i : i + size]
+
+
+@pytest.mark.asyncio
+async def test_archive_partition_writes_gzip_jsonl(tmp_path):
+    rows = [{"id": i, "player_id": 7, "created_at": NOW, "payload": {"n": i}} for i in range(3)]
+    session = MagicMock()
+    session.stream = AsyncMock(return_value=_Stream(rows))
+    with patch.object(hp, "ARCHIVE_CHUNK", 2):
+        n = await hp.archive_partition(session, "player_event_log", "player_event_log_p202509", str(tmp_path))
+
+    path = tmp_path / "player_event_log" / "player_event_log_p202509.jsonl.gz"
+    assert n == 3 and path.exists() and not path.with_suffix(".gz.tmp").exists()
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        lines = [json.loads(line) for line in fh]
+    assert [r["id"] for r in lines] == [0, 1, 2] and lines[0]["created_at"] == str(NOW)
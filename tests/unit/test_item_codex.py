@@ -8,6 +8,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 
 from waifu_bot.services import item_codex as ic
+from waifu_bot.services.player_pricing import PlayerPricingContext
 
 
 def test_direct_base_template_id_from_attribute() -> None:
@@ -112,9 +113,9 @@ async def test_get_shop_inventory_registers_codex_for_active_offers() -> None:
     svc = ShopService()
     with patch.object(svc, "_ensure_offers", new_callable=AsyncMock, return_value=[offer]):
         with patch(
-            "waifu_bot.services.shop.merchant_discount_pct_for_player",
+            "waifu_bot.services.shop.get_player_pricing_context",
             new_callable=AsyncMock,
-            return_value=0.0,
+            return_value=PlayerPricingContext(player_id=1),
         ):
             with patch.object(svc, "_enrich_inv_with_template_stats", new_callable=AsyncMock):
                 with patch.object(
@@ -150,9 +151,9 @@ async def test_get_shop_inventory_skips_codex_for_sold_offers() -> None:
     svc = ShopService()
     with patch.object(svc, "_ensure_offers", new_callable=AsyncMock, return_value=[offer]):
         with patch(
-            "waifu_bot.services.shop.merchant_discount_pct_for_player",
+            "waifu_bot.services.shop.get_player_pricing_context",
             new_callable=AsyncMock,
-            return_value=0.0,
+            return_value=PlayerPricingContext(player_id=1),
         ):
             with patch.object(svc, "_enrich_inv_with_template_stats", new_callable=AsyncMock):
                 with patch.object(
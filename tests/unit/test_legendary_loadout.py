@@ -0,0 +1,104 @@
+"""Unit tests: compiled legendary loadout (handler resolution, shared context, revision cache)."""
+
+from __future__ import annotations
+
+from unittest.mock import AsyncMock
+
+import pytest
+
+from waifu_bot.game.legendary_bonuses import loader
+from waifu_bot.game.legendary_bonuses.context import BonusContext
+from waifu_bot.game.legendary_bonuses.engine import run_outgoing_handlers
+from waifu_bot.game.legendary_bonuses.handlers import BONUS_HANDLERS
+from waifu_bot.game.legendary_bonuses.loadout import compile_loadout
+from waifu_bot.game.legendary_bonuses.state import initial_battle_state
+
+from tests.unit.fake_redis import FakeRedis
+
+ROWS = [
+    {"bonus_key": "BOSS_SLAYER", "params": {"damage_multiplier": 3.0}, "inventory_item_id": 1, "slot_type": "weapon_1"},
+    {"bonus_key": "GOLD_PULSE", "params": {"gold_threshold": 10}, "inventory_item_id": 2, "slot_type": "ring_1"},
+    {
+        "bonus_key": "GIF_LOOP",
+        "params": {"handler": "media", "media_types": ["gif"], "effects": {"damage_multiplier": 2.0}},
+        "inventory_item_id": 3,
+        "slot_type": "amulet",
+    },
+    {"bonus_key": "KILLING_BLOW_HEAL", "params": {}, "inventory_item_id": 4, "slot_type": "costume"},
+]
+
+
+def _ctx(**kwargs) -> BonusContext:
+    base = dict(
+        player_id=1,
+        waifu_id=1,
+        session_id=1,
+        message_type="gif",
+        monster_is_boss=True,
+        waifu_gold=100,
+        base_damage=100,
+        battle_state=initial_battle_state(),
+    )
+    base.update(kwargs)
+    return BonusContext(**base)
+
+
+def test_compile_resolves_handlers_once():
+    loadout = compile_loadout(ROWS, legendary_count=4)
+    handlers = {b.bonus_key: b.handler for b in loadout.bonuses}
+    assert handlers["BOSS_SLAYER"] is BONUS_HANDLERS["BOSS_SLAYER"]
+    assert handlers["GIF_LOOP"] is not None
+    assert handlers["KILLING_BLOW_HEAL"] is None
+    assert [b.bonus_key for b in loadout.outgoing] == ["BOSS_SLAYER", "GOLD_PULSE", "GIF_LOOP"]
+    assert loadout.rows == ROWS
+    with pytest.raises(TypeError):
+        loadout.bonuses[0].params["damage_multiplier"] = 9.0  # type: ignore[index]
+
+
+@pytest.mark.parametrize("phase", ["full", "pre_crit", "post_crit"])
+def test_compiled_loadout_matches_raw_rows(phase):
+    ctx = _ctx()
+    from_rows = run_outgoing_handlers(ROWS, ctx, phase=phase)
+    from_loadout = run_outgoing_handlers(compile_loadout(ROWS), ctx, phase=phase)
+    assert from_loadout == from_rows
+    if phase == "full":
+        assert [c.bonus_key for c in from_loadout.contributions] == ["BOSS_SLAYER", "GOLD_PULSE", "GIF_LOOP"]
+    assert isinstance(ctx.battle_state, dict)
+
+
+@pytest.fixture
+def db(monkeypatch) -> dict[str, AsyncMock]:
+    loader.clear_loadout_cache()
+    mocks = {
+        "count": AsyncMock(return_value=2),
+        "rows": AsyncMock(return_value=ROWS[:2]),
+    }
+    monkeypatch.setattr(loader, "count_equipped_legendaries", mocks["count"])
+    monkeypatch.setattr(loader, "get_active_legendary_bonuses", mocks["rows"])
+    yield mocks
+    loader.clear_loadout_cache()
+
+
+@pytest.mark.asyncio
+async def test_loadout_is_cached_until_inventory_revision_moves(db):
+    redis = FakeRedis()
+    first = await loader.load_legendary_loadout(object(), 7, redis=redis)
+    assert first.legendary_count == 2 and len(first.bonuses) == 2
+    assert await loader.load_legendary_loadout(object(), 7, redis=redis) is first
+    assert db["rows"].await_count == 1
+
+    redis.hashes["player:rev:7"]["inventory"] = "1"
+    second = await loader.load_legendary_loadout(object(), 7, redis=redis)
+    assert second is not first and db["rows"].await_count == 2
+
+    # No Redis → no cache tag, always from the database.
+    await loader.load_legendary_loadout(object(), 7)
+    assert db["rows"].await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_no_legendaries_skips_the_bonus_query(db):
+    db["count"].return_value = 0
+    loadout = await loader.load_legendary_loadout(object(), 8, redis=FakeRedis())
+    assert not loadout.active and loadout.rows == []
+    db["rows"].assert_not_awaited()
@@ -0,0 +1,123 @@
+"""Unit tests: LLM usage write-behind buffer, hourly rollups and report source selection."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from waifu_bot.services import llm_usage, llm_usage_ledger as ledger
+
+from tests.unit.fake_redis import FakeRedis
+
+
+def _row(minute: int, *, caller="gd", ok=True, model="m1", pt=10, ct=5, latency=100):
+    return {
+        "created_at": datetime(2026, 5, 1, 12, minute, tzinfo=timezone.utc),
+        "caller": caller,
+        "modality": "text",
+        "player_id": 7,
+        "source": "telegram",
+        "trigger": "/gd",
+        "provider": "routerai",
+        "model": model,
+        "http_status": 200 if ok else 500,
+        "ok": ok,
+        "latency_ms": latency,
+        "prompt_tokens": pt,
+        "completion_tokens": ct,
+    }
+
+
+def test_encode_decode_roundtrip():
+    row = _row(5)
+    assert ledger.decode_row(ledger.encode_row(row)) == row
+    assert ledger.decode_row("{not json") is None
+
+
+def test_rollup_groups_by_hour_and_dimensions():
+    rows = [_row(1), _row(30, ok=False, latency=300), _row(59, model=None), _row(2, caller="tavern")]
+    rows.append({**_row(0), "created_at": datetime(2026, 5, 1, 13, 0, tzinfo=timezone.utc)})
+    out = {(r["hour"].hour, r["caller"], r["model"]): r for r in ledger.rollup_rows(rows)}
+    assert set(out) == {(12, "gd", "m1"), (12, "gd", ""), (12, "tavern", "m1"), (13, "gd", "m1")}
+    gd = out[(12, "gd", "m1")]
+    assert (gd["requests"], gd["ok"], gd["latency_ms_sum"], gd["prompt_tokens"]) == (2, 1, 400, 20)
+
+
+def test_hourly_upsert_accumulates():
+    sql = str(
+        ledger.hourly_upsert_stmt(ledger.rollup_rows([_row(1)])).compile(dialect=postgresql.dialect())
+    )
+    assert "ON CONFLICT (hour, caller, modality, provider, model, source) DO UPDATE" in sql
+    assert "requests = (llm_usage_hourly.requests + excluded.requests)" in sql
+
+
+@pytest.mark.asyncio
+async def test_record_enqueues_without_touching_db():
+    redis = FakeRedis()
+    with patch.object(ledger, "buffer_redis", return_value=redis), patch(
+        "waifu_bot.db.session.SessionLocal"
+    ) as session_local:
+        await llm_usage.record_llm_http(
+            caller="gd", modality="text", provider="routerai", model="m1",
+            http_status=200, ok=True, latency_ms=42, prompt_tokens=3, completion_tokens=4,
+        )
+    session_local.assert_not_called()
+    (raw,) = redis.lists[ledger.BUF_KEY]
+    row = ledger.decode_row(raw)
+    assert row["caller"] == "gd" and row["latency_ms"] == 42 and row["source"] == "background"
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_batch_and_clears_inflight():
+    redis = FakeRedis()
+    for minute in range(3):
+        await ledger.enqueue(redis, _row(minute))
+    session = MagicMock()
+    session.execute = AsyncMock()
+    session.commit = AsyncMock()
+
+    assert await ledger.flush_llm_usage_buffer(session, redis) == 3
+    # One multi-row raw insert + one rollup upsert for the single (hour, dims) bucket.
+    assert session.execute.await_count == 2
+    session.commit.assert_awaited_once()
+    assert redis.lists == {}
+
+    assert await ledger.flush_llm_usage_buffer(session, redis) == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_keeps_inflight_when_commit_fails():
+    redis = FakeRedis()
+    await ledger.enqueue(redis, _row(1))
+    session = MagicMock()
+    session.execute = AsyncMock()
+    session.commit = AsyncMock(side_effect=RuntimeError("db down"))
+    with pytest.raises(RuntimeError):
+        await ledger.flush_llm_usage_buffer(session, redis)
+    assert len(redis.lists[ledger.INFLIGHT_KEY]) == 1
+
+
+@pytest.mark.asyncio
+async def test_usage_report_reads_rollups_for_hour_aligned_window():
+    empty = MagicMock()
+    empty.one.return_value = MagicMock(n=0, ok=0, latency_sum=0, prompt_tokens=0, completion_tokens=0)
+    empty.scalar_one.return_value = 0
+    empty.all.return_value = []
+    empty.scalars.return_value.all.return_value = []
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=empty)
+
+    since = datetime(2026, 5, 1, 0, tzinfo=timezone.utc)
+    until = datetime(2026, 5, 2, 0, tzinfo=timezone.utc)
+    out = await llm_usage.usage_report(session, since=since, until=until)
+    assert out["aggregates"] == "hourly"
+    totals_sql = str(session.execute.await_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+    assert "FROM llm_usage_hourly" in totals_sql
+
+    out = await llm_usage.usage_report(session, since=since.replace(minute=30), until=until)
+    assert out["aggregates"] == "raw"
+    out = await llm_usage.usage_report(session, since=since, until=until, player_id=7)
+    assert out["aggregates"] == "raw"
@@ -0,0 +1,184 @@
+"""Unit tests: maintenance job engine (chunking, checkpoints, cancel, CPU pool) and rescale snapshots."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from waifu_bot.core.config import settings
+from waifu_bot.services import maintenance_jobs as mj
+from waifu_bot.services.background_lock import _INSTANCE_ID
+from waifu_bot.services.item_ilvl_rescale import (
+    apply_rescale,
+    compute_rescale,
+    rescale_legacy_plus_item,
+    rescale_snapshot,
+)
+
+
+@pytest.fixture
+def fake_job(monkeypatch):
+    ids = list(range(1, 12))
+    seen: list[list[int]] = []
+
+    async def keys(session, after, limit, params):
+        return [i for i in ids if after is None or i > after][:limit]
+
+    async def process(session, keys_, ctx):
+        seen.append(list(keys_))
+        if set(keys_) & set(ctx.params.get("fail_on", [])):
+            raise RuntimeError("boom")
+        return mj.ChunkResult(processed=len(keys_), changed=len(keys_) // 2)
+
+    job = mj.MaintenanceJob(name="test_job", title="t", keys=keys, process=process, chunk_size=4)
+    monkeypatch.setitem(mj.JOBS, job.name, job)
+    monkeypatch.setattr(settings, "maintenance_job_duty_cycle", 1.0)
+    monkeypatch.setattr(settings, "maintenance_job_max_active_queries", 0)
+    return job, seen
+
+
+def _session(run, *, cancel_after: int | None = None):
+    session = MagicMock()
+    session.get = AsyncMock(return_value=run)
+    checks = {"n": 0}
+
+    async def scalar(_stmt):
+        checks["n"] += 1
+        return cancel_after is not None and checks["n"] > cancel_after
+
+    session.scalar = AsyncMock(side_effect=scalar)
+    session.execute = AsyncMock()
+    session.commit = AsyncMock()
+    session.rollback = AsyncMock()
+    session.flush = AsyncMock()
+    return session
+
+
+def _run(**kw):
+    base = dict(
+        id=7, job_name="test_job", params={}, dry_run=False, status="running",
+        claimed_by=_INSTANCE_ID, cursor=None, chunk_size=4,
+    )
+    return SimpleNamespace(**{**base, **kw})
+
+
+def _checkpoints(session) -> list[dict]:
+    out = []
+    for call in session.execute.await_args_list:
+        params = call.args[0].compile().params
+        if "cursor" in params:
+            out.append(params)
+    return out
+
+
+@pytest.mark.asyncio
+async def test_run_inline_pages_by_keyset_and_honours_limit(fake_job):
+    _, seen = fake_job
+    session = MagicMock()
+    session.flush = AsyncMock()
+    res = await mj.run_job_inline(session, "test_job")
+    assert seen == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11]]
+    assert (res.processed, res.changed) == (11, 5)
+
+    seen.clear()
+    res = await mj.run_job_inline(session, "test_job", limit=6)
+    assert seen == [[1, 2, 3, 4], [5, 6]] and res.processed == 6
+
+    with pytest.raises(mj.MaintenanceJobError):
+        await mj.run_job_inline(session, "no_such_job")
+
+
+@pytest.mark.asyncio
+async def test_execute_run_commits_checkpoint_per_chunk_and_resumes(fake_job):
+    _, seen = fake_job
+    session = _session(_run(cursor=4))
+    assert await mj.execute_run(session, 7) == "done"
+    # Resumed after the stored cursor: chunk [1..4] is not redone.
+    assert seen == [[5, 6, 7, 8], [9, 10, 11]]
+    assert [c["cursor"] for c in _checkpoints(session)] == [8, 11]
+    assert session.commit.await_count == 3  # two chunks + final status
+
+
+@pytest.mark.asyncio
+async def test_execute_run_dry_run_rolls_back_chunk_writes(fake_job):
+    session = _session(_run(dry_run=True))
+    assert await mj.execute_run(session, 7) == "done"
+    assert session.rollback.await_count >= 3
+    assert [c["cursor"] for c in _checkpoints(session)] == [4, 8, 11]
+
+
+@pytest.mark.asyncio
+async def test_execute_run_cancel_and_failure(fake_job):
+    _, seen = fake_job
+    session = _session(_run(), cancel_after=1)
+    assert await mj.execute_run(session, 7) == "cancelled"
+    assert seen == [[1, 2, 3, 4]]
+
+    session = _session(_run(params={"fail_on": [6]}))
+    assert await mj.execute_run(session, 7) == "failed"
+    # The failed chunk is not checkpointed, so a resume retries it.
+    assert [c["cursor"] for c in _checkpoints(session)] == [4]
+
+    with pytest.raises(mj.MaintenanceJobError):
+        await mj.execute_run(_session(_run(claimed_by="other:1")), 7)
+
+
+@pytest.mark.asyncio
+async def test_each_key_counts_errors_per_savepoint():
+    session = MagicMock()
+    session.begin_nested = MagicMock(return_value=AsyncMock())
+
+    async def fn(key):
+        if key == 2:
+            raise ValueError("bad")
+        return key == 3
+
+    res = await mj.each_key(session, [1, 2, 3], fn, label="t")
+    assert (res.processed, res.changed, res.errors) == (3, 1, 1)
+
+
+def test_duty_cycle_and_payload(monkeypatch):
+    monkeypatch.setattr(settings, "maintenance_job_duty_cycle", 0.25)
+    assert mj._duty_sleep_sec(1.0) == pytest.approx(3.0)
+    row = SimpleNamespace(
+        id=1, job_name="gear_scores", params={}, dry_run=False, status="running", cancel_requested=False,
+        cursor=50, chunk_size=200, processed=50, changed=3, errors=0, total_estimate=200, created_by=1,
+        created_at=None, started_at=None, finished_at=None, updated_at=None, last_error=None,
+    )
+    assert mj.run_payload(row)["progress"] == 0.25
+
+
+def _plus_item(i: int):
+    affixes = [SimpleNamespace(id=i * 10, stat="strength", value="12", affix_tier=1, tier=1)]
+    return SimpleNamespace(
+        id=i, base_stat_value=40, damage_min=10, damage_max=20, power_rank=0, plus_level_source=15,
+        secondary_fraction_value=0.02, ilvl_stat_scale_ver=0, affixes=affixes,
+        item=SimpleNamespace(damage=20),
+    )
+
+
+@pytest.mark.asyncio
+async def test_rescale_snapshot_matches_in_place_rescale_via_pool():
+    expected = [_plus_item(i) for i in range(mj.CPU_POOL_MIN_ITEMS)]
+    for inv in expected:
+        rescale_legacy_plus_item(inv)
+
+    ctx = mj.JobContext(processes=2)
+    try:
+        actual = [_plus_item(i) for i in range(mj.CPU_POOL_MIN_ITEMS)]
+        results = await ctx.run_cpu(compute_rescale, [rescale_snapshot(inv) for inv in actual])
+    finally:
+        ctx.close()
+    for inv, res in zip(actual, results):
+        apply_rescale(inv, res)
+    for got, want in zip(actual, expected):
+        assert vars(got.item) == vars(want.item)
+        assert [vars(a) for a in got.affixes] == [vars(a) for a in want.affixes]
+        assert {k: v for k, v in vars(got).items() if k not in ("item", "affixes")} == {
+            k: v for k, v in vars(want).items() if k not in ("item", "affixes")
+        }
+    done = _plus_item(1)
+    done.ilvl_stat_scale_ver = 99
+    assert compute_rescale(rescale_snapshot(done)) is None
@@ -0,0 +1,88 @@
+"""Unit tests: per-request PlayerPricingContext and GET /inventory paging."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from waifu_bot.api import inventory_routes
+from waifu_bot.game.formulas import SHOP_SELL_VS_BUY_RATIO, shop_buy_price_from_merchant_discount
+from waifu_bot.services import player_pricing as pp
+from waifu_bot.services.passive_skills import compute_passive_buy_price_from_bonuses
+
+
+def test_context_prices_match_legacy_formula():
+    ps = {"shop_discount_pct": 0.1, "trade_flat": 3}
+    hs = {"shop_discount_pct": 5.0}
+    ctx = pp.PlayerPricingContext(player_id=1, charm=40, merchant_discount_pct=12.5, passive_bonuses=ps, hidden_bonuses=hs)
+    for base in (1, 77, 1000, 25_000):
+        raw_buy = shop_buy_price_from_merchant_discount(base, 12.5)
+        anchor = compute_passive_buy_price_from_bonuses(raw_buy, ps, hs)
+        assert ctx.buy_price(base) == anchor
+        assert ctx.sell_price(base) == max(1, int(anchor * SHOP_SELL_VS_BUY_RATIO))
+    assert ctx.sell_prices([10, 20]) == [ctx.sell_price(10), ctx.sell_price(20)]
+
+
+def test_inventory_item_base_value_falls_back_to_tier_rarity():
+    assert pp.inventory_item_base_value(SimpleNamespace(item=SimpleNamespace(base_value=450), tier=3, rarity=2)) == 450
+    assert pp.inventory_item_base_value(SimpleNamespace(item=None, tier=3, rarity=2)) == 600
+
+
+@pytest.mark.asyncio
+async def test_context_is_loaded_once_per_session():
+    session = SimpleNamespace(info={})
+    with patch.object(pp, "equipped_charm_and_merchant_bonuses", new_callable=AsyncMock, return_value=(20, 1.0, 0.0)) as eq, \
+            patch.object(pp, "get_passive_skill_bonuses", new_callable=AsyncMock, return_value={}) as ps:
+        a = await pp.get_player_pricing_context(session, 9)
+        b = await pp.get_player_pricing_context(session, 9)
+    assert a is b
+    eq.assert_awaited_once()
+    ps.assert_awaited_once()
+    assert a.charm == 20 and a.merchant_discount_pct > 0
+
+    pp.invalidate_player_pricing_context(session, 9)
+    assert 9 not in session.info[pp._SESSION_PRICING_CACHE_KEY]
+
+
+@pytest.mark.asyncio
+async def test_list_inventory_keyset_page_prices_without_per_item_queries():
+    items = [SimpleNamespace(id=i, item=SimpleNamespace(base_value=100 * i), tier=1, rarity=1) for i in (11, 12)]
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = items
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=result)
+    ctx = pp.PlayerPricingContext(player_id=5)
+
+    with patch.object(inventory_routes, "build_inventory_payloads", new_callable=AsyncMock, return_value=[{}, {}]), \
+            patch.object(inventory_routes, "get_player_pricing_context", new_callable=AsyncMock, return_value=ctx) as get_ctx, \
+            patch.object(inventory_routes, "enrich_items_with_image_urls", new_callable=AsyncMock):
+        out = await inventory_routes.list_inventory(
+            player_id=5, session=session, rarity=None, equipped=None, economy=None,
+            client=None, limit=2, offset=0, after_id=10,
+        )
+
+    get_ctx.assert_awaited_once()
+    assert [row["sell_price"] for row in out["items"]] == [ctx.sell_price(1100), ctx.sell_price(1200)]
+    assert out["next_after_id"] == 12
+    sql = str(session.execute.await_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "inventory_items.id > " in sql
+    assert "ORDER BY inventory_items.id ASC" in sql
+    assert "OFFSET" not in sql
+
+
+def test_flush_of_pricing_rows_drops_that_players_context():
+    from waifu_bot.db import models as m
+
+    cache = {9: pp.PlayerPricingContext(player_id=9), 10: pp.PlayerPricingContext(player_id=10)}
+    equipped = m.InventoryItem(player_id=9, equipment_slot=1)
+    other = m.Player(id=10)
+    session = SimpleNamespace(info={pp._SESSION_PRICING_CACHE_KEY: cache}, new=[equipped], dirty=[other], deleted=[])
+    pp._drop_changed(session, None, None)
+    assert list(cache) == [10]  # Player rows are not pricing inputs
+
+    session.new = [m.PlayerPassiveSkill(player_id=10, node_id="n1", level=1)]
+    pp._drop_changed(session, None, None)
+    assert cache == {}
@@ -0,0 +1,121 @@
+"""Unit tests: per-player revision counters and per-section client snapshot rebuilds."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.util import greenlet_spawn
+
+from waifu_bot.core import redis as redis_core
+from waifu_bot.db import models as m
+from waifu_bot.services import client_snapshots as cs
+from waifu_bot.services import player_revisions as pr
+
+from tests.unit.fake_redis import FakeRedis
+
+
+def _persistent_player(session: Session, pid: int) -> m.Player:
+    player = m.Player(id=pid, gold=100, username="p")
+    make_transient_to_detached(player)
+    session.add(player)
+    return player
+
+
+def test_collect_attributes_tracked_rows_to_domains():
+    session = Session()
+    session.add(m.InventoryItem(player_id=7))
+    session.add(m.HiredWaifu(player_id=7))
+    player = _persistent_player(session, 8)
+    player.last_active = None
+    pr._collect(session, None, None)
+    assert session.info[pr._PENDING_KEY] == {7: {"inventory", "roster"}}
+
+    player.gold = 150
+    pr._collect(session, None, None)
+    assert session.info[pr._PENDING_KEY][8] == {"wallet"}
+
+
+def test_note_revision_rejects_unknown_domain():
+    session = Session()
+    pr.note_revision(session, 3, "roster")
+    assert session.info[pr._PENDING_KEY][3] == {"roster"}
+    with pytest.raises(ValueError):
+        pr.note_revision(session, 3, "guild")
+
+
+@pytest.mark.asyncio
+async def test_after_commit_bumps_inside_async_session_greenlet(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(redis_core, "_redis", redis)
+    session = Session()
+    pr.note_revision(session, 5, "inventory", "wallet")
+
+    await greenlet_spawn(pr._after_commit, session)
+
+    assert redis.hashes[pr.revision_key(5)] == {"inventory": "1", "wallet": "1"}
+    assert pr._PENDING_KEY not in session.info
+
+
+@pytest.mark.asyncio
+async def test_read_revisions_stamps_epoch_once():
+    redis = FakeRedis()
+    await pr.bump(redis, 5, "inventory")
+    first = await pr.read_revisions(redis, 5)
+    assert first["inventory"] == 1 and first["roster"] == 0 and first["epoch"]
+    assert (await pr.read_revisions(redis, 5))["epoch"] == first["epoch"]
+    assert await pr.read_revisions(None, 5) is None
+
+
+def test_stale_sections_by_domain_and_epoch():
+    revs = {"epoch": "e1", "inventory": 2, "roster": 0, "waifu": 4, "wallet": 9}
+    snap = SimpleNamespace(
+        section_revisions_json={"epoch": "e1", "sections": cs._section_tokens(revs)}
+    )
+    assert cs.stale_sections(snap, revs) == ()
+    assert cs.stale_sections(snap, {**revs, "inventory": 3}) == ("inventory",)
+    assert cs.stale_sections(snap, {**revs, "waifu": 5}) == ("hub", "mercenaries")
+    assert cs.stale_sections(snap, {**revs, "epoch": "e2"}) == cs.ALL_SECTIONS
+    assert cs.stale_sections(snap, None) == cs.ALL_SECTIONS
+    assert cs.stale_sections(None, revs) == cs.ALL_SECTIONS
+
+
+@pytest.mark.asyncio
+async def test_snapshot_rebuilds_only_stale_section(monkeypatch):
+    redis = FakeRedis()
+    await pr.bump(redis, 5, "inventory", "waifu", "wallet", "roster")
+    revs = await pr.read_revisions(redis, 5)
+    snap = m.PlayerClientSnapshot(
+        player_id=5,
+        hub_json={"gold": 1},
+        loadout_json={"items": []},
+        inventory_summary_json={"bag_count": 0},
+        mercenaries_summary_json={"count": 0},
+        revision=3,
+        section_revisions_json={"epoch": revs["epoch"], "sections": cs._section_tokens(revs)},
+    )
+    session = MagicMock()
+    session.get = AsyncMock(return_value=snap)
+    session.flush = AsyncMock()
+    session.commit = AsyncMock()
+    build_inv = AsyncMock(return_value=({"items": [1]}, {"bag_count": 1}))
+    build_hub = AsyncMock()
+    build_mercs = AsyncMock()
+    monkeypatch.setattr(cs, "_build_inventory", build_inv)
+    monkeypatch.setattr(cs, "_build_hub", build_hub)
+    monkeypatch.setattr(cs, "_build_mercenaries", build_mercs)
+
+    out = await cs.get_or_build_client_snapshot(session, 5, redis=redis)
+    assert out["revision"] == 3
+    build_inv.assert_not_awaited()
+
+    await pr.bump(redis, 5, "inventory")
+    out = await cs.get_or_build_client_snapshot(session, 5, redis=redis)
+    build_inv.assert_awaited_once()
+    build_hub.assert_not_awaited()
+    build_mercs.assert_not_awaited()
+    assert out["inventory_summary"] == {"bag_count": 1}
+    assert out["revision"] == 4
+    assert snap.section_revisions_json["sections"]["inventory"] == [2]
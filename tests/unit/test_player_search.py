@@ -0,0 +1,118 @@
+"""Unit tests: player search normalization, ranking, paging and the Postgres statements."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from waifu_bot.services import player_search as ps
+from waifu_bot.services.armory_service import search_players_page
+
+
+def _sql(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+@pytest.fixture
+def memory_index():
+    idx = ps.MemoryPlayerSearchIndex(
+        [
+            ps.SearchDoc.build(1, "@Alice", "Алиса", "Мирай"),
+            ps.SearchDoc.build(2, "alice_w", "Bob", "Алёна"),
+            ps.SearchDoc.build(3, "malice", None, "Кира"),
+            ps.SearchDoc.build(4, "zed", "Zed", "Алиса"),
+            ps.SearchDoc.build(12345, "carol", "", ""),
+        ]
+    )
+    ps.set_backend(idx)
+    yield idx
+    ps.set_backend(None)
+
+
+def test_normalize_and_parse():
+    assert ps.normalize_name("  @Алёна   Ёлкина ") == "алена елкина"
+    assert ps.normalize_name(None) == ""
+    assert ps.SearchQuery.parse("  @ ") is None
+    q = ps.SearchQuery.parse(" 12345 ")
+    assert q.player_id == 12345 and q.substring
+    assert not ps.SearchQuery.parse("al").substring
+    assert ps.SearchDoc.build(1, "A", "", "Б").search_text == "a б"
+
+
+@pytest.mark.asyncio
+async def test_memory_index_ranks_exact_prefix_substring(memory_index):
+    page = await ps.find_player_ids(None, "alice")
+    # exact username, then prefix, then substring ("malice").
+    assert page.player_ids == [1, 2, 3] and not page.has_more
+
+    page = await ps.find_player_ids(None, "Алена")
+    assert page.player_ids == [2]
+
+    # Two chars: prefix only, no "malice".
+    page = await ps.find_player_ids(None, "al")
+    assert page.player_ids == [1, 2]
+
+    page = await ps.find_player_ids(None, "12345")
+    assert page.player_ids == [12345]
+
+    page = await ps.find_player_ids(None, "alice", exclude_player_id=1)
+    assert page.player_ids == [2, 3]
+
+
+@pytest.mark.asyncio
+async def test_memory_index_pages(memory_index):
+    first = await ps.find_player_ids(None, "alice", limit=2)
+    assert first.player_ids == [1, 2] and first.has_more
+    second = await ps.find_player_ids(None, "alice", limit=2, offset=2)
+    assert second.player_ids == [3] and not second.has_more
+    assert (await ps.find_player_ids(None, "   ")).player_ids == []
+
+
+def test_pg_search_stmt_uses_prefix_and_trigram_paths():
+    backend = ps.PgPlayerSearchIndex()
+    sql = _sql(backend.search_stmt(ps.SearchQuery.parse("ali_ce"), limit=20))
+    assert "player_search_index" in sql and "players" not in sql.replace("player_search_index", "")
+    assert "similarity(" in sql and "ESCAPE" in sql
+    assert "ILIKE" not in sql and "lower(" not in sql
+    params = backend.search_stmt(ps.SearchQuery.parse("ali_ce"), limit=20).compile(dialect=postgresql.dialect()).params
+    assert "ali\\_ce%" in params.values() and "%ali\\_ce%" in params.values()
+
+    short = _sql(backend.search_stmt(ps.SearchQuery.parse("al"), limit=20))
+    assert "similarity(" not in short
+
+    by_id = backend.search_stmt(ps.SearchQuery.parse("42"), limit=5, exclude_player_id=7)
+    params = by_id.compile(dialect=postgresql.dialect()).params
+    assert 42 in params.values() and 7 in params.values() and 6 in params.values()
+
+
+def test_refresh_stmt_upserts_from_players_and_waifus():
+    sql = _sql(ps.refresh_stmt([1, 2]))
+    assert "INSERT INTO player_search_index" in sql
+    assert "LEFT OUTER JOIN main_waifus" in sql
+    assert "ON CONFLICT (player_id) DO UPDATE" in sql
+
+
+@pytest.mark.asyncio
+async def test_search_players_page_keeps_rank_order(memory_index):
+    def row(pid, username, wname, level):
+        return (
+            SimpleNamespace(id=pid, username=username, first_name=None),
+            SimpleNamespace(name=wname, level=level) if wname else None,
+        )
+
+    result = MagicMock()
+    result.all.return_value = [row(3, "malice", "Кира", 5), row(1, "Alice", "Мирай", 10), row(2, "alice_w", None, 0)]
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=result)
+
+    out = await search_players_page(session, "alice", limit=2)
+    assert [x["telegram_id"] for x in out["items"]] == [1, 2]
+    assert out["has_more"] and out["next_offset"] == 2
+    assert out["items"][1]["level"] is None
+
+    out = await search_players_page(session, "alice", limit=2, offset=2)
+    assert [x["telegram_id"] for x in out["items"]] == [3]
+    assert not out["has_more"] and out["next_offset"] is None
@@ -0,0 +1,124 @@
+"""Unit tests: per-scope SQL accounting, N+1 shapes and declared query budgets."""
+
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from waifu_bot.services import query_budget as qb
+from waifu_bot.services.query_budget_http import QueryBudgetHttpMiddleware
+
+
+@pytest.fixture
+def engine():
+    eng = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    qb.install_engine_hooks(eng)
+    qb.install_engine_hooks(eng)  # idempotent
+    with eng.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("INSERT INTO items (id, name) VALUES (1, 'a'), (2, 'b'), (3, 'c')"))
+    qb.reset()
+    yield eng
+    qb.reset()
+    eng.dispose()
+
+
+def test_normalize_collapses_literals_and_lists():
+    a = qb.normalize_sql("SELECT * FROM items WHERE id IN ($1::INTEGER, $2::INTEGER, $3::INTEGER)")
+    b = qb.normalize_sql("SELECT *  FROM items\n WHERE id IN ($1::INTEGER)")
+    assert a == "SELECT * FROM items WHERE id IN (?…)"
+    assert qb.fingerprint(a) != qb.fingerprint(b)
+    assert qb.normalize_sql("SELECT 1 FROM t WHERE name = 'x''y' AND n = 5") == "SELECT ? FROM t WHERE name = ? AND n = ?"
+    assert qb.normalize_sql("INSERT INTO t (a, b) VALUES (?, ?), (?, ?)") == "INSERT INTO t (a, b) VALUES (?…)…"
+
+
+def test_scope_counts_statements_and_flags_repeated_selects(engine):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))  # outside any scope: not counted
+        with qb.query_scope("GET /items") as scope:
+            conn.execute(text("UPDATE items SET name = 'z'"))
+            for i in range(12):
+                conn.execute(text(f"SELECT name FROM items WHERE id = {i}"))
+    assert scope.statements == 13
+    assert scope.rows == 3  # UPDATE rowcount; pysqlite SELECTs report -1 and keep no prefetched rows
+
+    (row,) = qb.snapshot()
+    assert row["scope"] == "GET /items" and row["runs"] == 1 and row["max_statements"] == 13
+    (hit,) = row["n_plus_one"]
+    assert hit["max_repeats"] == 12 and hit["sql"] == "SELECT name FROM items WHERE id = ?"
+
+
+def test_repeated_statement_text_is_normalized_once(engine):
+    qb._shape_of.cache_clear()
+    with engine.connect() as conn, qb.query_scope("tick") as scope:
+        for i in range(5):
+            conn.execute(text("SELECT name FROM items WHERE id = :id"), {"id": i})
+    info = qb._shape_of.cache_info()
+    assert scope.statements == 5 and (info.misses, info.hits) == (1, 4)
+    assert list(scope.shapes.values()) == [5]
+
+
+def test_budget_overrun_counts_and_raises_only_in_strict_mode(engine):
+    with engine.connect() as conn:
+        with qb.query_scope("tick:demo", budget=1):
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        with patch("waifu_bot.core.config.settings.query_budget_strict", True):
+            with pytest.raises(qb.QueryBudgetExceeded, match="tick:demo: 2 statements > budget 1"):
+                with qb.query_scope("tick:demo", budget=1):
+                    conn.execute(text("SELECT 1"))
+                    conn.execute(text("SELECT 2"))
+    (row,) = qb.snapshot()
+    assert row["runs"] == 2 and row["over_budget"] == 2 and row["budget"] == 1
+
+
+@pytest.mark.asyncio
+async def test_run_in_scope_takes_budget_from_tick_function(engine):
+    seen = {}
+
+    @qb.query_budget(5)
+    async def tick() -> str:
+        seen["scope"] = qb.current_scope()
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return "done"
+
+    assert await qb.run_in_scope("tick:demo", tick) == "done"
+    assert (seen["scope"].name, seen["scope"].budget, seen["scope"].statements) == ("tick:demo", 5, 1)
+    assert qb.current_scope() is None
+
+
+def test_http_scope_uses_route_template_and_enforces_endpoint_budget(engine):
+    app = FastAPI()
+    app.add_middleware(QueryBudgetHttpMiddleware)
+
+    @app.get("/api/items/{item_id}")
+    @qb.query_budget(2)
+    async def get_item(item_id: int):
+        with engine.connect() as conn:
+            for _ in range(item_id):
+                conn.execute(text("SELECT name FROM items WHERE id = 1"))
+        return {"ok": True}
+
+    client = TestClient(app)
+    assert client.get("/api/items/2").status_code == 200
+    with patch("waifu_bot.core.config.settings.query_budget_strict", True):
+        with pytest.raises(qb.QueryBudgetExceeded):
+            client.get("/api/items/3")
+    (row,) = qb.snapshot()
+    assert row["scope"] == "GET /items/{item_id}"
+    assert (row["runs"], row["max_statements"], row["over_budget"]) == (2, 3, 1)
+
+
+def test_telegram_update_budget_is_the_outermost_project_middleware():
+    from waifu_bot.services import webhook
+
+    names = [type(m).__name__ for m in webhook._dp.update.outer_middleware]
+    ours = names[names.index("QueryBudgetUpdateMiddleware"):]
+    assert ours[:3] == ["QueryBudgetUpdateMiddleware", "LlmUsageTelegramMiddleware", "PlayerTelegramActivityMiddleware"]
+    assert "QueryBudgetHandlerMiddleware" in [type(m).__name__ for m in webhook._dp.message.middleware]
@@ -0,0 +1,141 @@
+"""Unit tests: cached chat → guild / raid / participants resolution for raid chat logging."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.util import greenlet_spawn
+
+from waifu_bot.db.models import Guild, GuildRaid, GuildRaidChatEvent, GuildRaidParticipant
+from waifu_bot.services import raid_chat_cache as rcc
+from waifu_bot.services.guild_raid_service import apply_raid_message_damage
+from waifu_bot.services.guild_raid_v2_service import log_raid_chat_events
+
+from tests.unit.fake_redis import FakeRedis
+
+NOW = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+RAID = rcc.RaidChatTarget(guild_id=3, raid_id=10, raid_version=2, raid_status="active", participants=frozenset({1, 2}))
+
+
+def _rows(*rows):
+    r = MagicMock()
+    r.first.return_value = rows[0] if rows else None
+    r.scalars.return_value.all.return_value = list(rows)
+    return r
+
+
+def test_entries_round_trip_and_negative_cache():
+    assert rcc._load(rcc._dump(RAID)) == RAID and RAID.logs_chat
+    assert rcc._load(rcc._dump(None)) is None
+    assert rcc._load("{broken") is False
+    assert not rcc.RaidChatTarget(guild_id=3).logs_chat
+    assert not rcc.RaidChatTarget(guild_id=3, raid_id=10, raid_version=1, raid_status="active").logs_chat
+
+
+@pytest.mark.asyncio
+async def test_resolve_hits_db_once_then_serves_from_redis():
+    redis = FakeRedis()
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=[_rows((3, 10)), _rows(1, 2)])
+    session.get = AsyncMock(return_value=SimpleNamespace(id=10, raid_version=2, status="active"))
+
+    assert await rcc.resolve_raid_chat(session, -100, redis=redis) == RAID
+    assert await rcc.resolve_raid_chat(session, -100, redis=redis) == RAID
+    assert session.execute.await_count == 2 and session.get.await_count == 1
+
+    session.execute = AsyncMock(return_value=_rows())
+    assert await rcc.resolve_raid_chat(session, -200, redis=redis) is None
+    assert await rcc.resolve_raid_chat(session, -200, redis=redis) is None
+    assert session.execute.await_count == 1  # non-guild chat cached negatively
+
+
+@pytest.mark.asyncio
+async def test_batch_logs_participants_without_lookups_or_commit():
+    session = MagicMock()
+    session.execute = AsyncMock()
+    session.commit = AsyncMock()
+    events = [(1, NOW, 12, ["photo"]), (7, NOW, 5, None), (1, NOW, 3, None), (2, NOW, 8, None)]
+    with patch("waifu_bot.services.guild_raid_v2_service.resolve_raid_chat", AsyncMock(return_value=RAID)):
+        assert await log_raid_chat_events(session, -100, events) == 3
+
+    added = [c.args[0] for c in session.add.call_args_list]
+    assert all(isinstance(e, GuildRaidChatEvent) for e in added)
+    assert [(e.player_id, e.media_types_json) for e in added] == [(1, ["photo"]), (1, []), (2, [])]
+    (call,) = session.execute.await_args_list
+    assert sorted((p["b_pid"], p["b_n"]) for p in call.args[1]) == [(1, 2), (2, 1)]
+    session.commit.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_legacy_branch_reuses_resolution():
+    session = MagicMock()
+    session.execute = AsyncMock()
+    v1 = rcc.RaidChatTarget(guild_id=3, raid_id=9, raid_version=1, raid_status="active")
+    with patch("waifu_bot.services.guild_raid_service.resolve_raid_chat", AsyncMock(return_value=v1)):
+        out = await apply_raid_message_damage(session, -100, 1, message_length=4, media_types=None)
+    assert out == {"ok": False, "reason": "legacy_disabled"}
+    session.execute.assert_not_awaited()
+
+    with patch("waifu_bot.services.guild_raid_service.resolve_raid_chat", AsyncMock(return_value=RAID)):
+        out = await apply_raid_message_damage(session, -100, 2, message_length=4, media_types=None)
+    assert out == {"logged": True}
+
+
+def _persistent(session: Session, obj):
+    make_transient_to_detached(obj)
+    session.add(obj)
+    return obj
+
+
+@pytest.mark.asyncio
+async def test_raid_changes_drop_chat_entries_after_commit_only():
+    redis = FakeRedis()
+    redis.strings = {f"raid_chat:{c}": "none" for c in (-100, -200, -300)}
+    session = Session()
+    guild = _persistent(session, Guild(id=3, telegram_chat_id=-100, raid_active_id=None))
+    raid = _persistent(session, GuildRaid(id=10, guild_id=3, status="active", chat_id=-100, gxp_reward=1))
+    other = _persistent(session, GuildRaid(id=11, guild_id=4, status="active", chat_id=-300, gxp_reward=1))
+
+    raid.stage_monster_hp_current = 5  # damage: not part of the entry
+    rcc._collect(session, None, None)
+    assert rcc._PENDING_KEY not in session.info
+
+    session.add(GuildRaidParticipant(raid_id=10, player_id=7))
+    rcc._collect(session, None, None)
+    assert session.info[rcc._PENDING_KEY] == {-100}
+    rcc._after_rollback(session)
+    assert rcc._PENDING_KEY not in session.info
+
+    guild.telegram_chat_id = -200  # muster in another chat: old and new chat
+    other.status = "cancelled"  # guild 4 not loaded here; the raid's own chat still counts
+    with patch.object(rcc, "_guild_chat", side_effect=lambda s, gid: {3: -200, 4: None}[gid]):
+        rcc._collect(session, None, None)
+    assert session.info[rcc._PENDING_KEY] == {-100, -200, -300}
+    with patch("waifu_bot.core.redis.get_redis", return_value=redis):
+        await greenlet_spawn(rcc._after_commit, session)
+    assert redis.strings == {f"raid_chat:gen:{c}": "1" for c in (-100, -200, -300)}
+    assert rcc._PENDING_KEY not in session.info
+
+
+@pytest.mark.asyncio
+async def test_refill_loaded_before_an_invalidation_is_not_stored():
+    redis = FakeRedis()
+    session = MagicMock()
+
+    async def load_then_commit(*args, **kwargs):
+        # The raid starts and its commit hook runs while this reader is in the DB.
+        await rcc.invalidate_raid_chats(redis, [-100])
+        return _rows()
+
+    session.execute = AsyncMock(side_effect=load_then_commit)
+    assert await rcc.resolve_raid_chat(session, -100, redis=redis) is None  # pre-commit state
+    assert "raid_chat:-100" not in redis.strings  # not cached for CACHE_TTL_SECONDS
+
+    session.execute = AsyncMock(side_effect=[_rows((3, 10)), _rows(1, 2)])
+    session.get = AsyncMock(return_value=SimpleNamespace(id=10, raid_version=2, status="active"))
+    assert await rcc.resolve_raid_chat(session, -100, redis=redis) == RAID
+    assert rcc._load(redis.strings["raid_chat:-100"]) == RAID
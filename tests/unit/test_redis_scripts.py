@@ -0,0 +1,138 @@
+"""Unit tests: Lua script registry (EVALSHA reload) and the hot paths moved onto scripts."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from waifu_bot.game.constants import MediaType
+from waifu_bot.services import chat_rewards, hidden_skills
+from waifu_bot.services import redis_scripts as rs
+from waifu_bot.services.chat_rewards import ChatRewardBreakdown, try_award_chat_message
+from waifu_bot.services.gd_phantom_log import append_phantom_text, phantom_ucnt_key
+
+from tests.unit.fake_redis import SCRIPT_MIRRORS, FakeRedis
+
+_CFG = {
+    "chat_reward.min_seconds_between_msgs": "5",
+    "chat_reward.daily_points_cap": "6",
+    "chat_reward.points_per_msg_cap": "5",
+    "chat_reward.gold_per_point": "2",
+    "chat_reward.exp_per_point": "3",
+}
+
+
+def test_every_script_is_mirrored_and_unique():
+    assert set(rs.SCRIPTS) == set(SCRIPT_MIRRORS)
+    assert len({s.sha for s in rs.SCRIPTS.values()}) == len(rs.SCRIPTS)
+
+
+@pytest.mark.asyncio
+async def test_run_script_reloads_after_noscript_then_uses_evalsha():
+    redis = FakeRedis()
+    assert await rs.run_script(redis, rs.INCR_EXPIRE, ["c"], [60]) == 1
+    assert redis.commands == ["evalsha", "eval"]
+    redis.commands.clear()
+    assert await rs.run_script(redis, rs.INCR_EXPIRE, ["c"], [60]) == 2
+    assert redis.commands == ["evalsha"] and redis.ttls["c"] == 60
+
+    await redis.script_flush()
+    assert await rs.preload_scripts(redis) == len(rs.SCRIPTS)
+    assert redis.loaded_scripts == {s.sha for s in rs.SCRIPTS.values()}
+
+
+@pytest.mark.asyncio
+async def test_phantom_append_is_one_round_trip():
+    redis = FakeRedis()
+    redis.loaded_scripts.add(rs.GD_PHANTOM_APPEND.sha)
+    assert await append_phantom_text(redis, 5, 42, "привет")
+    assert redis.round_trips() == 1
+    assert redis.hashes[phantom_ucnt_key(5)] == {"42": "1"}
+
+
+def _session():
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=MagicMock(scalar_one_or_none=MagicMock(return_value=None)))
+    return session
+
+
+@pytest.mark.asyncio
+async def test_chat_award_gate_and_commit_are_two_round_trips(monkeypatch):
+    monkeypatch.setattr(
+        chat_rewards, "resolve_multipliers", AsyncMock(return_value=ChatRewardBreakdown(gold_mult=1.0, exp_mult=1.0))
+    )
+    monkeypatch.setattr(hidden_skills, "increment_skill_counter", AsyncMock())
+    redis = FakeRedis()
+    redis.loaded_scripts.update(s.sha for s in rs.SCRIPTS.values())
+    kw = dict(chat_id=-100, media_type=MediaType.PHOTO, text_chars=0, cfg=_CFG)
+
+    assert await try_award_chat_message(_session(), redis, player_id=1, **kw)
+    assert redis.round_trips() == 2
+    assert redis.hashes["chat_reward:buf:1"] == {"gold": "4", "exp": "6", "points": "2", "messages": "1"}
+    assert redis.sets["chat_authors:-100"] == {"1"}
+
+    # Cooldown: one round trip, nothing buffered.
+    redis.commands.clear()
+    assert not await try_award_chat_message(_session(), redis, player_id=1, **kw)
+    assert redis.round_trips() == 1
+
+    # Concurrent message pushed the live counter past the cap between gate and commit.
+    day = chat_rewards._today_msk()
+    redis.strings.pop(chat_rewards._cd_key(1))
+
+    async def racing_db_points(*_args):
+        redis.strings[chat_rewards._daily_pts_key(1, day)] = "5"
+        return 0
+
+    monkeypatch.setattr(chat_rewards, "_db_today_points", racing_db_points)
+    assert not await try_award_chat_message(_session(), redis, player_id=1, **kw)
+    assert redis.hashes["chat_reward:buf:1"]["messages"] == "1"
+
+
+@pytest.mark.asyncio
+async def test_chat_drain_reads_and_clears_in_one_step():
+    redis = FakeRedis()
+    redis.hashes["buf"] = {"gold": "4", "points": "2"}
+    redis.strings["pts"] = "2"
+    flat = await rs.run_script(redis, rs.CHAT_REWARD_DRAIN, ["buf", "pts"])
+    assert chat_rewards._int_pairs(flat) == {"gold": 4, "points": 2}
+    assert "buf" not in redis.hashes and "pts" not in redis.strings
+
+
+@pytest.mark.asyncio
+async def test_hidden_trackers_on_scripts(monkeypatch):
+    inc = AsyncMock()
+    set_counter = AsyncMock()
+    monkeypatch.setattr(hidden_skills, "increment_skill_counter", inc)
+    monkeypatch.setattr(hidden_skills, "set_skill_counter", set_counter)
+    redis = FakeRedis()
+
+    await hidden_skills.try_hoarder_saving_streak(None, 7, 500, redis)
+    await hidden_skills.try_hoarder_saving_streak(None, 7, 900, redis)  # same day: no-op
+    assert inc.await_count == 1 and redis.strings["hidden:hoarder:peak:7"] == "500"
+
+    redis.strings["hidden:consistent:last:7"] = "20000101"
+    redis.strings["hidden:consistent:streak:7"] = "9"
+    await hidden_skills.try_track_consistent_day(None, 7, redis)
+    await hidden_skills.try_track_consistent_day(None, 7, redis)
+    set_counter.assert_awaited_once_with(None, 7, "consistent", 1)
+
+    now = int(datetime.now(timezone.utc).timestamp())
+    redis.strings["hidden:marathon:start:7"] = str(now - 8 * 3600)
+    redis.strings["hidden:marathon:last_msg:7"] = str(now - 3600)
+    inc.reset_mock()
+    await hidden_skills.try_track_marathon_session(None, 7, redis)
+    inc.assert_awaited_once_with(None, 7, "marathon_complete", 1)
+    assert int(redis.strings["hidden:marathon:start:7"]) >= now
+
+
+@pytest.mark.asyncio
+async def test_daily_streak_mirror_semantics():
+    redis = FakeRedis()
+    keys = ["d1", "last", "streak"]
+    assert await rs.run_script(redis, rs.DAILY_STREAK, keys, ["20260102", "20260101", 86400, 999]) == 1
+    assert await rs.run_script(redis, rs.DAILY_STREAK, keys, ["20260102", "20260101", 86400, 999]) == -1
+    assert await rs.run_script(redis, rs.DAILY_STREAK, ["d2", "last", "streak"], ["20260103", "20260102", 1, 9]) == 2
+    assert await rs.run_script(redis, rs.DAILY_STREAK, ["d3", "last", "streak"], ["20260110", "20260109", 1, 9]) == 1
@@ -11,6 +11,7 @@ import pytest
 from waifu_bot.db.models import InventoryItem
 from waifu_bot.services.gamble import GAMBLE_SIZE, GambleService
 from waifu_bot.services.shop import ShopService, shop_size_for_act
+from waifu_bot.services.player_pricing import PlayerPricingContext
 
 
 def _shop_offers_after_sell(*, act: int = 1, sold_slot: int = 2) -> list[SimpleNamespace]:
@@ -93,9 +94,9 @@ async def test_get_shop_inventory_marks_sold_slot_without_inventory_row() -> Non
 
     with patch.object(svc, "_ensure_offers", new_callable=AsyncMock, return_value=offers):
         with patch(
-            "waifu_bot.services.shop.merchant_discount_pct_for_player",
+            "waifu_bot.services.shop.get_player_pricing_context",
             new_callable=AsyncMock,
-            return_value=0.0,
+            return_value=PlayerPricingContext(player_id=1),
         ):
             with patch(
                 "waifu_bot.services.inventory_payload.enrich_inventory_items_with_template_stats",
@@ -0,0 +1,126 @@
+"""Unit tests: static asset manifest build, hashed URLs, sidecar serving and HTML rewrite."""
+
+from __future__ import annotations
+
+import gzip
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from scripts.lib.static_asset_build import build_manifest, write_manifest
+from waifu_bot.services import static_assets as sa
+from waifu_bot.services.sse import SseSkipGZipMiddleware
+
+APP_JS = ("console.log('waifu');\n" * 200).encode()
+
+
+@pytest.fixture
+def built(tmp_path, monkeypatch):
+    static = tmp_path / "static"
+    webapp = tmp_path / "webapp"
+    for slug, color in (("a", "red"), ("b", "blue")):
+        d = static / "game" / "items" / "webp" / "sword" / slug
+        d.mkdir(parents=True)
+        Image.new("RGBA", (96, 96), color).save(d / "t1.webp")
+    webapp.mkdir()
+    (webapp / "app.js").write_bytes(APP_JS)
+    (webapp / "index.html").write_text(
+        '<script src="./app.js?v=waifu-webapp-v1"></script><a href="https://t.me/x">x</a>',
+        encoding="utf-8",
+    )
+    mounts = {"/static": static, "/webapp": webapp}
+    monkeypatch.setattr(sa, "mount_directories", lambda: mounts)
+    monkeypatch.setattr(sa, "manifest_path", lambda: static / sa.MANIFEST_NAME)
+    manifest = build_manifest(mounts, atlas=True)
+    write_manifest(static / sa.MANIFEST_NAME, manifest)
+    sa.reset_manifest_cache()
+    yield mounts, manifest
+    sa.reset_manifest_cache()
+
+
+def _client(mounts) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(SseSkipGZipMiddleware, minimum_size=500)
+    app.mount("/webapp", sa.AssetStaticFiles(mount="/webapp", directory=str(mounts["/webapp"]), html=True))
+    app.mount("/static", sa.AssetStaticFiles(mount="/static", directory=str(mounts["/static"])))
+    return TestClient(app)
+
+
+def test_hash_helpers_roundtrip():
+    assert sa.hashed_name("/webapp/bundle/app.min.js", "0123456789ab") == "/webapp/bundle/app.min.0123456789ab.js"
+    assert sa.split_hashed("/webapp/bundle/app.min.0123456789ab.js") == ("/webapp/bundle/app.min.js", "0123456789ab")
+    assert sa.split_hashed("/webapp/bundle/app.min.js") is None
+    assert sa.accepted_encodings("gzip, br;q=0, deflate") == {"gzip", "deflate"}
+
+
+def test_manifest_records_hashes_sidecars_and_atlas(built):
+    mounts, manifest = built
+    entry = manifest["files"]["/webapp/app.js"]
+    assert entry["e"] == ["gz"]
+    assert gzip.decompress((mounts["/webapp"] / "app.js.gz").read_bytes()) == APP_JS
+    assert "/webapp/index.html" not in manifest["files"]
+    assert manifest["atlases"]["items-t1"]["count"] == 2
+    assert "/static/game/atlas/items-t1.webp" in manifest["files"]
+
+    url = sa.asset_url("/webapp/app.js")
+    assert url == f"/webapp/app.{entry['h']}.js"
+    sprite = sa.sprite_for("/static/game/items/webp/sword/b/t1.webp")
+    assert sprite["w"] == 96 and sprite["url"].startswith("/static/game/atlas/items-t1.")
+
+    # Changed on disk since the build → plain URL, no atlas frame.
+    os.utime(mounts["/webapp"] / "app.js", ns=(1, 1))
+    assert sa.asset_url("/webapp/app.js") == "/webapp/app.js"
+    assert sa.asset_url("/static/unknown.webp") == "/static/unknown.webp"
+
+
+def test_hashed_request_serves_sidecar_immutable_with_304(built):
+    mounts, _ = built
+    client = _client(mounts)
+    url = sa.asset_url("/webapp/app.js")
+
+    resp = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["cache-control"] == sa.IMMUTABLE_CACHE_CONTROL
+    assert resp.headers["content-type"].startswith("text/javascript")
+    assert "Accept-Encoding" in resp.headers["vary"]
+    assert resp.content == APP_JS
+
+    again = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": resp.headers["etag"]})
+    assert again.status_code == 304
+
+    stale = client.get("/webapp/app.000000000000.js", headers={"Accept-Encoding": "identity"})
+    assert stale.status_code == 200
+    assert stale.headers["cache-control"] == sa.REVALIDATE_CACHE_CONTROL
+    assert "content-encoding" not in stale.headers
+
+
+def test_html_is_rewritten_to_hashed_urls(built):
+    mounts, manifest = built
+    client = _client(mounts)
+    resp = client.get("/webapp/index.html")
+    h = manifest["files"]["/webapp/app.js"]["h"]
+    assert f'src="./app.{h}.js"' in resp.text
+    assert 'href="https://t.me/x"' in resp.text
+    assert resp.headers["cache-control"] == sa.REVALIDATE_CACHE_CONTROL
+    assert client.get("/webapp/index.html", headers={"If-None-Match": resp.headers["etag"]}).status_code == 304
+    assert client.get("/static/.asset-manifest.json").status_code == 404
+
+
+def test_gzip_middleware_skips_media_and_prebuilt_assets(built):
+    assert sa.skip_gzip("/static/game/items/webp/sword/a/t1.webp")
+    assert sa.skip_gzip(sa.asset_url("/webapp/app.js"))
+    assert not sa.skip_gzip("/webapp/index.html")
+    assert not sa.skip_gzip("/api/inventory")
+
+
+def test_no_manifest_keeps_plain_urls(tmp_path, monkeypatch):
+    monkeypatch.setattr(sa, "manifest_path", lambda: tmp_path / "missing.json")
+    sa.reset_manifest_cache()
+    from waifu_bot.services.item_art import game_asset_public_url
+
+    assert game_asset_public_url("items_webp/sword/a/t1.webp") == "/static/game/items/webp/sword/a/t1.webp"
+    sa.reset_manifest_cache()
@@ -0,0 +1,233 @@
+"""Unit tests: webhook update queue (dedupe, per-chat order across parallel chats, ack retries, dead letters, leases, handover)."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from waifu_bot.services import redis_scripts as rs
+from waifu_bot.services import telegram_ingress as ingress
+
+from tests.unit.fake_redis import FakeRedis
+
+
+def _msg(update_id: int, chat_id: int, text: str = "hi") -> dict:
+    return {"update_id": update_id, "message": {"message_id": update_id, "chat": {"id": chat_id}, "text": text}}
+
+
+def test_ordering_key_per_update_kind():
+    assert ingress.chat_key(_msg(1, -100)) == -100
+    assert ingress.chat_key({"update_id": 2, "callback_query": {"from": {"id": 7}, "message": {"chat": {"id": -5}}}}) == -5
+    assert ingress.chat_key({"update_id": 3, "callback_query": {"from": {"id": 7}}}) == 7  # inline message
+    assert ingress.chat_key({"update_id": 4, "my_chat_member": {"chat": {"id": -9}, "from": {"id": 1}}}) == -9
+    assert ingress.chat_key({"update_id": 5, "poll_answer": {"user": {"id": 11}}}) == 11
+    assert ingress.chat_key({"update_id": 6}) == 0
+    assert ingress.shard_for(-100, 8) == ingress.shard_for(-100, 8) == (-100) % 8
+
+
+@pytest.mark.asyncio
+async def test_enqueue_is_one_round_trip_and_drops_telegram_retries():
+    redis = FakeRedis()
+    redis.loaded_scripts.add(rs.TELEGRAM_UPDATE_ENQUEUE.sha)
+    with patch("waifu_bot.core.config.settings.telegram_ingress_shards", 4):
+        assert await ingress.enqueue_update(redis, _msg(1, -100))
+        assert redis.round_trips() == 1
+        assert await ingress.enqueue_update(redis, _msg(1, -100))  # retry of the same update_id
+        assert await ingress.enqueue_update(redis, _msg(2, -101))
+        assert not await ingress.enqueue_update(redis, {"message": {}})  # no update_id: inline
+        assert not await ingress.enqueue_update(None, _msg(3, -100))
+
+    (entry_id, fields), = redis.streams[ingress.stream_key((-100) % 4)]
+    assert json.loads(fields["b"]) == _msg(1, -100) and fields["c"] == "-100"
+    assert len(redis.streams[ingress.stream_key((-101) % 4)]) == 1
+    assert not await ingress.accept_update(_msg(4, -100))  # no consumer pool here: route goes inline
+
+
+@pytest.mark.asyncio
+async def test_drain_keeps_chat_order_and_runs_chats_in_parallel():
+    redis = FakeRedis()
+    with patch("waifu_bot.core.config.settings.telegram_ingress_shards", 1):
+        for uid, chat in [(1, -1), (2, -2), (3, -1), (4, -2), (5, -1)]:
+            assert await ingress.enqueue_update(redis, _msg(uid, chat))
+
+        seen: list[tuple[int, int]] = []
+        chat2_started = asyncio.Event()
+
+        async def dispatch(payload: dict) -> bool:
+            chat = payload["message"]["chat"]["id"]
+            if chat == -2:
+                chat2_started.set()
+            elif payload["update_id"] == 1:
+                # Chat -1 blocks until chat -2 runs: chats do not wait on each other.
+                await asyncio.wait_for(chat2_started.wait(), timeout=1)
+            seen.append((chat, payload["update_id"]))
+            return True
+
+        assert await ingress.drain_shard(redis, 0, dispatch=dispatch) == 5
+        assert await ingress.drain_shard(redis, 0, dispatch=dispatch) == 0
+        stats = await ingress.ingress_stats(redis)
+
+    assert [u for c, u in seen if c == -1] == [1, 3, 5]
+    assert [u for c, u in seen if c == -2] == [2, 4]
+    assert seen.index((-2, 2)) < seen.index((-1, 1))
+    assert stats["shards"] == [{"shard": 0, "length": 0, "pending": 0, "lag": 0}] and stats["backlog"] == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_chat_does_not_hold_back_later_reads_and_entries_ack_one_by_one():
+    redis = FakeRedis()
+    with patch("waifu_bot.core.config.settings.telegram_ingress_shards", 1):
+        for uid, chat in [(1, -1), (2, -2), (3, -2), (4, -2), (5, -1)]:
+            await ingress.enqueue_update(redis, _msg(uid, chat))
+        stream = ingress.stream_key(0)
+        chat2_done = asyncio.Event()
+        seen: list[int] = []
+        backlog_while_slow: list[int] = []
+
+        async def dispatch(payload: dict) -> bool:
+            uid = payload["update_id"]
+            if uid == 1:
+                # Updates 2..4 come in later reads (count=1) and must finish meanwhile.
+                await asyncio.wait_for(chat2_done.wait(), timeout=1)
+                backlog_while_slow.extend(json.loads(f["b"])["update_id"] for _, f in redis.streams[stream])
+            seen.append(uid)
+            if uid == 4:
+                chat2_done.set()
+            return True
+
+        assert await ingress.drain_shard(redis, 0, dispatch=dispatch, count=1) == 5
+
+    assert seen == [2, 3, 4, 1, 5]
+    assert backlog_while_slow == [1, 5]  # chat -2 entries were acked and deleted as they finished
+    assert redis.streams[stream] == []
+
+
+@pytest.mark.asyncio
+async def test_new_lease_holder_waits_for_previous_holders_entries_to_go_idle():
+    redis = FakeRedis()
+    with patch("waifu_bot.core.config.settings.telegram_ingress_shards", 1), \
+            patch.object(ingress, "PENDING_RETRY_SEC", 0):
+        stream = ingress.stream_key(0)
+        await ingress.ensure_group(redis, stream)
+        for uid in (1, 2):
+            await ingress.enqueue_update(redis, _msg(uid, -1))
+        await redis.xreadgroup(ingress.GROUP, "old-holder", {stream: ">"}, count=10)  # still running there
+        await ingress.enqueue_update(redis, _msg(3, -1))
+
+        seen: list[int] = []
+
+        async def dispatch(payload: dict) -> bool:
+            seen.append(payload["update_id"])
+            return True
+
+        consumer = ingress.ShardConsumer(redis, 0, dispatch)
+        assert await consumer.read() == 0  # neither claims nor overtakes the old holder's entries
+        assert seen == [] and len(redis.streams[stream]) == 3
+
+        for entry in redis.groups[(stream, ingress.GROUP)]["pending"].values():
+            entry[2] -= ingress.CLAIM_IDLE_MS  # old holder died: its entries went idle
+        assert await consumer.read() == 2
+        await consumer.join()
+        assert await consumer.read() == 1
+        await consumer.join()
+
+    assert seen == [1, 2, 3] and consumer.acked == 3 and redis.streams[stream] == []
+
+
+@pytest.mark.asyncio
+async def test_failed_ack_is_retried_without_running_the_update_again():
+    redis = FakeRedis()
+    with patch("waifu_bot.core.config.settings.telegram_ingress_shards", 1):
+        stream = ingress.stream_key(0)
+        await ingress.ensure_group(redis, stream)
+        for uid in (1, 2):
+            await ingress.enqueue_update(redis, _msg(uid, -1))
+        seen: list[int] = []
+
+        async def dispatch(payload: dict) -> bool:
+            seen.append(payload["update_id"])
+            return True
+
+        first_id = redis.streams[stream][0][0]
+        xack, failures = redis.xack, [2]
+
+        async def flaky_xack(name, group, *ids):
+            if first_id in ids and failures[0]:  # update 1: its ack and the first retry fail
+                failures[0] -= 1
+                raise RedisConnectionError("down")
+            return await xack(name, group, *ids)
+
+        redis.xack = flaky_xack
+        consumer = ingress.ShardConsumer(redis, 0, dispatch)
+        assert await consumer.read() == 2
+        await consumer.join()
+        assert consumer.acked == 1 and len(redis.streams[stream]) == 1
+
+        for entry in redis.groups[(stream, ingress.GROUP)]["pending"].values():
+            entry[2] -= ingress.CLAIM_IDLE_MS  # would be re-claimable by now
+        await ingress.enqueue_update(redis, _msg(3, -1))
+        assert await consumer.read() == 1  # ack retry failed again: not stale, new entries still read
+        await consumer.join()
+        assert await consumer.read() == 0
+        await consumer.join()
+
+    assert seen == [1, 2, 3] and consumer.acked == 3
+    assert redis.streams[stream] == [] and not redis.groups[(stream, ingress.GROUP)]["pending"]
+
+
+@pytest.mark.asyncio
+async def test_failed_updates_are_dead_lettered_and_requeued():
+    redis = FakeRedis()
+    with patch("waifu_bot.core.config.settings.telegram_ingress_shards", 2):
+        for uid in (1, 2, 3, 4):
+            await ingress.enqueue_update(redis, _msg(uid, -10))
+        stream = ingress.stream_key(0)
+        await redis.xadd(stream, {"u": "5", "c": "-10", "t": "0", "b": "{broken"})
+
+        async def dispatch(payload: dict) -> bool:
+            uid = payload["update_id"]
+            if uid == 2:
+                ingress.note_handler_error(RuntimeError("no rights in chat"))  # dispatcher error handler
+            if uid == 3:
+                raise ValueError("boom")
+            return uid != 4
+
+        assert await ingress.drain_shard(redis, 0, dispatch=dispatch) == 5
+        assert redis.streams[stream] == [] and not redis.groups[(stream, ingress.GROUP)]["pending"]
+
+        dead = await ingress.list_dead(redis)
+        assert [(d["update_id"], d["error"]) for d in dead] == [
+            (2, "RuntimeError: no rights in chat"),
+            (3, "ValueError: boom"),
+            (4, "dispatch failed"),
+            (5, "malformed entry"),
+        ]
+        assert await ingress.requeue_dead(redis, ids=[dead[0]["id"], "0-1"]) == [dead[0]["id"]]
+        assert len(await ingress.list_dead(redis)) == 3
+        (_, fields), = redis.streams[stream]
+        assert json.loads(fields["b"]) == _msg(2, -10)
+
+        ok: list[int] = []
+
+        async def fixed(payload: dict) -> bool:
+            ok.append(payload["update_id"])
+            return True
+
+        assert await ingress.drain_shard(redis, 0, dispatch=fixed) == 1
+    assert ok == [2]
+
+
+@pytest.mark.asyncio
+async def test_one_lease_holder_per_shard():
+    redis = FakeRedis()
+    assert await ingress.hold_lease(redis, 3, owner="a")
+    assert await ingress.hold_lease(redis, 3, owner="a")  # renew
+    assert not await ingress.hold_lease(redis, 3, owner="b")
+    assert await ingress.hold_lease(redis, 3, owner="b", ttl=0)  # release by a non-owner: no-op
+    assert not await ingress.hold_lease(redis, 3, owner="b")
+    assert await ingress.hold_lease(redis, 3, owner="a", ttl=0)
+    assert await ingress.hold_lease(redis, 3, owner="b")
@@ -0,0 +1,174 @@
+"""Unit tests: batched wallet transactions (WalletTx / apply_tx)."""
+
+from __future__ import annotations
+
+from collections import Counter
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from waifu_bot.db import models as m
+from waifu_bot.services import wallet as w
+
+from scripts.lib.wallet_bench import payout_plan
+
+
+def _balance(pid: int, key: str, amount: int) -> m.PlayerWalletBalance:
+    return m.PlayerWalletBalance(player_id=pid, currency_key=key, amount=amount)
+
+
+def _session(players: dict[int, SimpleNamespace]) -> MagicMock:
+    session = MagicMock()
+    session.get = AsyncMock(side_effect=lambda model, pid: players.get(pid))
+    return session
+
+
+def _patch_io(balances: dict, *, skip: tuple = (), progress: dict | None = None, claimed: tuple = ()):
+    async def lock(session, pairs):
+        lock.pairs = list(pairs)
+        return {p: balances.setdefault(p, _balance(p[0], p[1], 0)) for p in pairs}
+
+    async def ledger(session, moves):
+        out = Counter(mv.ledger_key() for mv in moves)
+        for key in skip:
+            out[key] -= 1
+        return out
+
+    return (
+        patch.object(w, "_existing_keys", AsyncMock(return_value=set(claimed))),
+        patch.object(w, "_lock_balances", lock),
+        patch.object(w, "_insert_ledger", AsyncMock(side_effect=ledger)),
+        patch.object(w, "_lock_abyss_progress", AsyncMock(return_value=progress or {})),
+    )
+
+
+@pytest.mark.asyncio
+async def test_apply_tx_credits_several_players_and_currencies_with_mirrors():
+    players = {1: SimpleNamespace(gold=10, enchant_dust=0), 2: SimpleNamespace(gold=0, enchant_dust=0)}
+    balances = {(2, "enchant_dust"): _balance(2, "enchant_dust", 5)}
+    prog = SimpleNamespace(abyss_shards=0)
+    tx = (
+        w.WalletTx()
+        .credit(2, "enchant_dust", 7, source="abyss_kill")
+        .credit(1, "gold", 15, source="abyss_kill", ref_type="abyss_floor", ref_id=12)
+        .credit(1, "abyss_shards", 3, source="abyss_checkpoint")
+        .credit(1, "abyss_shards", 0, source="abyss_checkpoint")
+        .debit(2, "enchant_dust", 10, source="temper")
+    )
+    keys_p, lock_p, ledger_p, prog_p = _patch_io(balances, progress={1: prog})
+    with keys_p, lock_p as lock, ledger_p as ledger, prog_p as lock_prog:
+        flags = await w.apply_tx(_session(players), tx)
+
+    assert flags == [True] * 5
+    assert lock.pairs == [(1, "abyss_shards"), (2, "enchant_dust")]
+    assert ledger.await_count == 1 and len(ledger.await_args.args[1]) == 4
+    assert tx.movements[1].ref_id == "12"
+    assert players[1].gold == 25
+    assert balances[(2, "enchant_dust")].amount == 2 and players[2].enchant_dust == 2
+    assert balances[(1, "abyss_shards")].amount == 3 and prog.abyss_shards == 3
+    lock_prog.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_idempotent_duplicate_is_skipped_per_movement():
+    players = {1: SimpleNamespace(gold=0, enchant_dust=0)}
+    balances: dict = {}
+    tx = (
+        w.WalletTx()
+        .credit(1, "gold", 100, source="challenge_first", ref_type="challenge_progress", ref_id=5)
+        .credit(1, "refine_core", 1, source="challenge_first", ref_type="challenge_progress_core", ref_id=5)
+    )
+    keys_p, lock_p, ledger_p, prog_p = _patch_io(balances, skip=(tx.movements[0].ledger_key(),))
+    with keys_p, lock_p, ledger_p, prog_p:
+        flags = await w.apply_tx(_session(players), tx)
+    assert flags == [False, True]
+    assert players[1].gold == 0 and balances[(1, "refine_core")].amount == 1
+
+
+@pytest.mark.asyncio
+async def test_debits_checked_in_order_before_any_write():
+    players = {1: SimpleNamespace(gold=50, enchant_dust=0)}
+    balances = {(1, "refine_core"): _balance(1, "refine_core", 2)}
+    ok = w.WalletTx().credit(1, "refine_core", 3, source="x").debit(1, "refine_core", 5, source="refine")
+    short = w.WalletTx().debit(1, "gold", 30, source="refine").debit(1, "gold", 30, source="refine")
+    keys_p, lock_p, ledger_p, prog_p = _patch_io(balances)
+    with keys_p, lock_p, ledger_p as ledger, prog_p:
+        assert await w.apply_tx(_session(players), ok) == [True, True]
+        assert balances[(1, "refine_core")].amount == 0
+        with pytest.raises(w.InsufficientCurrency) as exc:
+            await w.apply_tx(_session(players), short)
+    assert exc.value.have == 20 and exc.value.need == 30
+    assert ledger.await_count == 1 and players[1].gold == 50
+
+
+@pytest.mark.asyncio
+async def test_replayed_debit_returns_false_instead_of_insufficient():
+    players = {1: SimpleNamespace(gold=0, enchant_dust=0)}
+    balances = {(1, "refine_core"): _balance(1, "refine_core", 1)}
+    tx = (
+        w.WalletTx()
+        .debit(1, "refine_core", 5, source="refine", ref_type="inventory_item", ref_id=9)
+        .debit(1, "refine_core", 1, source="refine", ref_type="inventory_item", ref_id=10)
+    )
+    replayed = tx.movements[0]
+    keys_p, lock_p, ledger_p, prog_p = _patch_io(
+        balances, skip=(replayed.ledger_key(),), claimed=(replayed.idempotency_key(),)
+    )
+    with keys_p as keys, lock_p, ledger_p, prog_p:
+        assert await w.apply_tx(_session(players), tx) == [False, True]
+    assert keys.await_args.args[1] == [replayed.idempotency_key(), tx.movements[1].idempotency_key()]
+    assert balances[(1, "refine_core")].amount == 0
+
+
+@pytest.mark.asyncio
+async def test_validation_and_empty_tx():
+    with pytest.raises(ValueError):
+        w.WalletTx().credit(1, "rubies", 1, source="x")
+    with pytest.raises(ValueError):
+        w.WalletTx().debit(1, "gold", -1, source="x")
+    session = MagicMock()
+    assert not w.WalletTx().credit(1, "gold", 0, source="x")
+    assert await w.apply_tx(session, w.WalletTx().credit(1, "gold", 0, source="x")) == [True]
+    session.execute.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_set_based_statements_lock_in_key_order_and_claim_idempotency_keys():
+    session = MagicMock()
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = []
+    result.all.return_value = [(1, "in", "gold", "admin", None, None)]
+    session.execute = AsyncMock(return_value=result)
+
+    await w._lock_balances(session, [(1, "enchant_dust"), (2, "refine_core")])
+    ins, sel = (c.args[0].compile(dialect=postgresql.dialect()) for c in session.execute.await_args_list)
+    assert "ON CONFLICT (player_id, currency_key) DO NOTHING" in str(ins)
+    assert "ORDER BY player_wallet_balances.player_id, player_wallet_balances.currency_key" in str(sel)
+    assert str(sel).rstrip().endswith("FOR UPDATE")
+
+    session.execute.reset_mock()
+    result.all.return_value = [(1, "admin", "grant", "7")]
+    moves = [
+        w.Movement(1, "gold", 5, "in", "admin", "grant", "7"),
+        w.Movement(1, "gold", 5, "in", "admin", "grant", "7"),
+        w.Movement(1, "gold", 2, "in", "abyss_kill"),
+    ]
+    written = await w._insert_ledger(session, moves)
+    keys_sql, ledger_sql = (
+        str(c.args[0].compile(dialect=postgresql.dialect())) for c in session.execute.await_args_list
+    )
+    assert "economy_ledger_keys" in keys_sql and "RETURNING" in keys_sql
+    assert "ON CONFLICT (player_id, source, ref_type, ref_id) DO NOTHING" in keys_sql
+    assert "INSERT INTO economy_ledger " in ledger_sql and "ON CONFLICT" not in ledger_sql
+    assert written == Counter({moves[0].ledger_key(): 1, moves[2].ledger_key(): 1})
+
+
+def test_bench_payout_plan_is_deterministic():
+    plan = payout_plan([1, 2, 3, 4], payouts=20, players_per_payout=3, seed=5)
+    assert plan == payout_plan([1, 2, 3, 4], payouts=20, players_per_payout=3, seed=5)
+    assert len(plan) == 20
+    for payout in plan:
+        assert len({pid for pid, _, _ in payout}) == 3
+        assert sum(1 for _, key, _ in payout if key == "gold") == 3